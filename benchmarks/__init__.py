@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""
+PegaProx hot-path benchmarks.
+
+fake_pve — deterministic in-process Proxmox API (synthetic clusters, injectable
+latency / errors). runner — cases, measurement, JSON results, baseline diff.
+Run with `python -m benchmarks` from the repo root; see benchmarks/README.md.
+"""
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+python -m benchmarks — run the hot-path benchmarks against a simulated cluster.
+
+    python -m benchmarks                          # all cases, default 8 nodes / 500 guests
+    python -m benchmarks --vms 5000 --latency-ms 2 --case get_vm_resources
+    python -m benchmarks --json out.json --fail-on-regression
+    python -m benchmarks --save-baseline          # refresh benchmarks/baseline.json
+
+Exit code 1 with --fail-on-regression when any compared metric is worse than
+the baseline by more than --threshold.
+"""
+# Same runtime as the server: the manager's fan-out and the DB's off-hub reads
+# behave differently without gevent, so patch before anything else is imported.
+try:
+    from gevent import monkey
+    monkey.patch_all()
+except ImportError:
+    pass
+
+import argparse
+import logging
+import sys
+
+from benchmarks import runner
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.split('\n\n')[0].strip())
+    ap.add_argument('--case', action='append', dest='cases', metavar='NAME',
+                    help='run only this case (repeatable); see --list')
+    ap.add_argument('--list', action='store_true', help='list cases and exit')
+    ap.add_argument('--nodes', type=int, default=8)
+    ap.add_argument('--vms', type=int, default=500)
+    ap.add_argument('--storages', type=int, default=2, help='storages per node (first is local)')
+    ap.add_argument('--tasks', type=int, default=50)
+    ap.add_argument('--latency-ms', type=float, default=0.0, help='added latency per fake API request')
+    ap.add_argument('--jitter-ms', type=float, default=0.0, help='uniform random extra latency (seeded)')
+    ap.add_argument('--error-rate', type=float, default=0.0, help='fraction of fake API requests answering 500')
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--iterations', type=int, default=50)
+    ap.add_argument('--warmup', type=int, default=3)
+    ap.add_argument('--alloc-iterations', type=int, default=5)
+    ap.add_argument('--json', metavar='PATH', help='write results as JSON')
+    ap.add_argument('--baseline', metavar='PATH', default=runner.DEFAULT_BASELINE)
+    ap.add_argument('--save-baseline', action='store_true', help='write this run to --baseline')
+    ap.add_argument('--threshold', type=float, default=0.25, help='relative change counted as regression')
+    ap.add_argument('--fail-on-regression', action='store_true')
+    ap.add_argument('-v', '--verbose', action='store_true')
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(levelname)s %(message)s')
+
+    if args.list:
+        for name, c in runner.CASES.items():
+            print(f'{name:<30} {c["description"]}')
+        return 0
+
+    current = runner.run(
+        args.cases, iterations=args.iterations, warmup=args.warmup, alloc_iterations=args.alloc_iterations,
+        nodes=args.nodes, vms=args.vms, storages=args.storages, tasks=args.tasks,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate, seed=args.seed,
+    )
+    if args.json:
+        runner.save_results(current, args.json)
+
+    rows = []
+    baseline = None if args.save_baseline else runner.load_baseline(args.baseline)
+    if baseline:
+        mismatch = runner.params_mismatch(current, baseline)
+        if mismatch:
+            print(f"baseline not compared: parameters differ ({', '.join(mismatch)})", file=sys.stderr)
+        else:
+            rows = runner.compare(current, baseline, threshold=args.threshold)
+    runner.format_report(current, rows)
+    if current['meta']['fake_pve_misses']:
+        print(f"note: fake PVE had no route for {', '.join(current['meta']['fake_pve_misses'])}", file=sys.stderr)
+
+    if args.save_baseline:
+        runner.save_results(current, args.baseline)
+        print(f'baseline written to {args.baseline}')
+    if args.fail_on_regression and any(r['regression'] for r in rows):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
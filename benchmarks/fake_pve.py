@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""
+Deterministic in-process fake of the Proxmox VE REST API.
+
+NS Oct 2026: the hot paths we want to time (get_vm_resources, get_node_status,
+one broadcast tick, the balance check) all talk to PVE through the manager's
+cached requests session. Instead of a real pveproxy we mount FakePVEAdapter on
+that session, so the manager code under test runs unmodified — URL building,
+session wrapper, JSON decoding, per-node fan-out — and only the socket is
+replaced. Data comes from SyntheticCluster, generated from a seed, so two runs
+with the same parameters see byte-identical payloads.
+
+Latency and errors are injectable (fixed + jittered latency per request, a
+global error rate, per-node "unreachable" 595s) so the same cases can be timed
+against a healthy LAN cluster and a slow / flaky WAN one.
+"""
+import json
+import random
+import re
+import threading
+import time
+from urllib.parse import urlsplit, parse_qs
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+G = 2 ** 30
+
+
+class SyntheticCluster:
+    """Static cluster state (nodes, guests, storage, tasks) built from a seed."""
+
+    def __init__(self, nodes=3, vms=30, storages=2, tasks=50, seed=1, name='bench'):
+        rng = random.Random(seed)
+        self.name = name
+        self.node_names = [f'pve{i + 1}' for i in range(max(1, nodes))]
+        self.nodes = {}
+        for n in self.node_names:
+            self.nodes[n] = {
+                'node': n, 'status': 'online', 'type': 'node', 'id': f'node/{n}',
+                'cpu': round(rng.uniform(0.05, 0.85), 4), 'maxcpu': 32,
+                'mem': int(rng.uniform(0.2, 0.9) * 256 * G), 'maxmem': 256 * G,
+                'disk': int(rng.uniform(0.1, 0.6) * 100 * G), 'maxdisk': 100 * G,
+                'uptime': rng.randint(3600, 90 * 86400), 'level': '',
+            }
+
+        self.guests = []
+        for i in range(vms):
+            vmid = 100 + i
+            vtype = 'lxc' if rng.random() < 0.2 else 'qemu'
+            node = self.node_names[rng.randrange(len(self.node_names))]
+            running = rng.random() < 0.85
+            maxmem = rng.choice((2, 4, 8, 16, 32)) * G
+            maxdisk = rng.choice((16, 32, 64, 128)) * G
+            self.guests.append({
+                'id': f'{vtype}/{vmid}', 'vmid': vmid, 'type': vtype, 'node': node,
+                'name': f'{"ct" if vtype == "lxc" else "vm"}-{vmid}',
+                'status': 'running' if running else 'stopped', 'template': 0,
+                'cpu': round(rng.uniform(0, 0.9), 4) if running else 0,
+                'maxcpu': rng.choice((1, 2, 4, 8)),
+                'mem': int(rng.uniform(0.1, 0.95) * maxmem) if running else 0, 'maxmem': maxmem,
+                'disk': int(rng.uniform(0.1, 0.8) * maxdisk) if vtype == 'lxc' else 0, 'maxdisk': maxdisk,
+                'netin': rng.randint(0, 10 ** 11) if running else 0,
+                'netout': rng.randint(0, 10 ** 11) if running else 0,
+                'diskread': rng.randint(0, 10 ** 11), 'diskwrite': rng.randint(0, 10 ** 11),
+                'uptime': rng.randint(60, 30 * 86400) if running else 0,
+                'tags': rng.choice(('', '', 'prod', 'web;prod', 'db')),
+            })
+
+        self.by_vmid = {g['vmid']: g for g in self.guests}
+
+        self.storage = []
+        for n in self.node_names:
+            for s in range(max(1, storages)):
+                shared = s > 0
+                sid = f'ceph{s}' if shared else 'local-lvm'
+                total = (10 * 1024 if shared else 2 * 1024) * G
+                self.storage.append({
+                    'id': f'storage/{n}/{sid}', 'storage': sid, 'node': n, 'type': 'storage',
+                    'status': 'available', 'shared': 1 if shared else 0,
+                    'plugintype': 'rbd' if shared else 'lvmthin', 'content': 'images,rootdir',
+                    'disk': int(rng.uniform(0.1, 0.7) * total), 'maxdisk': total,
+                })
+
+        base = 1_760_000_000
+        self.tasks = []
+        for i in range(tasks):
+            node = self.node_names[i % len(self.node_names)]
+            start = base + i * 37
+            kind = rng.choice(('qmstart', 'qmstop', 'vzdump', 'qmigrate', 'vncproxy'))
+            vmid = 100 + rng.randrange(max(1, vms))
+            self.tasks.append({
+                'upid': f'UPID:{node}:{i:08X}:{i:08X}:{start:08X}:{kind}:{vmid}:root@pam:',
+                'node': node, 'type': kind, 'id': str(vmid), 'user': 'root@pam',
+                'starttime': start, 'endtime': start + rng.randint(1, 300), 'status': 'OK',
+            })
+        self.tasks.sort(key=lambda t: -t['starttime'])
+
+    def guest_config(self, guest):
+        cfg = {'name': guest['name'], 'cores': guest['maxcpu'], 'memory': guest['maxmem'] // 2 ** 20,
+               'digest': f'{guest["vmid"]:040x}', 'onboot': 1}
+        if guest['tags']:
+            cfg['tags'] = guest['tags']
+        # every 4th guest sits on node-local storage (relevant for balancing)
+        store = 'local-lvm' if guest['vmid'] % 4 == 0 else 'ceph1'
+        size = f'{guest["maxdisk"] // G}G'
+        if guest['type'] == 'lxc':
+            cfg.update({'hostname': guest['name'], 'rootfs': f'{store}:subvol-{guest["vmid"]}-disk-0,size={size}',
+                        'net0': f'name=eth0,bridge=vmbr0,hwaddr=BC:24:11:00:{guest["vmid"] // 256:02X}:{guest["vmid"] % 256:02X},ip=dhcp'})
+        else:
+            cfg.update({'scsi0': f'{store}:vm-{guest["vmid"]}-disk-0,size={size}', 'ostype': 'l26',
+                        'net0': f'virtio=BC:24:11:00:{guest["vmid"] // 256:02X}:{guest["vmid"] % 256:02X},bridge=vmbr0',
+                        'agent': '1', 'boot': 'order=scsi0'})
+        return cfg
+
+    def node_status(self, node):
+        n = self.nodes[node]
+        return {
+            'cpu': n['cpu'], 'uptime': n['uptime'], 'loadavg': ['0.50', '0.40', '0.30'],
+            'memory': {'used': n['mem'], 'total': n['maxmem'], 'free': n['maxmem'] - n['mem']},
+            'swap': {'used': 0, 'total': 8 * G, 'free': 8 * G},
+            'rootfs': {'used': n['disk'], 'total': n['maxdisk'], 'avail': n['maxdisk'] - n['disk']},
+            'cpuinfo': {'cpus': n['maxcpu'], 'sockets': 2, 'model': 'Synthetic CPU'},
+            'ksm': {'shared': 0}, 'pveversion': 'pve-manager/8.4.1', 'kversion': 'Linux 6.8.12',
+        }
+
+    def rrd(self, node, points=70):
+        n = self.nodes[node]
+        return [{'time': 1_760_000_000 + i * 60, 'cpu': n['cpu'], 'netin': 1000.0 + i, 'netout': 500.0 + i,
+                 'memused': n['mem'], 'memtotal': n['maxmem']} for i in range(points)]
+
+
+class FakePVEAdapter(BaseAdapter):
+    """requests transport adapter that answers PVE API calls from a SyntheticCluster.
+
+    latency_ms / jitter_ms — added per request (jitter is uniform 0..jitter_ms,
+    drawn from a seeded RNG). error_rate — fraction of requests answered with a
+    500 (or a ConnectionError with error_mode='reset'). unreachable — node names
+    whose proxied per-node calls answer 595 like a dead cluster member.
+    Unknown paths answer 404 and are recorded in `.misses`.
+    """
+
+    def __init__(self, cluster, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0,
+                 error_mode='http', unreachable=(), seed=1):
+        super().__init__()
+        self.cluster = cluster
+        self.latency_ms = float(latency_ms)
+        self.jitter_ms = float(jitter_ms)
+        self.error_rate = float(error_rate)
+        self.error_mode = error_mode
+        self.unreachable = set(unreachable)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.misses = set()
+        self._export_calls = 0
+        self._routes = [
+            (re.compile(r'^/version$'), self._version),
+            (re.compile(r'^/nodes$'), self._nodes),
+            (re.compile(r'^/nodes/([^/]+)/status$'), self._node_status),
+            (re.compile(r'^/nodes/([^/]+)/rrddata$'), self._node_rrd),
+            (re.compile(r'^/cluster/resources$'), self._resources),
+            (re.compile(r'^/cluster/tasks$'), self._tasks),
+            (re.compile(r'^/cluster/status$'), self._cluster_status),
+            (re.compile(r'^/cluster/options$'), self._cluster_options),
+            (re.compile(r'^/storage$'), self._storage_config),
+            (re.compile(r'^/cluster/ha/(?:status/current|resources|groups)$'), self._empty_list),
+            (re.compile(r'^/cluster/metrics/export$'), self._metrics_export),
+            (re.compile(r'^/nodes/([^/]+)/(qemu|lxc)/(\d+)/config$'), self._guest_config),
+        ]
+
+    # ── routes ──
+    def _version(self, q):
+        return 200, {'version': '8.4.1', 'release': '8.4', 'repoid': 'bench'}
+
+    def _nodes(self, q):
+        return 200, [dict(n) for n in self.cluster.nodes.values()]
+
+    def _node_status(self, q, node):
+        if node not in self.cluster.nodes:
+            return 404, None
+        return 200, self.cluster.node_status(node)
+
+    def _node_rrd(self, q, node):
+        if node not in self.cluster.nodes:
+            return 404, None
+        return 200, self.cluster.rrd(node)
+
+    def _resources(self, q):
+        rtype = (q.get('type') or [''])[0]
+        if rtype == 'vm':
+            rows = self.cluster.guests
+        elif rtype == 'node':
+            rows = list(self.cluster.nodes.values())
+        elif rtype == 'storage':
+            rows = self.cluster.storage
+        else:
+            rows = list(self.cluster.nodes.values()) + self.cluster.guests + self.cluster.storage
+        return 200, [dict(r) for r in rows]
+
+    def _tasks(self, q):
+        return 200, [dict(t) for t in self.cluster.tasks]
+
+    def _cluster_status(self, q):
+        rows = [{'type': 'cluster', 'name': self.cluster.name, 'quorate': 1, 'nodes': len(self.cluster.nodes)}]
+        rows += [{'type': 'node', 'name': n, 'online': 1, 'local': int(i == 0), 'nodeid': i + 1,
+                  'ip': f'10.0.0.{i + 1}'} for i, n in enumerate(self.cluster.node_names)]
+        return 200, rows
+
+    def _cluster_options(self, q):
+        return 200, {'keyboard': 'en-us', 'migration': {'type': 'secure'}}
+
+    def _storage_config(self, q):
+        seen = {}
+        for st in self.cluster.storage:
+            seen.setdefault(st['storage'], {'storage': st['storage'], 'type': st['plugintype'],
+                                            'shared': st['shared'], 'content': st['content']})
+        return 200, list(seen.values())
+
+    def _empty_list(self, q):
+        return 200, []
+
+    def _metrics_export(self, q):
+        # pvestatd feed: cumulative per-node NIC counters (`derive`). The value
+        # advances with every call so the manager can differentiate a rate.
+        with self._lock:
+            self._export_calls += 1
+            tick = self._export_calls
+        now = int(time.time())
+        rows = []
+        for i, n in enumerate(self.cluster.node_names):
+            for metric, rate in (('net_in', 1000 + i), ('net_out', 500 + i)):
+                rows.append({'id': f'node/{n}', 'metric': metric, 'type': 'derive',
+                             'value': rate * 10 * tick, 'timestamp': now})
+        # object-returning endpoint → double-wrapped over HTTP
+        return 200, {'data': rows}
+
+    def _guest_config(self, q, node, vtype, vmid):
+        g = self.cluster.by_vmid.get(int(vmid))
+        if not g or g['node'] != node or g['type'] != vtype:
+            return 500, None      # PVE answers 500 "does not exist" for a wrong node/type
+        return 200, self.cluster.guest_config(g)
+
+    # ── transport ──
+    def _dispatch(self, method, path, query):
+        if not path.startswith('/api2/json'):
+            return 404, None
+        path = path[len('/api2/json'):].rstrip('/') or '/'
+        node = re.match(r'^/nodes/([^/]+)/', path)
+        if node and node.group(1) in self.unreachable:
+            return 595, None
+        if method != 'GET':
+            self.misses.add(f'{method} {path}')
+            return 501, None
+        for rx, handler in self._routes:
+            m = rx.match(path)
+            if m:
+                return handler(query, *m.groups())
+        self.misses.add(f'{method} {path}')
+        return 404, None
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        parts = urlsplit(request.url)
+        with self._lock:
+            self.requests += 1
+            delay = self.latency_ms + (self._rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0)
+            fail = self.error_rate > 0 and self._rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        if fail and self.error_mode == 'reset':
+            raise requests.exceptions.ConnectionError('connection reset by fake PVE', request=request)
+        if fail:
+            status, data = 500, None
+        else:
+            status, data = self._dispatch(request.method, parts.path, parse_qs(parts.query))
+
+        resp = requests.Response()
+        resp.status_code = status
+        resp._content = json.dumps({'data': data}).encode()
+        resp.headers = CaseInsensitiveDict({'Content-Type': 'application/json;charset=UTF-8'})
+        resp.encoding = 'utf-8'
+        resp.reason = 'OK' if status == 200 else 'Error'
+        resp.url = request.url
+        resp.request = request
+        resp.connection = self
+        return resp
+
+    def close(self):
+        pass
+
+
+def attach(mgr, adapter, host='fake-pve.invalid'):
+    """Point a PegaProxManager at `adapter` as if connect_to_proxmox() had succeeded
+    with an API token, without any network I/O."""
+    mgr._ssl_verify = False
+    mgr._using_api_token = True
+    mgr._api_token = 'bench@pve!bench=00000000-0000-0000-0000-000000000000'
+    mgr._ticket = None
+    mgr._csrf_token = None
+    mgr.current_host = host
+    mgr.is_connected = True
+    mgr.session = True
+    mgr._create_session().mount('https://', adapter)
+    return mgr
+
+
+def make_manager(cluster, adapter=None, cluster_id='bench', **config):
+    """A PegaProxManager wired to a fake PVE for `cluster` (a SyntheticCluster)."""
+    from pegaprox.core.manager import PegaProxManager
+    from pegaprox.models.tasks import PegaProxConfig
+    data = {'name': cluster.name, 'host': 'fake-pve.invalid', 'user': 'bench@pve',
+            'pass': '', 'fallback_hosts': ['fake-pve.invalid'], 'dry_run': True}
+    data.update(config)
+    mgr = PegaProxManager(cluster_id, PegaProxConfig(data))
+    return attach(mgr, adapter or FakePVEAdapter(cluster))
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark runner: hot-path cases, measurement, JSON results, baseline diff.
+
+NS Oct 2026: every case is a factory `setup(env) -> fn`; the runner calls
+fn() `warmup` times, then `iterations` times under perf_counter for latency
+(p50 / p99 / mean) and throughput, then a few more under tracemalloc for
+allocation figures (kept out of the timed loop — tracing roughly doubles the
+cost of every allocation). Result-caches inside the code under test (node
+status TTL, tasks TTL, the heavy-read cache) are disabled or cleared per call
+so a case measures the real work, not a dict lookup.
+
+Results are plain JSON so CI can archive them; compare() diffs a run
+against a stored baseline with a relative threshold.
+"""
+import gc
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+from benchmarks.fake_pve import SyntheticCluster, FakePVEAdapter, make_manager
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# compared per case; 'higher' = bigger is better
+COMPARED_METRICS = (
+    ('p50_ms', 'lower'),
+    ('p99_ms', 'lower'),
+    ('ops_per_sec', 'higher'),
+    ('alloc_peak_kib', 'lower'),
+)
+
+CASES = {}
+
+
+def case(name, description, max_iterations=None):
+    """Register a benchmark case. The decorated function gets the BenchEnv and
+    returns the zero-arg callable to time. max_iterations caps the timed loop
+    for cases that take seconds per call."""
+    def deco(setup):
+        CASES[name] = {'setup': setup, 'description': description, 'max_iterations': max_iterations}
+        return setup
+    return deco
+
+
+class BenchEnv:
+    """One synthetic cluster + fake PVE + a manager wired to it, shared by all cases of a run."""
+
+    def __init__(self, nodes=8, vms=500, storages=2, tasks=50, latency_ms=0.0, jitter_ms=0.0,
+                 error_rate=0.0, seed=1):
+        self.params = {'nodes': nodes, 'vms': vms, 'storages': storages, 'tasks': tasks,
+                       'latency_ms': latency_ms, 'jitter_ms': jitter_ms,
+                       'error_rate': error_rate, 'seed': seed}
+        self.cluster = SyntheticCluster(nodes=nodes, vms=vms, storages=storages, tasks=tasks, seed=seed)
+        self.adapter = FakePVEAdapter(self.cluster, latency_ms=latency_ms, jitter_ms=jitter_ms,
+                                      error_rate=error_rate, seed=seed)
+        self.cluster_id = 'bench'
+        self._mgr = None
+
+    @property
+    def manager(self):
+        if self._mgr is None:
+            self._mgr = make_manager(self.cluster, self.adapter, cluster_id=self.cluster_id)
+            self._mgr.logger.setLevel(logging.WARNING)
+            # measure the fetch, not the short result caches in front of it
+            self._mgr._node_status_ttl = 0
+            self._mgr._tasks_ttl = 0
+        return self._mgr
+
+
+@contextmanager
+def scratch_db():
+    """Point PegaProxDB at a throwaway directory for the duration of a run
+    (same redirection the test suite's `db` fixture does)."""
+    import pegaprox.core.db as dbmod
+    tmp = tempfile.mkdtemp(prefix='pegaprox_bench_')
+    orig = (dbmod.CONFIG_DIR, dbmod.DATABASE_FILE, dbmod.KEY_FILE)
+    dbmod.CONFIG_DIR = tmp
+    dbmod.DATABASE_FILE = os.path.join(tmp, 'pegaprox.db')
+    dbmod.KEY_FILE = os.path.join(tmp, '.pegaprox.key')
+    dbmod._db = None
+    dbmod.PegaProxDB._instance = None
+    try:
+        yield dbmod.get_db()
+    finally:
+        try:
+            dbmod._db._audit_writer.stop()
+        except Exception:
+            pass
+        dbmod._db = None
+        dbmod.PegaProxDB._instance = None
+        dbmod.CONFIG_DIR, dbmod.DATABASE_FILE, dbmod.KEY_FILE = orig
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+# ── cases ────────────────────────────────────────────────────────────────────
+
+@case('get_vm_resources', '/cluster/resources?type=vm fetch + per-guest enrichment')
+def _case_vm_resources(env):
+    mgr = env.manager
+    return lambda: mgr.get_vm_resources()
+
+
+@case('get_node_status', 'node list + parallel per-node status fan-out')
+def _case_node_status(env):
+    mgr = env.manager
+    return lambda: mgr.get_node_status()
+
+
+@case('broadcast_for_cluster', 'one SSE broadcast tick for a watched cluster')
+def _case_broadcast(env):
+    from pegaprox.background.broadcast import broadcast_for_cluster
+    mgr = env.manager
+    tick = {'n': 0}
+
+    def run():
+        tick['n'] += 1
+        broadcast_for_cluster(env.cluster_id, mgr, tick['n'])
+    return run
+
+
+@case('run_balance_check', 'dry-run balance check: scores + whole-cluster plan')
+def _case_balance(env):
+    mgr = env.manager
+    return lambda: mgr.run_balance_check(force=True)
+
+
+def _collector_snapshot(cluster, step):
+    """One metrics-collector snapshot (tsdb.flatten_cluster shape) for `cluster`;
+    `step` wiggles the values so chunks don't compress to constants."""
+    wig = (step % 12) / 100.0
+    nodes = {n: {'cpu': round(d['cpu'] * 100 + wig, 2), 'mem_percent': round(d['mem'] / d['maxmem'] * 100, 2),
+                 'maxcpu': d['maxcpu'], 'maxmem': d['maxmem'], 'temp': 55.0 + wig}
+             for n, d in cluster.nodes.items()}
+    vms = {}
+    for g in cluster.guests:
+        running = g['status'] == 'running'
+        vms[str(g['vmid'])] = {'t': g['type'], 'r': running,
+                               'cpu': round(g['cpu'] * 100 + wig, 2) if running else None,
+                               'mem': round(g['mem'] / g['maxmem'] * 100, 2) if running else None,
+                               'maxmem': g['maxmem'], 'maxcpu': g['maxcpu']}
+    storage = {}
+    for st in cluster.storage:
+        storage.setdefault(st['storage'], {'used': st['disk'], 'total': st['maxdisk'],
+                                           'pct': round(st['disk'] / st['maxdisk'] * 100, 1)})
+    running = [g for g in cluster.guests if g['status'] == 'running']
+    totals = {'vms_running': sum(1 for g in running if g['type'] == 'qemu'),
+              'vms_stopped': sum(1 for g in cluster.guests if g['type'] == 'qemu' and g['status'] != 'running'),
+              'cts_running': sum(1 for g in running if g['type'] == 'lxc'),
+              'cts_stopped': sum(1 for g in cluster.guests if g['type'] == 'lxc' and g['status'] != 'running'),
+              'cpu_used': sum(d['cpu'] * d['maxcpu'] for d in cluster.nodes.values()),
+              'cpu_total': sum(d['maxcpu'] for d in cluster.nodes.values()),
+              'mem_used': sum(d['mem'] for d in cluster.nodes.values()),
+              'mem_total': sum(d['maxmem'] for d in cluster.nodes.values())}
+    return {'name': cluster.name, 'nodes': nodes, 'totals': totals, 'vms': vms, 'storage': storage}
+
+
+@case('load_cluster_metrics_window', '2-day metrics history read + decode (cold cache)', max_iterations=10)
+def _case_metrics_window(env):
+    from pegaprox.api.helpers import load_cluster_metrics_window
+    from pegaprox.core import tsdb, dbcrypto
+    days = 2
+    now = int(time.time())
+    first = now - days * 86400
+    samples, meta = [], {}
+    for i, ts in enumerate(range(first - first % 300, now, 300)):
+        points, meta = tsdb.flatten_cluster(_collector_snapshot(env.cluster, i))
+        samples.append((ts, points))
+    dbcrypto.run_heavy_txn(lambda conn: tsdb.append_points(conn, env.cluster_id, samples, meta))
+
+    def run():
+        dbcrypto._HEAVY_CACHE.clear()
+        return load_cluster_metrics_window(env.cluster_id, days)
+    return run
+
+
+# ── measurement ─────────────────────────────────────────────────────────────
+
+def _percentile(sorted_vals, p):
+    if not sorted_vals:
+        return 0.0
+    k = (len(sorted_vals) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+def measure(fn, iterations=50, warmup=3, alloc_iterations=5, adapter=None):
+    """Time `fn`. Returns the per-case result dict."""
+    for _ in range(warmup):
+        fn()
+    req0 = adapter.requests if adapter else 0
+    err0 = adapter.errors if adapter else 0
+    gc.collect()
+    durations = []
+    wall0 = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - t0)
+    wall = time.perf_counter() - wall0
+    requests_per_op = ((adapter.requests - req0) / iterations) if adapter else 0
+    errors = (adapter.errors - err0) if adapter else 0
+
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for _ in range(alloc_iterations):
+            gc.collect()
+            base, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            fn()
+            cur, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - base)
+            retained.append(cur - base)
+    finally:
+        tracemalloc.stop()
+
+    s = sorted(durations)
+    return {
+        'iterations': iterations,
+        'ops_per_sec': round(iterations / wall, 2) if wall > 0 else 0.0,
+        'mean_ms': round(statistics.fmean(s) * 1000, 3),
+        'p50_ms': round(_percentile(s, 50) * 1000, 3),
+        'p99_ms': round(_percentile(s, 99) * 1000, 3),
+        'min_ms': round(s[0] * 1000, 3),
+        'max_ms': round(s[-1] * 1000, 3),
+        'alloc_peak_kib': round(statistics.fmean(peaks) / 1024, 1) if peaks else 0.0,
+        'alloc_retained_kib': round(statistics.fmean(retained) / 1024, 1) if retained else 0.0,
+        'requests_per_op': round(requests_per_op, 2),
+        'errors': errors,
+    }
+
+
+def run(names=None, iterations=50, warmup=3, alloc_iterations=5, **env_params):
+    """Run the selected cases (all by default) against one BenchEnv."""
+    names = list(names or CASES)
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        raise ValueError(f"unknown benchmark case(s): {', '.join(unknown)}")
+    results = {}
+    with scratch_db():
+        env = BenchEnv(**env_params)
+        for name in names:
+            fn = CASES[name]['setup'](env)
+            cap = CASES[name]['max_iterations']
+            n = min(iterations, cap) if cap else iterations
+            results[name] = measure(fn, iterations=n, warmup=min(warmup, n),
+                                    alloc_iterations=min(alloc_iterations, n), adapter=env.adapter)
+            logging.info(f"[bench] {name}: p50 {results[name]['p50_ms']}ms, "
+                         f"{results[name]['ops_per_sec']} ops/s")
+        misses = sorted(env.adapter.misses)
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'params': dict(env.params, iterations=iterations, warmup=warmup),
+            'fake_pve_misses': misses,
+        },
+        'results': results,
+    }
+
+
+# ── baseline ────────────────────────────────────────────────────────────────
+
+def load_baseline(path=DEFAULT_BASELINE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_results(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(current, baseline, threshold=0.25):
+    """Diff `current` against `baseline` (both run() outputs). A metric regresses
+    when it is worse than the baseline by more than `threshold` (relative).
+    Returns a list of {case, metric, baseline, current, change, regression}."""
+    rows = []
+    base_results = (baseline or {}).get('results', {})
+    for name, cur in current.get('results', {}).items():
+        base = base_results.get(name)
+        if not base:
+            continue
+        for metric, better in COMPARED_METRICS:
+            b, c = base.get(metric), cur.get(metric)
+            if not isinstance(b, (int, float)) or not isinstance(c, (int, float)) or b <= 0:
+                continue
+            change = (c - b) / b
+            worse = change > threshold if better == 'lower' else change < -threshold
+            rows.append({'case': name, 'metric': metric, 'baseline': b, 'current': c,
+                         'change': round(change, 4), 'regression': worse})
+    return rows
+
+
+def params_mismatch(current, baseline):
+    """Parameter keys whose values differ between the two runs (a diff across
+    different cluster sizes is meaningless)."""
+    a = (current or {}).get('meta', {}).get('params', {})
+    b = (baseline or {}).get('meta', {}).get('params', {})
+    return sorted(k for k in set(a) | set(b) if k not in ('iterations', 'warmup') and a.get(k) != b.get(k))
+
+
+def format_report(current, rows=None, out=sys.stdout):
+    out.write(f"{'case':<30} {'p50 ms':>10} {'p99 ms':>10} {'ops/s':>10} {'peak KiB':>10} {'req/op':>8}\n")
+    for name, r in current['results'].items():
+        out.write(f"{name:<30} {r['p50_ms']:>10.3f} {r['p99_ms']:>10.3f} {r['ops_per_sec']:>10.2f} "
+                  f"{r['alloc_peak_kib']:>10.1f} {r['requests_per_op']:>8.2f}\n")
+    if rows:
+        out.write('\nvs. baseline:\n')
+        for row in rows:
+            flag = 'REGRESSION' if row['regression'] else ''
+            out.write(f"  {row['case']:<28} {row['metric']:<15} {row['baseline']:>10} → {row['current']:<10} "
+                      f"{row['change'] * 100:+7.1f}% {flag}\n")
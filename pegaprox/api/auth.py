@@ -12,7 +12,7 @@ from flask import Blueprint, jsonify, request, make_response
 from pegaprox.constants import *
 from pegaprox.globals import *
 from pegaprox.models.permissions import *
-from pegaprox.core.db import get_db
+from pegaprox.core.db import get_db, bump_auth_generation
 
 from pegaprox.utils.auth import (
     hash_password, verify_password, needs_password_rehash,
@@ -1793,6 +1793,7 @@ def revoke_api_token_endpoint(token_id):
             if row:
                 cursor.execute('UPDATE api_tokens SET revoked = 1 WHERE id = ?', (token_id,))
                 db.conn.commit()
+                bump_auth_generation()
                 token_owner = dict(row)['username']
                 token_name = dict(row)['name']
                 log_audit(username, 'token.revoked', f"Revoked API token '{token_name}' (user: {token_owner})")
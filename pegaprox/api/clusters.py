@@ -18,9 +18,12 @@ from pegaprox.utils.audit import log_audit
 from pegaprox.utils.sanitization import sanitize_log_message as _sl  # CWE-117
 from pegaprox.utils.rbac import (
     has_permission, get_user_clusters, filter_clusters_for_user,
-    user_can_access_vm, invalidate_pool_cache, get_vm_acls,
+    user_can_access_vm, invalidate_pool_cache, get_vm_list_visibility,
 )
 from pegaprox.utils.realtime import broadcast_sse, broadcast_update, push_immediate_update
+from pegaprox.utils.resource_state import drop_resource_state
+from pegaprox.core import inventory
+from pegaprox.core.migration_queue import drop_migration_queue
 from pegaprox.core.config import load_config, save_config
 from pegaprox.core.manager import PegaProxManager
 from pegaprox.core.xcpng import XcpngManager, XENAPI_AVAILABLE
@@ -128,6 +131,8 @@ def get_clusters():
                 'balance_mem_weight': getattr(mgr.config, 'balance_mem_weight', 1.0),
                 'balance_io_weight': getattr(mgr.config, 'balance_io_weight', 0.0),
                 'cpu_baseline': getattr(mgr.config, 'cpu_baseline', None),
+                'migration_max_parallel': getattr(mgr.config, 'migration_max_parallel', 0),
+                'migration_max_per_node': getattr(mgr.config, 'migration_max_per_node', 0),
                 'enabled': mgr.config.enabled,
                 'ha_enabled': mgr.config.ha_enabled,
                 'fallback_hosts': mgr.config.fallback_hosts,
@@ -535,6 +540,9 @@ def delete_cluster(cluster_id):
 
     mgr.stop()
     del cluster_managers[cluster_id]
+    drop_resource_state(cluster_id)
+    inventory.drop_cluster(cluster_id)
+    drop_migration_queue(cluster_id)
 
     # MK: Delete cluster and all related data from database
     try:
@@ -963,6 +971,18 @@ def get_cluster_api_latency(cluster_id):
 
     mgr = cluster_managers[cluster_id]
     samples = list(getattr(mgr, '_api_latency', []) or [])
+    # NS Oct 2026 — cumulative histograms + pool/TLS/coalescing stats from the API
+    # transport. Unlike the deque these cover every session call, not just _api_*.
+    from pegaprox.core.api_transport import ApiTransport
+    transport = getattr(mgr, '_api_transport', None)
+    transport_info = None
+    if isinstance(transport, ApiTransport):
+        transport_info = transport.stats()
+        transport_info['histograms'] = [
+            {'method': m, 'endpoint': ep, 'count': h['count'], 'errors': h['errors'],
+             'sum_ms': round(h['sum_ms'], 1), 'buckets': [[le, c] for le, c in h['buckets']]}
+            for (m, ep), h in sorted(transport.histograms.snapshot().items(), key=lambda kv: -kv[1]['sum_ms'])[:50]
+        ]
     if not samples:
         return jsonify({
             'samples': 0,
@@ -970,6 +990,7 @@ def get_cluster_api_latency(cluster_id):
             'error_rate': 0,
             'recent': [],
             'by_endpoint': [],
+            'transport': transport_info,
         })
 
     # window: only consider last 5 min for headline stats; recent for sparkline
@@ -1019,6 +1040,7 @@ def get_cluster_api_latency(cluster_id):
         'error_rate': round((errs / n) * 100.0, 1) if n else 0,
         'recent': recent,
         'by_endpoint': by_ep_list,
+        'transport': transport_info,
     })
 
 
@@ -1058,35 +1080,9 @@ def get_cluster_resources(cluster_id):
     if user.get('role') == ROLE_ADMIN:
         return jsonify(all_resources)
     
-    # LW: Filter VMs based on ACLs - only show VMs user can access
-    acls = get_vm_acls()
-    cluster_acls = acls.get(cluster_id, {})
-    
-    # if no ACLs defined for this cluster, check if user has general vm.view permission
-    if not cluster_acls:
-        if has_permission(user, 'vm.view'):
-            return jsonify(all_resources)
-        else:
-            return jsonify([])  # no vm.view permission and no ACLs
-    
-    # filter resources - show VMs user has ACL access to OR general vm.view permission
-    filtered = []
-    has_general_view = has_permission(user, 'vm.view')
-    
-    for vm in all_resources:
-        vmid = str(vm.get('vmid', ''))
-        vm_acl = cluster_acls.get(vmid, {})
-        
-        if vm_acl:
-            # VM has specific ACL - check if user is in whitelist
-            allowed_users = vm_acl.get('users', [])
-            if user['username'] in allowed_users or '*' in allowed_users:
-                filtered.append(vm)
-        elif has_general_view:
-            # No specific ACL but user has general view permission
-            filtered.append(vm)
-    
-    return jsonify(filtered)
+    # LW: Filter VMs based on ACLs - only show VMs user has ACL access to OR general vm.view
+    # NS Oct 2026 — decision is precomputed per (user, cluster), the loop is a set test per row
+    return jsonify(get_vm_list_visibility(user, cluster_id).filter(all_resources, type_key=None))
 
 # NS: Feb 2026 - SECURITY: explicit allowlist prevents mass assignment attacks
 # Password/key changes must go through dedicated endpoints with their own auth
@@ -1101,6 +1097,7 @@ ALLOWED_CONFIG_FIELDS = {
     'cpu_baseline',
     'vnc_tunnel',  # MK Apr 2026 — SSH-tunnel-mode for VNC console
     'proxlb_tags_enabled',  # MK Jul 2026 (#426) — derive placement from ProxLB VM tags
+    'migration_max_parallel', 'migration_max_per_node',  # NS Oct 2026 — migration queue caps
 }
 
 @bp.route('/api/clusters/<cluster_id>', methods=['PUT'])
@@ -2493,3 +2490,29 @@ def trigger_balance_now(cluster_id):
     log_audit(usr, 'balance.manual', f"Manual balance check triggered for {mgr.config.name}", cluster=mgr.config.name)
 
     return jsonify({'message': 'Balance check started'})
+
+
+# NS: Oct 2026 - dry-run view of the balancer's migration plan. Plans from
+# live scores; ?cached=1 returns what the last balance cycle planned instead.
+@bp.route('/api/clusters/<cluster_id>/balance-plan', methods=['GET'])
+@require_auth(perms=['cluster.config'])
+def get_balance_plan(cluster_id):
+    ok, err = check_cluster_access(cluster_id)
+    if not ok: return err
+
+    mgr = cluster_managers.get(cluster_id)
+    if not mgr:
+        return jsonify({'error': 'Cluster not found'}), 404
+    if not hasattr(mgr, 'plan_balance'):
+        return jsonify({'error': 'Balance planning is only available for Proxmox clusters'}), 400
+    if request.args.get('cached') in ('1', 'true'):
+        return jsonify({'plan': mgr.last_balance_plan})
+    if not mgr.is_connected:
+        return jsonify({'error': 'Cluster not connected'}), 503
+
+    try:
+        plan = mgr.plan_balance()
+    except Exception as e:
+        logging.error(f"[BAL] plan for {cluster_id} failed: {e}")
+        return jsonify({'error': 'Failed to compute balance plan'}), 500
+    return jsonify({'plan': plan})
@@ -32,7 +32,7 @@ from flask import Blueprint, jsonify, request
 from pegaprox.globals import cluster_managers
 from pegaprox.utils.auth import require_auth
 from pegaprox.utils.sanitization import sanitize_csv_field
-from pegaprox.api.helpers import check_cluster_access, load_metrics_window
+from pegaprox.api.helpers import check_cluster_access, load_cluster_metrics_window
 from pegaprox.core.db import get_db
 from pegaprox.models.permissions import ROLE_ADMIN
 
@@ -90,17 +90,14 @@ def _current_user():
 
 
 def _load_history(cluster_id, days=30):
-    """Pull all snapshots for a cluster. Fetch+parse run off-hub + cached in
-    load_metrics_window (shared with insights/power); we just filter."""
-    out = []
+    """Snapshots for one cluster as (ts_unix, cluster_data), oldest→newest.
+    Read + decode run off-hub + cached in load_cluster_metrics_window (shared
+    with insights/power); only this cluster's series are read."""
     try:
-        for ts_unix, clusters in load_metrics_window(days):
-            cd = clusters.get(cluster_id)
-            if cd:
-                out.append((ts_unix, cd))
+        return load_cluster_metrics_window(cluster_id, days) or []
     except Exception as e:
         logging.warning(f"[costs] history load failed for {cluster_id}: {e}")
-    return out
+    return []
 
 
 def _compute_per_vm(snapshots, mgr, rates, hours_window):
@@ -20,10 +20,15 @@ Workflow:
 
 Diff is a list of {path, op, before, after} entries. Keeps it explainable.
 
+Config reads run in parallel (per-cluster limit). Each guest's PVE config
+`digest` is stored next to its baseline; a guest whose digest matches the
+baseline or the last clean scan isn't diffed again.
+
 Drift events also fan out via the alerts notification handlers, so the same
 Slack/Discord/ntfy/web-push channels users have configured for alerts also
 get drift notifications without extra plumbing.
 """
+import os
 import json
 import time
 import uuid
@@ -36,6 +41,7 @@ from pegaprox.globals import cluster_managers
 from pegaprox.utils.auth import require_auth
 from pegaprox.api.helpers import check_cluster_access
 from pegaprox.core.db import get_db
+from pegaprox.utils.concurrent import run_concurrent
 from pegaprox.models.permissions import ROLE_ADMIN
 
 bp = Blueprint('drift', __name__)
@@ -71,76 +77,157 @@ def _strip_volatile(d, volatile_keys):
     return out
 
 
-def _fetch_state(mgr, cluster_id):
+# NS Oct 2026 — config reads fan out through the shared gevent pool. The limit is
+# per cluster (a manual scan + the background one share it) so a 5k-guest scan
+# doesn't open hundreds of parallel requests against one pveproxy.
+DRIFT_SCAN_CONCURRENCY = int(os.environ.get('PEGAPROX_DRIFT_CONCURRENCY', '8'))
+_FETCH_CHUNK = 256          # tasks handed to run_concurrent per call
+_FETCH_CHUNK_TIMEOUT = 120
+_cluster_fetch_slots = {}
+_cluster_fetch_slots_lock = threading.Lock()
+
+
+def _fetch_slot(cluster_id):
+    with _cluster_fetch_slots_lock:
+        sem = _cluster_fetch_slots.get(cluster_id)
+        if sem is None:
+            sem = _cluster_fetch_slots[cluster_id] = threading.BoundedSemaphore(max(1, DRIFT_SCAN_CONCURRENCY))
+        return sem
+
+
+def _api_data(mgr, url, slot):
+    """GET url under the cluster's slot; returns the `data` payload or None."""
+    with slot:
+        r = mgr._api_get(url)
+    if r is None or getattr(r, 'status_code', 0) != 200:
+        return None
+    return r.json().get('data')
+
+
+def _fetch_state(mgr, cluster_id, digests=None, failed=None):
     """Return list of (kind, scope, snapshot_dict). Robust to per-call fails;
-    a single dead node shouldn't poison the whole snapshot."""
+    a single dead node shouldn't poison the whole snapshot.
+
+    If `digests` is a dict it gets {vm scope: PVE config digest} filled in, so
+    the scanner can tell which guests changed without diffing them.
+
+    If `failed` is a set it gets (kind, scope) for every read that errored or
+    timed out — missing from the result but not gone (see _fetch_failed)."""
     out = []
     host, port = mgr.host, mgr.api_port
+    base = f"https://{host}:{port}/api2/json"
+    slot = _fetch_slot(cluster_id)
 
-    # cluster options
-    try:
-        r = mgr._api_get(f"https://{host}:{port}/api2/json/cluster/options")
-        if r is not None and getattr(r, 'status_code', 0) == 200:
-            data = r.json().get('data') or {}
-            out.append(('cluster_options', 'global', data))
-    except Exception as e:
-        logging.debug(f"[drift] cluster/options fetch failed: {e}")
+    def _cluster_options():
+        try:
+            data = _api_data(mgr, f"{base}/cluster/options", slot)
+            return [('cluster_options', 'global', data or {})] if data is not None else None
+        except Exception as e:
+            logging.debug(f"[drift] cluster/options fetch failed: {e}")
+            return None
 
-    # storage configs (cluster-wide)
-    try:
-        r = mgr._api_get(f"https://{host}:{port}/api2/json/storage")
-        if r is not None and getattr(r, 'status_code', 0) == 200:
-            for s in (r.json().get('data') or []):
+    def _storage():
+        # storage configs (cluster-wide)
+        try:
+            data = _api_data(mgr, f"{base}/storage", slot)
+            if data is None:
+                return None
+            rows = []
+            for s in data:
                 sid = s.get('storage')
                 if not sid: continue
                 # _strip_volatile sorts comma-list fields like `content`, `nodes`
                 # which Proxmox returns in non-deterministic order
-                out.append(('storage', sid, _strip_volatile(s, set())))
-    except Exception as e:
-        logging.debug(f"[drift] storage fetch failed: {e}")
+                rows.append(('storage', sid, _strip_volatile(s, set())))
+            return rows
+        except Exception as e:
+            logging.debug(f"[drift] storage fetch failed: {e}")
+            return None
 
-    # per-node network state
-    try:
-        nodes = (mgr.nodes or {}).keys()
-    except Exception:
-        nodes = []
-    for node in nodes:
+    def _network(node):
         try:
-            r = mgr._api_get(f"https://{host}:{port}/api2/json/nodes/{node}/network")
-            if r is None or getattr(r, 'status_code', 0) != 200:
-                continue
-            for nic in (r.json().get('data') or []):
+            data = _api_data(mgr, f"{base}/nodes/{node}/network", slot)
+            if data is None:
+                return None
+            rows = []
+            for nic in data:
                 iface = nic.get('iface')
                 if not iface: continue
                 clean = _strip_volatile(nic, _NETWORK_VOLATILE)
-                out.append(('network', f"{node}/{iface}", clean))
+                rows.append(('network', f"{node}/{iface}", clean))
+            return rows
         except Exception as e:
             logging.debug(f"[drift] network/{node} fetch failed: {e}")
+            return None
 
-    # per-VM/CT configs
+    def _vm_config(node, t, vmid):
+        try:
+            cfg = _api_data(mgr, f"{base}/nodes/{node}/{t}/{vmid}/config", slot)
+            if cfg is None:
+                return None
+            scope = f"{t}/{vmid}"
+            if digests is not None and cfg.get('digest'):
+                digests[scope] = cfg['digest']
+            return [('vm_config', scope, _strip_volatile(cfg, _VM_VOLATILE_KEYS))]
+        except Exception:
+            return None
+
+    # each task with the (kind, scope) it covers; a scope ending in '/' (or
+    # empty) stands for every object under it
+    tasks = [(_cluster_options, ('cluster_options', 'global')), (_storage, ('storage', ''))]
+    lost = set()
+
+    # per-node network state
+    try:
+        nodes = list((mgr.nodes or {}).keys())
+    except Exception:
+        nodes = []
+    if not nodes:
+        lost.add(('network', ''))
+    tasks += [(lambda n=node: _network(n), ('network', f"{node}/")) for node in nodes]
+
+    # per-VM/CT configs — [] is also what a failed walk returns, so an empty
+    # guest list says nothing about which guests are gone
     try:
-        for r in (mgr.get_vm_resources() or []):
+        resources = mgr.get_vm_resources() or []
+        if not resources:
+            lost.add(('vm_config', ''))
+        for r in resources:
             t = r.get('type')
             vmid = r.get('vmid')
             node = r.get('node')
             if t not in ('qemu', 'lxc') or not vmid or not node:
                 continue
-            url = f"https://{host}:{port}/api2/json/nodes/{node}/{t}/{vmid}/config"
-            try:
-                resp = mgr._api_get(url)
-                if resp is None or getattr(resp, 'status_code', 0) != 200:
-                    continue
-                cfg = resp.json().get('data') or {}
-                clean = _strip_volatile(cfg, _VM_VOLATILE_KEYS)
-                out.append(('vm_config', f"{t}/{vmid}", clean))
-            except Exception:
-                continue
+            tasks.append((lambda n=node, t=t, v=vmid: _vm_config(n, t, v), ('vm_config', f"{t}/{vmid}")))
     except Exception as e:
         logging.debug(f"[drift] vm enumeration failed: {e}")
-
+        lost.add(('vm_config', ''))
+
+    # keep the historical ordering (options, storage, network, vms) — chunks are
+    # processed in order and run_concurrent returns results in task order.
+    # A chunk that overruns is killed; its unfinished reads count as failed.
+    for i in range(0, len(tasks), _FETCH_CHUNK):
+        chunk = tasks[i:i + _FETCH_CHUNK]
+        results = run_concurrent([fn for fn, _ in chunk], timeout=_FETCH_CHUNK_TIMEOUT, kill=True)
+        for (_, covers), rows in zip(chunk, results):
+            if rows is None:
+                lost.add(covers)
+            else:
+                out.extend(rows)
+
+    if lost:
+        logging.debug(f"[drift] {cluster_id}: {len(lost)} state read(s) failed or timed out")
+    if failed is not None:
+        failed.update(lost)
     return out
 
 
+def _fetch_failed(failed, kind, scope):
+    """True if `scope` of `kind` was not read because its fetch failed."""
+    return ((kind, scope) in failed or (kind, '') in failed
+            or ('/' in scope and (kind, scope.split('/', 1)[0] + '/') in failed))
+
+
 # ──────────────────────────────────────────────────────────────────────────
 # Diff
 # ──────────────────────────────────────────────────────────────────────────
@@ -204,7 +291,7 @@ def _load_baselines(cluster_id):
     try:
         c = get_db().conn.cursor()
         c.execute(
-            "SELECT id, kind, scope, snapshot, created_at, created_by "
+            "SELECT id, kind, scope, snapshot, created_at, created_by, digest, last_digest "
             "FROM drift_baselines WHERE cluster_id = ?",
             (cluster_id,)
         )
@@ -219,6 +306,8 @@ def _load_baselines(cluster_id):
                 'snapshot': snap,
                 'created_at': r['created_at'],
                 'created_by': r['created_by'] or '',
+                'digest': r['digest'] or '',
+                'last_digest': r['last_digest'] or '',
             }
         return out
     except Exception as e:
@@ -226,7 +315,7 @@ def _load_baselines(cluster_id):
         return {}
 
 
-def _set_baseline(cluster_id, kind, scope, snapshot, user):
+def _set_baseline(cluster_id, kind, scope, snapshot, user, digest=''):
     try:
         c = get_db().conn.cursor()
         # one baseline per (cluster,kind,scope) — replace
@@ -235,15 +324,31 @@ def _set_baseline(cluster_id, kind, scope, snapshot, user):
             (cluster_id, kind, scope)
         )
         c.execute('''
-            INSERT INTO drift_baselines (id, cluster_id, kind, scope, snapshot, created_at, created_by)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO drift_baselines (id, cluster_id, kind, scope, snapshot, created_at, created_by, digest)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         ''', (uuid.uuid4().hex[:12], cluster_id, kind, scope,
-              json.dumps(snapshot), datetime.now().isoformat(), user))
+              json.dumps(snapshot), datetime.now().isoformat(), user, digest or ''))
         get_db().conn.commit()
     except Exception as e:
         logging.warning(f"[drift] set_baseline failed: {e}")
 
 
+def _save_clean_digests(cluster_id, clean):
+    """Remember digests that diffed clean against the baseline ({scope: digest}),
+    so the next scan skips those guests until their config changes again."""
+    if not clean:
+        return
+    try:
+        c = get_db().conn.cursor()
+        c.executemany(
+            "UPDATE drift_baselines SET last_digest=? WHERE cluster_id=? AND kind='vm_config' AND scope=?",
+            [(dg, cluster_id, scope) for scope, dg in clean.items()]
+        )
+        get_db().conn.commit()
+    except Exception as e:
+        logging.warning(f"[drift] digest update failed: {e}")
+
+
 def _record_event(cluster_id, kind, scope, diffs, severity, summary):
     try:
         c = get_db().conn.cursor()
@@ -285,33 +390,50 @@ def _scan_cluster(cluster_id, autobaseline=False):
     if not getattr(mgr, 'is_connected', False):
         return {'error': 'cluster offline', 'status': 'skipped'}
 
-    state = _fetch_state(mgr, cluster_id)
+    digests, failed = {}, set()
+    state = _fetch_state(mgr, cluster_id, digests=digests, failed=failed)
     baselines = _load_baselines(cluster_id)
 
     new_events = []
     seeded = 0
+    unchanged = 0
+    clean_digests = {}
     seen_keys = set()
     for kind, scope, snap in state:
         seen_keys.add((kind, scope))
         bk = baselines.get((kind, scope))
+        dg = digests.get(scope) if kind == 'vm_config' else None
         if not bk:
             if autobaseline:
-                _set_baseline(cluster_id, kind, scope, snap, 'system')
+                _set_baseline(cluster_id, kind, scope, snap, 'system', digest=dg)
                 seeded += 1
             continue
+        # same digest as the baseline or the last clean scan → config file is
+        # byte-identical, nothing to diff
+        if dg and dg in (bk['digest'], bk['last_digest']):
+            unchanged += 1
+            continue
         diffs = _flat_diff(bk['snapshot'], snap)
-        if not diffs: continue
+        if not diffs:
+            if dg:
+                clean_digests[scope] = dg
+            continue
         sev = _severity_for(kind, diffs)
         summary = _short_summary(kind, scope, diffs)
         eid = _record_event(cluster_id, kind, scope, diffs, sev, summary)
         new_events.append({'id': eid, 'kind': kind, 'scope': scope,
                            'severity': sev, 'summary': summary})
 
-    # detect deletions: baseline keys that are no longer in current state
+    # detect deletions: baseline keys that are no longer in current state —
+    # unless their read failed or timed out, which says nothing about existence
     removed = []
+    skipped = 0
     for (kind, scope), bk in baselines.items():
         if (kind, scope) in seen_keys:
             continue
+        if failed and _fetch_failed(failed, kind, scope):
+            skipped += 1
+            continue
         diffs = [{'path': '*', 'op': 'removed', 'before': bk['snapshot'], 'after': None}]
         summary = f"{kind} {scope}: object removed"
         sev = 'warning' if kind in ('vm_config', 'storage') else 'info'
@@ -320,6 +442,8 @@ def _scan_cluster(cluster_id, autobaseline=False):
                            'severity': sev, 'summary': summary})
         removed.append(scope)
 
+    _save_clean_digests(cluster_id, clean_digests)
+
     # fire alert handler so configured Slack/Discord/etc. + push pick it up
     if new_events:
         try:
@@ -349,7 +473,9 @@ def _scan_cluster(cluster_id, autobaseline=False):
         'cluster_id': cluster_id,
         'events_count': len(new_events),
         'seeded_baselines': seeded,
+        'unchanged': unchanged,
         'removed': removed,
+        'unreadable': skipped,
         'events': new_events,
     }
 
@@ -497,10 +623,12 @@ def acknowledge_event(eid):
             cid = ev['cluster_id']
             mgr = cluster_managers.get(cid)
             if mgr:
-                state = _fetch_state(mgr, cid)
+                digests = {}
+                state = _fetch_state(mgr, cid, digests=digests)
                 for kind, scope, snap in state:
                     if kind == ev['kind'] and scope == ev['scope']:
-                        _set_baseline(cid, kind, scope, snap, user)
+                        _set_baseline(cid, kind, scope, snap, user,
+                                      digest=digests.get(scope) if kind == 'vm_config' else '')
                         break
         get_db().conn.commit()
         return jsonify({'ok': True})
@@ -531,7 +659,8 @@ def reset_baseline(cluster_id):
         return jsonify({'error': 'cluster not found'}), 404
     mgr = cluster_managers[cluster_id]
     user = _current_user()
-    state = _fetch_state(mgr, cluster_id)
+    digests = {}
+    state = _fetch_state(mgr, cluster_id, digests=digests)
     try:
         c = get_db().conn.cursor()
         c.execute('DELETE FROM drift_baselines WHERE cluster_id=?', (cluster_id,))
@@ -539,10 +668,11 @@ def reset_baseline(cluster_id):
                   (cluster_id,))
         for kind, scope, snap in state:
             c.execute('''
-                INSERT INTO drift_baselines (id, cluster_id, kind, scope, snapshot, created_at, created_by)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                INSERT INTO drift_baselines (id, cluster_id, kind, scope, snapshot, created_at, created_by, digest)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ''', (uuid.uuid4().hex[:12], cluster_id, kind, scope,
-                  json.dumps(snap), datetime.now().isoformat(), user))
+                  json.dumps(snap), datetime.now().isoformat(), user,
+                  digests.get(scope, '') if kind == 'vm_config' else ''))
         get_db().conn.commit()
         return jsonify({'ok': True, 'baselines': len(state)})
     except Exception as e:
@@ -499,6 +499,7 @@ def get_cluster_group_lb_history(group_id):
         return jsonify({'error': 'Access denied'}), 403
 
     # MK: grab anything tagged with xclb.* that mentions this group
+    db.flush_audit()
     events = db.query(
         "SELECT * FROM audit_log WHERE action LIKE 'xclb.%' AND details LIKE ? ORDER BY timestamp DESC LIMIT 50",
         (f'%{group_id}%',)
@@ -525,21 +525,24 @@ def parse_pve_error(response_text, fallback='Proxmox API error'):
     return html.escape(text) if text else fallback
 
 
-# NS 2026-06-04 — shared metrics_history loader for insights/cost/power.
-# The expensive part of these three endpoints isn't the SQL fetch, it's
-# json.loads()'ing every snapshot blob (8.6k rows over 30d). Tier-1 moved the
-# fetch off the gevent hub; this moves the PARSE off too AND caches the parsed
-# result. The parse runs inside run_heavy_read's transform (worker thread), so
-# even the cold-cache caller doesn't block the hub, and concurrent callers for
-# the same window coalesce onto one fetch+parse (single-flight). Returns a list
-# of (ts_unix, clusters_dict) for ALL clusters; callers filter for their own id.
+# NS 2026-06-04 — shared metrics history loader for insights/cost/power.
+# Fetch + decode run off-hub inside run_heavy_read's transform (worker thread)
+# and the result is cached + single-flighted per (cluster, window), so
+# concurrent viewers of the same cluster coalesce onto one read.
+#
+# NS Oct 2026 — was load_metrics_window(days): one query over every cluster's
+# JSON blob, json.loads'd in full, then filtered down to one cluster by each
+# caller. Now backed by the columnar store (core/tsdb.py), so a request only
+# reads and decodes ITS cluster's chunks. Returns [(ts_unix, cluster_data)]
+# oldest→newest in the collector's snapshot shape. Treat as read-only — the
+# lists are the cached structure.
 def _history_stride(days):
-    # Snapshots land ~every 5 min. Parsing thousands of them is the GIL-bound
-    # ceiling (json.loads holds the GIL even in a worker thread), so for long
-    # windows we decimate to a coarser cadence. All three consumers are
-    # ratio/average/percentile based — sample COUNT doesn't change the result,
-    # only the resolution — so this is lossless for cost/power numbers and only
-    # smooths insights trends. Recent (<=2d) views keep full 5-min detail.
+    # Snapshots land ~every 5 min. Rebuilding per-sample dicts for thousands of
+    # them is the GIL-bound ceiling, so for long windows we decimate to a coarser
+    # cadence. All three consumers are ratio/average/percentile based — sample
+    # COUNT doesn't change the result, only the resolution — so this is lossless
+    # for cost/power numbers and only smooths insights trends. Recent (<=2d)
+    # views keep full 5-min detail.
     if days <= 2:
         return 1     # 5-min, full resolution
     if days <= 14:
@@ -547,36 +550,6 @@ def _history_stride(days):
     return 12        # ~hourly for month+ windows
 
 
-def load_metrics_window(days):
-    from datetime import timedelta
-    from pegaprox.core.dbcrypto import run_heavy_read
-    cutoff = (datetime.now() - timedelta(days=days)).isoformat()
-    stride = _history_stride(days)
-
-    def _parse(rows):
-        out = []
-        for row in rows:
-            try:
-                d = json.loads(row['data'])
-                ts_unix = int(datetime.fromisoformat(row['timestamp']).timestamp())
-                out.append((ts_unix, d.get('clusters') or {}))
-            except Exception:
-                continue
-        return out
-
-    # `id % stride = 0` picks ~every Nth snapshot. rowid lives in the timestamp
-    # index, so SQLite evaluates the modulo without a table lookup and only
-    # decrypts the `data` blob for rows it keeps — cuts BOTH decrypt and parse.
-    if stride > 1:
-        sql = ("SELECT timestamp, data FROM metrics_history "
-               "WHERE timestamp >= ? AND id % ? = 0 ORDER BY timestamp ASC")
-        sql_params = (cutoff, stride)
-    else:
-        sql = ("SELECT timestamp, data FROM metrics_history "
-               "WHERE timestamp >= ? ORDER BY timestamp ASC")
-        sql_params = (cutoff,)
-
-    # cache_key shared across every cluster + across insights/cost/power.
-    # NOTE: the returned dicts are the cached parsed structure — callers must
-    # treat them as read-only (the aggregation paths only read, never mutate).
-    return run_heavy_read(sql, sql_params, cache_key=f"mh_parsed:{days}", transform=_parse)
+def load_cluster_metrics_window(cluster_id, days):
+    from pegaprox.core import tsdb
+    return tsdb.load_cluster_window(cluster_id, days, stride=_history_stride(days))
@@ -263,10 +263,12 @@ def get_migration_history():
     # migration metadata by simply OMITTING the vmid filter. Admins short-circuit True in
     # user_can_access_vm; a plain cluster-wide operator keeps all their cluster's rows.
     from pegaprox.utils.auth import build_authz_user
-    from pegaprox.utils.rbac import user_can_access_vm
+    from pegaprox.utils.rbac import get_vm_visibility
     _u = build_authz_user(request.session.get('user', ''), request.session)
-    migrations = [m for m in migrations
-                  if user_can_access_vm(_u, m.get('cluster_id'), m.get('vmid'), 'vm.view')]
+    _vis = {}
+    for _cid in {m.get('cluster_id') for m in migrations}:
+        _vis[_cid] = get_vm_visibility(_u, _cid, 'vm.view')
+    migrations = [m for m in migrations if _vis[m.get('cluster_id')].can(m.get('vmid'))]
 
     return jsonify(migrations[:limit])
 
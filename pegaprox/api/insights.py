@@ -2,7 +2,7 @@
 """
 Right-sizing + Capacity Forecasting endpoints — MK May 2026.
 
-Reads from the metrics_history snapshot table (5-min cadence, 30d retention)
+Reads from the metrics time-series store (core/tsdb.py; 5-min cadence, 30d retention)
 and produces:
   - per-VM right-sizing recommendations (oversized / undersized CPU/RAM)
   - per-cluster + per-storage capacity forecasts (linear regression →
@@ -19,28 +19,21 @@ from flask import Blueprint, jsonify, request
 
 from pegaprox.globals import cluster_managers
 from pegaprox.utils.auth import require_auth
-from pegaprox.api.helpers import check_cluster_access, safe_error, load_metrics_window
+from pegaprox.api.helpers import check_cluster_access, safe_error, load_cluster_metrics_window
 from pegaprox.core.db import get_db
 
 bp = Blueprint('insights', __name__)
 
 
 def _load_history(cluster_id, days=30):
-    """Pull all snapshots for a cluster from metrics_history within the window.
-    Returns list of (ts_unix, cluster_data_dict) sorted oldest→newest.
-
-    NS 2026-06-04: fetch+parse happen off-hub + cached/single-flighted in
-    load_metrics_window (shared across clusters + cost/power); here we only do
-    the cheap per-cluster filter."""
-    out = []
+    """Snapshots for one cluster as (ts_unix, cluster_data), oldest→newest.
+    Read + decode run off-hub + cached in load_cluster_metrics_window (shared
+    with cost/power); only this cluster's series are read."""
     try:
-        for ts_unix, clusters in load_metrics_window(days):
-            cd = clusters.get(cluster_id)
-            if cd:
-                out.append((ts_unix, cd))
+        return load_cluster_metrics_window(cluster_id, days) or []
     except Exception as e:
         logging.warning(f"[insights] history load failed for {cluster_id}: {e}")
-    return out
+    return []
 
 
 def _percentile(values, p):
@@ -530,6 +523,11 @@ def long_term_history(cluster_id):
                                 (return every snapshot); >0 = average the
                                 snapshots inside each step-second window
                                 (server-side downsample for long windows).
+
+    NS Oct 2026: step >= 1h (or a window beyond the raw retention) is served
+    from the collector's pre-aggregated rollup tiers (core/tsdb.py) instead of
+    averaging raw snapshots per request — a 365d hourly chart reads ~8.8k
+    buckets. Rollup samples also carry *_max / *_p95 so peaks survive.
     """
     ok, err = check_cluster_access(cluster_id)
     if not ok: return err
@@ -548,6 +546,26 @@ def long_term_history(cluster_id):
         step = 0
     step = max(0, min(step, 86400))  # 1d bucket cap
 
+    from pegaprox.core import tsdb
+    from pegaprox.background.metrics import _retention_days
+    tier = tsdb.pick_tier(step, days, _retention_days())
+    if tier != 'raw':
+        try:
+            samples = _rollup_samples(cluster_id, tier, days, step)
+        except Exception as e:
+            logging.warning(f"[insights] rollup read failed for {cluster_id}: {e}")
+            samples = []
+        # an empty tier (fresh install, rollups not caught up yet) falls back to raw
+        if samples:
+            return jsonify({
+                'cluster_id': cluster_id,
+                'days_requested': days,
+                'step_seconds': max(step, tsdb.ROLLUP_TIERS[tier][0]),
+                'tier': tier,
+                'sample_count': len(samples),
+                'samples': samples,
+            })
+
     raw = _load_history(cluster_id, days=days)
     if not raw:
         return jsonify({
@@ -605,11 +623,68 @@ def long_term_history(cluster_id):
         'cluster_id': cluster_id,
         'days_requested': days,
         'step_seconds': step,
+        'tier': 'raw',
         'sample_count': len(samples),
         'samples': samples,
     })
 
 
+def _rollup_samples(cluster_id, tier, days, step):
+    """Chart samples from a rollup tier, merged up to `step` when it is coarser
+    than the tier's bucket. Same keys as the raw path plus peak fields."""
+    from pegaprox.core import tsdb
+    step = max(step, tsdb.ROLLUP_TIERS[tier][0])
+    cl = (tsdb.load_rollup(cluster_id, tier, days, entity='cluster') or {}).get('cluster') or {}
+    node_series = tsdb.load_rollup(cluster_id, tier, days, prefix='node/') or {}
+
+    def _group(buckets):
+        grouped = {}
+        for ts, st in (buckets or {}).items():
+            grouped.setdefault(ts - ts % step, []).append(st)
+        return {ts: tsdb.merge_buckets(sts) for ts, sts in grouped.items()}
+
+    def _pct(num, den, i):
+        if not num or not den or not den[2]:
+            return 0
+        return round(num[i] / den[2] * 100, 2)
+
+    totals = {m: _group(cl.get(m)) for m in ('cpu_used', 'cpu_total', 'mem_used', 'mem_total',
+                                              'vms_running', 'cts_running')}
+    nodes = {}
+    for entity, metrics in node_series.items():
+        nodes[entity.split('/', 1)[1]] = {m: _group(metrics.get(m)) for m in ('cpu', 'mem_percent')}
+
+    samples = []
+    for ts in sorted(totals['cpu_total'] or totals['mem_total']):
+        cu, ct = totals['cpu_used'].get(ts), totals['cpu_total'].get(ts)
+        mu, mt = totals['mem_used'].get(ts), totals['mem_total'].get(ts)
+        vr, cr = totals['vms_running'].get(ts), totals['cts_running'].get(ts)
+        nodes_out = {}
+        for nname, nd in nodes.items():
+            c, m = nd['cpu'].get(ts), nd['mem_percent'].get(ts)
+            if not c and not m:
+                continue
+            nodes_out[nname] = {
+                'cpu': round(c[2], 4) if c else 0,
+                'cpu_max': round(c[1], 4) if c else 0,
+                'cpu_p95': round(c[3], 4) if c else 0,
+                'mem_percent': round(m[2], 2) if m else 0,
+                'mem_percent_max': round(m[1], 2) if m else 0,
+            }
+        samples.append({
+            'ts': ts,
+            'cpu_pct': _pct(cu, ct, 2),
+            'cpu_pct_max': _pct(cu, ct, 1),
+            'cpu_pct_p95': _pct(cu, ct, 3),
+            'mem_pct': _pct(mu, mt, 2),
+            'mem_pct_max': _pct(mu, mt, 1),
+            'vms_running': int(vr[1]) if vr else 0,
+            'cts_running': int(cr[1]) if cr else 0,
+            'nodes': nodes_out,
+        })
+    return samples
+
+
 def _avg_samples(samples, bucket_ts):
     """Average a list of samples into a single bucketed sample.
     bucket_ts is the bucket's leftmost timestamp."""
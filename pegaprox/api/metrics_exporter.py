@@ -8,11 +8,17 @@ that match what admins typically want to alert on (node down, high CPU, quorum
 at risk, etc). Most data is derived from existing in-memory state; APT update
 availability is queried through Proxmox and cached briefly per node.
 
+NS Oct 2026: scrapes are served from a pre-rendered, per-family byte cache kept
+fresh by a background refresher (see "Pre-rendered exposition cache" below).
+
 Auth: Bearer token via existing API tokens (admin-view role is enough), or the
 endpoint can be made public by setting `metrics_public: true` in server settings —
 some setups put PegaProx behind a mutual-TLS reverse proxy and want to skip auth.
 """
+import os
+import gzip
 import time
+import zlib
 import logging
 import threading
 from flask import Blueprint, request, Response
@@ -20,9 +26,11 @@ from flask import Blueprint, request, Response
 from pegaprox.globals import (
     cluster_managers, pbs_managers, vmware_managers,
     active_sessions, sessions_lock,
+    sse_clients, sse_clients_lock,
 )
 from pegaprox.api.helpers import load_server_settings
 from pegaprox.utils.auth import validate_api_token, load_users
+from pegaprox.utils.realtime import sse_fanout_stats
 from pegaprox.models.permissions import ROLE_ADMIN
 from pegaprox.utils import auth as auth_state
 
@@ -141,29 +149,383 @@ def _auth_ok():
     return False
 
 
-@bp.route('/api/metrics', methods=['GET'])
-def prometheus_metrics():
-    if not _auth_ok():
-        return Response(
-            '# unauthorized — set Authorization: Bearer <api_token>, or enable metrics_public\n',
-            status=401, mimetype='text/plain; version=0.0.4'
-        )
 
-    out = []
-    emit = out.append
+# ──────────────────────────────────────────────────────────────────────────
+# Pre-rendered exposition cache — NS Oct 2026
+#
+# A scrape used to walk every cluster's nodes + guests, call load_users and
+# format thousands of lines on the request path — paid again by every
+# Prometheus replica / Grafana Agent each interval. Now a refresher thread keeps
+# one encoded byte buffer per (source, family) up to date (clusters reuse the
+# broadcast loop's node/guest data via feed_cluster()), and a scrape just joins
+# the cached buffers. Scrapes can be gzip'd and conditional (ETag /
+# If-None-Match). The refresher starts on the first scrape and stops again
+# after _EXPORTER_IDLE without one, so installs without Prometheus pay nothing.
+# ──────────────────────────────────────────────────────────────────────────
+
+METRICS_REFRESH_INTERVAL = max(1.0, float(os.environ.get('PEGAPROX_METRICS_REFRESH', '10')))
+_EXPORTER_IDLE = 600
+_FEED_MAX_AGE = 30          # broadcast-loop data older than this → refresher fetches itself
+_CEPH_CACHE_TTL = 60        # one SSH probe per cluster per minute at most
+_GZIP_MIN_BYTES = 1024
+
+# (name, type, help) — exposition order. A family's HELP/TYPE is only written
+# when at least one source has samples for it.
+_SELF_FAMILIES = (
+    ('pegaprox_info', 'gauge', 'Build information'),
+    ('pegaprox_scrape_timestamp_seconds', 'gauge', 'Unix time the exposed data last changed'),
+    ('pegaprox_sessions_active', 'gauge', 'Currently authenticated sessions'),
+    ('pegaprox_users_logged_in', 'gauge', 'Unique PegaProx users with an active session'),
+    ('pegaprox_users_total', 'gauge', 'Configured PegaProx user accounts'),
+    ('pegaprox_users_enabled', 'gauge', 'Enabled PegaProx user accounts'),
+    ('pegaprox_sse_clients', 'gauge', 'Connected SSE live-update clients'),
+    ('pegaprox_sse_fanout_seconds', 'summary', 'Time to serialize and enqueue one broadcast event'),
+    ('pegaprox_sse_fanout_seconds_max', 'gauge', 'Slowest single broadcast fan-out since start'),
+    ('pegaprox_sse_frames_sent_total', 'counter', 'Frames enqueued to SSE clients'),
+    ('pegaprox_sse_frames_dropped_total', 'counter', 'Frames dropped because an SSE client queue was full'),
+    ('pegaprox_sse_slow_clients', 'gauge', 'Connected SSE clients that had frames dropped (slow consumers)'),
+    ('pegaprox_sse_client_dropped_frames_max', 'gauge', 'Most frames dropped for any one connected SSE client'),
+    ('pegaprox_auth_cache_hits_total', 'counter', 'Authenticated requests served from the auth context cache'),
+    ('pegaprox_auth_cache_misses_total', 'counter', 'Authenticated requests that resolved user and permissions from the DB'),
+    ('pegaprox_auth_cache_entries', 'gauge', 'Cached auth contexts (sessions + API tokens)'),
+    ('pegaprox_auth_check_seconds', 'summary', 'Time spent in require_auth before the route handler'),
+    ('pegaprox_auth_check_seconds_max', 'gauge', 'Slowest single require_auth check since start'),
+    ('pegaprox_siem_backlog_events', 'gauge', 'Audit events not yet delivered to the SIEM target'),
+    ('pegaprox_siem_delivered_events_total', 'counter', 'Audit events delivered since start'),
+    ('pegaprox_siem_failed_batches_total', 'counter', 'Delivery batches that failed and were retried'),
+    ('pegaprox_siem_last_batch_seconds', 'gauge', 'Duration of the last successful delivery batch'),
+    ('pegaprox_siem_backoff_seconds', 'gauge', 'Current retry backoff (0 = healthy)'),
+    ('pegaprox_siem_dead_lettered_events_total', 'counter', 'Audit events skipped after the SIEM target kept rejecting them'),
+    ('pegaprox_console_sessions', 'gauge', 'Open VNC / console relay sessions'),
+    ('pegaprox_console_sessions_limit', 'gauge', 'Configured cap on concurrent console sessions'),
+    ('pegaprox_console_sessions_rejected_total', 'counter', 'Console sessions refused because the cap was reached'),
+    ('pegaprox_console_bytes_total', 'counter', 'Bytes relayed by console sessions since start'),
+    ('pegaprox_console_bytes_per_second', 'gauge', 'Recent throughput of the open console sessions'),
+    ('pegaprox_console_latency_seconds_max', 'gauge', 'Worst smoothed per-chunk relay latency among open console sessions'),
+    ('pegaprox_rrd_cache_lookups_total', 'counter', 'Chart RRD lookups by result (miss = fetched, coalesced = joined a fetch in flight)'),
+    ('pegaprox_rrd_cache_fetch_errors_total', 'counter', 'RRD fetches that failed (errors are not cached)'),
+    ('pegaprox_rrd_cache_evictions_total', 'counter', 'RRD series dropped by the LRU bounds'),
+    ('pegaprox_rrd_cache_entries', 'gauge', 'Cached RRD series'),
+    ('pegaprox_rrd_cache_cells', 'gauge', 'Cached RRD values (points x columns)'),
+    ('pegaprox_scheduler_jobs', 'gauge', 'Jobs on the scheduler heap by kind'),
+    ('pegaprox_scheduler_jobs_running', 'gauge', 'Scheduled jobs currently running by kind'),
+    ('pegaprox_scheduler_jobs_queued', 'gauge', 'Due jobs waiting for a worker or a per-cluster slot'),
+    ('pegaprox_scheduler_fired_total', 'counter', 'Scheduled job runs started'),
+    ('pegaprox_scheduler_failed_total', 'counter', 'Scheduled job runs that raised'),
+    ('pegaprox_scheduler_skipped_total', 'counter', 'Due jobs dropped because their row changed or was disabled'),
+    ('pegaprox_scheduler_deferred_total', 'counter', 'Due jobs held back by the per-cluster concurrency limit'),
+    ('pegaprox_scheduler_lateness_seconds', 'summary', 'Delay between a job\'s fire time and its start'),
+    ('pegaprox_scheduler_lateness_seconds_max', 'gauge', 'Largest delay between a fire time and the job start since start'),
+    ('pegaprox_site_recovery_plan_ready', 'gauge', '1 if every VM in the recovery plan has a healthy replica within RPO'),
+    ('pegaprox_site_recovery_plan_vms', 'gauge', 'VMs protected by the recovery plan'),
+    ('pegaprox_site_recovery_plan_blockers', 'gauge', 'Reasons blocking auto-failover for the plan (missing, disabled or failing replication)'),
+    ('pegaprox_site_recovery_rpo_breached_vms', 'gauge', 'Plan VMs whose replica is older than the replication RPO'),
+    ('pegaprox_site_recovery_replication_age_seconds_max', 'gauge', 'Age of the oldest replica in the plan'),
+)
+
+_CLUSTER_FAMILIES = (
+    ('pegaprox_cluster_connected', 'gauge', '1 if PegaProx can reach the cluster API'),
+    ('pegaprox_cluster_nodes_total', 'gauge', 'Node count per cluster'),
+    ('pegaprox_cluster_nodes_online', 'gauge', 'Online node count'),
+    ('pegaprox_cluster_vms_total', 'gauge', 'VMs/CTs per cluster'),
+    ('pegaprox_cluster_vms_running', 'gauge', 'Running VMs/CTs per cluster'),
+    ('pegaprox_cluster_quorum_held', 'gauge', '1 if quorum is currently held'),
+    ('pegaprox_node_cpu_percent', 'gauge', 'CPU usage percent per node'),
+    ('pegaprox_node_mem_percent', 'gauge', 'Memory usage percent per node'),
+    ('pegaprox_node_uptime_seconds', 'gauge', 'Node uptime in seconds'),
+    ('pegaprox_node_online', 'gauge', '1 if the node is online'),
+    ('pegaprox_node_apt_updates_available', 'gauge', '1 if any APT package update is available on the node'),
+    ('pegaprox_guest_running', 'gauge', '1 if the VM or LXC container is running'),
+    ('pegaprox_guest_cpu_percent', 'gauge', 'CPU usage percent per VM or LXC container'),
+    ('pegaprox_guest_mem_used_bytes', 'gauge', 'Memory used by a VM or LXC container'),
+    ('pegaprox_guest_mem_total_bytes', 'gauge', 'Configured memory limit for a VM or LXC container'),
+    ('pegaprox_guest_mem_percent', 'gauge', 'Memory usage percent per VM or LXC container'),
+    ('pegaprox_guest_disk_used_bytes', 'gauge', 'Disk bytes used by a VM or LXC container'),
+    ('pegaprox_guest_disk_total_bytes', 'gauge', 'Configured disk size for a VM or LXC container'),
+    ('pegaprox_guest_disk_percent', 'gauge', 'Disk usage percent per VM or LXC container'),
+    ('pegaprox_guest_network_receive_bytes_total', 'counter', 'Cumulative network bytes received by a VM or LXC container'),
+    ('pegaprox_guest_network_transmit_bytes_total', 'counter', 'Cumulative network bytes transmitted by a VM or LXC container'),
+    ('pegaprox_guest_uptime_seconds', 'gauge', 'Uptime in seconds for a VM or LXC container'),
+    # Ceph (#540) — only emitted for clusters that actually run Ceph
+    ('pegaprox_ceph_health_status', 'gauge', 'Ceph cluster health (0=OK, 1=WARN, 2=ERR, 3=unknown)'),
+    ('pegaprox_ceph_osd_up', 'gauge', 'Number of Ceph OSDs currently up'),
+    ('pegaprox_ceph_osd_in', 'gauge', 'Number of Ceph OSDs currently in'),
+    # API transport (core/api_transport.py)
+    ('pegaprox_api_request_duration_seconds', 'histogram', 'Proxmox API request latency per endpoint template'),
+    ('pegaprox_api_coalesced_requests_total', 'counter', 'GETs answered by an identical request already in flight'),
+    ('pegaprox_api_tls_handshakes_total', 'counter', 'TLS handshakes to the cluster API (resumed="1" = session resumption)'),
+    ('pegaprox_api_pool_size', 'gauge', 'Keep-alive pool size per node (node="_cluster" = cluster-level calls)'),
+    # Guest-agent poll planner (core/guest_poller.py)
+    ('pegaprox_guest_agent_probes_total', 'counter', 'Guest-agent IP/disk probes by outcome (unchanged = cache was already right)'),
+    ('pegaprox_guest_agent_skipped_total', 'counter', 'Running guests not probed in a cycle because their interval had not elapsed'),
+    ('pegaprox_guest_agent_deferred_total', 'counter', 'Due probes pushed to a later cycle by the per-node rate cap'),
+    ('pegaprox_guest_agent_cache_age_seconds', 'gauge', 'Age of the cached guest-agent answers (stat="avg" or "max")'),
+)
+
+_TAIL_FAMILIES = (
+    ('pegaprox_pbs_connected', 'gauge', '1 if PBS is reachable'),
+    ('pegaprox_esxi_connected', 'gauge', '1 if ESXi/vCenter is reachable'),
+    ('pegaprox_metrics_render_seconds', 'gauge', 'Time the last refresh spent rendering this metric family (all sources)'),
+    ('pegaprox_metrics_family_bytes', 'gauge', 'Encoded size of this metric family in the exposition cache'),
+    ('pegaprox_metrics_cluster_render_seconds', 'gauge', 'Time the last refresh spent rendering one cluster'),
+    ('pegaprox_metrics_render_age_seconds', 'gauge', 'Age of the oldest cached source in this exposition'),
+    ('pegaprox_metrics_scrapes_total', 'counter', 'Scrapes served from the exposition cache'),
+)
+
+_ALL_FAMILIES = _SELF_FAMILIES + _CLUSTER_FAMILIES + _TAIL_FAMILIES
+_HEADERS = {name: f'# HELP {name} {help_text}\n# TYPE {name} {mtype}\n'.encode()
+            for name, mtype, help_text in _ALL_FAMILIES}
+
+# guest families: name → value(v, mem_used, mem_total, disk_used, disk_total)
+_GUEST_FAMILIES = (
+    ('pegaprox_guest_running', lambda v, mu, mt, du, dt: 1 if v.get('status') == 'running' else 0),
+    ('pegaprox_guest_cpu_percent', lambda v, mu, mt, du, dt: _round_num(v.get('cpu_percent', _num(v.get('cpu', 0)) * 100))),
+    ('pegaprox_guest_mem_used_bytes', lambda v, mu, mt, du, dt: mu),
+    ('pegaprox_guest_mem_total_bytes', lambda v, mu, mt, du, dt: mt),
+    ('pegaprox_guest_mem_percent', lambda v, mu, mt, du, dt: _round_num(v.get('mem_percent', _pct(mu, mt)))),
+    ('pegaprox_guest_disk_used_bytes', lambda v, mu, mt, du, dt: du),
+    ('pegaprox_guest_disk_total_bytes', lambda v, mu, mt, du, dt: dt),
+    ('pegaprox_guest_disk_percent', lambda v, mu, mt, du, dt: _round_num(v.get('disk_percent', _pct(du, dt)))),
+    ('pegaprox_guest_network_receive_bytes_total', lambda v, mu, mt, du, dt: _num(v.get('netin', 0))),
+    ('pegaprox_guest_network_transmit_bytes_total', lambda v, mu, mt, du, dt: _num(v.get('netout', 0))),
+    ('pegaprox_guest_uptime_seconds', lambda v, mu, mt, du, dt: _num(v.get('uptime', 0))),
+)
+
+_cache_lock = threading.Lock()
+_self_buffers = {}          # family -> bytes
+_tail_buffers = {}          # family -> bytes (pbs / esxi)
+_cluster_buffers = {}       # cid -> {'at': ts, 'seconds': float, 'families': {family: bytes}}
+_render_seconds = {}        # (source, family) -> seconds of its last render
+_ceph_cache = {}            # cid -> (ts, summary)
+_fed = {}                   # cid -> (ts, node_status, vms) from the broadcast loop
+_cache_gen = 0
+_body_cache = {'gen': -1, 'body': b'', 'gzip': None}
+_scrape_counts = {}         # (encoding, code) -> n
+_exporter = {'thread': None, 'last_scrape': 0.0, 'rendered_at': 0.0}
+
+
+def _labels_str(labels):
+    return ','.join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+
+
+def _encode(lines):
+    return ('\n'.join(lines) + '\n').encode() if lines else b''
+
+
+class _Families:
+    """Collects one source's families and how long each took to render."""
+
+    def __init__(self):
+        self.buffers = {}
+        self.seconds = {}
+        self._t = time.perf_counter()
+
+    def put(self, name, lines):
+        now = time.perf_counter()
+        if lines:
+            self.buffers[name] = self.buffers.get(name, b'') + _encode(lines)
+        self.seconds[name] = self.seconds.get(name, 0.0) + (now - self._t)
+        self._t = now
 
-    # ── PegaProx self metrics ──
-    emit('# HELP pegaprox_info Build information')
-    emit('# TYPE pegaprox_info gauge')
+    def mark(self):
+        """Start timing the next family here (excludes shared prep work)."""
+        self._t = time.perf_counter()
+
+
+def feed_cluster(cid, node_status=None, vms=None):
+    """Called by the broadcast loop with what it just fetched, so the refresher
+    doesn't repeat the node/guest walk for watched clusters. No-op while nobody
+    scrapes."""
+    if _exporter['thread'] is None:
+        return
+    with _cache_lock:
+        prev = _fed.get(cid)
+        _fed[cid] = (time.time(),
+                     node_status if node_status is not None else (prev[1] if prev else None),
+                     vms if vms is not None else (prev[2] if prev else None))
+
+
+def _fed_data(cid):
+    """(node_status, vms) the broadcast loop handed us recently — either may be None."""
+    with _cache_lock:
+        fed = _fed.get(cid)
+    if fed and time.time() - fed[0] < _FEED_MAX_AGE:
+        return fed[1], fed[2]
+    return None, None
+
+
+def _fetch_vms(mgr):
+    if hasattr(mgr, 'get_vm_resources'):
+        try:
+            return mgr.get_vm_resources(max_age=METRICS_REFRESH_INTERVAL) or []
+        except TypeError:   # non-PVE managers don't take max_age
+            return mgr.get_vm_resources() or []
+    if hasattr(mgr, 'get_resources'):
+        return [r for r in (mgr.get_resources() or []) if r.get('type') in ('qemu', 'lxc')]
+    return []
+
+
+def _ceph_summary(cid, mgr):
+    now = time.time()
+    with _cache_lock:
+        cached = _ceph_cache.get(cid)
+    if cached and now - cached[0] < _CEPH_CACHE_TTL:
+        return cached[1]
+    ceph = mgr.get_ceph_health_summary() if hasattr(mgr, 'get_ceph_health_summary') else None
+    with _cache_lock:
+        _ceph_cache[cid] = (now, ceph)
+    return ceph
+
+
+def _render_cluster(cid, mgr):
+    fam = _Families()
+    cname = getattr(getattr(mgr, 'config', None), 'name', cid) or cid
+    base = {'cluster_id': cid, 'cluster': cname}
+    blbl = _labels_str(base)
+    connected = 1 if getattr(mgr, 'is_connected', False) else 0
+    fam.put('pegaprox_cluster_connected', [f'pegaprox_cluster_connected{{{blbl}}} {connected}'])
+    try:
+        _render_api_transport(fam, mgr, base)
+    except Exception as e:
+        logging.debug(f"[metrics] {cid} api transport stats failed: {e}")
+    try:
+        _render_guest_poller(fam, mgr, base)
+    except Exception as e:
+        logging.debug(f"[metrics] {cid} guest poller stats failed: {e}")
+    if not connected:
+        return fam
+
+    fed_nodes, fed_vms = _fed_data(cid)
+
+    # Node counts + per-node stats
+    try:
+        node_status = fed_nodes if fed_nodes is not None else (mgr.get_node_status() or {})
+        fam.mark()
+        nodes = []
+        for name, info in node_status.items():
+            is_online = (info.get('status') == 'online') or (not info.get('offline', False))
+            nodes.append((_labels_str({**base, 'node': name}), name, info, is_online))
+        nodes_online = sum(1 for n in nodes if n[3])
+        fam.put('pegaprox_node_online', [f'pegaprox_node_online{{{l}}} {1 if on else 0}' for l, _, _, on in nodes])
+        fam.put('pegaprox_node_cpu_percent', [
+            f"pegaprox_node_cpu_percent{{{l}}} {_round_num(i.get('cpu_percent', _num(i.get('cpu', 0)) * 100))}"
+            for l, _, i, _ in nodes])
+        fam.put('pegaprox_node_mem_percent', [
+            f"pegaprox_node_mem_percent{{{l}}} {_round_num(i.get('mem_percent', 0))}" for l, _, i, _ in nodes])
+        fam.put('pegaprox_node_uptime_seconds', [
+            f"pegaprox_node_uptime_seconds{{{l}}} {_num(i.get('uptime', 0))}" for l, _, i, _ in nodes])
+        apt = []
+        for l, name, _, on in nodes:
+            apt_available = _node_apt_updates_available(cid, mgr, name) if on else 0
+            if apt_available is not None:
+                apt.append(f'pegaprox_node_apt_updates_available{{{l}}} {apt_available}')
+        fam.put('pegaprox_node_apt_updates_available', apt)
+        fam.put('pegaprox_cluster_nodes_total', [f'pegaprox_cluster_nodes_total{{{blbl}}} {len(nodes)}'])
+        fam.put('pegaprox_cluster_nodes_online', [f'pegaprox_cluster_nodes_online{{{blbl}}} {nodes_online}'])
+        # Quorum: >50% online
+        quorum = 1 if nodes_online * 2 > len(nodes) else 0
+        fam.put('pegaprox_cluster_quorum_held', [f'pegaprox_cluster_quorum_held{{{blbl}}} {quorum}'])
+    except Exception as e:
+        logging.debug(f"[metrics] {cid} node stats failed: {e}")
+
+    # Ceph health (#540) — best-effort; get_ceph_health_summary returns None when
+    # the cluster has no Ceph, so no ceph_* series are emitted for those clusters.
+    try:
+        fam.mark()
+        ceph = _ceph_summary(cid, mgr)
+        if ceph:
+            _cmap = {'HEALTH_OK': 0, 'HEALTH_WARN': 1, 'HEALTH_ERR': 2}
+            fam.put('pegaprox_ceph_health_status',
+                    [f"pegaprox_ceph_health_status{{{blbl}}} {_cmap.get(ceph.get('status'), 3)}"])
+            fam.put('pegaprox_ceph_osd_up', [f"pegaprox_ceph_osd_up{{{blbl}}} {_num(ceph.get('osd_up', 0))}"])
+            fam.put('pegaprox_ceph_osd_in', [f"pegaprox_ceph_osd_in{{{blbl}}} {_num(ceph.get('osd_in', 0))}"])
+    except Exception as e:
+        logging.debug(f"[metrics] {cid} ceph health failed: {e}")
+
+    # VM counts + per-guest families (label strings built once, shared by all of them)
+    try:
+        vms = fed_vms if fed_vms is not None else _fetch_vms(mgr)
+        fam.mark()
+        fam.put('pegaprox_cluster_vms_total', [f'pegaprox_cluster_vms_total{{{blbl}}} {len(vms)}'])
+        running = sum(1 for v in vms if v.get('status') == 'running')
+        fam.put('pegaprox_cluster_vms_running', [f'pegaprox_cluster_vms_running{{{blbl}}} {running}'])
+        rows = []
+        for v in vms:
+            vmid = v.get('vmid', '')
+            lbl = _labels_str({
+                **base,
+                'node': v.get('node', ''),
+                'type': _resource_type_label(v.get('type')),
+                'vmid': vmid,
+                'name': v.get('name') or v.get('hostname') or str(vmid),
+            })
+            rows.append((lbl, v, _num(v.get('mem', 0)), _num(v.get('maxmem', 0)),
+                         _num(v.get('disk', 0)), _num(v.get('maxdisk', 0))))
+        fam.mark()
+        for name, value in _GUEST_FAMILIES:
+            fam.put(name, [f'{name}{{{r[0]}}} {value(*r[1:])}' for r in rows])
+    except Exception as e:
+        logging.debug(f"[metrics] {cid} vm list failed: {e}")
+    return fam
+
+
+def _render_api_transport(fam, mgr, base):
+    from pegaprox.core.api_transport import ApiTransport
+    transport = getattr(mgr, '_api_transport', None)
+    if not isinstance(transport, ApiTransport):   # non-PVE managers, or no API call yet
+        return
+    fam.mark()
+    rows = []
+    for (method, endpoint), h in sorted(transport.histograms.snapshot().items()):
+        lbl = {**base, 'method': method, 'endpoint': endpoint}
+        for le, cum in h['buckets']:
+            le_s = '+Inf' if le is None else f'{le / 1000.0:g}'
+            rows.append(f"pegaprox_api_request_duration_seconds_bucket{{{_labels_str({**lbl, 'le': le_s})}}} {cum}")
+        l = _labels_str(lbl)
+        rows.append(f"pegaprox_api_request_duration_seconds_sum{{{l}}} {h['sum_ms'] / 1000.0:.6f}")
+        rows.append(f"pegaprox_api_request_duration_seconds_count{{{l}}} {h['count']}")
+    fam.put('pegaprox_api_request_duration_seconds', rows)
+    st = transport.stats()
+    blbl = _labels_str(base)
+    fam.put('pegaprox_api_coalesced_requests_total',
+            [f"pegaprox_api_coalesced_requests_total{{{blbl}}} {st.get('coalesced', 0)}"])
+    if 'tls_handshakes' in st:
+        hs, resumed = st['tls_handshakes'], st.get('tls_resumed', 0)
+        fam.put('pegaprox_api_tls_handshakes_total', [
+            f"pegaprox_api_tls_handshakes_total{{{_labels_str({**base, 'resumed': '1'})}}} {resumed}",
+            f"pegaprox_api_tls_handshakes_total{{{_labels_str({**base, 'resumed': '0'})}}} {hs - resumed}",
+        ])
+    fam.put('pegaprox_api_pool_size', [
+        f"pegaprox_api_pool_size{{{_labels_str({**base, 'node': node})}}} {p['size']}"
+        for node, p in sorted((st.get('pools') or {}).items())])
+
+
+def _render_guest_poller(fam, mgr, base):
+    from pegaprox.core.guest_poller import GuestPollPlanner
+    planner = getattr(mgr, '_guest_poller', None)
+    if not isinstance(planner, GuestPollPlanner):
+        return
+    fam.mark()
+    st = planner.stats()
+    blbl = _labels_str(base)
+    fam.put('pegaprox_guest_agent_probes_total', [
+        f"pegaprox_guest_agent_probes_total{{{_labels_str({**base, 'result': r})}}} {st[r]}"
+        for r in ('unchanged', 'changed', 'failed')])
+    fam.put('pegaprox_guest_agent_skipped_total', [f"pegaprox_guest_agent_skipped_total{{{blbl}}} {st['skipped']}"])
+    fam.put('pegaprox_guest_agent_deferred_total', [f"pegaprox_guest_agent_deferred_total{{{blbl}}} {st['deferred']}"])
+    fam.put('pegaprox_guest_agent_cache_age_seconds', [
+        f"pegaprox_guest_agent_cache_age_seconds{{{_labels_str({**base, 'stat': k})}}} {st[f'age_{k}_seconds']}"
+        for k in ('avg', 'max')])
+
+
+def _render_self():
+    fam = _Families()
     try:
         from pegaprox.constants import PEGAPROX_VERSION, PEGAPROX_BUILD
-        out.extend(_sample('pegaprox_info', 1, {'version': PEGAPROX_VERSION, 'build': PEGAPROX_BUILD}))
+        fam.put('pegaprox_info', _sample('pegaprox_info', 1, {'version': PEGAPROX_VERSION, 'build': PEGAPROX_BUILD}))
     except Exception:
         pass
-
-    emit('# HELP pegaprox_scrape_timestamp_seconds Unix time of this scrape')
-    emit('# TYPE pegaprox_scrape_timestamp_seconds gauge')
-    out.extend(_sample('pegaprox_scrape_timestamp_seconds', f'{time.time():.0f}'))
+    fam.put('pegaprox_scrape_timestamp_seconds', _sample('pegaprox_scrape_timestamp_seconds', f'{time.time():.0f}'))
 
     # ── Session + auth state ──
     with sessions_lock:
@@ -174,191 +536,365 @@ def prometheus_metrics():
             u = s.get('user', '?')
             if u and u != '?':
                 active_users.add(u)
-    emit('# HELP pegaprox_sessions_active Currently authenticated sessions')
-    emit('# TYPE pegaprox_sessions_active gauge')
-    out.extend(_sample('pegaprox_sessions_active', sess_total))
-    emit('# HELP pegaprox_users_logged_in Unique PegaProx users with an active session')
-    emit('# TYPE pegaprox_users_logged_in gauge')
-    out.extend(_sample('pegaprox_users_logged_in', len(active_users)))
+    fam.put('pegaprox_sessions_active', _sample('pegaprox_sessions_active', sess_total))
+    fam.put('pegaprox_users_logged_in', _sample('pegaprox_users_logged_in', len(active_users)))
 
     try:
+        fam.mark()
         users = load_users(readonly=True) or {}
         enabled_users = sum(1 for u in users.values() if u.get('enabled', True))
-        emit('# HELP pegaprox_users_total Configured PegaProx user accounts')
-        emit('# TYPE pegaprox_users_total gauge')
-        out.extend(_sample('pegaprox_users_total', len(users)))
-        emit('# HELP pegaprox_users_enabled Enabled PegaProx user accounts')
-        emit('# TYPE pegaprox_users_enabled gauge')
-        out.extend(_sample('pegaprox_users_enabled', enabled_users))
+        fam.put('pegaprox_users_total', _sample('pegaprox_users_total', len(users)))
+        fam.put('pegaprox_users_enabled', _sample('pegaprox_users_enabled', enabled_users))
     except Exception as e:
         logging.debug(f"[metrics] user stats failed: {e}")
 
-    # ── Clusters ──
-    emit('# HELP pegaprox_cluster_connected 1 if PegaProx can reach the cluster API')
-    emit('# TYPE pegaprox_cluster_connected gauge')
-    emit('# HELP pegaprox_cluster_nodes_total Node count per cluster')
-    emit('# TYPE pegaprox_cluster_nodes_total gauge')
-    emit('# HELP pegaprox_cluster_nodes_online Online node count')
-    emit('# TYPE pegaprox_cluster_nodes_online gauge')
-    emit('# HELP pegaprox_cluster_vms_total VMs/CTs per cluster')
-    emit('# TYPE pegaprox_cluster_vms_total gauge')
-    emit('# HELP pegaprox_cluster_vms_running Running VMs/CTs per cluster')
-    emit('# TYPE pegaprox_cluster_vms_running gauge')
-    emit('# HELP pegaprox_cluster_quorum_held 1 if quorum is currently held')
-    emit('# TYPE pegaprox_cluster_quorum_held gauge')
-
-    emit('# HELP pegaprox_node_cpu_percent CPU usage percent per node')
-    emit('# TYPE pegaprox_node_cpu_percent gauge')
-    emit('# HELP pegaprox_node_mem_percent Memory usage percent per node')
-    emit('# TYPE pegaprox_node_mem_percent gauge')
-    emit('# HELP pegaprox_node_uptime_seconds Node uptime in seconds')
-    emit('# TYPE pegaprox_node_uptime_seconds gauge')
-    emit('# HELP pegaprox_node_online 1 if the node is online')
-    emit('# TYPE pegaprox_node_online gauge')
-    emit('# HELP pegaprox_node_apt_updates_available 1 if any APT package update is available on the node')
-    emit('# TYPE pegaprox_node_apt_updates_available gauge')
-
-    emit('# HELP pegaprox_guest_running 1 if the VM or LXC container is running')
-    emit('# TYPE pegaprox_guest_running gauge')
-    emit('# HELP pegaprox_guest_cpu_percent CPU usage percent per VM or LXC container')
-    emit('# TYPE pegaprox_guest_cpu_percent gauge')
-    emit('# HELP pegaprox_guest_mem_used_bytes Memory used by a VM or LXC container')
-    emit('# TYPE pegaprox_guest_mem_used_bytes gauge')
-    emit('# HELP pegaprox_guest_mem_total_bytes Configured memory limit for a VM or LXC container')
-    emit('# TYPE pegaprox_guest_mem_total_bytes gauge')
-    emit('# HELP pegaprox_guest_mem_percent Memory usage percent per VM or LXC container')
-    emit('# TYPE pegaprox_guest_mem_percent gauge')
-    emit('# HELP pegaprox_guest_disk_used_bytes Disk bytes used by a VM or LXC container')
-    emit('# TYPE pegaprox_guest_disk_used_bytes gauge')
-    emit('# HELP pegaprox_guest_disk_total_bytes Configured disk size for a VM or LXC container')
-    emit('# TYPE pegaprox_guest_disk_total_bytes gauge')
-    emit('# HELP pegaprox_guest_disk_percent Disk usage percent per VM or LXC container')
-    emit('# TYPE pegaprox_guest_disk_percent gauge')
-    emit('# HELP pegaprox_guest_network_receive_bytes_total Cumulative network bytes received by a VM or LXC container')
-    emit('# TYPE pegaprox_guest_network_receive_bytes_total counter')
-    emit('# HELP pegaprox_guest_network_transmit_bytes_total Cumulative network bytes transmitted by a VM or LXC container')
-    emit('# TYPE pegaprox_guest_network_transmit_bytes_total counter')
-    emit('# HELP pegaprox_guest_uptime_seconds Uptime in seconds for a VM or LXC container')
-    emit('# TYPE pegaprox_guest_uptime_seconds gauge')
-    # Ceph (#540) — only emitted for clusters that actually run Ceph
-    emit('# HELP pegaprox_ceph_health_status Ceph cluster health (0=OK, 1=WARN, 2=ERR, 3=unknown)')
-    emit('# TYPE pegaprox_ceph_health_status gauge')
-    emit('# HELP pegaprox_ceph_osd_up Number of Ceph OSDs currently up')
-    emit('# TYPE pegaprox_ceph_osd_up gauge')
-    emit('# HELP pegaprox_ceph_osd_in Number of Ceph OSDs currently in')
-    emit('# TYPE pegaprox_ceph_osd_in gauge')
-
-    for cid, mgr in cluster_managers.items():
-        cname = getattr(getattr(mgr, 'config', None), 'name', cid) or cid
-        base = {'cluster_id': cid, 'cluster': cname}
-        connected = 1 if getattr(mgr, 'is_connected', False) else 0
-        out.extend(_sample('pegaprox_cluster_connected', connected, base))
-        if not connected:
-            continue
-
-        # Node counts + per-node stats
-        try:
-            node_status = mgr.get_node_status() or {}
-            nodes_total = len(node_status)
-            nodes_online = 0
-            for name, info in node_status.items():
-                is_online = (info.get('status') == 'online') or (not info.get('offline', False))
-                if is_online:
-                    nodes_online += 1
-                nlabels = {**base, 'node': name}
-                out.extend(_sample('pegaprox_node_online', 1 if is_online else 0, nlabels))
-                out.extend(_sample('pegaprox_node_cpu_percent',
-                                   _round_num(info.get('cpu_percent', _num(info.get('cpu', 0)) * 100)),
-                                   nlabels))
-                out.extend(_sample('pegaprox_node_mem_percent',
-                                   _round_num(info.get('mem_percent', 0)), nlabels))
-                out.extend(_sample('pegaprox_node_uptime_seconds',
-                                   _num(info.get('uptime', 0)), nlabels))
-                apt_available = _node_apt_updates_available(cid, mgr, name) if is_online else 0
-                if apt_available is not None:
-                    out.extend(_sample('pegaprox_node_apt_updates_available', apt_available, nlabels))
-            out.extend(_sample('pegaprox_cluster_nodes_total', nodes_total, base))
-            out.extend(_sample('pegaprox_cluster_nodes_online', nodes_online, base))
-            # Quorum: >50% online
-            quorum = 1 if nodes_online * 2 > nodes_total else 0
-            out.extend(_sample('pegaprox_cluster_quorum_held', quorum, base))
-        except Exception as e:
-            logging.debug(f"[metrics] {cid} node stats failed: {e}")
+    # ── Live updates (SSE fan-out) ──
+    try:
+        fam.mark()
+        fan = sse_fanout_stats()
+        with sse_clients_lock:
+            sse_list = [c.get('dropped', 0) for c in sse_clients.values()]
+        fam.put('pegaprox_sse_clients', _sample('pegaprox_sse_clients', len(sse_list)))
+        fam.put('pegaprox_sse_fanout_seconds',
+                _sample('pegaprox_sse_fanout_seconds_sum', f"{fan['seconds_total']:.6f}")
+                + _sample('pegaprox_sse_fanout_seconds_count', fan['events']))
+        fam.put('pegaprox_sse_fanout_seconds_max', _sample('pegaprox_sse_fanout_seconds_max', f"{fan['seconds_max']:.6f}"))
+        fam.put('pegaprox_sse_frames_sent_total', _sample('pegaprox_sse_frames_sent_total', fan['frames']))
+        fam.put('pegaprox_sse_frames_dropped_total', _sample('pegaprox_sse_frames_dropped_total', fan['dropped']))
+        # aggregate only: per-client series would grow with every tab that
+        # ever connected and put usernames on the unauthenticated scrape
+        fam.put('pegaprox_sse_slow_clients',
+                _sample('pegaprox_sse_slow_clients', sum(1 for d in sse_list if d)))
+        fam.put('pegaprox_sse_client_dropped_frames_max',
+                _sample('pegaprox_sse_client_dropped_frames_max', max(sse_list, default=0)))
+    except Exception as e:
+        logging.debug(f"[metrics] sse stats failed: {e}")
 
-        # Ceph health (#540) — best-effort; get_ceph_health_summary returns None when
-        # the cluster has no Ceph, so no ceph_* series are emitted for those clusters.
-        # One SSH probe per cluster per scrape, consistent with the apt-updates metric.
-        try:
-            ceph = mgr.get_ceph_health_summary() if hasattr(mgr, 'get_ceph_health_summary') else None
-            if ceph:
-                _cmap = {'HEALTH_OK': 0, 'HEALTH_WARN': 1, 'HEALTH_ERR': 2}
-                out.extend(_sample('pegaprox_ceph_health_status', _cmap.get(ceph.get('status'), 3), base))
-                out.extend(_sample('pegaprox_ceph_osd_up', _num(ceph.get('osd_up', 0)), base))
-                out.extend(_sample('pegaprox_ceph_osd_in', _num(ceph.get('osd_in', 0)), base))
-        except Exception as e:
-            logging.debug(f"[metrics] {cid} ceph health failed: {e}")
+    # ── Auth context cache (require_auth) ──
+    try:
+        fam.mark()
+        from pegaprox.utils.auth import auth_cache_stats
+        ac = auth_cache_stats()
+        fam.put('pegaprox_auth_cache_hits_total', _sample('pegaprox_auth_cache_hits_total', ac['hits']))
+        fam.put('pegaprox_auth_cache_misses_total', _sample('pegaprox_auth_cache_misses_total', ac['misses']))
+        fam.put('pegaprox_auth_cache_entries', _sample('pegaprox_auth_cache_entries', ac['entries']))
+        fam.put('pegaprox_auth_check_seconds',
+                _sample('pegaprox_auth_check_seconds_sum', f"{ac['seconds_total']:.6f}")
+                + _sample('pegaprox_auth_check_seconds_count', ac['checks']))
+        fam.put('pegaprox_auth_check_seconds_max', _sample('pegaprox_auth_check_seconds_max', f"{ac['seconds_max']:.6f}"))
+    except Exception as e:
+        logging.debug(f"[metrics] auth cache stats failed: {e}")
+
+    # ── SIEM forwarder backpressure (per target) ──
+    try:
+        fam.mark()
+        from pegaprox.api.siem import worker_stats as siem_worker_stats
+        siem = siem_worker_stats()
+        if siem:
+            keys = (
+                ('pegaprox_siem_backlog_events', 'backlog'),
+                ('pegaprox_siem_delivered_events_total', 'delivered'),
+                ('pegaprox_siem_failed_batches_total', 'failures'),
+                ('pegaprox_siem_last_batch_seconds', 'last_batch_seconds'),
+                ('pegaprox_siem_backoff_seconds', 'backoff_seconds'),
+                ('pegaprox_siem_dead_lettered_events_total', 'dead_lettered'),
+            )
+            for name, key in keys:
+                lines = []
+                for tid, st in siem.items():
+                    labels = {'target_id': tid, 'target': st.get('name', ''), 'type': st.get('type', '')}
+                    lines.extend(_sample(name, _num(st.get(key, 0)), labels))
+                fam.put(name, lines)
+    except Exception as e:
+        logging.debug(f"[metrics] siem stats failed: {e}")
+
+    # ── Console relay (VNC sessions, cap, per-session throughput) ──
+    try:
+        fam.mark()
+        from pegaprox.utils.console_relay import stats as console_stats
+        cs = console_stats()
+        fam.put('pegaprox_console_sessions', _sample('pegaprox_console_sessions', cs['active']))
+        fam.put('pegaprox_console_sessions_limit', _sample('pegaprox_console_sessions_limit', cs['cap']))
+        fam.put('pegaprox_console_sessions_rejected_total',
+                _sample('pegaprox_console_sessions_rejected_total', cs['rejected']))
+        fam.put('pegaprox_console_bytes_total',
+                _sample('pegaprox_console_bytes_total', cs['bytes_up'], {'direction': 'up'})
+                + _sample('pegaprox_console_bytes_total', cs['bytes_down'], {'direction': 'down'}))
+        # per (cluster, kind), never per session: session ids, vmids and users
+        # would be unbounded series on an unauthenticated scrape
+        rate, lat = {}, {}
+        for sess in cs['sessions']:
+            key = (sess['cluster_id'], sess['kind'])
+            up, down = rate.get(key, (0, 0))
+            rate[key] = (up + sess['bytes_per_sec_up'], down + sess['bytes_per_sec_down'])
+            lat[key] = max(lat.get(key, 0), sess['latency_ms'])
+        rate_lines, lat_lines = [], []
+        for (cluster_id, kind), (up, down) in sorted(rate.items()):
+            labels = {'cluster_id': cluster_id, 'kind': kind}
+            rate_lines.extend(_sample('pegaprox_console_bytes_per_second', round(up, 1), {**labels, 'direction': 'up'}))
+            rate_lines.extend(_sample('pegaprox_console_bytes_per_second', round(down, 1),
+                                      {**labels, 'direction': 'down'}))
+            lat_lines.extend(_sample('pegaprox_console_latency_seconds_max',
+                                     f"{lat[(cluster_id, kind)] / 1000:.6f}", labels))
+        fam.put('pegaprox_console_bytes_per_second', rate_lines)
+        fam.put('pegaprox_console_latency_seconds_max', lat_lines)
+    except Exception as e:
+        logging.debug(f"[metrics] console relay stats failed: {e}")
+
+    # ── Chart RRD cache (core/rrd_cache.py) ──
+    try:
+        fam.mark()
+        from pegaprox.core.rrd_cache import stats as rrd_cache_stats
+        rc = rrd_cache_stats()
+        lines = []
+        for result, key in (('hit', 'hits'), ('miss', 'misses'), ('coalesced', 'coalesced')):
+            lines.extend(_sample('pegaprox_rrd_cache_lookups_total', rc[key], {'result': result}))
+        fam.put('pegaprox_rrd_cache_lookups_total', lines)
+        fam.put('pegaprox_rrd_cache_fetch_errors_total', _sample('pegaprox_rrd_cache_fetch_errors_total', rc['errors']))
+        fam.put('pegaprox_rrd_cache_evictions_total', _sample('pegaprox_rrd_cache_evictions_total', rc['evictions']))
+        fam.put('pegaprox_rrd_cache_entries', _sample('pegaprox_rrd_cache_entries', rc['entries']))
+        fam.put('pegaprox_rrd_cache_cells', _sample('pegaprox_rrd_cache_cells', rc['cells']))
+    except Exception as e:
+        logging.debug(f"[metrics] rrd cache stats failed: {e}")
+
+    # ── Job scheduler (core/job_scheduler.py) ──
+    try:
+        fam.mark()
+        from pegaprox.core.job_scheduler import stats as scheduler_stats
+        js = scheduler_stats()
+        keys = (
+            ('pegaprox_scheduler_jobs', 'jobs'),
+            ('pegaprox_scheduler_jobs_running', 'running'),
+            ('pegaprox_scheduler_jobs_queued', 'queued'),
+            ('pegaprox_scheduler_fired_total', 'fired'),
+            ('pegaprox_scheduler_failed_total', 'failed'),
+            ('pegaprox_scheduler_skipped_total', 'skipped'),
+            ('pegaprox_scheduler_deferred_total', 'deferred'),
+        )
+        for name, key in keys:
+            fam.put(name, [l for kind, st in js.items() for l in _sample(name, st[key], {'kind': kind})])
+        lines, max_lines = [], []
+        for kind, st in js.items():
+            lines.extend(_sample('pegaprox_scheduler_lateness_seconds_sum', f"{st['lateness_sum']:.3f}", {'kind': kind})
+                         + _sample('pegaprox_scheduler_lateness_seconds_count', st['fired'], {'kind': kind}))
+            max_lines.extend(_sample('pegaprox_scheduler_lateness_seconds_max', f"{st['lateness_max']:.3f}", {'kind': kind}))
+        fam.put('pegaprox_scheduler_lateness_seconds', lines)
+        fam.put('pegaprox_scheduler_lateness_seconds_max', max_lines)
+    except Exception as e:
+        logging.debug(f"[metrics] job scheduler stats failed: {e}")
+
+    # ── Site-recovery readiness (core/dr_readiness.py) ──
+    try:
+        fam.mark()
+        from pegaprox.core.dr_readiness import summary as dr_summary
+        plans = dr_summary()
+        keys = (
+            ('pegaprox_site_recovery_plan_ready', lambda r: 1 if r['ready'] else 0),
+            ('pegaprox_site_recovery_plan_vms', lambda r: r['vms']),
+            ('pegaprox_site_recovery_plan_blockers', lambda r: r['blockers']),
+            ('pegaprox_site_recovery_rpo_breached_vms', lambda r: r['rpo_breached']),
+        )
+        for name, get in keys:
+            fam.put(name, [l for pid, r in plans.items()
+                           for l in _sample(name, get(r), {'plan': pid, 'name': r['name']})])
+        fam.put('pegaprox_site_recovery_replication_age_seconds_max', [
+            l for pid, r in plans.items() if r['max_age_seconds'] is not None
+            for l in _sample('pegaprox_site_recovery_replication_age_seconds_max', r['max_age_seconds'],
+                             {'plan': pid, 'name': r['name']})])
+    except Exception as e:
+        logging.debug(f"[metrics] site-recovery readiness failed: {e}")
+    return fam
 
-        # VM counts
+
+def _render_tail():
+    fam = _Families()
+    # ── PBS backup servers ──
+    lines = []
+    for pid, pmgr in list(pbs_managers.items()):
+        labels = {'pbs_id': pid, 'pbs': getattr(pmgr, 'name', '') or pid}
+        lines.extend(_sample('pegaprox_pbs_connected', 1 if getattr(pmgr, 'connected', False) else 0, labels))
+    fam.put('pegaprox_pbs_connected', lines)
+    # ── VMware/ESXi ──
+    lines = []
+    for vid, vmgr in list(vmware_managers.items()):
+        labels = {'esxi_id': vid, 'host': getattr(vmgr, 'host', '') or vid}
+        lines.extend(_sample('pegaprox_esxi_connected', 1 if getattr(vmgr, 'connected', False) else 0, labels))
+    fam.put('pegaprox_esxi_connected', lines)
+    return fam
+
+
+def refresh_exposition():
+    """Re-render every source into the cache. Bumps the generation (→ new ETag)
+    only when some family's bytes actually changed."""
+    global _cache_gen
+    self_fam = _render_self()
+    tail_fam = _render_tail()
+    clusters = {}
+    for cid, mgr in list(cluster_managers.items()):
+        t0 = time.perf_counter()
+        fam = _render_cluster(cid, mgr)
+        clusters[cid] = {'at': time.time(), 'seconds': time.perf_counter() - t0,
+                         'families': fam.buffers, 'render': fam.seconds}
+
+    with _cache_lock:
+        old = (_self_buffers, _tail_buffers, {c: e['families'] for c, e in _cluster_buffers.items()})
+        # the timestamp sample changes every render; leave it out of the comparison
+        changed = (
+            {k: v for k, v in self_fam.buffers.items() if k != 'pegaprox_scrape_timestamp_seconds'}
+            != {k: v for k, v in old[0].items() if k != 'pegaprox_scrape_timestamp_seconds'}
+            or tail_fam.buffers != old[1]
+            or {c: e['families'] for c, e in clusters.items()} != old[2]
+        )
+        if changed or not _self_buffers:
+            _self_buffers.clear()
+            _self_buffers.update(self_fam.buffers)
+            _cache_gen += 1
+        _tail_buffers.clear()
+        _tail_buffers.update(tail_fam.buffers)
+        _cluster_buffers.clear()
+        _cluster_buffers.update(clusters)
+        for k in [k for k in _fed if k not in cluster_managers]:
+            _fed.pop(k, None)
+        _render_seconds.clear()
+        for name, secs in self_fam.seconds.items():
+            _render_seconds[('self', name)] = secs
+        for name, secs in tail_fam.seconds.items():
+            _render_seconds[('tail', name)] = secs
+        for cid, e in clusters.items():
+            for name, secs in e['render'].items():
+                _render_seconds[(cid, name)] = secs
+        _exporter['rendered_at'] = time.time()
+
+
+def _render_stats_lines(now):
+    """The exporter's own families — built per scrape from the cached stats (cheap)."""
+    out = {}
+    with _cache_lock:
+        per_family, sizes = {}, {}
+        for (_src, name), secs in _render_seconds.items():
+            per_family[name] = per_family.get(name, 0.0) + secs
+        for bufs in [_self_buffers, _tail_buffers] + [e['families'] for e in _cluster_buffers.values()]:
+            for name, b in bufs.items():
+                sizes[name] = sizes.get(name, 0) + len(b)
+        cluster_secs = {cid: e['seconds'] for cid, e in _cluster_buffers.items()}
+        oldest = min([e['at'] for e in _cluster_buffers.values()] + [_exporter['rendered_at'] or now])
+        scrapes = dict(_scrape_counts)
+    out['pegaprox_metrics_render_seconds'] = [
+        f'pegaprox_metrics_render_seconds{{family="{n}"}} {s:.6f}' for n, s in sorted(per_family.items())]
+    out['pegaprox_metrics_family_bytes'] = [
+        f'pegaprox_metrics_family_bytes{{family="{n}"}} {b}' for n, b in sorted(sizes.items())]
+    out['pegaprox_metrics_cluster_render_seconds'] = [
+        f'pegaprox_metrics_cluster_render_seconds{{cluster_id="{_escape_label(c)}"}} {s:.6f}'
+        for c, s in sorted(cluster_secs.items())]
+    out['pegaprox_metrics_render_age_seconds'] = [f'pegaprox_metrics_render_age_seconds {max(0.0, now - oldest):.3f}']
+    out['pegaprox_metrics_scrapes_total'] = [
+        f'pegaprox_metrics_scrapes_total{{encoding="{enc}",code="{code}"}} {n}'
+        for (enc, code), n in sorted(scrapes.items())]
+    return out
+
+
+def _cached_body():
+    """(etag, body bytes) for the current generation — joined once per generation."""
+    with _cache_lock:
+        gen = _cache_gen
+        if _body_cache['gen'] == gen:
+            return _body_cache['etag'], _body_cache['body']
+        order = sorted(_cluster_buffers)
+        parts = []
+        for name, _t, _h in _SELF_FAMILIES:
+            if _self_buffers.get(name):
+                parts.append(_HEADERS[name])
+                parts.append(_self_buffers[name])
+        for name, _t, _h in _CLUSTER_FAMILIES:
+            chunk = b''.join(_cluster_buffers[c]['families'].get(name, b'') for c in order)
+            if chunk:
+                parts.append(_HEADERS[name])
+                parts.append(chunk)
+        for name in ('pegaprox_pbs_connected', 'pegaprox_esxi_connected'):
+            if _tail_buffers.get(name):
+                parts.append(_HEADERS[name])
+                parts.append(_tail_buffers[name])
+        body = b''.join(parts)
+        etag = f'"pgx-{gen}-{zlib.crc32(body):08x}"'
+        _body_cache.update({'gen': gen, 'etag': etag, 'body': body, 'gzip': None})
+        return etag, body
+
+
+def _refresher_loop():
+    while True:
+        if time.time() - _exporter['last_scrape'] > _EXPORTER_IDLE:
+            break
         try:
-            vms = []
-            if hasattr(mgr, 'get_vm_resources'):
-                vms = mgr.get_vm_resources() or []
-            elif hasattr(mgr, 'get_resources'):
-                vms = [r for r in (mgr.get_resources() or []) if r.get('type') in ('qemu', 'lxc')]
-            out.extend(_sample('pegaprox_cluster_vms_total', len(vms), base))
-            running = sum(1 for v in vms if v.get('status') == 'running')
-            out.extend(_sample('pegaprox_cluster_vms_running', running, base))
-
-            for v in vms:
-                vmid = v.get('vmid', '')
-                labels = {
-                    **base,
-                    'node': v.get('node', ''),
-                    'type': _resource_type_label(v.get('type')),
-                    'vmid': vmid,
-                    'name': v.get('name') or v.get('hostname') or str(vmid),
-                }
-                mem_used = _num(v.get('mem', 0))
-                mem_total = _num(v.get('maxmem', 0))
-                disk_used = _num(v.get('disk', 0))
-                disk_total = _num(v.get('maxdisk', 0))
-                out.extend(_sample('pegaprox_guest_running', 1 if v.get('status') == 'running' else 0, labels))
-                out.extend(_sample('pegaprox_guest_cpu_percent',
-                                   _round_num(v.get('cpu_percent', _num(v.get('cpu', 0)) * 100)),
-                                   labels))
-                out.extend(_sample('pegaprox_guest_mem_used_bytes', mem_used, labels))
-                out.extend(_sample('pegaprox_guest_mem_total_bytes', mem_total, labels))
-                out.extend(_sample('pegaprox_guest_mem_percent',
-                                   _round_num(v.get('mem_percent', _pct(mem_used, mem_total))),
-                                   labels))
-                out.extend(_sample('pegaprox_guest_disk_used_bytes', disk_used, labels))
-                out.extend(_sample('pegaprox_guest_disk_total_bytes', disk_total, labels))
-                out.extend(_sample('pegaprox_guest_disk_percent',
-                                   _round_num(v.get('disk_percent', _pct(disk_used, disk_total))),
-                                   labels))
-                out.extend(_sample('pegaprox_guest_network_receive_bytes_total', _num(v.get('netin', 0)), labels))
-                out.extend(_sample('pegaprox_guest_network_transmit_bytes_total', _num(v.get('netout', 0)), labels))
-                out.extend(_sample('pegaprox_guest_uptime_seconds', _num(v.get('uptime', 0)), labels))
+            refresh_exposition()
         except Exception as e:
-            logging.debug(f"[metrics] {cid} vm list failed: {e}")
+            logging.warning(f"[metrics] exposition refresh failed: {e}")
+        time.sleep(METRICS_REFRESH_INTERVAL)
+    with _cache_lock:
+        _exporter['thread'] = None
+        _fed.clear()
+    logging.info("[metrics] exporter idle — refresher stopped")
 
-    # ── PBS backup servers ──
-    if pbs_managers:
-        emit('# HELP pegaprox_pbs_connected 1 if PBS is reachable')
-        emit('# TYPE pegaprox_pbs_connected gauge')
-        for pid, pmgr in pbs_managers.items():
-            labels = {'pbs_id': pid, 'pbs': getattr(pmgr, 'name', '') or pid}
-            out.extend(_sample('pegaprox_pbs_connected',
-                               1 if getattr(pmgr, 'connected', False) else 0, labels))
 
-    # ── VMware/ESXi ──
-    if vmware_managers:
-        emit('# HELP pegaprox_esxi_connected 1 if ESXi/vCenter is reachable')
-        emit('# TYPE pegaprox_esxi_connected gauge')
-        for vid, vmgr in vmware_managers.items():
-            labels = {'esxi_id': vid, 'host': getattr(vmgr, 'host', '') or vid}
-            out.extend(_sample('pegaprox_esxi_connected',
-                               1 if getattr(vmgr, 'connected', False) else 0, labels))
-
-    body = '\n'.join(out) + '\n'
-    return Response(body, mimetype='text/plain; version=0.0.4; charset=utf-8')
+def _ensure_exporter():
+    """Start the refresher on demand; render inline when the cache is empty or stale."""
+    _exporter['last_scrape'] = time.time()
+    with _cache_lock:
+        start = _exporter['thread'] is None
+        if start:
+            _exporter['thread'] = threading.Thread(target=_refresher_loop, daemon=True, name='metrics-exporter')
+        stale = time.time() - _exporter['rendered_at'] > 3 * METRICS_REFRESH_INTERVAL
+    if stale:
+        refresh_exposition()
+    if start:
+        _exporter['thread'].start()
+
+
+def _count_scrape(encoding, code):
+    with _cache_lock:
+        _scrape_counts[(encoding, code)] = _scrape_counts.get((encoding, code), 0) + 1
+
+
+@bp.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    if not _auth_ok():
+        return Response(
+            '# unauthorized — set Authorization: Bearer <api_token>, or enable metrics_public\n',
+            status=401, mimetype='text/plain; version=0.0.4'
+        )
+
+    _ensure_exporter()
+    base_etag, body = _cached_body()
+    mimetype = 'text/plain; version=0.0.4; charset=utf-8'
+    gzip_ok = 'gzip' in (request.headers.get('Accept-Encoding') or '').lower()
+    encoding = 'gzip' if gzip_ok else 'identity'
+    # NS Oct 2026 — the gzip body is a different representation, so it gets its
+    # own strong ETag; decided on the cached body alone so a 304 needs no tail render
+    use_gzip = gzip_ok and len(body) >= _GZIP_MIN_BYTES
+    etag = base_etag[:-1] + '-gz"' if use_gzip else base_etag
+
+    # conditional scrape: nothing re-rendered differently since the caller's copy
+    if etag in (request.headers.get('If-None-Match') or ''):
+        _count_scrape(encoding, '304')
+        resp = Response(status=304)
+        resp.headers['ETag'] = etag
+        resp.headers['Vary'] = 'Accept-Encoding'
+        return resp
+
+    _count_scrape(encoding, '200')
+    stats = _render_stats_lines(time.time())
+    tail = b''.join(_HEADERS[name] + _encode(stats[name])
+                    for name, _t, _h in _TAIL_FAMILIES if stats.get(name))
+    if use_gzip:
+        # gzip members concatenate: compress the cached body once per generation,
+        # only the small self-stats tail is compressed per scrape
+        with _cache_lock:
+            if _body_cache['etag'] == base_etag and _body_cache['gzip'] is None:
+                _body_cache['gzip'] = gzip.compress(body, compresslevel=6)
+            gz_body = _body_cache['gzip'] if _body_cache['etag'] == base_etag else gzip.compress(body, compresslevel=6)
+        resp = Response(gz_body + gzip.compress(tail, compresslevel=6), mimetype=mimetype)
+        resp.headers['Content-Encoding'] = 'gzip'
+    else:
+        resp = Response(body + tail, mimetype=mimetype)
+    resp.headers['ETag'] = etag
+    resp.headers['Vary'] = 'Accept-Encoding'
+    return resp
@@ -197,7 +197,7 @@ def get_node_sensors_api(cluster_id, node):
 
 
 # #601 — per-node hottest-temperature history for the chart-over-time ask. Reads the
-# background collector's persisted 5-min metrics_history snapshots (off-hub, cached);
+# background collector's persisted 5-min metrics series (core/tsdb.py, off-hub, cached);
 # no live SSH here, so it stays cheap even at fleet scale.
 @bp.route('/api/clusters/<cluster_id>/nodes/<node>/temperature-history', methods=['GET'])
 @require_auth(perms=['node.view'])
@@ -206,22 +206,18 @@ def get_node_temperature_history_api(cluster_id, node):
     if not ok: return err
     bad, code = _reject_bad_node(node)
     if bad is not None: return bad, code
-    from pegaprox.background.metrics import load_metrics_history
+    from datetime import datetime as _dt
+    from pegaprox.core import tsdb
     series = []
     try:
-        hist = load_metrics_history() or {}
-        for snap in (hist.get('snapshots') or []):
-            try:
-                nodes = ((snap.get('clusters') or {}).get(cluster_id) or {}).get('nodes') or {}
-                temp = (nodes.get(node) or {}).get('temp')
-                ts = snap.get('timestamp')
-                if temp is not None and ts:
-                    series.append({'ts': ts, 'temp': temp})
-            except Exception:
-                continue
+        # one series read (this node's temp chunks only), ~the last 1000 samples
+        data = tsdb.load_series(cluster_id, 1000 * 300 / 86400, entity=f'node/{node}') or {}
+        ts_list, vals = (data.get(f'node/{node}') or {}).get('temp') or ([], [])
+        for ts, temp in zip(ts_list, vals):
+            if temp == temp:  # NaN = no reading in that sample
+                series.append({'ts': _dt.fromtimestamp(ts).isoformat(), 'temp': round(temp, 1)})
     except Exception as e:
         return jsonify({'error': f'history read failed: {e}'}), 500
-    series.sort(key=lambda x: x['ts'])
     return jsonify({'series': series, 'unit': '°C', 'count': len(series)})
 
 
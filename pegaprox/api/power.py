@@ -33,7 +33,7 @@ from flask import Blueprint, jsonify, request
 
 from pegaprox.globals import cluster_managers
 from pegaprox.utils.auth import require_auth
-from pegaprox.api.helpers import check_cluster_access, load_metrics_window
+from pegaprox.api.helpers import check_cluster_access, load_cluster_metrics_window
 from pegaprox.core.db import get_db
 from pegaprox.models.permissions import ROLE_ADMIN
 
@@ -91,16 +91,11 @@ def _current_user():
 
 
 def _load_history(cluster_id, days=30):
-    # fetch+parse off-hub + cached in load_metrics_window (shared w/ insights/costs)
-    out = []
+    # read+decode off-hub + cached in load_cluster_metrics_window (shared w/ insights/costs)
     try:
-        for ts_unix, clusters in load_metrics_window(days):
-            cd = clusters.get(cluster_id)
-            if cd:
-                out.append((ts_unix, cd))
+        return load_cluster_metrics_window(cluster_id, days) or []
     except Exception:
-        pass
-    return out
+        return []
 
 
 def _compute_per_vm(snapshots, mgr, rates, hours_window):
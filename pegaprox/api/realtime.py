@@ -28,8 +28,9 @@ from pegaprox.utils.realtime import (
     broadcast_update, broadcast_sse, broadcast_action,
     create_sse_token, validate_sse_token,
     create_ws_token, validate_ws_token,
-    push_immediate_update,
+    push_immediate_update, rebuild_sse_index, sse_frame,
 )
+from pegaprox.utils.resource_state import send_resource_snapshots
 from pegaprox.utils.email import send_email
 from pegaprox.api.helpers import load_server_settings, get_connected_manager
 from pegaprox.models.permissions import ROLE_ADMIN
@@ -37,6 +38,8 @@ from pegaprox.models.permissions import ROLE_ADMIN
 bp = Blueprint('realtime', __name__)
 sock = Sock()
 
+_MAX_FOCUS_VMS = 500   # per cluster, per SSE client
+
 
 def _scope_ws_clusters(allowed, requested):
     """NS Aug 2026 (audit) — clamp a WebSocket client's cluster subscription to what RBAC permits.
@@ -367,28 +370,34 @@ def sse_updates():
             'connected_at': datetime.now().isoformat(),
             'auth_method': auth_method
         }
+    rebuild_sse_index()
 
     logging.info(f"[SSE] Client connected: {client_id} (user: {user}, auth: {auth_method}) - Total: {len(sse_clients)}")
 
+    # NS Oct 2026: the broadcast loop only ships resources_delta frames now — seed
+    # this client with the current versioned snapshot of every subscribed cluster
+    send_resource_snapshots(client_id)
+
     def generate():
         try:
             # Send initial connected message
-            yield f"data: {json.dumps({'type': 'connected', 'client_id': client_id})}\n\n"
+            yield sse_frame(json.dumps({'type': 'connected', 'client_id': client_id}))
 
             while True:
                 try:
                     # Wait for message with timeout
-                    message = message_queue.get(timeout=30)
-                    yield f"data: {message}\n\n"
+                    # NS Oct 2026: queue items are pre-encoded SSE frames (bytes)
+                    yield message_queue.get(timeout=30)
                 except queue_module.Empty:
                     # Send keepalive
-                    yield f": keepalive\n\n"
+                    yield b": keepalive\n\n"
         except GeneratorExit:
             pass
         finally:
             with sse_clients_lock:
                 if client_id in sse_clients:
                     del sse_clients[client_id]
+            rebuild_sse_index()
             logging.info(f"[SSE] Client disconnected: {client_id} - Remaining clients: {len(sse_clients)}")
 
     response = Response(generate(), mimetype='text/event-stream')
@@ -428,6 +437,19 @@ def update_sse_subscription():
     else:
         new_sub = allowed  # None = everything user can see
 
+    # NS Oct 2026 — optional {cluster_id: [vmid, ...]} of guests the client
+    # has on screen (the dashboard sends its open guest detail view and config
+    # modal). Only steers guest-agent polling priority, so it's filtered to the
+    # subscription and capped.
+    focus = {}
+    req_focus = data.get('focus')
+    for cid, vmids in (req_focus.items() if isinstance(req_focus, dict) else ()):
+        if not isinstance(vmids, list) or (new_sub is not None and cid not in new_sub):
+            continue
+        ids = [int(v) for v in vmids[:_MAX_FOCUS_VMS] if str(v).isdigit()]
+        if ids:
+            focus[cid] = set(ids)
+
     with sse_clients_lock:
         client = sse_clients.get(client_id)
         if not client:
@@ -438,6 +460,15 @@ def update_sse_subscription():
             return jsonify({'error': 'Unauthorized'}), 403
         old_sub = client.get('clusters')
         client['clusters'] = new_sub
+        client['focus'] = focus
+    rebuild_sse_index()
+
+    # NS Oct 2026: clusters that just entered the subscription get their resource
+    # snapshot now, so the following resources_delta frames have a base to apply on
+    if old_sub is not None:
+        gained = [c for c in (cluster_managers if new_sub is None else new_sub) if c not in old_sub]
+        if gained:
+            send_resource_snapshots(client_id, gained)
 
     # R2 (regression fix): the IP/disk refresh loop is gated on watched-clusters
     # and only re-runs ~every 40s, so a freshly-selected cluster would show stale
@@ -459,6 +490,39 @@ def update_sse_subscription():
     return jsonify({'ok': True, 'clusters': new_sub})
 
 
+@bp.route('/api/sse/resync', methods=['POST'])
+@require_auth()
+def resync_sse_resources():
+    """Re-send full resource snapshots to an SSE client that saw a seq gap.
+
+    NS Oct 2026 — resources arrive as `resources_delta` frames ({seq, base, ...});
+    when a frame's base doesn't match what the browser last applied (dropped
+    frame, resubscribe) it posts here and gets a `resources` snapshot carrying
+    the current seq on its existing stream.
+    """
+    data = request.json or {}
+    client_id = data.get('client_id')
+    clusters = data.get('clusters')
+
+    if not client_id:
+        return jsonify({'error': 'client_id required'}), 400
+    if clusters is not None and not isinstance(clusters, list):
+        return jsonify({'error': 'clusters must be a list'}), 400
+
+    username = request.session.get('user', 'unknown')
+    with sse_clients_lock:
+        client = sse_clients.get(client_id)
+        if not client:
+            return jsonify({'ok': False, 'reason': 'client_not_found'})
+        if client.get('user') != username:
+            return jsonify({'error': 'Unauthorized'}), 403
+
+    # send_resource_snapshots only serves clusters in the client's (RBAC-filtered)
+    # subscription, so a crafted cluster list can't widen what it sees
+    sent = send_resource_snapshots(client_id, clusters)
+    return jsonify({'ok': True, 'sent': sent})
+
+
 @bp.route('/api/settings/smtp/test', methods=['POST'])
 @require_auth(perms=['admin.settings'])
 def test_smtp():
@@ -13,6 +13,11 @@ from pegaprox.constants import *
 from pegaprox.globals import *
 from pegaprox.models.permissions import *
 from pegaprox.core.db import get_db
+from pegaprox.core.job_scheduler import (
+    JobSource, next_at, not_before, parse_hhmm,
+    register as register_job_source, unregister as unregister_job_source,
+    touch as touch_job, reload as reload_jobs,
+)
 
 from pegaprox.utils.auth import require_auth, load_users, build_authz_user
 from pegaprox.utils.rbac import has_permission
@@ -40,8 +45,29 @@ def _require_action_perm(action):
 # ============================================
 
 SCHEDULES_FILE = os.path.join(CONFIG_DIR, 'scheduled_actions.json')
-_scheduler_thread = None
-_scheduler_running = False
+
+
+def _row_to_action(row):
+    # MK Apr 2026 (#337): name + vm_type are persisted via columns added in the
+    # db migration block. On legacy rows both come back as NULL — fall back
+    # to a sensible default so the frontend form doesn't render blank.
+    keys = row.keys()
+    return {
+        'id': row['id'],
+        'cluster_id': row['cluster_id'],
+        'vmid': row['vmid'],
+        'vm_type': (row['vm_type'] if 'vm_type' in keys and row['vm_type'] else 'qemu'),
+        'action': row['action'],
+        'schedule_type': row['schedule_type'],
+        'time': row['schedule_time'],
+        'days': json.loads(row['schedule_days'] or '[]'),
+        'date': row['schedule_date'],
+        'enabled': bool(row['enabled']),
+        'last_run': row['last_run'],
+        'name': (row['name'] if 'name' in keys and row['name'] else ''),
+        'created_by': row['created_by'],
+    }
+
 
 def load_schedules():
     """Load scheduled actions from SQLite database
@@ -55,30 +81,10 @@ def load_schedules():
         
         actions = []
         last_id = 0
-        # MK Apr 2026 (#337): name + vm_type are persisted via columns added in the
-        # db migration block. On legacy rows both come back as NULL — fall back
-        # to a sensible default so the frontend form doesn't render blank.
-        row_keys = [d[0] for d in cursor.description] if cursor.description else []
-        has_name = 'name' in row_keys
-        has_vm_type = 'vm_type' in row_keys
         for row in cursor.fetchall():
             if row['id'] > last_id:
                 last_id = row['id']
-            actions.append({
-                'id': row['id'],
-                'cluster_id': row['cluster_id'],
-                'vmid': row['vmid'],
-                'vm_type': (row['vm_type'] if has_vm_type and row['vm_type'] else 'qemu'),
-                'action': row['action'],
-                'schedule_type': row['schedule_type'],
-                'time': row['schedule_time'],
-                'days': json.loads(row['schedule_days'] or '[]'),
-                'date': row['schedule_date'],
-                'enabled': bool(row['enabled']),
-                'last_run': row['last_run'],
-                'name': (row['name'] if has_name and row['name'] else ''),
-                'created_by': row['created_by'],
-            })
+            actions.append(_row_to_action(row))
         
         return {'actions': actions, 'last_id': last_id}
     except Exception as e:
@@ -133,100 +139,8 @@ def save_schedules(schedules):
         db.conn.commit()
     except Exception as e:
         logging.error(f"Error saving schedules: {e}")
-
-
-def check_schedules():
-    """Check if any scheduled actions need to run
-    
-    Called every minute by the scheduler thread
-    This is deliberately simple - no cron expressions, just specific times
-    """
-    global _scheduler_running
-    
-    while _scheduler_running:
-        try:
-            schedules = load_schedules()
-            now = datetime.now()
-            current_time = now.strftime('%H:%M')
-            current_day = now.strftime('%A').lower()
-            current_date = now.strftime('%Y-%m-%d')
-            
-            modified = False
-            
-            for action in schedules.get('actions', []):
-                if not action.get('enabled', True):
-                    continue
-                
-                should_run = False
-                schedule_type = action.get('schedule_type', 'daily')
-                schedule_time = action.get('time', '')
-                
-                # Check if it's time to run
-                if schedule_time == current_time:
-                    if schedule_type == 'once':
-                        # One-time schedule - check date
-                        if action.get('date') == current_date:
-                            should_run = True
-                            action['enabled'] = False  # Disable after running
-                            modified = True
-                    
-                    elif schedule_type == 'daily':
-                        should_run = True
-                    
-                    elif schedule_type == 'weekly':
-                        # Check if today is in the selected days
-                        days = action.get('days', [])
-                        if current_day in days:
-                            should_run = True
-                    
-                    elif schedule_type == 'weekdays':
-                        if current_day not in ['saturday', 'sunday']:
-                            should_run = True
-                    
-                    elif schedule_type == 'weekends':
-                        if current_day in ['saturday', 'sunday']:
-                            should_run = True
-                
-                if should_run:
-                    # Check if we already ran this minute (prevent double execution)
-                    last_run = action.get('last_run', '')
-                    if last_run == f"{current_date} {current_time}":
-                        continue
-                    
-                    # Execute the action
-                    execute_scheduled_action(action)
-                    action['last_run'] = f"{current_date} {current_time}"
-                    action['run_count'] = action.get('run_count', 0) + 1
-                    modified = True
-            
-            if modified:
-                save_schedules(schedules)
-            
-            # MK: Check for scheduled rolling updates
-            try:
-                check_scheduled_updates()
-            except Exception as e:
-                logging.error(f"[SCHEDULER] Scheduled updates check error: {e}")
-            
-            # Daily cleanup tasks at 03:00
-            if current_time == '03:00':
-                try:
-                    # Cleanup soft-deleted scripts after 20 days
-                    cleanup_deleted_scripts()
-                    # MK: Cleanup orphaned excluded VMs (VMs that no longer exist)
-                    cleanup_orphaned_excluded_vms()
-                    logging.info("[SCHEDULER] Daily cleanup completed")
-                except Exception as e:
-                    logging.error(f"[SCHEDULER] Daily cleanup error: {e}")
-        
-        except Exception as e:
-            logging.error(f"Scheduler error: {e}")
-        
-        # Sleep for 60 seconds (check every minute)
-        for _ in range(60):
-            if not _scheduler_running:
-                break
-            time.sleep(1)
+    # NS Oct 2026 — the table was rewritten wholesale, re-read it into the job heap
+    reload_jobs('scheduled_action')
 
 
 def execute_scheduled_action(action):
@@ -490,23 +404,143 @@ def execute_scheduled_rolling_update(mgr, cluster_id: str, action: dict):
         logging.error(f"[SCHEDULER] Failed to start scheduled rolling update: {e}")
 
 
+# ============================================
+# Job sources
+# NS Oct 2026 — scheduled actions, update windows and the daily cleanup used to
+# share one 60s loop that re-read both tables every minute and ran everything
+# inline. They're now sources on the shared job scheduler
+# (pegaprox/core/job_scheduler.py): fire times sit in a heap, a job's row is
+# only read again when it's due or edited.
+# ============================================
+
+_DAY_NAMES = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+
+class _ActionSource(JobSource):
+    """Rows of scheduled_actions (once / daily / weekly / weekdays / weekends at HH:MM)."""
+
+    kind = 'scheduled_action'
+
+    def load(self, job_id=None):
+        cursor = get_db().conn.cursor()
+        if job_id is None:
+            cursor.execute('SELECT * FROM scheduled_actions WHERE enabled = 1')
+            return {row['id']: _row_to_action(row) for row in cursor.fetchall()}
+        cursor.execute('SELECT * FROM scheduled_actions WHERE id = ? AND enabled = 1', (job_id,))
+        row = cursor.fetchone()
+        return _row_to_action(row) if row else None
+
+    def next_fire(self, job, after):
+        hhmm = parse_hhmm(job.get('time') or '', default=None)
+        if hhmm is None:
+            return None
+        hh, mm = hhmm
+        # last_run is "YYYY-mm-dd HH:MM" — a minute that already ran never fires again
+        after = not_before(after, job.get('last_run'))
+        schedule_type = job.get('schedule_type', 'daily')
+        if schedule_type == 'once':
+            try:
+                at = datetime.strptime(f"{job.get('date')} {hh:02d}:{mm:02d}", '%Y-%m-%d %H:%M')
+            except (TypeError, ValueError):
+                return None
+            return at if at > after else None
+        if schedule_type == 'daily':
+            return next_at(after, hh, mm)
+        if schedule_type == 'weekly':
+            days = set(job.get('days') or [])
+            return next_at(after, hh, mm, lambda d: _DAY_NAMES[d.weekday()] in days) if days else None
+        if schedule_type == 'weekdays':
+            return next_at(after, hh, mm, lambda d: d.weekday() < 5)
+        if schedule_type == 'weekends':
+            return next_at(after, hh, mm, lambda d: d.weekday() >= 5)
+        return None
+
+    def run(self, job, fire_at):
+        execute_scheduled_action(job)
+        # one-time schedules are disabled after running
+        try:
+            db = get_db()
+            db.conn.cursor().execute(
+                'UPDATE scheduled_actions SET last_run = ?, enabled = ? WHERE id = ?',
+                (fire_at.strftime('%Y-%m-%d %H:%M'), 0 if job.get('schedule_type') == 'once' else 1, job['id']))
+            db.conn.commit()
+        except Exception as e:
+            logging.error(f"[SCHEDULER] Could not record run of schedule {job['id']}: {e}")
+
+
+class _UpdateWindowSource(JobSource):
+    """Per-cluster rolling-update windows from update_schedules."""
+
+    kind = 'update_schedule'
+
+    def load(self, job_id=None):
+        if job_id is None:
+            return {cid: dict(s, cluster_id=cid) for cid, s in load_all_update_schedules().items()}
+        schedule = load_update_schedule(job_id)
+        return dict(schedule, cluster_id=job_id) if schedule.get('enabled') else None
+
+    def next_fire(self, job, after):
+        # 'once' schedules that already ran are done
+        if job.get('schedule_type', 'recurring') == 'once' and job.get('last_run'):
+            return None
+        hhmm = parse_hhmm(job.get('time', '03:00'), default=None)
+        if hhmm is None:
+            return None
+        day = (job.get('day') or 'sunday').lower()
+        if day != 'daily' and day not in _DAY_NAMES:
+            return None
+        # recurring: at most once per day
+        last_run = job.get('last_run')
+        if last_run:
+            try:
+                last_day = datetime.fromisoformat(last_run).date()
+                after = max(after, datetime.combine(last_day, datetime.max.time()))
+            except ValueError:
+                pass
+        return next_at(after, hhmm[0], hhmm[1],
+                       None if day == 'daily' else (lambda d: _DAY_NAMES[d.weekday()] == day))
+
+    def run(self, job, fire_at):
+        _run_update_schedule(job['cluster_id'], job)
+
+
+class _MaintenanceSource(JobSource):
+    """Daily housekeeping at 03:00."""
+
+    kind = 'maintenance'
+
+    def load(self, job_id=None):
+        job = {'id': 'daily_cleanup', 'cluster_id': ''}
+        if job_id is None:
+            return {job['id']: job}
+        return job if job_id == job['id'] else None
+
+    def next_fire(self, job, after):
+        return next_at(after, 3, 0)
+
+    def run(self, job, fire_at):
+        try:
+            # Cleanup soft-deleted scripts after 20 days
+            cleanup_deleted_scripts()
+            # MK: Cleanup orphaned excluded VMs (VMs that no longer exist)
+            cleanup_orphaned_excluded_vms()
+            logging.info("[SCHEDULER] Daily cleanup completed")
+        except Exception as e:
+            logging.error(f"[SCHEDULER] Daily cleanup error: {e}")
+
+
 def start_scheduler():
-    """Start the scheduler background thread"""
-    global _scheduler_thread, _scheduler_running
-    
-    if _scheduler_thread and _scheduler_thread.is_alive():
-        return
-    
-    _scheduler_running = True
-    _scheduler_thread = threading.Thread(target=check_schedules, daemon=True)
-    _scheduler_thread.start()
+    """Register scheduled actions, update windows and daily cleanup with the job scheduler"""
+    # registering again (app start + reports module) just re-reads the tables
+    for source in (_ActionSource(), _UpdateWindowSource(), _MaintenanceSource()):
+        register_job_source(source)
     logging.info("Scheduler started")
 
 
 def stop_scheduler():
     """Stop the scheduler"""
-    global _scheduler_running
-    _scheduler_running = False
+    for kind in ('scheduled_action', 'update_schedule', 'maintenance'):
+        unregister_job_source(kind)
 
 
 # API endpoints for scheduled actions
@@ -859,6 +893,7 @@ def save_update_schedule(cluster_id: str, schedule: dict, user: str = 'system'):
         db.conn.commit()
     except Exception as e:
         logging.error(f"Error saving update schedule: {e}")
+    touch_job('update_schedule', cluster_id)
 
 
 def update_schedule_last_run(cluster_id: str, last_run: str, next_run: str):
@@ -968,6 +1003,7 @@ def delete_update_schedule(cluster_id):
         cursor = db.conn.cursor()
         cursor.execute('DELETE FROM update_schedules WHERE cluster_id = ?', (cluster_id,))
         db.conn.commit()
+        touch_job('update_schedule', cluster_id)
         
         usr = getattr(request, 'session', {}).get('user', 'system')
         mgr = cluster_managers[cluster_id]
@@ -1010,95 +1046,51 @@ def calculate_next_update_run(day: str, time_str: str) -> str:
         return None
 
 
-def check_scheduled_updates():
-    """Check if any scheduled updates should run - called by scheduler"""
-    try:
-        schedules = load_all_update_schedules()
-        now = datetime.now()
-        
-        for cluster_id, schedule in schedules.items():
-            if not schedule.get('enabled'):
-                continue
-            
-            if cluster_id not in cluster_managers:
-                continue
-            
-            mgr = cluster_managers[cluster_id]
-            if not mgr.is_connected:
-                continue
-            
-            # Check schedule_type - 'once' schedules that already ran should be skipped
-            schedule_type = schedule.get('schedule_type', 'recurring')
-            if schedule_type == 'once' and schedule.get('last_run'):
-                continue
-            
-            # Check if it's time to run
-            day = schedule.get('day', 'sunday')
-            time_str = schedule.get('time', '03:00')
-            
-            try:
-                hour, minute = map(int, time_str.split(':'))
-            except:
-                continue
-            
-            day_map = {
-                'monday': 0, 'tuesday': 1, 'wednesday': 2, 'thursday': 3,
-                'friday': 4, 'saturday': 5, 'sunday': 6
-            }
-            
-            is_correct_day = (day == 'daily' or now.weekday() == day_map.get(day.lower(), -1))
-            is_correct_time = now.hour == hour and now.minute == minute
-            
-            if is_correct_day and is_correct_time:
-                # Check if already ran today (for recurring)
-                if schedule_type == 'recurring':
-                    last_run = schedule.get('last_run')
-                    if last_run:
-                        try:
-                            last_run_date = datetime.fromisoformat(last_run).date()
-                            if last_run_date == now.date():
-                                continue  # Already ran today
-                        except:
-                            pass
-                
-                # Check if rolling update already running
-                if hasattr(mgr, '_rolling_update') and mgr._rolling_update:
-                    if mgr._rolling_update.get('status') == 'running':
-                        continue
-                
-                logging.info(f"[SCHEDULER] Starting scheduled update for cluster {cluster_id} (type: {schedule_type})")
-                
-                # Execute the scheduled rolling update
-                action = {
-                    'cluster_id': cluster_id,
-                    'action': 'rolling_update',
-                    'config': {
-                        'include_reboot': schedule.get('include_reboot', True),
-                        'skip_evacuation': schedule.get('skip_evacuation', False),
-                        'skip_up_to_date': schedule.get('skip_up_to_date', True),
-                        'evacuation_timeout': schedule.get('evacuation_timeout', 1800),
-                        # MK #630 — forward the per-schedule reboot timeout to the runner; without this
-                        # the runner falls back to 600s and the saved value never takes effect.
-                        'reboot_timeout': schedule.get('reboot_timeout', 600)
-                    }
-                }
-                
-                execute_scheduled_rolling_update(mgr, cluster_id, action)
-                
-                # Update last run time
-                last_run_str = now.isoformat()
-                next_run_str = calculate_next_update_run(day, time_str) if schedule_type == 'recurring' else None
-                update_schedule_last_run(cluster_id, last_run_str, next_run_str)
-                
-                # Disable 'once' schedules after running
-                if schedule_type == 'once':
-                    schedule['enabled'] = False
-                    schedule['last_run'] = last_run_str
-                    save_update_schedule(cluster_id, schedule)
-                    logging.info(f"[SCHEDULER] One-time schedule disabled for {cluster_id}")
-                
-    except Exception as e:
-        logging.error(f"Error checking scheduled updates: {e}")
-
-
-
+def _run_update_schedule(cluster_id: str, schedule: dict):
+    """Start a due scheduled rolling update - called by the job scheduler"""
+    if cluster_id not in cluster_managers:
+        return
+    
+    mgr = cluster_managers[cluster_id]
+    if not mgr.is_connected:
+        return
+    
+    schedule_type = schedule.get('schedule_type', 'recurring')
+    
+    # Check if rolling update already running
+    if hasattr(mgr, '_rolling_update') and mgr._rolling_update:
+        if mgr._rolling_update.get('status') == 'running':
+            return
+    
+    logging.info(f"[SCHEDULER] Starting scheduled update for cluster {cluster_id} (type: {schedule_type})")
+    
+    # Execute the scheduled rolling update
+    action = {
+        'cluster_id': cluster_id,
+        'action': 'rolling_update',
+        'config': {
+            'include_reboot': schedule.get('include_reboot', True),
+            'skip_evacuation': schedule.get('skip_evacuation', False),
+            'skip_up_to_date': schedule.get('skip_up_to_date', True),
+            'evacuation_timeout': schedule.get('evacuation_timeout', 1800),
+            # MK #630 — forward the per-schedule reboot timeout to the runner; without this
+            # the runner falls back to 600s and the saved value never takes effect.
+            'reboot_timeout': schedule.get('reboot_timeout', 600)
+        }
+    }
+    
+    execute_scheduled_rolling_update(mgr, cluster_id, action)
+    
+    # Update last run time
+    last_run_str = datetime.now().isoformat()
+    next_run_str = (calculate_next_update_run(schedule.get('day', 'sunday'), schedule.get('time', '03:00'))
+                    if schedule_type == 'recurring' else None)
+    update_schedule_last_run(cluster_id, last_run_str, next_run_str)
+    
+    # Disable 'once' schedules after running
+    if schedule_type == 'once':
+        schedule = {k: v for k, v in schedule.items() if k != 'cluster_id'}
+        schedule['enabled'] = False
+        schedule['last_run'] = last_run_str
+        save_update_schedule(cluster_id, schedule)
+        logging.info(f"[SCHEDULER] One-time schedule disabled for {cluster_id}")
@@ -4,6 +4,7 @@
 import os
 import json
 import logging
+import threading
 from datetime import datetime
 from flask import Blueprint, jsonify, request
 
@@ -16,9 +17,10 @@ from pegaprox.utils.auth import require_auth, load_users
 from pegaprox.utils.audit import log_audit
 
 from pegaprox.utils.rbac import (
-    has_permission, filter_clusters_for_user, user_can_access_vm,
+    has_permission, filter_clusters_for_user, get_vm_visibility,
     get_user_clusters,
 )
+from pegaprox.core import inventory
 from pegaprox.api.helpers import get_connected_manager, safe_error, check_cluster_access
 
 bp = Blueprint('search', __name__)
@@ -96,6 +98,49 @@ def save_favorites(favorites):
         logging.error(f"Error saving favorites: {e}")
 
 
+# NS Oct 2026: an index older than this is re-synced on search (clusters the
+# broadcast loop isn't polling because nobody has them open)
+_INVENTORY_MAX_AGE = 120
+
+# clusters with a refresh thread running — one walk per cluster, however many
+# searches come in while it runs
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _refresh_cluster(cluster_id, mgr):
+    try:
+        resources = mgr.get_vm_resources(max_age=30)
+        if resources:   # [] is also what a failed walk returns — keep the old index
+            inventory.update_cluster(cluster_id, resources)
+    except Exception as e:
+        logging.debug(f"[Search] inventory refresh for {cluster_id} failed: {e}")
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(cluster_id)
+
+
+def _refresh_stale_inventories(clusters):
+    """Start a background refresh for clusters whose index is missing or stale
+    and return their ids. The search never waits for it — it answers from the
+    index as it is and flags those clusters, the next search sees the new data.
+    get_vm_resources(max_age=30) reuses the broadcast loop's snapshot when there
+    is one, so this only walks PVE for clusters nobody has looked at lately."""
+    stale = []
+    for cluster_id, mgr in clusters:
+        age = inventory.cluster_age(cluster_id)
+        if age is not None and age <= _INVENTORY_MAX_AGE:
+            continue
+        stale.append(cluster_id)
+        with _refreshing_lock:
+            if cluster_id in _refreshing:
+                continue
+            _refreshing.add(cluster_id)
+        threading.Thread(target=_refresh_cluster, args=(cluster_id, mgr), daemon=True,
+                         name=f'search-inventory-{cluster_id}').start()
+    return stale
+
+
 @bp.route('/api/global/search', methods=['GET'])
 @require_auth()
 def global_search():
@@ -146,78 +191,45 @@ def global_search():
 
     # MK: collect tags for the autocomplete dropdown in the frontend
     all_tags = set()
-    
+
+    # NS Oct 2026: guests come from the in-memory inventory index (core/inventory),
+    # which the broadcast loop keeps current for every cluster someone has open.
+    # Clusters nobody watched recently get a background re-sync kicked off here;
+    # this search answers from what the index has and lists them as stale.
+    searchable = []
     for cluster_id, mgr in cluster_managers.items():
         # Check cluster access - NS: important for multi-tenant setups
         if accessible_clusters is not None and cluster_id not in accessible_clusters:
             continue
-        
         if not mgr.is_connected:
             continue
-        
+        searchable.append((cluster_id, mgr))
+
+    stale_clusters = []
+    if search_type in ['all', 'vm', 'ct']:
+        stale_clusters = _refresh_stale_inventories(searchable)
+
+    for cluster_id, mgr in searchable:
         cluster_name = mgr.config.name or cluster_id
-        
+
         # Search VMs and Containers
         if search_type in ['all', 'vm', 'ct']:
             try:
-                resources = mgr.get_vm_resources()
-                for r in resources:
-                    name = (r.get('name') or '').lower()
-                    vmid = str(r.get('vmid', ''))
-                    node = (r.get('node') or '').lower()
-                    ip = (r.get('ip') or '').lower()
-                    tags_str = (r.get('tags') or '').lower()
-                    tags_list = [t.strip() for t in tags_str.split(';') if t.strip()] if tags_str else []
-                    status = (r.get('status') or '').lower()
-                    
-                    # collect tags for autocomplete
-                    for t in tags_list:
-                        all_tags.add(t)
-                    
-                    # Match based on prefix filter or global search
-                    matched = False
-                    match_field = None
-                    
-                    if prefix_filter == 'tag':
-                        # All tag queries must match (AND logic for multi-tag)
-                        matched = all(any(tq in tag for tag in tags_list) for tq in tag_queries)
-                        if matched:
-                            match_field = 'tag'
-                    elif prefix_filter == 'node':
-                        matched = query in node
-                        if matched:
-                            match_field = 'node'
-                    elif prefix_filter == 'ip':
-                        matched = query in ip
-                        if matched:
-                            match_field = 'ip'
-                    elif prefix_filter == 'status':
-                        matched = status.startswith(query)
-                        if matched:
-                            match_field = 'status'
-                    else:
-                        # Global search: match name, vmid, node, ip, AND tags
-                        if query in name:
-                            matched, match_field = True, 'name'
-                        elif query == vmid or query in vmid:
-                            matched, match_field = True, 'vmid'
-                        elif query in node:
-                            matched, match_field = True, 'node'
-                        elif query in ip:
-                            matched, match_field = True, 'ip'
-                        elif any(query in tag for tag in tags_list):
-                            matched, match_field = True, 'tag'
-                    
-                    if not matched:
-                        continue
-                    
+                inv = inventory.get_cluster_inventory(cluster_id, create=False)
+                hits = inv.match(query, prefix_filter, tag_queries) if inv else []
+                if inv:
+                    all_tags.update(inv.tags())
+                vis = get_vm_visibility(user_data, cluster_id, 'vm.view') if hits else None
+                for r, match_field in hits:
                     # Type filter
                     vm_type = r.get('type', 'qemu')
                     if search_type == 'vm' and vm_type != 'qemu':
                         continue
                     if search_type == 'ct' and vm_type != 'lxc':
                         continue
-                    
+                    if not vis.can(r.get('vmid'), vm_type):
+                        continue
+
                     results.append({
                         'type': 'vm' if vm_type == 'qemu' else 'ct',
                         'cluster_id': cluster_id,
@@ -281,6 +293,7 @@ def global_search():
         'count': len(results),
         'results': results[:100],  # Limit to 100 results
         'tag_suggestions': tag_suggestions,
+        'stale_clusters': stale_clusters,   # index being refreshed — results may lag
     })
 
 
@@ -637,10 +650,11 @@ def get_cluster_tags(cluster_id):
     # names/usage of VMs outside their scope. Admins pass user_can_access_vm unchanged.
     from pegaprox.utils.auth import build_authz_user
     _tag_user = build_authz_user(request.session.get('user', ''), request.session)
+    _tag_vis = get_vm_visibility(_tag_user, cluster_id, 'vm.view')
 
     def _tag_vm_visible(vmid_str):
         try:
-            return user_can_access_vm(_tag_user, cluster_id, int(str(vmid_str).split(':')[0]), 'vm.view')
+            return _tag_vis.can(int(str(vmid_str).split(':')[0]))
         except (ValueError, TypeError):
             return False
 
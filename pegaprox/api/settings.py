@@ -3574,6 +3574,7 @@ def generate_support_bundle():
             # 6. Recent Audit Logs (last 500 entries)
             try:
                 db = get_db()
+                db.flush_audit()
                 cursor = db.conn.cursor()
                 cursor.execute('SELECT timestamp, user, action, details, ip_address FROM audit_log ORDER BY timestamp DESC LIMIT 500')
                 audit_entries = []
@@ -3784,6 +3785,7 @@ def generate_support_bundle():
             # NS: Feb 2026 - Track SSH sessions opened through PegaProx WebSocket terminal
             try:
                 db = get_db()
+                db.flush_audit()
                 cursor = db.conn.cursor()
                 cursor.execute('''
                     SELECT timestamp, user, action, details, ip_address 
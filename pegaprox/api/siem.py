@@ -7,8 +7,18 @@ can ingest them into their existing Splunk / Elastic / Loki / syslog pipeline
 without polling our /api/audit endpoint on a cron.
 
 Architecture:
-  log_audit() → db.add_audit_entry() → enqueue() → background worker thread
-  → fan-out to every enabled target → format per type → send → retry on fail
+  log_audit() → db.add_audit_entry() → group commit → enqueue() wakes the per-target workers
+  → each worker reads the next batch from audit_log after its own cursor
+  → format per type → send (batched / pipelined) → advance cursor, or back off
+
+NS Oct 2026 — audit_log IS the outbox: every target keeps a delivery cursor
+(siem_targets.cursor_id = last audit_log.id it acknowledged), so a restart or a
+SIEM outage resumes where it stopped instead of losing what sat in the old 10k
+in-memory queue. Delivery is at-least-once — a batch that fails midway is
+retried as a whole. One worker per target, so a slow Splunk no longer stalls
+the syslog box; HEC and Elastic (_bulk) get multi-event bodies, syslog TCP
+pipelines a batch over one kept-open connection, HTTP targets reuse a
+keep-alive session.
 
 Supported target types:
   syslog_udp  — RFC 5424 over UDP, host:port
@@ -25,8 +35,8 @@ Settings JSON shape varies per type:
   elastic     : {username: '', password: '', index: 'pegaprox-audit'}
   generic     : {headers: {...}}
 
-Each delivery attempt is non-blocking; failures bump error_count on the
-target row but don't block the queue or the next event.
+Failures bump error_count on the target row and the worker retries the same
+batch with exponential backoff; other targets are unaffected.
 """
 import os
 import json
@@ -36,18 +46,9 @@ import uuid
 import base64
 import logging
 import threading
-import urllib.request
-import urllib.parse
-from queue import Queue, Empty
-
-
-class _NoSiemRedirect(urllib.request.HTTPRedirectHandler):
-    # M-8 (security audit): the SSRF guard validates only the first hop, so a
-    # 30x to an internal/metadata host would bypass it. SIEM ingest endpoints
-    # don't legitimately redirect — refuse to follow (the 30x surfaces as an error).
-    def redirect_request(self, *a, **k):
-        return None
 from datetime import datetime
+
+import requests
 from flask import Blueprint, jsonify, request, session
 
 from pegaprox.utils.auth import require_auth
@@ -57,22 +58,38 @@ from pegaprox.models.permissions import ROLE_ADMIN
 bp = Blueprint('siem', __name__)
 
 
-# ── In-process queue + worker thread ──────────────────────────────────────
-_queue = Queue(maxsize=10000)
+# ── Per-target delivery workers ───────────────────────────────────────────
+TYPES = {'syslog_udp', 'syslog_tcp', 'http_json', 'splunk_hec', 'elastic', 'generic'}
+
+# events per delivery round — multi-event bodies for HEC/_bulk/syslog, smaller
+# for the one-POST-per-event types so an at-least-once retry repeats less
+_BATCH_MAX = {'splunk_hec': 500, 'elastic': 500, 'syslog_tcp': 500, 'syslog_udp': 200}
+_BATCH_MAX_DEFAULT = 50
+_IDLE_WAIT = 5            # s — fallback poll when no enqueue() wake-up arrives
+_RESCAN_INTERVAL = 30     # s — supervisor re-reads siem_targets at least this often
+_BACKOFF_MAX = 300        # s
+# a batch the receiver rejects as malformed (not "down" or "unauthorised")
+# is retried this often, then halved until the offending event is alone —
+# that one is dead-lettered so everything behind it still gets delivered
+_REJECT_RETRIES = 3
+_PERMANENT_HTTP = {400, 413, 415, 422}
+_DEAD_LETTER_KEEP = 20
+
 _worker_running = False
 _worker_lock = threading.Lock()
-TYPES = {'syslog_udp', 'syslog_tcp', 'http_json', 'splunk_hec', 'elastic', 'generic'}
+_workers = {}             # target_id → _TargetWorker
+_workers_lock = threading.Lock()
+_targets_changed = threading.Event()
 
 
 def enqueue(event: dict):
-    """Hand off an audit event to the SIEM queue. Non-blocking; drops on
-    overflow rather than backing up the audit write path."""
-    try:
-        _queue.put_nowait(event)
-    except Exception:
-        # Queue full — log once at WARNING then move on. The audit DB is
-        # still authoritative, so SIEM gaps aren't catastrophic.
-        logging.warning("[siem] queue full, dropping event")
+    """Called after an audit row is committed. The row itself is the outbox —
+    this only wakes the workers so they ship it without waiting for the next
+    poll. Never blocks or drops anything."""
+    with _workers_lock:
+        workers = list(_workers.values())
+    for w in workers:
+        w.wake.set()
 
 
 def _current_user():
@@ -85,7 +102,7 @@ def _current_user():
         return ''
 
 
-def _row_to_target(row):
+def _row_to_target(row, mask=True):
     try:
         settings = json.loads(row['settings'] or '{}')
     except Exception:
@@ -93,7 +110,9 @@ def _row_to_target(row):
     # NS Jul 2026 (CodeAnt data-exposure) — SIEM target settings can hold auth secrets
     # (token/password/api_key/secret/Authorization header); mask them before returning to the
     # UI so a siem.view holder can't read the raw credential back out.
-    if isinstance(settings, dict):
+    # NS Oct 2026: delivery needs the real values (mask=False) — the masked copy
+    # was being handed to the senders, so HEC/Elastic went out with '********'.
+    if mask and isinstance(settings, dict):
         _SECRET_KEYS = ('token', 'password', 'api_key', 'apikey', 'secret', 'auth', 'authorization')
         def _mask(d):
             out = {}
@@ -129,21 +148,28 @@ def _list_enabled():
     try:
         c = get_db().conn.cursor()
         c.execute('SELECT * FROM siem_targets WHERE enabled = 1')
-        return [_row_to_target(r) for r in c.fetchall()]
+        return [_row_to_target(r, mask=False) for r in c.fetchall()]
     except Exception as e:
         logging.debug(f"[siem] list_enabled failed: {e}")
         return []
 
 
-def _record_result(target_id, ok, msg=''):
+def _record_result(target_id, ok, msg='', count=1, cursor_id=None):
     try:
         c = get_db().conn.cursor()
         now = datetime.now().isoformat()
         if ok:
-            c.execute('''UPDATE siem_targets
-                         SET last_ok_at = ?, last_status = 'ok',
-                             sent_count = COALESCE(sent_count,0) + 1
-                         WHERE id = ?''', (now, target_id))
+            if cursor_id is not None:
+                c.execute('''UPDATE siem_targets
+                             SET last_ok_at = ?, last_status = 'ok',
+                                 sent_count = COALESCE(sent_count,0) + ?,
+                                 cursor_id = ?
+                             WHERE id = ?''', (now, count, cursor_id, target_id))
+            else:
+                c.execute('''UPDATE siem_targets
+                             SET last_ok_at = ?, last_status = 'ok',
+                                 sent_count = COALESCE(sent_count,0) + ?
+                             WHERE id = ?''', (now, count, target_id))
         else:
             c.execute('''UPDATE siem_targets
                          SET last_error_at = ?, last_status = 'error',
@@ -155,6 +181,36 @@ def _record_result(target_id, ok, msg=''):
         pass
 
 
+_AUDIT_COLS = 'id, timestamp, user, action, details, ip_address, cluster, severity'
+
+
+def _max_audit_id():
+    # queued (not yet group-committed) entries belong BEFORE the new cursor
+    get_db().flush_audit()
+    row = get_db().conn.execute('SELECT MAX(id) FROM audit_log').fetchone()
+    return (row[0] if row else None) or 0
+
+
+def _load_cursor(target_id):
+    """Target's delivery cursor. NULL (new target, freshly re-enabled, or rows
+    from before cursors existed) starts at the current end of the audit log —
+    we forward from now on, never replay history."""
+    row = get_db().conn.execute('SELECT cursor_id FROM siem_targets WHERE id = ?', (target_id,)).fetchone()
+    if row is not None and row[0] is not None:
+        return row[0]
+    cur = _max_audit_id()
+    conn = get_db().conn
+    conn.execute('UPDATE siem_targets SET cursor_id = ? WHERE id = ? AND cursor_id IS NULL', (cur, target_id))
+    conn.commit()
+    return cur
+
+
+def _pending_events(after_id, limit):
+    c = get_db().conn.cursor()
+    c.execute(f'SELECT {_AUDIT_COLS} FROM audit_log WHERE id > ? ORDER BY id LIMIT ?', (after_id, limit))
+    return [dict(r) for r in c.fetchall()]
+
+
 # ── Formatters ────────────────────────────────────────────────────────────
 
 def _to_syslog_5424(event, app='pegaprox', facility='local0'):
@@ -196,32 +252,71 @@ def _to_json_line(event):
 
 
 # ── Senders per target type ───────────────────────────────────────────────
-
-def _send_syslog(target, event, proto='udp'):
-    settings = target.get('settings', {})
+# Every sender takes a BATCH of events plus the worker's _Channel, which holds
+# the kept-open syslog sockets / HTTP keep-alive session for that target.
+
+class _Channel:
+    """Per-target connections, reused across batches. Any send error closes
+    them (reconnect on the next attempt)."""
+
+    def __init__(self):
+        self.session = None
+        self.tcp = None
+        self.udp = None
+
+    def http(self):
+        if self.session is None:
+            self.session = requests.Session()
+            # one target → one host; a couple of pooled sockets is plenty
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0)
+            self.session.mount('https://', adapter)
+            self.session.mount('http://', adapter)
+        return self.session
+
+    def close(self):
+        for attr in ('tcp', 'udp'):
+            sock = getattr(self, attr)
+            if sock is not None:
+                try:
+                    sock.close()
+                except Exception:
+                    pass
+                setattr(self, attr, None)
+        if self.session is not None:
+            try:
+                self.session.close()
+            except Exception:
+                pass
+            self.session = None
+
+
+def _syslog_addr(target):
     ep = target['endpoint']
     if ':' not in ep:
         raise ValueError('endpoint must be host:port')
     host, port = ep.rsplit(':', 1)
-    port = int(port)
-    line = _to_syslog_5424(event, facility=settings.get('facility', 'local0'))
+    return host, int(port)
+
+
+def _send_syslog(target, events, chan, proto='udp'):
+    settings = target.get('settings', {})
+    host, port = _syslog_addr(target)
+    facility = settings.get('facility', 'local0')
+    lines = [_to_syslog_5424(e, facility=facility).encode('utf-8') for e in events]
     if proto == 'udp':
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.settimeout(3)
-        try:
-            sock.sendto(line.encode('utf-8'), (host, port))
-        finally:
-            sock.close()
+        if chan.udp is None:
+            chan.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            chan.udp.settimeout(3)
+        for line in lines:
+            chan.udp.sendto(line, (host, port))
     else:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(5)
-        try:
-            sock.connect((host, port))
-            # RFC 6587 octet-counting framing for TCP syslog
-            data = line.encode('utf-8')
-            sock.sendall(f"{len(data)} ".encode('ascii') + data)
-        finally:
-            sock.close()
+        if chan.tcp is None:
+            sock = socket.create_connection((host, port), timeout=5)
+            sock.settimeout(10)
+            chan.tcp = sock
+        # RFC 6587 octet-counting framing for TCP syslog; the whole batch goes
+        # out in one write on the kept-open connection
+        chan.tcp.sendall(b''.join(f"{len(d)} ".encode('ascii') + d for d in lines))
 
 
 def _verify_tls_for(target):
@@ -246,56 +341,52 @@ def _warn_tls_downgrade(url):
     )
 
 
-def _http_post(url, body_bytes, headers, timeout=10, verify_tls=True):
-    """Plain urllib HTTPS POST. MK May 2026 — TLS verification on by default;
-    admins opt out per target if they're shipping to a self-signed SIEM.
+class _Rejected(RuntimeError):
+    """The receiver refused the payload itself — retrying it unchanged won't help."""
+
+
+def _http_post(url, body_bytes, headers, chan, timeout=10, verify_tls=True):
+    """HTTPS POST over the target's keep-alive session. MK May 2026 — TLS
+    verification on by default; admins opt out per target if they're shipping
+    to a self-signed SIEM.
 
     NS May 2026 — SSRF guard: reject URLs aimed at internal/metadata IPs
     even when admin sets a malicious endpoint via UI. SIEM targets are
     almost always public, so this is an honest fit.
     """
-    import ssl
     from pegaprox.utils.url_security import resolve_and_pin_url, SsrfError
     try:
-        # GHSA-hmcf-9q7f-vx35 — pin the vetted IP so urllib can't re-resolve the host to an internal
+        # GHSA-hmcf-9q7f-vx35 — pin the vetted IP so the client can't re-resolve the host to an internal
         # address between the check and the connect; when the admin disabled cert verification
         # (verify_tls=False) https must be pinned too, since TLS won't catch the rebind.
         url = resolve_and_pin_url(url, allowed_schemes=('https', 'http'), tls_verified=verify_tls)
     except SsrfError as exc:
         raise RuntimeError(f"SIEM endpoint rejected: {exc}")
-    req = urllib.request.Request(url, data=body_bytes, method='POST', headers=headers)
-    # MK 2026-05-31 (CodeAnt siem.py:224/226): ssl.create_default_context()
-    # already returns check_hostname=True + verify_mode=CERT_REQUIRED by
-    # stdlib default — the static analyser doesn't read defaults though.
-    # Set them explicitly so the secure path is self-documenting. The
-    # opt-out path below only fires when the admin set verify_tls=False
-    # on this target (typically a self-signed SIEM in their own infra).
-    ctx = ssl.create_default_context()
-    ctx.check_hostname = True
-    ctx.verify_mode = ssl.CERT_REQUIRED
     if not verify_tls:
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
         _warn_tls_downgrade(url)
-    # M-8: build an opener that won't follow redirects; pass the SSL context via
-    # the HTTPS handler (build_opener keeps the default HTTP handler for http URLs).
-    _opener = urllib.request.build_opener(_NoSiemRedirect, urllib.request.HTTPSHandler(context=ctx))
-    with _opener.open(req, timeout=timeout) as resp:
-        code = resp.getcode()
-        if not (200 <= code < 300):
-            raise RuntimeError(f"HTTP {code}")
-        return code
-
-
-def _send_http_json(target, event):
+    # M-8 (security audit): the SSRF guard validates only the first hop, so a
+    # 30x to an internal/metadata host would bypass it. SIEM ingest endpoints
+    # don't legitimately redirect — never follow (the 30x surfaces as an error).
+    resp = chan.http().post(url, data=body_bytes, headers=headers, timeout=timeout,
+                            verify=verify_tls, allow_redirects=False)
+    code = resp.status_code
+    if code in _PERMANENT_HTTP:
+        raise _Rejected(f"HTTP {code}")
+    if not (200 <= code < 300):
+        raise RuntimeError(f"HTTP {code}")
+    return resp
+
+
+def _send_http_json(target, events, chan):
     settings = target.get('settings') or {}
     headers = {'Content-Type': 'application/json'}
     headers.update(settings.get('headers') or {})
-    body = json.dumps(_to_json_line(event)).encode('utf-8')
-    _http_post(target['endpoint'], body, headers, verify_tls=_verify_tls_for(target))
+    for event in events:
+        body = json.dumps(_to_json_line(event)).encode('utf-8')
+        _http_post(target['endpoint'], body, headers, chan, verify_tls=_verify_tls_for(target))
 
 
-def _send_splunk_hec(target, event):
+def _send_splunk_hec(target, events, chan):
     settings = target.get('settings') or {}
     token = settings.get('token')
     if not token:
@@ -304,44 +395,68 @@ def _send_splunk_hec(target, event):
         'Authorization': f'Splunk {token}',
         'Content-Type': 'application/json',
     }
-    payload = {
-        'event': _to_json_line(event),
-        'sourcetype': settings.get('sourcetype', 'pegaprox:audit'),
-        'source': 'pegaprox',
-    }
-    if settings.get('index'):
-        payload['index'] = settings['index']
-    _http_post(target['endpoint'], json.dumps(payload).encode('utf-8'), headers,
+    parts = []
+    for event in events:
+        payload = {
+            'event': _to_json_line(event),
+            'sourcetype': settings.get('sourcetype', 'pegaprox:audit'),
+            'source': 'pegaprox',
+        }
+        if settings.get('index'):
+            payload['index'] = settings['index']
+        parts.append(json.dumps(payload))
+    # HEC batch format: event objects back to back in one body
+    _http_post(target['endpoint'], '\n'.join(parts).encode('utf-8'), headers, chan,
                verify_tls=_verify_tls_for(target))
 
 
-def _send_elastic(target, event):
+def _send_elastic(target, events, chan):
     settings = target.get('settings') or {}
     index = settings.get('index', 'pegaprox-audit')
     base = target['endpoint'].rstrip('/')
-    url = f"{base}/{index}/_doc"
-    headers = {'Content-Type': 'application/json'}
+    url = f"{base}/_bulk"
+    headers = {'Content-Type': 'application/x-ndjson'}
     user = settings.get('username')
     pw = settings.get('password')
     if user and pw is not None:
         token = base64.b64encode(f"{user}:{pw}".encode('utf-8')).decode('ascii')
         headers['Authorization'] = f"Basic {token}"
-    body = json.dumps(_to_json_line(event)).encode('utf-8')
-    _http_post(url, body, headers, verify_tls=_verify_tls_for(target))
-
-
-def _send_generic(target, event):
+    action = json.dumps({'index': {'_index': index}})
+    lines = []
+    for event in events:
+        lines.append(action)
+        lines.append(json.dumps(_to_json_line(event)))
+    resp = _http_post(url, ('\n'.join(lines) + '\n').encode('utf-8'), headers, chan,
+                      verify_tls=_verify_tls_for(target))
+    # _bulk answers 200 even when single documents were rejected
+    try:
+        result = resp.json()
+    except ValueError:
+        return
+    if result.get('errors'):
+        for item in result.get('items') or []:
+            err = (item.get('index') or {}).get('error')
+            if err:
+                msg = f"bulk item rejected: {err.get('type', '')} {err.get('reason', '')}"[:300]
+                # 429 = cluster busy; other 4xx item errors are about the document
+                status = (item.get('index') or {}).get('status') or 0
+                raise (_Rejected if 400 <= status < 500 and status != 429 else RuntimeError)(msg)
+        raise RuntimeError('bulk request reported errors')
+
+
+def _send_generic(target, events, chan):
     """Plain webhook — POST JSON body, no auth assumptions."""
     settings = target.get('settings') or {}
     headers = {'Content-Type': 'application/json'}
     headers.update(settings.get('headers') or {})
-    _http_post(target['endpoint'], json.dumps(_to_json_line(event)).encode('utf-8'),
-               headers, verify_tls=_verify_tls_for(target))
+    for event in events:
+        _http_post(target['endpoint'], json.dumps(_to_json_line(event)).encode('utf-8'),
+                   headers, chan, verify_tls=_verify_tls_for(target))
 
 
 _DISPATCH = {
-    'syslog_udp': lambda t, e: _send_syslog(t, e, 'udp'),
-    'syslog_tcp': lambda t, e: _send_syslog(t, e, 'tcp'),
+    'syslog_udp': lambda t, e, c: _send_syslog(t, e, c, 'udp'),
+    'syslog_tcp': lambda t, e, c: _send_syslog(t, e, c, 'tcp'),
     'http_json':  _send_http_json,
     'splunk_hec': _send_splunk_hec,
     'elastic':    _send_elastic,
@@ -349,36 +464,187 @@ _DISPATCH = {
 }
 
 
-def _deliver_one(target, event):
-    """Try once. Updates last_ok / last_error stats."""
+def _send_batch(target, events, chan):
     fn = _DISPATCH.get(target['type'])
     if not fn:
-        _record_result(target['id'], False, f"unknown type {target['type']}")
-        return False
+        raise ValueError(f"unknown type {target['type']}")
     try:
-        fn(target, event)
+        fn(target, events, chan)
+    except Exception:
+        chan.close()
+        raise
+
+
+def _deliver_one(target, event):
+    """Try once over a throwaway channel (the UI's test button). Updates
+    last_ok / last_error stats, never touches the delivery cursor."""
+    chan = _Channel()
+    try:
+        _send_batch(target, [event], chan)
         _record_result(target['id'], True)
         return True
     except Exception as e:
         _record_result(target['id'], False, e)
         return False
+    finally:
+        chan.close()
+
+
+class _TargetWorker:
+    """Ships one target's backlog: read batch after cursor → send → advance."""
+
+    def __init__(self, target):
+        self.target = target
+        self.wake = threading.Event()
+        self.stopped = False
+        self.chan = _Channel()
+        self.stats = {
+            'delivered': 0, 'batches': 0, 'failures': 0,
+            'backlog': 0, 'oldest_pending': None,
+            'last_batch_size': 0, 'last_batch_seconds': 0.0,
+            'backoff_seconds': 0, 'cursor': None,
+            'rejected': 0, 'dead_lettered': 0, 'dead_letter': [],
+        }
+        self.limit = None           # batch size while bisecting a rejected batch
+        self.split_until = None     # ... until the cursor passes this id
+
+    def stop(self):
+        self.stopped = True
+        self.wake.set()
+
+    def run(self):
+        tid = self.target['id']
+        backoff = 0
+        rejects, reject_key = 0, None      # consecutive rejections of the same batch
+        try:
+            cursor = _load_cursor(tid)
+        except Exception as e:
+            logging.warning(f"[siem] {tid}: cannot load cursor: {e}")
+            return
+        self.stats['cursor'] = cursor
+        while not self.stopped and _worker_running:
+            target = self.target        # supervisor may swap in edited settings
+            try:
+                events = _pending_events(cursor, self.limit or _BATCH_MAX.get(target['type'], _BATCH_MAX_DEFAULT))
+            except Exception as e:
+                logging.debug(f"[siem] {tid}: outbox read failed: {e}")
+                events = []
+            self._update_backlog(cursor, events)
+            if not events:
+                self.wake.wait(_IDLE_WAIT)
+                self.wake.clear()
+                continue
+
+            t0 = time.monotonic()
+            try:
+                _send_batch(target, events, self.chan)
+            except Exception as e:
+                self.stats['failures'] += 1
+                _record_result(tid, False, e)
+                if isinstance(e, _Rejected):
+                    rejects = rejects + 1 if (cursor, len(events)) == reject_key else 1
+                    reject_key = (cursor, len(events))
+                    self.stats['rejected'] += 1
+                    if rejects >= _REJECT_RETRIES:
+                        rejects, reject_key = 0, None
+                        if len(events) > 1:
+                            self.limit = max(1, len(events) // 2)
+                            self.split_until = max(self.split_until or 0, events[-1]['id'])
+                            logging.info(f"[siem] {tid}: batch of {len(events)} rejected ({e}), "
+                                         f"retrying in halves")
+                            continue
+                        cursor = self._dead_letter(tid, events[0], e)
+                        backoff = 0
+                        continue
+                else:
+                    rejects, reject_key = 0, None
+                backoff = min(_BACKOFF_MAX, backoff * 2 if backoff else 1)
+                self.stats['backoff_seconds'] = backoff
+                logging.debug(f"[siem] {tid}: batch of {len(events)} failed, retry in {backoff}s: {e}")
+                # sleep in short steps: enqueue() wake-ups must not cut the
+                # backoff short, but a disable/delete (stop) should
+                deadline = time.monotonic() + backoff
+                while not self.stopped and time.monotonic() < deadline:
+                    time.sleep(min(1.0, deadline - time.monotonic()))
+                continue
+
+            backoff = 0
+            rejects, reject_key = 0, None
+            cursor = events[-1]['id']
+            if self.split_until is not None and cursor >= self.split_until:
+                self.limit = self.split_until = None
+            self.stats.update({
+                'delivered': self.stats['delivered'] + len(events),
+                'batches': self.stats['batches'] + 1,
+                'last_batch_size': len(events),
+                'last_batch_seconds': round(time.monotonic() - t0, 4),
+                'backoff_seconds': 0, 'cursor': cursor,
+            })
+            _record_result(tid, True, count=len(events), cursor_id=cursor)
+        self.chan.close()
+
+    def _dead_letter(self, tid, event, error):
+        """Give up on one event the receiver keeps rejecting: note it in the
+        stats and the log, move the cursor past it."""
+        cursor = event['id']
+        logging.warning(f"[siem] {tid}: receiver keeps rejecting audit event {cursor} "
+                        f"({event.get('action')}): {error} — skipped")
+        self.stats['dead_lettered'] += 1
+        self.stats['dead_letter'] = (self.stats['dead_letter'] + [
+            {'id': cursor, 'action': event.get('action'), 'error': str(error)[:200],
+             'at': datetime.now().isoformat()}])[-_DEAD_LETTER_KEEP:]
+        self.stats['cursor'] = cursor
+        if self.split_until is not None and cursor >= self.split_until:
+            self.limit = self.split_until = None
+        try:
+            conn = get_db().conn
+            conn.execute('UPDATE siem_targets SET cursor_id = ? WHERE id = ?', (cursor, tid))
+            conn.commit()
+        except Exception as e:
+            logging.debug(f"[siem] {tid}: cursor update after dead-letter failed: {e}")
+        return cursor
+
+    def _update_backlog(self, cursor, events):
+        try:
+            self.stats['backlog'] = max(0, _max_audit_id() - cursor)
+            self.stats['oldest_pending'] = events[0]['timestamp'] if events else None
+        except Exception:
+            pass
+
+
+def _sync_workers():
+    """Start/stop/refresh workers so there is exactly one per enabled target."""
+    wanted = {t['id']: t for t in _list_enabled() if t['type'] in TYPES}
+    with _workers_lock:
+        for tid in [t for t in _workers if t not in wanted]:
+            _workers.pop(tid).stop()
+        for tid, target in wanted.items():
+            w = _workers.get(tid)
+            if w is None:
+                w = _workers[tid] = _TargetWorker(target)
+                threading.Thread(target=w.run, daemon=True, name=f'siem-{tid}').start()
+            else:
+                w.target = target
 
 
 def _worker_loop():
-    """Drain queue forever. Doesn't retry forever — one shot, fail loudly in
-    the target's last_error field, move on."""
+    """Supervisor: keeps the per-target workers in line with siem_targets.
+    Re-reads the table when a target is created/edited/deleted, and every
+    _RESCAN_INTERVAL as a safety net."""
     while _worker_running:
         try:
-            evt = _queue.get(timeout=2)
-        except Empty:
-            continue
-        try:
-            for t in _list_enabled():
-                _deliver_one(t, evt)
+            _sync_workers()
         except Exception as e:
-            logging.debug(f"[siem] dispatch loop err: {e}")
-        finally:
-            _queue.task_done()
+            logging.debug(f"[siem] supervisor err: {e}")
+        _targets_changed.wait(_RESCAN_INTERVAL)
+        _targets_changed.clear()
+
+
+def worker_stats():
+    """{target_id: stats} — backpressure view for the UI and /api/metrics."""
+    with _workers_lock:
+        return {tid: dict(w.stats, name=w.target.get('name', ''), type=w.target.get('type', ''))
+                for tid, w in _workers.items()}
 
 
 def start_worker():
@@ -400,7 +666,13 @@ def list_targets():
     try:
         c = get_db().conn.cursor()
         c.execute('SELECT * FROM siem_targets ORDER BY created_at DESC')
-        return jsonify({'targets': [_row_to_target(r) for r in c.fetchall()]})
+        stats = worker_stats()
+        targets = []
+        for r in c.fetchall():
+            t = _row_to_target(r)
+            t['delivery'] = stats.get(t['id'])
+            targets.append(t)
+        return jsonify({'targets': targets})
     except Exception as e:
         logging.exception('handler error in siem.py'); return jsonify({'error': 'internal error'}), 500
 
@@ -429,6 +701,7 @@ def create_target():
         ''', (tid, name, typ, endpoint, fmt, enabled,
               json.dumps(settings), datetime.now().isoformat(), _current_user()))
         get_db().conn.commit()
+        _targets_changed.set()
         c.execute('SELECT * FROM siem_targets WHERE id = ?', (tid,))
         return jsonify({'target': _row_to_target(c.fetchone())})
     except Exception as e:
@@ -451,6 +724,10 @@ def update_target(tid):
         fields.append('type = ?'); params.append(body['type'])
     if 'enabled' in body:
         fields.append('enabled = ?'); params.append(1 if body['enabled'] else 0)
+        if not body['enabled']:
+            # a disabled target forwards nothing — re-enabling starts from "now",
+            # it doesn't replay everything audited while it was off
+            fields.append('cursor_id = NULL')
     if 'settings' in body:
         fields.append('settings = ?'); params.append(json.dumps(body['settings']))
     if not fields:
@@ -462,6 +739,7 @@ def update_target(tid):
         get_db().conn.commit()
         if c.rowcount == 0:
             return jsonify({'error': 'not found'}), 404
+        _targets_changed.set()
         c.execute('SELECT * FROM siem_targets WHERE id = ?', (tid,))
         row = c.fetchone()
         return jsonify({'target': _row_to_target(row) if row else None})
@@ -478,6 +756,7 @@ def delete_target(tid):
         get_db().conn.commit()
         if c.rowcount == 0:
             return jsonify({'error': 'not found'}), 404
+        _targets_changed.set()
         return jsonify({'ok': True})
     except Exception as e:
         logging.exception('handler error in siem.py'); return jsonify({'error': 'internal error'}), 500
@@ -493,7 +772,7 @@ def test_target(tid):
         row = c.fetchone()
         if not row:
             return jsonify({'error': 'not found'}), 404
-        target = _row_to_target(row)
+        target = _row_to_target(row, mask=False)
         evt = {
             'id': 0,
             'timestamp': datetime.now().isoformat(),
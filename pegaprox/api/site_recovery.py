@@ -18,6 +18,7 @@ from pegaprox.utils.audit import log_audit
 # fixes so future grep stays clean.
 from pegaprox.utils.sanitization import sanitize_log_message as _sl
 from pegaprox.api.helpers import check_cluster_access
+from pegaprox.core import dr_readiness
 
 bp = Blueprint('site_recovery', __name__)
 
@@ -66,15 +67,17 @@ def _get_plan_vms(plan_id):
 def _plan_with_vms(plan):
     """Enrich plan with VMs and replication status"""
     plan['vms'] = _get_plan_vms(plan['id'])
-    # attach RPO info from replication jobs
-    db = get_db()
+    # attach RPO info from the readiness index (core/dr_readiness.py) — no per-VM query
+    status = dr_readiness.vm_status(plan['id'])
     for vm in plan['vms']:
-        if vm.get('replication_job_id'):
-            repl = db.query_one('SELECT last_run, last_status FROM cross_cluster_replications WHERE id = ?',
-                                (vm['replication_job_id'],))
-            if repl:
-                vm['last_replication'] = repl['last_run']
-                vm['replication_status'] = repl['last_status']
+        st = status.get(vm['vmid'])
+        if st and st['job_found']:
+            vm['last_replication'] = st['last_run']
+            vm['replication_status'] = st['last_status']
+            vm['replication_age_seconds'] = st['age_seconds']
+            vm['rpo_seconds'] = st['rpo_seconds']
+            vm['rpo_breached'] = st['rpo_breached']
+    plan['readiness'] = dr_readiness.summary(plan['id'])
     return plan
 
 
@@ -114,6 +117,7 @@ def list_plans():
     _user = build_authz_user(request.session.get('user', ''), request.session)
     _allowed = get_user_clusters(_user)
     rows = db.query('SELECT * FROM site_recovery_plans ORDER BY created_at DESC')
+    readiness = dr_readiness.summary()
     plans = []
     for row in (rows or []):
         p = dict(row)
@@ -124,9 +128,14 @@ def list_plans():
                 p[k] = json.loads(p[k] or '{}')
             except Exception:
                 p[k] = {}
-        # include vm count
-        cnt = db.query_one('SELECT COUNT(*) as c FROM site_recovery_vms WHERE plan_id = ?', (p['id'],))
-        p['vm_count'] = cnt['c'] if cnt else 0
+        # vm count + RPO readiness straight from the readiness index
+        r = readiness.get(p['id'])
+        if r is None:
+            cnt = db.query_one('SELECT COUNT(*) as c FROM site_recovery_vms WHERE plan_id = ?', (p['id'],))
+            p['vm_count'] = cnt['c'] if cnt else 0
+        else:
+            p['vm_count'] = r['vms']
+            p['readiness'] = r
         plans.append(p)
     return jsonify(plans)
 
@@ -176,6 +185,7 @@ def create_plan():
          1 if data.get('test_disconnect_nics') else 0,
          getattr(request, 'session', {}).get('user', 'system'),
          now, now))
+    dr_readiness.plan_changed(plan_id)
 
     usr = getattr(request, 'session', {}).get('user', 'system')
     log_audit(usr, 'site_recovery.plan_created', f"Created recovery plan '{data['name']}': {data['source_cluster']} → {data['target_cluster']}")
@@ -247,6 +257,8 @@ def update_plan(plan_id):
 
     db = get_db()
     db.execute(f"UPDATE site_recovery_plans SET {', '.join(updates)} WHERE id = ?", params)
+    if 'name' in data:
+        dr_readiness.plan_changed(plan_id)
 
     usr = getattr(request, 'session', {}).get('user', 'system')
     changed = [k for k in allowed if k in data]
@@ -281,6 +293,7 @@ def delete_plan(plan_id):
     db.execute('DELETE FROM site_recovery_vms WHERE plan_id = ?', (plan_id,))
     db.execute('DELETE FROM site_recovery_events WHERE plan_id = ?', (plan_id,))
     db.execute('DELETE FROM site_recovery_plans WHERE id = ?', (plan_id,))
+    dr_readiness.plan_changed(plan_id)
 
     usr = getattr(request, 'session', {}).get('user', 'system')
     log_audit(usr, 'site_recovery.plan_deleted', f"Deleted recovery plan '{plan['name']}'")
@@ -363,6 +376,7 @@ def add_plan_vm(plan_id):
          data.get('vm_type', 'qemu'), data.get('boot_group', 0),
          data.get('boot_delay', 30), data.get('replication_job_id', ''),
          data.get('notes', '')))
+    dr_readiness.plan_changed(plan_id)
 
     usr = getattr(request, 'session', {}).get('user', 'system')
     log_audit(usr, 'site_recovery.vm_added', f"VM {data['vmid']} added to plan '{plan['name']}'")
@@ -402,6 +416,7 @@ def update_plan_vm(plan_id, vm_id):
     if updates:
         params.append(vm_id)
         db.execute(f"UPDATE site_recovery_vms SET {', '.join(updates)} WHERE id = ?", params)
+        dr_readiness.plan_changed(plan_id)
 
         usr = getattr(request, 'session', {}).get('user', 'system')
         log_audit(usr, 'site_recovery.vm_updated', f"VM {row['vmid']} config changed in plan {plan_id}")
@@ -428,6 +443,7 @@ def remove_plan_vm(plan_id, vm_id):
     db = get_db()
     row = db.query_one('SELECT vmid FROM site_recovery_vms WHERE id = ? AND plan_id = ?', (vm_id, plan_id))
     db.execute('DELETE FROM site_recovery_vms WHERE id = ? AND plan_id = ?', (vm_id, plan_id))
+    dr_readiness.plan_changed(plan_id)
 
     usr = getattr(request, 'session', {}).get('user', 'system')
     log_audit(usr, 'site_recovery.vm_removed', f"VM {row['vmid'] if row else vm_id} removed from plan {plan_id}")
@@ -473,18 +489,21 @@ def check_readiness(plan_id):
     if not vms:
         issues.append({'severity': 'warning', 'msg': 'No VMs in recovery plan'})
 
-    # check replication status per VM
+    # check replication status per VM (readiness index, no per-VM query)
     db = get_db()
+    repl_status = dr_readiness.vm_status(plan_id)
     for vm in vms:
         if vm.get('replication_job_id'):
-            repl = db.query_one('SELECT last_run, last_status, enabled FROM cross_cluster_replications WHERE id = ?',
-                                (vm['replication_job_id'],))
-            if not repl:
+            repl = repl_status.get(vm['vmid'])
+            if not repl or not repl['job_found']:
                 issues.append({'severity': 'warning', 'msg': f"VM {vm['vmid']}: replication job not found"})
             elif repl['last_status'] == 'error':
                 issues.append({'severity': 'error', 'msg': f"VM {vm['vmid']}: last replication failed"})
             elif not repl['enabled']:
                 issues.append({'severity': 'warning', 'msg': f"VM {vm['vmid']}: replication job disabled"})
+            elif repl['rpo_breached']:
+                issues.append({'severity': 'warning', 'msg': f"VM {vm['vmid']}: replica is "
+                               f"{repl['age_seconds'] // 60} min old, past RPO ({repl['rpo_seconds'] // 60} min)"})
         else:
             issues.append({'severity': 'info', 'msg': f"VM {vm['vmid']}: no replication job linked"})
 
@@ -30,7 +30,6 @@ Retention:
   - retention_days > 0:  also prune snapshots older than N days
 """
 import json
-import time
 import uuid
 import logging
 import calendar
@@ -42,8 +41,13 @@ from pegaprox.globals import cluster_managers
 from pegaprox.utils.auth import require_auth, load_users, build_authz_user
 from pegaprox.api.helpers import check_cluster_access
 from pegaprox.core.db import get_db
+from pegaprox.core.snapshot_engine import SnapshotBatch
+from pegaprox.core.job_scheduler import (
+    JobSource, cron_next, next_at, not_before, parse_hhmm,
+    register as register_job_source, touch as touch_job,
+)
 from pegaprox.utils.audit import log_audit
-from pegaprox.utils.rbac import user_can_access_vm
+from pegaprox.utils.rbac import user_can_access_vm, get_vm_visibility
 from pegaprox.models.permissions import ROLE_ADMIN
 
 bp = Blueprint('snapshot_schedule', __name__)
@@ -116,80 +120,8 @@ def _resolve_targets(mgr, policy):
     return targets
 
 
-# NS #586 — small self-contained cron matcher so we don't pull in croniter.
-# 5 fields: "min hour dom month dow". Supports *, lists (a,b), ranges (a-b),
-# and steps (*/n, a-b/n). dow: 0 or 7 = Sunday.
-def _cron_field(field, value, lo, hi):
-    field = field.strip()
-    if field == '*':
-        return True
-    for part in field.split(','):
-        part = part.strip()
-        if not part:
-            continue
-        step = 1
-        rng = part
-        if '/' in part:
-            rng, _, st = part.partition('/')
-            try:
-                step = int(st)
-            except ValueError:
-                continue
-            if step <= 0:
-                continue
-        if rng == '*':
-            start, end = lo, hi
-        elif '-' in rng:
-            a, _, b = rng.partition('-')
-            try:
-                start, end = int(a), int(b)
-            except ValueError:
-                continue
-        else:
-            try:
-                start = end = int(rng)
-            except ValueError:
-                continue
-        if start > end:
-            continue
-        if value < start or value > end:
-            continue
-        if (value - start) % step == 0:
-            return True
-    return False
-
-
-def _cron_match(expr, dt):
-    """True if dt matches the 5-field cron expr. A malformed expr never fires."""
-    if not expr:
-        return False
-    parts = expr.split()
-    if len(parts) != 5:
-        return False
-    mn, hr, dom, mon, dow = parts
-    cron_dow = (dt.weekday() + 1) % 7  # python Mon=0..Sun=6 -> cron Sun=0..Sat=6
-    if not _cron_field(mn, dt.minute, 0, 59):
-        return False
-    if not _cron_field(hr, dt.hour, 0, 23):
-        return False
-    if not _cron_field(mon, dt.month, 1, 12):
-        return False
-    dom_restricted = dom.strip() != '*'
-    dow_restricted = dow.strip() != '*'
-    dom_ok = _cron_field(dom, dt.day, 1, 31)
-    dow_ok = _cron_field(dow, cron_dow, 0, 7) or (cron_dow == 0 and _cron_field(dow, 7, 0, 7))
-    # standard cron rule: if both DOM and DOW are restricted, match either
-    if dom_restricted and dow_restricted:
-        return dom_ok or dow_ok
-    if dom_restricted:
-        return dom_ok
-    if dow_restricted:
-        return dow_ok
-    return True
-
-
 def _valid_cron(expr):
-    """Structural check for a 5-field cron expr (charset only — _cron_match does
+    """Structural check for a 5-field cron expr (charset only — cron_next does
     the real evaluation, and a non-matching/garbage expr simply never fires)."""
     parts = (expr or '').split()
     if len(parts) != 5:
@@ -198,60 +130,37 @@ def _valid_cron(expr):
     return all(p and set(p) <= allowed for p in parts)
 
 
-def _is_due(policy, now=None):
-    """Check whether the policy should fire right now. Idempotent: also reads
-    last_run_at to avoid double-fires when the scheduler wakes during the
-    same minute."""
-    now = now or datetime.now()
+def _next_fire(policy, after):
+    """When the policy should fire next, strictly after `after` (naive local
+    datetime), or None. Slots the policy already ran for (last_run_at) are
+    never handed out again."""
+    sch = (policy['schedule'] or 'daily').lower()
     last_run = policy['last_run_at']
-    last_dt = None
-    if last_run:
+
+    # #586 — once: a single run at run_once_at, however late we get to it
+    if sch == 'once':
+        if last_run:
+            return None  # already fired once → never again
         try:
-            last_dt = datetime.fromisoformat(last_run)
-        except Exception:
-            last_dt = None
+            return datetime.fromisoformat((policy.get('run_once_at') or '').strip())
+        except ValueError:
+            return None
 
-    sch = (policy['schedule'] or 'daily').lower()
+    after = not_before(after, last_run)
     if sch == 'hourly':
-        # fire at the top of each hour
-        if now.minute > 5: return False  # only within first 5 min of the hour
-        if last_dt and (now - last_dt).total_seconds() < 3000: return False  # 50 min guard
-        return True
-
-    # #586 — cron + once don't use schedule_at, so handle them before that gate
+        return after.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
     if sch == 'cron':
-        if not _cron_match(policy.get('schedule_cron') or '', now): return False
-        # loop ticks ~every 60s — guard a double-fire inside the same minute
-        if last_dt and (now - last_dt).total_seconds() < 55: return False
-        return True
-    if sch == 'once':
-        once_at = (policy.get('run_once_at') or '').strip()
-        if not once_at: return False
-        if last_dt is not None: return False  # already fired once → never again
-        try:
-            once_dt = datetime.fromisoformat(once_at)
-        except Exception:
-            return False
-        return now >= once_dt
+        return cron_next(policy.get('schedule_cron') or '', after)
 
     # daily / weekly / monthly use schedule_at HH:MM
-    schedule_at = (policy['schedule_at'] or '03:00').strip()
-    try:
-        hh, mm = [int(x) for x in schedule_at.split(':', 1)]
-    except Exception:
-        hh, mm = 3, 0
-    if not (now.hour == hh and 0 <= now.minute - mm < 5):
-        return False
+    hh, mm = parse_hhmm(policy['schedule_at'] or '03:00')
     if sch == 'daily':
-        if last_dt and (now - last_dt).total_seconds() < 23 * 3600: return False
-        return True
+        return next_at(after, hh, mm)
     if sch == 'weekly':
         # fire on Sunday (weekday == 6)
-        if now.weekday() != 6: return False
-        if last_dt and (now - last_dt).total_seconds() < 6 * 24 * 3600: return False
-        return True
+        return next_at(after, hh, mm, lambda d: d.weekday() == 6)
     if sch == 'monthly':
-        # #586 — once per month on schedule_day (hour/minute already gated above).
+        # #586 — once per month on schedule_day.
         # clamp to the month's length so day=31 still fires on Feb 28/29, Apr 30, etc.
         # (otherwise "run on the 31st" silently skips ~5 months a year).
         try:
@@ -259,11 +168,9 @@ def _is_due(policy, now=None):
         except Exception:
             day = 1
         day = max(1, min(31, day))
-        dim = calendar.monthrange(now.year, now.month)[1]
-        if now.day != min(day, dim): return False
-        if last_dt and (now - last_dt).total_seconds() < 27 * 24 * 3600: return False
-        return True
-    return False
+        return next_at(after, hh, mm,
+                       lambda d: d.day == min(day, calendar.monthrange(d.year, d.month)[1]))
+    return None
 
 
 def _snap_name(policy_id):
@@ -273,60 +180,6 @@ def _snap_name(policy_id):
     return f"pegaprox-{safe}-{ts}"
 
 
-def _prune(mgr, node, vmid, vm_type, policy):
-    """Delete snapshots owned by this policy beyond retention. Owned =
-    name starts with `pegaprox-<policy_id_prefix>-`."""
-    pruned = 0
-    prefix = f"pegaprox-{policy['id'][:12]}-"
-    try:
-        snaps = mgr.list_snapshots(node, vmid, vm_type) if hasattr(mgr, 'list_snapshots') else []
-    except Exception:
-        snaps = []
-    if not snaps:
-        # fallback: list via direct API
-        try:
-            url = f"https://{mgr.host}:{mgr.api_port}/api2/json/nodes/{node}/{vm_type}/{vmid}/snapshot"
-            resp = mgr._api_get(url)
-            if resp and resp.status_code == 200:
-                snaps = resp.json().get('data') or []
-        except Exception:
-            snaps = []
-
-    owned = []
-    for s in snaps:
-        name = s.get('name') or ''
-        if not name.startswith(prefix): continue
-        snap_t = s.get('snaptime', 0)
-        owned.append((snap_t, name))
-    owned.sort(reverse=True)  # newest first
-
-    keep_set = set()
-    if policy['retention_count'] > 0:
-        for _, name in owned[:policy['retention_count']]:
-            keep_set.add(name)
-    cutoff = 0
-    if policy['retention_days'] > 0:
-        cutoff = (datetime.now() - timedelta(days=policy['retention_days'])).timestamp()
-
-    for snap_t, name in owned:
-        if name in keep_set:
-            continue
-        if cutoff and snap_t >= cutoff:
-            keep_set.add(name)
-            continue
-        # delete this snapshot
-        try:
-            if hasattr(mgr, 'delete_snapshot'):
-                mgr.delete_snapshot(node, vmid, vm_type, name)
-            else:
-                url = f"https://{mgr.host}:{mgr.api_port}/api2/json/nodes/{node}/{vm_type}/{vmid}/snapshot/{name}"
-                mgr._api_delete(url)
-            pruned += 1
-        except Exception as e:
-            logging.warning(f"[snap-sched] prune delete failed for {name}: {e}")
-    return pruned
-
-
 def _execute_policy(policy_id, force=False):
     """Run one policy. Persists a row in snapshot_runs. force=True runs even a
     disabled policy (used by the manual 'run now' button — #586)."""
@@ -342,7 +195,7 @@ def _execute_policy(policy_id, force=False):
 
     # #586 — a 'once' policy must fire exactly once. Stamp last_run_at up front so
     # an early exit below (e.g. the cluster manager being temporarily gone) can't
-    # leave it un-stamped and have the 60s scheduler re-dispatch it every tick.
+    # leave it un-stamped and have the scheduler re-dispatch it.
     # The final UPDATE just refreshes last_run_at with the real finish time/status.
     if policy['schedule'] == 'once':
         try:
@@ -401,75 +254,45 @@ def _execute_policy(policy_id, force=False):
     prune_only = bool(policy.get('prune_only'))
     if prune_only:
         log_lines.append('prune-only policy — not creating new snapshots, retention sweep only')
+    allowed = []
     for node, vmid, vm_type in targets:
         if policy_creator and not user_can_access_vm(policy_creator, policy['cluster_id'], vmid, 'vm.snapshot', vm_type):
             skipped_authz += 1
             log_lines.append(f"  ⊘ {vm_type}/{vmid}@{node}: skipped (creator lacks vm.snapshot)")
             continue
-        # #586 — prune-only: skip create, just sweep this policy's old snapshots
-        if prune_only:
-            try:
-                pruned = _prune(mgr, node, vmid, vm_type, policy)
-                if pruned:
-                    pruned_total += pruned
-                    log_lines.append(f"  ⌫ {vm_type}/{vmid}@{node}: pruned {pruned} old snapshot(s)")
-            except Exception as e:
-                log_lines.append(f"  ✗ {vm_type}/{vmid}@{node}: prune err: {e}")
-            continue
-        snap = _snap_name(policy['id'])
-        create_ok = False
-        try:
-            res = mgr.create_snapshot(node, vmid, vm_type, snap, f"PegaProx policy {policy['name']}", policy['include_ram'])
-            if res.get('success'):
-                # MK May 2026 (#436 aalandez): create_snapshot returns success as soon
-                # as PVE accepts the request and the task starts — NOT when it
-                # completes. While the create task runs, PVE holds the VM at
-                # `lock = snapshot`. If we issued the retention-delete immediately,
-                # it would hit "VM is locked (snapshot)" and fail. Block on the
-                # task UPID first so the lock has been released before _prune runs.
-                task_upid = res.get('task')
-                if task_upid and hasattr(mgr, '_wait_for_task'):
-                    try:
-                        finished_ok = mgr._wait_for_task(node, task_upid, timeout=600)
-                        if not finished_ok:
-                            log_lines.append(
-                                f"    ⚠ create task for {snap} did not finish OK — "
-                                f"prune may still race the lock; check task log"
-                            )
-                    except Exception as wait_err:
-                        log_lines.append(f"    wait-for-create-task failed (non-fatal): {wait_err}")
-                created += 1
-                create_ok = True
-                log_lines.append(f"  ✓ {vm_type}/{vmid}@{node} → {snap}")
-            else:
-                failed += 1
-                log_lines.append(f"  ✗ {vm_type}/{vmid}@{node}: {res.get('error', 'unknown')}")
-        except Exception as e:
-            failed += 1
-            log_lines.append(f"  ✗ {vm_type}/{vmid}@{node}: exception: {e}")
-            continue
-        # Only attempt prune when create actually succeeded — otherwise we
-        # might silently prune the wrong policy's snapshots if the VM is
-        # already locked from something else.
-        if not create_ok:
-            continue
-        try:
-            pruned = _prune(mgr, node, vmid, vm_type, policy)
-            if pruned:
-                pruned_total += pruned
-                log_lines.append(f"    pruned {pruned} old snapshot(s)")
-        except Exception as e:
-            log_lines.append(f"    prune err: {e}")
+        allowed.append((node, vmid, vm_type))
+
+    # NS Oct 2026 — create / prune run node-parallel in the batch engine
+    # (core/snapshot_engine.py). Per VM it still waits for the create task to
+    # finish before pruning (#436 — the VM holds `lock = snapshot` until then),
+    # and only prunes after a good create. #586 — prune-only skips the create.
+    batch = SnapshotBatch(
+        mgr, allowed, prefix=f"pegaprox-{policy['id'][:12]}-",
+        retention_count=policy['retention_count'], retention_days=policy['retention_days'],
+        snap_name=None if prune_only else (lambda: _snap_name(policy['id'])),
+        description=f"PegaProx policy {policy['name']}", vmstate=policy['include_ram'],
+        log=log_lines)
+    try:
+        res = batch.run()
+    except Exception as e:
+        log_lines.append(f"batch aborted: {e}")
+        res = batch.stats
+    created, failed, pruned_total = res['created'], res['failed'], res['pruned']
+    duration = res['duration']
+    per_minute = round(created * 60 / duration, 2) if duration > 0 else 0.0
+    log_lines.append(f"{len(allowed)} VMs in {duration:.1f}s · peak {res['peak_parallel']} in flight · "
+                     f"{per_minute} snapshots/min · {res['prune_failed']} prune deletes failed")
 
     finished_at = datetime.now().isoformat()
     status = 'completed' if failed == 0 else ('partial' if created > 0 else 'failed')
     summary = f"{created} created · {failed} failed · {pruned_total} pruned · {skipped_authz} authz-skipped · {len(targets)} targets"
 
     c.execute('''UPDATE snapshot_runs SET status=?, finished_at=?, log=?, summary=?,
-                 snapshots_created=?, snapshots_failed=?, snapshots_pruned=?
+                 snapshots_created=?, snapshots_failed=?, snapshots_pruned=?,
+                 duration_seconds=?, snapshots_per_minute=?, peak_parallel=?
                  WHERE id=?''',
               (status, finished_at, '\n'.join(log_lines), summary,
-               created, failed, pruned_total, run_id))
+               created, failed, pruned_total, duration, per_minute, res['peak_parallel'], run_id))
     c.execute('''UPDATE snapshot_policies SET last_run_at=?, last_run_status=? WHERE id=?''',
               (finished_at, status, policy['id']))
     db.conn.commit()
@@ -486,41 +309,31 @@ def _execute_policy(policy_id, force=False):
 # Background scheduler
 # ──────────────────────────────────────────────────────────────────────────
 
-_scheduler_running = False
-_scheduler_lock = threading.Lock()
+class _PolicySource(JobSource):
+    """Snapshot policies on the shared job scheduler (core/job_scheduler.py)."""
 
+    kind = 'snapshot_policy'
+    grace = 300     # the old 60s loop fired up to 5 min into the slot — keep that slack
 
-def _scheduler_loop():
-    while _scheduler_running:
-        try:
-            db = get_db()
-            c = db.conn.cursor()
+    def load(self, job_id=None):
+        c = get_db().conn.cursor()
+        if job_id is None:
             c.execute("SELECT * FROM snapshot_policies WHERE enabled = 1")
-            for row in c.fetchall():
-                p = _row_to_policy(row)
-                if _is_due(p):
-                    try:
-                        _execute_policy(p['id'])
-                    except Exception as e:
-                        logging.warning(f"[snap-sched] policy {p['id']} run failed: {e}")
-        except Exception as e:
-            logging.debug(f"[snap-sched] loop iter err: {e}")
-        # check every 60s
-        for _ in range(60):
-            if not _scheduler_running:
-                return
-            time.sleep(1)
+            return {r['id']: _row_to_policy(r) for r in c.fetchall()}
+        c.execute("SELECT * FROM snapshot_policies WHERE id = ? AND enabled = 1", (job_id,))
+        row = c.fetchone()
+        return _row_to_policy(row) if row else None
+
+    def next_fire(self, job, after):
+        return _next_fire(job, after)
+
+    def run(self, job, fire_at):
+        _execute_policy(job['id'])
 
 
 def start_scheduler():
-    global _scheduler_running
-    with _scheduler_lock:
-        if _scheduler_running:
-            return
-        _scheduler_running = True
-    t = threading.Thread(target=_scheduler_loop, daemon=True, name='snapshot-scheduler')
-    t.start()
-    logging.info("[snap-sched] scheduler thread started (60s tick)")
+    register_job_source(_PolicySource())
+    logging.info("[snap-sched] policies registered with the job scheduler")
 
 
 # ──────────────────────────────────────────────────────────────────────────
@@ -585,9 +398,10 @@ def create_policy(cluster_id):
         return jsonify({'error': 'cluster manager not found'}), 404
     creator = build_authz_user(request.session.get('user', ''), request.session)
     try:
+        vis = get_vm_visibility(creator, cluster_id, 'vm.snapshot')
         denied = [f"{t}/{v}@{n}" for n, v, t in _resolve_targets(mgr, {
                       'target_type': target_type, 'target_value': target_value, 'cluster_id': cluster_id})
-                  if not user_can_access_vm(creator, cluster_id, v, 'vm.snapshot', t)]
+                  if not vis.can(v, t)]
     except Exception as e:
         return jsonify({'error': f'failed to resolve targets: {e}'}), 400
     if denied:
@@ -610,6 +424,7 @@ def create_policy(cluster_id):
              retention_count, retention_days, 1 if include_ram else 0, 1 if enabled else 0,
              notes, _current_user(), datetime.now().isoformat()))
         get_db().conn.commit()
+        touch_job('snapshot_policy', pid)
         c.execute('SELECT * FROM snapshot_policies WHERE id=?', (pid,))
         return jsonify({'policy': _row_to_policy(c.fetchone())})
     except Exception:
@@ -639,9 +454,10 @@ def update_policy(cluster_id, pid):
         tv = body.get('target_value', cur['target_value'])
         creator = build_authz_user(request.session.get('user', ''), request.session)
         try:
+            vis = get_vm_visibility(creator, cluster_id, 'vm.snapshot')
             denied = [f"{t}/{v}@{n}" for n, v, t in _resolve_targets(mgr, {
                           'target_type': tt, 'target_value': tv, 'cluster_id': cluster_id})
-                      if not user_can_access_vm(creator, cluster_id, v, 'vm.snapshot', t)]
+                      if not vis.can(v, t)]
         except Exception as e:
             return jsonify({'error': f'failed to resolve targets: {e}'}), 400
         if denied:
@@ -690,6 +506,7 @@ def update_policy(cluster_id, pid):
         get_db().conn.commit()
         if c.rowcount == 0:
             return jsonify({'error': 'not found'}), 404
+        touch_job('snapshot_policy', pid)
         c.execute('SELECT * FROM snapshot_policies WHERE id=?', (pid,))
         return jsonify({'policy': _row_to_policy(c.fetchone())})
     except Exception:
@@ -717,8 +534,9 @@ def delete_policy(cluster_id, pid):
         return jsonify({'error': 'cluster manager not found'}), 404
     caller = build_authz_user(request.session.get('user', ''), request.session)
     try:
+        vis = get_vm_visibility(caller, cluster_id, 'vm.snapshot')
         denied = [f"{t}/{v}@{n}" for n, v, t in _resolve_targets(mgr, _row_to_policy(prow))
-                  if not user_can_access_vm(caller, cluster_id, v, 'vm.snapshot', t)]
+                  if not vis.can(v, t)]
     except Exception as e:
         return jsonify({'error': f'failed to resolve targets: {e}'}), 400
     if denied:
@@ -733,6 +551,7 @@ def delete_policy(cluster_id, pid):
         get_db().conn.commit()
         if c.rowcount == 0:
             return jsonify({'error': 'not found'}), 404
+        touch_job('snapshot_policy', pid)
         return jsonify({'ok': True})
     except Exception:
         logging.exception('delete snapshot policy failed')
@@ -760,8 +579,9 @@ def run_policy_now(cluster_id, pid):
         return jsonify({'error': 'cluster manager not found'}), 404
     caller = build_authz_user(request.session.get('user', ''), request.session)
     try:
+        vis = get_vm_visibility(caller, cluster_id, 'vm.snapshot')
         denied = [f"{t}/{v}@{n}" for n, v, t in _resolve_targets(mgr, _row_to_policy(prow))
-                  if not user_can_access_vm(caller, cluster_id, v, 'vm.snapshot', t)]
+                  if not vis.can(v, t)]
     except Exception as e:
         return jsonify({'error': f'failed to resolve targets: {e}'}), 400
     if denied:
@@ -324,8 +324,9 @@ def get_vms_without_pool(cluster_id):
         # A pool-scoped user reaches the cluster via the pool fallback but must not enumerate
         # every unpooled VM's metadata; admins pass user_can_access_vm unchanged.
         from pegaprox.utils.auth import build_authz_user
-        from pegaprox.utils.rbac import user_can_access_vm
+        from pegaprox.utils.rbac import get_vm_visibility
         _user = build_authz_user(request.session.get('user', ''), request.session)
+        _vis = get_vm_visibility(_user, cluster_id, 'vm.view')
 
         # Filter VMs not in any pool
         vms_without_pool = []
@@ -339,7 +340,7 @@ def get_vms_without_pool(cluster_id):
             except (TypeError, ValueError):
                 continue  # a single malformed vmid must skip this row, not 500 the whole endpoint
 
-            if key not in membership and user_can_access_vm(_user, cluster_id, vmid_int, 'vm.view'):
+            if key not in membership and _vis.can(vmid_int):
                 vms_without_pool.append({
                     'vmid': vmid,
                     'name': vm.get('name', f'VM {vmid}'),
@@ -12,7 +12,7 @@ from flask import Blueprint, jsonify, request
 from pegaprox.constants import *
 from pegaprox.globals import *
 from pegaprox.models.permissions import *
-from pegaprox.core.db import get_db
+from pegaprox.core.db import get_db, bump_auth_generation
 from pegaprox.utils.sanitization import sanitize_username, sanitize_log_message as _sl
 
 from pegaprox.utils.auth import (
@@ -1093,6 +1093,7 @@ def delete_user(username):
     invalidate_user_ws_tokens(username)   # drop any pre-minted console/shell ws_token too
     try:
         db.execute('UPDATE api_tokens SET revoked = 1 WHERE username = ?', (username,))
+        bump_auth_generation()
     except Exception as e:
         logging.warning(f"Failed to revoke API tokens for deleted user '{_sl(username)}': {e}")
 
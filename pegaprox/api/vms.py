@@ -25,7 +25,7 @@ from pegaprox.core.db import get_db
 
 from pegaprox.utils.auth import require_auth, load_users, validate_session, build_authz_user
 from pegaprox.utils.audit import log_audit
-from pegaprox.utils.rbac import user_can_access_vm, get_user_permissions
+from pegaprox.utils.rbac import user_can_access_vm, get_user_permissions, get_vm_visibility
 
 
 def _require_vm_access(cluster_id, vmid, perm, vm_type=None):
@@ -42,8 +42,10 @@ def _require_vm_access(cluster_id, vmid, perm, vm_type=None):
 from pegaprox.utils.realtime import broadcast_sse, broadcast_action, push_immediate_update
 from pegaprox.core.config import save_config
 from pegaprox.api.helpers import get_connected_manager, check_cluster_access, register_task_user, safe_error, parse_pve_error
+from pegaprox.core.migration_queue import MigrationJob, get_migration_queue
 from pegaprox.utils.ssh import get_paramiko
 from pegaprox.utils.sanitization import sanitize_int
+from pegaprox.utils import console_relay
 from urllib.parse import urlencode, quote as url_quote
 import signal
 import requests.exceptions
@@ -3959,6 +3961,14 @@ def vnc_poll(cluster_id, node, vm_type, vmid):
 
     # ───── action: open ─────
     if action == 'open':
+        # NS Oct 2026 — console slot first, before we spend a PVE login on it
+        try:
+            relay = console_relay.admit('poll', cluster_id, vmid, request.session['user'])
+        except console_relay.ConsoleCapacityError as ce:
+            resp = jsonify({'error': str(ce), 'retry_after': 10})
+            resp.headers['Retry-After'] = '10'
+            return resp, 503
+
         # acquire PVE auth + vncproxy ticket (mirrors the WS handler flow)
         import urllib.request, urllib.parse, json as _json, ssl as _ssl
         import websocket as ws_client
@@ -4005,6 +4015,7 @@ def vnc_poll(cluster_id, node, vm_type, vmid):
                 vnc_ticket = vnc_result['data']['ticket']
                 vnc_port = vnc_result['data']['port']
         except Exception as e:
+            relay.release()
             return jsonify({'error': f'pve auth/proxy failed: {e}'}), 502
 
         encoded_ticket = url_quote(vnc_ticket, safe='')
@@ -4048,6 +4059,7 @@ def vnc_poll(cluster_id, node, vm_type, vmid):
             try:
                 if tunnel_endpoint: tunnel_endpoint.stop()
             except Exception: pass
+            relay.release()
             return jsonify({'error': f'pve ws connect failed: {e}'}), 502
 
         # Optional Stable-Mode crypto
@@ -4071,6 +4083,7 @@ def vnc_poll(cluster_id, node, vm_type, vmid):
             vm_type=vm_type,
             vmid=vmid,
             host=host,
+            relay=relay,
         )
         _poll.register(sess)
         log_audit(request.session.get('user', 'unknown'), 'vm.console',
@@ -6697,7 +6710,8 @@ def _execute_replication_incremental(job):
     LXC, missing creds…) so the caller falls back to the proven full path.
     """
     from pegaprox.core.incremental_repl import (rbd_replicate_disk, rbd_prune_snapshots,
-                                                zfs_replicate_dataset, zfs_prune_snapshots)
+                                                zfs_replicate_dataset, zfs_prune_snapshots,
+                                                pick_compression, run_streams, transfer_stats)
     db = get_db()
     job_id = job['id']; vmid = int(job['vmid'])
     vm_type = job.get('vm_type', 'qemu') or 'qemu'
@@ -6810,28 +6824,57 @@ def _execute_replication_incremental(job):
                 _cleanup_snapshot(source_mgr, source_node, vmid, vm_type, new_snap)
                 _update_repl_status(db, job_id, 'error', rm_err); return True
 
-        # 3. replicate each disk (seed when rebuilding, else the base..new delta)
+        # 3. replicate each disk (seed when rebuilding, else the base..new delta).
+        #    NS Oct 2026 — disks go out in parallel (one ssh pair per stream) and
+        #    optionally compressed; throughput lands on the job row.
         base_for_disk = None if rebuild else (last_snap or None)
         _dlog = lambda m: logging.info(f"[XCINCR] {job_id}: {m}")
-        replicated, total = [], 0
+        compression = pick_compression(src_ssh, tgt_ssh, job.get('compression') or 'none', log=_dlog)
+        items = {}
         for (key, storage, volume) in disks:
-            tgt_vol = volume.replace(f"vm-{vmid}-", f"vm-{tgt_vmid}-", 1)
+            items[key] = (storage, volume, volume.replace(f"vm-{vmid}-", f"vm-{tgt_vmid}-", 1))
+
+        def _ship(item, s_ssh, t_ssh):
+            storage, volume, tgt_vol = item
             if incr_type == 'rbd':
-                res = rbd_replicate_disk(src_ssh, tgt_ssh,
-                                         _xcincr_rbd_pool(src_ssh, storage), volume,
-                                         _xcincr_rbd_pool(tgt_ssh, target_storage), tgt_vol,
-                                         new_snap, base_snap=base_for_disk, log=_dlog)
-            else:  # zfspool
-                src_ds = f"{_xcincr_zfs_pool(src_ssh, storage)}/{volume}"
-                tgt_ds = f"{_xcincr_zfs_pool(tgt_ssh, target_storage)}/{tgt_vol}"
-                res = zfs_replicate_dataset(src_ssh, tgt_ssh, src_ds, tgt_ds, new_snap,
-                                            base_snap=base_for_disk, log=_dlog)
+                return rbd_replicate_disk(s_ssh, t_ssh,
+                                          _xcincr_rbd_pool(s_ssh, storage), volume,
+                                          _xcincr_rbd_pool(t_ssh, target_storage), tgt_vol,
+                                          new_snap, base_snap=base_for_disk, log=_dlog,
+                                          compression=compression)
+            # zfspool
+            src_ds = f"{_xcincr_zfs_pool(s_ssh, storage)}/{volume}"
+            tgt_ds = f"{_xcincr_zfs_pool(t_ssh, target_storage)}/{tgt_vol}"
+            return zfs_replicate_dataset(s_ssh, t_ssh, src_ds, tgt_ds, new_snap,
+                                         base_snap=base_for_disk, log=_dlog, compression=compression)
+
+        def _open_pair():
+            return (source_mgr._ssh_connect(_xcincr_node_ip(source_mgr, source_node)),
+                    target_mgr._ssh_connect(_xcincr_node_ip(target_mgr, target_node)))
+
+        t_ship = time.time()
+        results = run_streams(items, _ship, (src_ssh, tgt_ssh), _open_pair,
+                              streams=int(job.get('streams') or 0) or None)
+        xfer = transfer_stats(results.values(), time.time() - t_ship)
+        try:
+            db.execute('UPDATE cross_cluster_replications SET last_bytes=?, last_bytes_per_sec=?, '
+                       'last_compress_ratio=?, last_stall_seconds=? WHERE id=?',
+                       (xfer['bytes'], xfer['bytes_per_sec'], xfer['compress_ratio'],
+                        xfer['stall_seconds'], job_id))
+        except Exception as e:
+            logging.debug(f"[XCINCR] {job_id}: transfer stats not stored: {e}")
+        replicated = []
+        for (key, storage, volume) in disks:
+            res = results[key]
             if not res['ok']:
                 _cleanup_snapshot(source_mgr, source_node, vmid, vm_type, new_snap)
                 _update_repl_status(db, job_id, 'error', f'disk {key} ({volume}) replicate failed: {res.get("error","")[:200]}')
                 return True
-            total += res['bytes']; replicated.append((key, tgt_vol, res['mode']))
-        logging.info(f"[XCINCR] Job {job_id}: shipped {total/1e6:.1f} MB ({', '.join(m for _,_,m in replicated)})")
+            replicated.append((key, items[key][2], res['mode']))
+        logging.info(f"[XCINCR] Job {job_id}: shipped {xfer['raw_bytes']/1e6:.1f} MB "
+                     f"({xfer['bytes']/1e6:.1f} MB on the wire, {compression or 'uncompressed'}, "
+                     f"{xfer['bytes_per_sec']/1e6:.1f} MB/s, stalled {xfer['stall_seconds']:.1f}s; "
+                     f"{', '.join(m for _,_,m in replicated)})")
 
         # 4. build the replica VM shell on a (re)build (disks already seeded)
         if rebuild:
@@ -7233,13 +7276,18 @@ def _execute_replication(job):
 
 def _update_repl_status(db, job_id, status, error=''):
     """Update job status in DB after a replication run."""
+    finished = datetime.now()
     try:
         db.execute(
             'UPDATE cross_cluster_replications SET last_run = ?, last_status = ?, last_error = ?, updated_at = ? WHERE id = ?',
-            (datetime.now().isoformat(), status, error or '', datetime.now().isoformat(), job_id)
+            (finished.isoformat(), status, error or '', finished.isoformat(), job_id)
         )
     except Exception as e:
         logging.warning(f"[XCREPL] Could not update status for {job_id}: {e}")
+    # NS Oct 2026 — feed the DR readiness index (core/dr_readiness.py) so failover
+    # gating and the DR dashboard see the run without re-reading the table
+    from pegaprox.core.dr_readiness import note_replication
+    note_replication(job_id, status, finished.timestamp())
     # MK May 2026 (audit completeness) — emit terminal audit event so the bundle's
     # audit_log captures the outcome of every xcrepl run, not just `replication.triggered`.
     # Mirrors the gap that surfaced via #438 on the v2p side: started-only audit forces
@@ -7508,13 +7556,21 @@ def create_cross_cluster_replication():
     mode = str(data.get('mode', 'full')).lower()
     if mode not in ('full', 'incremental'):
         mode = 'full'
+    # relay options for the incremental path (ignored by the full path)
+    compression = str(data.get('compression') or 'none').lower()
+    if compression not in ('none', 'auto', 'zstd', 'lz4'):
+        return jsonify({'error': 'compression must be none, auto, zstd or lz4'}), 400
+    try:
+        streams = max(0, min(16, int(data.get('streams') or 0)))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'streams must be an integer'}), 400
 
     db.execute('''
         INSERT INTO cross_cluster_replications
         (id, source_cluster, target_cluster, vmid, vm_type, schedule, retention,
          target_storage, target_bridge, target_node, target_vmid, delete_target,
-         mode, enabled, created_by, created_at, updated_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?, ?)
+         mode, compression, streams, enabled, created_by, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?, ?)
     ''', (
         job_id,
         source_cluster,
@@ -7529,10 +7585,15 @@ def create_cross_cluster_replication():
         target_vmid,
         delete_target,
         mode,
+        compression,
+        streams,
         getattr(request, 'session', {}).get('user', 'system'),
         now, now,
     ))
 
+    from pegaprox.core.dr_readiness import job_changed
+    job_changed(job_id)
+
     usr = getattr(request, 'session', {}).get('user', 'system')
     log_audit(usr, 'replication.created',
               f"Cross-cluster replication {job_id}: VM {vmid} from {source_cluster} to {target_cluster} "
@@ -7670,6 +7731,8 @@ def delete_cross_cluster_replication(job_id):
             target_detail = f' (replica: {detail})'
 
     db.execute('DELETE FROM cross_cluster_replications WHERE id = ?', (job_id,))
+    from pegaprox.core.dr_readiness import job_changed
+    job_changed(job_id)
 
     usr = getattr(request, 'session', {}).get('user', 'system')
     log_audit(usr, 'replication.deleted', f"Cross-cluster replication {job_id} deleted{target_detail}")
@@ -7815,8 +7878,68 @@ def _console_authz(user, cluster_id, vmid, vm_type=None):
     return True, None
 
 
+# NS Oct 2026 — shared pump for the two gevent-side VNC proxies (geventwebsocket
+# + flask-sock). Both used to poll pve_ws with a 0.1s timeout and gsleep(0.01),
+# i.e. every idle console woke 20x a second. Blocking reads just park the
+# greenlet; whichever side ends first closes the other to unblock its reader.
+def _relay_vnc_ws(ws, pve_ws, relay):
+    """Pump bytes browser ws <-> PVE ws until either side closes.
+    Returns (bytes_sent, bytes_received)."""
+    import websocket
+    from gevent import spawn
+    state = {'running': True, 'sent': 0, 'received': 0}
+    pve_ws.settimeout(None)
+
+    def _stop():
+        if state['running']:
+            state['running'] = False
+            try: ws.close()
+            except Exception: pass
+            try: pve_ws.close()
+            except Exception: pass
+
+    def proxmox_to_client():
+        try:
+            while state['running']:
+                data = pve_ws.recv()
+                if not data:
+                    break
+                state['received'] += len(data)
+                t0 = time.monotonic()
+                ws.send(data)
+                relay.record('down', len(data), time.monotonic() - t0)
+        except websocket.WebSocketConnectionClosedException:
+            print("Proxmox closed")
+        except Exception as e:
+            if state['running']:
+                print(f"PVE->Client error: {e}")
+        finally:
+            _stop()
+
+    pve_reader = spawn(proxmox_to_client)
+    print(f"Step 4: Proxy running...")
+    try:
+        while state['running']:
+            data = ws.receive()
+            if data is None:
+                print("Client disconnected")
+                break
+            if data:
+                state['sent'] += len(data)
+                t0 = time.monotonic()
+                pve_ws.send(data)
+                relay.record('up', len(data), time.monotonic() - t0)
+    except Exception as e:
+        if state['running'] and 'closed' not in str(e).lower():
+            print(f"Client->PVE error: {e}")
+    finally:
+        _stop()
+        pve_reader.kill()
+    return state['sent'], state['received']
+
+
 # WebSocket proxy for VNC - using geventwebsocket
-def handle_vnc_websocket(ws, cluster_id, node, vm_type, vmid):
+def handle_vnc_websocket(ws, cluster_id, node, vm_type, vmid, auth_user=''):
     """Handle VNC WebSocket connection"""
     print(f"\n{'='*60}")
     print(f"VNC WEBSOCKET: {vm_type}/{vmid} on {node}")
@@ -7830,13 +7953,18 @@ def handle_vnc_websocket(ws, cluster_id, node, vm_type, vmid):
     host, port = manager.host, manager.api_port
     
     print(f"Target host: {host}")
+
+    try:
+        relay = console_relay.admit('geventwebsocket', cluster_id, vmid, auth_user)
+    except console_relay.ConsoleCapacityError as ce:
+        logging.warning(f"[VNC] rejected {cluster_id}/{vmid}: {ce}")
+        try: ws.send('Console session limit reached')
+        except: pass
+        return
     
     pve_ws = None
-    running = True
     
     try:
-        import gevent
-        from gevent import spawn, sleep as gsleep
         import urllib.parse
         import urllib.request
         import json
@@ -7918,74 +8046,19 @@ def handle_vnc_websocket(ws, cluster_id, node, vm_type, vmid):
         _apply_vnc_socket_options(pve_ws.sock)
 
         print(f"✓ Connected to Proxmox!")
-        pve_ws.settimeout(0.1)
-        
-        bytes_sent = 0
-        bytes_received = 0
-        
-        # Greenlet to read from Proxmox and send to client
-        def proxmox_to_client():
-            nonlocal bytes_received, running
-            try:
-                while running:
-                    try:
-                        data = pve_ws.recv()
-                        if data:
-                            bytes_received += len(data)
-                            ws.send(data)
-                    except websocket.WebSocketTimeoutException:
-                        gsleep(0.01)
-                    except websocket.WebSocketConnectionClosedException:
-                        print("Proxmox closed")
-                        running = False
-                        break
-                    except Exception as e:
-                        if running:
-                            print(f"PVE->Client error: {e}")
-                        running = False
-                        break
-            except Exception as e:
-                print(f"proxmox_to_client crashed: {e}")
-                running = False
-        
-        # Start the proxmox reader greenlet
-        pve_reader = spawn(proxmox_to_client)
-        
-        print(f"Step 4: Proxy running...")
-        
-        # Main loop: read from client, send to Proxmox
-        while running:
-            try:
-                data = ws.receive()
-                if data is None:
-                    print("Client disconnected")
-                    running = False
-                    break
-                if data:
-                    bytes_sent += len(data)
-                    pve_ws.send(data)
-            except Exception as e:
-                if running:
-                    err_str = str(e)
-                    if 'closed' not in err_str.lower():
-                        print(f"Client->PVE error: {e}")
-                running = False
-                break
-        
-        running = False
-        pve_reader.kill()
+        bytes_sent, bytes_received = _relay_vnc_ws(ws, pve_ws, relay)
         
         print(f"Session ended: sent {bytes_sent}, received {bytes_received}")
         
     except Exception as e:
         logging.exception(f"VNC proxy error: {type(e).__name__}: {e}")
     finally:
-        running = False
         if pve_ws:
             try:
                 pve_ws.close()
             except:
                 pass
+        relay.release()
         print(f"{'='*60}\n")
 
 
@@ -8050,7 +8123,7 @@ def vnc_websocket_route(cluster_id, node, vm_type, vmid):
     ws = request.environ.get('wsgi.websocket')
     if ws is not None:
         print("Using geventwebsocket handler...")
-        handle_vnc_websocket(ws, cluster_id, node, vm_type, vmid)
+        handle_vnc_websocket(ws, cluster_id, node, vm_type, vmid, auth_user)
         return ''
     
     # If not a websocket, return error
@@ -8194,6 +8267,14 @@ def start_vnc_websocket_server(port=5001, ssl_cert=None, ssl_key=None, host='0.0
         
         manager = cluster_managers[cluster_id]
         host, port = manager.host, manager.api_port
+
+        # NS Oct 2026 — shared console cap; 1013 = "try again later"
+        try:
+            relay = console_relay.admit('websocket', cluster_id, vmid, user.get('username', ''))
+        except console_relay.ConsoleCapacityError as ce:
+            logging.warning(f"[VNC] rejected {cluster_id}/{vmid}: {ce}")
+            await websocket.close(1013, "Console session limit reached")
+            return
         
         pve_ws = None
 
@@ -8420,9 +8501,12 @@ def start_vnc_websocket_server(port=5001, ssl_cert=None, ssl_key=None, host='0.0
                         bytes_received += len(data)
                         if isinstance(data, str):
                             data = data.encode('latin-1')
+                        _n = len(data)
+                        _t_send = _t_connect.monotonic()
                         if crypto_session is not None:
                             data = crypto_session.encrypt(data)
                         await websocket.send(data)
+                        relay.record('down', _n, _t_connect.monotonic() - _t_send)
                     except ws_client.WebSocketConnectionClosedException:
                         running = False
                         break
@@ -8466,7 +8550,9 @@ def start_vnc_websocket_server(port=5001, ssl_cert=None, ssl_key=None, host='0.0
                                 except Exception:
                                     pass
                                 break
+                        _t_send = _t_connect.monotonic()
                         await asyncio.to_thread(pve_ws.send, message)
+                        relay.record('up', len(message), _t_connect.monotonic() - _t_send)
                 except Exception as e:
                     if running and 'close' not in str(e).lower():
                         logging.debug(f"[VNC] Client->PVE: {e}")
@@ -8578,6 +8664,7 @@ def start_vnc_websocket_server(port=5001, ssl_cert=None, ssl_key=None, host='0.0
                     tunnel_endpoint.stop()
             except Exception as _tend:
                 logging.debug(f"[VNC] tunnel cleanup error: {_tend}")
+            relay.release()
             print(f"{'='*60}\n")
 
     async def main():
@@ -8705,8 +8792,6 @@ def start_vnc_websocket_server(port=5001, ssl_cert=None, ssl_key=None, host='0.0
 @sock.route('/api/clusters/<cluster_id>/vms/<node>/<vm_type>/<int:vmid>/vncwebsocket')
 def vnc_websocket_proxy(ws, cluster_id, node, vm_type, vmid):
     """WebSocket proxy for VNC connection via Flask-Sock (same port as main app)"""
-    import gevent
-    from gevent import spawn, sleep as gsleep
     
     print(f"\n{'='*60}")
     print(f"VNC WEBSOCKET: {vm_type}/{vmid} on {node}")
@@ -8776,9 +8861,16 @@ def vnc_websocket_proxy(ws, cluster_id, node, vm_type, vmid):
     host, port = manager.host, manager.api_port
     
     print(f"Target host: {host}")
+
+    try:
+        relay = console_relay.admit('flask-sock', cluster_id, vmid, auth_user)
+    except console_relay.ConsoleCapacityError as ce:
+        logging.warning(f"[VNC] rejected {cluster_id}/{vmid}: {ce}")
+        try: ws.send('Console session limit reached')
+        except: pass
+        return
     
     pve_ws = None
-    running = True
     
     try:
         import urllib.parse
@@ -8862,75 +8954,19 @@ def vnc_websocket_proxy(ws, cluster_id, node, vm_type, vmid):
         _apply_vnc_socket_options(pve_ws.sock)
 
         print(f"✓ Connected!")
-        pve_ws.settimeout(0.1)
-        
-        bytes_sent = 0
-        bytes_received = 0
-        
-        # Greenlet to read from Proxmox and send to client
-        def proxmox_to_client():
-            nonlocal bytes_received, running
-            try:
-                while running:
-                    try:
-                        data = pve_ws.recv()
-                        if data:
-                            bytes_received += len(data)
-                            ws.send(data)
-                    except websocket.WebSocketTimeoutException:
-                        gsleep(0.01)
-                    except websocket.WebSocketConnectionClosedException:
-                        print("Proxmox closed")
-                        running = False
-                        break
-                    except Exception as e:
-                        if running:
-                            print(f"PVE->Client error: {e}")
-                        running = False
-                        break
-            except Exception as e:
-                print(f"proxmox_to_client crashed: {e}")
-                running = False
-        
-        # Start the proxmox reader greenlet
-        pve_reader = spawn(proxmox_to_client)
-        
-        print(f"Step 4: Proxy running...")
-        
-        # Main loop: read from client, send to Proxmox
-        while running:
-            try:
-                data = ws.receive(timeout=0.1)
-                if data is None:
-                    print("Client disconnected")
-                    running = False
-                    break
-                if data:
-                    bytes_sent += len(data)
-                    pve_ws.send(data)
-            except TimeoutError:
-                gsleep(0.01)
-            except Exception as e:
-                if "timed out" not in str(e).lower() and "timeout" not in str(e).lower():
-                    print(f"Client->PVE error: {e}")
-                    running = False
-                    break
-                gsleep(0.01)
-        
-        running = False
-        pve_reader.kill()
+        bytes_sent, bytes_received = _relay_vnc_ws(ws, pve_ws, relay)
         
         print(f"Session ended: sent {bytes_sent}, received {bytes_received}")
         
     except Exception as e:
         logging.exception(f"SSH proxy error: {type(e).__name__}: {e}")
     finally:
-        running = False
         if pve_ws:
             try:
                 pve_ws.close()
             except:
                 pass
+        relay.release()
         print(f"{'='*60}\n")
 
 
@@ -10223,6 +10259,8 @@ def bulk_migrate_api(cluster_id):
     from pegaprox.api.history import check_affinity_violation
 
     results = []
+    jobs = []
+    rows = {r.get('vmid'): r for r in (mgr.get_vm_resources(max_age=30) or [])}
     for vm in vms:
         if not user_can_access_vm(_authz_user, cluster_id, vm['vmid'], 'vm.migrate', vm.get('type', 'qemu')):
             results.append({
@@ -10242,29 +10280,80 @@ def bulk_migrate_api(cluster_id):
         elif aff.get('violation'):
             logging.warning(f"Affinity warning for VMID {vm['vmid']} -> {target_node}: {aff['message']} (not enforced)")
 
-        result = mgr.migrate_vm_manual(vm['node'], vm['vmid'], vm['type'], target_node, online)
+        row = dict(rows.get(vm['vmid']) or {})
+        row.update({'vmid': vm['vmid'], 'node': vm['node'], 'type': vm.get('type', 'qemu')})
+        job = MigrationJob(row, target=target_node, online=online, user=user)
+        jobs.append(job)
+        results.append(job)     # filled in from the job once the first wave is dispatched
+
+    # NS Oct 2026 — accepted VMs go through the cluster migration queue instead
+    # of 1000 back-to-back /migrate POSTs (per-node concurrency caps, retries,
+    # ETA). Progress: GET /api/clusters/<id>/migration-queue/<batch_id>.
+    batch_id = None
+    if jobs:
+        def _start(job):
+            return mgr.migrate_vm_manual(job.source, job.vmid, job.type, job.target, job.online)
+
+        def _on_start(job):
+            # NS: Register PegaProx user for each migration task
+            register_task_user(job.upid, job.user, cluster_id)
+            push_immediate_update(cluster_id, delay=0.5)
 
-        # NS: Register PegaProx user for each migration task
-        if result.get('task') or result.get('upid'):
-            register_task_user(result.get('task') or result.get('upid'), user, cluster_id)
+        batch_id = get_migration_queue(mgr).submit(jobs, _start, on_start=_on_start,
+                                                   label=f'bulk → {target_node}', wait_timeout=3600)
+
+    # submit() starts the first wave before returning: those VMs report their
+    # UPID (or start error) exactly as before. The rest are queued — not a
+    # success yet; their task/error show up on the batch status endpoint.
+    for i, r in enumerate(results):
+        if not isinstance(r, MigrationJob):
+            continue
+        started = bool(r.upid) or r.state == 'done'
+        results[i] = {
+            'vmid': r.vmid, 'success': started, 'task': r.upid,
+            'error': None if started else r.error,
+            'queued': r.state == 'queued', 'state': r.state, 'job_id': r.id,
+        }
+        if r.note:
+            results[i]['note'] = r.note
 
-        results.append({
-            'vmid': vm['vmid'],
-            'success': result.get('success', False),
-            'task': result.get('task'),
-            'error': result.get('error')
-        })
-    
-    # NS: Push immediate update for live UI (all migrations started)
-    push_immediate_update(cluster_id, delay=0.5)
-    
     return jsonify({
         'results': results,
         'total': len(vms),
-        'successful': sum(1 for r in results if r['success'])
+        'successful': sum(1 for r in results if r['success']),
+        'queued': sum(1 for r in results if r.get('queued')),
+        'batch_id': batch_id,
+        'status_url': f'/api/clusters/{cluster_id}/migration-queue/{batch_id}' if batch_id else None,
     })
 
 
+# NS Oct 2026 — progress / ETA of queued bulk migrations and evacuations
+@bp.route('/api/clusters/<cluster_id>/migration-queue', methods=['GET'])
+@bp.route('/api/clusters/<cluster_id>/migration-queue/<batch_id>', methods=['GET'])
+@require_auth(perms=['vm.migrate'])
+def get_migration_queue_api(cluster_id, batch_id=None):
+    ok, err = check_cluster_access(cluster_id)
+    if not ok: return err
+    mgr = cluster_managers.get(cluster_id)
+    if not mgr:
+        return jsonify({'error': 'Cluster not found'}), 404
+
+    # same per-VM scoping as the VM list — don't leak foreign guests' names,
+    # and count / estimate only the jobs the caller can see
+    user = load_users().get(request.session['user'], {})
+    user['username'] = request.session['user']
+    vis = get_vm_visibility(user, cluster_id, 'vm.view')
+    visible = lambda job: vis.can(job.vmid, job.type)
+
+    queue = get_migration_queue(mgr)
+    if batch_id:
+        batch = queue.batch_status(batch_id, visible=visible)
+        if batch is None:
+            return jsonify({'error': 'Batch not found'}), 404
+        return jsonify(batch)
+    return jsonify(queue.status(visible=visible))
+
+
 @bp.route('/api/clusters/<cluster_id>/fingerprint', methods=['GET'])
 @require_auth(perms=['cluster.view'])
 def get_cluster_fingerprint_api(cluster_id):
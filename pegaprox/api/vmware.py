@@ -1082,6 +1082,9 @@ def start_vmware_migration(vmware_id, vm_id):
     - wait_for_confirmation (#562): hold before the final switchover and wait for an
       explicit POST .../confirm-cutover (or .../cancel-cutover). Default false.
     - confirmation_timeout: seconds to wait at that gate before auto-aborting (default 86400).
+    - parallel_disks / per_datastore_streams / per_storage_streams: how many disks copy at
+      once overall, per source datastore and per target storage (1-16; defaults 4/2/2).
+    - sparse_copy: skip unallocated extents via CBT / qemu-img map (default true).
     """
     if vmware_id not in vmware_managers:
         return jsonify({'error': 'VMware server not found'}), 404
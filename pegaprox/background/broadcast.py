@@ -17,6 +17,7 @@ from pegaprox.globals import (
     vmware_managers,
 )
 from pegaprox.utils.realtime import broadcast_sse
+from pegaprox.utils.resource_state import publish_resources
 
 
 def _watched_clusters():
@@ -26,6 +27,16 @@ def _watched_clusters():
     from pegaprox.utils.realtime import watched_clusters
     return watched_clusters()
 
+
+def _feed_metrics_exporter(cid, node_status=None, vms=None):
+    """Hand this loop's node/guest data to the Prometheus exposition cache so a
+    scrape doesn't repeat the walk (no-op unless something is scraping)."""
+    try:
+        from pegaprox.api.metrics_exporter import feed_cluster
+        feed_cluster(cid, node_status=node_status, vms=vms)
+    except Exception as e:
+        logging.debug(f"[SSE] metrics feed for {cid} failed: {e}")
+
 # NS 2026-06-05 (#528 scaling): per-cluster "broadcast greenlet in flight" flags.
 # The loop spawns one greenlet per cluster every ~1s; a slow-but-not-erroring
 # cluster (the cooldown only catches erroring ones) would otherwise stack a fresh
@@ -50,6 +61,7 @@ def _get_recent_audit_tasks(cluster_id, cluster_name):
     try:
         from pegaprox.core.db import get_db
         db = get_db()
+        db.flush_audit()
         cursor = db.conn.cursor()
         # only last 2 minutes of portal + console events
         cutoff = (datetime.now() - __import__('datetime').timedelta(minutes=2)).isoformat()
@@ -97,6 +109,179 @@ def _get_recent_audit_tasks(cluster_id, cluster_name):
     except Exception:
         return []
 
+
+def broadcast_for_cluster(cid, mgr, loop_count=0):
+    """Broadcast updates for a single cluster - runs in own thread
+
+    NS Oct 2026 — lifted out of broadcast_resources_loop (was a closure over
+    loop_count) so benchmarks/ can drive one tick against a simulated cluster."""
+    try:
+        # NS May 2026 — when a cluster's API calls have been timing out,
+        # back off so we don't spawn 1 thread per second waiting on the
+        # same dead TCP connection. Cooldown is per-mgr.
+        now = time.time()
+        cooldown_until = getattr(mgr, '_sse_cooldown_until', 0)
+        if now < cooldown_until:
+            # still in cooldown — don't poke, but tell client we're alive
+            broadcast_sse('tasks', [], cid)
+            return
+        # NS: Feb 2026 - AUTO-RECONNECT disconnected clusters
+        # Without this, a network reload (ifreload) permanently kills the connection
+        # until PegaProx is restarted. Now we retry every 10 seconds.
+        # MK 2026-05-31 — log backoff. Previously the "is disconnected,
+        # attempting reconnect..." INFO line fired every 10s while a
+        # cluster stayed down → ~360 INFO entries per hour per dead
+        # cluster filling up the log file. Now: INFO on the first
+        # attempt + once every 50 attempts (~8min) for ongoing
+        # visibility, DEBUG in between. Reconnect cadence itself is
+        # unchanged.
+        if not mgr.is_connected:
+            if now - mgr._last_reconnect_attempt >= 10:
+                mgr._last_reconnect_attempt = now
+                attempt_count = getattr(mgr, '_reconnect_attempt_count', 0) + 1
+                mgr._reconnect_attempt_count = attempt_count
+                _attempt_log = (logging.info if attempt_count == 1 or attempt_count % 50 == 0
+                                else logging.debug)
+                _attempt_log(f"[SSE] Cluster '{cid}' is disconnected, "
+                             f"attempting reconnect (try #{attempt_count})...")
+                try:
+                    if mgr.connect_to_proxmox():
+                        logging.info(f"[SSE] Cluster '{cid}' reconnected successfully "
+                                     f"after {attempt_count} attempt(s)!")
+                        mgr._reconnect_attempt_count = 0
+                        mgr._sse_cooldown_until = 0  # clear any pending cooldown
+                        # only notify if last broadcast was >60s ago (avoid toast spam on WAN)
+                        last_notified = getattr(mgr, '_last_reconnect_broadcast', 0)
+                        if now - last_notified >= 60:
+                            mgr._last_reconnect_broadcast = now
+                            broadcast_sse('node_status', {
+                                'event': 'cluster_reconnected',
+                                'cluster_id': cid,
+                                'message': f'Connection to cluster restored'
+                            }, cid)
+                        # MK 2026-05-31 — push a fresh metrics
+                        # snapshot immediately so the UI flips
+                        # to "online" without waiting one full
+                        # loop tick. Worst case the next-loop
+                        # broadcast just re-confirms.
+                        try:
+                            _fresh = mgr.get_node_status()
+                            if _fresh:
+                                broadcast_sse('metrics', _fresh, cid)
+                        except Exception:
+                            pass
+                    else:
+                        logging.debug(f"[SSE] Cluster '{cid}' reconnect failed, will retry in 10s")
+                except Exception as e:
+                    logging.debug(f"[SSE] Cluster '{cid}' reconnect error: {e}")
+
+            if not mgr.is_connected:
+                # Still disconnected - send empty data so UI knows
+                broadcast_sse('tasks', [], cid)
+                return
+
+        # Get tasks every loop - but only broadcast if changed
+        # NS May 2026 — wrap in try/except so a single hung call
+        # doesn't kill the whole broadcast for this cluster.
+        try:
+            tasks = mgr.get_tasks(limit=50)
+        except Exception as e:
+            logging.debug(f"[SSE] {cid} get_tasks failed: {e}")
+            # cooldown so we don't hammer a hung host
+            mgr._sse_cooldown_until = time.time() + 10
+            broadcast_sse('tasks', [], cid)
+            return
+        task_list = tasks or []
+
+        # NS: Apr 2026 - Inject recent portal/audit actions as virtual tasks
+        # so admins can see what customers are doing in their task bar
+        try:
+            audit_tasks = _get_recent_audit_tasks(cid, mgr.config.name)
+            if audit_tasks:
+                task_list = task_list + audit_tasks
+        except Exception:
+            pass
+
+        # Deduplicate: only broadcast if tasks actually changed
+        task_hash = hash(tuple((t.get('upid',''), t.get('status','')) for t in task_list[:20]))
+        prev_hash = getattr(mgr, '_last_task_hash', None)
+        if task_hash != prev_hash or loop_count % 10 == 0:
+            mgr._last_task_hash = task_hash
+            broadcast_sse('tasks', task_list, cid)
+
+        # Get metrics every loop
+        metrics_ok = False
+        try:
+            metrics = mgr.get_node_status()
+            if metrics:
+                metrics_ok = True
+                _feed_metrics_exporter(cid, node_status=metrics)
+                # NS Jul 2026 — dedup like tasks (SSE-perf): node cpu/mem
+                # jitter every fetch, so bucket coarsely (status / 5% cpu /
+                # 2% mem) and only push when a node's bucketed state moved,
+                # or every 10th loop as a keepalive (slow fields + new clients).
+                try:
+                    m_hash = hash(tuple(
+                        (name, (d or {}).get('status', ''),
+                         int((d or {}).get('cpu_percent') or 0) // 5,
+                         int((d or {}).get('mem_percent') or 0) // 2)
+                        for name, d in sorted(metrics.items())))
+                except Exception:
+                    m_hash = None
+                if m_hash is None or m_hash != getattr(mgr, '_last_metrics_hash', None) or loop_count % 10 == 0:
+                    mgr._last_metrics_hash = m_hash
+                    broadcast_sse('metrics', metrics, cid)
+        except Exception as e:
+            # NS May 2026 — surface this in debug; cooldown if frequent
+            logging.debug(f"[SSE] {cid} get_node_status failed: {e}")
+            mgr._sse_cooldown_until = time.time() + 10
+
+        # NS: Resources every loop now (was every 2nd loop)
+        # This makes VM status update much faster in the UI
+        # NS: Fixed - was calling get_all_resources() which doesn't exist!
+        try:
+            resources = mgr.get_vm_resources()
+            if resources:
+                _feed_metrics_exporter(cid, vms=resources)
+                # NS Jul 2026 — dedup like tasks (SSE-perf): bucket the
+                # noisy cpu/mem and only send when a guest's status/node/
+                # name or bucketed load changed, or every 10th loop
+                # (keepalive for ip/tags/exact load).
+                # NS Oct 2026 — and send only the rows that changed
+                # (`resources_delta`, see utils/resource_state). New
+                # clients get a snapshot on connect/subscribe, and a client
+                # that spots a seq gap asks /api/sse/resync. The
+                # after-action push_immediate_update() forces its frame
+                # out so action feedback stays instant.
+                publish_resources(cid, resources, force=(loop_count % 10 == 0))
+                # NS: Feb 2026 - Reset stale counter on success
+                mgr._consecutive_empty_responses = 0
+            elif metrics_ok:
+                # MK Jun 2026 (#554 Thermal-spearhead): get_vm_resources()
+                # also returns [] for a node that simply has no VMs/CTs — not
+                # only for a stale ticket. If node-status came back this same
+                # loop the ticket is clearly valid, so an empty guest list is
+                # legitimate. Don't churn an endless ~33s re-auth loop on an
+                # idle/empty node; only treat empty as stale when metrics are
+                # ALSO empty (the real 401-without-exception case).
+                mgr._consecutive_empty_responses = 0
+            else:
+                # NS: Feb 2026 - Track empty responses while "connected"
+                # This catches stale tickets (Proxmox returns 401 but no exception)
+                mgr._consecutive_empty_responses = getattr(mgr, '_consecutive_empty_responses', 0) + 1
+                if mgr._consecutive_empty_responses >= 30:  # ~30s of empty data, WAN needs more tolerance
+                    logging.warning(f"[SSE] Cluster '{cid}' returning empty data despite being 'connected' - forcing re-auth")
+                    mgr._consecutive_empty_responses = 0
+                    mgr.is_connected = False  # Force reconnect on next loop
+        except:
+            pass
+
+    except Exception as e:
+        logging.debug(f"Error broadcasting updates for {cid}: {e}")
+    finally:
+        _broadcast_inflight[cid] = False
+
+
 def broadcast_resources_loop():
     """Periodically broadcast resource updates to all connected SSE clients
     
@@ -150,181 +335,6 @@ def broadcast_resources_loop():
                             logging.debug(f"[VMware:{vmw_id}] keepalive error: {e}")
                 threading.Thread(target=_vmware_keepalive_tick, daemon=True).start()
             
-            def broadcast_for_cluster(cid, mgr):
-                """Broadcast updates for a single cluster - runs in own thread"""
-                try:
-                    # NS May 2026 — when a cluster's API calls have been timing out,
-                    # back off so we don't spawn 1 thread per second waiting on the
-                    # same dead TCP connection. Cooldown is per-mgr.
-                    now = time.time()
-                    cooldown_until = getattr(mgr, '_sse_cooldown_until', 0)
-                    if now < cooldown_until:
-                        # still in cooldown — don't poke, but tell client we're alive
-                        broadcast_sse('tasks', [], cid)
-                        return
-                    # NS: Feb 2026 - AUTO-RECONNECT disconnected clusters
-                    # Without this, a network reload (ifreload) permanently kills the connection
-                    # until PegaProx is restarted. Now we retry every 10 seconds.
-                    # MK 2026-05-31 — log backoff. Previously the "is disconnected,
-                    # attempting reconnect..." INFO line fired every 10s while a
-                    # cluster stayed down → ~360 INFO entries per hour per dead
-                    # cluster filling up the log file. Now: INFO on the first
-                    # attempt + once every 50 attempts (~8min) for ongoing
-                    # visibility, DEBUG in between. Reconnect cadence itself is
-                    # unchanged.
-                    if not mgr.is_connected:
-                        if now - mgr._last_reconnect_attempt >= 10:
-                            mgr._last_reconnect_attempt = now
-                            attempt_count = getattr(mgr, '_reconnect_attempt_count', 0) + 1
-                            mgr._reconnect_attempt_count = attempt_count
-                            _attempt_log = (logging.info if attempt_count == 1 or attempt_count % 50 == 0
-                                            else logging.debug)
-                            _attempt_log(f"[SSE] Cluster '{cid}' is disconnected, "
-                                         f"attempting reconnect (try #{attempt_count})...")
-                            try:
-                                if mgr.connect_to_proxmox():
-                                    logging.info(f"[SSE] Cluster '{cid}' reconnected successfully "
-                                                 f"after {attempt_count} attempt(s)!")
-                                    mgr._reconnect_attempt_count = 0
-                                    mgr._sse_cooldown_until = 0  # clear any pending cooldown
-                                    # only notify if last broadcast was >60s ago (avoid toast spam on WAN)
-                                    last_notified = getattr(mgr, '_last_reconnect_broadcast', 0)
-                                    if now - last_notified >= 60:
-                                        mgr._last_reconnect_broadcast = now
-                                        broadcast_sse('node_status', {
-                                            'event': 'cluster_reconnected',
-                                            'cluster_id': cid,
-                                            'message': f'Connection to cluster restored'
-                                        }, cid)
-                                    # MK 2026-05-31 — push a fresh metrics
-                                    # snapshot immediately so the UI flips
-                                    # to "online" without waiting one full
-                                    # loop tick. Worst case the next-loop
-                                    # broadcast just re-confirms.
-                                    try:
-                                        _fresh = mgr.get_node_status()
-                                        if _fresh:
-                                            broadcast_sse('metrics', _fresh, cid)
-                                    except Exception:
-                                        pass
-                                else:
-                                    logging.debug(f"[SSE] Cluster '{cid}' reconnect failed, will retry in 10s")
-                            except Exception as e:
-                                logging.debug(f"[SSE] Cluster '{cid}' reconnect error: {e}")
-                        
-                        if not mgr.is_connected:
-                            # Still disconnected - send empty data so UI knows
-                            broadcast_sse('tasks', [], cid)
-                            return
-                    
-                    # Get tasks every loop - but only broadcast if changed
-                    # NS May 2026 — wrap in try/except so a single hung call
-                    # doesn't kill the whole broadcast for this cluster.
-                    try:
-                        tasks = mgr.get_tasks(limit=50)
-                    except Exception as e:
-                        logging.debug(f"[SSE] {cid} get_tasks failed: {e}")
-                        # cooldown so we don't hammer a hung host
-                        mgr._sse_cooldown_until = time.time() + 10
-                        broadcast_sse('tasks', [], cid)
-                        return
-                    task_list = tasks or []
-
-                    # NS: Apr 2026 - Inject recent portal/audit actions as virtual tasks
-                    # so admins can see what customers are doing in their task bar
-                    try:
-                        audit_tasks = _get_recent_audit_tasks(cid, mgr.config.name)
-                        if audit_tasks:
-                            task_list = task_list + audit_tasks
-                    except Exception:
-                        pass
-
-                    # Deduplicate: only broadcast if tasks actually changed
-                    task_hash = hash(tuple((t.get('upid',''), t.get('status','')) for t in task_list[:20]))
-                    prev_hash = getattr(mgr, '_last_task_hash', None)
-                    if task_hash != prev_hash or loop_count % 10 == 0:
-                        mgr._last_task_hash = task_hash
-                        broadcast_sse('tasks', task_list, cid)
-                    
-                    # Get metrics every loop
-                    metrics_ok = False
-                    try:
-                        metrics = mgr.get_node_status()
-                        if metrics:
-                            metrics_ok = True
-                            # NS Jul 2026 — dedup like tasks (SSE-perf): node cpu/mem
-                            # jitter every fetch, so bucket coarsely (status / 5% cpu /
-                            # 2% mem) and only push when a node's bucketed state moved,
-                            # or every 10th loop as a keepalive (slow fields + new clients).
-                            try:
-                                m_hash = hash(tuple(
-                                    (name, (d or {}).get('status', ''),
-                                     int((d or {}).get('cpu_percent') or 0) // 5,
-                                     int((d or {}).get('mem_percent') or 0) // 2)
-                                    for name, d in sorted(metrics.items())))
-                            except Exception:
-                                m_hash = None
-                            if m_hash is None or m_hash != getattr(mgr, '_last_metrics_hash', None) or loop_count % 10 == 0:
-                                mgr._last_metrics_hash = m_hash
-                                broadcast_sse('metrics', metrics, cid)
-                    except Exception as e:
-                        # NS May 2026 — surface this in debug; cooldown if frequent
-                        logging.debug(f"[SSE] {cid} get_node_status failed: {e}")
-                        mgr._sse_cooldown_until = time.time() + 10
-                    
-                    # NS: Resources every loop now (was every 2nd loop)
-                    # This makes VM status update much faster in the UI
-                    # NS: Fixed - was calling get_all_resources() which doesn't exist!
-                    try:
-                        resources = mgr.get_vm_resources()
-                        if resources:
-                            # NS Jul 2026 — dedup like tasks (SSE-perf). At 10k VMs the
-                            # full list is a ~3MB json.dumps every second; bucket the noisy
-                            # cpu/mem and only broadcast when a guest's status/node/name or
-                            # bucketed load changed, or every 10th loop (keepalive for
-                            # ip/tags + newly-connected clients). Cuts steady-state hub
-                            # serialize + SSE bandwidth ~90% on a quiet estate. The
-                            # after-action push_immediate_update() bypasses this gate
-                            # (calls broadcast_sse directly) so action feedback stays instant.
-                            try:
-                                r_hash = hash(tuple(
-                                    (r.get('vmid'), r.get('status', ''), r.get('node', ''),
-                                     r.get('name', ''),
-                                     int(r.get('cpu_percent') or 0) // 5,
-                                     int(r.get('mem_percent') or 0) // 2)
-                                    for r in resources))
-                            except Exception:
-                                r_hash = None
-                            if r_hash is None or r_hash != getattr(mgr, '_last_resource_hash', None) or loop_count % 10 == 0:
-                                mgr._last_resource_hash = r_hash
-                                broadcast_sse('resources', resources, cid)
-                            # NS: Feb 2026 - Reset stale counter on success
-                            mgr._consecutive_empty_responses = 0
-                        elif metrics_ok:
-                            # MK Jun 2026 (#554 Thermal-spearhead): get_vm_resources()
-                            # also returns [] for a node that simply has no VMs/CTs — not
-                            # only for a stale ticket. If node-status came back this same
-                            # loop the ticket is clearly valid, so an empty guest list is
-                            # legitimate. Don't churn an endless ~33s re-auth loop on an
-                            # idle/empty node; only treat empty as stale when metrics are
-                            # ALSO empty (the real 401-without-exception case).
-                            mgr._consecutive_empty_responses = 0
-                        else:
-                            # NS: Feb 2026 - Track empty responses while "connected"
-                            # This catches stale tickets (Proxmox returns 401 but no exception)
-                            mgr._consecutive_empty_responses = getattr(mgr, '_consecutive_empty_responses', 0) + 1
-                            if mgr._consecutive_empty_responses >= 30:  # ~30s of empty data, WAN needs more tolerance
-                                logging.warning(f"[SSE] Cluster '{cid}' returning empty data despite being 'connected' - forcing re-auth")
-                                mgr._consecutive_empty_responses = 0
-                                mgr.is_connected = False  # Force reconnect on next loop
-                    except:
-                        pass
-                        
-                except Exception as e:
-                    logging.debug(f"Error broadcasting updates for {cid}: {e}")
-                finally:
-                    _broadcast_inflight[cid] = False
-
             # NS: Run each cluster broadcast in its own thread with 8s max
             # Prevents one slow/timing-out cluster from blocking all SSE updates
             # NS 2026-06-05 (#528 scaling): only poll clusters someone is actually
@@ -341,7 +351,7 @@ def broadcast_resources_loop():
                 if _broadcast_inflight.get(cluster_id):
                     continue
                 _broadcast_inflight[cluster_id] = True
-                t = threading.Thread(target=broadcast_for_cluster, args=(cluster_id, manager), daemon=True)
+                t = threading.Thread(target=broadcast_for_cluster, args=(cluster_id, manager, loop_count), daemon=True)
                 t.start()
                 threads.append(t)
             
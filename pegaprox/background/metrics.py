@@ -129,31 +129,26 @@ def _node_hw_summary_redfish(mgr, cluster_id, node):
 
 
 def load_metrics_history():
-    """Load historical metrics from SQLite database.
+    """Load historical metrics (cluster name + totals, all clusters).
 
     NS 2026-06-05 (#528 scaling): this SELECTed up to 1000 snapshot rows and
     json.loads'd each — multi-MB blobs at fleet scale — ON THE HUB, a multi-second
     freeze per report (reports.py calls this up to 3× per report). Now the fetch
     + parse run off-hub via run_heavy_read, with a short TTL cache so the repeated
     calls within a report (and back-to-back reports) coalesce onto one query.
+
+    NS Oct 2026: reads the 'cluster' series of the time-series store instead of
+    the blob table — reports only use name + totals, so node/VM chunks are never
+    touched. Window ≈ the old 1000-snapshot cap (~3.5 days at 5-min cadence).
     """
     try:
-        from pegaprox.core.dbcrypto import run_heavy_read
-
-        def _parse(rows):
-            out = []
-            for row in rows:
-                try:
-                    data = json.loads(row['data'])
-                    data['timestamp'] = row['timestamp']
-                    out.append(data)
-                except Exception:
-                    pass
-            return out
-
-        snapshots = run_heavy_read(
-            'SELECT timestamp, data FROM metrics_history ORDER BY timestamp DESC LIMIT 1000',
-            cache_key='mh_reports_1000', transform=_parse)
+        from pegaprox.core import tsdb
+        by_ts = {}
+        for cluster_id, snaps in (tsdb.load_cluster_totals(1000 * 300 / 86400) or {}).items():
+            for ts_unix, cd in snaps:
+                by_ts.setdefault(ts_unix, {})[cluster_id] = {'name': cd.get('name'), 'totals': cd.get('totals') or {}}
+        snapshots = [{'timestamp': datetime.fromtimestamp(ts).isoformat(), 'clusters': by_ts[ts]}
+                     for ts in sorted(by_ts, reverse=True)]
         return {'snapshots': snapshots, 'last_cleanup': None}
     except Exception as e:
         logging.error(f"Error loading metrics history from database: {e}")
@@ -204,36 +199,29 @@ def _retention_days():
 
 
 def save_metrics_snapshot(snapshot):
-    """Save a single metrics snapshot to SQLite.
+    """Save a single metrics snapshot.
 
     Cadence: every 5 min. Retention defaults to 30 days; override via
-    PEGAPROX_METRICS_RETENTION_DAYS (7..365). The data column is a JSON
-    blob of the per-cluster snapshot — see collect_metrics_snapshot for
-    the shape. Insights / Cost / Power / Prometheus exporter / the new
-    `/insights/history` endpoint all read from this table so it's a
-    single source of truth.
-
-    NS 2026-06-05 (#528 scaling): at 30 clusters / 100+ nodes the data blob is
-    multi-MB, and json.dumps + SQLCipher-encrypt + INSERT + prune all ran on the
-    gevent hub every 5 min — a periodic freeze. Now the whole thing (incl. the
-    json.dumps) runs off-hub on a fresh connection via run_heavy_write, and the
-    prune is an indexed timestamp DELETE instead of a full-table anti-join.
+    PEGAPROX_METRICS_RETENTION_DAYS (7..365). See collect_metrics_snapshot for
+    the shape. Insights / Cost / Power / Prometheus exporter / the
+    `/insights/history` endpoint all read this history so it's a single source
+    of truth.
+
+    NS 2026-06-05 (#528 scaling): runs off-hub on a fresh connection, the prune
+    is an indexed range DELETE.
+
+    NS Oct 2026: written to the columnar metrics_series store (core/tsdb.py)
+    instead of one multi-MB JSON blob per snapshot, so readers fetch only the
+    cluster/entity they need. The legacy metrics_history table is no longer
+    written; it is backfilled into the store once and then just ages out.
     """
     try:
+        from pegaprox.core import tsdb
         from pegaprox.core.dbcrypto import run_heavy_write
         from datetime import timedelta
-        timestamp = snapshot.get('timestamp', datetime.now().isoformat())
+        tsdb.append_snapshot(snapshot, retention_days=_retention_days())
         cutoff = (datetime.now() - timedelta(days=_retention_days())).isoformat()
-
-        def _build():
-            # json.dumps of the multi-MB blob happens HERE, in the worker thread
-            data = json.dumps({k: v for k, v in snapshot.items() if k != 'timestamp'})
-            return [
-                ("INSERT INTO metrics_history (timestamp, data) VALUES (?, ?)", (timestamp, data)),
-                # indexed prune (idx_metrics_timestamp) — keep last N days
-                ("DELETE FROM metrics_history WHERE timestamp < ?", (cutoff,)),
-            ]
-        run_heavy_write(build=_build)
+        run_heavy_write([("DELETE FROM metrics_history WHERE timestamp < ?", (cutoff,))])
     except Exception as e:
         logging.error(f"Error saving metrics snapshot: {e}")
 
@@ -448,7 +436,14 @@ def metrics_collector_loop():
     updated for SQLite
     """
     global _metrics_collector_running
-    
+
+    # one-time import of pre-tsdb JSON-blob history (no-op once done)
+    try:
+        from pegaprox.core import tsdb
+        tsdb.backfill_from_legacy()
+    except Exception as e:
+        logging.warning(f"Metrics history backfill skipped: {e}")
+
     while _metrics_collector_running:
         try:
             snapshot = collect_metrics_snapshot()
@@ -5,19 +5,46 @@ Background scheduled task execution.
 """
 
 import os
-import time
 import json
 import logging
 from pegaprox.utils.sanitization import sanitize_log_message as _sl  # CWE-117 tainted-log sanitiser
-import threading
 import uuid
 from datetime import datetime, timedelta
 
 from pegaprox.constants import SCHEDULED_TASKS_FILE
-from pegaprox.globals import cluster_managers, _scheduler_running, _scheduler_thread
+from pegaprox.globals import cluster_managers
 from pegaprox.core.db import get_db
+from pegaprox.core.job_scheduler import (
+    JobSource, next_at, not_before, parse_hhmm,
+    register as register_job_source, reload as reload_jobs,
+)
 from pegaprox.utils.audit import log_audit
 
+def _row_to_task(row):
+    task = {
+        'id': row['id'],
+        'cluster_id': row['cluster_id'],
+        'name': row['name'],
+        'task_type': row['task_type'],
+        'schedule': row['schedule'],
+        'config': json.loads(row['config'] or '{}'),
+        'enabled': bool(row['enabled']),
+        'last_run': row['last_run'],
+        'next_run': row['next_run'],
+    }
+    # NS Oct 2026 — save_scheduled_tasks packs type/time/day into the schedule
+    # column; unpack them again or every task reads back as "daily 02:00"
+    try:
+        sched = json.loads(row['schedule'] or '{}')
+    except (TypeError, ValueError):
+        sched = {}
+    if isinstance(sched, dict):
+        for key in ('schedule_type', 'schedule_time', 'schedule_day'):
+            if key in sched:
+                task[key] = sched[key]
+    return task
+
+
 # NS: this was buried somewhere around line 40k in the monolith, nobody could find it
 def load_scheduled_tasks():
     """Load scheduled tasks from SQLite database
@@ -29,19 +56,7 @@ def load_scheduled_tasks():
         cursor = db.conn.cursor()
         cursor.execute('SELECT * FROM scheduled_tasks')
         
-        tasks = []
-        for row in cursor.fetchall():
-            tasks.append({
-                'id': row['id'],
-                'cluster_id': row['cluster_id'],
-                'name': row['name'],
-                'task_type': row['task_type'],
-                'schedule': row['schedule'],
-                'config': json.loads(row['config'] or '{}'),
-                'enabled': bool(row['enabled']),
-                'last_run': row['last_run'],
-                'next_run': row['next_run'],
-            })
+        tasks = [_row_to_task(row) for row in cursor.fetchall()]
         
         return {'tasks': tasks}
     except Exception as e:
@@ -94,69 +109,13 @@ def save_scheduled_tasks(config):
             ))
         
         db.conn.commit()
+        # table rewritten wholesale → re-read it into the job heap
+        reload_jobs('scheduled_task')
         return True
     except Exception as e:
         logging.error(f"Error saving scheduled tasks: {e}")
         return False
 
-def run_scheduled_tasks():
-    """Check and execute due scheduled tasks
-    
-    LW: Runs every minute, checks if any tasks are due
-    Supported actions: start, stop, restart, snapshot, backup
-    """
-    config = load_scheduled_tasks()
-    current_time = datetime.now()
-    
-    for task in config.get('tasks', []):
-        if not task.get('enabled', True):
-            continue
-        
-        # Check if task is due
-        schedule_type = task.get('schedule_type', 'daily')
-        schedule_time = task.get('schedule_time', '02:00')
-        schedule_day = task.get('schedule_day', 0)  # 0=Monday for weekly
-        last_run = task.get('last_run')
-        
-        should_run = False
-        
-        try:
-            hour, minute = map(int, schedule_time.split(':'))
-            
-            if schedule_type == 'hourly':
-                # Run every hour at specified minute
-                if current_time.minute == minute:
-                    if not last_run or (datetime.fromisoformat(last_run) + timedelta(hours=1)) <= current_time:
-                        should_run = True
-                        
-            elif schedule_type == 'daily':
-                # Run once a day at specified time
-                if current_time.hour == hour and current_time.minute == minute:
-                    if not last_run or datetime.fromisoformat(last_run).date() < current_time.date():
-                        should_run = True
-                        
-            elif schedule_type == 'weekly':
-                # Run once a week on specified day and time
-                if current_time.weekday() == schedule_day and current_time.hour == hour and current_time.minute == minute:
-                    if not last_run or (datetime.fromisoformat(last_run) + timedelta(days=7)) <= current_time:
-                        should_run = True
-                        
-            elif schedule_type == 'monthly':
-                # Run on specified day of month
-                if current_time.day == schedule_day and current_time.hour == hour and current_time.minute == minute:
-                    if not last_run or datetime.fromisoformat(last_run).month != current_time.month:
-                        should_run = True
-                        
-        except Exception as e:
-            logging.error(f"Error parsing schedule for task {task.get('id')}: {e}")
-            continue
-        
-        if should_run:
-            execute_scheduled_task(task)
-            # Update last_run
-            task['last_run'] = current_time.isoformat()
-            save_scheduled_tasks(config)
-
 def execute_scheduled_task(task):
     """Execute a scheduled task"""
     cluster_id = task.get('cluster_id', '')
@@ -195,29 +154,82 @@ def execute_scheduled_task(task):
         logging.error(f"Scheduled task failed: {e}")
         log_audit('scheduler', 'scheduled_task.failed', f"Task '{task.get('name')}' failed: {e}")
 
-# Scheduler thread
-_scheduler_thread = None
-_scheduler_running = False
+class _TaskSource(JobSource):
+    """scheduled_tasks rows on the shared job scheduler (core/job_scheduler.py)
+    — replaces the old 60s scheduler_loop.
+    Supported actions: start, stop, restart, snapshot, backup"""
 
-def scheduler_loop():
-    """Background thread that runs scheduled tasks"""
-    global _scheduler_running
-    _scheduler_running = True
-    
-    while _scheduler_running:
+    kind = 'scheduled_task'
+
+    def load(self, job_id=None):
+        cursor = get_db().conn.cursor()
+        if job_id is None:
+            cursor.execute('SELECT * FROM scheduled_tasks WHERE enabled = 1')
+            return {row['id']: _row_to_task(row) for row in cursor.fetchall()}
+        cursor.execute('SELECT * FROM scheduled_tasks WHERE id = ? AND enabled = 1', (job_id,))
+        row = cursor.fetchone()
+        return _row_to_task(row) if row else None
+
+    def next_fire(self, task, after):
+        schedule_type = task.get('schedule_type', 'daily')
+        hhmm = parse_hhmm(task.get('schedule_time', '02:00'), default=None)
+        if hhmm is None:
+            logging.error(f"Error parsing schedule for task {task.get('id')}: {task.get('schedule_time')!r}")
+            return None
+        hour, minute = hhmm
+        try:
+            schedule_day = int(task.get('schedule_day', 0))  # 0=Monday for weekly
+        except (TypeError, ValueError):
+            schedule_day = 0
+        last_run = task.get('last_run')
+
+        if schedule_type == 'hourly':
+            # Run every hour at specified minute
+            after = not_before(after, last_run)
+            nxt = after.replace(minute=minute, second=0, microsecond=0)
+            return nxt if nxt > after else nxt + timedelta(hours=1)
+        if schedule_type == 'daily':
+            # Run once a day at specified time
+            return next_at(self._after_period(after, last_run, 'day'), hour, minute)
+        if schedule_type == 'weekly':
+            # Run once a week on specified day and time
+            return next_at(self._after_period(after, last_run, 'day'), hour, minute,
+                           lambda d: d.weekday() == schedule_day)
+        if schedule_type == 'monthly':
+            # Run on specified day of month
+            return next_at(self._after_period(after, last_run, 'month'), hour, minute,
+                           lambda d: d.day == schedule_day)
+        return None
+
+    @staticmethod
+    def _after_period(after, last_run, period):
+        # at most one run per day / month: skip to the end of the one last_run is in
+        if not last_run:
+            return after
+        try:
+            last = datetime.fromisoformat(last_run)
+        except (TypeError, ValueError):
+            return after
+        if period == 'month':
+            nxt = (last.replace(day=28) + timedelta(days=4)).replace(day=1)
+            end = datetime.combine(nxt.date(), datetime.min.time()) - timedelta(microseconds=1)
+        else:
+            end = datetime.combine(last.date(), datetime.max.time())
+        return max(after, end)
+
+    def run(self, task, fire_at):
+        execute_scheduled_task(task)
+        # Update last_run
         try:
-            run_scheduled_tasks()
+            db = get_db()
+            db.conn.cursor().execute('UPDATE scheduled_tasks SET last_run = ? WHERE id = ?',
+                                     (datetime.now().isoformat(), task['id']))
+            db.conn.commit()
         except Exception as e:
-            logging.error(f"Scheduler error: {e}")
-        
-        # Check every 60 seconds (was 30 but that caused duplicate executions when tasks
-        # took longer than the interval - we lost 4h debugging that one)
-        time.sleep(60)
+            logging.error(f"Error recording scheduled task run: {e}")
 
-def start_scheduler_thread():
-    global _scheduler_thread
-    if _scheduler_thread is None or not _scheduler_thread.is_alive():
-        _scheduler_thread = threading.Thread(target=scheduler_loop, daemon=True)
-        _scheduler_thread.start()
-        logging.info("Task scheduler thread started")
 
+def start_scheduler_thread():
+    # NS Oct 2026 — no thread of its own any more, the job scheduler runs it
+    register_job_source(_TaskSource())
+    logging.info("Task scheduler registered")
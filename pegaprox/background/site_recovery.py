@@ -9,6 +9,7 @@ import requests
 from datetime import datetime
 
 from pegaprox.core.db import get_db
+from pegaprox.core import dr_readiness
 from pegaprox.globals import cluster_managers
 from pegaprox.utils.audit import log_audit
 from pegaprox.utils.realtime import broadcast_sse
@@ -778,24 +779,10 @@ def _heartbeat_check():
         if elapsed >= timeout:
             # NS Apr 2026: before auto-failover, verify every VM in plan has a healthy recent
             # replication. Otherwise we'd start VMs that were never copied, or worse, stale copies.
-            vms = db.query("SELECT * FROM site_recovery_vms WHERE plan_id = ?", (plan_id,))
-            blockers = []
-            for vm_row in vms:
-                vm = dict(vm_row)
-                repl_id = (vm.get('replication_job_id') or '').strip()
-                if not repl_id:
-                    blockers.append(f"VM {vm['vmid']} has no replication job linked")
-                    continue
-                repl = db.query_one(
-                    "SELECT enabled, last_status, last_run FROM cross_cluster_replications WHERE id = ?",
-                    (repl_id,)
-                )
-                if not repl:
-                    blockers.append(f"VM {vm['vmid']}: replication job {repl_id} not found")
-                elif not repl['enabled']:
-                    blockers.append(f"VM {vm['vmid']}: replication disabled")
-                elif repl['last_status'] != 'ok':
-                    blockers.append(f"VM {vm['vmid']}: last replication status={repl['last_status'] or 'never ran'}")
+            # NS Oct 2026: answered by the readiness index (core/dr_readiness.py), which follows
+            # replication runs as they finish — no per-VM lookup here. Same checks as before;
+            # replica age is not one (it only grows while the source is down).
+            blockers = dr_readiness.blockers(plan_id)
 
             if blockers:
                 logger.error(f"[SR] BLOCKING auto-failover for '{_sl(plan['name'])}' — replication unhealthy: {'; '.join(blockers[:5])}")
@@ -0,0 +1,430 @@
+# -*- coding: utf-8 -*-
+"""
+PegaProx API transport - Layer 4
+Connection engine behind PegaProxManager's Proxmox API session.
+
+NS Oct 2026: the manager used ONE requests session with one 64-slot pool for
+everything. Under load that showed up in the API latency dashboard as:
+  * a slow node's per-node calls (status, rrddata, agent) holding keep-alive
+    slots the cluster-level calls needed → pool overflow → throwaway
+    connections (pool_block=False) → fresh TCP + TLS handshake each;
+  * full TLS handshakes after pveproxy's idle close, because urllib3's
+    default context disables tickets and never offers the old session;
+  * the same GET (e.g. /cluster/resources from the broadcast loop, a dashboard
+    poll and the exporter at once) going out two or three times concurrently.
+
+The transport hands the manager a requests.Session (so none of the ~400 call
+sites change) that routes per-node calls to per-node keep-alive pools sized
+from observed concurrency, resumes TLS sessions, lets identical in-flight GETs
+share one response, and records per-endpoint latency histograms for every
+request — not only the ones that go through _api_get & co.
+
+Pluggable: transports are looked up by name (PEGAPROX_API_TRANSPORT, default
+'pooled'). A gevent-native HTTP client plugs in by subclassing PooledTransport
+and overriding make_adapter() to return a requests transport adapter built on
+that client; pools, coalescing and histograms stay the same. Register it with
+register_transport().
+"""
+
+import os
+import re
+import ssl
+import time
+import logging
+import threading
+import weakref
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ms; +Inf implied. Covers LAN (single-digit ms) to a struggling node (10s timeout)
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+_MAX_ENDPOINTS = 200           # histogram keys per manager; the rest land in 'other'
+_NODE_PATH_RE = re.compile(r'^/api2/json/nodes/([^/]+)/')
+
+API_POOL_MAX = max(4, int(os.environ.get('PEGAPROX_API_POOL_MAX', '64')))
+_CLUSTER_POOL_INITIAL = 16
+_NODE_POOL_INITIAL = 4
+_POOL_RESIZE_INTERVAL = 30.0
+COALESCE_GETS = os.environ.get('PEGAPROX_API_COALESCE', '1') not in ('0', 'false', 'no')
+
+
+def endpoint_template(url):
+    """/api2/json/nodes/pve1/qemu/100/status → /nodes/{name}/qemu/{id}/status"""
+    try:
+        path = urlsplit(url).path
+        segs = [s for s in path.split('/') if s and s not in ('api2', 'json')]
+        tpl = []
+        for i, s in enumerate(segs):
+            if s.isdigit():
+                tpl.append('{id}')
+            elif i > 0 and segs[i - 1] in ('nodes', 'storage', 'pools', 'sdn'):
+                tpl.append('{name}')
+            else:
+                tpl.append(s)
+        return '/' + '/'.join(tpl) if tpl else path[:60]
+    except Exception:
+        return url[:60]
+
+
+class LatencyHistograms:
+    """Cumulative per-(method, endpoint) latency histograms (Prometheus-style buckets)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def observe(self, method, endpoint, duration_ms, status):
+        with self._lock:
+            key = (method, endpoint)
+            h = self._data.get(key)
+            if h is None:
+                if len(self._data) >= _MAX_ENDPOINTS:
+                    key = (method, 'other')
+                    h = self._data.get(key)
+                if h is None:
+                    h = self._data[key] = {'counts': [0] * (len(self.buckets) + 1),
+                                           'count': 0, 'sum_ms': 0.0, 'errors': 0}
+            i = 0
+            while i < len(self.buckets) and duration_ms > self.buckets[i]:
+                i += 1
+            h['counts'][i] += 1
+            h['count'] += 1
+            h['sum_ms'] += duration_ms
+            if not status or status >= 400:
+                h['errors'] += 1
+
+    def snapshot(self):
+        """{(method, endpoint): {'buckets': [(le_ms, cumulative), ...], 'count', 'sum_ms', 'errors'}}
+        — the last bucket's le is None (+Inf)."""
+        with self._lock:
+            items = [(k, dict(v, counts=list(v['counts']))) for k, v in self._data.items()]
+        out = {}
+        for key, h in items:
+            cum, rows = 0, []
+            for le, c in zip(self.buckets + (None,), h['counts']):
+                cum += c
+                rows.append((le, cum))
+            out[key] = {'buckets': rows, 'count': h['count'], 'sum_ms': h['sum_ms'], 'errors': h['errors']}
+        return out
+
+
+class _ResumingSSLContext(ssl.SSLContext):
+    """Client context that offers the previous TLS session to the same peer.
+
+    urllib3's default context sets OP_NO_TICKET and never passes `session=`,
+    so every new keep-alive connection (pool growth, pveproxy's idle close)
+    paid a full handshake. Sessions are keyed by peer address; TLS 1.3 tickets
+    arrive after the handshake, so the session is harvested from the previous
+    socket lazily at the next connect rather than right after wrap.
+    """
+
+    def __new__(cls, *args, **kwargs):
+        return super().__new__(cls, ssl.PROTOCOL_TLS_CLIENT)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self._resume_lock = threading.Lock()
+        self._sessions = {}        # peer -> SSLSession
+        self._last_socks = {}      # peer -> weakref(SSLSocket)
+        self._verify_loaded = set()
+        self.handshakes = 0
+        self.resumed = 0
+
+    def load_verify_locations(self, cafile=None, capath=None, cadata=None):
+        # urllib3 reloads the CA file into the (shared) context on every connect
+        key = (cafile, capath, cadata if isinstance(cadata, (str, bytes)) else None)
+        if key in self._verify_loaded:
+            return
+        super().load_verify_locations(cafile, capath, cadata)
+        self._verify_loaded.add(key)
+
+    def wrap_socket(self, sock, *args, server_hostname=None, session=None, **kwargs):
+        try:
+            peer = tuple(sock.getpeername()[:2])
+        except Exception:
+            peer = server_hostname
+        if session is None:
+            with self._resume_lock:
+                prev = self._last_socks.get(peer)
+                prev = prev() if prev is not None else None
+                fresh = getattr(prev, 'session', None) if prev is not None else None
+                if fresh is not None:
+                    self._sessions[peer] = fresh
+                session = self._sessions.get(peer)
+        try:
+            ssock = super().wrap_socket(sock, *args, server_hostname=server_hostname, session=session, **kwargs)
+        except (ssl.SSLError, ValueError):
+            if session is None:
+                raise
+            # stale / foreign session object → forget it, do a full handshake
+            with self._resume_lock:
+                self._sessions.pop(peer, None)
+            ssock = super().wrap_socket(sock, *args, server_hostname=server_hostname, **kwargs)
+        with self._resume_lock:
+            self.handshakes += 1
+            if getattr(ssock, 'session_reused', False):
+                self.resumed += 1
+            try:
+                self._last_socks[peer] = weakref.ref(ssock)
+            except TypeError:
+                pass
+            s = getattr(ssock, 'session', None)
+            if s is not None:
+                self._sessions[peer] = s
+        return ssock
+
+
+def make_ssl_context(ssl_verify):
+    """Resumption-capable client context with urllib3's defaults minus OP_NO_TICKET."""
+    ctx = _ResumingSSLContext()
+    ctx.minimum_version = ssl.TLSVersion.TLSv1_2
+    ctx.options |= ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3 | ssl.OP_NO_COMPRESSION
+    if not ssl_verify:
+        # MK (#88): IP-based hosts with self-signed certs
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+    return ctx
+
+
+class _PoolAdapter(HTTPAdapter):
+    """HTTPAdapter on the transport's shared resuming context, tracking in-flight
+    requests so the pool can be grown to the concurrency actually seen."""
+
+    def __init__(self, ssl_context, maxsize):
+        self._ssl_context = ssl_context
+        self.maxsize = maxsize
+        self.inflight = 0
+        self.peak = 0
+        self.overflow = 0
+        self._count_lock = threading.Lock()
+        super().__init__(pool_connections=4, pool_maxsize=maxsize, pool_block=False, max_retries=0)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = self._ssl_context
+        return super().init_poolmanager(*args, **kwargs)
+
+    def send(self, request, *args, **kwargs):
+        with self._count_lock:
+            self.inflight += 1
+            if self.inflight > self.peak:
+                self.peak = self.inflight
+            if self.inflight > self.maxsize:
+                self.overflow += 1     # this one gets a throwaway connection
+        try:
+            return super().send(request, *args, **kwargs)
+        finally:
+            with self._count_lock:
+                self.inflight -= 1
+
+
+class _Inflight:
+    __slots__ = ('event', 'response', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class TransportSession(requests.Session):
+    """requests.Session that picks a per-node pool, coalesces identical GETs and
+    records latency. Explicitly mounted adapters (tests, benchmarks/fake_pve)
+    still win over the transport's pools."""
+
+    def __init__(self, transport, ssl_verify):
+        super().__init__()
+        self._transport = transport
+        self._ssl_verify = bool(ssl_verify)
+        self._default_adapter = transport.pool('', self._ssl_verify)
+        self.mount('https://', self._default_adapter)
+
+    def get_adapter(self, url):
+        adapter = super().get_adapter(url)
+        if adapter is not self._default_adapter:
+            return adapter
+        m = _NODE_PATH_RE.match(urlsplit(url).path)
+        return self._transport.pool(m.group(1) if m else '', self._ssl_verify)
+
+    def request(self, method, url, params=None, **kwargs):
+        t = self._transport
+        method = method.upper()
+        key = None
+        if method == 'GET' and t.coalesce and not kwargs.get('stream'):
+            key = self._coalesce_key(url, params, kwargs)
+        if key is not None:
+            with t._inflight_lock:
+                slot = t._inflight.get(key)
+                leader = slot is None
+                if leader:
+                    slot = t._inflight[key] = _Inflight()
+            if not leader:
+                timeout = kwargs.get('timeout')
+                wait = (sum(timeout) if isinstance(timeout, tuple) else timeout) or 15
+                if slot.event.wait(wait + 1):
+                    with t._stats_lock:
+                        t.coalesced += 1
+                    if slot.error is not None:
+                        raise slot.error
+                    return slot.response
+                key = None   # leader is stuck past our own timeout → go ourselves
+            else:
+                try:
+                    slot.response = self._timed(method, url, params, kwargs)
+                    return slot.response
+                except Exception as e:
+                    slot.error = e
+                    raise
+                finally:
+                    with t._inflight_lock:
+                        t._inflight.pop(key, None)
+                    slot.event.set()
+        return self._timed(method, url, params, kwargs)
+
+    def _coalesce_key(self, url, params, kwargs):
+        if kwargs.get('data') or kwargs.get('json') or kwargs.get('files'):
+            return None
+        try:
+            p = tuple(sorted(params.items())) if isinstance(params, dict) else params
+            h = tuple(sorted((kwargs.get('headers') or {}).items()))
+            auth = (self.headers.get('Authorization'), self.headers.get('CSRFPreventionToken'),
+                    self.cookies.get('PVEAuthCookie'))
+            key = (url, p, h, auth, kwargs.get('verify'))
+            hash(key)
+            return key
+        except (TypeError, AttributeError):
+            return None
+
+    def _timed(self, method, url, params, kwargs):
+        t0 = time.monotonic()
+        status = 0
+        try:
+            resp = super().request(method, url, params=params, **kwargs)
+            status = resp.status_code
+            return resp
+        finally:
+            self._transport.histograms.observe(method, endpoint_template(url),
+                                               (time.monotonic() - t0) * 1000.0, status)
+            self._transport.maybe_resize()
+
+
+class ApiTransport:
+    """Interface: new_session(ssl_verify) -> requests.Session, stats(), close()."""
+
+    name = 'base'
+
+    def new_session(self, ssl_verify):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+class PooledTransport(ApiTransport):
+    """Default transport: per-node keep-alive pools, TLS resumption, GET
+    coalescing, latency histograms. One instance per manager."""
+
+    name = 'pooled'
+
+    def __init__(self, pool_max=None, coalesce=None):
+        self.pool_max = pool_max or API_POOL_MAX
+        self.coalesce = COALESCE_GETS if coalesce is None else coalesce
+        self.histograms = LatencyHistograms()
+        self._pools = {}               # (node, ssl_verify) -> _PoolAdapter
+        self._contexts = {}            # ssl_verify -> _ResumingSSLContext
+        self._pools_lock = threading.Lock()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._last_resize = 0.0
+        self.coalesced = 0
+        self.resizes = 0
+
+    def make_adapter(self, node, maxsize, ssl_verify):
+        """Override to plug in a different HTTP client (must be a requests transport adapter)."""
+        ctx = self._contexts.get(ssl_verify)
+        if ctx is None:
+            ctx = self._contexts[ssl_verify] = make_ssl_context(ssl_verify)
+        return _PoolAdapter(ctx, maxsize)
+
+    def pool(self, node, ssl_verify):
+        key = (node, ssl_verify)
+        p = self._pools.get(key)
+        if p is None:
+            with self._pools_lock:
+                p = self._pools.get(key)
+                if p is None:
+                    size = _NODE_POOL_INITIAL if node else _CLUSTER_POOL_INITIAL
+                    p = self._pools[key] = self.make_adapter(node, min(size, self.pool_max), ssl_verify)
+        return p
+
+    def maybe_resize(self):
+        """Grow pools whose concurrency outran their size (never shrinks — idle
+        keep-alive sockets are closed by pveproxy anyway)."""
+        now = time.monotonic()
+        if now - self._last_resize < _POOL_RESIZE_INTERVAL:
+            return
+        with self._pools_lock:
+            if now - self._last_resize < _POOL_RESIZE_INTERVAL:
+                return
+            self._last_resize = now
+            for key, p in list(self._pools.items()):
+                peak = getattr(p, 'peak', 0)
+                size = getattr(p, 'maxsize', 0)
+                if not size or peak <= size or size >= self.pool_max:
+                    continue
+                new_size = size
+                while new_size < peak and new_size < self.pool_max:
+                    new_size *= 2
+                new = self.make_adapter(key[0], min(new_size, self.pool_max), key[1])
+                self._pools[key] = new
+                self.resizes += 1
+                logging.debug(f"[api-transport] pool '{key[0] or 'cluster'}' {size} → {new.maxsize} (peak {peak})")
+                try:
+                    p.close()   # idle sockets only; in-use ones are dropped on release
+                except Exception:
+                    pass
+
+    def new_session(self, ssl_verify):
+        return TransportSession(self, ssl_verify)
+
+    def stats(self):
+        with self._pools_lock:
+            pools = {(k[0] or '_cluster'): {'size': getattr(p, 'maxsize', 0), 'peak': getattr(p, 'peak', 0),
+                                            'overflow': getattr(p, 'overflow', 0)}
+                     for k, p in self._pools.items()}
+        handshakes = sum(c.handshakes for c in self._contexts.values())
+        resumed = sum(c.resumed for c in self._contexts.values())
+        return {'transport': self.name, 'pools': pools, 'coalesced': self.coalesced,
+                'resizes': self.resizes, 'tls_handshakes': handshakes, 'tls_resumed': resumed}
+
+    def close(self):
+        with self._pools_lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for p in pools:
+            try:
+                p.close()
+            except Exception:
+                pass
+
+
+TRANSPORTS = {'pooled': PooledTransport}
+
+
+def register_transport(name, cls):
+    """Make a transport selectable via PEGAPROX_API_TRANSPORT=<name>."""
+    TRANSPORTS[name] = cls
+
+
+def create_transport(name=None):
+    name = name or os.environ.get('PEGAPROX_API_TRANSPORT', 'pooled')
+    cls = TRANSPORTS.get(name)
+    if cls is None:
+        logging.warning(f"[api-transport] unknown transport '{name}', using 'pooled'")
+        cls = PooledTransport
+    return cls()
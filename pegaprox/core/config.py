@@ -165,6 +165,8 @@ def save_config():
                     'backup_sla_max_age_hours': int(getattr(manager.config, 'backup_sla_max_age_hours', 0) or 0),
                     # MK May 2026 — Proxmox API port override (default 8006). Direct-TLS only.
                     'api_port': int(getattr(manager.config, 'api_port', 8006) or 8006),
+                    'migration_max_parallel': int(getattr(manager.config, 'migration_max_parallel', 0) or 0),
+                    'migration_max_per_node': int(getattr(manager.config, 'migration_max_per_node', 0) or 0),
                 }
 
                 db.save_cluster(cluster_id, cluster_data)
@@ -13,6 +13,7 @@ import logging
 import threading
 import hashlib
 import hmac
+import atexit
 import base64
 import uuid
 # MK May 2026 — DB connections now go through `dbcrypto.connect()` so
@@ -51,6 +52,161 @@ try:
 except ImportError:
     pass
 
+# NS Oct 2026 — audit_log group commit. add_audit_entry() used to INSERT+COMMIT
+# (one fsync) per event on the request path; a 1000-VM bulk migrate meant
+# thousands of fsyncs. Entries are now signed + queued in submit order and a
+# writer greenlet commits whatever piled up every few ms as ONE transaction.
+# ids are handed out in queue order, so the SIEM id cursor still sees a gap-free,
+# strictly increasing outbox. Readers call flush_audit() first (read-your-writes).
+AUDIT_COMMIT_INTERVAL = max(0.0, float(os.environ.get('PEGAPROX_AUDIT_COMMIT_MS', '5'))) / 1000.0
+_AUDIT_BATCH_MAX = 1000
+_AUDIT_WRITER_IDLE = 10.0    # writer exits (and closes its connection) after this much quiet
+
+
+def _audit_offhub(fn, *args):
+    """Run fn in gevent's threadpool when the hub is patched in (the commit's fsync
+    then doesn't stall every greenlet), inline otherwise."""
+    try:
+        import gevent.monkey
+        if gevent.monkey.is_module_patched('threading'):
+            from gevent import get_hub
+            return get_hub().threadpool.apply(fn, args)
+    except ImportError:
+        pass
+    return fn(*args)
+
+
+class AuditWriter:
+    """Batches audit_log INSERTs into group commits on a dedicated connection."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._pending = []
+        self._lock = threading.Lock()         # _pending + writer start/stop
+        self._write_lock = threading.Lock()   # one batch in flight → ids follow submit order
+        self._wake = threading.Event()
+        self._thread = None
+        self._conn = None
+        self._stopped = False
+        self.stats = {'entries': 0, 'batches': 0, 'errors': 0, 'max_batch': 0}
+
+    def submit(self, build):
+        """Queue one row. build() runs under the queue lock, so the timestamp /
+        signature it computes are in the same order the rows get their ids."""
+        with self._lock:
+            self._pending.append(build())
+            stopped = self._stopped
+            if not stopped and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, daemon=True, name='audit-writer')
+                self._thread.start()
+        if stopped:
+            self.flush()   # shutting down — write through
+        else:
+            self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Commit everything queued so far. Returns the number of rows written."""
+        written = 0
+        with self._write_lock:
+            while True:
+                with self._lock:
+                    batch = self._pending[:_AUDIT_BATCH_MAX]
+                    del self._pending[:len(batch)]
+                if not batch:
+                    break
+                try:
+                    last_id = _audit_offhub(self._write, batch)
+                except Exception as e:
+                    with self._lock:
+                        self._pending[:0] = batch   # keep order, retry on the next flush
+                    self.stats['errors'] += 1
+                    logging.error(f"[audit] group commit of {len(batch)} entries failed: {e}")
+                    break
+                written += len(batch)
+                self.stats['entries'] += len(batch)
+                self.stats['batches'] += 1
+                self.stats['max_batch'] = max(self.stats['max_batch'], len(batch))
+                # rows are committed → wake the SIEM workers (they read by id cursor)
+                try:
+                    from pegaprox.api import siem as _siem_mod
+                    ts, user, action, details, ip, _sig, cluster, severity = batch[-1]
+                    _siem_mod.enqueue({
+                        'id': last_id, 'timestamp': ts, 'user': user,
+                        'action': action, 'details': details, 'ip_address': ip,
+                        'cluster': cluster, 'severity': severity,
+                    })
+                except Exception:
+                    # silently swallow — SIEM is optional and shouldn't break audit writes
+                    pass
+        return written
+
+    def _write(self, batch):
+        if self._conn is None:
+            self._conn = dbcrypto.connect(self.db_path, check_same_thread=False, timeout=30.0)
+        cur = self._conn.cursor()
+        try:
+            for row in batch:
+                cur.execute('''
+                    INSERT INTO audit_log (timestamp, user, action, details, ip_address,
+                                           hmac_signature, cluster, severity)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', row)
+            last_id = cur.lastrowid
+            self._conn.commit()
+            return last_id
+        except Exception:
+            try:
+                self._conn.rollback()
+            except Exception:
+                pass
+            raise
+
+    def _run(self):
+        idle_since = time.monotonic()
+        while True:
+            if self._wake.wait(1.0):
+                self._wake.clear()
+                if AUDIT_COMMIT_INTERVAL:
+                    time.sleep(AUDIT_COMMIT_INTERVAL)   # let the burst pile up
+                self.flush()
+                idle_since = time.monotonic()
+                continue
+            with self._lock:
+                retry = bool(self._pending)   # last group commit failed → retry every ~1s
+            if retry:
+                self.flush()
+                idle_since = time.monotonic()
+                continue
+            with self._lock:
+                if self._pending:
+                    continue
+                if self._stopped or time.monotonic() - idle_since > _AUDIT_WRITER_IDLE:
+                    self._thread = None
+                    break
+        self._close_conn()
+
+    def _close_conn(self):
+        with self._write_lock:
+            if self._conn is not None:
+                try:
+                    self._conn.close()
+                except Exception:
+                    pass
+                self._conn = None
+
+    def stop(self):
+        """Flush and shut the writer down (shutdown / tests)."""
+        self.flush()
+        with self._lock:
+            self._stopped = True
+        self._wake.set()
+        self._close_conn()
+
+
 class PegaProxDB:
     """
     SQLite database wrapper - MK
@@ -83,6 +239,8 @@ class PegaProxDB:
         self.aes_key = None  # raw key for HMAC signing
         self._conn = None
         self._local = threading.local()
+        self._audit_writer = AuditWriter(self.db_path)
+        self._audit_fts = False
         
         self._init_encryption()
         self._init_db()
@@ -612,7 +770,53 @@ class PegaProxDB:
         cursor.execute('''
             CREATE INDEX IF NOT EXISTS idx_metrics_timestamp ON metrics_history(timestamp DESC)
         ''')
-        
+        # NS Oct 2026 — columnar time-series store that replaces the JSON-blob
+        # rows above (see pegaprox/core/tsdb.py). WITHOUT ROWID so a cluster's
+        # chunks are physically clustered on the PK → one range scan per query.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS metrics_series (
+                cluster_id TEXT NOT NULL,
+                chunk_start INTEGER NOT NULL,
+                entity TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                ts_data BLOB NOT NULL,
+                val_data BLOB NOT NULL,
+                samples INTEGER DEFAULT 0,
+                PRIMARY KEY (cluster_id, chunk_start, entity, metric)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_metrics_series_entity ON metrics_series(entity, chunk_start)
+        ''')
+        # NS Oct 2026 — pre-aggregated 1h / 1d buckets (min/max/avg/p95/count)
+        # maintained incrementally by the collector; one value array per stat.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS metrics_rollup (
+                cluster_id TEXT NOT NULL,
+                tier TEXT NOT NULL,
+                chunk_start INTEGER NOT NULL,
+                entity TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                ts_data BLOB NOT NULL,
+                min_data BLOB NOT NULL,
+                max_data BLOB NOT NULL,
+                avg_data BLOB NOT NULL,
+                p95_data BLOB NOT NULL,
+                cnt_data BLOB NOT NULL,
+                buckets INTEGER DEFAULT 0,
+                PRIMARY KEY (cluster_id, tier, chunk_start, entity, metric)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS metrics_series_meta (
+                cluster_id TEXT NOT NULL,
+                entity TEXT NOT NULL,
+                attrs TEXT DEFAULT '{}',
+                updated_at TEXT,
+                PRIMARY KEY (cluster_id, entity)
+            )
+        ''')
+
         # Custom Scripts table - MK Jan 2026
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS custom_scripts (
@@ -1097,6 +1301,9 @@ class PegaProxDB:
                 ('latitude', "REAL DEFAULT NULL"),
                 ('longitude', "REAL DEFAULT NULL"),
                 ('location_label', "TEXT DEFAULT ''"),
+                # NS Oct 2026 — migration queue concurrency caps (0 = built-in default)
+                ('migration_max_parallel', "INTEGER DEFAULT 0"),
+                ('migration_max_per_node', "INTEGER DEFAULT 0"),
             ]:
                 if col_name not in cluster_columns:
                     try:
@@ -1308,6 +1515,15 @@ class PegaProxDB:
             if 'last_snapshot' not in cols:
                 cursor.execute("ALTER TABLE cross_cluster_replications ADD COLUMN last_snapshot TEXT DEFAULT ''")
                 logging.info("Added last_snapshot column to cross_cluster_replications")
+            # NS Oct 2026 — relay transport options + per-run throughput telemetry for
+            # the incremental path: `compression` none/auto/zstd/lz4, `streams` = disks
+            # shipped in parallel (0 = PEGAPROX_REPL_STREAMS). last_* describe the last run.
+            for col, ddl in (('compression', "TEXT DEFAULT 'none'"), ('streams', 'INTEGER DEFAULT 0'),
+                             ('last_bytes', 'INTEGER DEFAULT 0'), ('last_bytes_per_sec', 'REAL DEFAULT 0'),
+                             ('last_compress_ratio', 'REAL DEFAULT 0'), ('last_stall_seconds', 'REAL DEFAULT 0')):
+                if col not in cols:
+                    cursor.execute(f"ALTER TABLE cross_cluster_replications ADD COLUMN {col} {ddl}")
+                    logging.info(f"Added {col} column to cross_cluster_replications")
         except Exception:
             pass
 
@@ -1643,6 +1859,10 @@ class PegaProxDB:
         except Exception as e:
             logging.error(f"Error extending audit_log schema: {e}")
 
+        # NS Oct 2026 — external-content FTS5 index over audit_log (same shape as the
+        # syslog logs_fts). trigram so MATCH keeps the old LIKE '%q%' substring semantics.
+        self._audit_fts = self._init_audit_fts(cursor)
+
         # MK May 2026 — SIEM forwarder targets
         try:
             cursor.execute('''
@@ -1664,6 +1884,12 @@ class PegaProxDB:
                     created_by TEXT DEFAULT ''
                 )
             ''')
+            # NS Oct 2026 — per-target delivery cursor into audit_log (the SIEM
+            # outbox). NULL = start at the current end of the log.
+            cols = [r[1] for r in cursor.execute("PRAGMA table_info(siem_targets)").fetchall()]
+            if 'cursor_id' not in cols:
+                cursor.execute("ALTER TABLE siem_targets ADD COLUMN cursor_id INTEGER")
+                logging.info("Added cursor_id column to siem_targets")
             logging.info("Ensured siem_targets table exists")
         except Exception as e:
             logging.error(f"Error creating siem_targets table: {e}")
@@ -1757,6 +1983,16 @@ class PegaProxDB:
                 )
             ''')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_snap_runs_policy ON snapshot_runs(policy_id, started_at DESC)')
+            # NS Oct 2026 — per-run throughput from the batch engine
+            cursor.execute("PRAGMA table_info(snapshot_runs)")
+            _srcols = {row[1] for row in cursor.fetchall()}
+            for _cn, _cd in (
+                ('duration_seconds', "REAL DEFAULT 0"),
+                ('snapshots_per_minute', "REAL DEFAULT 0"),
+                ('peak_parallel', "INTEGER DEFAULT 0"),
+            ):
+                if _cn not in _srcols:
+                    cursor.execute(f"ALTER TABLE snapshot_runs ADD COLUMN {_cn} {_cd}")
             logging.info("Ensured snapshot_policies + snapshot_runs tables exist")
         except Exception as e:
             logging.error(f"Error creating snapshot_policies tables: {e}")
@@ -1817,9 +2053,18 @@ class PegaProxDB:
                     scope TEXT NOT NULL,
                     snapshot TEXT NOT NULL,
                     created_at TEXT NOT NULL,
-                    created_by TEXT DEFAULT ''
+                    created_by TEXT DEFAULT '',
+                    digest TEXT DEFAULT '',
+                    last_digest TEXT DEFAULT ''
                 )
             ''')
+            # NS Oct 2026 — PVE config digests (baseline + last clean scan) so the
+            # scanner can skip re-diffing guests whose config didn't change
+            cursor.execute("PRAGMA table_info(drift_baselines)")
+            _dcols = {row['name'] for row in cursor.fetchall()}
+            for _cn in ('digest', 'last_digest'):
+                if _cn not in _dcols:
+                    cursor.execute(f"ALTER TABLE drift_baselines ADD COLUMN {_cn} TEXT DEFAULT ''")
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_drift_baseline_lookup ON drift_baselines(cluster_id, kind, scope)')
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS drift_events (
@@ -2894,6 +3139,8 @@ class PegaProxDB:
                 'balance_cpu_weight': row['balance_cpu_weight'] if 'balance_cpu_weight' in row.keys() else 1.0,
                 'balance_mem_weight': row['balance_mem_weight'] if 'balance_mem_weight' in row.keys() else 1.0,
                 'balance_io_weight': row['balance_io_weight'] if 'balance_io_weight' in row.keys() else 1.0,
+                'migration_max_parallel': int(row['migration_max_parallel'] or 0) if 'migration_max_parallel' in row.keys() else 0,
+                'migration_max_per_node': int(row['migration_max_per_node'] or 0) if 'migration_max_per_node' in row.keys() else 0,
                 'cpu_baseline': row['cpu_baseline'] if 'cpu_baseline' in row.keys() else '',
                 'vnc_tunnel': bool(row['vnc_tunnel']) if 'vnc_tunnel' in row.keys() else False,
                 'backup_sla_max_age_hours': int(row['backup_sla_max_age_hours']) if 'backup_sla_max_age_hours' in row.keys() and row['backup_sla_max_age_hours'] is not None else 0,
@@ -2980,6 +3227,8 @@ class PegaProxDB:
             'balance_cpu_weight': row['balance_cpu_weight'] if 'balance_cpu_weight' in row.keys() else 1.0,
             'balance_mem_weight': row['balance_mem_weight'] if 'balance_mem_weight' in row.keys() else 1.0,
             'balance_io_weight': row['balance_io_weight'] if 'balance_io_weight' in row.keys() else 1.0,
+            'migration_max_parallel': int(row['migration_max_parallel'] or 0) if 'migration_max_parallel' in row.keys() else 0,
+            'migration_max_per_node': int(row['migration_max_per_node'] or 0) if 'migration_max_per_node' in row.keys() else 0,
             'cpu_baseline': row['cpu_baseline'] if 'cpu_baseline' in row.keys() else '',
             'vnc_tunnel': bool(row['vnc_tunnel']) if 'vnc_tunnel' in row.keys() else False,
             'backup_sla_max_age_hours': int(row['backup_sla_max_age_hours']) if 'backup_sla_max_age_hours' in row.keys() and row['backup_sla_max_age_hours'] is not None else 0,
@@ -3033,9 +3282,10 @@ class PegaProxDB:
              api_port,
              latitude, longitude, location_label,
              proxlb_tags_enabled,
+             migration_max_parallel, migration_max_per_node,
              created_at, updated_at)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
-                    ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             cluster_id,
             data.get('name', ''),
@@ -3078,6 +3328,8 @@ class PegaProxDB:
             data.get('longitude', existing_lon),
             data.get('location_label', existing_loc_label) or '',
             1 if data.get('proxlb_tags_enabled', False) else 0,
+            int(data.get('migration_max_parallel', 0) or 0),
+            int(data.get('migration_max_per_node', 0) or 0),
             existing['created_at'] if existing else now,
             now
         ))
@@ -3339,6 +3591,7 @@ class PegaProxDB:
             data.get('user_folder', ''),
         ))
         self.conn.commit()
+        bump_auth_generation()
     
     def save_all_users(self, users: dict):
         """Save all users (for bulk operations)"""
@@ -3350,6 +3603,7 @@ class PegaProxDB:
         cursor = self.conn.cursor()
         cursor.execute('DELETE FROM users WHERE username = ?', (username,))
         self.conn.commit()
+        bump_auth_generation()
     
     # ========================================
     # SESSION OPERATIONS
@@ -3445,6 +3699,52 @@ class PegaProxDB:
     # AUDIT LOG OPERATIONS (with HMAC Integrity)
     # ========================================
     
+    def _init_audit_fts(self, cursor) -> bool:
+        try:
+            cursor.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS audit_fts USING fts5(
+                    user,
+                    action,
+                    details,
+                    cluster,
+                    content='audit_log',
+                    content_rowid='id',
+                    tokenize='trigram'
+                )
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS audit_log_ai AFTER INSERT ON audit_log BEGIN
+                    INSERT INTO audit_fts(rowid, user, action, details, cluster)
+                    VALUES (new.id, new.user, new.action, new.details, new.cluster);
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS audit_log_ad AFTER DELETE ON audit_log BEGIN
+                    INSERT INTO audit_fts(audit_fts, rowid, user, action, details, cluster)
+                    VALUES ('delete', old.id, old.user, old.action, old.details, old.cluster);
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS audit_log_au AFTER UPDATE ON audit_log BEGIN
+                    INSERT INTO audit_fts(audit_fts, rowid, user, action, details, cluster)
+                    VALUES ('delete', old.id, old.user, old.action, old.details, old.cluster);
+                    INSERT INTO audit_fts(rowid, user, action, details, cluster)
+                    VALUES (new.id, new.user, new.action, new.details, new.cluster);
+                END
+            """)
+            has_rows = cursor.execute("SELECT 1 FROM audit_fts LIMIT 1").fetchone()
+            if has_rows is None:
+                # first start on an existing install — index what's already there
+                cursor.execute("""
+                    INSERT INTO audit_fts(rowid, user, action, details, cluster)
+                    SELECT id, user, action, details, cluster FROM audit_log
+                """)
+            self.conn.commit()
+            return True
+        except dbcrypto.OperationalError as exc:
+            logging.info(f"FTS disabled for audit_log: {exc}")
+            return False
+
     def _generate_audit_hmac(self, timestamp: str, user: str, action: str, details: str,
                              ip: str, cluster: str = '', severity: str = '') -> str:
         """Generate HMAC signature for audit entry (tamper detection).
@@ -3501,10 +3801,9 @@ class PegaProxDB:
 
         cluster/severity added MK May 2026 — keep optional so existing callers
         keep working unchanged.
+        NS Oct 2026 — queued for the group-commit writer; committed within a
+        few ms. Use flush_audit() before reading audit_log with raw SQL.
         """
-        cursor = self.conn.cursor()
-        timestamp = datetime.now().isoformat()
-
         # Auto-derive severity from action prefix when caller didn't pass one
         if severity is None:
             a = (action or '').lower()
@@ -3517,38 +3816,42 @@ class PegaProxDB:
             else:
                 severity = 'info'
 
-        signature = self._generate_audit_hmac(timestamp, user, action, details, ip,
-                                               cluster or '', severity)
+        def _row():
+            timestamp = datetime.now().isoformat()
+            signature = self._generate_audit_hmac(timestamp, user, action, details, ip,
+                                                   cluster or '', severity)
+            return (timestamp, user, action, details, ip, signature, cluster or '', severity)
 
-        cursor.execute('''
-            INSERT INTO audit_log (timestamp, user, action, details, ip_address,
-                                   hmac_signature, cluster, severity)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (timestamp, user, action, details, ip, signature, cluster or '', severity))
-        last_id = cursor.lastrowid
-        self.conn.commit()
+        self._audit_writer.submit(_row)
 
-        # Hand off to SIEM forwarder if anyone has plugged into the queue.
-        # Late import to avoid import cycles at module load.
+    def flush_audit(self):
+        """Commit queued audit entries now (read-your-writes for audit readers)."""
         try:
-            from pegaprox.api import siem as _siem_mod
-            _siem_mod.enqueue({
-                'id': last_id, 'timestamp': timestamp, 'user': user,
-                'action': action, 'details': details, 'ip_address': ip,
-                'cluster': cluster or '', 'severity': severity,
-            })
-        except Exception:
-            # silently swallow — SIEM is optional and shouldn't break audit writes
-            pass
+            return self._audit_writer.flush()
+        except Exception as e:
+            logging.error(f"[audit] flush failed: {e}")
+            return 0
+
+    def audit_writer_stats(self) -> dict:
+        st = dict(self._audit_writer.stats)
+        st['pending'] = self._audit_writer.pending()
+        st['fts'] = self._audit_fts
+        return st
 
     def search_audit_log(self, q='', user='', action='', cluster='', severity='',
                          ip='', date_from='', date_to='', offset=0, limit=100):
         """Search audit log with rich filters + pagination.
         Returns (entries, total) where total is the un-paginated row count."""
+        self.flush_audit()
         cursor = self.conn.cursor()
         conds = []
         params = []
-        if q:
+        if q and self._audit_fts and len(q) >= 3:
+            # NS Oct 2026 — trigram FTS index: same case-insensitive substring match
+            # as the LIKE below, without scanning every row
+            conds.append('id IN (SELECT rowid FROM audit_fts WHERE audit_fts MATCH ?)')
+            params.append('"' + q.replace('"', '""') + '"')
+        elif q:
             # search across user, action, details, cluster
             conds.append('(user LIKE ? OR action LIKE ? OR details LIKE ? OR cluster LIKE ?)')
             wild = f'%{q}%'
@@ -3576,20 +3879,24 @@ class PegaProxDB:
             params.append(date_to)
         where = (' WHERE ' + ' AND '.join(conds)) if conds else ''
 
-        # total
-        cursor.execute(f'SELECT COUNT(*) AS n FROM audit_log{where}', params)
-        total = cursor.fetchone()['n']
-
         # page
         cursor.execute(
             f'SELECT * FROM audit_log{where} ORDER BY timestamp DESC LIMIT ? OFFSET ?',
             params + [int(limit), int(offset)]
         )
         rows = [dict(r) for r in cursor.fetchall()]
+
+        # total — a short first page already is the total, skip the COUNT
+        if int(offset) == 0 and len(rows) < int(limit):
+            total = len(rows)
+        else:
+            cursor.execute(f'SELECT COUNT(*) AS n FROM audit_log{where}', params)
+            total = cursor.fetchone()['n']
         return rows, total
 
     def audit_facets(self, days=7):
         """Return top users/actions for the audit search UI dropdowns."""
+        self.flush_audit()
         cursor = self.conn.cursor()
         cutoff = (datetime.now() - timedelta(days=days)).isoformat()
         out = {'users': [], 'actions': [], 'clusters': []}
@@ -3606,6 +3913,7 @@ class PegaProxDB:
     
     def get_audit_log(self, limit: int = 1000, user: str = None, action: str = None, verify_integrity: bool = False) -> list:
         """Get audit log entries, optionally verifying HMAC integrity"""
+        self.flush_audit()
         cursor = self.conn.cursor()
         
         query = 'SELECT * FROM audit_log'
@@ -3671,6 +3979,7 @@ class PegaProxDB:
                 'scanned_limit': (limit if limit and limit > 0 else None)  # None = full scan
             }
 
+        self.flush_audit()
         if limit and limit > 0:
             sql = 'SELECT * FROM audit_log ORDER BY timestamp DESC LIMIT ?'
             params = (limit,)
@@ -3690,6 +3999,7 @@ class PegaProxDB:
     
     def cleanup_audit_log(self, days: int = 90):
         """Remove audit entries older than specified days"""
+        self.flush_audit()
         cursor = self.conn.cursor()
         cutoff = (datetime.now() - timedelta(days=days)).isoformat()
         cursor.execute('DELETE FROM audit_log WHERE timestamp < ?', (cutoff,))
@@ -3797,6 +4107,7 @@ class PegaProxDB:
             (0 if str(data.get('inherit_role', True)).strip().lower() in ('false', '0', 'no', 'off', 'none', '') else 1)
         ))
         self.conn.commit()
+        bump_auth_generation()
     
     def save_all_vm_acls(self, acls: dict):
         """Save all VM ACLs"""
@@ -3814,6 +4125,7 @@ class PegaProxDB:
             cursor.execute('DELETE FROM vm_acls WHERE cluster_id = ? AND vmid = ?',
                           (cluster_id, str(vmid)))
             self.conn.commit()
+            bump_auth_generation()
             return cursor.rowcount > 0
         except Exception as e:
             logging.error(f"Failed to delete VM ACL: {e}")
@@ -3865,6 +4177,7 @@ class PegaProxDB:
             ''', (cluster_id, pool_id, subject_type, subject_id, json.dumps(permissions), now, now,
                   json.dumps(permissions), now))
             self.conn.commit()
+            bump_auth_generation()
             return True
         except Exception as e:
             logging.error(f"Failed to save pool permission: {e}")
@@ -3879,6 +4192,7 @@ class PegaProxDB:
                 WHERE cluster_id = ? AND pool_id = ? AND subject_type = ? AND subject_id = ?
             ''', (cluster_id, pool_id, subject_type, subject_id))
             self.conn.commit()
+            bump_auth_generation()
             return cursor.rowcount > 0
         except Exception as e:
             logging.error(f"Failed to delete pool permission: {e}")
@@ -4336,12 +4650,14 @@ class PegaProxDB:
             (data.get('quota_enforcement') or 'block'),
         ))
         self.conn.commit()
+        bump_auth_generation()
     
     def delete_tenant(self, tenant_id: str):
         """Delete tenant"""
         cursor = self.conn.cursor()
         cursor.execute('DELETE FROM tenants WHERE id = ?', (tenant_id,))
         self.conn.commit()
+        bump_auth_generation()
     
     def save_all_tenants(self, tenants: list):
         """Save all tenants"""
@@ -4510,6 +4826,23 @@ class PegaProxDB:
 
 
 # Global database instance
+# NS Oct 2026 — auth generation. require_auth caches the resolved user /
+# role / permission set per session (utils/auth.py); every write that can change
+# who someone is or what they may do bumps this and all cached contexts go stale.
+_auth_generation = 0
+_auth_generation_lock = threading.Lock()
+
+
+def bump_auth_generation():
+    global _auth_generation
+    with _auth_generation_lock:
+        _auth_generation += 1
+
+
+def get_auth_generation() -> int:
+    return _auth_generation
+
+
 _db = None
 
 def get_db() -> PegaProxDB:
@@ -4518,3 +4851,13 @@ def get_db() -> PegaProxDB:
     if _db is None:
         _db = PegaProxDB()
     return _db
+
+
+@atexit.register
+def _flush_audit_at_exit():
+    # queued audit entries must not die with the process
+    if _db is not None:
+        try:
+            _db._audit_writer.stop()
+        except Exception:
+            pass
@@ -398,6 +398,38 @@ def run_heavy_write(statements=None, build=None):
         return _work()
 
 
+def run_heavy_txn(work):
+    """Like run_heavy_write, but `work(conn)` gets the fresh connection itself,
+    for writers that must READ inside the same transaction (e.g. the metrics
+    time-series store appends to its current head chunk). Runs in gevent's
+    threadpool, commits on success, rolls back on error. Returns work()'s value."""
+    def _work():
+        from pegaprox.constants import DATABASE_FILE
+        conn = connect(DATABASE_FILE, timeout=30, check_same_thread=False)
+        try:
+            conn.row_factory = Row
+            try:
+                result = work(conn)
+                conn.commit()
+                return result
+            except Exception:
+                conn.rollback()
+                raise
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+    try:
+        from gevent import get_hub
+        hub = get_hub()
+    except Exception:
+        hub = None
+    if hub is None:
+        return _work()
+    return hub.threadpool.apply(_work)
+
+
 # ─── Auto-migration on app startup ──────────────────────────────────────────
 # NS May 2026 — "nuklear" means auto-on-boot. The CLI tool is the manual
 # escape hatch; normal operators never have to think about migration.
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+PegaProx site-recovery readiness index - Layer 4
+Per-plan view of how recoverable every protected VM is right now: which
+replication job covers it, whether that job is enabled, how its last run
+ended, how old the replica is and whether that age is past the job's RPO.
+
+The auto-failover heartbeat used to rebuild this every 30s for every plan
+whose source was unreachable — one cross_cluster_replications lookup per VM —
+and the DR dashboard did the same per page load. The inputs only change when
+a replication run finishes or someone edits a plan or a job, so now:
+
+  - the index is loaded once (three queries) and then maintained from those
+    events: note_replication() from the replication runner's status update,
+    job_changed() / plan_changed() from the API write paths,
+  - a plan's failover blockers (no job, job gone, disabled, last run not ok)
+    are recomputed only for the plans an event touches; RPO deadlines are
+    kept sorted per plan, so "who is past RPO now" is a bisect, not a scan,
+  - a full reload every RESYNC seconds catches writes that bypass the hooks
+    (restored DB, manual SQL).
+
+A VM breaches its RPO when its replica is older than RPO_FACTOR x the job's
+replication interval — i.e. at least one scheduled run went missing. That
+shows up in the readiness check, the dashboard and the metrics; it never
+blocks auto-failover (see blockers()).
+
+NS Oct 2026
+"""
+
+import os
+import time
+import bisect
+import logging
+import threading
+from datetime import datetime
+
+from pegaprox.core.db import get_db
+
+RPO_FACTOR = float(os.environ.get('PEGAPROX_DR_RPO_FACTOR', 2.0))
+RESYNC = 900            # full reload from the tables at least this often
+DEFAULT_INTERVAL = 6 * 3600
+
+
+def _ts(value):
+    """last_run is written as a naive local isoformat()."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (ValueError, TypeError):
+        return None
+
+
+def replication_interval(schedule):
+    """Seconds between runs of a replication job — the runner's own reading of
+    the schedule, so the RPO follows what actually drives the job."""
+    try:
+        from pegaprox.background.cross_cluster_replication import _parse_interval_seconds
+        return _parse_interval_seconds(schedule or '0 */6 * * *')
+    except Exception:
+        return DEFAULT_INTERVAL
+
+
+def _job_entry(row):
+    row = dict(row)
+    return {
+        'enabled': bool(row.get('enabled')),
+        'last_status': row.get('last_status') or '',
+        'last_run': _ts(row.get('last_run')),
+        'rpo_seconds': int(replication_interval(row.get('schedule')) * RPO_FACTOR),
+    }
+
+
+class ReadinessIndex:
+    def __init__(self, clock=time.time, resync=RESYNC):
+        self._clock = clock
+        self._resync = resync
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._jobs = {}         # job_id -> _job_entry
+        self._plans = {}        # plan_id -> {'name', 'vms': {vmid: job_id}}
+        self._by_job = {}       # job_id -> {plan_id}
+        self._summary = {}      # plan_id -> {'blockers', 'deadlines', 'oldest'}
+        self.counters = {'loads': 0, 'events': 0, 'lookups': 0}
+
+    # ── loading ──
+
+    def _ensure(self):
+        now = self._clock()
+        if self._loaded_at is not None and now - self._loaded_at < self._resync:
+            return
+        db = get_db()
+        plans = db.query('SELECT id, name FROM site_recovery_plans') or []
+        vms = db.query('SELECT plan_id, vmid, replication_job_id FROM site_recovery_vms') or []
+        jobs = db.query('SELECT id, enabled, last_status, last_run, schedule FROM cross_cluster_replications') or []
+        with self._lock:
+            self._jobs = {r['id']: _job_entry(r) for r in jobs}
+            self._plans = {r['id']: {'name': r['name'] or '', 'vms': {}} for r in plans}
+            for r in vms:
+                plan = self._plans.get(r['plan_id'])
+                if plan is not None:
+                    plan['vms'][r['vmid']] = (r['replication_job_id'] or '').strip()
+            self._by_job = {}
+            for pid, plan in self._plans.items():
+                for jid in plan['vms'].values():
+                    if jid:
+                        self._by_job.setdefault(jid, set()).add(pid)
+            self._summary = {pid: self._summarize(pid) for pid in self._plans}
+            self._loaded_at = now
+            self.counters['loads'] += 1
+
+    def _summarize(self, plan_id):
+        blockers, deadlines, oldest = [], [], None
+        for vmid, jid in sorted(self._plans[plan_id]['vms'].items()):
+            job = self._jobs.get(jid) if jid else None
+            if not jid:
+                blockers.append(f"VM {vmid} has no replication job linked")
+            elif job is None:
+                blockers.append(f"VM {vmid}: replication job {jid} not found")
+            elif not job['enabled']:
+                blockers.append(f"VM {vmid}: replication disabled")
+            elif job['last_status'] != 'ok':
+                blockers.append(f"VM {vmid}: last replication status={job['last_status'] or 'never ran'}")
+            if job and job['last_run'] is not None:
+                oldest = job['last_run'] if oldest is None else min(oldest, job['last_run'])
+                if job['enabled'] and job['last_status'] == 'ok':
+                    deadlines.append((job['last_run'] + job['rpo_seconds'], vmid))
+        deadlines.sort()
+        return {'blockers': blockers, 'deadlines': deadlines, 'oldest': oldest}
+
+    def _refresh(self, plan_ids):
+        for pid in plan_ids:
+            if pid in self._plans:
+                self._summary[pid] = self._summarize(pid)
+
+    # ── events ──
+
+    def note_replication(self, job_id, status, finished_at=None):
+        """A replication run ended. Only the plans protecting that job's VM are
+        re-summarised; nothing is read from the DB."""
+        with self._lock:
+            if self._loaded_at is None:
+                return          # not built yet — the first read loads current state
+            job = self._jobs.get(job_id)
+            if job is None:
+                self._loaded_at = None      # job we haven't seen: reload on next read
+                return
+            job['last_status'] = status or ''
+            job['last_run'] = finished_at if finished_at is not None else self._clock()
+            self.counters['events'] += 1
+            self._refresh(self._by_job.get(job_id, ()))
+
+    def job_changed(self, job_id):
+        """A replication job was created, edited or deleted."""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+        row = get_db().query_one(
+            'SELECT id, enabled, last_status, last_run, schedule FROM cross_cluster_replications WHERE id = ?',
+            (job_id,))
+        with self._lock:
+            if row:
+                self._jobs[job_id] = _job_entry(row)
+            else:
+                self._jobs.pop(job_id, None)
+            self.counters['events'] += 1
+            self._refresh(self._by_job.get(job_id, ()))
+
+    def plan_changed(self, plan_id):
+        """A plan or its VM list changed (created, renamed, VM added/edited/removed, deleted)."""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+        db = get_db()
+        plan = db.query_one('SELECT id, name FROM site_recovery_plans WHERE id = ?', (plan_id,))
+        vms = db.query('SELECT vmid, replication_job_id FROM site_recovery_vms WHERE plan_id = ?',
+                       (plan_id,)) if plan else []
+        vm_jobs = {r['vmid']: (r['replication_job_id'] or '').strip() for r in (vms or [])}
+        unknown = {j for j in vm_jobs.values() if j and j not in self._jobs}
+        rows = [db.query_one('SELECT id, enabled, last_status, last_run, schedule '
+                             'FROM cross_cluster_replications WHERE id = ?', (j,)) for j in unknown]
+        with self._lock:
+            for row in rows:
+                if row:
+                    self._jobs[row['id']] = _job_entry(row)
+            old = self._plans.pop(plan_id, None)
+            for jid in (old['vms'].values() if old else ()):
+                self._by_job.get(jid, set()).discard(plan_id)
+            self._summary.pop(plan_id, None)
+            if plan:
+                self._plans[plan_id] = {'name': plan['name'] or '', 'vms': vm_jobs}
+                for jid in vm_jobs.values():
+                    if jid:
+                        self._by_job.setdefault(jid, set()).add(plan_id)
+                self._refresh((plan_id,))
+            self.counters['events'] += 1
+
+    # ── reads ──
+
+    def _breached(self, plan_id, now):
+        deadlines = self._summary[plan_id]['deadlines']
+        return deadlines[:bisect.bisect_left(deadlines, (now, -1))]
+
+    def blockers(self, plan_id):
+        """Reasons auto-failover must not run for this plan; [] = ready.
+        Replica age is deliberately not one of them: while the source site is
+        down nothing can replicate, so every replica ages past its RPO during
+        exactly the outage failover exists for. RPO is reported, not gated."""
+        self._ensure()
+        with self._lock:
+            self.counters['lookups'] += 1
+            if plan_id not in self._plans:
+                return []
+            return list(self._summary[plan_id]['blockers'])
+
+    def vm_status(self, plan_id):
+        """{vmid: {...}} for the plan's VMs — job, status, replica age, RPO and breach."""
+        self._ensure()
+        now = self._clock()
+        with self._lock:
+            self.counters['lookups'] += 1
+            plan = self._plans.get(plan_id)
+            if not plan:
+                return {}
+            out = {}
+            for vmid, jid in plan['vms'].items():
+                job = self._jobs.get(jid) if jid else None
+                age = now - job['last_run'] if job and job['last_run'] is not None else None
+                out[vmid] = {
+                    'job_id': jid,
+                    'job_found': job is not None,
+                    'enabled': job['enabled'] if job else False,
+                    'last_status': job['last_status'] if job else '',
+                    'last_run': datetime.fromtimestamp(job['last_run']).isoformat()
+                    if job and job['last_run'] is not None else None,
+                    'age_seconds': int(age) if age is not None else None,
+                    'rpo_seconds': job['rpo_seconds'] if job else None,
+                    'rpo_breached': bool(job and age is not None and job['enabled']
+                                         and job['last_status'] == 'ok' and age > job['rpo_seconds']),
+                }
+            return out
+
+    def summary(self, plan_id=None):
+        """Per-plan headline numbers: vms, blockers, rpo_breached, max_age_seconds, ready."""
+        self._ensure()
+        now = self._clock()
+        with self._lock:
+            self.counters['lookups'] += 1
+            pids = [plan_id] if plan_id is not None else list(self._plans)
+            out = {}
+            for pid in pids:
+                if pid not in self._plans:
+                    continue
+                s = self._summary[pid]
+                breached = len(self._breached(pid, now))
+                out[pid] = {
+                    'name': self._plans[pid]['name'],
+                    'vms': len(self._plans[pid]['vms']),
+                    'blockers': len(s['blockers']),
+                    'rpo_breached': breached,
+                    'max_age_seconds': int(now - s['oldest']) if s['oldest'] is not None else None,
+                    'ready': not s['blockers'] and not breached,
+                }
+            return out if plan_id is None else out.get(plan_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+
+_index = ReadinessIndex()
+
+
+def note_replication(job_id, status, finished_at=None):
+    try:
+        _index.note_replication(job_id, status, finished_at)
+    except Exception as e:
+        logging.debug(f"[DR] readiness index update for {job_id} failed: {e}")
+        _index.invalidate()
+
+
+def job_changed(job_id):
+    try:
+        _index.job_changed(job_id)
+    except Exception as e:
+        logging.debug(f"[DR] readiness index job refresh for {job_id} failed: {e}")
+        _index.invalidate()
+
+
+def plan_changed(plan_id):
+    try:
+        _index.plan_changed(plan_id)
+    except Exception as e:
+        logging.debug(f"[DR] readiness index plan refresh for {plan_id} failed: {e}")
+        _index.invalidate()
+
+
+def blockers(plan_id):
+    return _index.blockers(plan_id)
+
+
+def vm_status(plan_id):
+    return _index.vm_status(plan_id)
+
+
+def summary(plan_id=None):
+    return _index.summary(plan_id)
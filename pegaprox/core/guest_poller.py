@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+PegaProx guest-agent poll planner - Layer 5
+Decides which running guests get their IP / disk-usage probe this cycle.
+
+refresh_ip_cache used to probe every running guest every 30s — 2 guest-agent
+calls per VM, so the load on pvedaemon grew with fleet size even though the
+answers almost never change. The planner keeps a per-guest interval instead:
+
+  - a guest that just started, rebooted or moved node is due right away and
+    polled at MIN_INTERVAL until its answer settles,
+  - every unchanged answer doubles the interval, up to MAX_INTERVAL,
+  - a changed answer drops it back to MIN_INTERVAL,
+  - guests someone has on screen (focus) are never older than FOCUS_INTERVAL,
+  - at most NODE_RATE probes per second per node, the rest wait a cycle.
+
+The manager owns the probing; this class only schedules and keeps the stats.
+"""
+
+import os
+import time
+import random
+import threading
+
+# NS Oct 2026 — per-guest probe schedule (seconds) and per-node rate cap
+MIN_INTERVAL = 15
+MAX_INTERVAL = int(os.environ.get('PEGAPROX_GUEST_AGENT_MAX_INTERVAL', 600))
+FOCUS_INTERVAL = 15
+NODE_RATE = float(os.environ.get('PEGAPROX_GUEST_AGENT_NODE_RATE', 2.0))
+POLL_TICK = 10                  # how often the manager asks for a plan
+
+
+class GuestPollPlanner:
+    """Per-cluster schedule for guest-agent probes, keyed by (node, vmid)."""
+
+    def __init__(self, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                 focus_interval=FOCUS_INTERVAL, node_rate=NODE_RATE):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.focus_interval = focus_interval
+        self.node_rate = max(0.1, node_rate)
+        self._guests = {}
+        self._last_plan = None
+        self._lock = threading.Lock()
+        self.counters = {'cycles': 0, 'probes': 0, 'unchanged': 0, 'changed': 0,
+                         'failed': 0, 'skipped': 0, 'deferred': 0}
+
+    def reset(self):
+        """Forget every schedule — after a reconnect all guests are due again."""
+        with self._lock:
+            self._guests.clear()
+            self._last_plan = None
+
+    def mark_stale(self, now=None):
+        """Make every known guest due on the next plan, keeping its interval —
+        used when the cluster was unwatched and nothing refreshed in between."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            for g in self._guests.values():
+                g['next'] = now
+
+    def plan(self, resources, focus=(), now=None):
+        """Running guests from `resources` that should be probed now, focused
+        ones first, then the longest-overdue, within each node's budget."""
+        now = time.monotonic() if now is None else now
+        focus = set(focus or ())
+        with self._lock:
+            # budget = what the per-node rate allows since the last plan,
+            # capped at one POLL_TICK worth so an idle stretch doesn't burst
+            since = POLL_TICK if self._last_plan is None else min(POLL_TICK, max(1.0, now - self._last_plan))
+            self._last_plan = now
+            budget_per_node = max(1, int(self.node_rate * since))
+            self.counters['cycles'] += 1
+
+            seen = set()
+            due = []
+            for r in resources or ():
+                if r.get('status') != 'running':
+                    continue
+                node, vmid = r.get('node', ''), r.get('vmid')
+                if not node or not vmid:
+                    continue
+                key = (node, vmid)
+                seen.add(key)
+                g = self._guests.get(key)
+                uptime = r.get('uptime') or 0
+                if g is None:
+                    # new to us: just started, migrated here, or first cycle
+                    g = self._guests[key] = {'interval': self.min_interval, 'next': now,
+                                             'checked': None, 'sig': None, 'uptime': uptime}
+                elif uptime and g['uptime'] and uptime < g['uptime']:
+                    # rebooted since the last look — agent answers will change
+                    g['interval'], g['next'] = self.min_interval, now
+                g['uptime'] = uptime
+                focused = vmid in focus
+                if focused and (g['checked'] is None or now - g['checked'] >= self.focus_interval):
+                    due.append((0, g['next'] - now, r))
+                elif g['next'] <= now:
+                    due.append((1, g['next'] - now, r))
+                else:
+                    self.counters['skipped'] += 1
+
+            for key in [k for k in self._guests if k not in seen]:
+                del self._guests[key]
+
+            due.sort(key=lambda d: (d[0], d[1]))
+            per_node = {}
+            out = []
+            for _, _, r in due:
+                node = r.get('node', '')
+                if per_node.get(node, 0) >= budget_per_node:
+                    self.counters['deferred'] += 1
+                    continue
+                per_node[node] = per_node.get(node, 0) + 1
+                out.append(r)
+            self.counters['probes'] += len(out)
+            return out
+
+    def record(self, node, vmid, answer, now=None):
+        """Fold a probe result in. `answer` is whatever the probe returned
+        (compared by value); None means the probe itself failed."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            g = self._guests.get((node, vmid))
+            if g is None:
+                return
+            g['checked'] = now
+            if answer is None:
+                self.counters['failed'] += 1
+                interval = g['interval']
+            elif g['sig'] is not None and answer == g['sig']:
+                self.counters['unchanged'] += 1
+                interval = min(self.max_interval, g['interval'] * 2)
+            else:
+                if g['sig'] is not None:
+                    self.counters['changed'] += 1
+                g['sig'] = answer
+                interval = self.min_interval
+            g['interval'] = interval
+            # ±10% so guests that started together drift apart
+            g['next'] = now + interval * random.uniform(0.9, 1.1)
+
+    def stats(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            ages = [now - g['checked'] for g in self._guests.values() if g['checked'] is not None]
+            out = dict(self.counters)
+            out['guests'] = len(self._guests)
+            out['never_checked'] = len(self._guests) - len(ages)
+            out['at_max_interval'] = sum(1 for g in self._guests.values()
+                                         if g['interval'] >= self.max_interval)
+        probes = out['unchanged'] + out['changed']
+        out['hit_ratio'] = round(out['unchanged'] / probes, 3) if probes else 0.0
+        out['age_avg_seconds'] = round(sum(ages) / len(ages), 1) if ages else 0.0
+        out['age_max_seconds'] = round(max(ages), 1) if ages else 0.0
+        return out
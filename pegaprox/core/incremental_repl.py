@@ -17,14 +17,23 @@ directly (pve-zsync's model), which rarely holds across separate clusters/sites.
     source node                PegaProx                 target node
     rbd export-diff  --stdout-->  relay  --stdin-->  rbd import-diff
 
+Throughput: the relay reads and writes concurrently over large-window
+channels, can compress the stream on the source node (zstd/lz4), and
+run_streams() ships a multi-disk VM's disks in parallel, one SSH connection
+pair per stream. Every relay reports wire/raw bytes, duration and stall time.
+
 This module is storage-primitive only: it moves one disk's delta and manages the
 snapshot chain. The VM-level orchestration (which disks, the snapshot on the
 guest, the replica VM config) lives in the replication engine that calls this.
 """
 
 import os
+import re
 import time
+import queue
 import logging
+import itertools
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -32,12 +41,70 @@ logger = logging.getLogger(__name__)
 # lock the relay by filling an undrained stderr buffer.
 _RBD = "rbd --no-progress"
 
+# NS Oct 2026 — relay transport tuning. One 4 MB-chunk recv/sendall loop over
+# paramiko's default 2 MB channel window left a cross-site link mostly idle:
+# every round trip the exporter stalled on a full window while we were still
+# busy writing the previous chunk to the target. Now the read and write sides
+# run in their own greenlets with a small bounded queue between them, the data
+# channels get a 16 MB window, the chunk size adapts to how much the source
+# actually has buffered, and the stream can be compressed on the source node
+# and decompressed on the target node (zstd/lz4 ship with PVE).
+REPL_STREAMS = max(1, int(os.environ.get('PEGAPROX_REPL_STREAMS', '4')))
+_CHUNK_MIN = 256 * 1024
+_CHUNK_MAX = 8 * 1024 * 1024
+_QUEUE_DEPTH = 4               # chunks in flight per stream → ≤ 32 MB buffered
+_STREAM_WINDOW = 16 * 1024 * 1024
+_STALL_THRESHOLD = 0.5         # a recv/sendall blocked longer than this counts as stall
+# compressor on the source, decompressor on the target. -v on the decompressor
+# reports the exact decoded size on stderr → raw bytes for the compression ratio.
+COMPRESSORS = {
+    'zstd': ('zstd -q -1 -T0 -c', 'zstd -d -v -c'),
+    'lz4': ('lz4 -q -1 -c', 'lz4 -d -v -c'),
+}
+_DECODED_RE = re.compile(r'(\d+) bytes')
+_tok_seq = itertools.count()
+
+
+def pick_compression(src_ssh, tgt_ssh, wanted='auto', log=None):
+    """Resolve a job's compression setting to a COMPRESSORS key (or None).
+
+    'auto' prefers zstd, then lz4; an explicit choice is honoured only when the
+    tool exists on BOTH nodes. Anything missing degrades to an uncompressed
+    stream rather than failing the run."""
+    wanted = (wanted or 'none').lower()
+    if wanted not in COMPRESSORS and wanted != 'auto':
+        return None
+    candidates = list(COMPRESSORS) if wanted == 'auto' else [wanted]
+    probe = "for t in " + ' '.join(candidates) + "; do command -v $t >/dev/null 2>&1 && echo $t; done"
+    have = set(_ssh_run(src_ssh, probe, timeout=20).split()) & set(_ssh_run(tgt_ssh, probe, timeout=20).split())
+    for c in candidates:
+        if c in have:
+            return c
+    if log and wanted != 'auto':
+        log(f"compression {wanted} not available on both nodes — sending uncompressed")
+    return None
+
+
+def _exec_stream(ssh, cmd, timeout):
+    """Start cmd on a channel with a large receive window and return the channel.
+    Falls back to plain exec_command() for ssh objects without a transport."""
+    try:
+        chan = ssh.get_transport().open_session(window_size=_STREAM_WINDOW, timeout=30)
+        chan.settimeout(timeout)
+        chan.exec_command(cmd)
+        return chan
+    except AttributeError:
+        _i, _o, _e = ssh.exec_command(cmd, timeout=timeout)
+        return _o.channel
+
 
 def _relay_pipe(src_ssh, src_cmd, tgt_ssh, tgt_cmd, chunk=4 * 1024 * 1024,
-                timeout=14400, log=None):
+                timeout=14400, log=None, compression=None):
     """Run src_cmd on the source (its stdout is the data stream) and pipe that
     stream into tgt_cmd's stdin on the target, relaying the bytes through this
-    process. Returns dict(ok, bytes, src_rc, tgt_rc, error).
+    process. Returns dict(ok, bytes, raw_bytes, seconds, stall_seconds,
+    compression, src_rc, tgt_rc, error) — `bytes` is what crossed the wire,
+    `raw_bytes` the stream size before compression.
 
     Both remote commands MUST keep stderr small (we don't drain it until the
     end) — callers use --no-progress / 2>/tmp/... to that effect.
@@ -47,59 +114,217 @@ def _relay_pipe(src_ssh, src_cmd, tgt_ssh, tgt_cmd, chunk=4 * 1024 * 1024,
             try: log(m)
             except Exception: pass
 
-    # A single-threaded relay must NOT let either remote command write to a
-    # stream we don't drain: the exporter's stdout IS the data (we read it) and
-    # the importer's stdin IS the data (we write it), but the exporter's stderr
-    # and the importer's stdout+stderr would otherwise fill their SSH-channel
-    # windows, block the remote process, and deadlock the pipe. Park those
-    # streams in files on the respective node and slurp them back at the end.
-    tok = f"/tmp/pegaprox-repl-{os.getpid()}-{int(time.time() * 1000) % 100000}"
-    full_src = f"{src_cmd} 2>{tok}.serr"
-    full_tgt = f"{tgt_cmd} >{tok}.tout 2>{tok}.terr"
-    _emit(f"exec[src]: {src_cmd}")
-    _si, _so, _se = src_ssh.exec_command(full_src, timeout=timeout)
-    _emit(f"exec[tgt]: {tgt_cmd}")
-    _ti, _to, _te = tgt_ssh.exec_command(full_tgt, timeout=timeout)
-
-    src_chan = _so.channel          # exporter: read its stdout (the data stream)
-    tgt_chan = _ti.channel          # importer: write its stdin (the data stream)
-    src_chan.settimeout(timeout)
-    tgt_chan.settimeout(timeout)
-    total = 0
-    relay_err = None
+    # The relay must NOT let either remote command write to a stream we don't
+    # drain: the exporter's stdout IS the data (we read it) and the importer's
+    # stdin IS the data (we write it), but the exporter's stderr and the
+    # importer's stdout+stderr would otherwise fill their SSH-channel windows,
+    # block the remote process, and deadlock the pipe. Park those streams in
+    # files on the respective node and slurp them back at the end.
+    # (Token carries a sequence number: parallel streams start in the same ms.)
+    tok = f"/tmp/pegaprox-repl-{os.getpid()}-{int(time.time() * 1000) % 100000}-{next(_tok_seq)}"
+    if compression in COMPRESSORS:
+        comp, decomp = COMPRESSORS[compression]
+        # the pipeline's exit status is the (de)compressor's — keep the real
+        # exporter/importer status: exporter rc goes to a file, importer is last.
+        full_src = f"{{ {src_cmd} 2>{tok}.serr; echo $? >{tok}.src; }} | {comp}"
+        full_tgt = f"{{ {decomp} 2>{tok}.zerr; echo $? >{tok}.dec; }} | {tgt_cmd} >{tok}.tout 2>{tok}.terr"
+    else:
+        compression = None
+        full_src = f"{src_cmd} 2>{tok}.serr"
+        full_tgt = f"{tgt_cmd} >{tok}.tout 2>{tok}.terr"
+    cleaned = False
     try:
-        while True:
-            data = src_chan.recv(chunk)
-            if not data:
-                break               # source EOF
-            tgt_chan.sendall(data)  # loops internally; honours window backpressure
-            total += len(data)
-    except Exception as e:
-        relay_err = f"relay error after {total} bytes: {type(e).__name__}: {e}"
-        logger.error(f"[INCR-REPL] {relay_err}")
-    finally:
-        # Signal EOF to the importer's stdin so it can finish and exit.
-        try: tgt_chan.shutdown_write()
-        except Exception: pass
-
-    src_rc = src_chan.recv_exit_status()
-    tgt_rc = tgt_chan.recv_exit_status()
+        _emit(f"exec[src]: {src_cmd}" + (f" | {compression}" if compression else ''))
+        src_chan = _exec_stream(src_ssh, full_src, timeout)   # exporter: read its stdout
+        _emit(f"exec[tgt]: {tgt_cmd}")
+        tgt_chan = _exec_stream(tgt_ssh, full_tgt, timeout)   # importer: write its stdin
+
+        q = queue.Queue(maxsize=_QUEUE_DEPTH)
+        st = {'bytes': 0, 'src_stall': 0.0, 'tgt_stall': 0.0, 'src_err': None}
+
+        def _reader():
+            size = max(_CHUNK_MIN, min(chunk, _CHUNK_MAX))
+            try:
+                while True:
+                    t0 = time.monotonic()
+                    data = src_chan.recv(size)
+                    waited = time.monotonic() - t0
+                    if waited > _STALL_THRESHOLD:
+                        st['src_stall'] += waited
+                    if not data:
+                        break           # source EOF
+                    # a full read means the source is ahead of us — take bigger bites;
+                    # mostly-empty reads mean it's trickling — don't hold big buffers
+                    if len(data) >= size and size < _CHUNK_MAX:
+                        size *= 2
+                    elif len(data) < size // 4 and size > _CHUNK_MIN:
+                        size //= 2
+                    q.put(data)
+            except Exception as e:
+                st['src_err'] = e
+            finally:
+                q.put(None)
+
+        t_start = time.monotonic()
+        reader = threading.Thread(target=_reader, daemon=True, name='repl-relay-read')
+        reader.start()
+        relay_err = None
+        try:
+            while True:
+                data = q.get()
+                if data is None:
+                    break
+                t0 = time.monotonic()
+                tgt_chan.sendall(data)  # loops internally; honours window backpressure
+                waited = time.monotonic() - t0
+                if waited > _STALL_THRESHOLD:
+                    st['tgt_stall'] += waited
+                st['bytes'] += len(data)
+            if st['src_err'] is not None:
+                raise st['src_err']
+        except Exception as e:
+            relay_err = f"relay error after {st['bytes']} bytes: {type(e).__name__}: {e}"
+            logger.error(f"[INCR-REPL] {relay_err}")
+            # stop the exporter and unblock the reader (it may be parked on q.put)
+            try: src_chan.close()
+            except Exception: pass
+            while reader.is_alive() or not q.empty():
+                try:
+                    if q.get(timeout=1) is None:
+                        break
+                except queue.Empty:
+                    pass
+        finally:
+            # Signal EOF to the importer's stdin so it can finish and exit.
+            try: tgt_chan.shutdown_write()
+            except Exception: pass
 
-    def _slurp(ssh, path):
+        src_rc = src_chan.recv_exit_status()
+        tgt_rc = tgt_chan.recv_exit_status()
+        seconds = time.monotonic() - t_start
+        total = st['bytes']
+
+        def _slurp(ssh, path):
+            try:
+                _i, o, _e = ssh.exec_command(f"cat {path} 2>/dev/null; rm -f {path}", timeout=20)
+                return o.read().decode('utf-8', 'replace').strip()
+            except Exception:
+                return ''
+        src_err = _slurp(src_ssh, f"{tok}.serr")
+        tgt_err = _slurp(tgt_ssh, f"{tok}.terr")
+        _slurp(tgt_ssh, f"{tok}.tout")   # importer stdout — discard, just clean up
+        raw = total
+        if compression:
+            # exporter / decompressor status from their rc files; missing file = never ran
+            def _rc(v):
+                return int(v) if v.strip().lstrip('-').isdigit() else -1
+            # both rc files are always read back — reading also removes them
+            exp_rc = _rc(_slurp(src_ssh, f"{tok}.src"))
+            dec_rc = _rc(_slurp(tgt_ssh, f"{tok}.dec"))
+            if src_rc == 0:
+                src_rc = exp_rc
+            zerr = _slurp(tgt_ssh, f"{tok}.zerr")
+            decoded = _DECODED_RE.findall(zerr)
+            if decoded:
+                raw = int(decoded[-1])
+            if dec_rc != 0:
+                tgt_err = ' '.join(p for p in (tgt_err, f"{compression} -d exit {dec_rc}: {zerr[-200:]}") if p)
+                if tgt_rc == 0:
+                    tgt_rc = dec_rc
+
+        parts = [p for p in (relay_err, src_err and f"src: {src_err}",
+                             tgt_err and f"tgt: {tgt_err}") if p]
+        ok = (relay_err is None) and src_rc == 0 and tgt_rc == 0
+        cleaned = True
+        return {'ok': ok, 'bytes': total, 'raw_bytes': raw, 'seconds': seconds,
+                'stall_seconds': st['src_stall'] + st['tgt_stall'], 'compression': compression,
+                'src_rc': src_rc, 'tgt_rc': tgt_rc, 'error': ' | '.join(parts)}
+    finally:
+        # every file is read back (and removed) above; if we bailed out before
+        # that — a channel that failed to open, a dropped connection — remove
+        # the stderr/stdout/rc files here so they don't pile up in /tmp
+        if not cleaned:
+            for ssh in (src_ssh, tgt_ssh):
+                try:
+                    ssh.exec_command(f"rm -f {tok}.*", timeout=20)
+                except Exception:
+                    pass
+
+
+def run_streams(items, fn, first_pair, open_pair, streams=None, timeout=86400):
+    """Ship several independent streams (one per disk) in parallel.
+
+    items: {key: payload}; fn(payload, src_ssh, tgt_ssh) -> result dict.
+    Each concurrent stream gets its OWN ssh connection pair — channels on one
+    paramiko transport share a single cipher stream and reader thread, so
+    extra channels on the same connection would not add throughput. The first
+    stream reuses first_pair; the others come from open_pair() (returns
+    (src_ssh, tgt_ssh) or None) and are closed here. Returns {key: result}.
+    """
+    from pegaprox.utils.concurrent import run_per_node
+    streams = max(1, min(int(streams or REPL_STREAMS), len(items)))
+    if streams == 1:
+        return {k: fn(v, *first_pair) for k, v in items.items()}
+    free, opened = [first_pair], []
+    lock = threading.Lock()
+
+    def _take():
+        with lock:
+            if free:
+                return free.pop()
+        pair = None
         try:
-            _i, o, _e = ssh.exec_command(f"cat {path} 2>/dev/null; rm -f {path}", timeout=20)
-            return o.read().decode('utf-8', 'replace').strip()
-        except Exception:
-            return ''
-    src_err = _slurp(src_ssh, f"{tok}.serr")
-    tgt_err = _slurp(tgt_ssh, f"{tok}.terr")
-    _slurp(tgt_ssh, f"{tok}.tout")   # importer stdout — discard, just clean up
+            pair = open_pair()
+        except Exception as e:
+            logger.warning(f"[INCR-REPL] extra stream connection failed: {e}")
+        if pair and all(pair):
+            with lock:
+                opened.append(pair)
+            return pair
+        for s in (pair or ()):
+            try:
+                if s: s.close()
+            except Exception: pass
+        return None
+
+    def _run(key):
+        pair = _take()
+        while pair is None:     # couldn't open another pair — wait for a free one
+            time.sleep(0.5)
+            with lock:
+                pair = free.pop() if free else None
+        try:
+            return fn(items[key], *pair)
+        except Exception as e:
+            return {'ok': False, 'bytes': 0, 'error': f"{type(e).__name__}: {e}"}
+        finally:
+            with lock:
+                free.append(pair)
 
-    parts = [p for p in (relay_err, src_err and f"src: {src_err}",
-                         tgt_err and f"tgt: {tgt_err}") if p]
-    ok = (relay_err is None) and src_rc == 0 and tgt_rc == 0
-    return {'ok': ok, 'bytes': total, 'src_rc': src_rc, 'tgt_rc': tgt_rc,
-            'error': ' | '.join(parts)}
+    try:
+        out = run_per_node({k: _run for k in items}, max_concurrent=streams, timeout=timeout)
+    finally:
+        for pair in opened:
+            for s in pair:
+                try: s.close()
+                except Exception: pass
+    return {k: (r if r is not None else {'ok': False, 'bytes': 0, 'error': 'stream timed out'})
+            for k, r in out.items()}
+
+
+def transfer_stats(results, seconds):
+    """Aggregate _relay_pipe results of one run: wire/raw bytes, bytes/s (raw,
+    over wall-clock), compression ratio (raw/wire) and total stall seconds."""
+    results = [r for r in results if r]
+    wire = sum(r.get('bytes', 0) for r in results)
+    raw = sum(r.get('raw_bytes', r.get('bytes', 0)) for r in results)
+    return {
+        'bytes': wire,
+        'raw_bytes': raw,
+        'bytes_per_sec': round(raw / seconds, 1) if seconds > 0 else 0.0,
+        'compress_ratio': round(raw / wire, 3) if wire else 0.0,
+        'stall_seconds': round(sum(r.get('stall_seconds', 0.0) for r in results), 2),
+    }
 
 
 # ------------------------------------------------------------------ RBD -----
@@ -121,7 +346,7 @@ def rbd_image_exists(ssh, pool, image, timeout=30):
 
 
 def rbd_replicate_disk(src_ssh, tgt_ssh, src_pool, src_image, tgt_pool, tgt_image,
-                       new_snap, base_snap=None, log=None):
+                       new_snap, base_snap=None, log=None, compression=None):
     """Replicate one RBD image's state at <new_snap> from source to target.
 
     Requires the snapshot <src_pool>/<src_image>@<new_snap> to already exist on
@@ -154,7 +379,7 @@ def rbd_replicate_disk(src_ssh, tgt_ssh, src_pool, src_image, tgt_pool, tgt_imag
         src_cmd = f"{_RBD} export-diff --from-snap {_q(base_snap)} {src_snap_ref} -"
         tgt_cmd = f"{_RBD} import-diff - {tgt}"
         if log: log(f"RBD incremental: {src_pool}/{src_image}@{base_snap}..@{new_snap} -> {tgt_pool}/{tgt_image}")
-        res = _relay_pipe(src_ssh, src_cmd, tgt_ssh, tgt_cmd, log=log)
+        res = _relay_pipe(src_ssh, src_cmd, tgt_ssh, tgt_cmd, log=log, compression=compression)
         res['mode'] = mode
         return res
 
@@ -170,7 +395,7 @@ def rbd_replicate_disk(src_ssh, tgt_ssh, src_pool, src_image, tgt_pool, tgt_imag
     src_cmd = f"{_RBD} export {src_snap_ref} -"
     tgt_cmd = f"{_RBD} import - {tgt}"
     if log: log(f"RBD seed (full): {src_pool}/{src_image}@{new_snap} -> {tgt_pool}/{tgt_image}")
-    res = _relay_pipe(src_ssh, src_cmd, tgt_ssh, tgt_cmd, log=log)
+    res = _relay_pipe(src_ssh, src_cmd, tgt_ssh, tgt_cmd, log=log, compression=compression)
     res['mode'] = mode
     if res['ok']:
         # anchor the incremental chain: snapshot the freshly-seeded target
@@ -206,7 +431,7 @@ def zfs_snap_exists(ssh, dataset, snap, timeout=30):
 
 
 def zfs_replicate_dataset(src_ssh, tgt_ssh, src_dataset, tgt_dataset,
-                          new_snap, base_snap=None, log=None):
+                          new_snap, base_snap=None, log=None, compression=None):
     """Replicate a ZFS dataset's @new_snap from source to target via send/recv.
 
     SEED: `zfs send src@new_snap | zfs recv -F tgt`.
@@ -229,7 +454,7 @@ def zfs_replicate_dataset(src_ssh, tgt_ssh, src_dataset, tgt_dataset,
         src_cmd = f"zfs send {_q(src_dataset)}@{_q(new_snap)}"
         tgt_cmd = f"zfs recv -F {_q(tgt_dataset)}"
     if log: log(f"ZFS {mode}: {src_dataset}@{new_snap} -> {tgt_dataset}")
-    res = _relay_pipe(src_ssh, src_cmd, tgt_ssh, tgt_cmd, log=log)
+    res = _relay_pipe(src_ssh, src_cmd, tgt_ssh, tgt_cmd, log=log, compression=compression)
     res['mode'] = mode
     return res
 
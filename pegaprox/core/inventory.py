@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+PegaProx Inventory Index - Layer 3
+Cross-cluster in-memory guest index behind /api/global/search.
+"""
+
+import time
+import threading
+
+# NS Oct 2026 — global search used to call get_vm_resources() on every cluster
+# per keystroke (40 clusters = 40 /cluster/resources walks per search) and then
+# substring-scan every guest. The index is fed by the broadcast loop's published
+# resource lists (utils/resource_state.publish_resources), so for any cluster
+# somebody has open it is always current without extra PVE calls. Lookups go
+# through 2/3-gram posting lists per field and an inverted tag index; every
+# candidate is still verified with the same substring test the old scan used,
+# so results are identical, just not O(all guests).
+
+# fields that decide whether a row's postings have to be rebuilt; anything else
+# (cpu/mem/uptime...) only swaps the stored row
+_INDEXED = ('name', 'vmid', 'node', 'ip', 'tags', 'status', 'type')
+
+# order = priority of match_field for an un-prefixed query (matches the old scan)
+GLOBAL_FIELDS = ('name', 'vmid', 'node', 'ip', 'tag')
+
+
+def _grams(s):
+    out = set()
+    for n in (2, 3):
+        for i in range(len(s) - n + 1):
+            out.add(s[i:i + n])
+    return out
+
+
+def _split_tags(tags):
+    tags = (tags or '').lower()
+    return [t.strip() for t in tags.split(';') if t.strip()] if tags else []
+
+
+class _Row:
+    __slots__ = ('r', 'name', 'vmid', 'node', 'ip', 'tags', 'status', 'sig')
+
+    def __init__(self, r):
+        self.r = r
+        self.name = (r.get('name') or '').lower()
+        self.vmid = str(r.get('vmid', ''))
+        self.node = (r.get('node') or '').lower()
+        self.ip = (r.get('ip') or '').lower()
+        self.tags = _split_tags(r.get('tags'))
+        self.status = (r.get('status') or '').lower()
+        self.sig = tuple(r.get(f) for f in _INDEXED)
+
+    def values(self, field):
+        if field == 'tag':
+            return self.tags
+        return (getattr(self, field),)
+
+
+class ClusterInventory:
+    """Guests of one cluster + their posting lists. Mutated under self.lock."""
+
+    def __init__(self):
+        self.rows = {}          # vmid → _Row
+        self.postings = {f: {} for f in GLOBAL_FIELDS}   # field → gram → {vmid}
+        self.by_tag = {}        # exact tag → {vmid}
+        self.by_status = {}     # status → {vmid}
+        self.updated_at = 0.0
+        self.lock = threading.Lock()
+
+    def _index(self, key, row, add):
+        for field in GLOBAL_FIELDS:
+            post = self.postings[field]
+            for v in row.values(field):
+                for g in _grams(v):
+                    if add:
+                        post.setdefault(g, set()).add(key)
+                    else:
+                        s = post.get(g)
+                        if s is not None:
+                            s.discard(key)
+                            if not s:
+                                del post[g]
+        for bucket, vals in ((self.by_tag, row.tags), (self.by_status, (row.status,))):
+            for v in vals:
+                if add:
+                    bucket.setdefault(v, set()).add(key)
+                else:
+                    s = bucket.get(v)
+                    if s is not None:
+                        s.discard(key)
+                        if not s:
+                            del bucket[v]
+
+    def update(self, resources):
+        """Sync with a full get_vm_resources() list; only rows whose indexed
+        fields changed touch the posting lists."""
+        seen = set()
+        with self.lock:
+            for r in resources:
+                key = r.get('vmid')
+                if key is None:
+                    continue
+                seen.add(key)
+                old = self.rows.get(key)
+                if old is not None and old.sig == tuple(r.get(f) for f in _INDEXED):
+                    old.r = r
+                    continue
+                row = _Row(r)
+                if old is not None:
+                    self._index(key, old, add=False)
+                self.rows[key] = row
+                self._index(key, row, add=True)
+            for key in [k for k in self.rows if k not in seen]:
+                self._index(key, self.rows.pop(key), add=False)
+            self.updated_at = time.time()
+
+    def _candidates(self, field, q):
+        """vmids whose `field` may contain q (superset — caller verifies)."""
+        if len(q) < 2:
+            return set(self.rows)
+        post = self.postings[field]
+        if len(q) == 2:
+            return set(post.get(q, ()))
+        sets = []
+        for i in range(len(q) - 2):
+            s = post.get(q[i:i + 3])
+            if not s:
+                return set()
+            sets.append(s)
+        sets.sort(key=len)
+        out = set(sets[0])
+        for s in sets[1:]:
+            out &= s
+            if not out:
+                break
+        return out
+
+    def match(self, query, prefix_filter=None, tag_queries=None):
+        """[(row dict, match_field)] — same semantics as the old linear scan."""
+        hits = []
+        with self.lock:
+            if prefix_filter == 'tag':
+                tqs = tag_queries or [query]
+                cands = None
+                for tq in tqs:
+                    c = self._candidates('tag', tq)
+                    cands = c if cands is None else cands & c
+                for key in sorted(cands or (), key=str):
+                    row = self.rows[key]
+                    if all(any(tq in t for t in row.tags) for tq in tqs):
+                        hits.append((row.r, 'tag'))
+            elif prefix_filter == 'status':
+                for status, keys in self.by_status.items():
+                    if status.startswith(query):
+                        hits.extend((self.rows[k].r, 'status') for k in sorted(keys, key=str))
+            elif prefix_filter in ('node', 'ip'):
+                for key in sorted(self._candidates(prefix_filter, query), key=str):
+                    row = self.rows[key]
+                    if query in getattr(row, prefix_filter):
+                        hits.append((row.r, prefix_filter))
+            else:
+                field_of = {}
+                for field in GLOBAL_FIELDS:
+                    for key in self._candidates(field, query):
+                        if key in field_of:
+                            continue
+                        row = self.rows[key]
+                        if any(query in v for v in row.values(field)):
+                            field_of[key] = field
+                for key in sorted(field_of, key=str):
+                    hits.append((self.rows[key].r, field_of[key]))
+        return hits
+
+    def tags(self):
+        with self.lock:
+            return list(self.by_tag)
+
+
+_clusters = {}
+_clusters_lock = threading.Lock()
+
+
+def get_cluster_inventory(cluster_id, create=True):
+    with _clusters_lock:
+        inv = _clusters.get(cluster_id)
+        if inv is None and create:
+            inv = _clusters[cluster_id] = ClusterInventory()
+        return inv
+
+
+def update_cluster(cluster_id, resources):
+    get_cluster_inventory(cluster_id).update(resources)
+
+
+def touch_cluster(cluster_id):
+    """Mark a cluster's index current (fresh poll, nothing changed)."""
+    inv = get_cluster_inventory(cluster_id, create=False)
+    if inv is not None:
+        inv.updated_at = time.time()
+
+
+def drop_cluster(cluster_id):
+    with _clusters_lock:
+        _clusters.pop(cluster_id, None)
+
+
+def cluster_age(cluster_id):
+    """Seconds since the cluster's index was last synced, None if never."""
+    inv = get_cluster_inventory(cluster_id, create=False)
+    if inv is None or not inv.updated_at:
+        return None
+    return time.time() - inv.updated_at
@@ -0,0 +1,501 @@
+# -*- coding: utf-8 -*-
+"""
+PegaProx job scheduler - Layer 4
+One timer heap for every recurring job: snapshot policies, scheduled VM
+actions, rolling-update windows and the legacy scheduled_tasks table.
+
+Each of those used to run its own 60s loop that re-read its whole table,
+re-evaluated every row's schedule (cron included) and ran whatever was due
+inline, one after the other. One slow snapshot policy held up all the
+others, and due times drifted by up to a minute. Now:
+
+  - a job's next fire time is computed once — when it's loaded, edited or has
+    just run — and sits in a min-heap. Between fire times the dispatcher
+    sleeps; no table is read and no schedule is parsed,
+  - at fire time the job's row is re-read once (it may have been disabled,
+    edited or run by hand since) and handed to a bounded pool: WORKERS jobs
+    at once, at most PER_CLUSTER of them against the same cluster; the rest
+    queue in fire order,
+  - every start records its lateness (start - fire time) per kind.
+
+A subsystem plugs in with a JobSource subclass (load / next_fire / run /
+cluster) and calls touch(kind, id) after it writes a job — or reload(kind)
+after a bulk rewrite — so the heap follows the table.
+
+NS Oct 2026
+"""
+
+import os
+import time
+import heapq
+import logging
+import itertools
+import threading
+from datetime import datetime, timedelta
+
+WORKERS = int(os.environ.get('PEGAPROX_SCHEDULER_WORKERS', 8))
+PER_CLUSTER = int(os.environ.get('PEGAPROX_SCHEDULER_PER_CLUSTER', 2))
+MAX_SLEEP = 60          # re-check the wall clock at least this often (NTP steps, DST)
+
+
+# ──────────────────────────────────────────
+# Schedule helpers shared by the job sources
+# ──────────────────────────────────────────
+
+# NS #586 — small self-contained cron matcher so we don't pull in croniter.
+# 5 fields: "min hour dom month dow". Supports *, lists (a,b), ranges (a-b),
+# and steps (*/n, a-b/n). dow: 0 or 7 = Sunday.
+def cron_field(field, value, lo, hi):
+    field = field.strip()
+    if field == '*':
+        return True
+    for part in field.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        step = 1
+        rng = part
+        if '/' in part:
+            rng, _, st = part.partition('/')
+            try:
+                step = int(st)
+            except ValueError:
+                continue
+            if step <= 0:
+                continue
+        if rng == '*':
+            start, end = lo, hi
+        elif '-' in rng:
+            a, _, b = rng.partition('-')
+            try:
+                start, end = int(a), int(b)
+            except ValueError:
+                continue
+        else:
+            try:
+                start = end = int(rng)
+            except ValueError:
+                continue
+        if start > end:
+            continue
+        if value < start or value > end:
+            continue
+        if (value - start) % step == 0:
+            return True
+    return False
+
+
+def _cron_day_ok(dom, dow, day, dom_set, dow_set):
+    cron_dow = (day.weekday() + 1) % 7  # python Mon=0..Sun=6 -> cron Sun=0..Sat=6
+    dom_restricted = dom.strip() != '*'
+    dow_restricted = dow.strip() != '*'
+    dom_ok = day.day in dom_set
+    dow_ok = cron_dow in dow_set
+    # standard cron rule: if both DOM and DOW are restricted, match either
+    if dom_restricted and dow_restricted:
+        return dom_ok or dow_ok
+    if dom_restricted:
+        return dom_ok
+    if dow_restricted:
+        return dow_ok
+    return True
+
+
+def _cron_sets(expr):
+    parts = (expr or '').split()
+    if len(parts) != 5:
+        return None
+    mn, hr, dom, mon, dow = parts
+    return (parts,
+            [v for v in range(60) if cron_field(mn, v, 0, 59)],
+            [v for v in range(24) if cron_field(hr, v, 0, 23)],
+            {v for v in range(1, 32) if cron_field(dom, v, 1, 31)},
+            {v for v in range(1, 13) if cron_field(mon, v, 1, 12)},
+            {v for v in range(7) if cron_field(dow, v, 0, 7) or (v == 0 and cron_field(dow, 7, 0, 7))})
+
+
+def cron_match(expr, dt):
+    """True if dt matches the 5-field cron expr. A malformed expr never fires."""
+    parts = (expr or '').split()
+    if len(parts) != 5:
+        return False
+    mn, hr, dom, mon, dow = parts
+    cron_dow = (dt.weekday() + 1) % 7
+    if not (cron_field(mn, dt.minute, 0, 59) and cron_field(hr, dt.hour, 0, 23)
+            and cron_field(mon, dt.month, 1, 12)):
+        return False
+    dom_set = {dt.day} if cron_field(dom, dt.day, 1, 31) else set()
+    dow_set = {cron_dow} if (cron_field(dow, cron_dow, 0, 7)
+                             or (cron_dow == 0 and cron_field(dow, 7, 0, 7))) else set()
+    return _cron_day_ok(dom, dow, dt, dom_set, dow_set)
+
+
+def cron_next(expr, after, horizon_days=366 * 5):
+    """First minute strictly after `after` that matches the cron expr, or None
+    (malformed, or nothing within the horizon — e.g. '0 0 31 2 *')."""
+    sets = _cron_sets(expr)
+    if sets is None:
+        return None
+    (_, _, dom, _, dow), mins, hours, dom_set, months, dow_set = sets
+    if not mins or not hours:
+        return None
+    start = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    day = start.date()
+    for _ in range(horizon_days):
+        if day.month in months and _cron_day_ok(dom, dow, day, dom_set, dow_set):
+            first_day = day == start.date()
+            for h in hours:
+                if first_day and h < start.hour:
+                    continue
+                for m in mins:
+                    if first_day and h == start.hour and m < start.minute:
+                        continue
+                    return datetime(day.year, day.month, day.day, h, m)
+        day += timedelta(days=1)
+    return None
+
+
+def parse_hhmm(value, default=(3, 0)):
+    try:
+        hh, mm = [int(x) for x in str(value).strip().split(':', 1)]
+        if 0 <= hh < 24 and 0 <= mm < 60:
+            return hh, mm
+    except Exception:
+        pass
+    return default
+
+
+def next_at(after, hh, mm, day_ok=None, horizon_days=400):
+    """First HH:MM strictly after `after` on a day accepted by day_ok(date)."""
+    day = after.date()
+    for _ in range(horizon_days):
+        cand = datetime(day.year, day.month, day.day, hh, mm)
+        if cand > after and (day_ok is None or day_ok(day)):
+            return cand
+        day += timedelta(days=1)
+    return None
+
+
+def not_before(after, last_run):
+    """`after`, moved up to last_run when the job already ran later than that
+    — so a reload never re-fires a slot that's been served."""
+    if not last_run:
+        return after
+    try:
+        last_dt = datetime.fromisoformat(str(last_run).strip())
+    except ValueError:
+        return after
+    if last_dt.tzinfo is not None:
+        last_dt = last_dt.astimezone().replace(tzinfo=None)
+    return max(after, last_dt)
+
+
+# ──────────────────────────────────────────
+# Sources + scheduler
+# ──────────────────────────────────────────
+
+class JobSource:
+    """One kind of scheduled job. Subclasses read and write their own table."""
+
+    kind = ''
+    grace = 60      # a fire time missed by less than this still runs (startup, edits)
+
+    def load(self, job_id=None):
+        """{job_id: job} of every enabled job, or the one job (None if it's gone
+        or disabled)."""
+        raise NotImplementedError
+
+    def next_fire(self, job, after):
+        """First local datetime strictly after `after` the job should run, or None."""
+        raise NotImplementedError
+
+    def run(self, job, fire_at):
+        raise NotImplementedError
+
+    def cluster(self, job):
+        return job.get('cluster_id') or ''
+
+
+class JobScheduler:
+    """Min-heap of next fire times + a bounded, per-cluster-limited run pool."""
+
+    def __init__(self, workers=WORKERS, per_cluster=PER_CLUSTER, clock=time.time):
+        self.workers = max(1, int(workers))
+        self.per_cluster = max(1, int(per_cluster))
+        self._clock = clock
+        self._sources = {}
+        self._jobs = {}         # (kind, id) → {'job', 'gen', 'fire', 'running'}
+        self._heap = []         # (fire ts, seq, key, gen) — stale gens are skipped
+        self._queue = []        # (fire ts, seq, key, job, deferred) waiting for a slot
+        self._seq = itertools.count()
+        self._active = 0
+        self._per_cluster = {}
+        self._cond = threading.Condition(threading.Lock())
+        self._thread = None
+        self._stats = {}
+
+    # ── registration / table changes ──
+
+    def register(self, source):
+        with self._cond:
+            self._sources[source.kind] = source
+            self._stats.setdefault(source.kind, {'fired': 0, 'skipped': 0, 'deferred': 0, 'failed': 0,
+                                                 'lateness_sum': 0.0, 'lateness_max': 0.0})
+        self.reload(source.kind)
+
+    def unregister(self, kind):
+        with self._cond:
+            self._sources.pop(kind, None)
+            for key in [k for k in self._jobs if k[0] == kind]:
+                del self._jobs[key]
+
+    def reload(self, kind):
+        """Re-read every job of `kind` — after a bulk rewrite of its table."""
+        src = self._sources.get(kind)
+        if src is None:
+            return
+        try:
+            jobs = src.load() or {}
+        except Exception as e:
+            logging.warning(f"[scheduler] loading {kind} jobs failed: {e}")
+            return
+        with self._cond:
+            if self._sources.get(kind) is not src:
+                return
+            after = self._now_dt() - timedelta(seconds=src.grace)
+            for key in [k for k in self._jobs if k[0] == kind and k[1] not in jobs]:
+                if not self._jobs[key]['running']:
+                    del self._jobs[key]
+            for job_id, job in jobs.items():
+                self._schedule((kind, job_id), job, after)
+            self._cond.notify_all()
+
+    def touch(self, kind, job_id):
+        """Re-read one job after it was created, edited, enabled or deleted."""
+        src = self._sources.get(kind)
+        if src is None:
+            return
+        try:
+            job = src.load(job_id)
+        except Exception as e:
+            logging.warning(f"[scheduler] loading {kind}/{job_id} failed: {e}")
+            return
+        with self._cond:
+            key = (kind, job_id)
+            if job is None:
+                entry = self._jobs.get(key)
+                if entry is not None and not entry['running']:
+                    del self._jobs[key]
+            else:
+                self._schedule(key, job, self._now_dt() - timedelta(seconds=src.grace))
+            self._cond.notify_all()
+
+    def _now_dt(self):
+        return datetime.fromtimestamp(self._clock())
+
+    def _schedule(self, key, job, after):
+        # lock held. A running job keeps its new row but is rescheduled when it ends.
+        # gens come from the global counter so a re-created job can't revive a stale heap entry
+        entry = self._jobs.setdefault(key, {'job': job, 'gen': 0, 'fire': None, 'running': False})
+        entry['job'] = job
+        entry['gen'] = next(self._seq)
+        entry['fire'] = None
+        if entry['running']:
+            return
+        try:
+            nxt = self._sources[key[0]].next_fire(job, after)
+        except Exception as e:
+            logging.warning(f"[scheduler] next fire of {key[0]}/{key[1]} failed: {e}")
+            nxt = None
+        if nxt is None:
+            del self._jobs[key]     # nothing left to fire (once-jobs that ran, past dates)
+            return
+        entry['fire'] = nxt.timestamp()
+        heapq.heappush(self._heap, (entry['fire'], next(self._seq), key, entry['gen']))
+
+    # ── dispatch ──
+
+    def tick(self):
+        """Hand every job whose fire time has come to the pool. Returns how many
+        were queued."""
+        now = self._clock()
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                fire, _, key, gen = heapq.heappop(self._heap)
+                entry = self._jobs.get(key)
+                if entry is None or entry['gen'] != gen or entry['running']:
+                    continue
+                entry['fire'] = None
+                due.append((fire, key, self._sources.get(key[0])))
+
+        queued = 0
+        for fire, key, src in due:
+            if src is None:
+                continue
+            # the row may have changed since the fire time was computed (run by
+            # hand, disabled, edited by something that didn't touch()) — one
+            # SELECT per fire instead of one per job per minute
+            try:
+                job = src.load(key[1])
+                still_due = job is not None and self._same_fire(
+                    src.next_fire(job, datetime.fromtimestamp(fire) - timedelta(seconds=1)), fire)
+            except Exception as e:
+                logging.warning(f"[scheduler] re-checking {key[0]}/{key[1]} failed: {e}")
+                job, still_due = None, False
+            with self._cond:
+                if key not in self._jobs or self._sources.get(key[0]) is not src:
+                    continue
+                if not still_due:
+                    self._stats[key[0]]['skipped'] += 1
+                    if job is None:
+                        del self._jobs[key]
+                    else:
+                        self._schedule(key, job, datetime.fromtimestamp(fire))
+                    continue
+                self._jobs[key]['job'] = job
+                self._jobs[key]['running'] = True     # queued counts as running: no double fire
+                heapq.heappush(self._queue, (fire, next(self._seq), key, job, False))
+                queued += 1
+        if queued:
+            with self._cond:
+                self._pump()
+        return queued
+
+    @staticmethod
+    def _same_fire(nxt, fire):
+        return nxt is not None and abs(nxt.timestamp() - fire) < 1
+
+    def _pump(self):
+        # lock held. Start queued jobs in fire order while slots are free.
+        waiting = []
+        while self._queue and self._active < self.workers:
+            item = heapq.heappop(self._queue)
+            fire, seq, key, job, deferred = item
+            src = self._sources.get(key[0])
+            if src is None:
+                self._jobs.pop(key, None)
+                continue
+            cluster = src.cluster(job)
+            if self._per_cluster.get(cluster, 0) >= self.per_cluster:
+                if not deferred:
+                    self._stats[key[0]]['deferred'] += 1
+                waiting.append((fire, seq, key, job, True))
+                continue
+            self._active += 1
+            self._per_cluster[cluster] = self._per_cluster.get(cluster, 0) + 1
+            t = threading.Thread(target=self._run_job, args=(src, key, job, fire, cluster),
+                                 daemon=True, name=f'sched-{key[0]}-{key[1]}')
+            t.start()
+        for item in waiting:
+            heapq.heappush(self._queue, item)
+
+    def _run_job(self, src, key, job, fire, cluster):
+        started = self._clock()
+        lateness = max(0.0, started - fire)
+        with self._cond:
+            st = self._stats[key[0]]
+            st['fired'] += 1
+            st['lateness_sum'] += lateness
+            st['lateness_max'] = max(st['lateness_max'], lateness)
+        try:
+            src.run(job, datetime.fromtimestamp(fire))
+        except Exception as e:
+            with self._cond:
+                self._stats[key[0]]['failed'] += 1
+            logging.warning(f"[scheduler] {key[0]}/{key[1]} run failed: {e}")
+        try:
+            fresh = src.load(key[1])
+        except Exception:
+            fresh = job
+        with self._cond:
+            self._active -= 1
+            self._per_cluster[cluster] = max(0, self._per_cluster.get(cluster, 0) - 1)
+            entry = self._jobs.get(key)
+            if entry is not None:
+                entry['running'] = False
+                if fresh is None or self._sources.get(key[0]) is not src:
+                    del self._jobs[key]
+                else:
+                    # a run that overran its next slot catches up once, not N times
+                    after = max(datetime.fromtimestamp(fire),
+                                self._now_dt() - timedelta(seconds=src.grace))
+                    self._schedule(key, fresh, after)
+            self._pump()
+            self._cond.notify_all()
+
+    # ── service loop ──
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, daemon=True, name='job-scheduler')
+            self._thread.start()
+        logging.info(f"[scheduler] started ({self.workers} workers, {self.per_cluster} per cluster)")
+
+    def _loop(self):
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                logging.error(f"[scheduler] dispatch error: {e}")
+            with self._cond:
+                wait = MAX_SLEEP
+                if self._heap:
+                    wait = min(MAX_SLEEP, self._heap[0][0] - self._clock())
+                if wait > 0:
+                    self._cond.wait(max(0.05, wait))
+
+    def wait_idle(self, timeout=5.0):
+        """Block until nothing is queued or running (tests, shutdown)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._active or self._queue:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                self._cond.wait(left)
+        return True
+
+    def stats(self):
+        now = self._clock()
+        with self._cond:
+            out = {}
+            for kind, st in self._stats.items():
+                keys = [k for k in self._jobs if k[0] == kind]
+                fires = [self._jobs[k]['fire'] for k in keys if self._jobs[k]['fire'] is not None]
+                d = dict(st)
+                d['jobs'] = len(keys)
+                d['running'] = sum(1 for k in keys if self._jobs[k]['running'])
+                d['queued'] = sum(1 for item in self._queue if item[2][0] == kind)
+                d['running'] -= d['queued']
+                d['next_fire_seconds'] = round(max(0.0, min(fires) - now), 1) if fires else None
+                d['lateness_avg'] = round(d['lateness_sum'] / d['fired'], 3) if d['fired'] else 0.0
+                out[kind] = d
+            return out
+
+
+_service = JobScheduler()
+
+
+def register(source):
+    """Add a job source to the process-wide scheduler and make sure it runs."""
+    _service.register(source)
+    _service.start()
+
+
+def unregister(kind):
+    _service.unregister(kind)
+
+
+def touch(kind, job_id):
+    _service.touch(kind, job_id)
+
+
+def reload(kind):
+    _service.reload(kind)
+
+
+def stats():
+    return _service.stats()
@@ -48,10 +48,14 @@ from pegaprox.globals import (
 )
 from pegaprox.models.tasks import MaintenanceTask, PegaProxConfig
 from pegaprox.core.config import save_config
-from pegaprox.utils.realtime import broadcast_sse, is_cluster_watched
+from pegaprox.utils.realtime import broadcast_sse, is_cluster_watched, focused_guests
 from pegaprox.utils.ssh import get_ssh_connection_stats, _ssh_track_connection
 from pegaprox.utils.concurrent import GEVENT_PATCHED
 from pegaprox.core.db import get_db
+from pegaprox.core.placement import PlanNode, PlanVM, plan_placement, swap_safe_prefix
+from pegaprox.core.migration_queue import MigrationJob, get_migration_queue
+from pegaprox.core.guest_poller import GuestPollPlanner, POLL_TICK as GUEST_POLL_TICK
+from pegaprox.core.rrd_cache import cached_series, RrdFetchError
 
 # Lazy paramiko import
 def get_paramiko():
@@ -308,6 +312,7 @@ class PegaProxManager:
         self.last_run = None
         self.last_migration_log = []
         self._vm_migration_cooldown = {}  # {vmid: timestamp} — prevent ping-pong
+        self.last_balance_plan = None  # NS Oct 2026: last plan_balance() result (dry-run view)
         self._node_metrics_history = {}  # {node_name: [{timestamp, cpu, mem_pct, ...}]} ring buffer for predictive LB
         self._metrics_history_lock = threading.Lock()  # guard concurrent access from API routes
         # #601 — hottest lm-sensors reading per node (°C), refreshed by the 5-min
@@ -334,7 +339,7 @@ class PegaProxManager:
         self.maintenance_lock = threading.Lock()
 
         # NS: IP address cache: (node, vmid) -> list of IPs (IPv4 first)
-        # Populated by _ip_refresh_loop every 30s, injected into get_vm_resources() output
+        # Populated by _ip_refresh_loop (adaptive, core/guest_poller.py), injected into get_vm_resources() output
         self._ip_cache = {}
         self._ip_cache_lock = threading.Lock()
         self._ip_refresh_thread = None
@@ -343,6 +348,8 @@ class PegaProxManager:
         self._disk_cache_lock = threading.Lock()
         # #237: track VMs where guest agent is disabled to avoid spamming PVE with failed requests
         self._no_agent_vms = set()  # vmids with no agent (cleared on VM start/config change)
+        # NS Oct 2026: per-guest probe schedule for the two caches above
+        self._guest_poller = GuestPollPlanner()
 
         # update tracking
         self.nodes_updating = {}
@@ -573,7 +580,13 @@ class PegaProxManager:
             try: cached.close()
             except Exception: pass
 
-        session = requests.Session()
+        # NS Oct 2026 — the session now comes from the manager's API transport
+        # (core/api_transport.py): per-node keep-alive pools sized from observed
+        # concurrency, TLS session resumption, coalescing of identical in-flight
+        # GETs and per-endpoint latency histograms. It replaces the single
+        # 64-slot pool that used to be mounted here; a slow node's per-node
+        # calls no longer eat the keep-alive slots the cluster-level calls need.
+        session = self._get_api_transport().new_session(self._ssl_verify)
         # NS Jul 2026 — never route cluster API calls through an ambient proxy.
         # requests defaults trust_env=True, which reads HTTP(S)_PROXY / NO_PROXY
         # from the environment (and ~/.netrc) per request. On an air-gapped /
@@ -584,24 +597,13 @@ class PegaProxManager:
         # LAN, so opt out of env proxy/.netrc entirely. (verify= is set
         # explicitly below, so this doesn't touch CA behaviour.)
         session.trust_env = False
-        # Keep-alive pool. pool_block=False => an excess concurrent request opens
-        # a throwaway connection instead of blocking on the pool lock (the old
-        # deadlock path). The hot broadcast path hits one host per cluster, so a
-        # small pool stays fully reused.
-        # NS 2026-06-05: pool_maxsize matches the node-fan-out concurrency
-        # (PEGAPROX_NODE_POOL_SIZE). get_node_status can fire dozens of per-node
-        # calls at once on this one session; with only 16 keep-alive slots the
-        # excess churned throwaway connections (pool_block=False), re-incurring
-        # the handshake cost the cache is meant to remove.
-        _pool_kw = dict(pool_connections=8, pool_maxsize=64, pool_block=False, max_retries=0)
         # NS: use system CA store when verifying - certifi bundle doesn't include custom CAs (#246)
+        # MK (#88): with verify off the transport's context skips hostname checks too
         if self._ssl_verify:
             _ca = ssl.get_default_verify_paths()
             session.verify = _ca.cafile or _ca.openssl_cafile or True
-            session.mount('https://', HTTPAdapter(**_pool_kw))
         else:
             session.verify = False
-            session.mount('https://', _NoHostnameCheckAdapter(**_pool_kw))  # MK: fix for IP-based hosts
 
         if getattr(self, '_api_token', None):
             # API Token auth - use Authorization header
@@ -634,6 +636,14 @@ class PegaProxManager:
         self._session_auth_key = auth_key
         return session
     
+    def _get_api_transport(self):
+        """Per-manager API transport (pools + histograms outlive session rebuilds)."""
+        transport = getattr(self, '_api_transport', None)
+        if transport is None:
+            from pegaprox.core.api_transport import create_transport
+            transport = self._api_transport = create_transport()
+        return transport
+
     @staticmethod
     def _bracket_ipv6(h):
         """Wrap IPv6 addresses in brackets for URL construction (#145)"""
@@ -815,25 +825,10 @@ class PegaProxManager:
     def _record_api_sample(self, method, url, duration_ms, status):
         try:
             from collections import deque
-            from urllib.parse import urlparse
+            from pegaprox.core.api_transport import endpoint_template
             if not hasattr(self, '_api_latency') or self._api_latency is None:
                 self._api_latency = deque(maxlen=500)
-            # template the path: /api2/json/nodes/foo/qemu/100/status → /nodes/{node}/qemu/{id}/status
-            try:
-                p = urlparse(url)
-                segs = [s for s in p.path.split('/') if s and s not in ('api2', 'json')]
-                # crude templating: digits → {id}, second seg after type → {name}
-                tpl = []
-                for i, s in enumerate(segs):
-                    if s.isdigit():
-                        tpl.append('{id}')
-                    elif i > 0 and segs[i - 1] in ('nodes', 'storage', 'pools', 'sdn'):
-                        tpl.append('{name}')
-                    else:
-                        tpl.append(s)
-                ep = '/' + '/'.join(tpl) if tpl else p.path[:60]
-            except Exception:
-                ep = url[:60]
+            ep = endpoint_template(url)  # /api2/json/nodes/foo/qemu/100/status → /nodes/{name}/qemu/{id}/status
             self._api_latency.append({
                 'method': method, 'endpoint': ep,
                 'duration_ms': float(duration_ms),
@@ -1048,6 +1043,7 @@ class PegaProxManager:
                 self._ip_cache.clear()
             with self._disk_cache_lock:
                 self._disk_cache.clear()
+            self._guest_poller.reset()
             # N-1 (regression fix): also drop the short node-status/tasks result
             # caches so the post-reconnect "flip to online" push isn't served a
             # ≤5s-old pre-disconnect snapshot (could show a node still offline).
@@ -1955,136 +1951,6 @@ class PegaProxManager:
         except:
             return []
     
-    def _fetch_qemu_ips(self, node: str, vmid: int) -> list:
-        """Fetch IP addresses from QEMU guest agent for a running VM.
-        Returns IPv4 addresses first, then IPv6 (so ips[0] is primary IPv4 when available).
-        Returns [] if agent not running, VM unreachable, or any error."""
-        # #237: skip VMs known to have no guest agent to avoid pvedaemon error spam
-        if vmid in self._no_agent_vms:
-            return []
-        try:
-            url = f"https://{self.host}:{self.api_port}/api2/json/nodes/{node}/qemu/{vmid}/agent/network-get-interfaces"
-            resp = self._create_session().get(url, timeout=8)
-            if resp.status_code == 500:
-                # agent socket not available — remember this VM
-                self._no_agent_vms.add(vmid)
-                return []
-            if resp.status_code != 200:
-                return []
-            interfaces = resp.json().get('data', {}).get('result', [])
-            ipv4s, ipv6s = [], []
-            for iface in interfaces:
-                if iface.get('name') == 'lo':
-                    continue
-                for addr in iface.get('ip-addresses', []):
-                    ip = addr.get('ip-address', '')
-                    if not ip:
-                        continue
-                    if ip.startswith('127.') or ip == '::1':
-                        continue
-                    if ip.lower().startswith('fe80:'):
-                        continue
-                    if addr.get('ip-address-type') == 'ipv4':
-                        ipv4s.append(ip)
-                    else:
-                        ipv6s.append(ip)
-            return ipv4s + ipv6s
-        except Exception:
-            return []
-
-    def _fetch_lxc_ips(self, node: str, vmid: int) -> list:
-        """Fetch IP addresses for a running LXC container.
-        MK: Apr 2026 — tries /interfaces first, falls back to config + status (#300)
-        """
-        try:
-            # method 1: /interfaces — preferred, returns all IPs
-            url = f"https://{self.host}:{self.api_port}/api2/json/nodes/{node}/lxc/{vmid}/interfaces"
-            resp = self._create_session().get(url, timeout=8)
-            if resp.status_code == 200:
-                interfaces = resp.json().get('data', [])
-                ipv4s, ipv6s = [], []
-                for iface in interfaces:
-                    if iface.get('name') == 'lo':
-                        continue
-                    inet = iface.get('inet', '')
-                    if inet:
-                        ip = inet.split('/')[0]
-                        if not ip.startswith('127.'):
-                            ipv4s.append(ip)
-                    inet6 = iface.get('inet6', '')
-                    if inet6:
-                        ip = inet6.split('/')[0]
-                        if ip != '::1' and not ip.lower().startswith('fe80:'):
-                            ipv6s.append(ip)
-                if ipv4s or ipv6s:
-                    return ipv4s + ipv6s
-
-            # method 2: /config — extract static IPs from net0..net9
-            cfg_url = f"https://{self.host}:{self.api_port}/api2/json/nodes/{node}/lxc/{vmid}/config"
-            cfg_resp = self._create_session().get(cfg_url, timeout=5)
-            if cfg_resp.status_code == 200:
-                cfg = cfg_resp.json().get('data', {})
-                import re
-                for key in sorted(cfg.keys()):
-                    if not key.startswith('net'):
-                        continue
-                    val = cfg[key]
-                    # format: name=eth0,bridge=vmbr0,ip=10.0.0.5/24,...
-                    m = re.search(r'ip=(\d+\.\d+\.\d+\.\d+)', str(val))
-                    if m:
-                        return [m.group(1)]
-
-            return []
-        except Exception:
-            return []
-
-    def refresh_ip_cache(self) -> None:
-        """Fetch IPs for all currently running VMs and containers, update cache.
-        Called from the background IP refresh loop every 30 seconds."""
-        if not self.is_connected or not self.session:
-            return
-        try:
-            resources = self.get_vm_resources()
-            running = [r for r in resources if r.get('status') == 'running']
-            if not running:
-                return
-
-            def fetch_one(r):
-                node = r.get('node', '')
-                vmid = r.get('vmid')
-                if not node or not vmid:
-                    return None
-                if r.get('type') == 'lxc':
-                    ips = self._fetch_lxc_ips(node, vmid)
-                else:
-                    ips = self._fetch_qemu_ips(node, vmid)
-                return (node, vmid, ips)
-
-            tasks = [lambda r=r: fetch_one(r) for r in running]
-            results = run_concurrent(tasks, timeout=15.0)
-
-            with self._ip_cache_lock:
-                for result in results:
-                    if result is None:
-                        continue
-                    node, vmid, ips = result
-                    self._ip_cache[(node, vmid)] = ips
-        except Exception as e:
-            self.logger.debug(f"[IP cache] refresh failed: {e}")
-
-    def _ip_refresh_loop(self) -> None:
-        """Background loop that refreshes the IP cache every 30 seconds.
-        Uses stop_event so it exits cleanly when the manager stops."""
-        if self.stop_event.wait(15):  # 15s initial delay; returns True if stopping
-            return
-        while not self.stop_event.is_set():
-            try:
-                if self.is_connected:
-                    self.refresh_ip_cache()
-            except Exception as e:
-                self.logger.debug(f"[IP refresh loop] error: {e}")
-            self.stop_event.wait(30)  # wait 30s or until stop requested
-
     def _format_bytes(self, bytes_value: int) -> str:
         # NS: quick helper, nothing fancy
         gb = bytes_value / (1024 ** 3)
@@ -2610,56 +2476,9 @@ class PegaProxManager:
             self.logger.info(f"[AFFINITY] Completed {migrations} affinity enforcement migration(s)")
         return migrations
 
-    def find_migration_candidate(self, source_node: str, target_node: str, exclude_vmids: list = None, include_containers: bool = None, node_status: dict = None) -> Optional[Dict]:
-        """
-        Find the best VM to migrate from source to target node.
-        
-        NS: This logic is based on ProxLB's approach but we've added:
-        - Affinity rule checking
-        - HA status awareness  
-        - Multi-cluster considerations
-        
-        Priority order:
-        1. VMs on shared storage (easiest to migrate)
-        2. VMs on local storage (only if balance_local_disks enabled)
-        3. Smaller VMs first (less impact during migration)
-        4. Prefer QEMU VMs over containers (containers need restart)
-        
-        MK: Container migrations are tricky - they ALWAYS restart.
-        We learned this the hard way in production...
-        LW: Feb 2026 - exclude_vmids used for multi-migration cycles to avoid re-picking
-        """
-        if exclude_vmids is None:
-            exclude_vmids = []
-        vms = self.get_vm_resources()
-        if not vms:
-            return None
-        
-        # MK: Get excluded VMs for this cluster
-        excluded_vmids = self.get_balancing_excluded_vms()
-        if excluded_vmids:
-            self.logger.info(f"VMs excluded from balancing: {excluded_vmids}")
-
-        # NS: Get excluded pools
-        excluded_pools = self.get_balancing_excluded_pools()
-        if excluded_pools:
-            self.logger.info(f"Pools excluded from balancing: {excluded_pools}")
-
-        # MK Jul 2026 (#426) — ProxLB tag-derived ignore/pin sets (opt-in; empty when off)
-        _proxlb = self._derive_proxlb_tag_rules(vms=vms)
-        proxlb_ignored = _proxlb['ignored']
-        proxlb_pins = _proxlb['pins']
-        if proxlb_ignored:
-            self.logger.info(f"[PROXLB] guests ignored via plb_ignore tag: {sorted(proxlb_ignored)}")
-
-        # Filter VMs on source node that are running
-        # NS: VM cooldown — skip VMs migrated in last 15 min to prevent ping-pong
-        cooldown_secs = 900
-        now = time.time()
-        cooled_vmids = {vmid for vmid, ts in self._vm_migration_cooldown.items() if now - ts < cooldown_secs}
-        # clean up old entries
-        self._vm_migration_cooldown = {v: t for v, t in self._vm_migration_cooldown.items() if now - t < cooldown_secs}
-
+    def _get_pve_crs_managed_vmids(self) -> set:
+        """vmids PVE 9.2's CRS auto-rebalance owns — the balancer leaves them alone.
+        (Split out of find_migration_candidate so plan_balance can share it.)"""
         # MK May 2026 — coexistence with PVE 9.2's CRS. Two-layer check:
         #
         # 1) Cluster-wide CRS toggle. PVE 9.2 stores it under
@@ -2719,6 +2538,59 @@ class PegaProxManager:
                 self.logger.debug(f"[BAL] HA-resource probe failed ({e}) — running balancer without CRS filter")
         else:
             self.logger.debug("[BAL] cluster CRS not active — balancer runs full set (compat path)")
+        return pve_crs_managed_vmids
+
+    def find_migration_candidate(self, source_node: str, target_node: str, exclude_vmids: list = None, include_containers: bool = None, node_status: dict = None) -> Optional[Dict]:
+        """
+        Find the best VM to migrate from source to target node.
+        
+        NS: This logic is based on ProxLB's approach but we've added:
+        - Affinity rule checking
+        - HA status awareness  
+        - Multi-cluster considerations
+        
+        Priority order:
+        1. VMs on shared storage (easiest to migrate)
+        2. VMs on local storage (only if balance_local_disks enabled)
+        3. Smaller VMs first (less impact during migration)
+        4. Prefer QEMU VMs over containers (containers need restart)
+        
+        MK: Container migrations are tricky - they ALWAYS restart.
+        We learned this the hard way in production...
+        LW: Feb 2026 - exclude_vmids used for multi-migration cycles to avoid re-picking
+        """
+        if exclude_vmids is None:
+            exclude_vmids = []
+        vms = self.get_vm_resources()
+        if not vms:
+            return None
+        
+        # MK: Get excluded VMs for this cluster
+        excluded_vmids = self.get_balancing_excluded_vms()
+        if excluded_vmids:
+            self.logger.info(f"VMs excluded from balancing: {excluded_vmids}")
+
+        # NS: Get excluded pools
+        excluded_pools = self.get_balancing_excluded_pools()
+        if excluded_pools:
+            self.logger.info(f"Pools excluded from balancing: {excluded_pools}")
+
+        # MK Jul 2026 (#426) — ProxLB tag-derived ignore/pin sets (opt-in; empty when off)
+        _proxlb = self._derive_proxlb_tag_rules(vms=vms)
+        proxlb_ignored = _proxlb['ignored']
+        proxlb_pins = _proxlb['pins']
+        if proxlb_ignored:
+            self.logger.info(f"[PROXLB] guests ignored via plb_ignore tag: {sorted(proxlb_ignored)}")
+
+        # Filter VMs on source node that are running
+        # NS: VM cooldown — skip VMs migrated in last 15 min to prevent ping-pong
+        cooldown_secs = 900
+        now = time.time()
+        cooled_vmids = {vmid for vmid, ts in self._vm_migration_cooldown.items() if now - ts < cooldown_secs}
+        # clean up old entries
+        self._vm_migration_cooldown = {v: t for v, t in self._vm_migration_cooldown.items() if now - t < cooldown_secs}
+
+        pve_crs_managed_vmids = self._get_pve_crs_managed_vmids()
 
         candidates = [
             vm for vm in vms
@@ -2879,6 +2751,147 @@ class PegaProxManager:
             self.logger.info(f"Selected for migration: {selected.get('name', 'unnamed')} ({vm_type} {selected.get('vmid')})")
         return selected
     
+    def plan_balance(self, node_status: Dict[str, Any] = None, include_containers: bool = None) -> Dict:
+        """Whole-cluster migration plan (core/placement) — nothing is migrated.
+
+        NS Oct 2026: replaces the max/min-pair rounds of run_balance_check. Same
+        eligibility rules as find_migration_candidate (excluded VMs/pools,
+        cooldown, PVE CRS, plb_ignore/plb_pin, containers, local disks, affinity,
+        CPU compat, free RAM), just evaluated for every node at once. The
+        API-backed checks are memoised per guest / per (guest, target), so the
+        planner only pays for moves it actually considers.
+
+        Returns the plan_placement() dict plus cluster/settings context; also
+        kept in self.last_balance_plan for the dry-run view.
+        """
+        if node_status is None:
+            node_status = self.get_node_status()
+        config_excluded = getattr(self.config, 'excluded_nodes', []) or []
+        active = {
+            n: d for n, d in (node_status or {}).items()
+            if d.get('status') == 'online'
+            and not d.get('maintenance_mode', False)
+            and n not in config_excluded
+        }
+
+        w_cpu = getattr(self.config, 'balance_cpu_weight', 1.0) or 0
+        w_mem = getattr(self.config, 'balance_mem_weight', 1.0) or 0
+        w_io = getattr(self.config, 'balance_io_weight', 0.0) or 0
+        if w_cpu == 0 and w_mem == 0 and w_io == 0:
+            w_cpu, w_mem = 1.0, 1.0
+        # aim for the plain threshold — the tolerance is only hysteresis for
+        # *triggering* (check_balance_needed), landing inside it would re-trigger
+        target_spread = float(self.config.migration_threshold)
+
+        plan = {
+            'cluster_id': self.id, 'generated_at': datetime.now().isoformat(),
+            'dry_run': bool(self.config.dry_run), 'weights': [w_cpu, w_mem, w_io],
+            'moves': [], 'initial_scores': {n: d.get('score', 0) for n, d in active.items()},
+            'predicted_scores': {}, 'initial_spread': 0, 'predicted_spread': 0,
+            'target_spread': target_spread, 'reached': True,
+        }
+        if len(active) < 2:
+            plan['reason'] = 'not_enough_nodes'
+            self.last_balance_plan = plan
+            return plan
+
+        vms = self.get_vm_resources() or []
+        vm_nodes = {str(r.get('vmid')): r.get('node') for r in vms if r.get('type') in ('qemu', 'lxc')}
+
+        excluded_vmids = set(self.get_balancing_excluded_vms() or [])
+        excluded_pools = set(self.get_balancing_excluded_pools() or [])
+        _proxlb = self._derive_proxlb_tag_rules(vms=vms)
+        proxlb_pins = _proxlb['pins']
+        now = time.time()
+        cooled = {v for v, ts in self._vm_migration_cooldown.items() if now - ts < 900}
+        crs_owned = self._get_pve_crs_managed_vmids()
+        balance_ct = include_containers if include_containers is not None else getattr(self.config, 'balance_containers', False)
+        balance_local_disks = getattr(self.config, 'balance_local_disks', False)
+
+        rolling = set()
+        if getattr(self, '_rolling_update', None):
+            rolling = {n for n in self._rolling_update.get('rebooting_nodes', []) + [self._rolling_update.get('current_node', '')] if n}
+
+        movable = [
+            PlanVM(vm) for vm in vms
+            if vm.get('node') in active
+            and vm.get('status') == 'running'
+            and vm.get('type') in (('qemu', 'lxc') if balance_ct else ('qemu',))
+            and vm.get('vmid') not in excluded_vmids
+            and vm.get('pool', '') not in excluded_pools
+            and vm.get('vmid') not in cooled
+            and vm.get('vmid') not in crs_owned
+            and vm.get('vmid') not in _proxlb['ignored']
+        ]
+
+        storage_kind = {}       # vmid → 'shared' | 'local' | 'unknown'
+        vm_storage = {}         # vmid → primary storage name (local disks only)
+        node_storages = {}      # node → active storage names
+        cpu_ok = {}             # (vmid, node) → bool
+
+        def _target_storages(node):
+            if node not in node_storages:
+                names = set()
+                try:
+                    r = self._create_session().get(
+                        f"https://{self.host}:{self.api_port}/api2/json/nodes/{node}/storage", timeout=10)
+                    if r.status_code == 200:
+                        names = {s['storage'] for s in r.json().get('data', []) if s.get('active')}
+                except Exception:
+                    pass
+                node_storages[node] = names
+            return node_storages[node]
+
+        def can_place(pvm, target, placement):
+            vmid = pvm.vmid
+            if target in rolling:
+                return False
+            pin = proxlb_pins.get(vmid)
+            if pin and target not in pin:
+                return False
+            if vmid not in storage_kind:
+                storage_kind[vmid] = self.check_vm_storage_type(pvm.node, vmid, pvm.type)
+            kind = storage_kind[vmid]
+            if kind == 'unknown':
+                return False
+            if kind == 'local':
+                if not balance_local_disks:
+                    return False
+                if vmid not in vm_storage:
+                    vm_storage[vmid] = self._get_vm_storage(pvm.node, vmid, pvm.type)
+                stor, have = vm_storage[vmid], _target_storages(target)
+                if stor and have and stor not in have:
+                    return False
+            key = (vmid, target)
+            if key not in cpu_ok:
+                cpu_ok[key] = self._check_cpu_compatibility(pvm.row, target, node_status=node_status).get('compatible', True)
+            if not cpu_ok[key]:
+                return False
+            sim = dict(placement)
+            sim[str(vmid)] = target
+            aff = self._check_affinity_violation(vmid, target, sim)
+            return not (aff.get('violation') and aff.get('enforce'))
+
+        result = plan_placement(
+            [PlanNode.from_status(n, d) for n, d in active.items()],
+            movable, (w_cpu, w_mem, w_io), target_spread,
+            can_place=can_place, vm_nodes=vm_nodes,
+            max_moves=max(2 * len(active), 10),
+        )
+        rows = {vm.vmid: vm.row for vm in movable}
+        for m in result['moves']:
+            m['local_disks'] = storage_kind.get(m['vmid']) == 'local'
+            m['mem'] = rows[m['vmid']].get('mem', 0)
+        plan.update(result)
+        self.last_balance_plan = plan
+
+        self.logger.info(
+            f"[PLAN] {len(plan['moves'])} move(s), spread {plan['initial_spread']} → {plan['predicted_spread']} "
+            f"(target {target_spread}{'' if plan['reached'] else ', not reachable'})")
+        for i, m in enumerate(plan['moves'], 1):
+            self.logger.info(f"[PLAN] {i}. {m['name'] or 'unnamed'} ({m['vmid']}) {m['from']} → {m['to']} — predicted {m['predicted_scores']}")
+        return plan
+
     def get_best_target_node(self, exclude_nodes: List[str] = None, vmid: int = None) -> Optional[str]:
         """Find the best target node for migration
 
@@ -3153,6 +3166,76 @@ class PegaProxManager:
             result[node_name] = self._compute_predictive_score(node_name)
         return result
 
+    def _start_migration(self, vm: Dict, target_node: str):
+        """POST the /migrate call for a resource row (ISO unmount + local-disk
+        storage mapping included) and return the raw response — no waiting.
+        NS Oct 2026: split out of migrate_vm for the migration queue."""
+        vmid = vm.get('vmid')
+        source_node = vm.get('node')
+        vm_type = vm.get('type')
+        # target_storage = vm.get('_target_storage')  # old code, not needed
+        
+        # unmount iso first or migration fails (found this out the hard way)
+        if vm_type == 'qemu':
+            config_url = f"https://{self.host}:{self.api_port}/api2/json/nodes/{source_node}/qemu/{vmid}/config"
+            config_response = self._create_session().get(config_url, timeout=15)
+            if config_response.status_code == 200:
+                config = config_response.json().get('data', {})
+                for key in ['ide2', 'cdrom']:
+                    if key in config and 'iso' in str(config.get(key, '')).lower():
+                        iso_value = config[key]
+                        self.logger.info(f"unmounting iso from {key}")
+                        unmount_response = self._create_session().put(config_url, data={key: 'none,media=cdrom'})
+                        if unmount_response.status_code != 200:
+                            self.logger.warning(f"couldnt unmount iso: {unmount_response.text}")
+        
+        if vm_type == 'qemu':
+            url = f"https://{self.host}:{self.api_port}/api2/json/nodes/{source_node}/qemu/{vmid}/migrate"
+        else:
+            url = f"https://{self.host}:{self.api_port}/api2/json/nodes/{source_node}/lxc/{vmid}/migrate"
+        
+        has_local_disks = vm.get('_has_local_disks', False)
+
+        if vm_type == 'lxc':
+            # LXC needs restart for migration
+            data = {
+                'target': target_node,
+                'restart': 1
+            }
+            if has_local_disks:
+                # PVE wants "rootfs=stor,mp0=stor2" mapping for LXC
+                stor_map = self._get_vm_storage_map(source_node, vmid, 'lxc')
+                if stor_map:
+                    # map each volume to itself (same storage name on target)
+                    data['target-storage'] = ','.join(f"{k}={v}" for k, v in stor_map.items())
+                else:
+                    stor = self._get_vm_storage(source_node, vmid, 'lxc')
+                    if stor:
+                        data['target-storage'] = stor
+                self.logger.info(f"container migration with restart, target-storage={data.get('target-storage')}")
+        else:
+            data = {
+                'target': target_node,
+                'online': 1
+            }
+            if has_local_disks:
+                data['with-local-disks'] = 1
+                # PVE wants "source_stor:target_stor" mapping for QEMU local disks
+                stor_map = self._get_vm_storage_map(source_node, vmid, 'qemu')
+                if stor_map:
+                    # dedupe: unique "stor:stor" pairs (same name = migrate to same storage on target)
+                    unique = list(dict.fromkeys(stor_map.values()))
+                    data['targetstorage'] = ','.join(f"{s}:{s}" for s in unique)
+                else:
+                    stor = self._get_vm_storage(source_node, vmid, 'qemu')
+                    if stor:
+                        data['targetstorage'] = stor
+                self.logger.info(f"local disk migration, targetstorage={data.get('targetstorage')}")
+        
+        local_info = ' (local disks)' if has_local_disks else ''
+        self.logger.info(f"migrating {vm.get('name', 'unnamed')} ({vmid}) {source_node} -> {target_node}{local_info}")
+        return self._api_post(url, data=data)
+
     def migrate_vm(self, vm: Dict, target_node: str, dry_run: bool = None, wait_timeout: int = 600) -> bool:
         """migrate vm to another node"""
         # NS: this handles the proxmox api call
@@ -3177,69 +3260,7 @@ class PegaProxManager:
         try:
             vmid = vm.get('vmid')
             source_node = vm.get('node')
-            vm_type = vm.get('type')
-            # target_storage = vm.get('_target_storage')  # old code, not needed
-            
-            # unmount iso first or migration fails (found this out the hard way)
-            if vm_type == 'qemu':
-                config_url = f"https://{self.host}:{self.api_port}/api2/json/nodes/{source_node}/qemu/{vmid}/config"
-                config_response = self._create_session().get(config_url, timeout=15)
-                if config_response.status_code == 200:
-                    config = config_response.json().get('data', {})
-                    for key in ['ide2', 'cdrom']:
-                        if key in config and 'iso' in str(config.get(key, '')).lower():
-                            iso_value = config[key]
-                            self.logger.info(f"unmounting iso from {key}")
-                            unmount_response = self._create_session().put(config_url, data={key: 'none,media=cdrom'})
-                            if unmount_response.status_code != 200:
-                                self.logger.warning(f"couldnt unmount iso: {unmount_response.text}")
-            
-            if vm_type == 'qemu':
-                url = f"https://{self.host}:{self.api_port}/api2/json/nodes/{source_node}/qemu/{vmid}/migrate"
-            else:
-                url = f"https://{self.host}:{self.api_port}/api2/json/nodes/{source_node}/lxc/{vmid}/migrate"
-            
-            has_local_disks = vm.get('_has_local_disks', False)
-
-            if vm_type == 'lxc':
-                # LXC needs restart for migration
-                data = {
-                    'target': target_node,
-                    'restart': 1
-                }
-                if has_local_disks:
-                    # PVE wants "rootfs=stor,mp0=stor2" mapping for LXC
-                    stor_map = self._get_vm_storage_map(source_node, vmid, 'lxc')
-                    if stor_map:
-                        # map each volume to itself (same storage name on target)
-                        data['target-storage'] = ','.join(f"{k}={v}" for k, v in stor_map.items())
-                    else:
-                        stor = self._get_vm_storage(source_node, vmid, 'lxc')
-                        if stor:
-                            data['target-storage'] = stor
-                    self.logger.info(f"container migration with restart, target-storage={data.get('target-storage')}")
-            else:
-                data = {
-                    'target': target_node,
-                    'online': 1
-                }
-                if has_local_disks:
-                    data['with-local-disks'] = 1
-                    # PVE wants "source_stor:target_stor" mapping for QEMU local disks
-                    stor_map = self._get_vm_storage_map(source_node, vmid, 'qemu')
-                    if stor_map:
-                        # dedupe: unique "stor:stor" pairs (same name = migrate to same storage on target)
-                        unique = list(dict.fromkeys(stor_map.values()))
-                        data['targetstorage'] = ','.join(f"{s}:{s}" for s in unique)
-                    else:
-                        stor = self._get_vm_storage(source_node, vmid, 'qemu')
-                        if stor:
-                            data['targetstorage'] = stor
-                    self.logger.info(f"local disk migration, targetstorage={data.get('targetstorage')}")
-            
-            local_info = ' (local disks)' if has_local_disks else ''
-            self.logger.info(f"migrating {vm.get('name', 'unnamed')} ({vmid}) {source_node} -> {target_node}{local_info}")
-            response = self._api_post(url, data=data)
+            response = self._start_migration(vm, target_node)
             
             if response.status_code == 200:
                 task_id = response.json().get('data')
@@ -3710,72 +3731,96 @@ class PegaProxManager:
                 task.status = 'completed'
                 return
 
-            # Sort VMs by memory (smallest first for faster evacuation)
-            node_vms.sort(key=lambda x: x.get('mem', 0))
-
-            for vm in node_vms:
-                vm_name = vm.get('name', 'unnamed')
-                vmid = vm.get('vmid')
-
-                task.current_vm = {'vmid': vmid, 'name': vm_name}
-
-                # NS: #78 — check if VM is still on this node before migrating.
-                # PVE HA might have already moved it while we were busy with other VMs
-                try:
-                    current_vms = self.get_vm_resources()
-                    still_here = any(
-                        v.get('vmid') == vmid and v.get('node') == node_name
-                        for v in current_vms
-                    )
-                    if not still_here:
-                        self.logger.info(f"[OK] {vm_name} ({vmid}) already migrated (HA or manual), skipping")
-                        task.migrated_vms += 1
-                        task.pending_vms = [v for v in task.pending_vms if v.get('vmid') != vmid]
-                        continue
-                except:
-                    pass  # if check fails, try migrating anyway
-
-                # Find best target node (#426: honour a plb_pin tag for this guest)
-                target_node = self.get_best_target_node(exclude_nodes=[node_name], vmid=vmid)
+            # NS Oct 2026 — evacuation runs through the cluster's migration queue
+            # (core/migration_queue): several guests in flight at once within the
+            # per-node limits, biggest/busiest first, targets picked at dispatch
+            # time so in-flight moves spread over the peers, retries with backoff.
+            # The "#78 already moved by HA" check happens in the queue right
+            # before each start.
+            allow_local = getattr(task, 'allow_local_disks', False)
 
-                if not target_node:
-                    self.logger.error(f"[ERROR] No available target node for {vm_name}")
-                    task.failed_vms.append({'vmid': vmid, 'name': vm_name, 'error': 'No target node available'})
-                    task.pending_vms = [v for v in task.pending_vms if v.get('vmid') != vmid]
-                    continue
+            def _pick_target(job, busy):
+                return self.get_best_target_node(exclude_nodes=[node_name] + list(busy), vmid=job.vmid)
 
+            def _start(job):
+                vm = dict(job.row)
                 # NS Apr 2026 (#330): when the user opted into local-disk evacuation,
                 # probe storage type here and tag the dict so migrate_vm emits
                 # --with-local-disks. Pre-flight check keeps the migrate path honest.
-                if getattr(task, 'allow_local_disks', False):
+                if allow_local:
                     try:
-                        stor_type = self.check_vm_storage_type(node_name, vmid, vm.get('type'))
+                        stor_type = self.check_vm_storage_type(node_name, job.vmid, vm.get('type'))
                     except Exception as e:
                         stor_type = None
-                        self.logger.debug(f"[MAINT] storage type probe for {vmid} failed: {e}")
+                        self.logger.debug(f"[MAINT] storage type probe for {job.vmid} failed: {e}")
                     if stor_type == 'local':
                         vm['_has_local_disks'] = True
                         self.logger.info(
-                            f"[MAINT] {vm_name} ({vmid}) has local disks -- migrating with "
+                            f"[MAINT] {job.name} ({job.vmid}) has local disks -- migrating with "
                             "--with-local-disks (this can take a while on big VMs)"
                         )
-
-                self.logger.info(f"[SYNC] Evacuating {vm_name} (VMID: {vmid}) to {target_node}")
-
-                # MK: #78 — use longer timeout for evacuations. Local storage
-                # migrations with large disks can easily take 30+ min
-                success = self.migrate_vm(vm, target_node, dry_run=False, wait_timeout=1800)
-
-                if success:
-                    task.migrated_vms += 1
-                    self.logger.info(f"[OK] Evacuated {vm_name} to {target_node} ({task.migrated_vms}/{task.total_vms})")
-                else:
-                    task.failed_vms.append({'vmid': vmid, 'name': vm_name, 'error': 'Migration failed'})
-                    self.logger.error(f"[ERROR] Failed to evacuate {vm_name}")
-
-                task.pending_vms = [v for v in task.pending_vms if v.get('vmid') != vmid]
+                self.logger.info(f"[SYNC] Evacuating {job.name} (VMID: {job.vmid}) to {job.target}")
+                r = self._start_migration(vm, job.target)
+                if r.status_code == 200:
+                    return {'success': True, 'task': r.json().get('data')}
+                return {'success': False, 'error': r.text}
+
+            def _on_finish(job):
+                # same /migration-log entries migrate_vm writes for single moves
+                if job.note and job.note.startswith('already moved'):
+                    return
+                entry = {
+                    'timestamp': datetime.now().isoformat(),
+                    'vm': job.name,
+                    'vmid': job.vmid,
+                    'from_node': job.source,
+                    'to_node': job.target,
+                    'dry_run': False,
+                    'success': job.state == 'done',
+                }
+                if job.note == 'HA re-routed':
+                    entry.update(to_node=job.landed or job.target, requested_target=job.target,
+                                 note='HA re-routed during evacuation')
+                elif job.state != 'done':
+                    entry['error'] = job.error or 'Task failed'
+                self.last_migration_log.append(entry)
+
+            queue = get_migration_queue(self)
+            # MK: #78 — long timeout for evacuations. Local storage migrations
+            # with large disks can easily take 30+ min
+            batch_id = queue.submit([MigrationJob(vm) for vm in node_vms], _start, pick_target=_pick_target,
+                                    on_finish=_on_finish, label=f'evacuate {node_name}', wait_timeout=1800)
+            logged = set()
+            while True:
+                st = queue.batch_status(batch_id)
+                if st is None:
+                    break
+                task.eta_seconds = st['eta_seconds']
+                task.running_vms = [{'vmid': j['vmid'], 'name': j['name'], 'target': j['target'],
+                                     'progress_percent': j.get('progress_percent')}
+                                    for j in st['jobs'] if j['state'] == 'running']
+                task.current_vm = task.running_vms[0] if task.running_vms else None
+                for j in st['jobs']:
+                    if j['state'] not in ('done', 'failed') or j['id'] in logged:
+                        continue
+                    logged.add(j['id'])
+                    if j['state'] == 'done':
+                        task.migrated_vms += 1
+                        if j['note']:
+                            self.logger.info(f"[OK] {j['name']} ({j['vmid']}) {j['note']}")
+                        else:
+                            self.logger.info(f"[OK] Evacuated {j['name']} to {j['target']} ({task.migrated_vms}/{task.total_vms})")
+                    else:
+                        task.failed_vms.append({'vmid': j['vmid'], 'name': j['name'], 'error': j['error'] or 'Migration failed'})
+                        self.logger.error(f"[ERROR] Failed to evacuate {j['name']}: {j['error']}")
+                    task.pending_vms = [v for v in task.pending_vms if v.get('vmid') != j['vmid']]
+                if st['finished']:
+                    break
+                time.sleep(2)
 
             task.current_vm = None
+            task.running_vms = []
+            task.eta_seconds = None
 
             # #78: verify node is actually empty — PVE HA or parallel migrations
             # might still be running. Give them up to 5 min to finish.
@@ -7878,6 +7923,7 @@ echo "AGENT_INSTALLED_OK"
                         try:
                             from pegaprox.core.db import get_db
                             _db = get_db()
+                            _db.flush_audit()   # entries still queued in the group-commit writer
                             _c = _db.conn.cursor()
                             # Wider window for slower operations (migrations, backups)
                             _slow_types = {'qmigrate','vzmigrate','vzdump','qmrestore','vzrestore',
@@ -11523,94 +11569,102 @@ echo "AGENT_INSTALLED_OK"
         
         Proxmox stores historical data in RRD format.
         Timeframes: hour, day, week, month, year
+
+        NS Oct 2026: served through core/rrd_cache.py — one fetch per RRD step
+        per guest/timeframe, shared by every open chart.
         """
         if not self.is_connected:
             if not self.connect_to_proxmox():
                 return {'success': False, 'error': 'Could not connect to Proxmox'}
         
         try:
-            host = self.host
+            kind = 'qemu' if vm_type == 'qemu' else 'lxc'
+            url = f"https://{self.host}:{self.api_port}/api2/json/nodes/{node}/{kind}/{vmid}/rrddata"
+            formatted = cached_series(
+                ('pve', self.id, node, kind, int(vmid), timeframe), timeframe,
+                lambda since: self._fetch_rrddata(url, timeframe),
+                lambda points, meta: self._format_vm_rrd(points, node, vmid, vm_type, timeframe))
+            return {'success': True, 'data': formatted}
+        except RrdFetchError as e:
+            return {'success': False, 'error': str(e)}
+        except Exception as e:
+            self.logger.error(f"[ERROR] Get VM RRD error: {e}")
+            return {'success': False, 'error': str(e)}
+
+    def _fetch_rrddata(self, url, timeframe):
+        """Raw rrddata points for the RRD cache. PVE has no "since" filter, so
+        this is always the whole window; the cache merges it over the old one."""
+        response = self._create_session().get(url, params={'timeframe': timeframe})
+        if response.status_code != 200:
+            raise RrdFetchError(response.text)
+        return response.json().get('data', []) or [], None
+
+    @staticmethod
+    def _format_vm_rrd(rrd_data, node, vmid, vm_type, timeframe):
+        # Process and format the data for charts
+        formatted_data = {
+            'timeframe': timeframe,
+            'vmid': vmid,
+            'node': node,
+            'type': vm_type,
+            'metrics': {
+                'cpu': [],
+                'memory': [],
+                'disk_read': [],
+                'disk_write': [],
+                'net_in': [],
+                'net_out': []
+            },
+            'timestamps': []
+        }
+
+        # Check for pressure stall data (PSI)
+        pressure_keys = [
+            'pressurecpusome', 'pressurecpufull',
+            'pressurememorysome', 'pressurememoryfull',
+            'pressureiosome', 'pressureiofull'
+        ]
+        active_pressure_keys = []
+
+        # Check first valid point to determine available metrics
+        if rrd_data:
+            first_point = next((p for p in rrd_data if p), None)
+            if first_point:
+                for k in pressure_keys:
+                    if k in first_point:
+                        active_pressure_keys.append(k)
+                        formatted_data['metrics'][k] = []
+
+        for point in rrd_data:
+            if not point:
+                continue
             
-            if vm_type == 'qemu':
-                url = f"https://{host}:{self.api_port}/api2/json/nodes/{node}/qemu/{vmid}/rrddata"
-            else:
-                url = f"https://{host}:{self.api_port}/api2/json/nodes/{node}/lxc/{vmid}/rrddata"
+            timestamp = point.get('time', 0)
+            formatted_data['timestamps'].append(timestamp)
             
-            response = self._create_session().get(url, params={'timeframe': timeframe})
+            # CPU usage (0-1 -> 0-100%)
+            cpu = point.get('cpu', 0)
+            formatted_data['metrics']['cpu'].append(round((cpu or 0) * 100, 2))
             
-            if response.status_code == 200:
-                rrd_data = response.json().get('data', [])
-                
-                # Process and format the data for charts
-                formatted_data = {
-                    'timeframe': timeframe,
-                    'vmid': vmid,
-                    'node': node,
-                    'type': vm_type,
-                    'metrics': {
-                        'cpu': [],
-                        'memory': [],
-                        'disk_read': [],
-                        'disk_write': [],
-                        'net_in': [],
-                        'net_out': []
-                    },
-                    'timestamps': []
-                }
+            # Memory usage (bytes)
+            mem = point.get('mem', 0)
+            maxmem = point.get('maxmem', 1)
+            mem_percent = ((mem or 0) / (maxmem or 1)) * 100
+            formatted_data['metrics']['memory'].append(round(mem_percent, 2))
+            
+            # Disk I/O (bytes/s)
+            formatted_data['metrics']['disk_read'].append(point.get('diskread', 0) or 0)
+            formatted_data['metrics']['disk_write'].append(point.get('diskwrite', 0) or 0)
+            
+            # Network I/O (bytes/s)
+            formatted_data['metrics']['net_in'].append(point.get('netin', 0) or 0)
+            formatted_data['metrics']['net_out'].append(point.get('netout', 0) or 0)
 
-                # Check for pressure stall data (PSI)
-                pressure_keys = [
-                    'pressurecpusome', 'pressurecpufull',
-                    'pressurememorysome', 'pressurememoryfull',
-                    'pressureiosome', 'pressureiofull'
-                ]
-                active_pressure_keys = []
-
-                # Check first valid point to determine available metrics
-                if rrd_data:
-                    first_point = next((p for p in rrd_data if p), None)
-                    if first_point:
-                        for k in pressure_keys:
-                            if k in first_point:
-                                active_pressure_keys.append(k)
-                                formatted_data['metrics'][k] = []
-
-                for point in rrd_data:
-                    if not point:
-                        continue
-                    
-                    timestamp = point.get('time', 0)
-                    formatted_data['timestamps'].append(timestamp)
-                    
-                    # CPU usage (0-1 -> 0-100%)
-                    cpu = point.get('cpu', 0)
-                    formatted_data['metrics']['cpu'].append(round((cpu or 0) * 100, 2))
-                    
-                    # Memory usage (bytes)
-                    mem = point.get('mem', 0)
-                    maxmem = point.get('maxmem', 1)
-                    mem_percent = ((mem or 0) / (maxmem or 1)) * 100
-                    formatted_data['metrics']['memory'].append(round(mem_percent, 2))
-                    
-                    # Disk I/O (bytes/s)
-                    formatted_data['metrics']['disk_read'].append(point.get('diskread', 0) or 0)
-                    formatted_data['metrics']['disk_write'].append(point.get('diskwrite', 0) or 0)
-                    
-                    # Network I/O (bytes/s)
-                    formatted_data['metrics']['net_in'].append(point.get('netin', 0) or 0)
-                    formatted_data['metrics']['net_out'].append(point.get('netout', 0) or 0)
+            # Pressure Stall (PSI)
+            for k in active_pressure_keys:
+                formatted_data['metrics'][k].append(point.get(k, 0) or 0)
 
-                    # Pressure Stall (PSI)
-                    for k in active_pressure_keys:
-                        formatted_data['metrics'][k].append(point.get(k, 0) or 0)
-                
-                return {'success': True, 'data': formatted_data}
-            else:
-                return {'success': False, 'error': response.text}
-                
-        except Exception as e:
-            self.logger.error(f"[ERROR] Get VM RRD error: {e}")
-            return {'success': False, 'error': str(e)}
+        return formatted_data
     
     def _parse_vm_config(self, config: Dict, vm_type: str) -> Dict:
         
@@ -13699,112 +13753,114 @@ echo "AGENT_INSTALLED_OK"
         """Get node performance metrics (RRD data) for charts
         
         NS: Added Jan 2026 - Same format as VM rrddata for consistency
+        NS Oct 2026: cached per node/timeframe like get_vm_rrd
         """
         if not self.is_connected:
             if not self.connect_to_proxmox():
                 return {'success': False, 'error': 'Could not connect to Proxmox'}
         
         try:
-            host = self.host
-            url = f"https://{host}:{self.api_port}/api2/json/nodes/{node}/rrddata"
-            
-            response = self._create_session().get(url, params={'timeframe': timeframe})
-            
-            if response.status_code == 200:
-                rrd_data = response.json().get('data', [])
-                
-                # Process and format the data for charts
-                formatted_data = {
-                    'timeframe': timeframe,
-                    'node': node,
-                    'metrics': {
-                        'cpu': [],
-                        'memory': [],
-                        'swap': [],
-                        'iowait': [],
-                        'loadavg': [],
-                        'net_in': [],
-                        'net_out': [],
-                        'rootfs': []
-                    },
-                    'timestamps': []
-                }
-
-                # Check for pressure stall data (PSI)
-                pressure_keys = [
-                    'pressurecpusome', 'pressurecpufull',
-                    'pressurememorysome', 'pressurememoryfull',
-                    'pressureiosome', 'pressureiofull'
-                ]
-                active_pressure_keys = []
-
-                # Check first valid point to determine available metrics
-                if rrd_data:
-                    first_point = next((p for p in rrd_data if p), None)
-                    if first_point:
-                        for k in pressure_keys:
-                            if k in first_point:
-                                active_pressure_keys.append(k)
-                                formatted_data['metrics'][k] = []
-
-                for point in rrd_data:
-                    if not point:
-                        continue
-                    
-                    timestamp = point.get('time', 0)
-                    formatted_data['timestamps'].append(timestamp)
-                    
-                    # CPU usage (0-1 -> 0-100%)
-                    cpu = point.get('cpu', 0)
-                    formatted_data['metrics']['cpu'].append(round((cpu or 0) * 100, 2))
-                    
-                    # IO Wait
-                    iowait = point.get('iowait', 0)
-                    formatted_data['metrics']['iowait'].append(round((iowait or 0) * 100, 2))
-                    
-                    # Memory usage
-                    memused = point.get('memused', 0)
-                    memtotal = point.get('memtotal', 1)
-                    mem_percent = ((memused or 0) / (memtotal or 1)) * 100
-                    formatted_data['metrics']['memory'].append(round(mem_percent, 2))
-                    
-                    # Swap usage
-                    swapused = point.get('swapused', 0)
-                    swaptotal = point.get('swaptotal', 1)
-                    if swaptotal and swaptotal > 0:
-                        swap_percent = ((swapused or 0) / swaptotal) * 100
-                    else:
-                        swap_percent = 0
-                    formatted_data['metrics']['swap'].append(round(swap_percent, 2))
-                    
-                    # Load average
-                    loadavg = point.get('loadavg', 0)
-                    formatted_data['metrics']['loadavg'].append(round(loadavg or 0, 2))
-                    
-                    # Network I/O (bytes/s)
-                    netin = point.get('netin', 0)
-                    netout = point.get('netout', 0)
-                    formatted_data['metrics']['net_in'].append(round((netin or 0) / 1024, 2))  # KB/s
-                    formatted_data['metrics']['net_out'].append(round((netout or 0) / 1024, 2))  # KB/s
-                    
-                    # Root FS usage
-                    rootused = point.get('rootused', 0)
-                    roottotal = point.get('roottotal', 1)
-                    if roottotal and roottotal > 0:
-                        rootfs_percent = ((rootused or 0) / roottotal) * 100
-                    else:
-                        rootfs_percent = 0
-                    formatted_data['metrics']['rootfs'].append(round(rootfs_percent, 2))
-
-                    # Pressure Stall (PSI)
-                    for k in active_pressure_keys:
-                        formatted_data['metrics'][k].append(point.get(k, 0) or 0)
-                
-                return formatted_data
+            url = f"https://{self.host}:{self.api_port}/api2/json/nodes/{node}/rrddata"
+            return cached_series(
+                ('pve', self.id, node, 'node', None, timeframe), timeframe,
+                lambda since: self._fetch_rrddata(url, timeframe),
+                lambda points, meta: self._format_node_rrd(points, node, timeframe))
+        except RrdFetchError:
             return {'error': 'Failed to get RRD data'}
         except Exception as e:
             self.logger.error(f"Error getting node RRD data: {e}")
             return {'error': str(e)}
+
+    @staticmethod
+    def _format_node_rrd(rrd_data, node, timeframe):
+        # Process and format the data for charts
+        formatted_data = {
+            'timeframe': timeframe,
+            'node': node,
+            'metrics': {
+                'cpu': [],
+                'memory': [],
+                'swap': [],
+                'iowait': [],
+                'loadavg': [],
+                'net_in': [],
+                'net_out': [],
+                'rootfs': []
+            },
+            'timestamps': []
+        }
+
+        # Check for pressure stall data (PSI)
+        pressure_keys = [
+            'pressurecpusome', 'pressurecpufull',
+            'pressurememorysome', 'pressurememoryfull',
+            'pressureiosome', 'pressureiofull'
+        ]
+        active_pressure_keys = []
+
+        # Check first valid point to determine available metrics
+        if rrd_data:
+            first_point = next((p for p in rrd_data if p), None)
+            if first_point:
+                for k in pressure_keys:
+                    if k in first_point:
+                        active_pressure_keys.append(k)
+                        formatted_data['metrics'][k] = []
+
+        for point in rrd_data:
+            if not point:
+                continue
+            
+            timestamp = point.get('time', 0)
+            formatted_data['timestamps'].append(timestamp)
+            
+            # CPU usage (0-1 -> 0-100%)
+            cpu = point.get('cpu', 0)
+            formatted_data['metrics']['cpu'].append(round((cpu or 0) * 100, 2))
+            
+            # IO Wait
+            iowait = point.get('iowait', 0)
+            formatted_data['metrics']['iowait'].append(round((iowait or 0) * 100, 2))
+            
+            # Memory usage
+            memused = point.get('memused', 0)
+            memtotal = point.get('memtotal', 1)
+            mem_percent = ((memused or 0) / (memtotal or 1)) * 100
+            formatted_data['metrics']['memory'].append(round(mem_percent, 2))
+            
+            # Swap usage
+            swapused = point.get('swapused', 0)
+            swaptotal = point.get('swaptotal', 1)
+            if swaptotal and swaptotal > 0:
+                swap_percent = ((swapused or 0) / swaptotal) * 100
+            else:
+                swap_percent = 0
+            formatted_data['metrics']['swap'].append(round(swap_percent, 2))
+            
+            # Load average
+            loadavg = point.get('loadavg', 0)
+            formatted_data['metrics']['loadavg'].append(round(loadavg or 0, 2))
+            
+            # Network I/O (bytes/s)
+            netin = point.get('netin', 0)
+            netout = point.get('netout', 0)
+            formatted_data['metrics']['net_in'].append(round((netin or 0) / 1024, 2))  # KB/s
+            formatted_data['metrics']['net_out'].append(round((netout or 0) / 1024, 2))  # KB/s
+            
+            # Root FS usage
+            rootused = point.get('rootused', 0)
+            roottotal = point.get('roottotal', 1)
+            if roottotal and roottotal > 0:
+                rootfs_percent = ((rootused or 0) / roottotal) * 100
+            else:
+                rootfs_percent = 0
+            formatted_data['metrics']['rootfs'].append(round(rootfs_percent, 2))
+
+            # Pressure Stall (PSI)
+            for k in active_pressure_keys:
+                formatted_data['metrics'][k].append(point.get(k, 0) or 0)
+
+        return formatted_data
     
     def get_node_network_config(self, node: str) -> List[Dict]:
         
@@ -14907,12 +14963,12 @@ echo "AGENT_INSTALLED_OK"
         
         NS: This is the main loadbalancer logic - runs every check_interval seconds
         1. Get node scores (CPU + RAM weighted)
-        2. If difference > threshold, find a VM to migrate
-        3. Move smallest suitable VM from loaded -> less loaded node
-        
+        2. If difference > threshold, plan moves for the whole cluster (plan_balance)
+        3. Execute the first steps of the plan
+
         MK: Feb 2026 - Now supports up to 3 migrations per cycle for larger clusters.
-        After each migration, scores are re-evaluated to avoid over-correcting.
         LW: Number of migrations scales with score difference and cluster size.
+        NS: Oct 2026 - rounds replaced by one ordered plan; dry-run logs all of it.
         """
         try:
             self.logger.info("=" * 60)
@@ -14953,51 +15009,38 @@ echo "AGENT_INSTALLED_OK"
             
             migrations_done = 0
             already_migrated_vmids = []  # LW: Track migrated VMs to avoid picking same one
-            
-            for migration_round in range(max_migrations):
-                # Re-fetch node status after each migration (scores changed!)
-                if migration_round > 0:
-                    self.logger.info(f"--- Re-evaluating balance (round {migration_round + 1}/{max_migrations}) ---")
-                    node_status = self.get_node_status()
-                    if not node_status:
+
+            # NS Oct 2026 — one whole-cluster plan instead of max/min-pair rounds
+            # (see plan_balance / core/placement). The plan is ordered, so the
+            # first max_migrations steps are the ones that buy the most balance;
+            # whatever is left is re-planned from fresh scores next cycle. A swap
+            # is never cut in half (one over the cap rather than a move that only
+            # flips which node is hot). Dry-run walks the full plan so the log
+            # shows every step.
+            needs_balance, _, _ = self.check_balance_needed(node_status)
+            if needs_balance and (force or self.config.auto_migrate):
+                plan = self.plan_balance(node_status)
+                steps = plan['moves'] if self.config.dry_run else swap_safe_prefix(plan['moves'], max_migrations)
+                if not steps:
+                    self.logger.info("No suitable VM found for migration")
+                vm_rows = {vm.get('vmid'): vm for vm in (self.get_vm_resources(max_age=30) or [])}
+                for i, step in enumerate(steps, 1):
+                    vm = dict(vm_rows.get(step['vmid']) or {'vmid': step['vmid'], 'name': step['name'], 'type': step['type']})
+                    if vm.get('node') not in (None, step['from']):
+                        self.logger.info(f"VM {step['vmid']} moved to {vm.get('node')} meanwhile, stopping plan execution")
                         break
-                
-                # Check if balancing is needed
-                needs_balance, source_node, target_node = self.check_balance_needed(node_status)
-                
-                if not needs_balance:
-                    if migration_round == 0:
-                        pass  # Normal - already logged in check_balance_needed
-                    else:
-                        self.logger.info(f"[OK] Cluster balanced after {migrations_done} migration(s)")
-                    break
-                
-                if not force and not self.config.auto_migrate:
-                    break
-                
-                # MK: Find migration candidate, excluding already migrated VMs
-                vm = self.find_migration_candidate(source_node, target_node, exclude_vmids=already_migrated_vmids, node_status=node_status)
-                
-                if vm:
-                    vmid = vm.get('vmid')
-                    vm_name = vm.get('name', 'unnamed')
-                    
-                    if max_migrations > 1:
-                        self.logger.info(f"[{migration_round + 1}/{max_migrations}] Migrating {vm_name} (VMID {vmid}): {source_node} → {target_node}")
-                    
-                    success = self.migrate_vm(vm, target_node)
-                    
-                    if success:
+                    vm['node'] = step['from']
+                    vm['_has_local_disks'] = step.get('local_disks', False)
+                    self.logger.info(f"[{i}/{len(steps)}] Migrating {step['name'] or 'unnamed'} (VMID {step['vmid']}): {step['from']} → {step['to']} (predicted {step['predicted_scores']})")
+
+                    if self.migrate_vm(vm, step['to']):
                         migrations_done += 1
-                        already_migrated_vmids.append(vmid)
-                        self._vm_migration_cooldown[vmid] = time.time()  # NS: cooldown to prevent ping-pong
+                        already_migrated_vmids.append(step['vmid'])
+                        self._vm_migration_cooldown[step['vmid']] = time.time()  # NS: cooldown to prevent ping-pong
                     else:
-                        self.logger.warning(f"Migration failed for {vm_name}, stopping further migrations this cycle")
+                        self.logger.warning(f"Migration failed for {step['name'] or 'unnamed'}, stopping further migrations this cycle")
                         break
-                else:
-                    self.logger.info("No suitable VM found for migration")
-                    break
-            
+
             if migrations_done > 1:
                 self.logger.info(f"[SUMMARY] Completed {migrations_done} migration(s) in this cycle")
 
@@ -16665,19 +16708,20 @@ echo DONE""",
             return []
 
     def refresh_ip_cache(self) -> None:
+        """Probe the guests the poll planner says are due and update the IP and
+        disk-usage caches. NS Oct 2026 — used to probe every running guest on
+        every pass; now unchanged answers back off (core/guest_poller.py)."""
         if not self.is_connected or not self.session:
             return
         try:
-            resources = self.get_vm_resources()
-            running = [r for r in resources if r.get('status') == 'running']
-            if not running:
+            resources = self.get_vm_resources(max_age=GUEST_POLL_TICK)
+            due = self._guest_poller.plan(resources, focused_guests(self.id))
+            if not due:
                 return
 
             def fetch_one(r):
                 node = r.get('node', '')
                 vmid = r.get('vmid')
-                if not node or not vmid:
-                    return None
                 vm_type = r.get('type', 'qemu')
                 if vm_type == 'lxc':
                     ips = self._fetch_lxc_ips(node, vmid)
@@ -16687,7 +16731,7 @@ echo DONE""",
                     disk = self._fetch_qemu_disk_usage(node, vmid)
                     return (node, vmid, ips, disk)
 
-            tasks = [lambda r=r: fetch_one(r) for r in running]
+            tasks = [lambda r=r: fetch_one(r) for r in due]
             results = run_concurrent(tasks, timeout=15.0)
 
             with self._ip_cache_lock:
@@ -16703,11 +16747,19 @@ echo DONE""",
                     node, vmid, ips, disk = result
                     if disk:
                         self._disk_cache[(node, vmid)] = disk
+            for r, result in zip(due, results):
+                if result is None:   # timed out in run_concurrent
+                    self._guest_poller.record(r.get('node', ''), r.get('vmid'), None)
+                    continue
+                node, vmid, ips, disk = result
+                # fill level in whole percent — byte counts move on every probe
+                fill = round(disk['used'] * 100 / disk['total']) if disk else None
+                self._guest_poller.record(node, vmid, (tuple(ips), fill))
         except Exception as e:
             self.logger.debug(f"[IP cache] refresh failed: {e}")
 
     def _ip_refresh_loop(self) -> None:
-        """Background loop that refreshes the IP cache every 30 seconds.
+        """Background loop that drives refresh_ip_cache every GUEST_POLL_TICK.
 
         MK May 2026 (#375) — every 5 min we also drop the entire `_no_agent_vms`
         skip-list so VMs whose guest agent wasn't ready at the first probe get
@@ -16718,17 +16770,23 @@ echo DONE""",
             return
         _NO_AGENT_TTL = 300  # 5 minutes
         last_no_agent_clear = time.time()
+        was_watched = False
         import random
         while not self.stop_event.is_set():
             try:
                 if self.is_connected:
                     # H4 (scale audit): only refresh IPs for a cluster someone is
-                    # actually viewing — this fans out 1-2 guest-agent calls PER
-                    # running VM; doing it for all 30 clusters every 30s saturates
-                    # the shared node pool for data no client is looking at. The
-                    # _no_agent_vms TTL-clear stays unconditional (cheap).
-                    if is_cluster_watched(self.id):
+                    # actually viewing. The planner decides which guests are due,
+                    # so a tick on a settled cluster costs a handful of probes.
+                    # The _no_agent_vms TTL-clear stays unconditional (cheap).
+                    watched = is_cluster_watched(self.id)
+                    if watched:
                         self.refresh_ip_cache()
+                    elif was_watched:
+                        # nobody refreshes while unwatched — whatever is cached
+                        # now ages, so the next viewer gets a fresh round
+                        self._guest_poller.mark_stale()
+                    was_watched = watched
                     now = time.time()
                     if now - last_no_agent_clear >= _NO_AGENT_TTL:
                         if self._no_agent_vms:
@@ -16738,7 +16796,7 @@ echo DONE""",
             except Exception as e:
                 self.logger.debug(f"[IP refresh loop] error: {e}")
             # H4: jitter so 30 managers don't fire on the same wall-clock tick
-            self.stop_event.wait(30 + random.uniform(0, 10))
+            self.stop_event.wait(GUEST_POLL_TICK + random.uniform(0, 2))
 
     def start(self):
         """Start the PegaProx daemon"""
@@ -0,0 +1,454 @@
+# -*- coding: utf-8 -*-
+"""
+PegaProx Migration Queue - Layer 4
+Per-cluster migration scheduler shared by bulk migrate and node evacuation.
+"""
+
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime
+
+# NS Oct 2026 — bulk migrate used to POST up to 1000 /migrate calls in a tight
+# loop (PVE then ran them all at once over one migration network), and node
+# evacuation did the opposite: strictly one guest at a time, each waited out
+# with _wait_for_task. Both now go through this queue:
+#   * concurrency caps per cluster and per node (outgoing AND incoming), from
+#     config.migration_max_parallel / migration_max_per_node
+#   * ordering by estimated transfer cost — RAM x (1 + cpu load); busy guests
+#     re-dirty pages and need extra pre-copy rounds. Biggest first, so the tail
+#     of a batch isn't one 256G guest migrating alone while the link idles
+#   * progress per job through its UPID (/nodes/{node}/tasks/{upid}/status)
+#   * retry with exponential backoff, and an "HA moved it anyway" check
+#   * ETA from the observed migration throughput (EWMA of bytes/s per job)
+
+DEFAULT_MAX_PARALLEL = 4
+DEFAULT_MAX_PER_NODE = 2
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 30           # seconds; 30, 60, 120 ...
+BACKOFF_MAX = 300
+POLL_INTERVAL = 2
+STOP_GRACE = 300            # after stopping a timed-out task: re-send the stop / give up on an unreadable status
+FINISHED_TTL = 3600         # keep finished batches this long for status queries
+
+
+class MigrationJob:
+    """One guest in the queue."""
+
+    def __init__(self, row, target=None, online=True, options=None, user=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.batch_id = None
+        self.row = row
+        self.vmid = row.get('vmid')
+        self.name = row.get('name', 'unnamed')
+        self.type = row.get('type', 'qemu')
+        self.source = row.get('node')
+        self.target = target
+        self.auto_target = target is None
+        self.online = online
+        self.options = options or {}
+        self.user = user
+        self.mem = float(row.get('mem') or row.get('maxmem') or 0)
+        self.dirty = float(row.get('cpu') or 0)     # dirty-rate proxy, see module head
+        self.state = 'queued'       # queued | running | done | failed
+        self.attempts = 0
+        self.upid = None
+        self.next_try = 0.0
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.note = None
+        self.landed = None          # node the guest was last seen on (HA re-route)
+        self.stop_sent = None       # when we asked PVE to stop a timed-out task
+
+    @property
+    def cost(self):
+        return self.mem * (1.0 + self.dirty)
+
+    def to_dict(self, rate=None):
+        d = {
+            'id': self.id, 'vmid': self.vmid, 'name': self.name, 'type': self.type,
+            'source': self.source, 'target': self.target, 'state': self.state,
+            'attempts': self.attempts, 'upid': self.upid, 'error': self.error, 'note': self.note,
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat() if self.started_at else None,
+            'finished_at': datetime.fromtimestamp(self.finished_at).isoformat() if self.finished_at else None,
+        }
+        if self.state == 'running' and rate and self.mem:
+            d['progress_percent'] = round(min(99.0, rate * (time.time() - self.started_at) / self.mem * 100), 1)
+        return d
+
+
+class MigrationQueue:
+    """Scheduler for one cluster manager. A dispatcher thread runs while there
+    is work and exits when the queue drains."""
+
+    def __init__(self, manager):
+        self.mgr = manager
+        self.lock = threading.Lock()
+        self.jobs = {}          # job id → MigrationJob
+        self.batches = {}       # batch id → {'jobs': [ids], 'label', 'created', ...hooks}
+        self.rate = None        # EWMA bytes/s of one migration
+        self._thread = None
+        self._wake = threading.Event()
+        self._finished = []     # jobs whose on_finish hook hasn't run yet
+
+    # -- limits -----------------------------------------------------------
+    def limits(self):
+        cfg = self.mgr.config
+        try:
+            per_cluster = int(getattr(cfg, 'migration_max_parallel', 0) or DEFAULT_MAX_PARALLEL)
+            per_node = int(getattr(cfg, 'migration_max_per_node', 0) or DEFAULT_MAX_PER_NODE)
+        except (TypeError, ValueError):
+            per_cluster, per_node = DEFAULT_MAX_PARALLEL, DEFAULT_MAX_PER_NODE
+        return max(1, per_cluster), max(1, per_node)
+
+    # -- public -----------------------------------------------------------
+    def submit(self, jobs, start, pick_target=None, on_start=None, on_finish=None, label='',
+               wait_timeout=1800):
+        """Queue MigrationJobs as one batch; returns the batch id.
+
+        start(job) -> {'success', 'task', 'error'} kicks the migration off
+        without waiting. pick_target(job, busy_nodes) chooses a target at
+        dispatch time for jobs submitted without one (None = wait/fail).
+        on_start(job) fires once a UPID is known, on_finish(job) once the job
+        is done or has failed for good.
+        """
+        batch_id = uuid.uuid4().hex[:12]
+        with self.lock:
+            self._gc()
+            for job in jobs:
+                job.batch_id = batch_id
+                self.jobs[job.id] = job
+            self.batches[batch_id] = {
+                'jobs': [j.id for j in jobs], 'label': label, 'created': time.time(),
+                'start': start, 'pick_target': pick_target, 'on_start': on_start,
+                'on_finish': on_finish, 'wait_timeout': wait_timeout,
+            }
+        # first wave starts right away so the caller's response already
+        # reflects it; the dispatcher thread takes over from there
+        try:
+            self._dispatch()
+        except Exception as e:
+            logging.error(f"[MIGQ] initial dispatch failed: {e}")
+        self._notify_finished()
+        with self.lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name=f'migq-{getattr(self.mgr, "id", "")}')
+                self._thread.start()
+        self._wake.set()
+        return batch_id
+
+    def batch_status(self, batch_id, visible=None):
+        """visible(job) -> bool limits the batch to the jobs a caller may see;
+        counts and ETA are then computed from those jobs only. None if the
+        batch doesn't exist or none of its jobs is visible."""
+        with self.lock:
+            b = self.batches.get(batch_id)
+            if not b:
+                return None
+            jobs = self._batch_jobs(b, visible)
+            if visible is not None and not jobs:
+                return None
+            return self._summary(batch_id, b, jobs)
+
+    def status(self, visible=None):
+        """All batches; with visible(job), batches without a visible job are left out."""
+        with self.lock:
+            per_cluster, per_node = self.limits()
+            batches = []
+            for bid, b in sorted(self.batches.items(), key=lambda kv: kv[1]['created']):
+                jobs = self._batch_jobs(b, visible)
+                if jobs or visible is None:
+                    batches.append(self._summary(bid, b, jobs))
+            return {
+                'max_parallel': per_cluster, 'max_per_node': per_node,
+                'throughput_bps': round(self.rate) if self.rate else None,
+                'batches': batches,
+            }
+
+    def is_done(self, batch_id):
+        st = self.batch_status(batch_id)
+        return st is None or st['finished']
+
+    # -- internals --------------------------------------------------------
+    def _batch_jobs(self, b, visible=None):
+        jobs = [self.jobs[j] for j in b['jobs'] if j in self.jobs]
+        return jobs if visible is None else [j for j in jobs if visible(j)]
+
+    def _summary(self, batch_id, b, jobs):
+        counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+        for j in jobs:
+            counts[j.state] += 1
+        return {
+            'id': batch_id, 'label': b['label'],
+            'created': datetime.fromtimestamp(b['created']).isoformat(),
+            'total': len(jobs), **counts,
+            'finished': counts['queued'] == 0 and counts['running'] == 0,
+            'eta_seconds': self._eta(jobs),
+            'jobs': [j.to_dict(self.rate) for j in jobs],
+        }
+
+    def _eta(self, jobs):
+        """Seconds until the batch drains at the observed throughput (None
+        until one migration has finished)."""
+        if not self.rate:
+            return None
+        now = time.time()
+        left, active = 0.0, 0
+        sources, targets = set(), set()
+        for j in jobs:
+            if j.state == 'queued':
+                left += j.mem
+            elif j.state == 'running':
+                left += max(0.0, j.mem - self.rate * (now - (j.started_at or now)))
+            else:
+                continue
+            active += 1
+            sources.add(j.source)
+            targets.add(j.target)
+        if not active:
+            return 0
+        # parallelism is bounded by the cluster cap and by the per-node cap on
+        # either end (an evacuation has one source; a bulk move one target)
+        per_cluster, per_node = self.limits()
+        slots = min(per_cluster, active, per_node * len(sources))
+        if None not in targets:
+            slots = min(slots, per_node * len(targets))
+        return int(left / (self.rate * slots))
+
+    def _gc(self):
+        now = time.time()
+        for bid in [bid for bid, b in self.batches.items() if now - b['created'] > FINISHED_TTL]:
+            ids = self.batches[bid]['jobs']
+            if all(self.jobs[j].state in ('done', 'failed') for j in ids if j in self.jobs):
+                for j in ids:
+                    self.jobs.pop(j, None)
+                del self.batches[bid]
+
+    def _run(self):
+        while True:
+            try:
+                self._poll_running()
+                self._dispatch()
+            except Exception as e:
+                logging.error(f"[MIGQ] dispatcher error: {e}")
+            self._notify_finished()
+            with self.lock:
+                if not any(j.state in ('queued', 'running') for j in self.jobs.values()):
+                    self._thread = None
+                    return
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+
+    def _node_load(self):
+        """Running migrations per node, either end. Caller holds the lock."""
+        load = {}
+        for j in self.jobs.values():
+            if j.state == 'running':
+                load[j.source] = load.get(j.source, 0) + 1
+                load[j.target] = load.get(j.target, 0) + 1
+        return load
+
+    def _dispatch(self):
+        per_cluster, per_node = self.limits()
+        now = time.time()
+        # 1. under the lock: which queued jobs could start, given the load now
+        with self.lock:
+            load = self._node_load()
+            slots = per_cluster - sum(1 for j in self.jobs.values() if j.state == 'running')
+            queued = sorted((j for j in self.jobs.values() if j.state == 'queued' and j.next_try <= now),
+                            key=lambda j: (-j.cost, j.vmid or 0))
+            candidates, outgoing = [], dict(load)
+            for job in queued:
+                if len(candidates) >= slots:
+                    break
+                if outgoing.get(job.source, 0) >= per_node:
+                    continue
+                outgoing[job.source] = outgoing.get(job.source, 0) + 1
+                candidates.append((job, self.batches[job.batch_id]))
+        if not candidates:
+            return
+
+        # 2. without it: target picks (evacuation's get_best_target_node walks
+        # the PVE API). Earlier picks count towards `busy` for later ones.
+        planned, picks = dict(load), []
+        for job, batch in candidates:
+            target = job.target
+            if job.auto_target:
+                busy = [n for n, c in planned.items() if c >= per_node]
+                try:
+                    target = batch['pick_target'](job, busy) if batch['pick_target'] else None
+                except Exception as e:
+                    logging.debug(f"[MIGQ] target pick for {job.vmid} failed: {e}")
+                    target = None
+            if target:
+                planned[job.source] = planned.get(job.source, 0) + 1
+                planned[target] = planned.get(target, 0) + 1
+            picks.append((job, batch, target))
+
+        # 3. under the lock again: re-check against the load as it is now (the
+        # poller or another dispatch may have started or finished jobs)
+        to_start = []
+        with self.lock:
+            load = self._node_load()
+            running = sum(1 for j in self.jobs.values() if j.state == 'running')
+            slots = per_cluster - running
+            for job, batch, target in picks:
+                if job.state != 'queued':
+                    continue
+                if not target:
+                    if not running and not to_start:
+                        self._finish(job, False, 'No target node available')
+                    continue
+                if slots <= 0:
+                    break
+                if load.get(job.source, 0) >= per_node or load.get(target, 0) >= per_node:
+                    continue
+                job.target = target
+                job.state = 'running'
+                job.attempts += 1
+                job.started_at = now
+                load[job.source] = load.get(job.source, 0) + 1
+                load[job.target] = load.get(job.target, 0) + 1
+                slots -= 1
+                to_start.append((job, batch))
+
+        # PVE calls happen outside the lock
+        for job, batch in to_start:
+            if not self._still_on_source(job):
+                with self.lock:
+                    job.note = 'already moved (HA or manual)'
+                    self._finish(job, True)
+                continue
+            try:
+                res = batch['start'](job) or {}
+            except Exception as e:
+                res = {'success': False, 'error': str(e)}
+            with self.lock:
+                if res.get('success') and res.get('task'):
+                    job.upid = res['task']
+                    job.started_at = time.time()
+                else:
+                    self._failed(job, res.get('error') or 'Migration could not be started')
+                    continue
+            if batch.get('on_start'):
+                try:
+                    batch['on_start'](job)
+                except Exception:
+                    pass
+
+    def _notify_finished(self):
+        """Run on_finish hooks outside the lock."""
+        with self.lock:
+            done, self._finished = self._finished, []
+        for job in done:
+            hook = self.batches.get(job.batch_id, {}).get('on_finish')
+            if hook:
+                try:
+                    hook(job)
+                except Exception as e:
+                    logging.debug(f"[MIGQ] on_finish for {job.vmid} failed: {e}")
+
+    def _still_on_source(self, job):
+        try:
+            for v in self.mgr.get_vm_resources(max_age=5) or []:
+                if v.get('vmid') == job.vmid:
+                    job.landed = v.get('node')
+                    return v.get('node') == job.source
+        except Exception:
+            pass
+        return True     # can't tell — try anyway
+
+    def _poll_running(self):
+        with self.lock:
+            running = [j for j in self.jobs.values() if j.state == 'running' and j.upid]
+        for job in running:
+            timeout = self.batches[job.batch_id]['wait_timeout']
+            task_url = (f"https://{self.mgr.host}:{self.mgr.api_port}/api2/json"
+                        f"/nodes/{job.source}/tasks/{job.upid}")
+            try:
+                r = self.mgr._api_get(f"{task_url}/status")
+                data = r.json().get('data', {}) if r.status_code == 200 else {}
+            except Exception as e:
+                logging.debug(f"[MIGQ] task status for {job.upid} failed: {e}")
+                data = {}
+            now = time.time()
+            if data.get('status') == 'stopped':
+                ok = data.get('exitstatus', '') in ('OK', 'WARNINGS')   # #184
+                if not ok and not self._still_on_source(job):
+                    # #340: HA re-routed the guest after our target was refused
+                    job.note = 'HA re-routed'
+                    ok = True
+                with self.lock:
+                    if ok:
+                        self._finish(job, True)
+                    elif job.stop_sent:
+                        self._finish(job, False, f'Timed out after {timeout}s')
+                    else:
+                        self._failed(job, f"Task finished with {data.get('exitstatus') or 'error'}")
+            elif job.stop_sent:
+                # the task holds its node slots until PVE says it stopped; only
+                # an unreadable status lets go, and only after STOP_GRACE
+                if now - job.stop_sent > STOP_GRACE:
+                    if data:
+                        self._stop_task(job, task_url, now)
+                    else:
+                        with self.lock:
+                            self._finish(job, False, f'Timed out after {timeout}s (task state unknown)')
+            elif now - job.started_at > timeout:
+                self._stop_task(job, task_url, now)
+
+    def _stop_task(self, job, task_url, now):
+        """Ask PVE to stop a task that overran its timeout. The job stays
+        'running' (and counted against the caps) until the task is gone."""
+        job.stop_sent = now
+        logging.warning(f"[MIGQ] {job.name} ({job.vmid}) overran its timeout — stopping {job.upid}")
+        try:
+            self.mgr._api_delete(task_url)
+        except Exception as e:
+            logging.warning(f"[MIGQ] stopping {job.upid} failed: {e}")
+
+    def _failed(self, job, error):
+        """Retry with backoff or give up. Caller holds self.lock."""
+        job.upid = None
+        job.stop_sent = None
+        if job.attempts < MAX_ATTEMPTS:
+            job.state = 'queued'
+            job.error = error
+            job.next_try = time.time() + min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (job.attempts - 1))
+            if job.auto_target:
+                job.target = None
+            logging.warning(f"[MIGQ] {job.name} ({job.vmid}) attempt {job.attempts} failed: {error} — retrying")
+        else:
+            self._finish(job, False, error)
+
+    def _finish(self, job, ok, error=None):
+        """Caller holds self.lock."""
+        job.finished_at = time.time()
+        job.state = 'done' if ok else 'failed'
+        job.error = None if ok else error
+        self._finished.append(job)
+        if ok and job.upid and job.started_at and job.mem:
+            took = job.finished_at - job.started_at
+            if took > 1:
+                bps = job.mem / took
+                self.rate = bps if self.rate is None else 0.7 * self.rate + 0.3 * bps
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_migration_queue(manager):
+    with _queues_lock:
+        q = _queues.get(manager.id)
+        if q is None or q.mgr is not manager:
+            q = _queues[manager.id] = MigrationQueue(manager)
+        return q
+
+
+def drop_migration_queue(cluster_id):
+    with _queues_lock:
+        _queues.pop(cluster_id, None)
@@ -18,6 +18,7 @@ import re
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 from pegaprox.core.db import get_db
+from pegaprox.core.rrd_cache import cached_series, RrdFetchError
 from pegaprox.globals import pbs_managers
 
 def _validate_pbs_host(host: str) -> bool:
@@ -635,7 +636,22 @@ class PBSManager:
     
     def get_datastore_rrd(self, store: str, timeframe: str = 'hour', cf: str = 'AVERAGE') -> dict:
         """Get RRD performance data for a datastore"""
-        return self.api_get(f'/admin/datastore/{store}/rrd', params={'timeframe': timeframe, 'cf': cf})
+        return self._cached_rrd(('pbs', self.id, 'datastore', store, timeframe, cf),
+                                f'/admin/datastore/{store}/rrd', timeframe, cf)
+
+    def _cached_rrd(self, key, path, timeframe, cf) -> dict:
+        """RRD GET through the shared RRD cache (core/rrd_cache.py) — one fetch
+        per RRD step however many PBS charts are open. NS Oct 2026"""
+        def fetch(since):
+            # PBS has no "since" filter either — whole window, merged by time
+            res = self.api_get(path, params={'timeframe': timeframe, 'cf': cf})
+            if 'error' in res:
+                raise RrdFetchError(res['error'])
+            return res.get('data') or [], None
+        try:
+            return {'data': cached_series(key, timeframe, fetch)}
+        except RrdFetchError as e:
+            return {'error': str(e)}
     
     # ── Snapshot & Group Notes ──
     
@@ -690,7 +706,8 @@ class PBSManager:
     
     def get_node_rrd(self, timeframe: str = 'hour', cf: str = 'AVERAGE') -> dict:
         """Get RRD performance data for the PBS node"""
-        return self.api_get('/nodes/localhost/rrd', params={'timeframe': timeframe, 'cf': cf})
+        return self._cached_rrd(('pbs', self.id, 'node', timeframe, cf),
+                                '/nodes/localhost/rrd', timeframe, cf)
     
     # ── Notifications ──
     
@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+PegaProx Placement Planner - Layer 3
+Whole-cluster migration planning for the load balancer.
+"""
+
+# NS Oct 2026 — the balancer used to move ONE guest per round from the max-score
+# node to the min-score node, then re-poll PVE and do it again (max 3 rounds).
+# On 20-node clusters that takes many cycles to converge, and since every round
+# only looks at two nodes it happily fixes the top pair by overloading the next
+# one (ping-pong). This module looks at every node x guest at once and returns
+# an ordered list of moves with the predicted node scores after each step.
+#
+# Pure data in / data out — no PVE calls here. Anything that needs the API
+# (affinity, CPU compat, local storage, ProxLB pins) comes in through the
+# caller's `can_place(vm, target, vm_nodes)` callback, which is only asked about
+# moves that would actually be picked, so it stays cheap on big clusters.
+#
+# Approach: greedy best-improvement (the move that lowers the score variance the
+# most per unit of migration cost), a swap step when no single move helps any
+# more (two guests trading places between the hottest node and a colder one),
+# then a pruning pass that drops moves the target spread doesn't need.
+
+# relative migration cost — containers always restart, so a CT move has to buy
+# twice the improvement of a VM move before we pick it
+_TYPE_COST = {'qemu': 1.0, 'lxc': 2.0}
+
+# how many ranked moves we ask can_place() about per step before giving up
+_MAX_CHECKS_PER_STEP = 40
+
+# guests per node considered for a swap (largest first)
+_SWAP_CANDIDATES = 15
+
+
+class PlanNode:
+    __slots__ = ('name', 'cpus', 'cpu_used', 'mem_total', 'mem_used', 'disk_percent')
+
+    def __init__(self, name, cpus, cpu_used, mem_total, mem_used, disk_percent=0.0):
+        self.name = name
+        self.cpus = max(float(cpus or 0), 1.0)
+        self.cpu_used = float(cpu_used or 0)
+        self.mem_total = float(mem_total or 0)
+        self.mem_used = float(mem_used or 0)
+        self.disk_percent = float(disk_percent or 0)
+
+    @classmethod
+    def from_status(cls, name, data):
+        """Build from one get_node_status() entry."""
+        cpus = (data.get('cpuinfo') or {}).get('cpus') or 0
+        cpus = max(float(cpus), 1.0)
+        return cls(name, cpus, (data.get('cpu_percent') or 0) / 100.0 * cpus,
+                   data.get('mem_total'), data.get('mem_used'), data.get('disk_percent'))
+
+
+class PlanVM:
+    __slots__ = ('vmid', 'name', 'type', 'node', 'cpu', 'mem', 'row')
+
+    def __init__(self, row):
+        self.row = row
+        self.vmid = row.get('vmid')
+        self.name = row.get('name', '')
+        self.type = row.get('type', 'qemu')
+        self.node = row.get('node')
+        # /cluster/resources: cpu = fraction of the guest's own maxcpu
+        self.cpu = float(row.get('cpu') or 0) * float(row.get('maxcpu') or 1)
+        self.mem = float(row.get('mem') or 0)
+
+
+def node_score(n, weights):
+    """Same formula as get_node_status(): cpu% * w_cpu + mem% * w_mem + disk% * w_io.
+
+    The io term is the node's rootfs usage, which guest moves don't change, so
+    it is carried along as a constant.
+    """
+    w_cpu, w_mem, w_io = weights
+    cpu_pct = n.cpu_used / n.cpus * 100
+    mem_pct = n.mem_used / n.mem_total * 100 if n.mem_total > 0 else 0
+    return cpu_pct * w_cpu + mem_pct * w_mem + n.disk_percent * w_io
+
+
+class _State:
+    """Mutable copy of the node loads + running sums for O(1) variance deltas."""
+
+    def __init__(self, nodes, weights):
+        self.weights = weights
+        self.nodes = {n.name: PlanNode(n.name, n.cpus, n.cpu_used, n.mem_total, n.mem_used, n.disk_percent)
+                      for n in nodes}
+        self.scores = {name: node_score(n, weights) for name, n in self.nodes.items()}
+        self.total = sum(self.scores.values())
+        self.total_sq = sum(s * s for s in self.scores.values())
+
+    def objective(self):
+        k = len(self.scores)
+        return self.total_sq / k - (self.total / k) ** 2 if k else 0.0
+
+    def spread(self):
+        return max(self.scores.values()) - min(self.scores.values()) if self.scores else 0.0
+
+    def _score_with(self, name, d_cpu, d_mem):
+        n = self.nodes[name]
+        w_cpu, w_mem, w_io = self.weights
+        mem_pct = (n.mem_used + d_mem) / n.mem_total * 100 if n.mem_total > 0 else 0
+        return (n.cpu_used + d_cpu) / n.cpus * 100 * w_cpu + mem_pct * w_mem + n.disk_percent * w_io
+
+    def fits(self, vm, target, freed=0.0):
+        """freed: memory a move planned just before this one releases on target."""
+        n = self.nodes[target]
+        # same gate as find_migration_candidate: free RAM must cover the guest
+        return n.mem_total <= 0 or n.mem_total - n.mem_used + freed >= vm.mem
+
+    def delta(self, moves):
+        """Objective after applying [(vm, src, dst)] without mutating."""
+        changed = {}
+        for vm, src, dst in moves:
+            for name, sign in ((src, -1), (dst, 1)):
+                c, m = changed.get(name, (0.0, 0.0))
+                changed[name] = (c + sign * vm.cpu, m + sign * vm.mem)
+        total, total_sq = self.total, self.total_sq
+        for name, (dc, dm) in changed.items():
+            old = self.scores[name]
+            new = self._score_with(name, dc, dm)
+            total += new - old
+            total_sq += new * new - old * old
+        k = len(self.scores)
+        return total_sq / k - (total / k) ** 2
+
+    def apply(self, vm, src, dst):
+        for name, sign in ((src, -1), (dst, 1)):
+            n = self.nodes[name]
+            n.cpu_used += sign * vm.cpu
+            n.mem_used += sign * vm.mem
+            old = self.scores[name]
+            new = node_score(n, self.weights)
+            self.scores[name] = new
+            self.total += new - old
+            self.total_sq += new * new - old * old
+
+
+def _rounded(scores):
+    return {name: round(s, 2) for name, s in sorted(scores.items())}
+
+
+def _replay(nodes, weights, moves, vm_nodes, can_place):
+    """Re-run an ordered move list from scratch; None if any step no longer
+    fits or is refused (used by the pruning pass)."""
+    st = _State(nodes, weights)
+    placement = dict(vm_nodes)
+    for vm, src, dst, _swap in moves:
+        if not st.fits(vm, dst) or (can_place and not can_place(vm, dst, placement)):
+            return None
+        st.apply(vm, src, dst)
+        placement[str(vm.vmid)] = dst
+    return st
+
+
+def swap_safe_prefix(moves, limit):
+    """The first `limit` moves of a plan, extended by one if the cut would
+    split a swap — half a swap just trades which node is hot."""
+    cut = min(max(int(limit), 0), len(moves))
+    if 0 < cut < len(moves):
+        swap = moves[cut - 1].get('swap')
+        if swap is not None and moves[cut].get('swap') == swap:
+            cut += 1
+    return moves[:cut]
+
+
+def plan_placement(nodes, vms, weights, target_spread, can_place=None, vm_nodes=None,
+                   max_moves=20):
+    """Plan the fewest moves that bring max-min node score down to target_spread.
+
+    nodes:     [PlanNode] — the nodes the balancer may use (sources AND targets)
+    vms:       [PlanVM]   — guests the balancer is allowed to move
+    weights:   (w_cpu, w_mem, w_io) as in get_node_status()
+    can_place: optional callback(vm, target, vm_nodes) -> bool; vm_nodes is the
+               simulated str(vmid) -> node map BEFORE the move
+    vm_nodes:  str(vmid) -> node for every guest in the cluster (affinity input)
+
+    Returns {'moves': [...], 'initial_scores', 'predicted_scores',
+             'initial_spread', 'predicted_spread', 'target_spread', 'reached'}.
+    Each move: {vmid, name, type, from, to, predicted_scores, predicted_spread,
+    swap}. swap is None for a single move; the two moves of a swap carry the
+    same number and only make sense together (see swap_safe_prefix).
+    A guest moves at most once per plan.
+    """
+    node_names = {n.name for n in nodes}
+    vms = [vm for vm in vms if vm.node in node_names]
+    base_placement = dict(vm_nodes or {})
+    for vm in vms:
+        base_placement.setdefault(str(vm.vmid), vm.node)
+    placement = dict(base_placement)
+    where = {vm.vmid: vm.node for vm in vms}     # simulated position per guest
+
+    st = _State(nodes, weights)
+    initial_scores = dict(st.scores)
+    initial_spread = st.spread()
+    moves = []          # [(vm, src, dst, swap id or None)]
+    moved = set()
+    swaps = 0
+    # (vmid, target) pairs can_place() said no to. Affinity answers depend on
+    # the simulated placement, so this is conservative — fine for one plan.
+    refused = set()
+
+    def allowed(vm, dst):
+        key = (vm.vmid, dst)
+        if key in refused:
+            return False
+        if can_place and not can_place(vm, dst, placement):
+            refused.add(key)
+            return False
+        return True
+
+    def commit(vm, src, dst, swap=None):
+        st.apply(vm, src, dst)
+        placement[str(vm.vmid)] = dst
+        where[vm.vmid] = dst
+        moved.add(vm.vmid)
+        moves.append((vm, src, dst, swap))
+
+    def swap_order(first, second):
+        """True if `first` then `second` can both run: each fits (the second
+        with the first guest's memory already gone from its target) and
+        can_place() accepts each against the placement it would run in."""
+        vm, src, dst = first
+        if not (st.fits(vm, dst) and allowed(vm, dst)):
+            return False
+        if not st.fits(second[0], second[2], freed=vm.mem) or (second[0].vmid, second[2]) in refused:
+            return False
+        if not can_place:
+            return True
+        # asked against the placement after `first`; not cached in refused,
+        # the answer only holds for this pairing
+        placement[str(vm.vmid)] = dst
+        try:
+            return bool(can_place(second[0], second[2], placement))
+        finally:
+            placement[str(vm.vmid)] = src
+
+    while st.spread() > target_spread and len(moves) < max_moves:
+        cur = st.objective()
+        mean = st.total / len(st.scores)
+        hot = {name for name, s in st.scores.items() if s > mean}
+        cold = [name for name, s in st.scores.items() if s < mean]
+
+        # single moves: hot → cold, ranked by improvement per migration cost
+        ranked = []
+        for vm in vms:
+            src = where[vm.vmid]
+            if vm.vmid in moved or src not in hot or (vm.cpu <= 0 and vm.mem <= 0):
+                continue
+            cost = _TYPE_COST.get(vm.type, 1.0)
+            for dst in cold:
+                if not st.fits(vm, dst):
+                    continue
+                # never overshoot: the target must end up no hotter than the
+                # source, or the next cycle just moves something back
+                if st._score_with(dst, vm.cpu, vm.mem) > st._score_with(src, -vm.cpu, -vm.mem):
+                    continue
+                gain = cur - st.delta([(vm, src, dst)])
+                if gain > 1e-9:
+                    ranked.append((gain / cost, vm, dst))
+        ranked.sort(key=lambda x: (-x[0], x[1].vmid))
+
+        picked = None
+        for _, vm, dst in ranked[:_MAX_CHECKS_PER_STEP]:
+            if allowed(vm, dst):
+                picked = (vm, dst)
+                break
+        if picked:
+            commit(picked[0], where[picked[0].vmid], picked[1])
+            continue
+
+        # no single move helps — try a swap between the hottest node and a
+        # colder one (two guests of different size trade places)
+        if len(moves) + 2 > max_moves:
+            break
+        src = max(st.scores, key=st.scores.get)
+        big = sorted((vm for vm in vms if where[vm.vmid] == src and vm.vmid not in moved),
+                     key=lambda v: -(v.cpu + v.mem / 2**30))[:_SWAP_CANDIDATES]
+        best = None
+        for dst in sorted(st.scores, key=st.scores.get):
+            if dst == src:
+                continue
+            small = sorted((vm for vm in vms if where[vm.vmid] == dst and vm.vmid not in moved),
+                           key=lambda v: v.cpu + v.mem / 2**30)[:_SWAP_CANDIDATES]
+            for a in big:
+                for b in small:
+                    gain = cur - st.delta([(a, src, dst), (b, dst, src)])
+                    if gain > 1e-9 and (best is None or gain > best[0]):
+                        best = (gain, a, b, dst)
+        if not best:
+            break
+        _, a, b, dst = best
+        # both moves are checked before either is committed — a lone half of
+        # a swap is a move the single-move stage just rejected
+        for first, second in (((a, src, dst), (b, dst, src)), ((b, dst, src), (a, src, dst))):
+            if swap_order(first, second):
+                break
+        else:
+            break
+        swaps += 1
+        commit(*first, swap=swaps)
+        commit(*second, swap=swaps)
+
+    reached = st.spread() <= target_spread
+
+    # pruning: greedy picks can become redundant once later moves landed — drop
+    # any move the plan still reaches the target without (newest first, since
+    # the early big moves are the ones that actually carry the rebalance).
+    # A swap is one unit: both moves go or both stay.
+    units = []
+    for move in moves:
+        if move[3] is not None and units and units[-1][-1][3] == move[3]:
+            units[-1].append(move)
+        else:
+            units.append([move])
+    if reached and len(units) > 1:
+        for i in range(len(units) - 1, -1, -1):
+            trial = units[:i] + units[i + 1:]
+            replay = _replay(nodes, weights, [m for u in trial for m in u], base_placement, can_place)
+            if replay is not None and replay.spread() <= target_spread:
+                units = trial
+
+    out = []
+    st = _State(nodes, weights)
+    swap_ids = {}
+    for vm, src, dst, swap in (m for u in units for m in u):
+        st.apply(vm, src, dst)
+        out.append({
+            'vmid': vm.vmid, 'name': vm.name, 'type': vm.type,
+            'from': src, 'to': dst,
+            'predicted_scores': {src: round(st.scores[src], 2), dst: round(st.scores[dst], 2)},
+            'predicted_spread': round(st.spread(), 2),
+            'swap': None if swap is None else swap_ids.setdefault(swap, len(swap_ids) + 1),
+        })
+
+    return {
+        'moves': out,
+        'initial_scores': _rounded(initial_scores),
+        'predicted_scores': _rounded(st.scores),
+        'initial_spread': round(initial_spread, 2),
+        'predicted_spread': round(st.spread(), 2),
+        'target_spread': target_spread,
+        'reached': st.spread() <= target_spread,
+    }
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+PegaProx RRD cache - Layer 4
+Shared cache behind the chart endpoints (PVE guest/node rrddata, XCP-ng
+rrd_updates, PBS datastore/node rrd).
+
+Every chart open or timeframe switch used to go to the source, pull the whole
+window again and reformat every point — a dashboard with a dozen guest tiles
+open in a few tabs did that per tile per poll, for data that only gains one
+point per RRD step (a minute for 'hour', 30 minutes for 'day', ...). The
+cache keeps one series per key, e.g. ('pve', cluster, node, type, vmid,
+timeframe):
+
+  - an entry stays current until the next step boundary of its timeframe
+    (plus a little grace for the source to write the point), so 'year' charts
+    are fetched about once a week instead of on every click,
+  - concurrent misses on one key share a single fetch,
+  - a refresh passes the newest cached timestamp to the fetch callback; a
+    source that can answer "since t" (XCP-ng rrd_updates) only sends the new
+    rows and they get merged in, one that can't (PVE, PBS) sends the window
+    and the merge just replaces the overlap,
+  - the formatted chart payload is rendered once per series version and
+    shared by every caller until the series changes,
+  - entries and total cells (points x columns) are LRU-bounded.
+
+NS Oct 2026
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# archive step per timeframe — one new point per step, so nothing to refetch before
+STEP_TTL = {'hour': 60, 'day': 1800, 'week': 10800, 'month': 43200, 'year': 604800}
+DEFAULT_TTL = 60                # unknown timeframe → treat like 'hour'
+STEP_GRACE = 10                 # pvestatd writes every 10s; don't refetch right on the boundary
+MAX_ENTRIES = int(os.environ.get('PEGAPROX_RRD_CACHE_ENTRIES', 2000))
+MAX_CELLS = int(os.environ.get('PEGAPROX_RRD_CACHE_CELLS', 2000000))
+
+
+class RrdFetchError(Exception):
+    """Raised by a fetch callback when the source answered with an error; the
+    message is what the chart endpoint reports. Errors are never cached —
+    waiting callers get the same exception and the next call tries again."""
+
+
+def _ts(point):
+    return point.get('time', 0) if isinstance(point, dict) else point[0]
+
+
+def _width(point):
+    if isinstance(point, dict):
+        return max(1, len(point))
+    return max(1, len(point[1])) if len(point) > 1 else 1
+
+
+def merge_points(old, new, span=None):
+    """Fold `new` into `old` (both lists of points, dicts with 'time' or
+    (ts, values) rows). New points win from their first timestamp on — the
+    source may rewrite the last, partially consolidated point — and the result
+    is trimmed to `span` seconds."""
+    new = sorted((p for p in new or () if p), key=_ts)
+    if not new:
+        return list(old or ())
+    first = _ts(new[0])
+    merged = [p for p in old or () if _ts(p) < first] + new
+    if span is not None and span > 0:
+        cutoff = _ts(merged[-1]) - span
+        merged = [p for p in merged if _ts(p) >= cutoff]
+    return merged
+
+
+class _Entry:
+    __slots__ = ('points', 'meta', 'span', 'expires', 'version', 'views', 'cells')
+
+    def __init__(self):
+        self.points = []
+        self.meta = None
+        self.span = None
+        self.expires = 0.0
+        self.version = 0
+        self.views = {}
+        self.cells = 0
+
+
+class _Inflight:
+    __slots__ = ('event', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.error = None
+
+
+class RrdCache:
+    """LRU of RRD series keyed by tuples, with per-key fetch coalescing."""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_cells=MAX_CELLS, clock=time.time):
+        self.max_entries = max(1, int(max_entries))
+        self.max_cells = max(1, int(max_cells))
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._cells = 0
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'coalesced': 0, 'merged': 0, 'resets': 0,
+                         'errors': 0, 'evictions': 0, 'renders': 0, 'render_hits': 0}
+
+    def expiry(self, timeframe, now):
+        """Next step boundary of `timeframe` after `now`, plus the grace."""
+        step = STEP_TTL.get(timeframe, DEFAULT_TTL)
+        return (now // step + 1) * step + min(STEP_GRACE, step / 10)
+
+    def get(self, key, timeframe, fetch, render=None, view=None):
+        """Series for `key`, rendered.
+
+        fetch(since) returns (points, meta): `since` is the newest cached
+        timestamp (None → whole window). meta describes the columns (e.g. the
+        XCP-ng legend list); when it changes the incremental answer can't be
+        merged and the window is fetched again. Raise RrdFetchError on failure.
+
+        render(points, meta) builds the caller's payload; its result is cached
+        per `view` until the series changes and is shared between callers, so
+        don't mutate it. Without render the cached point list is returned.
+        """
+        waited = False
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                now = self._clock()
+                if entry is not None and entry.expires > now:
+                    self._entries.move_to_end(key)
+                    if not waited:
+                        self.counters['hits'] += 1
+                    snap = (entry, entry.version)
+                    break
+                slot = self._inflight.get(key)
+                leader = slot is None
+                if leader:
+                    slot = self._inflight[key] = _Inflight()
+                    self.counters['misses'] += 1
+                    since = _ts(entry.points[-1]) if entry is not None and entry.points else None
+                    prev = entry
+                else:
+                    self.counters['coalesced'] += 1
+            if not leader:
+                slot.event.wait()
+                if slot.error is not None:
+                    raise slot.error
+                waited = True
+                continue   # leader stored it — read it under the lock
+            try:
+                entry = self._refresh(key, timeframe, fetch, since, prev)
+                snap = (entry, entry.version)
+            except Exception as e:
+                slot.error = e
+                with self._lock:
+                    self.counters['errors'] += 1
+                raise
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                slot.event.set()
+            break
+        return self._render(snap[0], snap[1], render, view)
+
+    def _refresh(self, key, timeframe, fetch, since, prev):
+        points, meta = fetch(since)
+        merged_into = prev
+        if since is not None and prev is not None and meta != prev.meta:
+            # columns changed (guest added / removed) → rows don't line up
+            with self._lock:
+                self.counters['resets'] += 1
+            points, meta = fetch(None)
+            merged_into = None
+        entry = _Entry()
+        if merged_into is not None:
+            entry.span = merged_into.span
+            entry.points = merge_points(merged_into.points, points, entry.span)
+            entry.version = merged_into.version + 1
+        else:
+            entry.points = merge_points((), points)
+            if len(entry.points) > 1:
+                entry.span = _ts(entry.points[-1]) - _ts(entry.points[0])
+            entry.version = (prev.version + 1) if prev is not None else 1
+        entry.meta = meta
+        entry.cells = len(entry.points) * (_width(entry.points[-1]) if entry.points else 1)
+        with self._lock:
+            if merged_into is not None:
+                self.counters['merged'] += 1
+            entry.expires = self.expiry(timeframe, self._clock())
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._cells -= old.cells
+            self._entries[key] = entry
+            self._cells += entry.cells
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries
+                                              or self._cells > self.max_cells):
+                _, evicted = self._entries.popitem(last=False)
+                self._cells -= evicted.cells
+                self.counters['evictions'] += 1
+        return entry
+
+    def _render(self, entry, version, render, view):
+        if render is None:
+            return entry.points
+        with self._lock:
+            hit = entry.views.get(view)
+            if hit is not None and hit[0] == version:
+                self.counters['render_hits'] += 1
+                return hit[1]
+        out = render(entry.points, entry.meta)
+        with self._lock:
+            self.counters['renders'] += 1
+            if entry.version == version:
+                entry.views[view] = (version, out)
+        return out
+
+    def invalidate(self, prefix):
+        """Drop every key starting with the `prefix` tuple (cluster removed, ...)."""
+        n = len(prefix)
+        with self._lock:
+            for key in [k for k in self._entries if k[:n] == prefix]:
+                self._cells -= self._entries.pop(key).cells
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.counters)
+            out['entries'] = len(self._entries)
+            out['cells'] = self._cells
+            out['inflight'] = len(self._inflight)
+        lookups = out['hits'] + out['misses'] + out['coalesced']
+        out['hit_ratio'] = round((out['hits'] + out['coalesced']) / lookups, 3) if lookups else 0.0
+        return out
+
+
+_cache = RrdCache()
+
+
+def cached_series(key, timeframe, fetch, render=None, view=None):
+    """get() on the process-wide cache — see RrdCache.get."""
+    return _cache.get(key, timeframe, fetch, render, view)
+
+
+def invalidate(prefix):
+    _cache.invalidate(prefix)
+
+
+def stats():
+    return _cache.stats()
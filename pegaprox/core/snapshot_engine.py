@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+PegaProx snapshot batch engine - Layer 5
+Runs the snapshot + retention work of one policy run across many guests.
+
+_execute_policy used to walk its targets one VM at a time: create, block on
+the task, list the VM's snapshots, delete the expired ones one after another.
+With a few hundred guests a run took hours while every node but one sat idle.
+The engine keeps the per-VM order (the guest is locked while a snapshot task
+runs, so create → list → delete, delete … stays sequential per VM) but runs
+VMs side by side:
+
+  - at most NODE_PARALLEL guests per node are in flight at once,
+  - guests on file-based storage (qcow2 on NFS / CIFS / dir, …) also take a
+    slot of that storage, NARROW_PARALLEL wide — a shared storage counts once
+    for the whole cluster. Copy-on-write storages (ZFS, RBD, LVM-thin, btrfs)
+    only count against the node,
+  - task UPIDs are polled in one loop instead of a blocking wait per task, so
+    a finished delete starts the VM's next one on the following poll,
+  - each guest's snapshot list is read once, right after its create finished.
+
+Storage types come from one storage listing per node; a guest's config is only
+read when its node mixes the two kinds.
+"""
+
+import os
+import re
+import time
+import logging
+from datetime import datetime, timedelta
+
+# NS Oct 2026 — concurrency per node / per narrow storage, task polling
+NODE_PARALLEL = int(os.environ.get('PEGAPROX_SNAPSHOT_NODE_PARALLEL', 4))
+NARROW_PARALLEL = int(os.environ.get('PEGAPROX_SNAPSHOT_STORAGE_PARALLEL', 1))
+WIDE_STORAGE_TYPES = frozenset({'zfspool', 'zfs', 'rbd', 'lvmthin', 'btrfs'})
+POLL_INTERVAL = 2.0
+CREATE_TIMEOUT = 600
+DELETE_TIMEOUT = 300
+
+_DISK_KEY = re.compile(r'^(ide|sata|scsi|virtio|mp)\d+$|^(efidisk0|tpmstate0|rootfs)$')
+
+
+def select_expired(snaps, prefix, retention_count=0, retention_days=0, now=None):
+    """Names of the snapshots owned by `prefix` that fall outside retention,
+    oldest first. retention_count keeps the newest N, retention_days keeps
+    anything younger than N days."""
+    owned = sorted(((s.get('snaptime', 0) or 0, s.get('name') or '') for s in snaps or ()
+                    if (s.get('name') or '').startswith(prefix)), reverse=True)   # newest first
+    keep = {name for _, name in owned[:retention_count]} if retention_count > 0 else set()
+    cutoff = 0
+    if retention_days > 0:
+        cutoff = ((now or datetime.now()) - timedelta(days=retention_days)).timestamp()
+    return [name for snap_t, name in reversed(owned)
+            if name not in keep and not (cutoff and snap_t >= cutoff)]
+
+
+def disk_storages(config):
+    """Storage ids a guest's disks live on (CD-ROMs and passthrough skipped)."""
+    out = set()
+    for key, value in (config or {}).items():
+        if not _DISK_KEY.match(key) or not isinstance(value, str):
+            continue
+        if 'media=cdrom' in value or ':' not in value.split(',', 1)[0]:
+            continue
+        out.add(value.split(':', 1)[0])
+    return out
+
+
+class _Guest:
+    __slots__ = ('node', 'vmid', 'vm_type', 'slots', 'state', 'upid', 'since', 'snap',
+                 'deletes', 'pruned')
+
+    def __init__(self, node, vmid, vm_type):
+        self.node, self.vmid, self.vm_type = node, vmid, vm_type
+        self.slots = None           # storage slot keys, resolved on first admission try
+        self.state = 'pending'
+        self.upid = None
+        self.since = 0.0
+        self.snap = None
+        self.deletes = []
+        self.pruned = 0
+
+    @property
+    def label(self):
+        return f"{self.vm_type}/{self.vmid}@{self.node}"
+
+
+class SnapshotBatch:
+    """One policy run's worth of snapshot / prune work.
+
+    snap_name() names each new snapshot; pass None for a prune-only run.
+    Per-guest results go to `log` as lines, totals come back from run().
+    """
+
+    def __init__(self, mgr, targets, prefix, retention_count=0, retention_days=0,
+                 snap_name=None, description='', vmstate=False, log=None,
+                 node_parallel=NODE_PARALLEL, narrow_parallel=NARROW_PARALLEL,
+                 poll_interval=POLL_INTERVAL, clock=time.monotonic, sleep=time.sleep):
+        self.mgr = mgr
+        self.prefix = prefix
+        self.retention_count = retention_count
+        self.retention_days = retention_days
+        self.snap_name = snap_name
+        self.description = description
+        self.vmstate = vmstate
+        self.log = log if log is not None else []
+        self.node_parallel = max(1, int(node_parallel))
+        self.narrow_parallel = max(1, int(narrow_parallel))
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._sleep = sleep
+        self._pending = {}          # node → [guest] in target order
+        for node, vmid, vm_type in targets:
+            self._pending.setdefault(node, []).append(_Guest(node, vmid, vm_type))
+        self._inflight = []
+        self._node_busy = {}
+        self._slot_busy = {}
+        self._storages = {}         # node → {storage id: slot key or None (wide)}
+        self.stats = {'created': 0, 'failed': 0, 'pruned': 0, 'prune_failed': 0,
+                      'peak_parallel': 0, 'api_calls': 0, 'duration': 0.0}
+
+    # ── storage classification ──
+
+    def _node_storages(self, node):
+        if node not in self._storages:
+            storages = {}
+            try:
+                self.stats['api_calls'] += 1
+                for st in self.mgr.get_storage_list(node) or []:
+                    sid = st.get('storage')
+                    content = st.get('content')
+                    if not sid or (content and 'images' not in content and 'rootdir' not in content):
+                        continue    # ISO / backup-only storages hold no guest disks
+                    if (st.get('type') or '') in WIDE_STORAGE_TYPES:
+                        storages[sid] = None
+                    else:
+                        storages[sid] = ('storage', sid) if st.get('shared') else ('storage', node, sid)
+            except Exception as e:
+                logging.debug(f"[snap-engine] storage list for {node} failed: {e}")
+            self._storages[node] = storages
+        return self._storages[node]
+
+    def _slots_for(self, g):
+        storages = self._node_storages(g.node)
+        narrow = {k for k in storages.values() if k is not None}
+        if not narrow:
+            return []               # nothing file-based on this node — only the node cap applies
+        if len(narrow) == 1 and all(v is not None for v in storages.values()):
+            return list(narrow)     # one narrow storage and nothing else — no need to ask
+        try:
+            self.stats['api_calls'] += 1
+            url = f"https://{self.mgr.host}:{self.mgr.api_port}/api2/json/nodes/{g.node}/{g.vm_type}/{g.vmid}/config"
+            resp = self.mgr._api_get(url)
+            config = {}
+            if resp is not None and resp.status_code == 200:
+                config = resp.json().get('data') or {}
+        except Exception:
+            config = {}
+        return sorted({storages[s] for s in disk_storages(config) if storages.get(s) is not None})
+
+    # ── run loop ──
+
+    def run(self):
+        started = self._clock()
+        while self._pending or self._inflight:
+            progressed = self._admit()
+            progressed = self._poll() or progressed
+            if not progressed and self._inflight:
+                self._sleep(self.poll_interval)
+            elif not progressed and not self._inflight:
+                break               # nothing in flight and nothing admissible: shouldn't happen
+        self.stats['duration'] = round(self._clock() - started, 3)
+        return self.stats
+
+    def _admit(self):
+        started = False
+        for node in list(self._pending):
+            queue = self._pending[node]
+            i = 0
+            while i < len(queue) and self._node_busy.get(node, 0) < self.node_parallel:
+                g = queue[i]
+                if g.slots is None:
+                    g.slots = self._slots_for(g)
+                if any(self._slot_busy.get(k, 0) >= self.narrow_parallel for k in g.slots):
+                    i += 1          # its storage is busy — let guests on other storages pass
+                    continue
+                queue.pop(i)
+                self._acquire(g)
+                self._start(g)
+                started = True
+            if not queue:
+                del self._pending[node]
+        return started
+
+    def _acquire(self, g):
+        self._node_busy[g.node] = self._node_busy.get(g.node, 0) + 1
+        for k in g.slots:
+            self._slot_busy[k] = self._slot_busy.get(k, 0) + 1
+        self._inflight.append(g)
+        self.stats['peak_parallel'] = max(self.stats['peak_parallel'], len(self._inflight))
+
+    def _release(self, g):
+        g.state = 'done'
+        self._node_busy[g.node] -= 1
+        for k in g.slots:
+            self._slot_busy[k] -= 1
+        self._inflight.remove(g)
+
+    def _start(self, g):
+        if self.snap_name is None:
+            self._list_and_prune(g)
+            return
+        g.snap = self.snap_name()
+        try:
+            self.stats['api_calls'] += 1
+            res = self.mgr.create_snapshot(g.node, g.vmid, g.vm_type, g.snap, self.description, self.vmstate)
+        except Exception as e:
+            res = {'success': False, 'error': f'exception: {e}'}
+        if not res.get('success'):
+            self.stats['failed'] += 1
+            self.log.append(f"  ✗ {g.label}: {res.get('error', 'unknown')}")
+            self._release(g)
+            return
+        if res.get('task'):
+            g.state, g.upid, g.since = 'creating', res['task'], self._clock()
+        else:
+            self._created(g, True)
+
+    def _created(self, g, ok):
+        if not ok:
+            # only prune after a good create — a locked / failed VM might otherwise
+            # lose snapshots without getting the new one
+            self.stats['failed'] += 1
+            self.log.append(f"  ✗ {g.label}: create task for {g.snap} did not finish OK — check task log")
+            self._release(g)
+            return
+        self.stats['created'] += 1
+        self.log.append(f"  ✓ {g.label} → {g.snap}")
+        self._list_and_prune(g)
+
+    def _list_and_prune(self, g):
+        snaps = []
+        try:
+            self.stats['api_calls'] += 1
+            url = f"https://{self.mgr.host}:{self.mgr.api_port}/api2/json/nodes/{g.node}/{g.vm_type}/{g.vmid}/snapshot"
+            resp = self.mgr._api_get(url)
+            if resp is not None and resp.status_code == 200:
+                snaps = resp.json().get('data') or []
+        except Exception as e:
+            self.log.append(f"    {g.label}: snapshot list failed: {e}")
+        g.deletes = select_expired(snaps, self.prefix, self.retention_count, self.retention_days)
+        self._next_delete(g)
+
+    def _next_delete(self, g):
+        while g.deletes:
+            name = g.deletes.pop(0)
+            try:
+                self.stats['api_calls'] += 1
+                res = self.mgr.delete_snapshot(g.node, g.vmid, g.vm_type, name)
+            except Exception as e:
+                res = {'success': False, 'error': str(e)}
+            if not res.get('success'):
+                self.stats['prune_failed'] += 1
+                logging.warning(f"[snap-sched] prune delete failed for {name}: {res.get('error')}")
+                continue
+            if res.get('task'):
+                g.state, g.upid, g.since = 'deleting', res['task'], self._clock()
+                return
+            g.pruned += 1
+        if g.pruned:
+            self.stats['pruned'] += g.pruned
+            if self.snap_name is None:
+                self.log.append(f"  ⌫ {g.label}: pruned {g.pruned} old snapshot(s)")
+            else:
+                self.log.append(f"    {g.label}: pruned {g.pruned} old snapshot(s)")
+        self._release(g)
+
+    def _poll(self):
+        progressed = False
+        for g in list(self._inflight):
+            if g.state not in ('creating', 'deleting'):
+                continue
+            done = self._task_done(g)
+            timed_out = False
+            if done is None:
+                timeout = CREATE_TIMEOUT if g.state == 'creating' else DELETE_TIMEOUT
+                if self._clock() - g.since < timeout:
+                    continue
+                logging.warning(f"[snap-engine] task {g.upid} timed out after {timeout}s")
+                done, timed_out = False, True
+            progressed = True
+            upid, g.upid = g.upid, None
+            if g.state == 'creating':
+                self._created(g, done)
+            else:
+                if done:
+                    g.pruned += 1
+                else:
+                    self.stats['prune_failed'] += 1
+                    logging.warning(f"[snap-sched] prune task {upid} for {g.label} did not finish OK")
+                if timed_out and g.deletes:
+                    # NS Oct 2026 — the delete may still hold the guest's lock;
+                    # the next one would only fail with "VM is locked". Leave the
+                    # rest for the next run and free the slots now.
+                    self.log.append(f"    {g.label}: delete still running, "
+                                    f"{len(g.deletes)} old snapshot(s) left for the next run")
+                    g.deletes = []
+                self._next_delete(g)
+        return progressed
+
+    def _task_done(self, g):
+        """True / False once the task stopped (OK or not), None while it runs."""
+        try:
+            self.stats['api_calls'] += 1
+            url = f"https://{self.mgr.host}:{self.mgr.api_port}/api2/json/nodes/{g.node}/tasks/{g.upid}/status"
+            resp = self.mgr._api_get(url)
+            if resp is None or resp.status_code != 200:
+                return None
+            data = resp.json().get('data') or {}
+        except Exception:
+            return None
+        if data.get('status') != 'stopped':
+            return None
+        # #184: WARNINGS = task succeeded with non-fatal warnings
+        return data.get('exitstatus', '') in ('OK', 'WARNINGS')
@@ -0,0 +1,680 @@
+# -*- coding: utf-8 -*-
+"""
+PegaProx Metrics Time-Series Store - Layer 2
+Columnar per-series storage for the 5-min metrics collector.
+
+NS Oct 2026 — metrics_history stored one multi-MB JSON blob per snapshot with
+every cluster, node and VM in it. Every Insights / Cost / Power request had to
+decrypt + json.loads the whole window (all clusters) just to filter down to one
+cluster — the single biggest CPU cost on big hubs (30 clusters / 10k VMs).
+
+Layout now: one row per (cluster_id, chunk_start, entity, metric) in
+`metrics_series`, holding a fixed CHUNK_SECONDS window of samples as two
+compact arrays:
+  ts_data  — uint32 deltas (first one relative to chunk_start, then to the
+             previous sample), little-endian
+  val_data — 1 typecode byte ('f' float32 / 'd' float64) + the value array,
+             little-endian; NaN = "no value" (stopped VM, no temp sensor …)
+Entities: 'cluster', 'node/<name>', 'vm/<vmid>', 'storage/<sid>'. Static
+per-entity attributes (cluster name, guest type) live in metrics_series_meta.
+
+A right-sizing query for one cluster is a single PK range scan over that
+cluster's chunks — other clusters are never read or decrypted. Appends read
+the current head chunk back inside the write transaction (stateless, so a
+restart or the force-snapshot endpoint can't desync an in-memory buffer).
+"""
+
+import os
+import sys
+import json
+import math
+import logging
+import itertools
+from array import array
+from datetime import datetime
+
+CHUNK_SECONDS = 6 * 3600  # 72 samples per chunk at the 5-min cadence
+
+# byte quantities need float64 — float32's 24-bit mantissa rounds TB-sized
+# storage/memory values. Everything else (percentages, core counts, guest
+# counts) is float32.
+_FLOAT64_METRICS = frozenset({'maxmem', 'mem_used', 'mem_total', 'used', 'total'})
+
+_TOTALS_KEYS = ('vms_running', 'vms_stopped', 'cts_running', 'cts_stopped',
+                'cpu_used', 'cpu_total', 'mem_used', 'mem_total')
+_NODE_KEYS = ('cpu', 'mem_percent', 'maxcpu', 'maxmem', 'temp')
+# 'r' (running) is not stored: the collector only records cpu for running
+# guests, so running == cpu is not NaN.
+_VM_KEYS = ('cpu', 'mem', 'maxcpu', 'maxmem')
+_STORAGE_KEYS = ('used', 'total')
+
+_NAN = float('nan')
+
+
+def chunk_start_for(ts_unix):
+    return int(ts_unix) - int(ts_unix) % CHUNK_SECONDS
+
+
+def _typecode(metric):
+    return 'd' if metric in _FLOAT64_METRICS else 'f'
+
+
+def _pack_ts(chunk_start, timestamps):
+    deltas = array('I')
+    prev = chunk_start
+    for ts in timestamps:
+        deltas.append(int(ts) - prev)
+        prev = int(ts)
+    if sys.byteorder == 'big':
+        deltas.byteswap()
+    return deltas.tobytes()
+
+
+def _unpack_ts(chunk_start, ts_data):
+    deltas = array('I')
+    deltas.frombytes(bytes(ts_data or b''))
+    if sys.byteorder == 'big':
+        deltas.byteswap()
+    return list(itertools.accumulate(deltas, initial=chunk_start))[1:]
+
+
+def _pack_vals(values, typecode='f'):
+    vals = array(typecode, (_NAN if v is None else v for v in values))
+    if sys.byteorder == 'big':
+        vals.byteswap()
+    return typecode.encode('ascii') + vals.tobytes()
+
+
+def _unpack_vals(val_data):
+    raw = bytes(val_data or b'')
+    vals = array(raw[:1].decode('ascii') if raw else 'f')
+    vals.frombytes(raw[1:])
+    if sys.byteorder == 'big':
+        vals.byteswap()
+    return vals.tolist()
+
+
+def encode_chunk(chunk_start, timestamps, values, typecode='f'):
+    """(chunk_start, [ts...], [v...]) → (ts_data, val_data) blobs."""
+    return _pack_ts(chunk_start, timestamps), _pack_vals(values, typecode)
+
+
+def decode_chunk(chunk_start, ts_data, val_data):
+    """Inverse of encode_chunk → ([ts...], [v...]); NaN stays NaN."""
+    timestamps = _unpack_ts(chunk_start, ts_data)
+    vals = _unpack_vals(val_data)
+    n = min(len(timestamps), len(vals))
+    return timestamps[:n], vals[:n]
+
+
+def flatten_cluster(cluster_data):
+    """Collector cluster dict → ({(entity, metric): value}, {entity: attrs})."""
+    points = {}
+    meta = {'cluster': {'name': cluster_data.get('name') or ''}}
+    totals = cluster_data.get('totals') or {}
+    for k in _TOTALS_KEYS:
+        if k in totals:
+            points[('cluster', k)] = totals.get(k)
+    for name, nd in (cluster_data.get('nodes') or {}).items():
+        ent = f'node/{name}'
+        for k in _NODE_KEYS:
+            if k in nd:
+                points[(ent, k)] = nd.get(k)
+    for vmid, vd in (cluster_data.get('vms') or {}).items():
+        ent = f'vm/{vmid}'
+        for k in _VM_KEYS:
+            points[(ent, k)] = vd.get(k)
+        # cpu doubles as the running flag: NaN <=> stopped
+        points[(ent, 'cpu')] = (vd.get('cpu') or 0.0) if vd.get('r') else None
+        meta[ent] = {'t': vd.get('t', 'qemu')}
+    for sid, sd in (cluster_data.get('storage') or {}).items():
+        ent = f'storage/{sid}'
+        for k in _STORAGE_KEYS:
+            points[(ent, k)] = sd.get(k)
+    return points, meta
+
+
+def _num(v):
+    if v is None:
+        return None
+    try:
+        f = float(v)
+    except (TypeError, ValueError):
+        return None
+    return None if f != f else f
+
+
+def append_points(conn, cluster_id, samples, meta=None):
+    """Append samples to the store on an open connection (caller commits).
+
+    samples — list of (ts_unix, {(entity, metric): value}).
+    Points are merged by timestamp and an already-stored timestamp keeps its
+    value, so a replayed backfill batch is idempotent and a backfill that lands
+    in a chunk the live collector already started interleaves correctly.
+    """
+    by_chunk = {}
+    for ts, points in samples:
+        cs = chunk_start_for(ts)
+        bucket = by_chunk.setdefault(cs, {})
+        for key, val in points.items():
+            bucket.setdefault(key, []).append((int(ts), _num(val)))
+
+    cur = conn.cursor()
+    for cs, series in by_chunk.items():
+        existing = {}
+        cur.execute(
+            "SELECT entity, metric, ts_data, val_data FROM metrics_series "
+            "WHERE cluster_id = ? AND chunk_start = ?", (cluster_id, cs))
+        for row in cur.fetchall():
+            existing[(row[0], row[1])] = decode_chunk(cs, row[2], row[3])
+        rows = []
+        for (entity, metric), pts in series.items():
+            ts_list, vals = existing.get((entity, metric), ([], []))
+            if ts_list and all(ts > ts_list[-1] for ts, _ in pts) and \
+                    all(a[0] < b[0] for a, b in zip(pts, pts[1:])):
+                ts_list = ts_list + [ts for ts, _ in pts]   # common case: plain append
+                vals = vals + [v for _, v in pts]
+            else:
+                merged = dict(pts)
+                merged.update(zip(ts_list, vals))
+                if len(merged) == len(ts_list):
+                    continue  # nothing new
+                ts_list = sorted(merged)
+                vals = [merged[t] for t in ts_list]
+            ts_data, val_data = encode_chunk(cs, ts_list, vals, _typecode(metric))
+            rows.append((cluster_id, cs, entity, metric, ts_data, val_data, len(ts_list)))
+        if rows:
+            cur.executemany(
+                "INSERT OR REPLACE INTO metrics_series "
+                "(cluster_id, chunk_start, entity, metric, ts_data, val_data, samples) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    if meta:
+        now = datetime.now().isoformat()
+        cur.executemany(
+            "INSERT INTO metrics_series_meta (cluster_id, entity, attrs, updated_at) "
+            "VALUES (?, ?, ?, ?) ON CONFLICT(cluster_id, entity) DO UPDATE SET "
+            "attrs = excluded.attrs, updated_at = excluded.updated_at "
+            "WHERE attrs != excluded.attrs",
+            [(cluster_id, ent, json.dumps(a, sort_keys=True), now) for ent, a in meta.items()])
+
+
+def prune(conn, before_ts):
+    """Drop every chunk that ends before `before_ts` (per cluster → PK range)."""
+    cur = conn.cursor()
+    cs = chunk_start_for(before_ts) - CHUNK_SECONDS
+    cur.execute("SELECT DISTINCT cluster_id FROM metrics_series_meta")
+    for (cid,) in [tuple(r) for r in cur.fetchall()]:
+        cur.execute("DELETE FROM metrics_series WHERE cluster_id = ? AND chunk_start <= ?", (cid, cs))
+
+
+def append_snapshot(snapshot, retention_days=None):
+    """Persist one collector snapshot (all clusters) off-hub in one transaction."""
+    from pegaprox.core.dbcrypto import run_heavy_txn
+    ts_iso = snapshot.get('timestamp') or datetime.now().isoformat()
+    ts_unix = int(datetime.fromisoformat(ts_iso).timestamp())
+    clusters = snapshot.get('clusters') or {}
+
+    def _work(conn):
+        for cid, cd in clusters.items():
+            points, meta = flatten_cluster(cd)
+            append_points(conn, cid, [(ts_unix, points)], meta)
+            maintain_rollups(conn, cid, ts_unix)
+        if retention_days:
+            prune(conn, ts_unix - int(retention_days) * 86400)
+        prune_rollups(conn, ts_unix)
+        return len(clusters)
+
+    return run_heavy_txn(_work)
+
+
+# ─── Rollup tiers (5m raw → 1h → 1d) ─────────────────────────────────────────
+# NS Oct 2026 — long-term charts used to load every raw sample in the window
+# and average in Python per request (365d = ~105k samples per series), and the
+# stride decimation dropped peaks. The collector now maintains pre-aggregated
+# buckets incrementally: each completed 1h / 1d bucket stores min, max, avg,
+# p95 and sample count per series, computed from the raw samples (so the 1d
+# p95 is exact, not a p95-of-p95s). Same chunked columnar layout as the raw
+# tier, one value array per statistic. Rollups have their own retention
+# (PEGAPROX_METRICS_ROLLUP_RETENTION_DAYS, default 365) so a year of hourly
+# history costs ~8.8k points per series regardless of the raw retention.
+
+# tier -> (bucket seconds, chunk seconds)
+ROLLUP_TIERS = {
+    '1h': (3600, 7 * 86400),
+    '1d': (86400, 180 * 86400),
+}
+ROLLUP_STATS = ('min', 'max', 'avg', 'p95')
+_ROLLUP_WATERMARK = '~rollup'       # metrics_series_meta entity holding per-tier progress
+_ROLLUP_MAX_BUCKETS = 24 * 7        # per call: catch up a backfill in bounded txns
+
+
+def rollup_retention_days():
+    raw = os.environ.get('PEGAPROX_METRICS_ROLLUP_RETENTION_DAYS', '365').strip()
+    try:
+        days = int(raw)
+    except (TypeError, ValueError):
+        days = 365
+    return max(30, min(days, 1825))
+
+
+def pick_tier(step, days, raw_days):
+    """Coarsest tier whose bucket still fits inside `step` seconds. Windows
+    older than the raw retention fall back to 1h even when step is 0."""
+    if step >= ROLLUP_TIERS['1d'][0]:
+        return '1d'
+    if step >= ROLLUP_TIERS['1h'][0] or days > raw_days:
+        return '1h'
+    return 'raw'
+
+
+def _percentile(sorted_vals, p):
+    k = (len(sorted_vals) - 1) * p / 100
+    f, c = math.floor(k), math.ceil(k)
+    if f == c:
+        return sorted_vals[int(k)]
+    return sorted_vals[f] * (c - k) + sorted_vals[c] * (k - f)
+
+
+def summarize(values):
+    """Non-NaN values of one bucket → (min, max, avg, p95, count) or None."""
+    vs = sorted(v for v in values if v is not None and v == v)
+    if not vs:
+        return None
+    return vs[0], vs[-1], sum(vs) / len(vs), _percentile(vs, 95), len(vs)
+
+
+def merge_buckets(stats):
+    """Combine (min, max, avg, p95, count) buckets into one coarser bucket.
+    p95 becomes the max of the inputs' p95 — conservative, never hides a peak."""
+    stats = [s for s in stats if s and s[4]]
+    if not stats:
+        return None
+    n = sum(s[4] for s in stats)
+    return (min(s[0] for s in stats), max(s[1] for s in stats),
+            sum(s[2] * s[4] for s in stats) / n, max(s[3] for s in stats), n)
+
+
+def _encode_rollup(chunk_start, buckets, typecode):
+    """{bucket_ts: (min, max, avg, p95, count)} → column blobs."""
+    ts_list = sorted(buckets)
+    cols = [_pack_vals([buckets[t][i] for t in ts_list], typecode) for i in range(4)]
+    counts = array('I', (int(buckets[t][4]) for t in ts_list))
+    if sys.byteorder == 'big':
+        counts.byteswap()
+    return (_pack_ts(chunk_start, ts_list), *cols, counts.tobytes(), len(ts_list))
+
+
+def _decode_rollup(chunk_start, row):
+    """(ts_data, min, max, avg, p95, count) blobs → {bucket_ts: stats}."""
+    ts_list = _unpack_ts(chunk_start, row[0])
+    cols = [_unpack_vals(row[i]) for i in range(1, 5)]
+    counts = array('I')
+    counts.frombytes(bytes(row[5] or b''))
+    if sys.byteorder == 'big':
+        counts.byteswap()
+    return {t: (cols[0][i], cols[1][i], cols[2][i], cols[3][i], counts[i])
+            for i, t in enumerate(ts_list) if i < len(counts)}
+
+
+def _rollup_watermarks(cur, cluster_id):
+    cur.execute("SELECT attrs FROM metrics_series_meta WHERE cluster_id = ? AND entity = ?",
+                (cluster_id, _ROLLUP_WATERMARK))
+    row = cur.fetchone()
+    try:
+        return json.loads(row[0]) if row else {}
+    except Exception:
+        return {}
+
+
+def maintain_rollups(conn, cluster_id, now_ts):
+    """Roll every completed bucket since the tier's watermark (bounded per call).
+    Runs inside the collector's write txn, right after the raw append."""
+    cur = conn.cursor()
+    marks = _rollup_watermarks(cur, cluster_id)
+    changed = False
+    for tier, (bucket, chunk) in ROLLUP_TIERS.items():
+        end = int(now_ts) - int(now_ts) % bucket      # buckets before `end` are complete
+        start = marks.get(tier)
+        if start is None:
+            cur.execute("SELECT MIN(chunk_start) FROM metrics_series WHERE cluster_id = ?", (cluster_id,))
+            first = cur.fetchone()[0]
+            if first is None:
+                continue
+            start = int(first) - int(first) % bucket
+        start = int(start)
+        if start >= end:
+            continue
+        end = min(end, start + bucket * _ROLLUP_MAX_BUCKETS)
+
+        cur.execute("SELECT entity, metric, chunk_start, ts_data, val_data FROM metrics_series "
+                    "WHERE cluster_id = ? AND chunk_start >= ? AND chunk_start < ?",
+                    (cluster_id, chunk_start_for(start), end))
+        series = decode_rows(cur.fetchall(), start)
+
+        by_chunk = {}   # rollup chunk_start -> {(entity, metric): {bucket_ts: stats}}
+        for entity, metrics in series.items():
+            for metric, (ts_list, vals) in metrics.items():
+                per_bucket = {}
+                for ts, v in zip(ts_list, vals):
+                    if ts < end:
+                        per_bucket.setdefault(ts - ts % bucket, []).append(v)
+                for b_ts, bvals in per_bucket.items():
+                    st = summarize(bvals)
+                    if st is None:
+                        continue
+                    cs = b_ts - b_ts % chunk
+                    by_chunk.setdefault(cs, {}).setdefault((entity, metric), {})[b_ts] = st
+
+        for cs, per_series in by_chunk.items():
+            cur.execute("SELECT entity, metric, ts_data, min_data, max_data, avg_data, p95_data, cnt_data "
+                        "FROM metrics_rollup WHERE cluster_id = ? AND tier = ? AND chunk_start = ?",
+                        (cluster_id, tier, cs))
+            existing = {(r[0], r[1]): _decode_rollup(cs, r[2:]) for r in cur.fetchall()}
+            rows = []
+            for (entity, metric), buckets in per_series.items():
+                merged = existing.get((entity, metric), {})
+                merged.update(buckets)
+                rows.append((cluster_id, tier, cs, entity, metric,
+                             *_encode_rollup(cs, merged, _typecode(metric))))
+            cur.executemany(
+                "INSERT OR REPLACE INTO metrics_rollup (cluster_id, tier, chunk_start, entity, metric, "
+                "ts_data, min_data, max_data, avg_data, p95_data, cnt_data, buckets) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        marks[tier] = end
+        changed = True
+    if changed:
+        cur.execute(
+            "INSERT INTO metrics_series_meta (cluster_id, entity, attrs, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(cluster_id, entity) DO UPDATE SET attrs = excluded.attrs, updated_at = excluded.updated_at",
+            (cluster_id, _ROLLUP_WATERMARK, json.dumps(marks), datetime.now().isoformat()))
+
+
+def prune_rollups(conn, now_ts):
+    cur = conn.cursor()
+    before = int(now_ts) - rollup_retention_days() * 86400
+    cur.execute("SELECT DISTINCT cluster_id FROM metrics_series_meta")
+    for (cid,) in [tuple(r) for r in cur.fetchall()]:
+        for tier, (_bucket, chunk) in ROLLUP_TIERS.items():
+            cur.execute("DELETE FROM metrics_rollup WHERE cluster_id = ? AND tier = ? AND chunk_start <= ?",
+                        (cid, tier, before - before % chunk - chunk))
+
+
+def decode_rollup_rows(rows, since_ts):
+    """Rows of (entity, metric, chunk_start, ts, min, max, avg, p95, cnt) →
+    {entity: {metric: {bucket_ts: (min, max, avg, p95, count)}}}."""
+    out = {}
+    for r in rows:
+        buckets = _decode_rollup(r[2], r[3:])
+        slot = out.setdefault(r[0], {}).setdefault(r[1], {})
+        for b_ts, st in buckets.items():
+            if b_ts >= since_ts:
+                slot[b_ts] = st
+    return out
+
+
+def load_rollup(cluster_id, tier, days, entity=None, prefix=None):
+    """Pre-aggregated buckets for one cluster + tier (off-hub, cached)."""
+    from pegaprox.core.dbcrypto import run_heavy_read
+    bucket, chunk = ROLLUP_TIERS[tier]
+    since = _since(days)
+    since -= since % bucket
+    sql = ("SELECT entity, metric, chunk_start, ts_data, min_data, max_data, avg_data, p95_data, cnt_data "
+           "FROM metrics_rollup WHERE cluster_id = ? AND tier = ? AND chunk_start >= ?")
+    params = [cluster_id, tier, since - since % chunk]
+    if entity:
+        sql += " AND entity = ?"
+        params.append(entity)
+    elif prefix:
+        lo, hi = _entity_range(prefix)
+        sql += " AND entity >= ? AND entity < ?"
+        params += [lo, hi]
+    return run_heavy_read(sql, tuple(params),
+                          cache_key=f"tsroll:{cluster_id}:{tier}:{days}:{entity or ''}:{prefix or ''}",
+                          transform=lambda rows: decode_rollup_rows(rows, since))
+
+
+# ─── Reads ───────────────────────────────────────────────────────────────────
+
+def _entity_range(prefix):
+    # 'vm/' .. 'vm0' — '0' is the byte right after '/', so this is a PK range
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def decode_rows(rows, since_ts):
+    """Rows of (entity, metric, chunk_start, ts_data, val_data) →
+    {entity: {metric: ([ts...], [v...])}} trimmed to ts >= since_ts."""
+    out = {}
+    for row in rows:
+        entity, metric, cs = row[0], row[1], row[2]
+        ts_list, vals = decode_chunk(cs, row[3], row[4])
+        if ts_list and ts_list[0] < since_ts:
+            keep = [i for i, t in enumerate(ts_list) if t >= since_ts]
+            ts_list = [ts_list[i] for i in keep]
+            vals = [vals[i] for i in keep]
+        if not ts_list:
+            continue
+        slot = out.setdefault(entity, {}).setdefault(metric, ([], []))
+        slot[0].extend(ts_list)
+        slot[1].extend(vals)
+    return out
+
+
+def _series_query(cluster_id, since_ts, entity=None, prefix=None):
+    sql = ("SELECT entity, metric, chunk_start, ts_data, val_data FROM metrics_series "
+           "WHERE cluster_id = ? AND chunk_start >= ?")
+    params = [cluster_id, chunk_start_for(since_ts)]
+    if entity:
+        sql += " AND entity = ?"
+        params.append(entity)
+    elif prefix:
+        lo, hi = _entity_range(prefix)
+        sql += " AND entity >= ? AND entity < ?"
+        params += [lo, hi]
+    return sql + " ORDER BY entity, metric, chunk_start", tuple(params)
+
+
+def _since(days):
+    return int(datetime.now().timestamp() - float(days) * 86400)
+
+
+def load_series(cluster_id, days, entity=None, prefix=None, cache=True):
+    """Raw per-series arrays for one cluster: {entity: {metric: (ts, vals)}}.
+
+    Fetch + decode run off-hub (run_heavy_read). Cached for the heavy-read TTL
+    under a per-cluster key, so concurrent viewers of one cluster coalesce and
+    other clusters never pay for it."""
+    from pegaprox.core.dbcrypto import run_heavy_read
+    since = _since(days)
+    sql, params = _series_query(cluster_id, since, entity, prefix)
+    key = f"ts:{cluster_id}:{days}:{entity or ''}:{prefix or ''}" if cache else None
+    return run_heavy_read(sql, params, cache_key=key, transform=lambda rows: decode_rows(rows, since))
+
+
+def load_meta(cluster_id):
+    from pegaprox.core.dbcrypto import run_heavy_read
+
+    def _parse(rows):
+        out = {}
+        for r in rows:
+            try:
+                out[r['entity']] = json.loads(r['attrs'] or '{}')
+            except Exception:
+                out[r['entity']] = {}
+        return out
+    return run_heavy_read("SELECT entity, attrs FROM metrics_series_meta WHERE cluster_id = ?",
+                          (cluster_id,), cache_key=f"tsmeta:{cluster_id}", transform=_parse)
+
+
+def _clean(v, nd=None):
+    if v is None or v != v:
+        return None
+    if nd is None:
+        return v
+    return round(v, nd)
+
+
+def rebuild_snapshots(series, meta, stride=1):
+    """{entity: {metric: (ts, vals)}} → [(ts_unix, cluster_data)] in the legacy
+    collector snapshot shape, oldest first. `stride` keeps every Nth timestamp
+    (long windows are ratio/percentile based, so resolution is all we lose)."""
+    all_ts = set()
+    for metrics in series.values():
+        for ts_list, _ in metrics.values():
+            all_ts.update(ts_list)
+    keep = sorted(all_ts)[::max(1, int(stride))]
+    if not keep:
+        return []
+    keep_set = set(keep)
+    name = (meta.get('cluster') or {}).get('name', '')
+    snaps = {ts: {'name': name, 'nodes': {}, 'totals': {}, 'vms': {}, 'storage': {}} for ts in keep}
+
+    for entity, metrics in series.items():
+        kind, _, ident = entity.partition('/')
+        for metric, (ts_list, vals) in metrics.items():
+            for ts, v in zip(ts_list, vals):
+                if ts not in keep_set:
+                    continue
+                cd = snaps[ts]
+                if kind == 'cluster':
+                    v = _clean(v)
+                    if v is not None:
+                        cd['totals'][metric] = round(v, 4) if metric == 'cpu_used' else int(v)
+                elif kind == 'node':
+                    v = _clean(v)
+                    if v is None:
+                        continue
+                    nd = cd['nodes'].setdefault(ident, {})
+                    nd[metric] = int(v) if metric in ('maxcpu', 'maxmem') else round(v, 1)
+                elif kind == 'vm':
+                    vd = cd['vms'].get(ident)
+                    if vd is None:
+                        vd = cd['vms'][ident] = {'t': (meta.get(entity) or {}).get('t', 'qemu'),
+                                                 'r': False, 'cpu': None, 'mem': None,
+                                                 'maxmem': 0, 'maxcpu': 0}
+                    v = _clean(v)
+                    if metric in ('maxmem', 'maxcpu'):
+                        vd[metric] = int(v or 0)
+                    else:
+                        vd[metric] = None if v is None else round(v, 1)
+                        if metric == 'cpu':
+                            vd['r'] = v is not None
+                elif kind == 'storage':
+                    v = _clean(v)
+                    if v is None:
+                        continue
+                    sd = cd['storage'].setdefault(ident, {})
+                    sd[metric] = int(v)
+                    if 'used' in sd and 'total' in sd and sd['total'] > 0:
+                        sd['pct'] = round(sd['used'] / sd['total'] * 100, 1)
+    return [(ts, snaps[ts]) for ts in keep]
+
+
+def load_cluster_window(cluster_id, days, stride=1, prefix=None):
+    """One cluster's history in the legacy snapshot shape (see rebuild_snapshots)."""
+    from pegaprox.core.dbcrypto import run_heavy_read
+    meta = load_meta(cluster_id) or {}
+    since = _since(days)
+    sql, params = _series_query(cluster_id, since, prefix=prefix)
+    return run_heavy_read(
+        sql, params, cache_key=f"tswin:{cluster_id}:{days}:{stride}:{prefix or ''}",
+        transform=lambda rows: rebuild_snapshots(decode_rows(rows, since), meta, stride))
+
+
+def load_cluster_totals(days):
+    """Cluster-level series (name + totals) for EVERY cluster, for the report
+    views that compare clusters. Reads only the 'cluster' entity via its index —
+    node / VM / storage chunks are never touched.
+    Returns {cluster_id: [(ts_unix, cluster_data)]}."""
+    from pegaprox.core.dbcrypto import run_heavy_read
+    since = _since(days)
+
+    def _parse(rows):
+        per = {}
+        for r in rows:
+            per.setdefault(r[0], []).append(tuple(r[1:]))
+        return {cid: decode_rows(crow, since) for cid, crow in per.items()}
+
+    series = run_heavy_read(
+        "SELECT cluster_id, entity, metric, chunk_start, ts_data, val_data FROM metrics_series "
+        "WHERE entity = 'cluster' AND chunk_start >= ? ORDER BY cluster_id, metric, chunk_start",
+        (chunk_start_for(since),), cache_key=f"tstotals:{days}", transform=_parse) or {}
+    return {cid: rebuild_snapshots(s, load_meta(cid) or {}) for cid, s in series.items()}
+
+
+# ─── One-time import of the legacy JSON-blob table ──────────────────────────
+
+def backfill_from_legacy(batch=288):
+    """Copy metrics_history blobs into the series store, oldest first, one
+    transaction per batch. Idempotent (append_points skips already-stored
+    timestamps) and resumable via the 'metrics_series_backfill_id' setting."""
+    from pegaprox.core.db import get_db
+    from pegaprox.core.dbcrypto import run_heavy_txn
+    db = get_db()
+    try:
+        last_id = int(db.get_server_setting('metrics_series_backfill_id', 0) or 0)
+    except (TypeError, ValueError):
+        last_id = 0
+    if last_id < 0:
+        return 0
+    copied = 0
+    while True:
+        def _work(conn, after=last_id):
+            cur = conn.cursor()
+            cur.execute("SELECT id, timestamp, data FROM metrics_history WHERE id > ? "
+                        "ORDER BY id ASC LIMIT ?", (after, batch))
+            rows = cur.fetchall()
+            per_cluster = {}
+            for row in rows:
+                try:
+                    ts = int(datetime.fromisoformat(row[1]).timestamp())
+                    blob = json.loads(row[2])
+                except Exception:
+                    continue
+                for cid, cd in (blob.get('clusters') or {}).items():
+                    points, meta = flatten_cluster(cd)
+                    slot = per_cluster.setdefault(cid, ([], {}))
+                    slot[0].append((ts, points))
+                    slot[1].update(meta)
+            for cid, (samples, meta) in per_cluster.items():
+                samples.sort(key=lambda s: s[0])
+                append_points(conn, cid, samples, meta)
+            return (rows[-1][0], len(rows)) if rows else (after, 0)
+        try:
+            last_id, n = run_heavy_txn(_work)
+        except Exception as e:
+            logging.warning(f"[tsdb] legacy backfill stopped at id {last_id}: {e}")
+            return copied
+        if not n:
+            break
+        copied += n
+        db.save_server_setting('metrics_series_backfill_id', last_id)
+    db.save_server_setting('metrics_series_backfill_id', -1)  # done
+    if copied:
+        catch_up_rollups()
+    if copied:
+        logging.info(f"[tsdb] backfilled {copied} legacy metrics snapshots into metrics_series")
+    return copied
+
+
+def catch_up_rollups(max_rounds=400):
+    """Bring every cluster's rollup watermarks up to now, one bounded txn per
+    round — used after the legacy backfill instead of waiting for the 5-min
+    collector to grind through months of history a week at a time."""
+    from pegaprox.core.dbcrypto import run_heavy_txn
+    now_ts = int(datetime.now().timestamp())
+
+    def _round(conn):
+        cur = conn.cursor()
+        cur.execute("SELECT DISTINCT cluster_id FROM metrics_series_meta")
+        pending = False
+        for (cid,) in [tuple(r) for r in cur.fetchall()]:
+            maintain_rollups(conn, cid, now_ts)
+            marks = _rollup_watermarks(cur, cid)
+            if any(t in marks and int(marks[t]) < now_ts - now_ts % b for t, (b, _c) in ROLLUP_TIERS.items()):
+                pending = True
+        return pending
+
+    for _ in range(max_rounds):
+        if not run_heavy_txn(_round):
+            break
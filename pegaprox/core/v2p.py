@@ -19,6 +19,10 @@ from pegaprox.globals import cluster_managers, vmware_managers, _v2p_migrations
 from pegaprox.utils.ssh import _ssh_exec, _pve_node_exec
 from pegaprox.utils.realtime import broadcast_sse
 from pegaprox.utils.audit import log_audit
+from pegaprox.core.v2p_transfer import (
+    DiskTransferScheduler, transfer_limits, update_rate, merge_extents,
+    extents_from_qemu_map, allocated_bytes, worth_sparse, blocks_with_data,
+)
 
 
 class V2PCutoverCancelled(Exception):
@@ -61,6 +65,7 @@ class V2PMigrationTask:
         self.downtime_end = None
         self.total_downtime_seconds = None
         self.log_lines = []
+        self._log_ctx = threading.local()
         # Config
         self.network_bridge = self.config.get('network_bridge', 'vmbr0')
         self.start_after = self.config.get('start_after', True)
@@ -92,6 +97,14 @@ class V2PMigrationTask:
         self.esxi_password = self.config.pop('esxi_password', '')
         self.esxi_datastore = self.config.get('esxi_datastore', '')
         self.esxi_vm_dir = self.config.get('esxi_vm_dir', '')
+        # NS Oct 2026 — disk transfer scheduling: how many disks copy at once (overall,
+        # per source datastore, per target storage) and whether thin-disk holes are
+        # skipped via CBT / qemu-img allocation maps. Clamped in transfer_limits().
+        self.parallel_disks, self.per_datastore_streams, self.per_storage_streams = \
+            transfer_limits(self.config)
+        self.sparse_copy = bool(self.config.get('sparse_copy', True))
+        self._disk_rate = {}
+        self._presync_extents = {}
         # Advanced options
         self.net_driver = self.config.get('net_driver', '')
         self.disk_bus = self.config.get('disk_bus', '')
@@ -162,6 +175,10 @@ class V2PMigrationTask:
 
     def log(self, msg):
         ts = datetime.now().strftime('%H:%M:%S')
+        # parallel disk copies tag their lines ("[disk1] ...") so the feed stays readable
+        prefix = getattr(self._log_ctx, 'prefix', '')
+        if prefix:
+            msg = f"{prefix}{msg}"
         self.log_lines.append(f"[{ts}] {msg}")
         logging.info(f"[V2P:{self.id}] {msg}")
         # Stream log line via SSE (throttled -- batch every 1s)
@@ -233,9 +250,13 @@ class V2PMigrationTask:
         except: pass
     
     def update_progress(self, disk_key, copied, total):
+        # NS Oct 2026 — per-disk throughput + ETA; disks copy in parallel now, so one
+        # overall percentage no longer tells the operator which disk is holding things up
+        rate, eta = update_rate(self._disk_rate.setdefault(disk_key, {}), copied, total)
         self.disk_progress[disk_key] = {
             'copied': copied, 'total': total,
-            'pct': round(copied / total * 100, 1) if total else 0
+            'pct': round(copied / total * 100, 1) if total else 0,
+            'bytes_per_sec': int(rate), 'eta_seconds': eta,
         }
         tc = sum(d['copied'] for d in self.disk_progress.values())
         tt = sum(d['total'] for d in self.disk_progress.values())
@@ -339,6 +360,8 @@ class V2PMigrationTask:
                 'remove_source': self.remove_source,
                 'esxi_host': self.esxi_host,
                 'esxi_datastore': self.esxi_datastore,
+                'parallel_disks': self.parallel_disks,
+                'sparse_copy': self.sparse_copy,
             },
         }
 
@@ -958,14 +981,14 @@ def _run_v2p_migration(task):
             task.set_phase('pre_sync')
             task.log("=== PRE-SYNC: copy base VMDKs while VM keeps running ===")
             presync_volumes = []
+            copies = _run_disk_transfers(pve_mgr, task, esxi_host, esxi_user, esxi_pass,
+                                         datastore, vm_dir, descriptor_files, stop_on_failure=True)
             for i, desc_file in enumerate(descriptor_files):
                 dk = f'disk{i}'
                 disk_size = task.disk_progress[dk]['total']
-                task.log(f"Pre-sync disk {i}: {desc_file} ({disk_size / (1024**3):.1f} GB)")
-                vol_id, vol_path = _ssh_pipe_transfer(
-                    pve_mgr, task, esxi_host, esxi_user, esxi_pass,
-                    datastore, vm_dir, desc_file, i)
+                vol_id, vol_path = copies[i] or (None, None)
                 if not vol_id:
+                    _free_transferred(pve_mgr, task, copies, i)
                     task.set_phase('failed',
                         f'snapshot_zero pre-sync failed for disk {i} ({desc_file}). '
                         f'No fallback — set transfer_mode to "auto" or "offline" if you accept higher downtime.')
@@ -1453,17 +1476,15 @@ def _run_v2p_migration(task):
             else:
                 task.log("VMware VM already off")
             
-            # Copy each disk (VM off = no locks)
+            # Copy the disks (VM off = no locks) — concurrently, attach in index order after
+            copies = _run_disk_transfers(pve_mgr, task, esxi_host, esxi_user, esxi_pass,
+                                         datastore, vm_dir, descriptor_files, stop_on_failure=True)
             for i, desc_file in enumerate(descriptor_files):
                 dk = f'disk{i}'
                 disk_size = task.disk_progress[dk]['total']
-                task.log(f"Copying disk {i}: {desc_file} ({disk_size / (1024**3):.1f} GB)")
-                
-                vol_id, vol_path = _ssh_pipe_transfer(
-                    pve_mgr, task, esxi_host, esxi_user, esxi_pass,
-                    datastore, vm_dir, desc_file, i
-                )
+                vol_id, vol_path = copies[i] or (None, None)
                 if not vol_id:
+                    _free_transferred(pve_mgr, task, copies, i)
                     task.set_phase('failed', f'Disk copy failed for {desc_file}')
                     _cleanup_sshfs(pve_mgr, task.target_node, mnt_path)
                     return
@@ -1557,20 +1578,19 @@ def _run_v2p_migration(task):
         # If VM was offline before we started, treat same as if we'd stopped it: skip delta-sync.
         stopped_for_presync = vm_offline_from_start
         
+        # NS Oct 2026 — all disks pre-sync concurrently (bounded per datastore / storage),
+        # so this phase takes about as long as the largest disk; attach stays in index order
+        copies = _run_disk_transfers(pve_mgr, task, esxi_host, esxi_user, esxi_pass,
+                                     datastore, vm_dir, descriptor_files, stop_on_failure=True)
         for i, desc_file in enumerate(descriptor_files):
             dk = f'disk{i}'
             disk_size = task.disk_progress[dk]['total']
-            
-            task.log(f"Pre-sync disk {i}: {desc_file} ({disk_size / (1024**3):.1f} GB)")
-            
-            vol_id, vol_path = _ssh_pipe_transfer(
-                pve_mgr, task, esxi_host, esxi_user, esxi_pass,
-                datastore, vm_dir, desc_file, i
-            )
+            vol_id, vol_path = copies[i] or (None, None)
             
             # If transfer failed with VM running → use SSHFS-boot strategy
             # Stop VM briefly, boot Proxmox VM from SSHFS, live-move disk in background
             if not vol_id and not stopped_for_presync:
+                _free_transferred(pve_mgr, task, copies, i)
                 task.log("Pre-sync failed (VMDK locked) - switching to QEMU SSH boot")
                 
                 # Stop VMware VM
@@ -1597,6 +1617,7 @@ def _run_v2p_migration(task):
                 return
             
             if not vol_id:
+                _free_transferred(pve_mgr, task, copies, i)
                 task.set_phase('failed', f'Transfer failed for {desc_file}')
                 _cleanup_sshfs(pve_mgr, task.target_node, mnt_path)
                 try: vmware_mgr.delete_migration_snapshot(task.vm_id)
@@ -1800,11 +1821,18 @@ def _run_v2p_migration(task):
             for i, (vol_id, vol_path, esxi_flat, flat_size) in enumerate(presync_volumes):
                 dk = f'disk{i}'
                 task.log(f"Delta sync disk {i}: comparing blocks...")
+                # a sparse pre-sync left holes; blocks still unallocated now are zero on
+                # both sides (needs both maps — a block freed since pre-sync is not)
+                allocated = None
+                if task._presync_extents.get(i) is not None:
+                    now_ext, _src = _disk_allocation_map(pve_mgr, task, vm_dir, descriptor_files[i], i, flat_size)
+                    if now_ext is not None:
+                        allocated = task._presync_extents[i] + now_ext
             
                 ok = _delta_sync_blocks(
                     pve_mgr, task, esxi_host, esxi_user, esxi_pass,
                     esxi_flat, vol_path, flat_size, i,
-                    pve_checksums=presync_checksums.get(i)
+                    pve_checksums=presync_checksums.get(i), allocated=allocated
                 )
                 if not ok:
                     task.log(f"  WARNING: Block delta failed, falling back to full re-download...")
@@ -6055,7 +6083,8 @@ def _do_offline_qemuimg_copy(pve_mgr, task, esxi_host, esxi_user, esxi_pass,
     task.log(f"COMPLETED: {task.vm_name} -> VMID {task.proxmox_vmid} (offline copy)")
 
 
-def _monitor_disk_write(pve_mgr, node, vol_path, disk_size, task, disk_key, stop_evt):
+def _monitor_disk_write(pve_mgr, node, vol_path, disk_size, task, disk_key, stop_evt,
+                        progress_log=None):
     """Poll destination size during dd/qemu-img transfer for live progress updates.
 
     NS Mar 2026 - #132: without this, migration sits at 0% until entire disk finishes.
@@ -6072,6 +6101,10 @@ def _monitor_disk_write(pve_mgr, node, vol_path, disk_size, task, disk_key, stop
       once at start and emit a degraded-monitor notice so the operator knows
       we can't estimate progress, but at least gets a heartbeat that the
       monitor itself is still alive.
+
+    NS Oct 2026 — `progress_log`: the sparse copy writes extents all over the
+    volume, so neither the file size nor data_percent track it. It appends a
+    running "N bytes copied" line to this log instead, which is read as-is.
     """
     import time as _time
     # Detect block-device target once
@@ -6088,7 +6121,12 @@ def _monitor_disk_write(pve_mgr, node, vol_path, disk_size, task, disk_key, stop
     while not stop_evt.is_set():
         written = -1
         try:
-            if is_block_dev:
+            if progress_log:
+                rc, out, _ = _pve_node_exec(pve_mgr, node,
+                    f"tail -1 {progress_log} 2>/dev/null", timeout=8)
+                m = re.search(r'(\d+) bytes', str(out or ''))
+                written = int(m.group(1)) if m else 0
+            elif is_block_dev:
                 # Best-effort: ask lvs for thin-volume data_percent. Path shape
                 # /dev/<vg>/<lv>. If lvs is unavailable or this isn't an LVM
                 # thin volume, fall through to heartbeat-only mode.
@@ -6164,6 +6202,138 @@ def _monitor_disk_write(pve_mgr, node, vol_path, disk_size, task, disk_key, stop
         stop_evt.wait(5)
 
 
+def _run_disk_transfers(pve_mgr, task, esxi_host, esxi_user, esxi_pass, datastore, vm_dir,
+                        descriptor_files, stop_on_failure=False):
+    """Run _ssh_pipe_transfer for every disk, concurrently.
+
+    NS Oct 2026 — disks used to copy strictly one after the other, so a multi-disk VM
+    took the sum of all copy times. The scheduler bounds concurrency overall, per source
+    datastore and per target storage (task.parallel_disks / per_datastore_streams /
+    per_storage_streams) and starts the largest disk first. Attaching stays with the
+    caller, in index order. Returns [(vol_id, vol_path) or None] indexed like descriptor_files.
+    """
+    jobs = []
+    for i, desc_file in enumerate(descriptor_files):
+        size = (task.disk_progress.get(f'disk{i}') or {}).get('total', 0)
+
+        def _copy(i=i, desc_file=desc_file, size=size):
+            task._log_ctx.prefix = f"[disk{i}] " if len(descriptor_files) > 1 else ''
+            try:
+                task.log(f"Copying disk {i}: {desc_file} ({size / (1024**3):.1f} GB)")
+                return _ssh_pipe_transfer(pve_mgr, task, esxi_host, esxi_user, esxi_pass,
+                                          datastore, vm_dir, desc_file, i)
+            finally:
+                task._log_ctx.prefix = ''
+        jobs.append({'key': i, 'source': datastore, 'target': task.target_storage,
+                     'size': size, 'fn': _copy})
+
+    sched = DiskTransferScheduler(task.parallel_disks, task.per_datastore_streams,
+                                  task.per_storage_streams, log=task.log)
+    if len(jobs) > 1:
+        task.log(f"Transferring {len(jobs)} disks concurrently (max {task.parallel_disks}, "
+                 f"{task.per_datastore_streams}/datastore, {task.per_storage_streams}/storage)")
+    t0 = time.time()
+    results = sched.run(jobs, stop_on_failure=stop_on_failure, ok=lambda r: bool(r and r[0]))
+    if len(jobs) > 1:
+        per_disk = ', '.join(f"disk{k}={v:.0f}s" for k, v in sorted(sched.seconds.items()))
+        task.log(f"Disk transfers done in {time.time() - t0:.0f}s ({per_disk}; peak {sched.peak} concurrent)")
+    return [results.get(i) for i in range(len(jobs))]
+
+
+def _free_transferred(pve_mgr, task, copies, start=0):
+    """Free the volumes of parallel copies that finished but will never be attached
+    (a sibling disk failed). Disks before `start` are already attached — left alone."""
+    for res in copies[start:]:
+        if res and res[0]:
+            _pve_node_exec(pve_mgr, task.target_node,
+                f"pvesm free {shlex.quote(res[0])} 2>/dev/null", timeout=30)
+
+
+# storage types whose freshly allocated volumes read back as zeros — only there may
+# the sparse copy leave holes unwritten (thick LVM / iSCSI LUNs keep stale data)
+_ZERO_INIT_STORAGE = ('lvmthin', 'zfspool', 'rbd', 'dir', 'nfs', 'cifs', 'glusterfs', 'btrfs', 'cephfs')
+
+
+def _target_reads_zero(pve_mgr, task):
+    cached = getattr(task, '_target_zero_init', None)
+    if cached is None:
+        rc, out, _ = _pve_node_exec(pve_mgr, task.target_node,
+            f"pvesm status --storage {shlex.quote(task.target_storage)} 2>&1 | grep -v '^Name'", timeout=10)
+        parts = str(out or '').split()
+        cached = task._target_zero_init = len(parts) >= 2 and parts[1].lower() in _ZERO_INIT_STORAGE
+    return cached
+
+
+def _disk_allocation_map(pve_mgr, task, vm_dir, desc_file, disk_index, size, max_extents=None):
+    """Allocated extents of a source disk as [(start, length)] plus where they came from.
+
+    Prefers VMware CBT (QueryChangedDiskAreas '*'), falls back to `qemu-img map` on the
+    SSHFS-mounted descriptor (sparse / seSparse extents; a flat VMFS extent maps as fully
+    allocated, which just means no saving). (None, None) when neither source answers.
+    """
+    if not getattr(task, 'sparse_copy', True):
+        return None, None
+    vmware_mgr = vmware_managers.get(task.vmware_id)
+    if vmware_mgr is not None and hasattr(vmware_mgr, 'get_disk_allocated_areas'):
+        try:
+            r = vmware_mgr.get_disk_allocated_areas(task.vm_id, desc_file)
+        except Exception as e:
+            r = {'error': str(e)}
+        if 'data' in r:
+            return merge_extents(r['data'].get('extents'), size, max_extents=max_extents), 'cbt'
+        task.log(f"  CBT allocation map unavailable ({r.get('error')}) — trying qemu-img map")
+    entries = _qemu_map_extents_via_sshfs(pve_mgr, task, f"/tmp/v2p-{task.id}/{vm_dir}/{desc_file}")
+    if entries:
+        return merge_extents(extents_from_qemu_map(entries), size, max_extents=max_extents), 'qemu-img map'
+    return None, None
+
+
+_SPARSE_MAX_EXTENTS = 512   # bounds the remote dd script; smaller gaps get copied as zeros
+
+
+def _sparse_ssh_copy(pve_mgr, task, esxi_host, esxi_user, esxi_pass, esxi_flat_path,
+                     vol_path, extents, disk_index, progress_log):
+    """Copy only `extents` of the flat VMDK over one SSH stream.
+
+    ESXi runs one `dd skip/count` per extent back to back (script fed via `sh -s`), the
+    node peels them off stdin with matching `dd seek/count iflag=fullblock` writes and
+    appends the running byte count to progress_log for _monitor_disk_write.
+    Returns True when every extent landed.
+    """
+    import base64
+    BS = 1024 * 1024
+    tag = f"/tmp/v2p-{task.id}-sparse-{disk_index}"
+    remote = '\n'.join(
+        f"dd if={shlex.quote(esxi_flat_path)} bs={BS} skip={a // BS} count={-(-l // BS)} 2>/dev/null || exit 3"
+        for a, l in extents) + '\n'
+    lines = ['#!/bin/bash', f': > {progress_log}',
+             f"sshpass -f {tag}.pass ssh -o StrictHostKeyChecking=accept-new "
+             f"-o HostKeyAlgorithms=+ssh-rsa,ssh-ed25519 "
+             f"-o KexAlgorithms=+diffie-hellman-group14-sha1,diffie-hellman-group14-sha256 "
+             f"{esxi_user}@{esxi_host} sh -s < {tag}.remote 2>/dev/null | {{"]
+    done = 0
+    for a, l in extents:
+        done += l
+        lines.append(f"  dd of={shlex.quote(vol_path)} bs={BS} seek={a // BS} count={-(-l // BS)} "
+                     f"iflag=fullblock conv=notrunc status=none || exit 3")
+        lines.append(f"  echo '{done} bytes copied' >> {progress_log}")
+    lines.append('}')
+    lines.append('echo "PIPE=${PIPESTATUS[0]}/${PIPESTATUS[1]}"')
+    lines.append(f'rm -f {tag}.pass {tag}.remote {tag}.sh')
+    files = {'pass': esxi_pass, 'remote': remote, 'sh': '\n'.join(lines) + '\n'}
+    for ext, body in files.items():
+        b64 = base64.b64encode(body.encode()).decode()
+        _pve_node_exec(pve_mgr, task.target_node,
+            f"echo '{b64}' | base64 -d > {tag}.{ext} && chmod 600 {tag}.{ext}", timeout=10)
+    rc, out, _ = _pve_node_exec(pve_mgr, task.target_node, f"bash {tag}.sh 2>&1", timeout=86400)
+    res = str(out or '').strip()
+    if rc == 0 and 'PIPE=0/0' in res:
+        return True
+    task.log(f"  Sparse copy failed (rc={rc}): {res[-200:]}")
+    _pve_node_exec(pve_mgr, task.target_node, f"rm -f {tag}.pass {tag}.remote {tag}.sh", timeout=5)
+    return False
+
+
 def _ssh_pipe_transfer(pve_mgr, task, esxi_host, esxi_user, esxi_pass, datastore, vm_dir, desc_file, disk_index):
     """Transfer a flat VMDK from ESXi to Proxmox storage.
 
@@ -6310,11 +6480,28 @@ def _ssh_pipe_transfer(pve_mgr, task, esxi_host, esxi_user, esxi_pass, datastore
     downloaded = 0
     dl_success = False
 
+    # NS Oct 2026 — sparse copy: with an allocation map (CBT / qemu-img map) only the
+    # allocated extents go over the wire. Only on storages whose new volumes read as
+    # zeros — on thick LVM the holes would keep whatever the LV held before.
+    task._presync_extents.pop(disk_index, None)
+    extents = map_src = None
+    if getattr(task, 'sparse_copy', True) and _target_reads_zero(pve_mgr, task):
+        extents, map_src = _disk_allocation_map(pve_mgr, task, vm_dir, desc_file, disk_index,
+                                                flat_size, max_extents=_SPARSE_MAX_EXTENTS)
+        if not worth_sparse(extents, flat_size):
+            if extents is not None:
+                task.log(f"  Allocation map ({map_src}): {allocated_bytes(extents) / (1024**3):.1f} GB "
+                         f"allocated — full copy")
+            extents = None
+    sparse_log = f"/tmp/v2p-{task.id}-sshdd-{disk_index}.log"
+
     # Live progress monitoring (#132) - polls vol_path size every 5s
     dk = f'disk{disk_index}'
     _stop_mon = threading.Event()
     _mon_t = threading.Thread(target=_monitor_disk_write, daemon=True,
-        args=(pve_mgr, task.target_node, vol_path, flat_size, task, dk, _stop_mon))
+        args=(pve_mgr, task.target_node, vol_path,
+              allocated_bytes(extents) if extents else flat_size, task, dk, _stop_mon),
+        kwargs={'progress_log': sparse_log if extents else None})
     _mon_t.start()
 
     # NS May 2026 (#222): HTTPS /folder endpoint on ESXi 7/8 with iSCSI VMFS
@@ -6379,6 +6566,25 @@ def _ssh_pipe_transfer(pve_mgr, task, esxi_host, esxi_user, esxi_pass, datastore
         else:
             task.log(f"  HTTPS test 0 bytes - skipping HTTPS full download")
 
+        # ================================================================
+        # METHOD 2a: sparse SSH dd — allocated extents only
+        # ================================================================
+        if not dl_success and extents:
+            alloc = allocated_bytes(extents)
+            task.log(f"  Sparse SSH copy ({map_src}): {alloc / (1024**3):.1f} of {flat_size_gb:.1f} GB "
+                     f"allocated in {len(extents)} extent(s)")
+            _pve_node_exec(pve_mgr, task.target_node,
+                "which sshpass >/dev/null 2>&1 || apt-get install -y sshpass >/dev/null 2>&1", timeout=30)
+            if _sparse_ssh_copy(pve_mgr, task, esxi_host, esxi_user, esxi_pass, esxi_flat_path,
+                                vol_path, extents, disk_index, sparse_log):
+                dl_success = True
+                downloaded = flat_size
+                task._presync_extents[disk_index] = extents
+                task.log(f"  Sparse OK: {alloc / (1024**3):.2f} GB copied, "
+                         f"{(flat_size - alloc) / (1024**3):.2f} GB of holes skipped")
+            else:
+                task.log(f"  Sparse copy failed — falling back to full SSH dd")
+
         # ================================================================
         # METHOD 2: SSH dd pipe (direct, no FUSE, no HTTP)
         # ================================================================
@@ -6471,13 +6677,15 @@ def _ssh_pipe_transfer(pve_mgr, task, esxi_host, esxi_user, esxi_pass, datastore
 
 def _delta_sync_blocks(pve_mgr, task, esxi_host, esxi_user, esxi_pass,
                         esxi_flat_path, vol_path, flat_size, disk_index,
-                        pve_checksums=None):
+                        pve_checksums=None, allocated=None):
     """Block-level delta sync: only transfer changed blocks.
     
     Compares checksums of fixed-size blocks between ESXi source and Proxmox LV.
     Only re-downloads blocks that differ. VM must be stopped (no VMDK lock).
     
     If pve_checksums is provided, skips Proxmox checksum computation (pre-computed).
+    If `allocated` (extents allocated on the source now OR at pre-sync time) is given,
+    blocks outside it are zeros on both sides and are neither hashed nor compared.
     Returns True on success, False on failure.
     """
     import base64
@@ -6487,16 +6695,32 @@ def _delta_sync_blocks(pve_mgr, task, esxi_host, esxi_user, esxi_pass,
     bs_mb = BLOCK_SIZE // (1024 * 1024)
     
     task.log(f"  Delta sync: {num_blocks} blocks of {bs_mb}MB each")
+
+    # NS Oct 2026 — hashing 256MB of zeros on ESXi is pure downtime; skip the blocks
+    # no allocation map has ever seen data in
+    check = list(range(num_blocks))
+    if allocated is not None:
+        check = sorted(blocks_with_data(allocated, BLOCK_SIZE, num_blocks))
+        task.log(f"  Allocation map: {num_blocks - len(check)} of {num_blocks} blocks unallocated "
+                 f"on both sides — not compared")
+        if not check:
+            task.log(f"  No allocated blocks - nothing to sync")
+            return True
+
+    def _sum_script(path):
+        if len(check) == num_blocks:
+            loop = f"i=0; while [ $i -lt {num_blocks} ]; do "
+            step = "i=$((i+1)); done"
+        else:
+            loop = f"for i in {' '.join(map(str, check))}; do "
+            step = "done"
+        return (f"{loop}dd if={shlex.quote(path)} bs={BLOCK_SIZE} skip=$i count=1 2>/dev/null "
+                f"| md5sum | cut -d' ' -f1; {step}")
     
     # 1. Generate checksums on ESXi (one SSH call, BusyBox-compatible)
-    task.log(f"  Computing checksums on ESXi ({num_blocks} blocks)...")
-    checksum_script = (
-        f"i=0; while [ $i -lt {num_blocks} ]; do "
-        f"dd if={shlex.quote(esxi_flat_path)} bs={BLOCK_SIZE} skip=$i count=1 2>/dev/null | md5sum | cut -d' ' -f1; "
-        f"i=$((i+1)); done"
-    )
+    task.log(f"  Computing checksums on ESXi ({len(check)} blocks)...")
     rc_e, out_e, _ = _ssh_exec(esxi_host, esxi_user, esxi_pass,
-        checksum_script, timeout=600)
+        _sum_script(esxi_flat_path), timeout=600)
     
     if rc_e != 0 or not out_e:
         task.log(f"  ESXi checksum failed: rc={rc_e}")
@@ -6505,24 +6729,19 @@ def _delta_sync_blocks(pve_mgr, task, esxi_host, esxi_user, esxi_pass,
     esxi_sums = [s.strip() for s in out_e.strip().split('\n') if s.strip()]
     task.log(f"  ESXi: got {len(esxi_sums)} checksums")
     
-    if len(esxi_sums) < num_blocks:
-        task.log(f"  WARNING: Expected {num_blocks} checksums, got {len(esxi_sums)}")
+    if len(esxi_sums) < len(check):
+        task.log(f"  WARNING: Expected {len(check)} checksums, got {len(esxi_sums)}")
         # Pad with empty to force re-download of remaining blocks
-        while len(esxi_sums) < num_blocks:
+        while len(esxi_sums) < len(check):
             esxi_sums.append('MISSING')
     
     # 2. Generate checksums on Proxmox LV (use pre-computed if available)
     if pve_checksums and len(pve_checksums) >= num_blocks:
-        pve_sums = pve_checksums[:num_blocks]
+        pve_sums = [pve_checksums[b] for b in check]
         task.log(f"  Proxmox: using {len(pve_sums)} pre-computed checksums (no downtime cost)")
     else:
         task.log(f"  Computing checksums on Proxmox...")
-        pve_script = (
-            f"i=0; while [ $i -lt {num_blocks} ]; do "
-            f"dd if={shlex.quote(vol_path)} bs={BLOCK_SIZE} skip=$i count=1 2>/dev/null | md5sum | cut -d' ' -f1; "
-            f"i=$((i+1)); done"
-        )
-        rc_p, out_p, _ = _pve_node_exec(pve_mgr, task.target_node, pve_script, timeout=600)
+        rc_p, out_p, _ = _pve_node_exec(pve_mgr, task.target_node, _sum_script(vol_path), timeout=600)
         
         if rc_p != 0 or not out_p:
             task.log(f"  Proxmox checksum failed: rc={rc_p}")
@@ -6531,14 +6750,11 @@ def _delta_sync_blocks(pve_mgr, task, esxi_host, esxi_user, esxi_pass,
         pve_sums = [s.strip() for s in out_p.strip().split('\n') if s.strip()]
         task.log(f"  Proxmox: got {len(pve_sums)} checksums")
     
-    while len(pve_sums) < num_blocks:
+    while len(pve_sums) < len(check):
         pve_sums.append('ZERO')
     
     # 3. Find differing blocks
-    diff_blocks = []
-    for i in range(num_blocks):
-        if i >= len(esxi_sums) or i >= len(pve_sums) or esxi_sums[i] != pve_sums[i]:
-            diff_blocks.append(i)
+    diff_blocks = [b for n, b in enumerate(check) if esxi_sums[n] != pve_sums[n]]
     
     diff_size_mb = len(diff_blocks) * bs_mb
     pct = (len(diff_blocks) / num_blocks * 100) if num_blocks > 0 else 0
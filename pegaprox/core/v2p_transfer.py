@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+PegaProx V2P disk transfer scheduling - Layer 5
+Concurrent per-disk copies and allocation maps for V2P migrations.
+
+The disk copy itself stays in core/v2p.py (_ssh_pipe_transfer and friends).
+This module decides which disks run at the same time, keeps the per-disk
+throughput / ETA numbers for the progress feed, and turns CBT or qemu-img
+allocation maps into the extent lists the sparse copy path walks.
+"""
+
+import os
+import time
+import logging
+import threading
+
+# NS Oct 2026 — defaults for how many disks of one migration copy at once.
+# Per-datastore caps keep a single VMFS LUN from being hammered by N readers,
+# per-storage caps do the same for the target (LVM metadata lock, one RBD pool).
+PARALLEL_DISKS = int(os.environ.get('PEGAPROX_V2P_PARALLEL_DISKS', 4))
+PER_DATASTORE_STREAMS = int(os.environ.get('PEGAPROX_V2P_DATASTORE_STREAMS', 2))
+PER_STORAGE_STREAMS = int(os.environ.get('PEGAPROX_V2P_STORAGE_STREAMS', 2))
+
+EXTENT_ALIGN = 1024 * 1024      # sparse copy moves whole MiB — dd bs=1M on both ends
+SPARSE_MIN_SAVING = 0.10        # below this the extent bookkeeping isn't worth it
+_RATE_ALPHA = 0.3               # EWMA weight of the newest throughput sample
+
+
+def _limit(value, default, lo=1, hi=16):
+    try:
+        v = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(lo, min(hi, v))
+
+
+def transfer_limits(config):
+    """(parallel, per_datastore, per_storage) from a migration config dict,
+    clamped to 1..16. Missing/garbage values fall back to the env defaults."""
+    config = config or {}
+    return (_limit(config.get('parallel_disks'), PARALLEL_DISKS),
+            _limit(config.get('per_datastore_streams'), PER_DATASTORE_STREAMS),
+            _limit(config.get('per_storage_streams'), PER_STORAGE_STREAMS))
+
+
+class DiskTransferScheduler:
+    """Runs one job per disk, at most `max_parallel` at a time and at most
+    `per_source` / `per_target` per source datastore / target storage.
+
+    Jobs are dicts: {'key', 'source', 'target', 'size', 'fn'}. Larger disks
+    start first (longest-processing-time order), so the phase ends close to
+    the time of the largest disk instead of the sum of all of them.
+    fn() returns the job's result; an exception counts as a failed job
+    (result None). With stop_on_failure, jobs that haven't started yet are
+    skipped once any job failed — running ones are left to finish.
+    """
+
+    def __init__(self, max_parallel=PARALLEL_DISKS, per_source=PER_DATASTORE_STREAMS,
+                 per_target=PER_STORAGE_STREAMS, log=None):
+        self.max_parallel = max(1, int(max_parallel))
+        self.per_source = max(1, int(per_source))
+        self.per_target = max(1, int(per_target))
+        self.log = log or (lambda msg: None)
+        self.seconds = {}
+        self.peak = 0
+
+    def run(self, jobs, stop_on_failure=False, ok=bool):
+        pending = sorted(jobs, key=lambda j: -(j.get('size') or 0))
+        results = {j['key']: None for j in jobs}
+        cond = threading.Condition()
+        busy_src, busy_tgt = {}, {}
+        state = {'running': 0, 'failed': False}
+
+        def _worker(job):
+            t0 = time.monotonic()
+            try:
+                res = job['fn']()
+            except Exception as e:
+                logging.exception(f"[V2P] disk transfer {job['key']} crashed")
+                self.log(f"  {job['key']}: transfer crashed: {e}")
+                res = None
+            with cond:
+                results[job['key']] = res
+                self.seconds[job['key']] = round(time.monotonic() - t0, 1)
+                busy_src[job.get('source')] -= 1
+                busy_tgt[job.get('target')] -= 1
+                state['running'] -= 1
+                if not ok(res):
+                    state['failed'] = True
+                cond.notify_all()
+
+        def _eligible():
+            for job in pending:
+                if busy_src.get(job.get('source'), 0) < self.per_source and \
+                   busy_tgt.get(job.get('target'), 0) < self.per_target:
+                    return job
+            return None
+
+        with cond:
+            while pending or state['running']:
+                if stop_on_failure and state['failed'] and pending:
+                    for job in pending:
+                        self.log(f"  {job['key']}: skipped (another disk failed)")
+                    pending = []
+                    continue
+                job = _eligible() if state['running'] < self.max_parallel else None
+                if job is None:
+                    cond.wait(timeout=5)
+                    continue
+                pending.remove(job)
+                busy_src[job.get('source')] = busy_src.get(job.get('source'), 0) + 1
+                busy_tgt[job.get('target')] = busy_tgt.get(job.get('target'), 0) + 1
+                state['running'] += 1
+                self.peak = max(self.peak, state['running'])
+                threading.Thread(target=_worker, args=(job,), daemon=True).start()
+        return results
+
+
+def update_rate(sample, copied, total, now=None):
+    """Fold a progress reading into `sample` (a per-disk scratch dict) and
+    return (bytes_per_sec, eta_seconds). Rate is an EWMA over the readings so
+    the ETA doesn't jump around with every monitor tick; eta is None until
+    there is a rate to divide by."""
+    now = time.monotonic() if now is None else now
+    last_t, last_c = sample.get('t'), sample.get('c')
+    rate = sample.get('rate', 0.0)
+    if last_t is not None and now > last_t and copied >= last_c:
+        inst = (copied - last_c) / (now - last_t)
+        rate = inst if not rate else _RATE_ALPHA * inst + (1 - _RATE_ALPHA) * rate
+    sample.update(t=now, c=copied, rate=rate)
+    if copied >= total:
+        return rate, 0
+    if rate <= 0:
+        return rate, None
+    return rate, int((total - copied) / rate)
+
+
+def merge_extents(extents, size, align=EXTENT_ALIGN, max_extents=None):
+    """Normalise (start, length) extents: round outward to `align`, clip to
+    `size`, sort and merge overlaps. With max_extents, the smallest gaps are
+    closed until the list fits — copying a little zero padding is cheaper
+    than an unbounded dd command line."""
+    out = []
+    for start, length in sorted(extents or ()):
+        if length <= 0:
+            continue
+        a = (start // align) * align
+        b = min(size, -(-(start + length) // align) * align)
+        if a >= b:
+            continue
+        if out and a <= out[-1][1]:
+            out[-1][1] = max(out[-1][1], b)
+        else:
+            out.append([a, b])
+    if max_extents and len(out) > max_extents:
+        # close the (n - max_extents) smallest gaps in one walk: everything
+        # under the threshold gap, then threshold-sized ones left to right
+        drop = len(out) - max(max_extents, 1)
+        gaps = [out[i + 1][0] - out[i][1] for i in range(len(out) - 1)]
+        threshold = sorted(gaps)[drop - 1]
+        at_threshold = drop - sum(1 for g in gaps if g < threshold)
+        merged = [out[0]]
+        for gap, ext in zip(gaps, out[1:]):
+            if gap < threshold or (gap == threshold and at_threshold > 0):
+                if gap == threshold:
+                    at_threshold -= 1
+                merged[-1][1] = ext[1]
+            else:
+                merged.append(ext)
+        out = merged
+    return [(a, b - a) for a, b in out]
+
+
+def extents_from_qemu_map(entries):
+    """Data-carrying extents from `qemu-img map --output=json`. Zero-flagged
+    entries read back as zeros, so they count as unallocated too."""
+    return [(int(e.get('start', 0)), int(e.get('length', 0)))
+            for e in (entries or ()) if e.get('data') and not e.get('zero')]
+
+
+def allocated_bytes(extents):
+    return sum(l for _, l in extents or ())
+
+
+def worth_sparse(extents, size):
+    """True when skipping the holes saves at least SPARSE_MIN_SAVING of the disk."""
+    if extents is None or not size:
+        return False
+    return allocated_bytes(extents) <= size * (1 - SPARSE_MIN_SAVING)
+
+
+def blocks_with_data(extents, block_size, num_blocks):
+    """Indexes of `block_size` blocks that at least one extent touches."""
+    hit = set()
+    for start, length in extents or ():
+        if length <= 0:
+            continue
+        first = start // block_size
+        last = min(num_blocks - 1, (start + length - 1) // block_size)
+        hit.update(range(first, last + 1))
+    return hit
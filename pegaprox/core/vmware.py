@@ -22,6 +22,122 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 from pegaprox.core.db import get_db
 from pegaprox.globals import vmware_managers
 
+# NS Oct 2026 — SOAP inventory via one PropertyCollector filter. The old
+# _soap_get_* helpers walked a ContainerView and then touched vm.config /
+# vm.runtime / vm.guest per object — every attribute access is a lazy SOAP round
+# trip, so a 2k-VM vCenter took minutes per listing and the SSE loop asks every
+# ~10s. Now one filter selects only the property paths we show; the first
+# WaitForUpdatesEx returns everything (paged via `truncated`), later calls only
+# what changed since `version`.
+_SOAP_INVENTORY_PATHS = {
+    'VirtualMachine': ['name', 'config.name', 'config.hardware.numCPU', 'config.hardware.memoryMB',
+                       'config.guestFullName', 'runtime.powerState'],
+    'HostSystem': ['name', 'runtime.connectionState', 'runtime.powerState',
+                   'hardware.cpuInfo.numCpuCores', 'hardware.memorySize'],
+    'Datastore': ['name', 'summary.type', 'summary.capacity', 'summary.freeSpace'],
+    'Network': ['name'],
+}
+
+
+def _soap_kind(obj):
+    """Inventory kind of a managed object ('Network' for DV portgroups too)."""
+    for cls in type(obj).__mro__:
+        name = cls.__name__.rsplit('.', 1)[-1]
+        if name in _SOAP_INVENTORY_PATHS:
+            return name
+    return None
+
+
+class SoapInventory:
+    """Property cache for VMs, hosts, datastores and networks, kept current
+    with WaitForUpdatesEx on a private PropertyCollector."""
+
+    PAGE_SIZE = 500
+
+    def __init__(self, content):
+        self.content = content
+        self.version = None   # None until the filter exists
+        self.objects = {kind: {} for kind in _SOAP_INVENTORY_PATHS}  # kind -> moid -> {obj, props}
+        self._lock = threading.Lock()
+        self._pc = None
+        self._view = None
+        self._filter = None
+
+    def _create_filter(self):
+        from pyVmomi import vim, vmodl
+        pcq = vmodl.query.PropertyCollector
+        types = [getattr(vim, kind) for kind in _SOAP_INVENTORY_PATHS]
+        self._view = self.content.viewManager.CreateContainerView(self.content.rootFolder, types, True)
+        self._pc = self.content.propertyCollector.CreatePropertyCollector()
+        traversal = pcq.TraversalSpec(name='view', path='view', skip=False, type=vim.view.ContainerView)
+        spec = pcq.FilterSpec(
+            objectSet=[pcq.ObjectSpec(obj=self._view, skip=True, selectSet=[traversal])],
+            propSet=[pcq.PropertySpec(type=getattr(vim, kind), pathSet=paths)
+                     for kind, paths in _SOAP_INVENTORY_PATHS.items()])
+        self._filter = self._pc.CreateFilter(spec, True)
+        self.version = ''
+
+    def sync(self):
+        """Apply all changes since the last sync; returns True if anything changed."""
+        from pyVmomi import vmodl
+        with self._lock:
+            if self._pc is None:
+                self._create_filter()
+            opts = vmodl.query.PropertyCollector.WaitOptions(maxWaitSeconds=0, maxObjectUpdates=self.PAGE_SIZE)
+            changed = False
+            while True:
+                upd = self._pc.WaitForUpdatesEx(self.version, opts)
+                if upd is None:
+                    break
+                self._apply(upd)
+                self.version = upd.version
+                changed = True
+                if not getattr(upd, 'truncated', False):
+                    break
+            return changed
+
+    def _apply(self, upd):
+        for fs in upd.filterSet or []:
+            for ou in fs.objectSet or []:
+                kind = _soap_kind(ou.obj)
+                if kind is None:
+                    continue
+                table = self.objects[kind]
+                moid = ou.obj._moId
+                if ou.kind == 'leave':
+                    table.pop(moid, None)
+                    continue
+                entry = table.setdefault(moid, {'obj': ou.obj, 'props': {}})
+                for ch in ou.changeSet or []:
+                    if ch.op in ('remove', 'indirectRemove'):
+                        entry['props'].pop(ch.name, None)
+                    else:
+                        entry['props'][ch.name] = ch.val
+
+    def rows(self, kind):
+        """[(moid, props)] snapshot for one kind."""
+        with self._lock:
+            return [(moid, dict(e['props'])) for moid, e in self.objects[kind].items()]
+
+    def lookup(self, kind, moid):
+        entry = self.objects.get(kind, {}).get(moid)
+        return entry['obj'] if entry else None
+
+    def destroy(self):
+        for mo in (self._filter, self._pc, self._view):
+            try:
+                if mo is not None:
+                    mo.Destroy()
+            except Exception:
+                pass
+        self._pc = self._view = self._filter = None
+
+
+def _soap_power_state(val):
+    # 'poweredOn' -> 'POWERED_ON', same shape the REST API returns
+    return str(val).replace('powered', 'POWERED_').upper() if val else 'UNKNOWN'
+
+
 class VMwareManager:
     """Manages connection to a vCenter Server or standalone ESXi host.
     
@@ -52,6 +168,7 @@ class VMwareManager:
         self._connection_type = 'rest'  # 'rest' or 'soap' (pyvmomi)
         self._si = None  # pyvmomi ServiceInstance
         self._soap_content = None  # pyvmomi ServiceContent
+        self._inventory = None  # SoapInventory, bound to _soap_content
         self._base_url = f"https://{self.host}:{self.port}"
         self._connect_lock = threading.Lock()  # Prevent concurrent reconnect attempts
         self._connect_fail_count = 0  # Track consecutive failures for log suppression
@@ -345,8 +462,41 @@ class VMwareManager:
                 self._soap_content = None
             return []
     
+    def _soap_inventory(self):
+        """Synced SoapInventory, or None if the PropertyCollector path failed
+        (callers then fall back to the ContainerView walk)."""
+        if not self._soap_content:
+            self.ensure_connected()
+            if not self._soap_content:
+                return None
+        inv = self._inventory
+        if inv is None or inv.content is not self._soap_content:
+            if inv is not None:
+                inv.destroy()
+            inv = self._inventory = SoapInventory(self._soap_content)
+        try:
+            inv.sync()
+            return inv
+        except Exception as e:
+            err = str(e)
+            logging.debug(f"[VMware:{self.id}] SOAP inventory sync failed: {err}")
+            inv.destroy()
+            self._inventory = None
+            if 'NotAuthenticated' in err or 'session' in err.lower() or 'expired' in err.lower():
+                logging.info(f"[VMware:{self.id}] SOAP session looks stale - tearing down for reconnect")
+                self.connected = False
+                self._si = None
+                self._soap_content = None
+            return None
+
     def _soap_get_managed_object(self, obj_type, moid):
         """Get a specific managed object by its MoId."""
+        # inventory kinds resolve from the property cache — no full view walk
+        inv = self._inventory
+        if inv is not None and inv.content is self._soap_content:
+            obj = inv.lookup(obj_type.__name__.rsplit('.', 1)[-1], moid)
+            if obj is not None:
+                return obj
         try:
             objects = self._soap_get_container(obj_type)
             for obj in objects:
@@ -468,6 +618,16 @@ class VMwareManager:
     
     def _soap_get_vms(self) -> dict:
         """List VMs via pyvmomi SOAP API."""
+        inv = self._soap_inventory()
+        if inv is not None:
+            return {'data': [{
+                'vm': moid,
+                'name': p.get('config.name') or p.get('name', ''),
+                'power_state': _soap_power_state(p.get('runtime.powerState')),
+                'cpu_count': p.get('config.hardware.numCPU') or 0,
+                'memory_size_MiB': p.get('config.hardware.memoryMB') or 0,
+                'guest_OS': p.get('config.guestFullName') or '',
+            } for moid, p in inv.rows('VirtualMachine')]}
         try:
             from pyVmomi import vim
             vms = self._soap_get_container(vim.VirtualMachine)
@@ -480,7 +640,7 @@ class VMwareManager:
                     result.append({
                         'vm': vm._moId,
                         'name': cfg.name if cfg else vm.name,
-                        'power_state': str(runtime.powerState).replace('powered', 'POWERED_').upper() if runtime else 'UNKNOWN',
+                        'power_state': _soap_power_state(runtime.powerState if runtime else None),
                         'cpu_count': cfg.hardware.numCPU if cfg and cfg.hardware else 0,
                         'memory_size_MiB': cfg.hardware.memoryMB if cfg and cfg.hardware else 0,
                         'guest_OS': cfg.guestFullName if cfg else '',
@@ -903,7 +1063,56 @@ class VMwareManager:
             return {'error': 'remove timed out'}
         except Exception as e:
             return {'error': str(e)}
-    
+
+    def get_disk_allocated_areas(self, vm_id: str, vmdk_name: str = '', disk_index: int = 0) -> dict:
+        """Allocated extents of one virtual disk via CBT (QueryChangedDiskAreas, changeId '*').
+
+        NS Oct 2026 — V2P sparse copy. With changeId='*' ESXi returns every
+        allocated area of the disk instead of a delta, which lets the transfer
+        skip the holes of a thin disk. Needs SOAP and changeTrackingEnabled on
+        the VM; anything else returns an error and the caller copies in full.
+        The disk is matched by descriptor file name, or by index when no name is given.
+        Returns {'data': {'extents': [(start, length), ...], 'capacity': bytes}}.
+        """
+        if not self._si:
+            return {'error': 'CBT query needs a SOAP connection'}
+        try:
+            from pyVmomi import vim
+            vm = self._soap_get_managed_object(vim.VirtualMachine, vm_id)
+            if not vm or not vm.config:
+                return {'error': 'VM not found'}
+            if not getattr(vm.config, 'changeTrackingEnabled', False):
+                return {'error': 'changed block tracking is not enabled on this VM'}
+            # a running VM needs a snapshot to query against; the migration
+            # snapshot's config still points at the frozen base disks
+            snap = vm.snapshot.currentSnapshot if vm.snapshot else None
+            hw = (snap.config if snap else vm.config).hardware
+            disks = sorted((d for d in hw.device if isinstance(d, vim.vm.device.VirtualDisk)),
+                           key=lambda d: d.key)
+            if vmdk_name:
+                # a wrong map would skip real data — only accept an unambiguous name match
+                hits = [d for d in disks if str(getattr(d.backing, 'fileName', '')).rsplit('/', 1)[-1]
+                        .rsplit('] ', 1)[-1] == vmdk_name]
+                dev = hits[0] if len(hits) == 1 else None
+            else:
+                dev = disks[disk_index] if 0 <= disk_index < len(disks) else None
+            if dev is None:
+                return {'error': f'disk {vmdk_name or disk_index} not found (or not unique)'}
+            capacity = int(getattr(dev, 'capacityInBytes', 0) or (dev.capacityInKB or 0) * 1024)
+            extents, offset = [], 0
+            while offset < capacity:
+                info = vm.QueryChangedDiskAreas(snapshot=snap, deviceKey=dev.key,
+                                                startOffset=offset, changeId='*')
+                for area in info.changedArea or []:
+                    extents.append((int(area.start), int(area.length)))
+                nxt = int(info.startOffset) + int(info.length)
+                if nxt <= offset:
+                    break
+                offset = nxt
+            return {'data': {'extents': extents, 'capacity': capacity}}
+        except Exception as e:
+            return {'error': str(e)}
+
     # -- Hosts --
     
     def get_hosts(self) -> dict:
@@ -913,6 +1122,16 @@ class VMwareManager:
         return self.api_get('/api/vcenter/host')
     
     def _soap_get_hosts(self) -> dict:
+        inv = self._soap_inventory()
+        if inv is not None:
+            return {'data': [{
+                'host': moid,
+                'name': p.get('name', ''),
+                'connection_state': str(p.get('runtime.connectionState') or 'UNKNOWN').upper(),
+                'power_state': str(p.get('runtime.powerState') or 'UNKNOWN').upper(),
+                'cpu_cores': p.get('hardware.cpuInfo.numCpuCores') or 0,
+                'memory_bytes': p.get('hardware.memorySize') or 0,
+            } for moid, p in inv.rows('HostSystem')]}
         try:
             from pyVmomi import vim
             hosts = self._soap_get_container(vim.HostSystem)
@@ -948,6 +1167,15 @@ class VMwareManager:
         return self.api_get('/api/vcenter/datastore')
     
     def _soap_get_datastores(self) -> dict:
+        inv = self._soap_inventory()
+        if inv is not None:
+            return {'data': [{
+                'datastore': moid,
+                'name': p.get('name', ''),
+                'type': str(p.get('summary.type') or 'UNKNOWN'),
+                'capacity': p.get('summary.capacity') or 0,
+                'free_space': p.get('summary.freeSpace') or 0,
+            } for moid, p in inv.rows('Datastore')]}
         try:
             from pyVmomi import vim
             stores = self._soap_get_container(vim.Datastore)
@@ -981,6 +1209,13 @@ class VMwareManager:
         return self.api_get('/api/vcenter/network')
     
     def _soap_get_networks(self) -> dict:
+        inv = self._soap_inventory()
+        if inv is not None:
+            return {'data': [{
+                'network': moid,
+                'name': p.get('name', ''),
+                'type': type(inv.lookup('Network', moid)).__name__,
+            } for moid, p in inv.rows('Network')]}
         try:
             from pyVmomi import vim
             nets = self._soap_get_container(vim.Network)
@@ -19,6 +19,7 @@ from urllib.parse import urlparse, urlunparse, urlencode
 from pegaprox.constants import LOG_DIR
 from pegaprox import globals as _g
 from pegaprox.core.db import get_db
+from pegaprox.core.rrd_cache import cached_series, RrdFetchError
 from pegaprox.utils.realtime import broadcast_sse
 
 # XenAPI is optional - only needed for XCP-ng clusters
@@ -78,6 +79,112 @@ def _build_xapi_rrd_url(base_url: str, path: str) -> str:
     return urlunparse(parsed._replace(path=f"/{path}"))
 
 
+# NS Oct 2026 — XAPI event cache. _fetch_vms used to do VM.get_record +
+# host.get_hostname + VM_metrics.get_record + VBD/VDI lookups + guest_metrics
+# per VM on every refresh — a few thousand XML-RPC round trips per cycle on a
+# 500-VM pool. Now we pull every record once with get_all_records() and then
+# follow event.from() to keep the local copies current; the builders below
+# resolve everything against these dicts.
+_XAPI_EVENT_CLASSES = ('VM', 'VM_metrics', 'VM_guest_metrics', 'VBD', 'VDI',
+                       'host', 'host_metrics', 'PIF')
+_NULL_REF = 'OpaqueRef:NULL'
+
+
+class XapiRecordCache:
+    """Local mirror of the XAPI objects the inventory needs, keyed by class
+    (lower-case, like event.from reports it) and opaque ref."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records = {c.lower(): {} for c in _XAPI_EVENT_CLASSES}
+        self.token = ''
+        self.ready = False
+        self.version = 0      # bumped whenever an event batch changed something
+
+    def bootstrap(self, api):
+        """Full load. The token is taken BEFORE the get_all_records calls so
+        anything that changes meanwhile gets replayed by the next pump()."""
+        token = getattr(api.event, 'from')([], '', 0.0).get('token', '')
+        fresh = {}
+        for cls in _XAPI_EVENT_CLASSES:
+            fresh[cls.lower()] = dict(getattr(api, cls).get_all_records())
+        with self._lock:
+            self.records = fresh
+            self.token = token
+            self.ready = True
+            self.version += 1
+
+    def pump(self, api, timeout=30.0):
+        """Apply everything since our token; blocks up to timeout on the XAPI
+        side if nothing happened. Returns the set of classes that changed."""
+        res = getattr(api.event, 'from')([c.lower() for c in _XAPI_EVENT_CLASSES],
+                                         self.token, float(timeout))
+        changed = set()
+        with self._lock:
+            for ev in res.get('events', []):
+                cls = str(ev.get('class', '')).lower()
+                table = self.records.get(cls)
+                ref = ev.get('ref')
+                if table is None or not ref:
+                    continue
+                if ev.get('operation') == 'del':
+                    table.pop(ref, None)
+                elif 'snapshot' in ev:
+                    table[ref] = ev['snapshot']
+                else:
+                    continue
+                changed.add(cls)
+            self.token = res.get('token', self.token)
+            if changed:
+                self.version += 1
+        return changed
+
+    def reset(self):
+        with self._lock:
+            self.ready = False
+            self.token = ''
+
+    # same two lookups the builders use on _XapiRpcRecords
+    def items(self, cls):
+        with self._lock:
+            return list(self.records.get(cls.lower(), {}).items())
+
+    def get(self, cls, ref):
+        if not ref or ref == _NULL_REF:
+            return None
+        return self.records.get(cls.lower(), {}).get(ref)
+
+
+class _XapiRpcRecords:
+    """Per-object XML-RPC lookups — what the builders fall back to while the
+    event cache isn't bootstrapped, or when the pool has no event.from.
+    Memoized for one build so a host isn't fetched once per VM."""
+
+    def __init__(self, api):
+        self.api = api
+        self._memo = {}
+
+    def items(self, cls):
+        proxy = getattr(self.api, cls)
+        out = []
+        for ref in proxy.get_all():
+            rec = self.get(cls, ref)
+            if rec is not None:
+                out.append((ref, rec))
+        return out
+
+    def get(self, cls, ref):
+        if not ref or ref == _NULL_REF:
+            return None
+        key = (cls, ref)
+        if key not in self._memo:
+            try:
+                self._memo[key] = getattr(self.api, cls).get_record(ref)
+            except Exception:
+                self._memo[key] = None
+        return self._memo[key]
+
+
 class XcpngManager:
     """
     XCP-ng pool manager - duck-typed to match PegaProxManager's public interface.
@@ -141,6 +248,11 @@ class XcpngManager:
         self._cached_vms = None
         self._vms_cache_time = 0
 
+        # XAPI event cache, fed by _event_loop on its own session
+        self._xapi_cache = XapiRecordCache()
+        self._event_thread = None
+        self._events_unsupported = False
+
         # maintenance stubs (needed for API compat)
         self.nodes_in_maintenance = {}
         self.maintenance_lock = threading.Lock()
@@ -210,13 +322,7 @@ class XcpngManager:
 
         with self._session_lock:
             try:
-                url = self._get_xapi_url()
-                session = XenAPI.Session(url, ignore_ssl=not self.config.ssl_verification)
-                session.xenapi.login_with_password(
-                    self.config.user, self.config.pass_,
-                    '1.0', 'PegaProx'
-                )
-                self._session = session
+                self._session = self._open_session()
                 self.is_connected = True
                 self.connection_error = None
                 self.current_host = self.config.host
@@ -233,6 +339,14 @@ class XcpngManager:
                     self.logger.error(f"XAPI connect failed: {e}")
                 return False
 
+    def _open_session(self):
+        session = XenAPI.Session(self._get_xapi_url(), ignore_ssl=not self.config.ssl_verification)
+        session.xenapi.login_with_password(
+            self.config.user, self.config.pass_,
+            '1.0', 'PegaProx'
+        )
+        return session
+
     # compat alias for API layer
     def connect_to_proxmox(self) -> bool:
         return self.connect()
@@ -281,6 +395,11 @@ class XcpngManager:
         self.thread = threading.Thread(target=self._run_loop, daemon=True,
                                        name=f"xcpng-{self.id}")
         self.thread.start()
+        # a pool that already answered "no event.from" stays on per-object polling
+        if not self._events_unsupported:
+            self._event_thread = threading.Thread(target=self._event_loop, daemon=True,
+                                                  name=f"xcpng-events-{self.id}")
+            self._event_thread.start()
         self.logger.info("XCP-ng manager started")
 
     def stop(self):
@@ -322,6 +441,63 @@ class XcpngManager:
             # NS: poll more often so tasks show up quickly
             self.stop_event.wait(min(interval, 15))
 
+    def _event_loop(self):
+        """Keep _xapi_cache current via event.from.
+
+        Runs on its own XAPI session because event.from long-polls (30s) and the
+        xmlrpc proxy of the main session isn't safe to share with a blocked call.
+        Any error (EVENTS_LOST, SESSION_INVALID, network) drops the cache back to
+        not-ready so the builders use per-object RPC until we've re-bootstrapped.
+        """
+        while not self.stop_event.is_set() and not self._events_unsupported:
+            if not XENAPI_AVAILABLE or not self.is_connected:
+                self.stop_event.wait(5)
+                continue
+            session = None
+            try:
+                session = self._open_session()
+                api = session.xenapi
+                self._xapi_cache.bootstrap(api)
+                self.logger.info("XAPI event cache loaded "
+                                 f"({len(self._xapi_cache.records['vm'])} VM records)")
+                self._rebuild_vms_from_cache()
+                while not self.stop_event.is_set():
+                    changed = self._xapi_cache.pump(api, timeout=30.0)
+                    if changed & {'vm', 'vm_metrics', 'vm_guest_metrics', 'vbd', 'vdi', 'host'}:
+                        self._rebuild_vms_from_cache()
+            except Exception as e:
+                self._xapi_cache.reset()
+                msg = str(e)
+                if 'MESSAGE_METHOD_UNKNOWN' in msg or 'UNKNOWN_XENAPI_MESSAGE' in msg:
+                    # pre-6.x XAPI without event.from — stay on the polling path
+                    self._events_unsupported = True
+                    self.logger.warning("XAPI has no event.from, using per-object polling")
+                    return
+                if not self.stop_event.is_set():
+                    self.logger.debug(f"XAPI event loop: {e}")
+                self.stop_event.wait(10)
+            finally:
+                if session is not None:
+                    try:
+                        session.xenapi.session.logout()
+                    except Exception:
+                        pass
+
+    def _rebuild_vms_from_cache(self):
+        """VM list straight from the local records — no XAPI calls."""
+        try:
+            self._cached_vms = self._build_vms(self._xapi_cache)
+            self._vms_cache_time = time.time()
+        except Exception as e:
+            self.logger.debug(f"VM rebuild from event cache failed: {e}")
+
+    def _records(self, api):
+        """Record source for the builders: the event cache once it's loaded,
+        per-object XML-RPC otherwise."""
+        if self._xapi_cache.ready:
+            return self._xapi_cache
+        return _XapiRpcRecords(api)
+
     # ──────────────────────────────────────────
     # Cache refresh
     # ──────────────────────────────────────────
@@ -372,16 +548,16 @@ class XcpngManager:
     # ──────────────────────────────────────────
 
     def _fetch_nodes(self, api) -> list:
-        host_refs = api.host.get_all()
+        # records come from the event cache; the live counters below are RRD
+        # data sources, which XAPI doesn't raise events for, so those stay RPCs
+        src = self._records(api)
         nodes = []
-        for ref in host_refs:
-            rec = api.host.get_record(ref)
-            metrics_ref = rec.get('metrics', 'OpaqueRef:NULL')
+        for ref, rec in src.items('host'):
             mem_total = 0
             mem_free = 0
             try:
-                if metrics_ref != 'OpaqueRef:NULL':
-                    m = api.host_metrics.get_record(metrics_ref)
+                m = src.get('host_metrics', rec.get('metrics', _NULL_REF))
+                if m:
                     mem_total = int(m.get('memory_total', 0))
                     mem_free = int(m.get('memory_free', 0))
             except Exception:
@@ -417,7 +593,7 @@ class XcpngManager:
             netout = 0
             for pif_ref in rec.get('PIFs', []):
                 try:
-                    dev = api.PIF.get_device(pif_ref)
+                    dev = (src.get('PIF', pif_ref) or {}).get('device')
                     if not dev:
                         continue
                     # bytes/sec from XAPI data source
@@ -490,16 +666,14 @@ class XcpngManager:
     # ──────────────────────────────────────────
 
     def _fetch_vms(self, api) -> list:
+        return self._build_vms(self._records(api))
+
+    def _build_vms(self, src) -> list:
+        """VM rows from a record source (XapiRecordCache or _XapiRpcRecords)."""
         db = get_db()
-        vm_refs = api.VM.get_all()
         now = time.time()
         vms = []
-        for ref in vm_refs:
-            try:
-                rec = api.VM.get_record(ref)
-            except Exception:
-                continue
-
+        for ref, rec in src.items('VM'):
             # skip templates, control domains, snapshots
             if rec.get('is_a_template', False):
                 continue
@@ -512,13 +686,8 @@ class XcpngManager:
             vmid = db.xcpng_get_vmid(self.id, vm_uuid)
 
             # figure out which host its on
-            resident = rec.get('resident_on', 'OpaqueRef:NULL')
-            node_name = ''
-            if resident != 'OpaqueRef:NULL':
-                try:
-                    node_name = api.host.get_hostname(resident)
-                except Exception:
-                    pass
+            host_rec = src.get('host', rec.get('resident_on', _NULL_REF))
+            node_name = host_rec.get('hostname', '') if host_rec else ''
 
             power = rec.get('power_state', 'Halted')
             status = _POWER_STATE_MAP.get(power, 'unknown')
@@ -532,10 +701,9 @@ class XcpngManager:
             mem_actual = int(rec.get('memory_target', 0))
             vm_uptime = 0
 
-            vm_metrics_ref = rec.get('metrics', 'OpaqueRef:NULL')
-            if vm_metrics_ref != 'OpaqueRef:NULL' and power == 'Running':
+            vm_m = src.get('VM_metrics', rec.get('metrics', _NULL_REF)) if power == 'Running' else None
+            if vm_m:
                 try:
-                    vm_m = api.VM_metrics.get_record(vm_metrics_ref)
                     # average vCPU utilisation
                     utils = vm_m.get('VCPUs_utilisation', {})
                     if utils:
@@ -561,28 +729,23 @@ class XcpngManager:
             disk_total = 0
             for vbd_ref in rec.get('VBDs', []):
                 try:
-                    vbd_rec = api.VBD.get_record(vbd_ref)
-                    if vbd_rec.get('type') == 'Disk':
-                        vdi_ref = vbd_rec.get('VDI', 'OpaqueRef:NULL')
-                        if vdi_ref != 'OpaqueRef:NULL':
-                            vdi_size = int(api.VDI.get_virtual_size(vdi_ref))
-                            disk_total += vdi_size
+                    vbd_rec = src.get('VBD', vbd_ref)
+                    if vbd_rec and vbd_rec.get('type') == 'Disk':
+                        vdi_rec = src.get('VDI', vbd_rec.get('VDI', _NULL_REF))
+                        if vdi_rec:
+                            disk_total += int(vdi_rec.get('virtual_size', 0))
                 except Exception:
                     pass
 
-            # guest metrics for IP addresses (cheap XAPI call)
+            # guest metrics for IP addresses
             guest_ips = []
-            gm_ref = rec.get('guest_metrics', 'OpaqueRef:NULL')
-            if gm_ref != 'OpaqueRef:NULL' and power == 'Running':
-                try:
-                    gm_nets = api.VM_guest_metrics.get_networks(gm_ref)
-                    _seen = set()
-                    for gk, gv in gm_nets.items():
-                        if '/ip' in gk and gv not in _seen:
-                            _seen.add(gv)
-                            guest_ips.append(gv)
-                except Exception:
-                    pass
+            gm = src.get('VM_guest_metrics', rec.get('guest_metrics', _NULL_REF)) if power == 'Running' else None
+            if gm:
+                _seen = set()
+                for gk, gv in (gm.get('networks') or {}).items():
+                    if '/ip' in gk and gv not in _seen:
+                        _seen.add(gv)
+                        guest_ips.append(gv)
 
             vms.append({
                 'vmid': vmid,
@@ -2662,16 +2825,43 @@ class XcpngManager:
         if not vm_uuid:
             return {'success': False, 'error': f'VM {vmid} not found'}
 
+        try:
+            formatted = self._rrd_updates(
+                timeframe, 'false',
+                lambda rows, legends: self._format_vm_rrd(rows, legends, vm_uuid, node, vmid, vm_type, timeframe),
+                ('vm', vm_uuid, node, vmid, vm_type))
+        except RrdFetchError as e:
+            return {'success': False, 'error': str(e)}
+        return {'success': True, 'data': formatted}
+
+    def _rrd_updates(self, timeframe, host, render, view):
+        """rrd_updates rows through the shared RRD cache.
+
+        NS Oct 2026 — one cached series per cluster/timeframe holds every VM's
+        columns (host='false') or hosts + VMs (host='true'), so all charts of a
+        pool share one download. Refreshes ask for start=<newest cached row>
+        and only the new rows come back; `interval` pins the archive, otherwise
+        XAPI answers a recent start from the 5s archive and the steps mix.
+        """
         tf_seconds = {'hour': 3600, 'day': 86400, 'week': 604800,
                       'month': 2592000, 'year': 31536000}
-        start = int(time.time()) - tf_seconds.get(timeframe, 3600)
+        tf_interval = {'hour': 60, 'day': 3600, 'week': 3600, 'month': 86400, 'year': 86400}
 
-        legends, rows = self._rrd_fetch('rrd_updates', {
-            'start': start, 'cf': 'AVERAGE', 'host': 'false'
-        })
-        if legends is None:
-            return {'success': False, 'error': 'Could not fetch RRD data'}
+        def fetch(since):
+            start = int(since) if since is not None else int(time.time()) - tf_seconds.get(timeframe, 3600)
+            legends, rows = self._rrd_fetch('rrd_updates', {
+                'start': start, 'cf': 'AVERAGE', 'host': host,
+                'interval': tf_interval.get(timeframe, 60)
+            })
+            if legends is None:
+                raise RrdFetchError('Could not fetch RRD data')
+            return rows, legends
+
+        return cached_series(('xcpng', self.id, 'rrd_updates', host, timeframe), timeframe,
+                             fetch, render, view)
 
+    @staticmethod
+    def _format_vm_rrd(rows, legends, vm_uuid, node, vmid, vm_type, timeframe):
         # filter legend entries for this VM uuid
         vm_prefix = f"AVERAGE:vm:{vm_uuid}:"
         col_map = {}
@@ -2725,14 +2915,10 @@ class XcpngManager:
             formatted['metrics']['disk_read'].append(sum(vals[c] for c in dkr_cols))
             formatted['metrics']['disk_write'].append(sum(vals[c] for c in dkw_cols))
 
-        return {'success': True, 'data': formatted}
+        return formatted
 
     def get_node_rrddata(self, node: str, timeframe: str = 'hour'):
         """Get node metrics - same output shape as PegaProxManager."""
-        tf_seconds = {'hour': 3600, 'day': 86400, 'week': 604800,
-                      'month': 2592000, 'year': 31536000}
-        start = int(time.time()) - tf_seconds.get(timeframe, 3600)
-
         # resolve node -> host UUID
         api = self._api()
         host_uuid = None
@@ -2746,12 +2932,17 @@ class XcpngManager:
             except Exception:
                 pass
 
-        legends, rows = self._rrd_fetch('rrd_updates', {
-            'start': start, 'cf': 'AVERAGE', 'host': 'true'
-        })
-        if legends is None:
-            return {'success': False, 'error': 'Could not fetch RRD data'}
+        try:
+            formatted = self._rrd_updates(
+                timeframe, 'true',
+                lambda rows, legends: self._format_node_rrd(rows, legends, host_uuid, node, timeframe),
+                ('host', node, host_uuid))
+        except RrdFetchError as e:
+            return {'success': False, 'error': str(e)}
+        return {'success': True, 'data': formatted}
 
+    @staticmethod
+    def _format_node_rrd(rows, legends, host_uuid, node, timeframe):
         host_prefix = f"AVERAGE:host:{host_uuid}:" if host_uuid else "AVERAGE:host:"
         col_map = {}
         for i, leg in enumerate(legends):
@@ -2809,7 +3000,7 @@ class XcpngManager:
             formatted['metrics']['net_in'].append(sum(vals[c] for c in netin_cols))
             formatted['metrics']['net_out'].append(sum(vals[c] for c in netout_cols))
 
-        return {'success': True, 'data': formatted}
+        return formatted
 
     # ──────────────────────────────────────────
     # Guest metrics (IP, OS, PV driver status)
@@ -23,6 +23,8 @@ class MaintenanceTask:
         self.acknowledged = False
         self.native_ha = False  # NS feb 2026 - tracks if Proxmox native HA maintenance was used
         self.note = None  # NS jul 2026 - informational note (e.g. single-node: no evacuation target)
+        self.running_vms = []  # NS oct 2026 - guests in flight (migration queue runs several at once)
+        self.eta_seconds = None
 
     def to_dict(self):
         return {
@@ -38,7 +40,9 @@ class MaintenanceTask:
             'error': self.error,
             'acknowledged': self.acknowledged,
             'native_ha': self.native_ha,
-            'note': self.note
+            'note': self.note,
+            'running_vms': self.running_vms,
+            'eta_seconds': self.eta_seconds,
         }
 
 
@@ -98,6 +102,9 @@ class PegaProxConfig:
         # MK Jul 2026 (#426) — opt-in: derive affinity/anti-affinity/ignore/pin
         # placement rules from ProxLB-convention VM tags. Off = zero change.
         self.proxlb_tags_enabled = cluster_data.get('proxlb_tags_enabled', False)
+        # NS Oct 2026 — migration queue caps for bulk migrate / evacuation (0 = default)
+        self.migration_max_parallel = cluster_data.get('migration_max_parallel', 0)
+        self.migration_max_per_node = cluster_data.get('migration_max_per_node', 0)
         self.dry_run = cluster_data.get('dry_run', False)
         self.enabled = cluster_data.get('enabled', True)
         self.ha_enabled = cluster_data.get('ha_enabled', False)
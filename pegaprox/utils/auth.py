@@ -18,6 +18,7 @@ import base64
 from datetime import datetime, timedelta
 from functools import wraps
 from pathlib import Path
+from types import MappingProxyType
 
 from flask import request, jsonify
 
@@ -34,7 +35,7 @@ from pegaprox.globals import (
     task_pegaprox_users_cache, task_pegaprox_users_lock,
     sessions_lock,
 )
-from pegaprox.core.db import get_db, ENCRYPTION_AVAILABLE
+from pegaprox.core.db import get_db, ENCRYPTION_AVAILABLE, bump_auth_generation, get_auth_generation
 from pegaprox.core.config import get_fernet
 from pegaprox.models.permissions import ROLE_ADMIN, ROLE_USER, ROLE_VIEWER, PERMISSIONS, ROLE_PERMISSIONS
 # MK: record the real client IP (XFF/X-Real-IP via trusted-proxy) for sessions/tokens,
@@ -628,6 +629,7 @@ def invalidate_session(session_id: str):
             del active_sessions[session_id]
             removed = True
     if removed:
+        bump_auth_generation()
         save_sessions()
 
 def invalidate_all_user_sessions(username: str, except_session: str = None):
@@ -644,6 +646,7 @@ def invalidate_all_user_sessions(username: str, except_session: str = None):
                 sessions_removed += 1
 
     if sessions_removed > 0:
+        bump_auth_generation()
         save_sessions()
         logging.info(f"Invalidated {sessions_removed} sessions for user '{username}'")
 
@@ -777,7 +780,8 @@ def validate_api_token(token: str) -> dict:
             'last_activity': time.time(),
             'api_token': True,  # NS: Flag to identify token auth vs session auth
             'token_name': row_dict['name'],
-            'token_id': row_dict['id']
+            'token_id': row_dict['id'],
+            'expires_at': row_dict.get('expires_at'),
         }
     except Exception as e:
         logging.error(f"[APIToken] Validation error: {e}")
@@ -844,6 +848,7 @@ def revoke_api_token(token_id: int, username: str) -> bool:
         db.conn.commit()
         
         if cursor.rowcount > 0:
+            bump_auth_generation()
             logging.info(f"[APIToken] Revoked token id={token_id} for user '{username}'")
             return True
         return False
@@ -852,117 +857,242 @@ def revoke_api_token(token_id: int, username: str) -> bool:
         return False
 
 
+# NS Oct 2026 — auth context cache. Every authed request used to do
+# get_user() (SELECT + AES-GCM decrypt of the TOTP fields) and re-resolve
+# role + custom-role permissions, and API tokens additionally did a SELECT and
+# an UPDATE+commit for last_used_at. The SPA polls dozens of endpoints per
+# second per operator, so that was most of the request latency. The resolved
+# context is now cached per session id / token hash and dropped as soon as the
+# global auth generation moves (user / role / tenant / ACL writes, logout,
+# token revocation — see core/db.py bump_auth_generation). The TTL is only a
+# backstop for writes that bypass those paths (manual SQL, restores).
+AUTH_CACHE_TTL = 60
+_AUTH_CACHE_MAX = 5000
+_auth_cache = {}
+_auth_cache_lock = threading.Lock()
+_auth_cache_stats = {'hits': 0, 'misses': 0, 'checks': 0, 'seconds_total': 0.0, 'seconds_max': 0.0}
+
+
+def auth_cache_stats() -> dict:
+    with _auth_cache_lock:
+        out = dict(_auth_cache_stats)
+        out['entries'] = len(_auth_cache)
+    return out
+
+
+def clear_auth_cache():
+    with _auth_cache_lock:
+        _auth_cache.clear()
+
+
+def _token_key(token: str) -> str:
+    return 't:' + hashlib.sha256(token.encode()).hexdigest()
+
+
+def _cached_context(key, username=None):
+    """Cached context for key if still current, else None."""
+    with _auth_cache_lock:
+        ctx = _auth_cache.get(key)
+        if ctx is not None and (ctx['gen'] != get_auth_generation()
+                                or time.time() - ctx['ts'] > AUTH_CACHE_TTL
+                                or (username is not None and ctx['username'] != username)):
+            _auth_cache.pop(key, None)
+            ctx = None
+        _auth_cache_stats['hits' if ctx is not None else 'misses'] += 1
+        return ctx
+
+
+def _build_context(key, session):
+    """Resolve user, effective role, permission set and tenant for a session.
+
+    Returns None when the user record is gone (caller fails closed).
+    """
+    from pegaprox.utils.rbac import get_user_permissions
+    # generation is read BEFORE the DB so a write racing with us leaves the
+    # entry stale instead of caching pre-write data under the new generation
+    gen = get_auth_generation()
+    # H2 (scale audit): fetch ONLY the acting user (indexed, O(1)) instead of
+    # SELECT *-ing + decrypting the entire users table on every authed request.
+    # get_user() builds the identical dict get_all_users() would for this row.
+    try:
+        user = get_db().get_user(session['user'])
+    except Exception:
+        user = load_users().get(session['user'])
+    if user is None:
+        return None
+
+    # MK May 2026 (CodeAnt CWE-269) — DO NOT refresh role from the user record
+    # when this is an API-token session. The token has its own role bound at
+    # creation (e.g. an admin creating a 'viewer' token for CI/CD); refreshing
+    # to user.role would silently escalate every restricted token to its
+    # owner's current global role. For session-auth (interactive login) we
+    # still refresh so an admin-side role change applies on the next request.
+    if session.get('api_token'):
+        # Floor at min(token_role, user_current_role) — if user got demoted
+        # since token creation, follow them down so the token can't outrank
+        # its owner. Won't auto-escalate.
+        _hier = {ROLE_ADMIN: 3, ROLE_USER: 2, ROLE_VIEWER: 1}
+        token_lvl = _hier.get(session.get('role'), 1)
+        user_lvl = _hier.get(user.get('role'), 1)
+        eff_lvl = min(token_lvl, user_lvl)
+        role = next((r for r, lvl in _hier.items() if lvl == eff_lvl), ROLE_VIEWER)
+        # H-3 (security audit): for API-token auth, evaluate perms against the
+        # token's effective (floored) ROLE — never the owner's. has_permission()
+        # short-circuits True for an admin user, so checking the owner dict let an
+        # admin-owned 'viewer' token inherit every permission on perms=-guarded
+        # routes (priv-esc). We scope to the role's own permissions only — the
+        # owner's interactive extra perms / group grants do NOT extend to a
+        # token — while still honouring the owner's denials.
+        perm_user = {
+            'role': role,
+            'permissions': [],
+            'denied_permissions': user.get('denied_permissions', []),
+            'tenant_id': user.get('tenant_id'),
+        }
+    else:
+        # NS Mar 2026 - refresh role from DB, session might be stale after admin change
+        role = user.get('role', session['role'])
+        perm_user = user
+
+    # same short-circuit as has_permission(): admins hold every permission
+    if perm_user.get('effective_role', perm_user.get('role')) == ROLE_ADMIN:
+        permissions = None
+    else:
+        permissions = frozenset(get_user_permissions(perm_user))
+
+    ctx = {
+        'gen': gen,
+        'ts': time.time(),
+        'username': session['user'],
+        'user': user,
+        'role': role,
+        'permissions': permissions,
+        'tenant_id': user.get('tenant_id'),
+    }
+    if session.get('api_token'):
+        ctx['session'] = dict(session)
+        exp = session.get('expires_at')
+        ctx['expires_ts'] = datetime.fromisoformat(exp).timestamp() if exp else None
+    with _auth_cache_lock:
+        if len(_auth_cache) >= _AUTH_CACHE_MAX:
+            _auth_cache.clear()
+        _auth_cache[key] = ctx
+    return ctx
+
+
+def _resolve_auth():
+    """(session, ctx) for the current request, or (None, error_response)."""
+    session = None
+    ctx = None
+
+    # MK: Feb 2026 - Check API token first (Authorization: Bearer pgx_...)
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer pgx_'):
+        token = auth_header[7:]  # Strip 'Bearer '
+        key = _token_key(token)
+        ctx = _cached_context(key)
+        # a hit skips the token SELECT and the last_used_at UPDATE; expiry is
+        # re-checked here, revocation bumps the generation
+        if ctx is not None and ctx['expires_ts'] and time.time() > ctx['expires_ts']:
+            with _auth_cache_lock:
+                _auth_cache.pop(key, None)
+            ctx = None
+        if ctx is not None:
+            session = dict(ctx['session'])
+        else:
+            session = validate_api_token(token)
+            if session:
+                ctx = _build_context(key, session)
+                if ctx is None:
+                    return None, (jsonify({'error': 'Account no longer exists', 'code': 'ACCOUNT_DELETED'}), 401)
+
+    # Fall back to session auth (X-Session-ID header or cookie)
+    if not session:
+        session_id = request.headers.get('X-Session-ID') or request.cookies.get('session_id')
+        # expiry / IP binding / last_activity stay per request (in-memory, cheap)
+        session = validate_session(session_id)
+        if not session:
+            return None, (jsonify({'error': 'Unauthorized', 'code': 'AUTH_REQUIRED'}), 401)
+        key = 's:' + session_id
+        ctx = _cached_context(key, session['user']) or _build_context(key, session)
+        # NS Jul 2026 (CodeAnt exploitation / off-boarding bypass) — FAIL CLOSED when the
+        # acting user's record is gone. The old `get_user() or {}` swallowed a DELETED user
+        # into {}, so `{}.get('enabled', True)` == True passed the disabled-check and
+        # `fresh_role` fell back to the stale session role → a deleted user (or their still
+        # valid pgx_ API token) kept access until the session expired. A missing record now
+        # means "no longer exists" → reject. This covers BOTH session and API-token auth,
+        # since both resolve the acting user here.
+        if ctx is None:
+            return None, (jsonify({'error': 'Account no longer exists', 'code': 'ACCOUNT_DELETED'}), 401)
+        if ctx['role'] != session['role']:
+            session['role'] = ctx['role']
+
+    return session, ctx
+
+
 def require_auth(roles: list = None, perms: list = None):
     """auth decorator for protected routes
 
     MK: main auth guard - use on all protected routes
     LW: Feb 2026 - now also accepts API tokens (Bearer pgx_...)
+    NS: Oct 2026 - user/role/permissions come from the auth context cache
     """
     def decorator(f):
         from functools import wraps
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            session = None
-            
-            # MK: Feb 2026 - Check API token first (Authorization: Bearer pgx_...)
-            auth_header = request.headers.get('Authorization', '')
-            if auth_header.startswith('Bearer pgx_'):
-                token = auth_header[7:]  # Strip 'Bearer '
-                session = validate_api_token(token)
-            
-            # Fall back to session auth (X-Session-ID header or cookie)
-            if not session:
-                session_id = request.headers.get('X-Session-ID') or request.cookies.get('session_id')
-                session = validate_session(session_id)
-            
-            if not session:
-                return jsonify({'error': 'Unauthorized', 'code': 'AUTH_REQUIRED'}), 401
-            
-            # NS: Feb 2026 - Check if user was disabled while session/token is still active
-            # H2 (scale audit): fetch ONLY the acting user (indexed, O(1)) instead of
-            # SELECT *-ing + decrypting the entire users table on every authed request.
-            # get_user() builds the identical dict get_all_users() would for this row.
-            try:
-                user = get_db().get_user(session['user'])
-            except Exception:
-                user = load_users().get(session['user'])
-            # NS Jul 2026 (CodeAnt exploitation / off-boarding bypass) — FAIL CLOSED when the
-            # acting user's record is gone. The old `get_user() or {}` swallowed a DELETED user
-            # into {}, so `{}.get('enabled', True)` == True passed the disabled-check and
-            # `fresh_role` fell back to the stale session role → a deleted user (or their still
-            # valid pgx_ API token) kept access until the session expired. A missing record now
-            # means "no longer exists" → reject. This covers BOTH session and API-token auth,
-            # since both resolve the acting user here.
-            if user is None:
-                return jsonify({'error': 'Account no longer exists', 'code': 'ACCOUNT_DELETED'}), 401
-            # stash for check_cluster_access et al. so cluster-scoped routes don't refetch
+            t0 = time.perf_counter()
+            session, ctx = _resolve_auth()
+            if session is None:
+                _record_auth_latency(t0)
+                return ctx
+
+            user = ctx['user']
+            # stash for check_cluster_access et al. so cluster-scoped routes don't refetch;
+            # the cached dict is shared between requests, so routes get a read-only
+            # view of it (dict(g.current_user) for a private copy)
             try:
                 from flask import g as _g
-                _g.current_user = user
+                _g.current_user = MappingProxyType(user)
+                _g.auth_context = {'role': ctx['role'], 'permissions': ctx['permissions'],
+                                   'tenant_id': ctx['tenant_id']}
             except Exception:
                 pass
+            # NS: Feb 2026 - Check if user was disabled while session/token is still active
             if not user.get('enabled', True):
+                _record_auth_latency(t0)
                 return jsonify({'error': 'Account is disabled', 'code': 'ACCOUNT_DISABLED'}), 401
-            
-            # MK May 2026 (CodeAnt CWE-269) — DO NOT refresh role from the user record
-            # when this is an API-token session. The token has its own role bound at
-            # creation (e.g. an admin creating a 'viewer' token for CI/CD); refreshing
-            # to user.role would silently escalate every restricted token to its
-            # owner's current global role. For session-auth (interactive login) we
-            # still refresh so an admin-side role change applies on the next request.
-            if session.get('api_token'):
-                # Floor at min(token_role, user_current_role) — if user got demoted
-                # since token creation, follow them down so the token can't outrank
-                # its owner. Won't auto-escalate.
-                _hier = {ROLE_ADMIN: 3, ROLE_USER: 2, ROLE_VIEWER: 1}
-                token_lvl = _hier.get(session.get('role'), 1)
-                user_lvl = _hier.get(user.get('role'), 1)
-                eff_lvl = min(token_lvl, user_lvl)
-                fresh_role = next((r for r, lvl in _hier.items() if lvl == eff_lvl), ROLE_VIEWER)
-                # Don't mutate session['role'] — keep the original token-bound value
-                # in the session dict for audit/log purposes; fresh_role drives the
-                # role check below.
-            else:
-                # NS Mar 2026 - refresh role from DB, session might be stale after admin change
-                fresh_role = user.get('role', session['role'])
-                if fresh_role != session['role']:
-                    session['role'] = fresh_role
 
             # Check role if specified
-            if roles and fresh_role not in roles:
+            if roles and ctx['role'] not in roles:
+                _record_auth_latency(t0)
                 return jsonify({'error': 'Forbidden', 'code': 'INSUFFICIENT_PERMISSIONS'}), 403
-            
-            # check permissions if specified
-            if perms:
-                from pegaprox.utils.rbac import has_permission
-                # H-3 (security audit): for API-token auth, evaluate perms against the
-                # token's effective (floored) ROLE — never the owner's. has_permission()
-                # short-circuits True for an admin user, so checking the owner dict let an
-                # admin-owned 'viewer' token inherit every permission on perms=-guarded
-                # routes (priv-esc). fresh_role already floors token_role to the owner's
-                # current role (can't escalate, follows demotions). We scope to the role's
-                # own permissions only — the owner's interactive extra perms / group grants
-                # do NOT extend to a token — while still honouring the owner's denials.
-                if session.get('api_token'):
-                    perm_user = {
-                        'role': fresh_role,
-                        'permissions': [],
-                        'denied_permissions': user.get('denied_permissions', []),
-                        'tenant_id': user.get('tenant_id'),
-                    }
-                else:
-                    perm_user = user
+
+            # check permissions if specified (token sessions were already scoped
+            # to the floored token role in _build_context)
+            if perms and ctx['permissions'] is not None:
                 for p in perms:
-                    if not has_permission(perm_user, p):
+                    if p not in ctx['permissions']:
+                        _record_auth_latency(t0)
                         return jsonify({'error': 'Permission denied', 'code': 'MISSING_PERMISSION', 'required': p}), 403
-            
+
             # Add session info to request context
             request.session = session
-            
+            _record_auth_latency(t0)
+
             return f(*args, **kwargs)
         return decorated_function
     return decorator
 
+
+def _record_auth_latency(t0):
+    dt = time.perf_counter() - t0
+    with _auth_cache_lock:
+        _auth_cache_stats['checks'] += 1
+        _auth_cache_stats['seconds_total'] += dt
+        if dt > _auth_cache_stats['seconds_max']:
+            _auth_cache_stats['seconds_max'] = dt
+
 def cleanup_expired_sessions():
     """Remove expired sessions
 
@@ -41,8 +41,10 @@ def get_paramiko():
 # MK: This made the dashboard like 5x faster, totally worth it
 # ============================================
 
-def run_concurrent(tasks: list, timeout: float = 30.0) -> list:
-    """Run tasks concurrently with gevent pool"""
+def run_concurrent(tasks: list, timeout: float = 30.0, kill: bool = False) -> list:
+    """Run tasks concurrently with gevent pool. Tasks still running at the
+    timeout give None; with kill=True they are also killed instead of being
+    left to finish in the pool."""
     # NS: chatgpt helped with this one, i was mass confused about greenlets
     # TODO: maybe add retry logic? - MK
     #
@@ -62,7 +64,10 @@ def run_concurrent(tasks: list, timeout: float = 30.0) -> list:
             # Wait for all with timeout
             from gevent import joinall
             joinall(greenlets, timeout=timeout)
-            
+            if kill:
+                from gevent import killall
+                killall([g for g in greenlets if not g.ready()], block=False)
+
             results = []
             for g in greenlets:
                 try:
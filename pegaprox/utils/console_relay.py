@@ -0,0 +1,300 @@
+"""Shared plumbing for the VNC / console relays.
+
+Every console byte PegaProx moves goes through one of three paths — the
+asyncio WebSocket server (vnc_handler), the flask-sock proxy on the main port
+(vnc_websocket_proxy) or the HTTP long-poll fallback (vnc_polling). On top of
+that the SSH tunnel (vnc_tunnel) pipes the PegaProx↔PVE leg. This module holds
+the parts they share:
+
+  - admission: one process-wide cap on concurrent console sessions. A new
+    session past the cap is refused up front (503 / close 1013) instead of
+    eating fds and greenlets until the box tips over.
+  - per-session metrics: bytes + chunks per direction, recent throughput and
+    relay latency (how long a chunk sat in PegaProx before it went out).
+  - pump(): cooperative copy loop with an adaptive read size. Under the gevent
+    monkeypatch recv/send just park the greenlet — no select() thread per
+    connection anymore.
+  - FrameCoalescer: byte queue for the long-poll path, so one recv returns one
+    batched (and once-encrypted) frame instead of N tiny ones.
+
+NS Oct 2026 — replaces the per-connection select threads in vnc_tunnel and the
+per-chunk encrypt/deque in vnc_polling.
+"""
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import deque
+
+MAX_CONSOLE_SESSIONS = int(os.environ.get('PEGAPROX_MAX_CONSOLE_SESSIONS', 200))
+BUF_MIN = 16 * 1024
+BUF_MAX = 256 * 1024
+COALESCE_WINDOW = 0.008          # linger after the first chunk so a framebuffer update lands in one poll
+COALESCE_MAX = 1024 * 1024       # never hand more than this to one long-poll response
+_RATE_WINDOW = 2.0               # throughput is measured over windows of this length
+_LAT_ALPHA = 0.2                 # EWMA weight of the newest latency sample
+
+
+class ConsoleCapacityError(Exception):
+    """Raised by admit() when MAX_CONSOLE_SESSIONS sessions are already open."""
+
+
+def spawn(fn, *args, name=None):
+    """Run fn(*args) as a greenlet when gevent owns the socket module, else as
+    a daemon thread (standalone scripts, the vnc_tunnel self-test)."""
+    try:
+        from gevent import monkey, spawn as _gspawn
+        if monkey.is_module_patched('socket'):
+            return _gspawn(fn, *args)
+    except ImportError:
+        pass
+    t = threading.Thread(target=fn, args=args, name=name, daemon=True)
+    t.start()
+    return t
+
+
+class AdaptiveBuffer:
+    """Read size for a pump. Starts at BUF_MIN, doubles while reads come back
+    full (bulk framebuffer updates), halves after a run of small reads
+    (keystrokes, cursor moves) so idle sessions don't pin 256K each."""
+
+    def __init__(self, lo=BUF_MIN, hi=BUF_MAX):
+        self.lo, self.hi = lo, hi
+        self.size = lo
+        self._small = 0
+
+    def feed(self, n):
+        if n >= self.size:
+            self.size = min(self.hi, self.size * 2)
+            self._small = 0
+        elif n < self.size // 8:
+            self._small += 1
+            if self._small >= 8 and self.size > self.lo:
+                self.size = max(self.lo, self.size // 2)
+                self._small = 0
+        else:
+            self._small = 0
+        return self.size
+
+
+class RelaySession:
+    """Counters for one admitted console session. Directions are 'up'
+    (browser → guest) and 'down' (guest → browser)."""
+
+    def __init__(self, registry, kind, cluster_id='', vmid=None, user=''):
+        self.id = secrets.token_hex(4)
+        self.kind = kind
+        self.cluster_id = cluster_id or ''
+        self.vmid = vmid
+        self.user = user or ''
+        self.started = time.monotonic()
+        self.bytes = {'up': 0, 'down': 0}
+        self.chunks = {'up': 0, 'down': 0}
+        self.rate = {'up': 0.0, 'down': 0.0}
+        self.latency = 0.0
+        self.latency_max = 0.0
+        self._win = {'up': [self.started, 0], 'down': [self.started, 0]}
+        self._registry = registry
+        self._lock = threading.Lock()
+        self._released = False
+
+    def record(self, direction, n, latency=None):
+        now = time.monotonic()
+        with self._lock:
+            self.bytes[direction] += n
+            self.chunks[direction] += 1
+            win = self._win[direction]
+            win[1] += n
+            if now - win[0] >= _RATE_WINDOW:
+                self.rate[direction] = win[1] / (now - win[0])
+                win[0], win[1] = now, 0
+            if latency is not None:
+                self.latency = latency if not self.latency else \
+                    _LAT_ALPHA * latency + (1 - _LAT_ALPHA) * self.latency
+                self.latency_max = max(self.latency_max, latency)
+        self._registry._count(direction, n)
+
+    def snapshot(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            rates = {}
+            for d, (t0, n) in self._win.items():
+                # a window that has been open too long means the stream went
+                # quiet — report what it moved since, not the last busy window
+                rates[d] = round(n / (now - t0), 1) if now - t0 >= 2 * _RATE_WINDOW else round(self.rate[d], 1)
+            return {
+                'id': self.id, 'kind': self.kind, 'cluster_id': self.cluster_id,
+                'vmid': self.vmid, 'user': self.user,
+                'age_seconds': round(now - self.started, 1),
+                'bytes_up': self.bytes['up'], 'bytes_down': self.bytes['down'],
+                'chunks_up': self.chunks['up'], 'chunks_down': self.chunks['down'],
+                'bytes_per_sec_up': rates['up'], 'bytes_per_sec_down': rates['down'],
+                'latency_ms': round(self.latency * 1000, 2),
+                'latency_max_ms': round(self.latency_max * 1000, 2),
+            }
+
+    def release(self):
+        self._registry.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class ConsoleRelayRegistry:
+    """Process-wide set of open console sessions with a hard cap."""
+
+    def __init__(self, cap=MAX_CONSOLE_SESSIONS):
+        self.cap = max(1, int(cap))
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.rejected = 0
+        self.bytes = {'up': 0, 'down': 0}
+
+    def admit(self, kind, cluster_id='', vmid=None, user=''):
+        with self._lock:
+            if len(self._sessions) >= self.cap:
+                self.rejected += 1
+                raise ConsoleCapacityError(
+                    f"console session limit reached ({self.cap} open) — try again shortly")
+            sess = RelaySession(self, kind, cluster_id, vmid, user)
+            self._sessions[sess.id] = sess
+            self.admitted += 1
+        return sess
+
+    def release(self, sess):
+        with self._lock:
+            if sess._released:
+                return
+            sess._released = True
+            self._sessions.pop(sess.id, None)
+
+    def _count(self, direction, n):
+        # racy += on an int is fine under gevent (no preemption between greenlets)
+        self.bytes[direction] += n
+
+    def active(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def guests(self, cluster_id):
+        with self._lock:
+            return {s.vmid for s in self._sessions.values()
+                    if s.cluster_id == cluster_id and s.vmid is not None}
+
+    def stats(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            out = {'active': len(sessions), 'cap': self.cap, 'admitted': self.admitted,
+                   'rejected': self.rejected, 'bytes_up': self.bytes['up'],
+                   'bytes_down': self.bytes['down']}
+        now = time.monotonic()
+        out['sessions'] = [s.snapshot(now) for s in sessions]
+        return out
+
+
+_registry = ConsoleRelayRegistry()
+
+
+def admit(kind, cluster_id='', vmid=None, user=''):
+    """Reserve a console slot. Raises ConsoleCapacityError when full; the
+    caller must release() the returned session when the console closes."""
+    return _registry.admit(kind, cluster_id, vmid, user)
+
+
+def stats():
+    return _registry.stats()
+
+
+def open_guests(cluster_id):
+    """vmids of `cluster_id` with a console open right now."""
+    return _registry.guests(cluster_id)
+
+
+def pump(recv, send, session=None, direction='down', on_end=None, tag='relay'):
+    """Copy recv(n) → send(data) until recv returns nothing or either side
+    raises. recv gets the current adaptive read size. Latency recorded per
+    chunk is the time send() took, i.e. how long the far side pushed back."""
+    buf = AdaptiveBuffer()
+    try:
+        while True:
+            data = recv(buf.size)
+            if not data:
+                break
+            t0 = time.monotonic()
+            send(data)
+            buf.feed(len(data))
+            if session is not None:
+                session.record(direction, len(data), time.monotonic() - t0)
+    except Exception as e:
+        logging.debug(f"[{tag}] pump {direction} ended: {e}")
+    finally:
+        if on_end is not None:
+            try:
+                on_end()
+            except Exception:
+                pass
+
+
+class FrameCoalescer:
+    """Producer/consumer byte queue for long-poll clients.
+
+    put() is called per chunk from the upstream reader, take() by the poll
+    handler. take() waits for the first chunk, then lingers `window` seconds
+    so the rest of a burst joins the same response, and returns everything
+    queued (up to max_batch) as one bytes object plus the age of the oldest
+    chunk in it.
+    """
+
+    def __init__(self, window=COALESCE_WINDOW, max_batch=COALESCE_MAX):
+        self.window = window
+        self.max_batch = max_batch
+        self._q = deque()
+        self._queued = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+    @property
+    def queued(self):
+        return self._queued
+
+    def put(self, data):
+        with self._cond:
+            self._q.append((data, time.monotonic()))
+            self._queued += len(data)
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def take(self, max_wait):
+        deadline = time.monotonic() + max(0.0, max_wait)
+        with self._cond:
+            while not self._q and not self._closed:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return b'', 0.0
+                self._cond.wait(timeout=left)
+            if self._q and not self._closed and self._queued < self.max_batch and self.window > 0:
+                linger_until = time.monotonic() + self.window
+                while self._queued < self.max_batch and not self._closed:
+                    left = linger_until - time.monotonic()
+                    if left <= 0:
+                        break
+                    self._cond.wait(timeout=left)
+            if not self._q:
+                return b'', 0.0
+            oldest = self._q[0][1]
+            parts, size = [], 0
+            while self._q and (not parts or size + len(self._q[0][0]) <= self.max_batch):
+                data, _ = self._q.popleft()
+                parts.append(data)
+                size += len(data)
+            self._queued -= size
+        return b''.join(parts), time.monotonic() - oldest
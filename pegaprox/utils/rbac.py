@@ -5,6 +5,7 @@ Custom roles, tenants, VM ACLs, pool membership cache.
 """
 
 import os
+import copy
 import json
 import time
 import logging
@@ -22,7 +23,7 @@ from pegaprox.models.permissions import (
     ROLE_ADMIN, ROLE_USER, ROLE_VIEWER, BUILTIN_ROLES,
     PERMISSIONS, ROLE_PERMISSIONS,
 )
-from pegaprox.core.db import get_db
+from pegaprox.core.db import get_db, bump_auth_generation, get_auth_generation
 
 def load_custom_roles() -> dict:
     """Load custom roles from SQLite database
@@ -124,6 +125,7 @@ def save_custom_roles(roles: dict):
                 ))
         
         db.conn.commit()
+        bump_auth_generation()
     except Exception as e:
         logging.error(f"Failed to save custom roles: {e}")
 
@@ -139,6 +141,7 @@ def get_custom_roles():
 def invalidate_roles_cache():
     global _custom_roles_cache
     _custom_roles_cache = None
+    bump_auth_generation()
 
 def get_role_permissions_for_user(user: dict, tenant_id: str = None) -> list:
     """Get permissions for a role, considering custom roles
@@ -923,6 +926,181 @@ def get_user_vms(user: dict, cluster_id: str) -> list:
     return allowed_vms if allowed_vms else None
 
 
+# =============================================================================
+# NS Oct 2026 — VM visibility engine
+# List endpoints called user_can_access_vm() per row, i.e. ACL lookup + pool
+# lookup + a pool_permissions SELECT + tenant resolution for every VM — tens of
+# thousands of evaluations for one non-admin list on a 10k-VM cluster. The
+# decision only depends on (user, cluster, permission), so it is materialized
+# once as a few frozensets and every row becomes an O(1) membership test.
+# Entries are rebuilt per (user, cluster) when that cluster's ACL rows, its pool
+# membership map or the auth generation (pool grants, tenants, roles) change.
+# =============================================================================
+
+_VM_VISIBILITY_TTL = 30.0   # backstop, same idea as _VM_ACLS_TTL
+_vm_visibility_cache = {}
+_vm_visibility_lock = threading.Lock()
+
+# inherit_role=True ACL rows grant exactly this set (see user_can_access_vm)
+_ACL_FULL_VM_PERMS = ('vm.view', 'vm.start', 'vm.stop', 'vm.restart', 'vm.console',
+                      'vm.snapshot', 'vm.migrate', 'vm.clone', 'vm.config', 'vm.backup')
+
+
+class VmVisibility:
+    """Materialized VM access decision for one (user, cluster, permission).
+
+    allow / deny: str vmids decided by an ACL row (they win over everything)
+    pool_keys:    'vmid:type' members of pools that grant the permission
+    default:      answer for any other VM (tenant + role fall-through)
+    scoped:       if set, `default` only applies to these int vmids
+    """
+    __slots__ = ('allow', 'deny', 'pool_keys', 'pool_members', 'default', 'scoped')
+
+    def __init__(self, allow=(), deny=(), pool_keys=(), pool_members=(), default=True, scoped=None):
+        self.allow = frozenset(allow)
+        self.deny = frozenset(deny)
+        self.pool_keys = frozenset(pool_keys)
+        self.pool_members = frozenset(pool_members)
+        self.default = default
+        self.scoped = frozenset(scoped) if scoped is not None else None
+
+    def can(self, vmid, vm_type=None) -> bool:
+        sv = str(vmid)
+        if sv in self.allow:
+            return True
+        if sv in self.deny:
+            return False
+        if self.pool_keys:
+            # same lookup order as get_vm_pool_cached()
+            if vm_type:
+                key = f"{vmid}:{vm_type}"
+            else:
+                key = f"{vmid}:qemu" if f"{vmid}:qemu" in self.pool_members else f"{vmid}:lxc"
+            if key in self.pool_keys:
+                return True
+        if not self.default:
+            return False
+        if self.scoped is not None:
+            try:
+                return int(vmid) in self.scoped
+            except (ValueError, TypeError):
+                return False
+        return True
+
+    def filter(self, rows, vmid_key='vmid', type_key='type'):
+        can = self.can
+        if type_key:
+            return [r for r in rows if can(r.get(vmid_key), r.get(type_key))]
+        return [r for r in rows if can(r.get(vmid_key))]
+
+
+_VISIBLE_ALL = VmVisibility()
+
+
+def _visibility_user_key(user: dict):
+    return (
+        user.get('username', ''), user.get('role'), user.get('effective_role'), user.get('tenant_id'),
+        tuple(user.get('permissions') or ()), tuple(user.get('denied_permissions') or ()),
+        json.dumps(user.get('tenant_permissions') or {}, sort_keys=True),
+        tuple(user.get('groups') or ()),
+    )
+
+
+def _build_vm_visibility(user, cluster_id, permission, cluster_acls, membership):
+    """Same decision as user_can_access_vm(), for every vmid of the cluster at once."""
+    username = user.get('username', '')
+
+    allow, deny, acl_scoped = set(), set(), set()
+    for v, acl in cluster_acls.items():
+        users = acl.get('users', []) or []
+        if username in users:
+            try:
+                acl_scoped.add(int(v))
+            except (ValueError, TypeError):
+                pass
+        if username in users or '*' in users:
+            perms = _ACL_FULL_VM_PERMS if acl.get('inherit_role', True) else (acl.get('permissions') or [])
+            (allow if permission in perms else deny).add(str(v))
+
+    pool_keys = set()
+    has_pool_grant = False
+    scoped_vms = set(acl_scoped)
+    try:
+        _pp = get_db().get_user_pool_permissions(cluster_id, username, user.get('groups', [])) or {}
+        granting = {pid for pid, perms in _pp.items() if perms and ('pool.admin' in perms or permission in perms)}
+        visible_pools = {pid for pid, perms in _pp.items() if perms}
+        has_pool_grant = bool(visible_pools)
+        for key, pid in membership.items():
+            if pid in granting:
+                pool_keys.add(key)
+            if pid in visible_pools:
+                try:
+                    scoped_vms.add(int(key.split(':', 1)[0]))
+                except (ValueError, IndexError):
+                    continue
+    except Exception as e:
+        logging.error(f"[VM-VIS] pool lookup failed for {username}@{cluster_id}: {e} → fail closed")
+        has_pool_grant = True   # unknown → scoped, never widen to the cluster
+
+    # tenant + role fall-through, including the ACL/pool confinement
+    tenant_clusters = get_user_clusters(user, include_pools=False)
+    if tenant_clusters is not None and cluster_id not in tenant_clusters:
+        default = False
+    else:
+        default = has_permission(user, permission)
+    scoped = scoped_vms if (acl_scoped or has_pool_grant) else None
+
+    return VmVisibility(allow, deny, pool_keys, membership.keys(), default, scoped)
+
+
+def get_vm_visibility(user: dict, cluster_id: str, permission: str = 'vm.view') -> VmVisibility:
+    """VmVisibility equivalent to calling user_can_access_vm(user, cluster_id, vmid,
+    permission, vm_type) for each VM — use it wherever a list gets filtered."""
+    if user.get('effective_role', user.get('role')) == ROLE_ADMIN:
+        return _VISIBLE_ALL
+
+    cluster_acls = get_vm_acls().get(cluster_id, {})
+    try:
+        membership = get_pool_membership_cache(cluster_id)
+    except Exception:
+        membership = {}
+    gen = get_auth_generation()
+    key = (_visibility_user_key(user), cluster_id, permission)
+    now = time.monotonic()
+
+    with _vm_visibility_lock:
+        entry = _vm_visibility_cache.get(key)
+    if entry is not None:
+        e_gen, e_acls, e_membership, e_ts, vis = entry
+        # ACL dicts are reloaded wholesale on any write; comparing this cluster's
+        # rows keeps the other clusters' entries warm
+        if (e_gen == gen and (e_membership is membership or not (e_membership or membership))
+                and now - e_ts < _VM_VISIBILITY_TTL
+                and e_acls == cluster_acls):
+            return vis
+
+    vis = _build_vm_visibility(user, cluster_id, permission, cluster_acls, membership)
+    with _vm_visibility_lock:
+        if len(_vm_visibility_cache) > 10000:
+            _vm_visibility_cache.clear()
+        _vm_visibility_cache[key] = (gen, copy.deepcopy(cluster_acls), membership, now, vis)
+    return vis
+
+
+def get_vm_list_visibility(user: dict, cluster_id: str) -> VmVisibility:
+    """Visibility for the RESTRICTIVE resource list (/resources): a VM with an ACL
+    row is shown only to the users that row names; everything else follows vm.view.
+    Unlike the per-VM routes this doesn't consult pools or the tenant scope."""
+    if user.get('role') == ROLE_ADMIN:
+        return _VISIBLE_ALL
+    username = user.get('username', '')
+    listed, unlisted = set(), set()
+    for v, acl in get_vm_acls().get(cluster_id, {}).items():
+        users = acl.get('users', []) or []
+        (listed if username in users or '*' in users else unlisted).add(str(v))
+    return VmVisibility(listed, unlisted, default=has_permission(user, 'vm.view'))
+
+
 # =============================================================================
 # VMWARE VM-LEVEL ACCESS CONTROL
 # Similar to Proxmox VM ACLs but for VMware VMs
@@ -55,6 +55,24 @@ def is_cluster_watched(cluster_id):
     return w is None or cluster_id in w
 
 
+def focused_guests(cluster_id):
+    """vmids of this cluster that are on someone's screen right now: guests an
+    SSE client reported via /api/sse/subscribe `focus`, plus guests with an
+    open console. Used to prioritise guest-agent polling. NS Oct 2026."""
+    vmids = set()
+    with sse_clients_lock:
+        for c in list(sse_clients.values()):
+            f = (c.get('focus') or {}).get(cluster_id)
+            if f:
+                vmids.update(f)
+    try:
+        from pegaprox.utils.console_relay import open_guests
+        vmids.update(open_guests(cluster_id))
+    except Exception:
+        pass
+    return vmids
+
+
 def push_immediate_update(cluster_id: str, delay: float = 0.3):
     """NS: push immediate SSE update after VM actions for faster UI feedback"""
     def _push():
@@ -68,9 +86,12 @@ def push_immediate_update(cluster_id: str, delay: float = 0.3):
 
             # Push resources
             # NS: Fixed - was calling get_all_resources() which doesn't exist
+            # NS Oct 2026: through the versioned state (delta frame, same seq
+            # stream as the broadcast loop), forced past the noise gate
             resources = manager.get_vm_resources()
             if resources:
-                broadcast_sse('resources', resources, cluster_id)
+                from pegaprox.utils.resource_state import publish_resources
+                publish_resources(cluster_id, resources, force=True)
 
             # Push tasks — force=True bypasses the 3s result cache so the action's
             # just-started task shows up immediately (N-2), not on the next tick.
@@ -237,6 +258,61 @@ def invalidate_user_ws_tokens(username: str) -> int:
     return len(gone)
 
 
+# NS Oct 2026 — SSE fan-out index. broadcast_sse used to walk every client under
+# sse_clients_lock for every event (subscription checks + put_nowait with the
+# lock held): O(events × clients) on the hub each second with a few hundred
+# operators open. The index maps cluster_id → subscriber tuple and is rebuilt
+# only when a client connects, disconnects or changes its subscription.
+# Publishers read the current index reference without any lock; rebuilds swap
+# in a new object (copy-on-write), so an in-flight broadcast keeps its view.
+class _SseIndex:
+    __slots__ = ('everyone', 'all_access', 'by_cluster')
+
+    def __init__(self, everyone=(), all_access=(), by_cluster=None):
+        self.everyone = everyone        # ((client_id, info), ...) with a queue
+        self.all_access = all_access    # subset with clusters=None (admin/all-access)
+        self.by_cluster = by_cluster or {}
+
+
+_sse_index = _SseIndex()
+
+# fan-out timing + drop counters for /api/metrics
+_fanout_stats = {'events': 0, 'seconds_total': 0.0, 'seconds_max': 0.0,
+                 'frames': 0, 'dropped': 0}
+_fanout_stats_lock = threading.Lock()
+
+
+def rebuild_sse_index():
+    """Rebuild the cluster → subscriber index. Call after ANY change to
+    sse_clients membership or a client's 'clusters'."""
+    global _sse_index
+    with sse_clients_lock:
+        everyone, all_access, by_cluster = [], [], {}
+        for client_id, info in sse_clients.items():
+            if info.get('queue') is None:
+                continue
+            entry = (client_id, info)
+            everyone.append(entry)
+            sub = info.get('clusters')
+            if sub is None:
+                all_access.append(entry)
+            else:
+                for c in set(sub):
+                    by_cluster.setdefault(c, []).append(entry)
+        _sse_index = _SseIndex(tuple(everyone), tuple(all_access),
+                               {c: tuple(v) for c, v in by_cluster.items()})
+
+
+def sse_frame(message: str) -> bytes:
+    """Encode a JSON message as a ready-to-write SSE frame (once per event)."""
+    return f"data: {message}\n\n".encode('utf-8')
+
+
+def sse_fanout_stats() -> dict:
+    with _fanout_stats_lock:
+        return dict(_fanout_stats)
+
+
 def broadcast_sse(update_type: str, data: dict, cluster_id: str = None, target_clusters=None):
     """Broadcast update to SSE clients
 
@@ -250,8 +326,12 @@ def broadcast_sse(update_type: str, data: dict, cluster_id: str = None, target_c
     is None) and to any client whose subscription intersects target_clusters. An empty list
     means "not linked to any cluster" → global, mirroring check_vmware_access's backward-compat
     rule. Without it (default None) the classic cluster_id / global logic below is unchanged.
+
+    NS Oct 2026 — serialized and SSE-encoded once, then handed to the subscribers
+    from the fan-out index (see rebuild_sse_index) without taking sse_clients_lock.
     """
     try:
+        t0 = time.perf_counter()
         # MK 2026-05-31 — `default=str` so a datetime / set / bytes / custom
         # object slipping into `data` doesn't TypeError and silently lose the
         # broadcast. Caller's intent was "best-effort dispatch", not "verify
@@ -281,48 +361,56 @@ def broadcast_sse(update_type: str, data: dict, cluster_id: str = None, target_c
         # Determine if this is a cluster-specific event
         # NS: Added 'tasks' and 'resources' - broadcast loop sends these types
         cluster_specific_events = ['node_status', 'vm_update', 'task_update', 'tasks',
-                                   'metrics', 'resources', 'migration', 'maintenance',
+                                   'metrics', 'resources', 'resources_delta', 'migration', 'maintenance',
                                    'ha_event', 'alert', 'ha_status']
         is_cluster_specific = update_type in cluster_specific_events or cluster_id is not None
 
-        with sse_clients_lock:
-            for client_id, client_info in list(sse_clients.items()):
-                try:
-                    q = client_info.get('queue')
-                    subscribed = client_info.get('clusters')
-
-                    should_send = False
-                    if target_clusters is not None:
-                        # NS Aug 2026 (Aikido pentest) — multi-cluster-scoped event (VMware
-                        # linked_clusters). Empty → unlinked server → global (matches REST).
-                        if not target_clusters:
-                            should_send = True
-                        elif subscribed is None:
-                            should_send = True   # admin / all-access
-                        elif subscribed and any(c in subscribed for c in target_clusters):
-                            should_send = True
-                    elif not is_cluster_specific:
-                        # Global event - send to everyone
-                        should_send = True
-                    elif cluster_id and subscribed is None:
-                        # NS: subscribed=None means admin/all-access -> send everything
-                        # Was previously blocking ALL SSE events for admin users!
-                        should_send = True
-                    elif cluster_id and subscribed and cluster_id in subscribed:
-                        # Cluster-specific event and client is subscribed
-                        should_send = True
-
-                    if q and should_send:
-                        try:
-                            q.put_nowait(message)
-                        except Exception:
-                            # R3 (regression scan): a slow client's queue is full, so
-                            # this frame is dropped — make it OBSERVABLE instead of
-                            # silent (its VM grid goes stale otherwise with no signal).
-                            n = client_info['dropped'] = client_info.get('dropped', 0) + 1
-                            if n == 1 or n % 100 == 0:
-                                logging.warning(f"[SSE] client {client_id} queue full — dropped {n} frames (slow consumer)")
-                except:
-                    pass
+        idx = _sse_index
+        if target_clusters is not None:
+            # NS Aug 2026 (Aikido pentest) — multi-cluster-scoped event (VMware
+            # linked_clusters). Empty → unlinked server → global (matches REST).
+            if not target_clusters:
+                targets = idx.everyone
+            else:
+                # admin / all-access + anyone subscribed to one of the clusters
+                # (dict dedups clients subscribed to several of them)
+                picked = dict(idx.all_access)
+                for c in target_clusters:
+                    picked.update(idx.by_cluster.get(c, ()))
+                targets = tuple(picked.items())
+        elif not is_cluster_specific:
+            # Global event - send to everyone
+            targets = idx.everyone
+        elif cluster_id:
+            # NS: subscribed=None means admin/all-access -> send everything
+            # Was previously blocking ALL SSE events for admin users!
+            targets = idx.all_access + idx.by_cluster.get(cluster_id, ())
+        else:
+            targets = ()
+
+        if not targets:
+            return
+        frame = sse_frame(message)
+        dropped = 0
+        for client_id, client_info in targets:
+            try:
+                client_info['queue'].put_nowait(frame)
+            except Exception:
+                # R3 (regression scan): a slow client's queue is full, so
+                # this frame is dropped — make it OBSERVABLE instead of
+                # silent (its VM grid goes stale otherwise with no signal).
+                dropped += 1
+                n = client_info['dropped'] = client_info.get('dropped', 0) + 1
+                if n == 1 or n % 100 == 0:
+                    logging.warning(f"[SSE] client {client_id} queue full — dropped {n} frames (slow consumer)")
+
+        elapsed = time.perf_counter() - t0
+        with _fanout_stats_lock:
+            _fanout_stats['events'] += 1
+            _fanout_stats['seconds_total'] += elapsed
+            if elapsed > _fanout_stats['seconds_max']:
+                _fanout_stats['seconds_max'] = elapsed
+            _fanout_stats['frames'] += len(targets) - dropped
+            _fanout_stats['dropped'] += dropped
     except Exception as e:
         logging.error(f"SSE broadcast error: {e}")
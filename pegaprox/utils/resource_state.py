@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+PegaProx Resource State - Layer 4
+Versioned per-cluster guest table behind the `resources_delta` SSE frames.
+"""
+
+import json
+import logging
+import threading
+from datetime import datetime
+
+from pegaprox.core import inventory
+from pegaprox.globals import sse_clients, sse_clients_lock
+from pegaprox.utils.realtime import broadcast_sse, sse_frame
+
+# NS Oct 2026 — the broadcast loop used to re-send the WHOLE guest list whenever
+# one VM changed (or every 10th loop as keepalive): ~3MB json per cluster per
+# frame at 10k VMs, and every browser diffed it again. We now keep the last
+# published row per vmid and only ship what moved. Every published frame bumps
+# `seq`; a delta carries `base` (= the seq it applies on top of) so a client
+# that missed a frame (queue full, resubscribe, reconnect) notices the gap and
+# asks for a snapshot via /api/sse/resync instead of drifting silently.
+
+# fields that wiggle on every poll — a change confined to these only goes out
+# when it crosses the same buckets the old hash used (cpu 5%, mem 2%), or on
+# the forced keepalive / after-action push
+_NOISY_FIELDS = frozenset((
+    'cpu', 'mem', 'cpu_percent', 'mem_percent', 'disk', 'disk_percent',
+    'netin', 'netout', 'diskread', 'diskwrite', 'uptime',
+))
+
+
+_MISSING = object()
+
+
+def _row_key(r):
+    # vmid is unique per PVE cluster across qemu + lxc
+    vmid = r.get('vmid')
+    return vmid if vmid is not None else r.get('id')
+
+
+def _buckets(r):
+    return (int(r.get('cpu_percent') or 0) // 5, int(r.get('mem_percent') or 0) // 2)
+
+
+class ClusterResourceState:
+    """Last published guest rows of one cluster, keyed by vmid."""
+
+    def __init__(self):
+        self.seq = 0
+        self._rows = {}
+        self.lock = threading.Lock()
+
+    def diff(self, resources, force=False):
+        """Diff a fresh get_vm_resources() list against the published state.
+
+        Returns the delta payload (and advances seq) or None when nothing worth
+        sending changed. Without `force`, noise-only changes are held back — the
+        state is NOT advanced for them, so they accumulate into the next frame.
+        Caller holds self.lock.
+        """
+        new_rows = {}
+        for r in resources:
+            k = _row_key(r)
+            if k is not None:
+                new_rows[k] = r
+
+        added = [r for k, r in new_rows.items() if k not in self._rows]
+        removed = [k for k in self._rows if k not in new_rows]
+        changed = []
+        significant = bool(added or removed)
+        for k, r in new_rows.items():
+            old = self._rows.get(k)
+            if old is None:
+                continue
+            upd = {f: v for f, v in r.items() if old.get(f, _MISSING) != v}
+            gone = [f for f in old if f not in r]
+            if not upd and not gone:
+                continue
+            entry = {'vmid': k, 'set': upd}
+            if gone:
+                entry['unset'] = gone
+            changed.append(entry)
+            if not significant and (gone or any(f not in _NOISY_FIELDS for f in upd)
+                                    or _buckets(old) != _buckets(r)):
+                significant = True
+
+        if not (added or removed or changed):
+            return None
+        if not significant and not force:
+            return None
+
+        self._rows = {k: dict(r) for k, r in new_rows.items()}
+        base = self.seq
+        self.seq += 1
+        added.sort(key=lambda r: str(_row_key(r)))
+        return {'seq': self.seq, 'base': base, 'added': added, 'removed': removed, 'changed': changed}
+
+    def snapshot(self):
+        """(seq, full row list sorted by vmid) — caller holds self.lock."""
+        return self.seq, sorted(self._rows.values(), key=lambda r: r.get('vmid') or 0)
+
+
+_states = {}
+_states_lock = threading.Lock()
+
+
+def get_resource_state(cluster_id):
+    with _states_lock:
+        st = _states.get(cluster_id)
+        if st is None:
+            st = _states[cluster_id] = ClusterResourceState()
+        return st
+
+
+def drop_resource_state(cluster_id):
+    """Forget a cluster (removed from PegaProx)."""
+    with _states_lock:
+        _states.pop(cluster_id, None)
+
+
+def publish_resources(cluster_id, resources, force=False):
+    """Diff + broadcast one `resources_delta` frame. Returns True if one went out.
+
+    The broadcast happens under the cluster's state lock so concurrent
+    publishers (broadcast loop vs push_immediate_update) enqueue frames in seq
+    order — otherwise a client would see base gaps that aren't real.
+    """
+    st = get_resource_state(cluster_id)
+    with st.lock:
+        delta = st.diff(resources, force=force)
+        if delta is not None:
+            broadcast_sse('resources_delta', delta, cluster_id)
+    # the global search index rides on the same polls (core/inventory)
+    if delta is None:
+        inventory.touch_cluster(cluster_id)
+        return False
+    inventory.update_cluster(cluster_id, resources)
+    return True
+
+
+def _queue_snapshot(cluster_id, q):
+    with _states_lock:
+        st = _states.get(cluster_id)
+    if st is None:
+        return False
+    # enqueue under the state lock so no delta of this cluster can slip in
+    # between "snapshot taken" and "snapshot queued"
+    with st.lock:
+        seq, rows = st.snapshot()
+        if not seq:
+            return False
+        try:
+            frame = sse_frame(json.dumps({
+                'type': 'resources',
+                'data': rows,
+                'seq': seq,
+                'cluster_id': cluster_id,
+                'timestamp': datetime.now().isoformat()
+            }, default=str))
+        except (TypeError, ValueError) as e:
+            logging.warning(f"[SSE] resources snapshot for {cluster_id} unserialisable: {e}")
+            return False
+        q.put_nowait(frame)
+    return True
+
+
+def send_resource_snapshots(client_id, cluster_ids=None):
+    """Queue a full `resources` snapshot (with its seq) to ONE SSE client.
+
+    cluster_ids=None → every cluster the client is subscribed to. Clusters the
+    client isn't subscribed to are skipped (RBAC is enforced on the
+    subscription). Returns the number of snapshots queued.
+    """
+    with sse_clients_lock:
+        client = sse_clients.get(client_id)
+        if not client:
+            return 0
+        q = client.get('queue')
+        subscribed = client.get('clusters')
+    if q is None:
+        return 0
+
+    if cluster_ids is None:
+        if subscribed is None:
+            with _states_lock:
+                cluster_ids = list(_states)
+        else:
+            cluster_ids = list(subscribed)
+    elif subscribed is not None:
+        cluster_ids = [c for c in cluster_ids if c in subscribed]
+
+    sent = 0
+    for cid in cluster_ids:
+        try:
+            if _queue_snapshot(cid, q):
+                sent += 1
+        except Exception:
+            # queue full — the client will report the gap again on its next delta
+            with sse_clients_lock:
+                client['dropped'] = client.get('dropped', 0) + 1
+    return sent
@@ -9,7 +9,7 @@ that no half-decent inspection product blocks.
 Wire format on the browser side:
   POST /api/clusters/.../vnc-poll   action=open   -> { poll_id, ... }
   POST /api/clusters/.../vnc-poll   action=send   data_b64=..   -> { ok }
-  POST /api/clusters/.../vnc-poll   action=recv                 -> { chunks: [b64..], closed? }
+  POST /api/clusters/.../vnc-poll   action=recv                 -> { chunks_b64: [b64], closed? }
   POST /api/clusters/.../vnc-poll   action=close                -> { ok }
 
 Latency is naturally higher than WSS (one HTTP round-trip per poll, ~30-80ms)
@@ -25,11 +25,12 @@ import logging
 import secrets
 import threading
 import time
-from collections import deque
 from typing import Optional
 
 import gevent
 
+from pegaprox.utils import console_relay
+
 # defaults
 SESSION_IDLE_TTL = 90.0          # seconds without activity → reaper closes
 RECV_LONG_POLL_DEFAULT = 5.0     # block at most this long for new bytes
@@ -41,11 +42,12 @@ class VncPollSession:
 
     Owns a sync websocket-client connection (`pve_ws`) and an optional SSH tunnel
     endpoint (`tunnel_endpoint`). A pump greenlet copies bytes from PVE into a
-    deque; recv() drains it. send() writes directly to PVE.
+    FrameCoalescer; recv() drains it as one frame. send() writes directly to PVE.
+    `relay` is the console_relay session slot (cap + metrics), released on stop().
     """
 
     def __init__(self, poll_id: str, pve_ws, tunnel_endpoint, crypto_session,
-                 cluster_id: str, vm_type: str, vmid: int, host: str):
+                 cluster_id: str, vm_type: str, vmid: int, host: str, relay=None):
         self.poll_id = poll_id
         self.pve_ws = pve_ws
         self.tunnel_endpoint = tunnel_endpoint
@@ -54,14 +56,18 @@ class VncPollSession:
         self.vm_type = vm_type
         self.vmid = vmid
         self.host = host
+        self.relay = relay
         self.created_at = time.monotonic()
         self.last_seen = time.monotonic()
         self.bytes_sent = 0       # browser → PVE
         self.bytes_recv = 0       # PVE → browser
         self._closed = False
-        self._buf = deque()
-        self._buf_lock = threading.Lock()
-        self._buf_cond = threading.Condition(self._buf_lock)
+        self._stopped = False
+        # NS Oct 2026 — raw bytes are queued and batched per recv(): a
+        # framebuffer update arrives as dozens of ws messages, which used to
+        # become dozens of AES-GCM frames + base64 strings per poll response.
+        self._frames = console_relay.FrameCoalescer()
+        self._recv_lock = threading.Lock()   # take+encrypt in order → seq stays monotonic
         self._pump = gevent.spawn(self._pump_loop)
 
     # ─────────────────────────────────────────────────────────────────
@@ -74,7 +80,7 @@ class VncPollSession:
 
     # ─────────────────────────────────────────────────────────────────
     def _pump_loop(self):
-        """Copy bytes from PVE into buffer until the connection drops."""
+        """Copy bytes from PVE into the coalescer until the connection drops."""
         # Blocking recv. websocket-client is gevent-friendly thanks to monkey
         # patching, so this yields the greenlet during socket waits.
         try:
@@ -92,21 +98,10 @@ class VncPollSession:
             if isinstance(data, str):
                 data = data.encode('latin-1')
             self.bytes_recv += len(data)
-            # Stable Mode: encrypt+seq before handing to the browser. Browser
-            # decrypts with the same key it negotiated through /console?stable=1.
-            if self.crypto_session is not None:
-                try:
-                    data = self.crypto_session.encrypt(data)
-                except Exception as ce:
-                    logging.warning(f"[VncPoll {self.poll_id[:8]}] encrypt failed: {ce}")
-                    break
-            with self._buf_cond:
-                self._buf.append(data)
-                self._buf_cond.notify_all()
+            self._frames.put(data)
         self._closed = True
         # Final wake-up so any pending recv() returns immediately.
-        with self._buf_cond:
-            self._buf_cond.notify_all()
+        self._frames.close()
 
     # ─────────────────────────────────────────────────────────────────
     def send(self, b64_payload: str) -> int:
@@ -119,25 +114,42 @@ class VncPollSession:
             raw = self.crypto_session.decrypt(raw)
         self.bytes_sent += len(raw)
         # send_binary on websocket-client = ws frame opcode 0x2
+        t0 = time.monotonic()
         self.pve_ws.send_binary(raw)
+        if self.relay is not None:
+            self.relay.record('up', len(raw), time.monotonic() - t0)
         return len(raw)
 
     def recv(self, max_wait: float = RECV_LONG_POLL_DEFAULT) -> list:
-        """Drain pending PVE→browser chunks, blocking up to max_wait if empty."""
+        """Pending PVE→browser bytes as a list of at most one frame, blocking
+        up to max_wait if nothing is queued."""
         max_wait = max(0.0, min(max_wait, RECV_LONG_POLL_MAX))
-        deadline = time.monotonic() + max_wait
         self.touch()
-        with self._buf_cond:
-            if not self._buf and not self._closed and max_wait > 0:
-                # block until pump appends something or session closes
-                self._buf_cond.wait(timeout=max_wait)
-            chunks = list(self._buf)
-            self._buf.clear()
-        return chunks
+        with self._recv_lock:
+            data, waited = self._frames.take(max_wait)
+            if not data:
+                return []
+            n = len(data)
+            # Stable Mode: encrypt+seq before handing to the browser. Browser
+            # decrypts with the same key it negotiated through /console?stable=1.
+            if self.crypto_session is not None:
+                try:
+                    data = self.crypto_session.encrypt(data)
+                except Exception as ce:
+                    logging.warning(f"[VncPoll {self.poll_id[:8]}] encrypt failed: {ce}")
+                    self.stop()
+                    return []
+        if self.relay is not None:
+            # latency = how long the oldest byte in this frame waited for a poll
+            self.relay.record('down', n, waited)
+        return [data]
 
     def stop(self):
-        if self._closed:
+        # own flag: _closed is also set by the pump when PVE hangs up, and the
+        # tunnel + relay slot still have to be released after that
+        if self._stopped:
             return
+        self._stopped = True
         self._closed = True
         try: self.pve_ws.close()
         except Exception: pass
@@ -148,8 +160,9 @@ class VncPollSession:
         try:
             self._pump.kill(block=False)
         except Exception: pass
-        with self._buf_cond:
-            self._buf_cond.notify_all()
+        self._frames.close()
+        if self.relay is not None:
+            self.relay.release()
 
 
 # ─────────────────────────────────────────────────────────────────
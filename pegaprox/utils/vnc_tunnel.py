@@ -22,13 +22,14 @@ encryption) wasn't enough because their inspection-engine sat on the
 PegaProx↔PVE side too.
 """
 import os
-import select
 import socket
 import threading
 import time
 import logging
 from typing import Optional
 
+from pegaprox.utils import console_relay
+
 
 # Lazy paramiko import — keep this module importable even on hosts where
 # paramiko isn't installed (it just won't be usable).
@@ -120,58 +121,41 @@ class TunnelEndpoint:
         logging.info(f"[VncTunnel] forward closed: cluster={self._cluster_id} port={self.local_port}")
 
 
-class _Pumper(threading.Thread):
-    """Bidirectional byte-pipe between a local TCP socket and an SSH channel."""
+class _Pumper:
+    """Bidirectional byte-pipe between a local TCP socket and an SSH channel.
+
+    NS Oct 2026 — two cooperative pumps (one per direction) instead of a
+    select() thread per connection. Blocking recv/sendall on the socket and on
+    paramiko's channel park the greenlet under the gevent monkeypatch, and the
+    read size grows with the traffic (console_relay.AdaptiveBuffer).
+    """
 
     def __init__(self, sock: socket.socket, channel, port_for_log: int):
-        super().__init__(name=f"VncTun-Pump-{port_for_log}", daemon=True)
         self._sock = sock
         self._channel = channel
+        self._port = port_for_log
         self._stopped = False
 
+    def start(self):
+        tag = f"VncTun-Pump-{self._port}"
+        console_relay.spawn(console_relay.pump, self._sock.recv, self._channel.sendall,
+                            None, 'up', self.stop, tag, name=f"{tag}-up")
+        console_relay.spawn(console_relay.pump, self._channel.recv, self._sock.sendall,
+                            None, 'down', self.stop, tag, name=f"{tag}-down")
+
     def stop(self):
+        # either direction ending (EOF, reset, stop()) tears down both ends,
+        # which unblocks the other pump
+        if self._stopped:
+            return
         self._stopped = True
+        try: self._sock.shutdown(socket.SHUT_RDWR)
+        except Exception: pass
         try: self._sock.close()
         except Exception: pass
         try: self._channel.close()
         except Exception: pass
 
-    def run(self):
-        # Use select() on both ends. Bytes go socket→channel and channel→socket.
-        # Buffer at 16KB — VNC frames are typically much smaller.
-        BUF = 16 * 1024
-        try:
-            self._sock.setblocking(False)
-            while not self._stopped:
-                ready, _, _ = select.select([self._sock, self._channel], [], [], 1.0)
-                if self._sock in ready:
-                    try:
-                        data = self._sock.recv(BUF)
-                    except (BlockingIOError, InterruptedError):
-                        data = None
-                    if data is None:
-                        pass
-                    elif not data:
-                        break
-                    else:
-                        self._channel.sendall(data)
-                if self._channel in ready:
-                    if self._channel.recv_ready():
-                        data = self._channel.recv(BUF)
-                        if not data:
-                            break
-                        self._sock.sendall(data)
-                # Stale-close detection: if channel reports closed
-                if self._channel.exit_status_ready() and not self._channel.recv_ready():
-                    break
-        except Exception as e:
-            logging.debug(f"[VncTunnel] pump exception: {e}")
-        finally:
-            try: self._sock.close()
-            except Exception: pass
-            try: self._channel.close()
-            except Exception: pass
-
 
 class SshVncTunnelPool:
     """Process-wide pool of persistent SSH transports keyed by cluster_id.
@@ -312,6 +296,7 @@ def shutdown(cluster_id: Optional[str] = None):
 #   3. Reconnection after the SSH transport drops
 # ──────────────────────────────────────────────────────────────────────────
 if __name__ == '__main__':
+    import select
     import sys
     paramiko = _get_paramiko()
     if not paramiko:
@@ -52,6 +52,7 @@ def db():
             # PegaProxDB keeps its live handle on a threadlocal (self._local.conn);
             # `_conn` is always None. Close the real connection so the temp DB file
             # isn't held open when we rmtree it below.
+            database._audit_writer.stop()
             _tlconn = getattr(getattr(database, '_local', None), 'conn', None)
             if _tlconn is not None:
                 _tlconn.close()
@@ -77,6 +78,8 @@ def _reset_rbac_caches():
         rbac.tenants_db = {}
         rbac._custom_roles_cache = None
         rbac._vm_acls_cache = None
+        with rbac._vm_visibility_lock:
+            rbac._vm_visibility_cache.clear()
         with rbac._pool_cache_lock:
             rbac._pool_membership_cache.clear()
     except Exception:
@@ -276,6 +279,24 @@ def api(_integration_app, db):
         with authmod.sessions_lock:
             authmod.active_sessions.clear()
         ppglobals.cluster_managers.clear()
+        _reset_metrics_cache()
+
+
+def _reset_metrics_cache():
+    """The Prometheus exporter keeps rendered buffers (and an idle-stopping
+    refresher) at module scope; drop them so a scrape in one test never serves
+    another test's managers. Marking the exporter idle lets the refresher exit."""
+    try:
+        import pegaprox.api.metrics_exporter as mx
+        with mx._cache_lock:
+            mx._exporter['last_scrape'] = 0.0
+            mx._exporter['rendered_at'] = 0.0
+            for d in (mx._self_buffers, mx._tail_buffers, mx._cluster_buffers,
+                      mx._render_seconds, mx._ceph_cache, mx._fed, mx._scrape_counts):
+                d.clear()
+            mx._body_cache['gen'] = -1
+    except Exception:
+        pass
 
 
 @pytest.fixture
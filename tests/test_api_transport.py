@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Tests for the manager's API transport (pegaprox/core/api_transport.py):
+identical in-flight GETs are coalesced, per-node calls get their own pool which
+grows with observed concurrency, latency lands in per-endpoint histograms, and
+transports are pluggable by name."""
+import threading
+
+import pegaprox.api.metrics_exporter as mx
+from pegaprox.core import api_transport as at
+from benchmarks.fake_pve import SyntheticCluster, FakePVEAdapter, make_manager
+
+_BASE = 'https://fake-pve.invalid:8006/api2/json'
+
+
+class _FakePool(FakePVEAdapter):
+    """FakePVEAdapter standing in for a pool adapter (same counters as _PoolAdapter)."""
+
+    def __init__(self, cluster, node, maxsize):
+        super().__init__(cluster, latency_ms=40)
+        self.node, self.maxsize = node, maxsize
+        self.inflight = self.peak = self.overflow = 0
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            self.inflight += 1
+            self.peak = max(self.peak, self.inflight)
+        try:
+            return super().send(request, **kwargs)
+        finally:
+            with self._lock:
+                self.inflight -= 1
+
+
+class _FakeTransport(at.PooledTransport):
+    name = 'fake'
+    cluster = SyntheticCluster(nodes=2, vms=10, seed=3)
+
+    def make_adapter(self, node, maxsize, ssl_verify):
+        return _FakePool(self.cluster, node, maxsize)
+
+
+def _parallel(fns):
+    out = [None] * len(fns)
+
+    def go(i):
+        out[i] = fns[i]()
+    threads = [threading.Thread(target=go, args=(i,)) for i in range(len(fns))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return out
+
+
+def test_identical_gets_coalesced(db):
+    cluster = SyntheticCluster(nodes=2, vms=10, seed=3)
+    adapter = FakePVEAdapter(cluster, latency_ms=50)
+    mgr = make_manager(cluster, adapter)
+    sess = mgr._create_session()
+    url = f'{_BASE}/cluster/resources'
+
+    res = _parallel([lambda: sess.get(url, params={'type': 'vm'})] * 5)
+    assert adapter.requests == 1 and len({id(r) for r in res}) == 1
+    assert mgr._api_transport.coalesced == 4
+
+    # different params or a non-GET are never shared
+    _parallel([lambda: sess.get(url, params={'type': 'vm'}), lambda: sess.get(url, params={'type': 'node'}),
+               lambda: sess.post(f'{_BASE}/nodes/pve1/qemu/100/status/start')])
+    assert adapter.requests == 4
+
+    hist = mgr._api_transport.histograms.snapshot()
+    h = hist[('GET', '/cluster/resources')]
+    assert h['count'] == 3 and h['buckets'][-1] == (None, 3)
+    assert ('POST', '/nodes/{name}/qemu/{id}/status/start') in hist
+
+
+def test_node_pools_grow_and_transport_is_pluggable(monkeypatch):
+    monkeypatch.setattr(at, 'TRANSPORTS', dict(at.TRANSPORTS))
+    at.register_transport('fake', _FakeTransport)
+    monkeypatch.setenv('PEGAPROX_API_TRANSPORT', 'fake')
+    t = at.create_transport()
+    assert isinstance(t, _FakeTransport)
+    sess = t.new_session(False)
+
+    sess.get(f'{_BASE}/cluster/resources')
+    _parallel([lambda i=i: sess.get(f'{_BASE}/nodes/pve1/rrddata', params={'timeframe': 'hour', 'n': i})
+               for i in range(10)])
+    pools = t.stats()['pools']
+    assert pools['_cluster']['size'] == 16 and pools['pve1'] == {'size': 4, 'peak': 10, 'overflow': 0}
+    assert t._pools[('pve1', False)].requests == 10 and t._pools[('', False)].requests == 1
+
+    t._last_resize = 0
+    t.maybe_resize()
+    assert t.stats()['pools']['pve1']['size'] == 16 and t.resizes == 1
+    assert t.stats()['pools']['_cluster']['size'] == 16   # never outran its size
+
+    monkeypatch.setenv('PEGAPROX_API_TRANSPORT', 'nope')
+    assert type(at.create_transport()) is at.PooledTransport
+
+
+def test_histogram_buckets_and_exposition():
+    h = at.LatencyHistograms(buckets=(10, 100))
+    for ms, status in ((3, 200), (10, 200), (50, 500), (5000, 0)):
+        h.observe('GET', '/version', ms, status)
+    snap = h.snapshot()[('GET', '/version')]
+    assert snap['buckets'] == [(10, 2), (100, 3), (None, 4)]
+    assert snap['count'] == 4 and snap['errors'] == 2 and snap['sum_ms'] == 5063
+    assert at.endpoint_template(f'{_BASE}/nodes/pve1/lxc/101/config') == '/nodes/{name}/lxc/{id}/config'
+
+    t = at.PooledTransport()
+    t.histograms.observe('GET', '/cluster/resources', 30, 200)
+    t.coalesced = 7
+    fam = mx._Families()
+    mx._render_api_transport(fam, type('M', (), {'_api_transport': t})(), {'cluster_id': 'c1'})
+    text = b''.join(fam.buffers.values()).decode()
+    assert ('pegaprox_api_request_duration_seconds_bucket{cluster_id="c1",method="GET",'
+            'endpoint="/cluster/resources",le="0.05"} 1') in text
+    assert 'pegaprox_api_coalesced_requests_total{cluster_id="c1"} 7' in text
@@ -62,6 +62,7 @@ def test_bulk_migrate_denies_foreign_vmid_but_migrates_own(api, seed):
     assert r.status_code == 200, r.get_data(as_text=True)
     by_vmid = {row['vmid']: row for row in r.get_json()['results']}
     assert by_vmid[100]['success'] is True                        # own VM migrated
+    assert by_vmid[100]['task'] == 'UPID:mig'                      # real UPID, first wave
     assert by_vmid[200]['success'] is False                       # foreign VM refused
     assert 'permission denied' in (by_vmid[200]['error'] or '').lower()
     # the batch did not relocate the foreign VM
@@ -69,6 +70,32 @@ def test_bulk_migrate_denies_foreign_vmid_but_migrates_own(api, seed):
     assert 200 not in migrated_vmids and 100 in migrated_vmids
 
 
+def test_migration_queue_counts_only_visible_jobs(api, seed):
+    seed.tenant('acme', clusters=['cluster_1'])
+    root = seed.user('root', role='admin', tenant_id='default')
+    bob = seed.user('bob', role='user', tenant_id='acme', permissions=['vm.migrate'])
+    seed.vm_acl('cluster_1', 100, users=['bob'])
+    seed.vm_acl('cluster_1', 200, users=['root'])
+
+    fake = api.make_fake_manager('cluster_1', migrate_vm_manual={'success': True, 'task': 'UPID:mig'})
+    fake.config = MagicMock(); fake.config.name = 'cluster_1'
+    api.set_manager('cluster_1', fake)
+    r = api.as_user(root).post('/api/clusters/cluster_1/vms/bulk-migrate', json={
+        'target': 'node2',
+        'vms': [{'node': 'node1', 'vmid': 100, 'type': 'qemu'},
+                {'node': 'node1', 'vmid': 200, 'type': 'qemu'}],
+    })
+    status_url = r.get_json()['status_url']
+    assert api.as_user(root).get(status_url).get_json()['total'] == 2
+
+    # bob sees his own guest — and neither the count nor the ETA of root's other one
+    batch = api.as_user(bob).get(status_url).get_json()
+    assert batch['total'] == 1 and [j['vmid'] for j in batch['jobs']] == [100]
+    assert sum(batch[k] for k in ('queued', 'running', 'done', 'failed')) == 1
+    listing = api.as_user(bob).get('/api/clusters/cluster_1/migration-queue').get_json()
+    assert [b['total'] for b in listing['batches']] == [1]
+
+
 # ===========================================================================
 # Tier A #2 — restore_backup must authorize the SOURCE volid, not only the target
 # ===========================================================================
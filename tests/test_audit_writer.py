@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Tests for the audit_log group-commit writer and FTS index
+(pegaprox/core/db.py AuditWriter / search_audit_log): queued entries commit
+as one batch in submit order, readers see their own writes, and trigram FTS
+search matches the old substring semantics."""
+
+
+def test_burst_commits_as_one_ordered_batch(db):
+    before = dict(db._audit_writer.stats)
+    for i in range(50):
+        db.add_audit_entry('root', f'vm.migrate.{i}', details=f'vm {100 + i}', cluster='c1')
+    assert db._audit_writer.pending() == 50    # nothing written on the request path
+
+    rows = db.get_audit_log(limit=100, verify_integrity=True)   # flushes first
+    st = db._audit_writer.stats
+    assert st['batches'] - before['batches'] == 1 and st['entries'] - before['entries'] == 50
+    assert len(rows) == 50 and all(r['integrity_verified'] for r in rows)
+    by_id = sorted(rows, key=lambda r: r['id'])
+    assert [r['action'] for r in by_id] == [f'vm.migrate.{i}' for i in range(50)]
+    assert [r['timestamp'] for r in by_id] == sorted(r['timestamp'] for r in by_id)
+    assert db.audit_writer_stats()['pending'] == 0
+
+
+def test_fts_search_keeps_substring_semantics(db):
+    assert db._audit_fts
+    db.add_audit_entry('alice', 'vm.migrate', details='VM 101 node1 -> node2', cluster='prod')
+    db.add_audit_entry('bob', 'user.login', details='from 10.0.0.9')
+    db.add_audit_entry('carol', 'storage.delete', details='removed iso', cluster='lab')
+
+    rows, total = db.search_audit_log(q='MIGR')
+    assert total == 1 and rows[0]['user'] == 'alice'
+    rows, total = db.search_audit_log(q='ode2')            # mid-word, like LIKE '%q%'
+    assert total == 1 and rows[0]['action'] == 'vm.migrate'
+    assert db.search_audit_log(q='lab')[1] == 1            # cluster column indexed
+    assert db.search_audit_log(q='bo')[1] == 1             # < 3 chars → LIKE fallback
+    rows, total = db.search_audit_log(q='o', limit=1)
+    assert len(rows) == 1 and total == 3                   # paged → real COUNT
+
+    db.conn.execute("DELETE FROM audit_log WHERE user = 'alice'")
+    db.conn.commit()
+    assert db.search_audit_log(q='migr') == ([], 0)        # delete trigger keeps FTS in sync
+
+
+def test_raw_audit_readers_see_queued_entries(api, seed, db):
+    db.conn.execute("INSERT INTO cluster_groups (id, name, tenant_id) VALUES ('g1', 'dc', NULL)")
+    db.conn.commit()
+    db.add_audit_entry('system', 'xclb.migrate', details='group g1: VM 100 c1 -> c2')
+    assert db._audit_writer.pending() == 1
+    admin = seed.user('root', role='admin', tenant_id='default')
+    r = api.as_user(admin).get('/api/cluster-groups/g1/lb-history')
+    assert r.status_code == 200 and [e['action'] for e in r.get_json()] == ['xclb.migrate']
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Tests for require_auth's auth context cache (pegaprox/utils/auth.py):
+hits skip the user lookup, and user / role / token writes and logout
+invalidate cached contexts through the auth generation."""
+import pegaprox.utils.auth as authmod
+
+
+def test_session_context_cached_until_user_write(api, seed):
+    seed.tenant('default')
+    seed.user('alice', role='user', permissions=['admin.users'])
+    client = api.as_user({'username': 'alice', 'role': 'user'})
+    before = authmod.auth_cache_stats()
+
+    assert client.get('/api/clusters').status_code == 200
+    assert client.get('/api/users').status_code == 200
+    st = authmod.auth_cache_stats()
+    # first request resolves the context, the second one is a hit
+    assert st['misses'] - before['misses'] == 1 and st['hits'] - before['hits'] == 1
+    assert st['checks'] - before['checks'] == 2
+
+    # an extra permission removed → next request re-resolves and is denied
+    seed.user('alice', role='user')
+    r = client.get('/api/users')
+    assert r.status_code == 403 and r.get_json()['code'] == 'MISSING_PERMISSION'
+
+    seed.user('alice', role='user', enabled=False)
+    assert client.get('/api/clusters').status_code == 401
+
+    # logout drops the context together with the session
+    seed.user('alice', role='user')
+    assert client.get('/api/clusters').status_code == 200
+    authmod.invalidate_session(client.session_id)
+    assert client.get('/api/clusters').status_code == 401
+
+
+def test_api_token_hits_skip_db_and_revocation_applies(api, seed, db):
+    seed.tenant('default')
+    seed.user('bob', role='admin')
+    tok = authmod.create_api_token('bob', 'ci', role='viewer')
+    headers = {'Authorization': f"Bearer {tok['token']}"}
+    anon = api.anon()
+
+    assert anon.get('/api/clusters', headers=headers).status_code == 200
+    first_use = db.query('SELECT last_used_at FROM api_tokens WHERE id = ?', (tok['token_id'],))[0]
+    assert anon.get('/api/clusters', headers=headers).status_code == 200
+    again = db.query('SELECT last_used_at FROM api_tokens WHERE id = ?', (tok['token_id'],))[0]
+    assert again['last_used_at'] == first_use['last_used_at']   # no UPDATE on a hit
+
+    # a viewer token of an admin owner still doesn't get admin perms from the cache
+    assert anon.get('/api/users', headers=headers).status_code == 403
+
+    assert authmod.revoke_api_token(tok['token_id'], 'bob')
+    assert anon.get('/api/clusters', headers=headers).status_code == 401
+
+
+def test_routes_get_a_read_only_view_of_the_cached_user(api, seed):
+    from flask import g
+    seed.tenant('default')
+    seed.user('carol', role='user')
+    client = api.as_user({'username': 'carol', 'role': 'user'})
+    seen = []
+
+    @authmod.require_auth()
+    def probe():
+        user = g.current_user
+        try:
+            user['role'] = 'admin'
+        except TypeError:
+            seen.append('read-only')
+        seen.append(dict(user)['role'])
+        return 'ok'
+
+    for _ in range(2):      # miss, then a hit on the shared cached context
+        with api.app.test_request_context('/', headers={'X-Session-ID': client.session_id}):
+            assert probe() == 'ok'
+    assert seen == ['read-only', 'user', 'read-only', 'user']
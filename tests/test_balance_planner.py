@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Tests for the whole-cluster balance planner (pegaprox/core/placement.py)
+and PegaProxManager.plan_balance's eligibility rules."""
+from types import SimpleNamespace
+
+from pegaprox.core.manager import PegaProxManager
+from pegaprox.core.placement import PlanNode, PlanVM, plan_placement, swap_safe_prefix
+
+G = 2 ** 30
+
+
+def _vm(vmid, node, cores=1.0, mem_g=4, vtype='qemu', **extra):
+    r = {'vmid': vmid, 'name': f'vm{vmid}', 'type': vtype, 'node': node, 'status': 'running',
+         'cpu': cores / 2, 'maxcpu': 2, 'mem': mem_g * G}
+    r.update(extra)
+    return r
+
+
+def _hot_cluster():
+    nodes = [PlanNode('a', 16, 8, 64 * G, 48 * G), PlanNode('b', 16, 2, 64 * G, 16 * G),
+             PlanNode('c', 16, 2, 64 * G, 16 * G)]
+    rows = [_vm(100 + i, 'a') for i in range(8)] + [_vm(200, 'a', cores=4, mem_g=16)]
+    return nodes, rows
+
+
+def test_plan_reaches_target_without_overshooting():
+    nodes, rows = _hot_cluster()
+    plan = plan_placement(nodes, [PlanVM(r) for r in rows], (1, 1, 0), 20)
+    assert plan['initial_spread'] == 87.5 and plan['reached']
+    assert plan['predicted_spread'] <= 20
+    # moving the big guest would just make b the new hot node
+    assert 200 not in [m['vmid'] for m in plan['moves']]
+    assert len(plan['moves']) == 4
+    assert len({m['vmid'] for m in plan['moves']}) == 4          # each guest once
+    last = plan['moves'][-1]
+    assert last['predicted_spread'] == plan['predicted_spread']
+    assert plan['predicted_scores'] == {'a': 75.0, 'b': 62.5, 'c': 62.5}
+
+
+def test_can_place_and_capacity_are_respected():
+    nodes, rows = _hot_cluster()
+
+    def can_place(vm, target, vm_nodes):
+        # anti-affinity: 100 and 101 may not share a node
+        other = {100: '101', 101: '100'}.get(vm.vmid)
+        return target != 'c' and not (other and vm_nodes.get(other) == target)
+
+    plan = plan_placement(nodes, [PlanVM(r) for r in rows], (1, 1, 0), 20, can_place=can_place)
+    assert all(m['to'] == 'b' for m in plan['moves'])
+    assert not {100, 101} <= {m['vmid'] for m in plan['moves']}
+
+    full = [PlanNode('a', 16, 8, 64 * G, 60 * G), PlanNode('b', 16, 0, 8 * G, 6 * G)]
+    plan = plan_placement(full, [PlanVM(_vm(1, 'a', mem_g=4))], (1, 1, 0), 10)
+    assert plan['moves'] == [] and not plan['reached']
+
+
+def test_swap_when_no_single_move_helps():
+    nodes = [PlanNode('a', 1, 0, 64 * G, 48 * G), PlanNode('b', 1, 0, 64 * G, 16 * G)]
+    vms = [PlanVM(_vm(1, 'a', cores=0, mem_g=32)), PlanVM(_vm(2, 'b', cores=0, mem_g=12))]
+    plan = plan_placement(nodes, vms, (0, 1, 0), 20)
+    assert [(m['vmid'], m['to'], m['swap']) for m in plan['moves']] == [(1, 'b', 1), (2, 'a', 1)]
+    assert plan['predicted_scores'] == {'a': 43.75, 'b': 56.25} and plan['reached']
+    assert swap_safe_prefix(plan['moves'], 1) == plan['moves']     # never half a swap
+
+
+def test_swap_is_all_or_nothing():
+    nodes = [PlanNode('a', 1, 0, 64 * G, 48 * G), PlanNode('b', 1, 0, 64 * G, 16 * G)]
+    vms = [PlanVM(_vm(1, 'a', cores=0, mem_g=32)), PlanVM(_vm(2, 'b', cores=0, mem_g=12))]
+    asked = []
+
+    def no_2_on_a(vm, target, vm_nodes):
+        asked.append((vm.vmid, target))
+        return vm.vmid != 2
+    # VM 1 → b would be allowed, but its partner can't follow: no lone half-swap
+    plan = plan_placement(nodes, vms, (0, 1, 0), 20, can_place=no_2_on_a)
+    assert plan['moves'] == [] and not plan['reached'] and (2, 'a') in asked
+
+    # the second move is sized against the node after the first one left:
+    # b can't take VM 1 while VM 2 still sits there, so 2 goes first
+    tight = [PlanNode('a', 1, 0, 64 * G, 48 * G), PlanNode('b', 1, 0, 32 * G, 16 * G)]
+    vms = [PlanVM(_vm(1, 'a', cores=0, mem_g=24)), PlanVM(_vm(2, 'b', cores=0, mem_g=16))]
+    plan = plan_placement(tight, vms, (0, 1, 0), 20)
+    assert [(m['vmid'], m['to'], m['swap']) for m in plan['moves']] == [(2, 'a', 1), (1, 'b', 1)]
+
+
+def _manager(rows, node_status, **cfg):
+    mgr = PegaProxManager.__new__(PegaProxManager)
+    mgr.id = 'c1'
+    mgr.logger = SimpleNamespace(info=lambda *a: None, debug=lambda *a: None, warning=lambda *a: None)
+    mgr.config = SimpleNamespace(migration_threshold=20, dry_run=True, balance_containers=False,
+                                 balance_local_disks=False, excluded_nodes=[], **cfg)
+    mgr._vm_migration_cooldown = {}
+    mgr._rolling_update = None
+    mgr.get_node_status = lambda: node_status
+    mgr.get_vm_resources = lambda max_age=0: rows
+    mgr.get_balancing_excluded_vms = lambda: [101]
+    mgr.get_balancing_excluded_pools = lambda: []
+    mgr._derive_proxlb_tag_rules = lambda vms=None: {'rules': [], 'ignored': {102}, 'pins': {103: {'c'}}}
+    mgr._get_pve_crs_managed_vmids = lambda: set()
+    mgr.check_vm_storage_type = lambda node, vmid, t: 'local' if vmid == 104 else 'shared'
+    mgr._check_cpu_compatibility = lambda vm, target, node_status=None: {'compatible': True}
+    mgr._check_affinity_violation = lambda vmid, target, vm_nodes: {'violation': False}
+    return mgr
+
+
+def test_plan_balance_applies_balancer_exclusions():
+    node_status = {n: {'status': 'online', 'cpu_percent': 0, 'mem_used': used * G, 'mem_total': 64 * G,
+                       'disk_percent': 0, 'score': 0, 'cpuinfo': {'cpus': 16}}
+                   for n, used in (('a', 48), ('b', 16), ('c', 16))}
+    node_status['c']['maintenance_mode'] = True
+    rows = [_vm(v, 'a', cores=0, mem_g=4) for v in range(100, 108)]
+    rows[5]['type'] = 'lxc'                      # 105: containers off
+    mgr = _manager(rows, node_status)
+    plan = mgr.plan_balance()
+    moved = {m['vmid'] for m in plan['moves']}
+    # 101 excluded, 102 plb_ignore, 103 pinned to a maintenance node, 104 local disks
+    assert moved and moved <= {100, 106, 107}
+    assert all(m['to'] == 'b' for m in plan['moves'])
+    assert 'c' not in plan['predicted_scores']
+    assert mgr.last_balance_plan is plan
+
+
+def test_balance_cycle_runs_whole_swaps_on_small_clusters():
+    node_status = {n: {'status': 'online', 'score': sc} for n, sc in (('a', 75.0), ('b', 25.0))}
+    nodes = [PlanNode('a', 1, 0, 64 * G, 48 * G), PlanNode('b', 1, 0, 64 * G, 16 * G)]
+    rows = [_vm(1, 'a', cores=0, mem_g=32), _vm(2, 'b', cores=0, mem_g=12)]
+    plan = plan_placement(nodes, [PlanVM(r) for r in rows], (0, 1, 0), 20)
+    mgr = _manager(rows, node_status, name='c1', check_interval=300, auto_migrate=True)
+    mgr.config.dry_run = False
+    mgr.check_balance_needed = lambda ns: (True, 'a', 'b')
+    mgr.plan_balance = lambda ns=None: plan
+    mgr._enforce_affinity_rules = lambda ns: 0
+    migrated = []
+    mgr.migrate_vm = lambda vm, target: migrated.append((vm['vmid'], vm['node'], target)) or True
+    mgr.logger.error = lambda *a: None
+
+    mgr.run_balance_check()       # 2 nodes → max_migrations = 1, the swap still runs whole
+    assert migrated == [(1, 'a', 'b'), (2, 'b', 'a')]
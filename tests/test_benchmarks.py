@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""Tests for the benchmark harness (benchmarks/): the fake PVE API is
+deterministic and serves the manager's hot paths without misses, and the
+runner's baseline comparison flags regressions."""
+from benchmarks import runner
+from benchmarks.fake_pve import SyntheticCluster, FakePVEAdapter, make_manager
+
+
+def test_fake_pve_serves_manager_hot_paths(db):
+    a, b = SyntheticCluster(nodes=3, vms=20, seed=7), SyntheticCluster(nodes=3, vms=20, seed=7)
+    assert a.guests == b.guests and a.tasks == b.tasks
+
+    adapter = FakePVEAdapter(a, unreachable={'pve3'})
+    mgr = make_manager(a, adapter)
+    mgr._node_status_ttl = 0
+    vms = mgr.get_vm_resources()
+    assert [v['vmid'] for v in vms] == list(range(100, 120))
+    assert all('cpu_percent' in v for v in vms)
+    nodes = mgr.get_node_status()
+    assert set(nodes) == {'pve1', 'pve2', 'pve3'}
+    assert nodes['pve1']['mem_total'] == a.nodes['pve1']['maxmem']
+    assert len(mgr.get_tasks(limit=50)) == 50
+    mgr.run_balance_check(force=True)
+    assert adapter.misses == set()
+
+    env = runner.BenchEnv(nodes=2, vms=10)
+    fn = runner.CASES['get_vm_resources']['setup'](env)
+    res = runner.measure(fn, iterations=5, warmup=1, alloc_iterations=1, adapter=env.adapter)
+    assert res['iterations'] == 5 and res['requests_per_op'] == 1.0
+    assert 0 < res['p50_ms'] <= res['p99_ms'] and res['alloc_peak_kib'] > 0
+
+
+def test_compare_flags_regressions():
+    base = {'meta': {'params': {'vms': 500}},
+            'results': {'x': {'p50_ms': 10.0, 'p99_ms': 20.0, 'ops_per_sec': 100.0, 'alloc_peak_kib': 50.0}}}
+    cur = {'meta': {'params': {'vms': 500}},
+           'results': {'x': {'p50_ms': 14.0, 'p99_ms': 21.0, 'ops_per_sec': 70.0, 'alloc_peak_kib': 50.0},
+                       'new_case': {'p50_ms': 1.0}}}
+    rows = {r['metric']: r for r in runner.compare(cur, base, threshold=0.25)}
+    assert rows['p50_ms']['regression'] and rows['ops_per_sec']['regression']
+    assert not rows['p99_ms']['regression'] and not rows['alloc_peak_kib']['regression']
+    assert {r['case'] for r in rows.values()} == {'x'}   # cases missing from the baseline are skipped
+    assert runner.params_mismatch(cur, base) == []
+    assert runner.params_mismatch({'meta': {'params': {'vms': 50}}}, base) == ['vms']
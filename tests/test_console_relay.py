@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""Tests for the console relay (pegaprox/utils/console_relay.py): the session
+cap refuses new consoles (vnc-poll answers 503 + Retry-After), per-session
+counters feed the exporter, the adaptive read size follows the traffic, the
+long-poll coalescer batches a burst into one encrypted frame, and the SSH
+tunnel pumper moves bytes both ways and tears down on EOF."""
+import base64
+import os
+import socket
+import time
+
+import gevent
+import gevent.event
+
+import pegaprox.api.metrics_exporter as mx
+from pegaprox.utils import console_relay as cr
+from pegaprox.utils import vnc_polling
+from pegaprox.utils.vnc_crypto import VncCryptoSession
+from pegaprox.utils.vnc_tunnel import _Pumper
+
+
+def test_cap_rejects_and_release_frees_slot(api, seed, monkeypatch):
+    reg = cr.ConsoleRelayRegistry(cap=2)
+    monkeypatch.setattr(cr, '_registry', reg)
+    a = cr.admit('websocket', 'c1', 100, 'alice')
+    with cr.admit('poll', 'c1', 101) as b:
+        try:
+            cr.admit('poll', 'c1', 102)
+            assert False, 'third session admitted past the cap'
+        except cr.ConsoleCapacityError:
+            pass
+        b.record('down', 4000, 0.002)
+        b.record('up', 10)
+    a.release()
+    a.release()   # idempotent
+    st = cr.stats()
+    assert st['active'] == 0 and st['admitted'] == 2 and st['rejected'] == 1
+    assert st['bytes_down'] == 4000 and st['bytes_up'] == 10
+
+    # a full relay turns the poll-open into a 503 before any PVE login
+    monkeypatch.setattr(cr, '_registry', cr.ConsoleRelayRegistry(cap=1))
+    cr.admit('websocket', 'c1', 100)
+    api.set_manager('c1', api.make_fake_manager('c1'))
+    root = seed.user('root', role='admin', tenant_id='default')
+    r = api.as_user(root).post('/api/clusters/c1/vms/pve1/qemu/100/vnc-poll', json={'action': 'open'})
+    assert r.status_code == 503 and r.headers['Retry-After'] == '10'
+    assert cr.stats()['rejected'] == 1
+
+    fam = mx._render_self()
+    assert b'pegaprox_console_sessions 1' in fam.buffers['pegaprox_console_sessions']
+    assert b'pegaprox_console_sessions_rejected_total 1' in fam.buffers['pegaprox_console_sessions_rejected_total']
+    lat = fam.buffers['pegaprox_console_latency_seconds_max']
+    assert b'cluster_id="c1"' in lat and b'kind="websocket"' in lat
+    # aggregated per cluster/kind: no session ids, vmids or users on the scrape
+    assert b'vmid=' not in lat and b'user=' not in fam.buffers['pegaprox_console_bytes_per_second']
+
+
+def test_adaptive_buffer_grows_and_shrinks():
+    buf = cr.AdaptiveBuffer()
+    for _ in range(10):
+        buf.feed(buf.size)
+    assert buf.size == cr.BUF_MAX
+    for _ in range(7):
+        buf.feed(100)
+    assert buf.size == cr.BUF_MAX      # a few small reads don't shrink it yet
+    buf.feed(100)
+    assert buf.size == cr.BUF_MAX // 2
+    for _ in range(64):
+        buf.feed(10)
+    assert buf.size == cr.BUF_MIN
+
+
+def test_coalescer_batches_a_burst():
+    fc = cr.FrameCoalescer(window=0.05, max_batch=10)
+    assert fc.take(0.01) == (b'', 0.0)
+
+    fc.put(b'abc')
+    gevent.spawn_later(0.01, fc.put, b'def')
+    data, waited = fc.take(1.0)
+    assert data == b'abcdef' and waited >= 0.01
+
+    # max_batch bounds one response, the rest stays for the next poll
+    for chunk in (b'12345', b'6789', b'XY'):
+        fc.put(chunk)
+    assert fc.take(1.0)[0] == b'123456789'
+    assert fc.take(1.0)[0] == b'XY' and fc.queued == 0
+    fc.close()
+    t0 = time.monotonic()
+    assert fc.take(5.0) == (b'', 0.0) and time.monotonic() - t0 < 1
+
+
+class _PveWs:
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.sent = []
+        self.closed = False
+        self.hangup = gevent.event.Event()
+
+    def settimeout(self, t):
+        pass
+
+    def recv(self):
+        gevent.sleep(0)
+        if self.chunks:
+            return self.chunks.pop(0)
+        self.hangup.wait()
+        return b''
+
+    def send_binary(self, data):
+        self.sent.append(data)
+
+    def close(self):
+        self.closed = True
+
+
+def test_poll_session_sends_one_encrypted_frame():
+    reg = cr.ConsoleRelayRegistry(cap=4)
+    key = os.urandom(32)
+    server, browser = VncCryptoSession(key), VncCryptoSession(key)
+    pve = _PveWs([b'RFB 003.008\n', b'\x00' * 5000, 'x'])
+    sess = vnc_polling.VncPollSession('p' * 24, pve, None, server, 'c1', 'qemu', 100, 'pve1',
+                                      relay=reg.admit('poll', 'c1', 100))
+    frames = sess.recv(max_wait=2.0)
+    assert len(frames) == 1
+    assert browser.decrypt(frames[0]) == b'RFB 003.008\n' + b'\x00' * 5000 + b'x'
+
+    sess.send(base64.b64encode(browser.encrypt(b'\x03\x01')).decode())
+    assert pve.sent == [b'\x03\x01']
+    snap = reg.stats()['sessions'][0]
+    assert snap['bytes_down'] == 5013 and snap['chunks_down'] == 1 and snap['bytes_up'] == 2
+
+    # PVE hung up on its own — stop() still has to free the slot
+    pve.hangup.set()
+    gevent.sleep(0.01)
+    assert sess.closed and sess.recv(max_wait=0.1) == []
+    sess.stop()
+    assert pve.closed and reg.active() == 0
+
+
+class _Channel:
+    """paramiko Channel stand-in backed by a socket."""
+
+    def __init__(self, sock):
+        self._s = sock
+        self.closed = False
+
+    def recv(self, n):
+        return self._s.recv(n)
+
+    def sendall(self, data):
+        self._s.sendall(data)
+
+    def close(self):
+        self.closed = True
+        self._s.close()
+
+
+def test_tunnel_pumper_relays_both_ways_and_stops_on_eof():
+    browser, local = socket.socketpair()
+    chan_sock, pve = socket.socketpair()
+    chan = _Channel(chan_sock)
+    pumper = _Pumper(local, chan, 5999)
+    pumper.start()
+
+    payload = os.urandom(300 * 1024)
+    gevent.spawn(browser.sendall, payload)
+    got = bytearray()
+    while len(got) < len(payload):
+        got += pve.recv(65536)
+    assert bytes(got) == payload
+    pve.sendall(b'framebuffer')
+    assert browser.recv(100) == b'framebuffer'
+
+    pve.close()                  # far end goes away → both directions wind down
+    browser.settimeout(2)
+    assert browser.recv(100) == b''
+    assert chan.closed
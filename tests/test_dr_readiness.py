@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Tests for the site-recovery readiness index (pegaprox/core/dr_readiness.py):
+blockers and RPO breaches come from the in-memory index without DB reads,
+replication runs and plan/job edits keep it current, and the auto-failover
+heartbeat gates on it — but never on replica age."""
+from datetime import datetime
+
+from pegaprox.api import site_recovery as sr_api
+from pegaprox.api import vms as vms_api
+from pegaprox.background import site_recovery as sr_bg
+from pegaprox.core import dr_readiness as dr
+
+T0 = datetime(2026, 10, 17, 12, 0).timestamp()
+
+
+class _Clock:
+    def __init__(self, t):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+def _seed(db, auto_failover=0):
+    c = db.conn.cursor()
+    c.execute('''INSERT INTO site_recovery_plans (id, group_id, name, source_cluster, target_cluster,
+                 auto_failover, failover_timeout, status) VALUES ('p1', '', 'web', 'c1', 'c2', ?, 60, 'ready')''',
+              (auto_failover,))
+    ok_run = datetime.fromtimestamp(T0 - 3600).isoformat()
+    for jid, vmid, enabled, status, last_run in (('j1', 100, 1, 'ok', ok_run), ('j2', 101, 1, 'ok', ok_run),
+                                                 ('j3', 102, 0, 'ok', ok_run)):
+        c.execute('''INSERT INTO cross_cluster_replications (id, source_cluster, target_cluster, vmid,
+                     schedule, enabled, last_status, last_run) VALUES (?, 'c1', 'c2', ?, '0 */6 * * *', ?, ?, ?)''',
+                  (jid, vmid, enabled, status, last_run))
+    for vid, vmid, jid in (('v1', 100, 'j1'), ('v2', 101, 'j2'), ('v3', 102, 'j3'), ('v4', 103, '')):
+        c.execute('''INSERT INTO site_recovery_vms (id, plan_id, vmid, replication_job_id)
+                     VALUES (?, 'p1', ?, ?)''', (vid, vmid, jid))
+    db.conn.commit()
+
+
+def test_blockers_and_rpo_from_memory(db, monkeypatch):
+    _seed(db)
+    clock = _Clock(T0)
+    idx = dr.ReadinessIndex(clock=clock, resync=10 ** 9)
+    assert idx.blockers('p1') == ['VM 102: replication disabled', 'VM 103 has no replication job linked']
+    s = idx.summary('p1')
+    assert s['vms'] == 4 and s['blockers'] == 2 and s['rpo_breached'] == 0 and s['max_age_seconds'] == 3600
+
+    # after the load, reads never touch the DB
+    def boom(*a, **kw):
+        raise AssertionError('DB read')
+    monkeypatch.setattr(db, 'query', boom)
+    monkeypatch.setattr(db, 'query_one', boom)
+
+    # 6h schedule x RPO_FACTOR 2 → 12h; j1/j2 last ran 1h ago
+    clock.t += 11 * 3600 + 1
+    s = idx.summary('p1')
+    assert s['rpo_breached'] == 2 and s['blockers'] == 2 and not s['ready']
+    assert idx.vm_status('p1')[101]['rpo_breached'] and idx.vm_status('p1')[101]['age_seconds'] == 43201
+    # replica age is reported, never a failover blocker (it only grows while the source is down)
+    assert idx.blockers('p1') == ['VM 102: replication disabled', 'VM 103 has no replication job linked']
+    idx.note_replication('j1', 'ok', clock.t)
+    idx.note_replication('j2', 'error', clock.t)
+    st = idx.vm_status('p1')
+    assert st[100]['age_seconds'] == 0 and not st[100]['rpo_breached'] and st[100]['rpo_seconds'] == 43200
+    assert 'VM 101: last replication status=error' in idx.blockers('p1')
+    assert idx.summary('p1')['rpo_breached'] == 0 and idx.counters['loads'] == 1
+
+
+def test_edits_and_replication_runs_follow_the_tables(db, monkeypatch):
+    _seed(db)
+    idx = dr.ReadinessIndex(clock=_Clock(T0))
+    monkeypatch.setattr(dr, '_index', idx)
+    assert not idx.summary('p1')['ready']
+
+    # the runner's status write feeds the index
+    vms_api._update_repl_status(db, 'j1', 'error', 'boom')
+    assert idx.vm_status('p1')[100]['last_status'] == 'error'
+    vms_api._update_repl_status(db, 'j1', 'ok')
+
+    c = db.conn.cursor()
+    c.execute("UPDATE cross_cluster_replications SET enabled = 1 WHERE id = 'j3'")
+    c.execute("DELETE FROM site_recovery_vms WHERE id = 'v4'")
+    db.conn.commit()
+    dr.job_changed('j3')
+    dr.plan_changed('p1')
+    assert idx.blockers('p1') == [] and idx.summary('p1')['ready']
+
+    c.execute("DELETE FROM cross_cluster_replications WHERE id = 'j2'")
+    db.conn.commit()
+    dr.job_changed('j2')
+    assert idx.blockers('p1') == ['VM 101: replication job j2 not found']
+
+    c.execute("DELETE FROM site_recovery_plans WHERE id = 'p1'")
+    db.conn.commit()
+    dr.plan_changed('p1')
+    assert idx.summary() == {} and idx.blockers('p1') == []
+    assert idx.counters['loads'] == 1
+
+
+def test_heartbeat_gates_on_the_index(db, monkeypatch):
+    _seed(db, auto_failover=1)
+    idx = dr.ReadinessIndex(clock=_Clock(T0))
+    monkeypatch.setattr(dr, '_index', idx)
+    spawned, audits = [], []
+    monkeypatch.setattr(sr_api, '_safe_spawn_failover', lambda func, pid, *a: spawned.append((pid, a)))
+    monkeypatch.setattr(sr_bg, 'log_audit', lambda user, action, details=None, **kw: audits.append(action))
+    monkeypatch.setattr(sr_bg, '_cooldowns', {})
+    monkeypatch.setattr(sr_bg, '_last_fail_times', {'p1': sr_bg.time.time() - 120})
+
+    sr_bg._heartbeat_check()
+    assert spawned == [] and audits == ['site_recovery.auto_failover_blocked']
+    assert sr_bg._cooldowns['p1'] > sr_bg.time.time() + 500
+
+    c = db.conn.cursor()
+    c.execute("UPDATE cross_cluster_replications SET enabled = 1 WHERE id = 'j3'")
+    c.execute("UPDATE site_recovery_vms SET replication_job_id = 'j1' WHERE id = 'v4'")
+    db.conn.commit()
+    dr.job_changed('j3')
+    dr.plan_changed('p1')
+    # a long outage: every replica is far past its RPO, failover still goes ahead
+    idx._clock.t += 7 * 86400
+    assert idx.summary('p1')['rpo_breached'] == 4
+    sr_bg._cooldowns.clear()
+    sr_bg._last_fail_times['p1'] = sr_bg.time.time() - 120
+    sr_bg._heartbeat_check()
+    assert spawned == [('p1', ('emergency',))] and audits[-1] == 'site_recovery.auto_failover'
+    row = db.query_one("SELECT status FROM site_recovery_plans WHERE id = 'p1'")
+    assert row['status'] == 'running'
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Tests for the drift scanner (pegaprox/api/drift.py): parallel state fetch,
+per-VM config digests persisted with the baselines, and digest-based skipping
+of unchanged guests on rescans."""
+import pegaprox.api.drift as drift
+from pegaprox.globals import cluster_managers
+
+
+class _Resp:
+    def __init__(self, data):
+        self.status_code = 200
+        self._data = data
+
+    def json(self):
+        return {'data': self._data}
+
+
+class _FakeMgr:
+    host, api_port, is_connected = 'pve', 8006, True
+
+    def __init__(self, configs):
+        self.nodes = {'n1': {}}
+        self.configs = configs
+        self.config_reads = []
+
+    def get_vm_resources(self, **kw):
+        return [{'type': 'qemu', 'vmid': v, 'node': 'n1'} for v in self.configs]
+
+    def _api_get(self, url):
+        path = url.split('/api2/json', 1)[1]
+        if path == '/cluster/options':
+            return _Resp({'keyboard': 'de'})
+        if path == '/storage':
+            return _Resp([{'storage': 'local', 'content': 'iso,images'}])
+        if path == '/nodes/n1/network':
+            return _Resp([{'iface': 'vmbr0', 'address': '10.0.0.1', 'active': 1}])
+        vmid = int(path.split('/')[4])
+        self.config_reads.append(vmid)
+        return _Resp(dict(self.configs[vmid]))
+
+
+def _cfg(digest, **kw):
+    return dict({'digest': digest, 'memory': 2048, 'cores': 2}, **kw)
+
+
+def test_fetch_state_order_and_digests(db):
+    mgr = _FakeMgr({100: _cfg('d100'), 101: _cfg('d101', lock='backup')})
+    digests = {}
+    state = drift._fetch_state(mgr, 'c1', digests=digests)
+    assert [k for k, _, _ in state] == ['cluster_options', 'storage', 'network', 'vm_config', 'vm_config']
+    assert state[1][2]['content'] == 'images,iso'
+    assert state[4] == ('vm_config', 'qemu/101', {'memory': 2048, 'cores': 2})
+    assert digests == {'qemu/100': 'd100', 'qemu/101': 'd101'}
+
+
+def test_rescan_skips_guests_with_known_digest(db, monkeypatch):
+    monkeypatch.setattr('pegaprox.background.alerts._notification_handlers', [], raising=False)
+    mgr = _FakeMgr({100: _cfg('a'), 101: _cfg('b'), 102: _cfg('c')})
+    monkeypatch.setitem(cluster_managers, 'c1', mgr)
+
+    seeded = drift._scan_cluster('c1', autobaseline=True)
+    assert seeded['seeded_baselines'] == 6 and seeded['events_count'] == 0
+    assert drift._load_baselines('c1')[('vm_config', 'qemu/100')]['digest'] == 'a'
+
+    again = drift._scan_cluster('c1')
+    assert again['unchanged'] == 3 and again['events_count'] == 0
+
+    # 101: only a volatile key changed → diffed once, clean digest remembered
+    # 102: real drift → event every scan while it persists
+    mgr.configs[101] = _cfg('b2', lock='snapshot')
+    mgr.configs[102] = _cfg('c2', memory=4096)
+    r = drift._scan_cluster('c1')
+    assert r['unchanged'] == 1 and r['events_count'] == 1
+    assert r['events'][0]['scope'] == 'qemu/102' and r['events'][0]['severity'] == 'warning'
+    assert drift._load_baselines('c1')[('vm_config', 'qemu/101')]['last_digest'] == 'b2'
+
+    r = drift._scan_cluster('c1')
+    assert r['unchanged'] == 2 and r['events_count'] == 1
+
+
+def test_failed_or_timed_out_reads_are_not_reported_as_removed(db, monkeypatch):
+    import time
+    monkeypatch.setattr('pegaprox.background.alerts._notification_handlers', [], raising=False)
+    mgr = _FakeMgr({100: _cfg('a'), 101: _cfg('b'), 102: _cfg('c')})
+    monkeypatch.setitem(cluster_managers, 'c1', mgr)
+    assert drift._scan_cluster('c1', autobaseline=True)['seeded_baselines'] == 6
+
+    # 101's node errors out, 102's read hangs past the chunk timeout
+    real_get = mgr._api_get
+
+    def flaky(url):
+        if url.endswith('/qemu/101/config') or url.endswith('/n1/network'):
+            return None
+        if url.endswith('/qemu/102/config'):
+            time.sleep(5)
+        return real_get(url)
+    monkeypatch.setattr(mgr, '_api_get', flaky)
+    monkeypatch.setattr(drift, '_FETCH_CHUNK_TIMEOUT', 0.2)
+    failed = set()
+    t0 = time.time()
+    drift._fetch_state(mgr, 'c1', failed=failed)
+    assert time.time() - t0 < 2
+    assert failed == {('vm_config', 'qemu/101'), ('vm_config', 'qemu/102'), ('network', 'n1/')}
+    r = drift._scan_cluster('c1')
+    assert r['events_count'] == 0 and r['removed'] == [] and r['unreadable'] == 3
+
+    # an empty guest list is what a failed walk returns — no mass "removed"
+    monkeypatch.setattr(mgr, '_api_get', real_get)
+    monkeypatch.setattr(mgr, 'get_vm_resources', lambda **kw: [])
+    r = drift._scan_cluster('c1')
+    assert r['removed'] == [] and r['unreadable'] == 3
+
+    # a guest that really is gone still is
+    monkeypatch.setattr(mgr, 'get_vm_resources',
+                        lambda **kw: [{'type': 'qemu', 'vmid': v, 'node': 'n1'} for v in (100, 101)])
+    assert drift._scan_cluster('c1')['removed'] == ['qemu/102']
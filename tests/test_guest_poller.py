@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""Tests for the adaptive guest-agent poller (pegaprox/core/guest_poller.py):
+new / rebooted guests are due at once, unchanged answers back off, focused
+guests stay fresh, the per-node cap defers the rest, and refresh_ip_cache only
+probes what the planner hands it."""
+import threading
+import logging
+
+import pegaprox.core.manager as manager_mod
+from pegaprox.core import guest_poller as gp
+from pegaprox.core.manager import PegaProxManager
+from pegaprox.globals import sse_clients, sse_clients_lock
+from pegaprox.utils.realtime import focused_guests
+
+
+def _vm(vmid, node='pve1', uptime=100, status='running', vm_type='qemu'):
+    return {'vmid': vmid, 'node': node, 'status': status, 'uptime': uptime, 'type': vm_type}
+
+
+def test_intervals_back_off_and_reset():
+    p = gp.GuestPollPlanner(min_interval=10, max_interval=80, node_rate=100)
+    res = [_vm(100), _vm(101), _vm(102, status='stopped')]
+    assert [r['vmid'] for r in p.plan(res, now=0)] == [100, 101]
+    p.record('pve1', 100, (('10.0.0.5',), 40), now=0)
+    p.record('pve1', 101, ((), None), now=0)
+
+    intervals = []
+    t = 0
+    for _ in range(5):   # same answer every time → 20, 40, 80, 80, 80
+        t += 100
+        assert 100 in [r['vmid'] for r in p.plan(res, now=t)]
+        p.record('pve1', 100, (('10.0.0.5',), 40), now=t)
+        intervals.append(p._guests[('pve1', 100)]['interval'])
+    assert intervals == [20, 40, 80, 80, 80]
+
+    t += 100
+    p.plan(res, now=t)
+    p.record('pve1', 100, (('10.0.0.9',), 40), now=t)   # new IP → fast again
+    assert p._guests[('pve1', 100)]['interval'] == 10
+
+    # reboot (uptime went down) and migration (new node) are due immediately
+    p.record('pve1', 101, ((), None), now=t)
+    assert 101 not in [r['vmid'] for r in p.plan([_vm(101, uptime=200)], now=t + 1)]
+    assert [r['vmid'] for r in p.plan([_vm(101, uptime=5)], now=t + 2)] == [101]
+    assert [r['vmid'] for r in p.plan([_vm(101, node='pve2')], now=t + 3)] == [101]
+    assert set(p._guests) == {('pve2', 101)}      # gone guests are dropped
+
+    st = p.stats(now=t + 3)
+    assert st['unchanged'] == 6 and st['changed'] == 1 and st['never_checked'] == 1
+    assert st['hit_ratio'] == round(6 / 7, 3)
+
+
+def test_focus_first_and_per_node_cap():
+    p = gp.GuestPollPlanner(min_interval=10, max_interval=600, focus_interval=15, node_rate=0.5)
+    res = [_vm(i) for i in range(100, 120)] + [_vm(i, node='pve2') for i in range(200, 203)]
+    first = p.plan(res, focus={119}, now=0)
+    # 0.5/s over one POLL_TICK → 5 per node; the focused guest jumps the queue
+    assert first[0]['vmid'] == 119
+    assert sum(r['node'] == 'pve1' for r in first) == 5 and sum(r['node'] == 'pve2' for r in first) == 3
+    assert p.counters['deferred'] == 15
+    for r in first:
+        p.record(r['node'], r['vmid'], ((), None), now=0)
+
+    # the focused guest comes back after focus_interval even though its
+    # schedule says otherwise; the deferred ones are next in line
+    p.record('pve1', 119, ((), None), now=0)
+    p.record('pve1', 119, ((), None), now=0)
+    nxt = [r for r in p.plan(res, focus={119}, now=16) if r['node'] == 'pve1']
+    assert nxt[0]['vmid'] == 119 and len(nxt) == 5
+    assert all(r['vmid'] not in {x['vmid'] for x in first} for r in nxt[1:])
+
+    # after an unwatched stretch everything is due again, still within the cap
+    p.mark_stale(now=17)
+    again = p.plan(res, now=26)
+    assert len(again) == 5 + 3 and p.counters['skipped'] == 0
+
+
+def _bare_manager(resources):
+    mgr = PegaProxManager.__new__(PegaProxManager)
+    mgr.id = 'c1'
+    mgr.is_connected = True
+    mgr.session = object()
+    mgr.logger = logging.getLogger('test')
+    mgr._ip_cache, mgr._disk_cache = {}, {}
+    mgr._ip_cache_lock, mgr._disk_cache_lock = threading.Lock(), threading.Lock()
+    mgr._guest_poller = gp.GuestPollPlanner(node_rate=100)
+    mgr.get_vm_resources = lambda max_age=0: resources
+    mgr.calls = []
+
+    def qemu_ips(node, vmid):
+        mgr.calls.append(('ips', vmid))
+        return ['10.0.0.%d' % (vmid - 99)]
+
+    def qemu_disk(node, vmid):
+        mgr.calls.append(('disk', vmid))
+        return {'used': 10 * vmid, 'total': 1000 * vmid}
+
+    def lxc_ips(node, vmid):
+        mgr.calls.append(('lxc', vmid))
+        return ['10.1.0.1']
+
+    mgr._fetch_qemu_ips, mgr._fetch_qemu_disk_usage, mgr._fetch_lxc_ips = qemu_ips, qemu_disk, lxc_ips
+    return mgr
+
+
+def test_refresh_ip_cache_probes_only_due_guests(monkeypatch):
+    monkeypatch.setattr(manager_mod, 'focused_guests', lambda cid: set())
+    mgr = _bare_manager([_vm(100), _vm(101, vm_type='lxc'), _vm(102, status='stopped')])
+    mgr.refresh_ip_cache()
+    assert sorted(mgr.calls) == [('disk', 100), ('ips', 100), ('lxc', 101)]
+    assert mgr._ip_cache == {('pve1', 100): ['10.0.0.1'], ('pve1', 101): ['10.1.0.1']}
+    assert mgr._disk_cache == {('pve1', 100): {'used': 1000, 'total': 100000}}
+
+    mgr.calls.clear()
+    mgr.refresh_ip_cache()          # nothing is due yet → no agent traffic
+    assert mgr.calls == []
+    assert mgr._guest_poller.counters['skipped'] == 2
+
+
+def test_subscribe_focus_feeds_focused_guests(api, seed):
+    root = seed.user('root', role='admin', tenant_id='default')
+    with sse_clients_lock:
+        sse_clients['cl-1'] = {'queue': None, 'user': 'root', 'clusters': None}
+    try:
+        r = api.as_user(root).post('/api/sse/subscribe', json={
+            'client_id': 'cl-1', 'clusters': ['c1'],
+            'focus': {'c1': [100, '101', 'x'], 'c2': [5]}})
+        assert r.status_code == 200
+        assert focused_guests('c1') == {100, 101} and focused_guests('c2') == set()
+
+        # the refresh loop re-probes the focused guest while the others back off
+        mgr = _bare_manager([_vm(100), _vm(102)])
+        mgr._guest_poller = gp.GuestPollPlanner(node_rate=100, focus_interval=0)
+        mgr.refresh_ip_cache()
+        mgr.calls.clear()
+        mgr.refresh_ip_cache()
+        assert sorted(mgr.calls) == [('disk', 100), ('ips', 100)]
+    finally:
+        with sse_clients_lock:
+            sse_clients.pop('cl-1', None)
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""Tests for the incremental replication relay (pegaprox/core/incremental_repl.py):
+the pipelined relay moves a stream intact and reports its telemetry, compressed
+streams report raw size and the exporter's real exit status, and multi-disk
+jobs run as parallel streams on their own ssh connections."""
+import os
+import re
+import threading
+import time
+
+from pegaprox.core import incremental_repl as ir
+
+
+class _Chan:
+    def __init__(self, chunks=(), rc=0):
+        self._chunks = list(chunks)
+        self.rc = rc
+        self.received = bytearray()
+        self.closed = False
+
+    def settimeout(self, t):
+        pass
+
+    def recv(self, n):
+        if not self._chunks or self.closed:
+            return b''
+        data = self._chunks.pop(0)
+        if len(data) > n:
+            self._chunks.insert(0, data[n:])
+            data = data[:n]
+        return data
+
+    def sendall(self, data):
+        self.received += data
+
+    def shutdown_write(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def recv_exit_status(self):
+        return self.rc
+
+
+class _Out:
+    def __init__(self, text='', channel=None):
+        self._text = text
+        self.channel = channel
+
+    def read(self):
+        return self._text.encode()
+
+
+class _FakeSSH:
+    """exec_command() stand-in: `cat <file>` reads from .files, known probes
+    answer from .tools, anything else is a data stream on a fresh _Chan."""
+
+    def __init__(self, chunks=(), rc=0, files=None, tools=''):
+        self.chunks, self.rc = chunks, rc
+        self.files = files or {}
+        self.tools = tools
+        self.cmds = []
+        self.chan = None
+        self.closed = False
+
+    def exec_command(self, cmd, timeout=None):
+        self.cmds.append(cmd)
+        if cmd.startswith('cat '):
+            path = cmd.split()[1]
+            return None, _Out(self.files.pop(os.path.splitext(path)[1], '')), None
+        if cmd.startswith('for t in'):
+            return None, _Out(self.tools), _Out()
+        self.chan = _Chan(self.chunks, self.rc)
+        return None, _Out(channel=self.chan), None
+
+    def close(self):
+        self.closed = True
+
+
+def test_relay_pipelined_and_reports_throughput():
+    payload = [os.urandom(n) for n in (1000, 300000, 5 * 1024 * 1024, 17, 2 * 1024 * 1024)]
+    src, tgt = _FakeSSH(chunks=payload), _FakeSSH()
+    res = ir._relay_pipe(src, 'rbd export x -', tgt, 'rbd import - y', chunk=64 * 1024)
+    assert res['ok'] and res['error'] == ''
+    assert bytes(tgt.chan.received) == b''.join(payload)
+    assert res['bytes'] == res['raw_bytes'] == sum(map(len, payload))
+    assert res['compression'] is None and res['seconds'] >= 0 and res['stall_seconds'] == 0
+    assert re.fullmatch(r'rbd export x - 2>/tmp/pegaprox-repl-[\d-]+\.serr', src.cmds[0])
+
+    # failing importer → not ok, its stderr surfaces
+    tgt = _FakeSSH(rc=1, files={'.terr': 'import-diff: bad header'})
+    res = ir._relay_pipe(_FakeSSH(chunks=[b'x' * 10]), 'a', tgt, 'b')
+    assert not res['ok'] and 'tgt: import-diff: bad header' in res['error']
+
+
+def test_compressed_relay_uses_exporter_status_and_decoded_size():
+    src = _FakeSSH(chunks=[b'z' * 4000], files={'.src': '0'})
+    tgt = _FakeSSH(files={'.dec': '0', '.zerr': '*** zstd v1.5 ***\n/*stdin*\\  : 16000 bytes'})
+    res = ir._relay_pipe(src, 'zfs send p@s', tgt, 'zfs recv q', compression='zstd')
+    assert res['ok'] and res['bytes'] == 4000 and res['raw_bytes'] == 16000
+    assert '| zstd -q -1 -T0 -c' in src.cmds[0] and src.cmds[0].startswith('{ zfs send p@s 2>')
+    assert 'zstd -d -v -c' in tgt.cmds[0] and '| zfs recv q >' in tgt.cmds[0]
+    stats = ir.transfer_stats([res], 2.0)
+    assert stats['compress_ratio'] == 4.0 and stats['bytes_per_sec'] == 8000.0
+
+    # the compressor exits 0 even when the exporter died — the rc file tells
+    src = _FakeSSH(chunks=[b'z'], files={'.src': '2', '.serr': 'zfs: dataset busy'})
+    res = ir._relay_pipe(src, 'zfs send p@s', _FakeSSH(files={'.dec': '0'}), 'zfs recv q', compression='zstd')
+    assert not res['ok'] and res['src_rc'] == 2 and 'dataset busy' in res['error']
+
+    # exporter channel itself failed: its rc file is still read back (and removed)
+    src = _FakeSSH(chunks=[b'z'], rc=255, files={'.src': '0'})
+    res = ir._relay_pipe(src, 'zfs send p@s', _FakeSSH(files={'.dec': '0'}), 'zfs recv q', compression='zstd')
+    assert not res['ok'] and res['src_rc'] == 255 and '.src' not in src.files
+
+
+def test_relay_removes_its_tmp_files_when_it_bails_out():
+    class _Broken(_FakeSSH):
+        def exec_command(self, cmd, timeout=None):
+            if not cmd.startswith(('cat ', 'rm ')):
+                self.cmds.append(cmd)
+                raise OSError('channel open failed')
+            return super().exec_command(cmd, timeout)
+    src, tgt = _FakeSSH(chunks=[b'z']), _Broken()
+    try:
+        ir._relay_pipe(src, 'zfs send p@s', tgt, 'zfs recv q', compression='zstd')
+    except OSError:
+        pass
+    else:
+        raise AssertionError('expected the channel error')
+    tok = src.cmds[0].split('2>', 1)[1].split('.serr')[0]
+    assert src.cmds[-1] == tgt.cmds[-1] == f"rm -f {tok}.*"
+
+
+def test_pick_compression_needs_tool_on_both_nodes():
+    assert ir.pick_compression(_FakeSSH(tools='zstd\nlz4'), _FakeSSH(tools='lz4'), 'auto') == 'lz4'
+    assert ir.pick_compression(_FakeSSH(tools='zstd'), _FakeSSH(tools='zstd'), 'auto') == 'zstd'
+    assert ir.pick_compression(_FakeSSH(tools='zstd'), _FakeSSH(tools=''), 'zstd') is None
+    assert ir.pick_compression(_FakeSSH(tools='zstd'), _FakeSSH(tools='zstd'), 'none') is None
+
+
+def test_run_streams_parallel_on_own_connections():
+    lock = threading.Lock()
+    seen = {'active': 0, 'peak': 0, 'pairs': set()}
+    opened = []
+
+    def ship(item, s, t):
+        with lock:
+            seen['active'] += 1
+            seen['peak'] = max(seen['peak'], seen['active'])
+            seen['pairs'].add(id(s))
+        time.sleep(0.05)
+        with lock:
+            seen['active'] -= 1
+        return {'ok': True, 'bytes': item, 'raw_bytes': item, 'stall_seconds': 0.0}
+
+    def open_pair():
+        pair = (_FakeSSH(), _FakeSSH())
+        opened.append(pair)
+        return pair
+
+    first = (_FakeSSH(), _FakeSSH())
+    out = ir.run_streams({'scsi0': 10, 'scsi1': 20, 'scsi2': 30}, ship, first, open_pair, streams=2)
+    assert {k: r['bytes'] for k, r in out.items()} == {'scsi0': 10, 'scsi1': 20, 'scsi2': 30}
+    assert seen['peak'] == 2 and len(opened) == 1 and len(seen['pairs']) == 2
+    assert all(s.closed for s in opened[0]) and not first[0].closed   # caller owns the first pair
+    assert ir.transfer_stats(out.values(), 1.0)['bytes'] == 60
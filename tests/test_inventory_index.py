@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Tests for the cross-cluster inventory index behind /api/global/search
+(pegaprox/core/inventory.py). The index must return exactly what the old
+linear substring scan returned, just without walking every guest."""
+import threading
+import time
+
+from pegaprox.api import search as search_api
+from pegaprox.core import inventory
+from pegaprox.core.inventory import ClusterInventory
+
+CID = 'cluster_1'
+
+
+def _guests():
+    return [
+        {'vmid': 100, 'type': 'qemu', 'name': 'web-prod-01', 'node': 'pve1', 'status': 'running',
+         'ip': '10.0.0.10', 'tags': 'web;production'},
+        {'vmid': 101, 'type': 'qemu', 'name': 'web-stage-01', 'node': 'pve2', 'status': 'stopped',
+         'tags': 'web;staging'},
+        {'vmid': 200, 'type': 'lxc', 'name': 'db-prod', 'node': 'pve1', 'status': 'running',
+         'ip': '10.0.1.20', 'tags': 'db;production'},
+        {'vmid': 1100, 'type': 'qemu', 'name': 'build', 'node': 'pve3', 'status': 'paused'},
+    ]
+
+
+def _scan(guests, q):
+    """Reference: the pre-index global scan (first matching field wins)."""
+    out = {}
+    for r in guests:
+        tags = [t for t in (r.get('tags') or '').lower().split(';') if t]
+        for field, vals in (('name', [(r.get('name') or '').lower()]), ('vmid', [str(r['vmid'])]),
+                            ('node', [r.get('node', '')]), ('ip', [r.get('ip') or '']), ('tag', tags)):
+            if any(q in v for v in vals):
+                out[r['vmid']] = field
+                break
+    return out
+
+
+def test_global_match_equals_linear_scan():
+    inv = ClusterInventory()
+    inv.update(_guests())
+    for q in ('we', 'web', 'prod', '10', '100', 'pve1', '10.0.1', 'stag', 'zz', 'b-p', 'ld'):
+        got = {r['vmid']: f for r, f in inv.match(q)}
+        assert got == _scan(_guests(), q), q
+
+
+def test_prefix_filters():
+    inv = ClusterInventory()
+    inv.update(_guests())
+    assert {r['vmid'] for r, _ in inv.match('web', 'tag', ['web', 'prod'])} == {100}
+    assert {r['vmid'] for r, _ in inv.match('run', 'status')} == {100, 200}
+    assert {r['vmid'] for r, _ in inv.match('pve1', 'node')} == {100, 200}
+    assert {r['vmid'] for r, _ in inv.match('10.0.0', 'ip')} == {100}
+    assert sorted(inv.tags()) == ['db', 'production', 'staging', 'web']
+
+
+def test_update_reindexes_changed_rows_and_drops_removed():
+    inv = ClusterInventory()
+    guests = _guests()
+    inv.update(guests)
+    guests = [dict(g) for g in guests if g['vmid'] != 200]
+    guests[0]['name'] = 'api-prod-01'
+    guests[1]['cpu'] = 0.5                  # not indexed → row swap only
+    inv.update(guests)
+    assert [r['vmid'] for r, _ in inv.match('web', 'tag', ['web'])] == [100, 101]
+    assert {r['vmid'] for r, f in inv.match('web-') if f == 'name'} == {101}
+    assert inv.match('api')[0][0]['vmid'] == 100
+    assert inv.match('db') == []
+    assert inv.match('stage')[0][0]['cpu'] == 0.5
+    assert 'db' not in inv.tags()
+
+
+def _wait_refreshed(timeout=5):
+    deadline = time.time() + timeout
+    while search_api._refreshing and time.time() < deadline:
+        time.sleep(0.01)
+    assert not search_api._refreshing
+
+
+def test_global_search_uses_index_and_filters_by_vm_acl(api, seed):
+    inventory.drop_cluster(CID)
+    fake = api.set_manager(CID, api.make_fake_manager(cluster_id=CID, get_vm_resources=_guests()))
+    fake.is_connected = True
+    fake.config.name = 'Prod'
+    fake.nodes = {}
+    try:
+        admin = seed.user('root', role='admin', tenant_id='default')
+        # no index yet: the search answers right away, flags the cluster and
+        # leaves the PVE walk to a background refresh
+        body = api.as_user(admin).get('/api/global/search?q=prod').get_json()
+        assert body['stale_clusters'] == [CID]
+        _wait_refreshed()
+        body = api.as_user(admin).get('/api/global/search?q=prod').get_json()
+        assert {r['vmid'] for r in body['results']} == {100, 200}
+        assert 'production' in body['tag_suggestions'] and body['stale_clusters'] == []
+        api.as_user(admin).get('/api/global/search?q=web')
+        assert fake.get_vm_resources.call_count == 1          # later searches: memory only
+
+        # hits follow the per-VM access rules: a user named on a VM ACL is
+        # confined to that VM, another user's ACL row hides nothing from a viewer
+        viewer = seed.user('alice', role='viewer', tenant_id='default')
+        bob = seed.user('bob', role='user', tenant_id='default')
+        seed.vm_acl(CID, 200, ['bob'])
+        body = api.as_user(bob).get('/api/global/search?q=prod').get_json()
+        assert {r['vmid'] for r in body['results']} == {200}
+        body = api.as_user(viewer).get('/api/global/search?q=prod').get_json()
+        assert {r['vmid'] for r in body['results']} == {100, 200}
+    finally:
+        inventory.drop_cluster(CID)
+
+
+def test_global_search_does_not_wait_for_a_slow_cluster(api, seed):
+    inventory.drop_cluster(CID)
+    release = threading.Event()
+
+    refreshes = []
+
+    def slow_walk(max_age=None):
+        # other background loops may poll the registered manager too — count
+        # only the search's own refreshes
+        if threading.current_thread().name.startswith('search-inventory-'):
+            refreshes.append(max_age)
+            release.wait(5)
+        return _guests()
+    fake = api.set_manager(CID, api.make_fake_manager(cluster_id=CID))
+    fake.get_vm_resources.side_effect = slow_walk
+    fake.is_connected = True
+    fake.config.name = 'Prod'
+    fake.nodes = {}
+    try:
+        admin = seed.user('root', role='admin', tenant_id='default')
+        t0 = time.time()
+        for _ in range(3):
+            body = api.as_user(admin).get('/api/global/search?q=prod').get_json()
+            assert body['results'] == [] and body['stale_clusters'] == [CID]
+        assert time.time() - t0 < 2
+        release.set()
+        _wait_refreshed()
+        assert refreshes == [30]                          # one refresh, not one per search
+        body = api.as_user(admin).get('/api/global/search?q=prod').get_json()
+        assert {r['vmid'] for r in body['results']} == {100, 200}
+    finally:
+        release.set()
+        inventory.drop_cluster(CID)
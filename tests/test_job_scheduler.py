@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""Tests for the shared job scheduler (pegaprox/core/job_scheduler.py): cron
+next-fire agrees with the matcher, jobs fire from the heap at their time and
+follow edits, the pool honours the worker and per-cluster limits and records
+lateness, and the snapshot-policy / scheduled-action sources keep the heap in
+step with their tables."""
+import threading
+from datetime import datetime, timedelta
+
+from pegaprox.core import job_scheduler as js
+from pegaprox.api import snapshots, schedules
+
+
+class _Clock:
+    def __init__(self, dt):
+        self.t = dt.timestamp()
+
+    def __call__(self):
+        return self.t
+
+
+class _Source(js.JobSource):
+    """In-memory jobs firing every `every` minutes on the minute."""
+
+    kind = 'fake'
+
+    def __init__(self, jobs, block=None):
+        self.jobs = jobs
+        self.runs = []
+        self.block = block
+
+    def load(self, job_id=None):
+        live = {k: v for k, v in self.jobs.items() if v.get('enabled', True)}
+        return dict(live) if job_id is None else live.get(job_id)
+
+    def next_fire(self, job, after):
+        base = after.replace(second=0, microsecond=0)
+        step = job['every']
+        return base + timedelta(minutes=step - base.minute % step)
+
+    def run(self, job, fire_at):
+        self.runs.append((job['id'], fire_at))
+        if self.block is not None:
+            self.block.wait(5)
+
+
+def test_cron_next_matches_brute_force():
+    start = datetime(2026, 2, 26, 22, 58)
+    for expr in ('*/15 * * * *', '30 2 * * 1-5', '0 0 1,15 * 0', '5 4 29 * 3', '0 */6 * * 7'):
+        expected, t = [], start
+        while len(expected) < 4 and t < start + timedelta(days=120):
+            t += timedelta(minutes=1)
+            if js.cron_match(expr, t):
+                expected.append(t)
+        got, t = [], start
+        for _ in range(len(expected)):
+            t = js.cron_next(expr, t)
+            got.append(t)
+        assert got == expected, expr
+    assert js.cron_next('0 0 31 2 *', start) is None and js.cron_next('bogus', start) is None
+    assert js.cron_next('0 12 * * *', datetime(2026, 3, 1, 11, 59, 30)) == datetime(2026, 3, 1, 12, 0)
+
+
+def test_heap_fires_due_jobs_and_follows_edits():
+    clock = _Clock(datetime(2026, 10, 17, 10, 0, 30))
+    sched = js.JobScheduler(workers=4, per_cluster=4, clock=clock)
+    src = _Source({'a': {'id': 'a', 'every': 5}, 'b': {'id': 'b', 'every': 60}})
+    sched.register(src)
+    # inside the 60s grace: 10:00 is still owed for both
+    assert sched.tick() == 2 and sched.wait_idle()
+    assert sorted(r[0] for r in src.runs) == ['a', 'b']
+    assert sched.stats()['fake']['lateness_max'] == 30
+
+    clock.t += 60                                 # 10:01:30 — nothing due
+    assert sched.tick() == 0
+
+    src.jobs['a']['every'] = 2                    # edited → due at 10:02 instead of 10:05
+    sched.touch('fake', 'a')
+    clock.t += 30
+    assert sched.tick() == 1 and sched.wait_idle()
+    assert src.runs[-1] == ('a', datetime(2026, 10, 17, 10, 2))
+
+    # disabled behind the scheduler's back: dropped at fire time, not run
+    src.jobs['a']['enabled'] = False
+    clock.t += 120
+    assert sched.tick() == 0
+    st = sched.stats()['fake']
+    assert st['skipped'] == 1 and st['jobs'] == 1 and st['fired'] == 3 and st['failed'] == 0
+
+
+def test_worker_and_per_cluster_limits():
+    clock = _Clock(datetime(2026, 10, 17, 10, 0, 0))
+    gate = threading.Event()
+    jobs = {f'j{i}': {'id': f'j{i}', 'every': 5, 'cluster_id': 'c1' if i < 3 else 'c2'} for i in range(5)}
+    src = _Source(jobs, block=gate)
+    sched = js.JobScheduler(workers=3, per_cluster=2, clock=clock)
+    src.next_fire = lambda job, after: datetime(2026, 10, 17, 10, 0) if after < datetime(2026, 10, 17, 10, 0) else None
+    sched.register(src)
+    clock.t += 10
+    assert sched.tick() == 5
+    js.time.sleep(0.05)
+    st = sched.stats()['fake']
+    # 3 workers: two from c1 (its cap) and one from c2; the third c1 job waits
+    assert st['running'] == 3 and st['queued'] == 2 and st['deferred'] == 1
+    assert sum(1 for j, _ in src.runs if jobs[j]['cluster_id'] == 'c1') == 2
+    gate.set()
+    assert sched.wait_idle()
+    st = sched.stats()['fake']
+    assert st['fired'] == 5 and st['queued'] == 0 and st['lateness_sum'] == 50
+    # nothing after 10:00 → off the heap timeline
+    assert st['next_fire_seconds'] is None
+
+
+def test_policy_and_action_sources(db, monkeypatch):
+    base = {'schedule_at': '03:00', 'schedule_cron': '', 'schedule_day': 31, 'run_once_at': '',
+            'last_run_at': None}
+    after = datetime(2026, 2, 10, 12, 30)
+    nf = snapshots._next_fire
+    assert nf(dict(base, schedule='hourly'), after) == datetime(2026, 2, 10, 13, 0)
+    assert nf(dict(base, schedule='daily'), after) == datetime(2026, 2, 11, 3, 0)
+    assert nf(dict(base, schedule='weekly'), after) == datetime(2026, 2, 15, 3, 0)        # Sunday
+    assert nf(dict(base, schedule='monthly'), after) == datetime(2026, 2, 28, 3, 0)       # clamped
+    assert nf(dict(base, schedule='cron', schedule_cron='15 */4 * * *'), after) == datetime(2026, 2, 10, 16, 15)
+    once = dict(base, schedule='once', run_once_at='2026-02-01T08:00')
+    assert nf(once, after) == datetime(2026, 2, 1, 8, 0)                                  # late, still runs
+    assert nf(dict(once, last_run_at='2026-02-01T08:00:05'), after) is None
+    assert nf(dict(base, schedule='daily', last_run_at='2026-02-11T03:00:40'), after) == datetime(2026, 2, 12, 3, 0)
+
+    sched = js.JobScheduler(clock=_Clock(after))
+    monkeypatch.setattr(js, '_service', sched)
+    c = db.conn.cursor()
+    c.execute('''INSERT INTO snapshot_policies (id, cluster_id, name, target_type, target_value,
+                 schedule, schedule_at, retention_count, retention_days, include_ram, enabled, created_at)
+                 VALUES ('p1', 'c1', 'p', 'vm', '100', 'daily', '04:00', 3, 0, 0, 1, '2026-01-01')''')
+    db.conn.commit()
+    sched.register(snapshots._PolicySource())
+    assert sched.stats()['snapshot_policy']['jobs'] == 1
+    assert sched._jobs[('snapshot_policy', 'p1')]['fire'] == datetime(2026, 2, 11, 4, 0).timestamp()
+    c.execute("UPDATE snapshot_policies SET enabled = 0 WHERE id = 'p1'")
+    db.conn.commit()
+    js.touch('snapshot_policy', 'p1')
+    assert sched.stats()['snapshot_policy']['jobs'] == 0
+
+    # scheduled actions: the bulk save re-reads the table into the heap
+    sched.register(schedules._ActionSource())
+    schedules.save_schedules({'actions': [
+        {'id': 1, 'cluster_id': 'c1', 'vmid': 100, 'action': 'start', 'schedule_type': 'weekends', 'time': '07:30'},
+        {'id': 2, 'cluster_id': 'c1', 'vmid': 101, 'action': 'stop', 'schedule_type': 'once',
+         'time': '07:30', 'date': '2026-02-09'},
+    ]})
+    st = sched.stats()['scheduled_action']
+    assert st['jobs'] == 1      # the once-schedule's date has passed
+    assert sched._jobs[('scheduled_action', 1)]['fire'] == datetime(2026, 2, 14, 7, 30).timestamp()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Tests for the pre-rendered Prometheus exposition cache
+(pegaprox/api/metrics_exporter.py): per-family grouping across clusters,
+broadcast-loop feeding, gzip and ETag / If-None-Match conditional scrapes."""
+import gzip
+
+import pegaprox.api.metrics_exporter as mx
+
+_AUTH = {'Authorization': 'Bearer pgx_dummy'}
+
+
+def _cluster(api, cid, vms):
+    mgr = api.make_fake_manager(
+        cid,
+        get_node_status={'pve1': {'status': 'online', 'cpu_percent': 12.5, 'mem_percent': 40, 'uptime': 99}},
+        get_vm_resources=vms,
+        get_ceph_health_summary=None,
+    )
+    mgr.is_connected = True
+    mgr.config.name = cid
+    api.set_manager(cid, mgr)
+    return mgr
+
+
+def _guests(n, node='pve1'):
+    return [{'vmid': 100 + i, 'name': f'vm{i}', 'node': node, 'type': 'qemu', 'status': 'running',
+             'mem': 1024, 'maxmem': 4096, 'disk': 0, 'maxdisk': 8192} for i in range(n)]
+
+
+def test_families_grouped_and_conditional_scrape(api, monkeypatch):
+    monkeypatch.setattr(mx, 'validate_api_token', lambda tok: {'user': 'svc', 'role': 'admin'})
+    monkeypatch.setattr(mx, '_node_apt_updates_available', lambda cid, mgr, node: 0)
+    a = _cluster(api, 'c_a', _guests(3))
+    _cluster(api, 'c_b', _guests(2))
+    client = api.anon()
+
+    r = client.get('/api/metrics', headers=_AUTH)
+    assert r.status_code == 200 and r.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    text = r.get_data(as_text=True)
+    lines = text.splitlines()
+    # one HELP/TYPE per family, and all of a family's samples follow it contiguously
+    assert text.count('# TYPE pegaprox_guest_running gauge') == 1
+    running = [i for i, l in enumerate(lines) if l.startswith('pegaprox_guest_running{')]
+    assert len(running) == 5 and running == list(range(running[0], running[0] + 5))
+    assert 'pegaprox_metrics_family_bytes{family="pegaprox_guest_running"}' in text
+    assert 'pegaprox_metrics_cluster_render_seconds{cluster_id="c_a"}' in text
+    assert 'pegaprox_metrics_render_seconds{family="pegaprox_guest_cpu_percent"}' in text
+
+    etag = r.headers['ETag']
+    r = client.get('/api/metrics', headers={**_AUTH, 'If-None-Match': etag})
+    assert r.status_code == 304 and r.get_data() == b''
+    calls = a.get_vm_resources.call_count
+    client.get('/api/metrics', headers=_AUTH)
+    assert a.get_vm_resources.call_count == calls   # served from the cache
+
+    # changed data → new render → new ETag
+    a.get_vm_resources.return_value = _guests(4)
+    mx.refresh_exposition()
+    r = client.get('/api/metrics', headers={**_AUTH, 'If-None-Match': etag})
+    assert r.status_code == 200 and r.headers['ETag'] != etag
+    assert r.get_data(as_text=True).count('pegaprox_guest_running{') == 6
+    assert 'pegaprox_metrics_scrapes_total{encoding="identity",code="304"} 1' in r.get_data(as_text=True)
+
+
+def test_gzip_and_broadcast_feed(api, monkeypatch):
+    monkeypatch.setattr(mx, 'validate_api_token', lambda tok: {'user': 'svc', 'role': 'admin'})
+    monkeypatch.setattr(mx, '_node_apt_updates_available', lambda cid, mgr, node: None)
+    a = _cluster(api, 'c_a', _guests(50))
+    client = api.anon()
+
+    r = client.get('/api/metrics', headers={**_AUTH, 'Accept-Encoding': 'gzip'})
+    assert r.status_code == 200 and r.headers['Content-Encoding'] == 'gzip'
+    plain = gzip.decompress(r.get_data()).decode()
+    assert plain.count('pegaprox_guest_running{') == 50
+    assert plain.endswith('\n') and '# TYPE pegaprox_metrics_scrapes_total counter' in plain
+
+    # each encoding is its own representation: distinct ETags, no cross-encoding 304
+    gz_etag = r.headers['ETag']
+    assert gz_etag.endswith('-gz"') and r.headers['Vary'] == 'Accept-Encoding'
+    r = client.get('/api/metrics', headers={**_AUTH, 'If-None-Match': gz_etag})
+    assert r.status_code == 200 and 'Content-Encoding' not in r.headers
+    assert r.headers['ETag'] == gz_etag[:-4] + '"'
+    r = client.get('/api/metrics', headers={**_AUTH, 'Accept-Encoding': 'gzip', 'If-None-Match': gz_etag})
+    assert r.status_code == 304 and r.headers['ETag'] == gz_etag and r.headers['Vary'] == 'Accept-Encoding'
+
+    # the broadcast loop's data replaces the manager walk on the next refresh
+    mx.feed_cluster('c_a', node_status={'pve1': {'status': 'online'}, 'pve2': {'status': 'online'}},
+                    vms=_guests(1, node='pve2'))
+    calls = a.get_node_status.call_count, a.get_vm_resources.call_count
+    mx.refresh_exposition()
+    assert (a.get_node_status.call_count, a.get_vm_resources.call_count) == calls
+    text = client.get('/api/metrics', headers=_AUTH).get_data(as_text=True)
+    assert 'pegaprox_cluster_nodes_total{cluster_id="c_a",cluster="c_a"} 2' in text
+    assert text.count('pegaprox_guest_running{') == 1
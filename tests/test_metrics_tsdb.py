@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for the columnar metrics time-series store (pegaprox/core/tsdb.py).
+
+The chunk codec and snapshot flatten/rebuild are pure; append_points runs
+against the throwaway DB from the `db` fixture (real schema from _init_db).
+"""
+import math
+
+from pegaprox.core import tsdb
+
+
+def _cluster(cpu=12.5, running=True):
+    return {
+        'name': 'Prod',
+        'nodes': {'pve1': {'cpu': 40.0, 'mem_percent': 55.5, 'maxcpu': 32,
+                           'maxmem': 256 * 1024 ** 3, 'temp': 61.0}},
+        'totals': {'vms_running': 1, 'vms_stopped': 1, 'cts_running': 0, 'cts_stopped': 0,
+                   'cpu_used': 12.8, 'cpu_total': 32, 'mem_used': 10 * 1024 ** 3,
+                   'mem_total': 256 * 1024 ** 3},
+        'vms': {
+            '100': {'t': 'qemu', 'r': running, 'cpu': cpu if running else None,
+                    'mem': 40.0 if running else None, 'maxmem': 8 * 1024 ** 3, 'maxcpu': 4},
+            '200': {'t': 'lxc', 'r': False, 'cpu': None, 'mem': None, 'maxmem': 1024 ** 3, 'maxcpu': 1},
+        },
+        'storage': {'ceph': {'used': 3 * 1024 ** 4 + 12345, 'total': 10 * 1024 ** 4, 'pct': 30.0}},
+    }
+
+
+def test_chunk_roundtrip_keeps_timestamps_and_nan():
+    cs = tsdb.chunk_start_for(1_700_000_123)
+    ts = [cs + 5, cs + 305, cs + 605, cs + 9000]
+    ts_data, val_data = tsdb.encode_chunk(cs, ts, [1.5, None, 3.25, 0.0])
+    assert len(ts_data) == 4 * 4 and len(val_data) == 1 + 4 * 4   # uint32 + float32
+    got_ts, got_v = tsdb.decode_chunk(cs, ts_data, val_data)
+    assert got_ts == ts
+    assert got_v[0] == 1.5 and math.isnan(got_v[1]) and got_v[2] == 3.25 and got_v[3] == 0.0
+
+
+def test_byte_metrics_use_float64():
+    cs = 0
+    big = 3 * 1024 ** 4 + 12345   # not representable in float32
+    _, val_data = tsdb.encode_chunk(cs, [1], [big], tsdb._typecode('used'))
+    assert tsdb.decode_chunk(cs, b'\x01\x00\x00\x00', val_data)[1] == [float(big)]
+
+
+def test_flatten_rebuild_roundtrip():
+    cd = _cluster()
+    points, meta = tsdb.flatten_cluster(cd)
+    assert ('vm/100', 'cpu') in points and meta['vm/200'] == {'t': 'lxc'}
+    series = {}
+    for (ent, metric), v in points.items():
+        series.setdefault(ent, {})[metric] = ([1000], [float('nan') if v is None else float(v)])
+    [(ts, got)] = tsdb.rebuild_snapshots(series, meta)
+    assert ts == 1000 and got['name'] == 'Prod'
+    assert got['vms']['100'] == cd['vms']['100']
+    assert got['vms']['200'] == cd['vms']['200']   # r recovered from NaN cpu
+    assert got['nodes']['pve1'] == cd['nodes']['pve1']
+    assert got['totals']['mem_total'] == cd['totals']['mem_total']
+    assert got['storage']['ceph'] == cd['storage']['ceph']
+
+
+def test_running_guest_without_cpu_sample_stays_running():
+    points, _ = tsdb.flatten_cluster(_cluster(cpu=None))
+    assert points[('vm/100', 'cpu')] == 0.0
+
+
+def test_append_points_merges_head_chunk_and_is_idempotent(db):
+    conn = db.conn
+    base = tsdb.chunk_start_for(1_800_000_000)
+    samples = []
+    for i in range(3):
+        points, meta = tsdb.flatten_cluster(_cluster(cpu=10.0 + i))
+        samples.append((base + i * 300, points))
+    tsdb.append_points(conn, 'c1', samples[:2], meta)
+    tsdb.append_points(conn, 'c1', samples[1:], meta)     # overlaps the head chunk
+    tsdb.append_points(conn, 'c2', samples[:1], meta)
+    conn.commit()
+
+    rows = conn.execute(
+        "SELECT entity, metric, chunk_start, ts_data, val_data FROM metrics_series "
+        "WHERE cluster_id = 'c1' AND entity = 'vm/100'").fetchall()
+    series = tsdb.decode_rows(rows, base)
+    ts_list, vals = series['vm/100']['cpu']
+    assert ts_list == [base, base + 300, base + 600]
+    assert vals == [10.0, 11.0, 12.0]
+    assert conn.execute("SELECT samples FROM metrics_series WHERE cluster_id='c2' "
+                        "AND entity='vm/100' AND metric='cpu'").fetchone()[0] == 1
+
+
+def test_rebuild_stride_keeps_every_nth_sample():
+    series = {'cluster': {'cpu_used': (list(range(0, 3000, 300)), [float(i) for i in range(10)])}}
+    snaps = tsdb.rebuild_snapshots(series, {}, stride=3)
+    assert [ts for ts, _ in snaps] == [0, 900, 1800, 2700]
+
+
+# ── rollup tiers ─────────────────────────────────────────────────────────────
+
+def test_pick_tier_uses_coarsest_bucket_within_step():
+    assert tsdb.pick_tier(0, 7, raw_days=30) == 'raw'
+    assert tsdb.pick_tier(900, 7, raw_days=30) == 'raw'
+    assert tsdb.pick_tier(3600, 7, raw_days=30) == '1h'
+    assert tsdb.pick_tier(86400, 365, raw_days=30) == '1d'
+    assert tsdb.pick_tier(0, 90, raw_days=30) == '1h'      # older than raw retention
+
+
+def test_summarize_and_merge_keep_peaks():
+    a = tsdb.summarize([1.0, 2.0, float('nan'), 3.0, None])
+    assert a[:3] == (1.0, 3.0, 2.0) and a[4] == 3
+    b = tsdb.summarize([10.0])
+    m = tsdb.merge_buckets([a, b, None])
+    assert m[0] == 1.0 and m[1] == 10.0 and m[4] == 4
+    assert m[2] == (2.0 * 3 + 10.0) / 4 and m[3] == 10.0
+    assert tsdb.summarize([None, float('nan')]) is None
+
+
+def test_maintain_rollups_builds_hour_buckets(db):
+    conn = db.conn
+    day = 1_800_000_000 - 1_800_000_000 % 86400
+    samples = []
+    for i in range(24):                              # two full hours of 5-min samples
+        points, meta = tsdb.flatten_cluster(_cluster(cpu=float(i)))
+        samples.append((day + i * 300, points))
+    tsdb.append_points(conn, 'c1', samples, meta)
+    tsdb.maintain_rollups(conn, 'c1', day + 2 * 3600 + 60)
+    tsdb.maintain_rollups(conn, 'c1', day + 2 * 3600 + 360)   # no new complete bucket
+    conn.commit()
+
+    rows = conn.execute(
+        "SELECT entity, metric, chunk_start, ts_data, min_data, max_data, avg_data, p95_data, cnt_data "
+        "FROM metrics_rollup WHERE cluster_id = 'c1' AND tier = '1h' AND entity = 'vm/100'").fetchall()
+    buckets = tsdb.decode_rollup_rows(rows, 0)['vm/100']['cpu']
+    assert sorted(buckets) == [day, day + 3600]
+    mn, mx, avg, p95, n = buckets[day + 3600]
+    assert (mn, mx, n) == (12.0, 23.0, 12) and avg == 17.5 and 22.0 < p95 < 23.0
+    # the day bucket is not complete yet
+    assert conn.execute("SELECT COUNT(*) FROM metrics_rollup WHERE tier = '1d'").fetchone()[0] == 0
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""Tests for the per-cluster migration queue (pegaprox/core/migration_queue.py):
+per-node concurrency caps, cost ordering, UPID tracking, retry/backoff and ETA."""
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from pegaprox.core import migration_queue as mq
+from pegaprox.core.migration_queue import MigrationJob, MigrationQueue
+
+G = 2 ** 30
+
+
+class _Resp:
+    def __init__(self, data):
+        self.status_code = 200
+        self._data = data
+
+    def json(self):
+        return {'data': self._data}
+
+
+class _FakePVE:
+    """Just enough of a manager: VM locations + task status by UPID."""
+
+    def __init__(self, rows, **cfg):
+        self.id = 'c1'
+        self.host, self.api_port = 'pve', 8006
+        self.config = SimpleNamespace(migration_max_parallel=4, migration_max_per_node=2, **cfg)
+        self.rows = rows
+        self.tasks = {}
+
+    def get_vm_resources(self, max_age=0):
+        return self.rows
+
+    def _api_get(self, url, **kw):
+        upid = url.split('/tasks/')[1].split('/')[0]
+        return _Resp(self.tasks.get(upid, {'status': 'running'}))
+
+
+@pytest.fixture(autouse=True)
+def _no_dispatcher_thread(monkeypatch):
+    # tests drive _dispatch/_poll_running by hand
+    monkeypatch.setattr(MigrationQueue, '_run', lambda self: None)
+
+
+def _rows(n, node='a'):
+    return [{'vmid': 100 + i, 'name': f'vm{i}', 'type': 'qemu', 'node': node,
+             'mem': (i + 1) * G, 'cpu': 0.1} for i in range(n)]
+
+
+def _starter(started, fail=()):
+    def start(job):
+        started.append((job.vmid, job.target))
+        if job.vmid in fail:
+            return {'success': False, 'error': 'locked'}
+        return {'success': True, 'task': f'UPID:{job.vmid}:{len(started)}'}
+    return start
+
+
+def test_per_node_limits_and_biggest_first():
+    pve = _FakePVE(_rows(6))
+    q = MigrationQueue(pve)
+    started = []
+    picks = iter(['b', 'c'] * 10)
+    q.submit([MigrationJob(r) for r in pve.rows], _starter(started),
+             pick_target=lambda job, busy: next(n for n in picks if n not in busy))
+    # source 'a' may only send 2 at once even though the cluster allows 4
+    assert [v for v, _ in started] == [105, 104]
+    assert {t for _, t in started} == {'b', 'c'}
+
+    # explicit target: incoming cap applies to the target node too
+    pve2 = _FakePVE(_rows(2, 'a') + _rows(2, 'x'))
+    for i, r in enumerate(pve2.rows):
+        r['vmid'] = 200 + i
+    q2 = MigrationQueue(pve2)
+    started2 = []
+    q2.submit([MigrationJob(r, target='b') for r in pve2.rows], _starter(started2))
+    assert len(started2) == 2
+
+
+def test_target_picks_run_outside_the_lock_and_are_rechecked():
+    pve = _FakePVE(_rows(2) + _rows(1, 'x'))
+    pve.rows[2]['vmid'] = 300
+    q = MigrationQueue(pve)
+    started, seen = [], []
+
+    def pick(job, busy):
+        # get_best_target_node walks the PVE API — status readers must not wait on it
+        assert q.lock.acquire(blocking=False)
+        q.lock.release()
+        seen.append((job.vmid, sorted(busy)))
+        if job.vmid == 101:
+            # meanwhile another batch fills node b up to its per-node cap
+            other = MigrationJob(pve.rows[2], target='b')
+            other.state, other.batch_id = 'running', job.batch_id
+            q.jobs[other.id] = other
+        return 'b'
+    pve.config.migration_max_per_node = 2
+    q.submit([MigrationJob(r) for r in pve.rows[:2]], _starter(started), pick_target=pick)
+    # both picked b, but the re-check lets only one start next to the job
+    # that took a b slot while the picks ran
+    assert seen == [(101, []), (100, [])]
+    assert started == [(101, 'b')]
+    assert sorted(j.state for j in q.jobs.values()) == ['queued', 'running', 'running']
+
+
+def test_completion_tracks_upid_and_feeds_eta():
+    pve = _FakePVE(_rows(3))
+    pve.config.migration_max_per_node = 1
+    q = MigrationQueue(pve)
+    started = []
+    bid = q.submit([MigrationJob(r, target='b') for r in pve.rows], _starter(started))
+    st = q.batch_status(bid)
+    assert st['running'] == 1 and st['queued'] == 2 and st['eta_seconds'] is None
+    job = next(j for j in q.jobs.values() if j.state == 'running')
+    job.started_at = time.time() - 30                       # 3G in 30s → 100MiB/s-ish
+    pve.tasks[job.upid] = {'status': 'stopped', 'exitstatus': 'OK'}
+    q._poll_running()
+    assert job.state == 'done' and q.rate == pytest.approx(3 * G / 30, rel=0.05)
+    st = q.batch_status(bid)
+    assert st['done'] == 1 and st['eta_seconds'] == pytest.approx((1 + 2) * 30 / 3, abs=2)
+    q._dispatch()
+    assert len(started) == 2 and not q.is_done(bid)
+
+
+def test_retry_with_backoff_then_give_up():
+    pve = _FakePVE(_rows(1))
+    q = MigrationQueue(pve)
+    started = []
+    bid = q.submit([MigrationJob(pve.rows[0], target='b')], _starter(started, fail={100}))
+    job = next(iter(q.jobs.values()))
+    assert job.state == 'queued' and job.attempts == 1
+    assert job.next_try - time.time() == pytest.approx(mq.BACKOFF_BASE, abs=2)
+    q._dispatch()
+    assert len(started) == 1                                # still backing off
+    for _ in range(mq.MAX_ATTEMPTS - 1):
+        job.next_try = 0
+        q._dispatch()
+    assert len(started) == mq.MAX_ATTEMPTS
+    assert job.state == 'failed' and job.error == 'locked'
+    assert q.batch_status(bid)['finished']
+
+
+def test_failed_task_but_guest_moved_counts_as_done():
+    pve = _FakePVE(_rows(2))
+    q = MigrationQueue(pve)
+    bid = q.submit([MigrationJob(r, target='b') for r in pve.rows], _starter([]))
+    big, small = sorted(q.jobs.values(), key=lambda j: -j.mem)
+    pve.tasks[big.upid] = {'status': 'stopped', 'exitstatus': 'hamigrate failed'}
+    pve.rows[1]['node'] = 'c'                                 # HA put it elsewhere
+    pve.tasks[small.upid] = {'status': 'stopped', 'exitstatus': 'migration aborted'}
+    q._poll_running()
+    assert big.state == 'done' and big.note == 'HA re-routed'
+    assert small.state == 'queued' and small.attempts == 1    # retry scheduled
+    # a guest that's gone from the source before its start is skipped, not migrated
+    pve.rows[0]['node'] = 'b'
+    small.next_try = 0
+    q._dispatch()
+    assert small.state == 'done' and small.note.startswith('already moved')
+    assert q.batch_status(bid)['finished']
+
+
+def test_on_finish_fires_once_per_finished_job():
+    pve = _FakePVE(_rows(3))
+    q = MigrationQueue(pve)
+    finished = []
+    bid = q.submit([MigrationJob(r, target='b') for r in pve.rows], _starter([], fail={100}),
+                   on_finish=lambda job: finished.append((job.vmid, job.state, job.landed)))
+    assert finished == []                                     # 100 is backing off, not finished
+    running = sorted((j for j in q.jobs.values() if j.upid), key=lambda j: j.vmid)
+    pve.tasks[running[0].upid] = {'status': 'stopped', 'exitstatus': 'OK'}
+    pve.tasks[running[1].upid] = {'status': 'stopped', 'exitstatus': 'hamigrate failed'}
+    pve.rows[2]['node'] = 'c'
+    q._poll_running()
+    q._notify_finished()
+    assert finished == [(101, 'done', 'a'), (102, 'done', 'c')]
+    retry = q.jobs[next(j for j in q.batches[bid]['jobs'] if q.jobs[j].vmid == 100)]
+    retry.attempts = mq.MAX_ATTEMPTS
+    retry.next_try = 0
+    q._dispatch()
+    q._notify_finished()
+    assert finished[-1] == (100, 'failed', 'a') and len(finished) == 3
+
+
+def test_timeout_stops_the_task_and_keeps_its_slot_until_stopped():
+    pve = _FakePVE(_rows(3))
+    pve.config.migration_max_per_node = 1
+    deletes = []
+    pve._api_delete = lambda url, **kw: deletes.append(url)
+    q = MigrationQueue(pve)
+    started = []
+    q.submit([MigrationJob(r, target='b') for r in pve.rows], _starter(started), wait_timeout=60)
+    job = next(j for j in q.jobs.values() if j.state == 'running')
+    job.started_at = time.time() - 61
+    q._poll_running()
+    assert deletes == [f'https://pve:8006/api2/json/nodes/a/tasks/{job.upid}']
+    q._dispatch()
+    assert job.state == 'running' and len(started) == 1     # still holds the node slot
+    q._poll_running()
+    assert len(deletes) == 1                                # no re-send inside the grace
+    job.stop_sent -= mq.STOP_GRACE + 1
+    q._poll_running()
+    assert len(deletes) == 2                                # still running → stop again
+    pve.tasks[job.upid] = {'status': 'stopped', 'exitstatus': 'interrupted by signal'}
+    q._poll_running()
+    assert job.state == 'failed' and job.error == 'Timed out after 60s'
+    q._dispatch()
+    assert len(started) == 2
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for the versioned per-cluster resource state behind the
+`resources_delta` SSE frames (pegaprox/utils/resource_state.py)."""
+import json
+import queue
+
+from pegaprox.globals import sse_clients, sse_clients_lock
+from pegaprox.utils import resource_state
+from pegaprox.utils.realtime import rebuild_sse_index
+from pegaprox.utils.resource_state import ClusterResourceState
+
+
+def _vm(vmid, status='running', cpu=10.0, **extra):
+    r = {'vmid': vmid, 'id': f'qemu/{vmid}', 'type': 'qemu', 'node': 'pve1',
+         'name': f'vm{vmid}', 'status': status, 'cpu_percent': cpu, 'cpu': cpu / 100}
+    r.update(extra)
+    return r
+
+
+def test_first_diff_adds_everything_then_nothing():
+    st = ClusterResourceState()
+    d = st.diff([_vm(101), _vm(100)])
+    assert d['seq'] == 1 and d['base'] == 0
+    assert [r['vmid'] for r in d['added']] == [100, 101]
+    assert st.diff([_vm(100), _vm(101)]) is None
+    assert st.seq == 1
+
+
+def test_changed_fields_removed_rows_and_unset():
+    st = ClusterResourceState()
+    st.diff([_vm(100, lock='backup'), _vm(101), _vm(102)])
+    d = st.diff([_vm(100), _vm(101, status='stopped')])
+    assert d['base'] == 1 and d['seq'] == 2
+    assert d['removed'] == [102] and d['added'] == []
+    by_id = {c['vmid']: c for c in d['changed']}
+    assert by_id[100] == {'vmid': 100, 'set': {}, 'unset': ['lock']}
+    assert by_id[101]['set'] == {'status': 'stopped'}
+
+
+def test_noise_is_held_back_until_forced_or_bucket_crossed():
+    st = ClusterResourceState()
+    st.diff([_vm(100, cpu=10.0)])
+    assert st.diff([_vm(100, cpu=11.0)]) is None           # same 5% bucket
+    d = st.diff([_vm(100, cpu=12.0)], force=True)          # keepalive ships exact load
+    assert d['changed'][0]['set'] == {'cpu_percent': 12.0, 'cpu': 0.12}
+    d = st.diff([_vm(100, cpu=16.0)])                      # crossed 15% bucket
+    assert d is not None and d['base'] == 2
+
+
+def test_snapshot_is_sorted_and_carries_seq():
+    st = ClusterResourceState()
+    st.diff([_vm(300), _vm(100), _vm(200)])
+    seq, rows = st.snapshot()
+    assert seq == 1 and [r['vmid'] for r in rows] == [100, 200, 300]
+
+
+def test_send_snapshots_respects_subscription():
+    resource_state.drop_resource_state('c-a')
+    resource_state.drop_resource_state('c-b')
+    resource_state.publish_resources('c-a', [_vm(100)])
+    resource_state.publish_resources('c-b', [_vm(200)])
+    q = queue.Queue(maxsize=100)
+    with sse_clients_lock:
+        sse_clients['t-client'] = {'queue': q, 'user': 'u', 'clusters': ['c-a']}
+    rebuild_sse_index()
+    try:
+        assert resource_state.send_resource_snapshots('t-client', ['c-a', 'c-b']) == 1
+        frame = q.get_nowait()
+        assert frame.startswith(b'data: ') and frame.endswith(b'\n\n')
+        msg = json.loads(frame[6:])
+        assert msg['type'] == 'resources' and msg['cluster_id'] == 'c-a'
+        assert msg['seq'] == 1 and msg['data'][0]['vmid'] == 100
+        assert resource_state.send_resource_snapshots('missing') == 0
+    finally:
+        with sse_clients_lock:
+            sse_clients.pop('t-client', None)
+        rebuild_sse_index()
+        resource_state.drop_resource_state('c-a')
+        resource_state.drop_resource_state('c-b')
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""Tests for the chart RRD cache (pegaprox/core/rrd_cache.py): entries live
+until the next step boundary of their timeframe, concurrent misses share one
+fetch, refreshes merge the new points into the cached window, the rendered
+payload is built once per version, the LRU bounds hold, and the PVE / XCP-ng /
+PBS chart methods go through it."""
+import logging
+import types
+
+import gevent
+
+import pegaprox.core.xcpng as xcpng_mod
+from pegaprox.core import rrd_cache as rc
+from pegaprox.core.manager import PegaProxManager
+from pegaprox.core.pbs import PBSManager
+from pegaprox.core.xcpng import XcpngManager
+
+
+class _Clock:
+    def __init__(self, t=0.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+def _pts(t0, t1, step=60, **extra):
+    return [dict({'time': t, 'cpu': 0.5}, **extra) for t in range(t0, t1 + 1, step)]
+
+
+def test_step_ttl_merge_and_render_once():
+    clock = _Clock(6000.0)
+    cache = rc.RrdCache(clock=clock)
+    fetches, renders = [], []
+
+    def fetch(since):
+        fetches.append(since)
+        now = int(clock.t) // 60 * 60
+        return _pts(now - 3540, now), None
+
+    def render(points, meta):
+        renders.append(len(points))
+        return {'timestamps': [p['time'] for p in points]}
+
+    key = ('pve', 'c1', 'pve1', 'qemu', 100, 'hour')
+    first = cache.get(key, 'hour', fetch, render, 'vm')
+    assert fetches == [None] and len(first['timestamps']) == 60
+    assert cache.get(key, 'hour', fetch, render, 'vm') is first      # same version → same payload
+    clock.t = 6065.0                                                 # past the boundary, inside the grace
+    assert cache.get(key, 'hour', fetch, render, 'vm') is first and renders == [60]
+
+    clock.t = 6067.0
+    second = cache.get(key, 'hour', fetch, render, 'vm')
+    assert fetches == [None, 6000] and renders == [60, 60]
+    assert second['timestamps'][0] == 2520 and second['timestamps'][-1] == 6060
+
+    # 'year' is good for a week; unknown timeframes fall back to a minute
+    assert cache.expiry('year', 0) == 604800 + rc.STEP_GRACE
+    assert cache.expiry('bogus', 30) == 60 + 6
+
+    # a source that only sends what's new: merged in, window kept
+    cache2 = rc.RrdCache(clock=clock)
+    calls = []
+
+    def incr(since):
+        calls.append(since)
+        if since is None:
+            return [(t, [1.0]) for t in range(0, 3601, 60)], ['a']
+        return [(since, [2.0]), (since + 60, [3.0])], ['a']
+
+    base = cache2.get(('x',), 'hour', incr)
+    clock.t += 120
+    rows = cache2.get(('x',), 'hour', incr)
+    assert calls == [None, 3600] and len(rows) == len(base) and rows[0][0] == 60
+    assert rows[-2:] == [(3600, [2.0]), (3660, [3.0])] and cache2.stats()['merged'] == 1
+
+
+def test_concurrent_misses_share_one_fetch_and_errors_are_not_cached():
+    cache = rc.RrdCache()
+    calls = []
+
+    def slow(since):
+        calls.append(since)
+        gevent.sleep(0.05)
+        return _pts(0, 600), None
+
+    results = [g.value for g in gevent.joinall(
+        [gevent.spawn(cache.get, ('k',), 'hour', slow) for _ in range(8)])]
+    assert len(calls) == 1 and all(r is results[0] for r in results)
+    st = cache.stats()
+    assert st['misses'] == 1 and st['coalesced'] == 7 and st['hit_ratio'] == round(7 / 8, 3)
+
+    def broken(since):
+        gevent.sleep(0.02)
+        raise rc.RrdFetchError('HTTP 595')
+
+    greenlets = [gevent.spawn(cache.get, ('bad',), 'hour', broken) for _ in range(3)]
+    gevent.joinall(greenlets)
+    assert all(isinstance(g.exception, rc.RrdFetchError) for g in greenlets)
+    assert cache.stats()['errors'] == 1 and cache.stats()['entries'] == 1
+    assert cache.get(('bad',), 'hour', lambda since: (_pts(0, 60), None))[-1]['time'] == 60
+
+
+def test_lru_bounds_and_invalidate():
+    cache = rc.RrdCache(max_entries=3, max_cells=10 ** 6)
+    for vmid in range(5):
+        cache.get(('pve', 'c1', vmid), 'hour', lambda since: (_pts(0, 600), None))
+    st = cache.stats()
+    assert st['entries'] == 3 and st['evictions'] == 2
+
+    # 11 points x 2 columns = 22 cells each; a 50-cell budget holds two
+    cache = rc.RrdCache(max_entries=100, max_cells=50)
+    for vmid in range(3):
+        cache.get(('pve', 'c1', vmid), 'hour', lambda since: (_pts(0, 600), None))
+    cache.get(('pve', 'c1', 1), 'hour', lambda since: 1 / 0)       # hit → moves to the front
+    cache.get(('pve', 'c2', 9), 'hour', lambda since: (_pts(0, 600), None))
+    assert set(cache._entries) == {('pve', 'c1', 1), ('pve', 'c2', 9)} and cache.stats()['cells'] == 44
+    cache.invalidate(('pve', 'c1'))
+    assert set(cache._entries) == {('pve', 'c2', 9)} and cache.stats()['cells'] == 22
+
+
+class _Resp:
+    def __init__(self, status, data):
+        self.status_code = status
+        self._data = data
+        self.text = 'boom'
+
+    def json(self):
+        return {'data': self._data}
+
+
+def test_chart_methods_go_through_the_cache(monkeypatch):
+    monkeypatch.setattr(rc, '_cache', rc.RrdCache())
+
+    # PVE: one HTTP call for any number of chart requests in the same step
+    mgr = PegaProxManager.__new__(PegaProxManager)
+    mgr.id, mgr.is_connected, mgr.current_host = 'c1', True, 'pve'
+    mgr.config = types.SimpleNamespace(host='pve', api_port=8006)
+    mgr.logger = logging.getLogger('test')
+    urls = []
+
+    class _Session:
+        def get(self, url, params=None):
+            urls.append((url, params))
+            if '/nodes/pve2/' in url:
+                return _Resp(500, None)
+            return _Resp(200, _pts(0, 120, mem=1, maxmem=4, pressurecpusome=0.1))
+
+    mgr._create_session = lambda: _Session()
+    a = mgr.get_vm_rrd('pve1', 100, 'qemu', 'hour')
+    b = mgr.get_vm_rrd('pve1', 100, 'qemu', 'hour')
+    assert a['success'] and a['data'] is b['data'] and len(urls) == 1
+    assert a['data']['metrics']['cpu'] == [50.0] * 3 and a['data']['metrics']['memory'] == [25.0] * 3
+    assert 'pressurecpusome' in a['data']['metrics']
+    assert mgr.get_node_rrddata('pve1', 'day')['metrics']['cpu'] == [50.0] * 3 and len(urls) == 2
+    assert mgr.get_vm_rrd('pve2', 100, 'qemu', 'hour') == {'success': False, 'error': 'boom'}
+
+    # XCP-ng: all VMs share one rrd_updates series; refreshes ask for the new rows only
+    x = XcpngManager.__new__(XcpngManager)
+    x.id = 'x1'
+    db = types.SimpleNamespace(xcpng_resolve_vmid=lambda cid, vmid: {100: 'u-a', 101: 'u-b'}.get(vmid))
+    monkeypatch.setattr(xcpng_mod, 'get_db', lambda: db)
+    sent = []
+    legends = ['AVERAGE:vm:u-a:cpu0', 'AVERAGE:vm:u-b:cpu0']
+
+    def rrd_fetch(path, params):
+        sent.append(params)
+        start = params['start']
+        return legends, [(t, [0.25, 0.75]) for t in range(start, start + 181, 60)][::-1]
+
+    x._rrd_fetch = rrd_fetch
+    va = x.get_vm_rrd('n1', 100, timeframe='hour')['data']
+    vb = x.get_vm_rrd('n1', 101, timeframe='hour')['data']
+    assert len(sent) == 1 and sent[0]['interval'] == 60 and sent[0]['host'] == 'false'
+    assert va['metrics']['cpu'][0] == 25.0 and vb['metrics']['cpu'][0] == 75.0
+    assert va['timestamps'] == sorted(va['timestamps'])
+
+    entry = rc._cache._entries[('xcpng', 'x1', 'rrd_updates', 'false', 'hour')]
+    entry.expires = 0
+    x.get_vm_rrd('n1', 100, timeframe='hour')
+    assert sent[1]['start'] == va['timestamps'][-1]
+
+    # PBS: errors come back in the old shape, data is cached
+    p = PBSManager.__new__(PBSManager)
+    p.id = 'pbs1'
+    gets = []
+
+    def api_get(path, params=None, timeout=30):
+        gets.append(path)
+        return {'error': 'HTTP 500'} if 'broken' in path else {'data': _pts(0, 60)}
+
+    p.api_get = api_get
+    assert p.get_datastore_rrd('broken') == {'error': 'HTTP 500'}
+    assert len(p.get_datastore_rrd('ds1')['data']) == 2
+    p.get_datastore_rrd('ds1')
+    p.get_node_rrd()
+    assert gets == ['/admin/datastore/broken/rrd', '/admin/datastore/ds1/rrd', '/nodes/localhost/rrd']
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""Tests for the batching SIEM forwarder (pegaprox/api/siem.py): multi-event
+HEC / Elastic _bulk bodies, pipelined syslog TCP, and the audit_log-as-outbox
+delivery cursor."""
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from pegaprox.api import siem
+
+
+class _Resp:
+    def __init__(self, body=None, code=200):
+        self.status_code = code
+        self._body = body
+
+    def json(self):
+        if self._body is None:
+            raise ValueError('no body')
+        return self._body
+
+
+class _Session:
+    def __init__(self, resp=None):
+        self.posts = []
+        self.resp = resp or _Resp()
+
+    def post(self, url, data=None, headers=None, **kw):
+        self.posts.append((url, data, headers, kw))
+        return self.resp
+
+
+@pytest.fixture
+def chan(monkeypatch):
+    import pegaprox.utils.url_security as urlsec
+    monkeypatch.setattr(urlsec, 'resolve_and_pin_url', lambda url, **kw: url)
+    c = siem._Channel()
+    c.session = _Session()
+    return c
+
+
+def _events(n):
+    return [{'id': i, 'timestamp': f'2026-10-01T00:00:0{i}', 'user': 'root', 'action': f'vm.start.{i}',
+             'details': '', 'ip_address': '', 'cluster': 'c1', 'severity': 'info'} for i in range(1, n + 1)]
+
+
+def test_hec_sends_one_request_per_batch(chan):
+    target = {'id': 't', 'type': 'splunk_hec', 'endpoint': 'https://splunk:8088/services/collector',
+              'settings': {'token': 'abc', 'index': 'main'}}
+    siem._send_batch(target, _events(3), chan)
+    [(url, body, headers, kw)] = chan.session.posts
+    assert headers['Authorization'] == 'Splunk abc' and kw['allow_redirects'] is False
+    docs = [json.loads(line) for line in body.decode().splitlines()]
+    assert [d['event']['action'] for d in docs] == ['vm.start.1', 'vm.start.2', 'vm.start.3']
+    assert all(d['index'] == 'main' for d in docs)
+
+
+def test_elastic_uses_bulk_ndjson_and_surfaces_item_errors(chan):
+    target = {'id': 't', 'type': 'elastic', 'endpoint': 'https://es:9200/', 'settings': {'index': 'audit'}}
+    siem._send_batch(target, _events(2), chan)
+    url, body, headers, _ = chan.session.posts[0]
+    assert url == 'https://es:9200/_bulk' and headers['Content-Type'] == 'application/x-ndjson'
+    lines = body.decode().split('\n')
+    assert lines[-1] == '' and len(lines) == 5
+    assert json.loads(lines[0]) == {'index': {'_index': 'audit'}}
+
+    chan.session = _Session(_Resp({'errors': True, 'items': [
+        {'index': {'status': 400, 'error': {'type': 'mapper_parsing_exception', 'reason': 'bad'}}}]}))
+    s = chan.session
+    with pytest.raises(RuntimeError, match='mapper_parsing_exception'):
+        siem._send_batch(target, _events(1), chan)
+    assert chan.session is None and s.posts     # channel reset after a failure
+
+
+def test_syslog_tcp_pipelines_batch_over_one_connection():
+    srv = socket.socket()
+    srv.bind(('127.0.0.1', 0))
+    srv.listen(1)
+    got = []
+
+    def accept():
+        conn, _ = srv.accept()
+        conn.settimeout(2)
+        buf = b''
+        try:
+            while True:
+                chunk = conn.recv(65536)
+                if not chunk:
+                    break
+                buf += chunk
+        except socket.timeout:
+            pass
+        got.append(buf)
+        conn.close()
+
+    th = threading.Thread(target=accept, daemon=True)
+    th.start()
+    target = {'id': 't', 'type': 'syslog_tcp', 'endpoint': f'127.0.0.1:{srv.getsockname()[1]}',
+              'settings': {}}
+    c = siem._Channel()
+    siem._send_batch(target, _events(2), c)
+    siem._send_batch(target, _events(1), c)
+    c.close()
+    th.join(3)
+    srv.close()
+    data = got[0]
+    frames = []
+    while data:
+        n, rest = data.split(b' ', 1)
+        frames.append(rest[:int(n)])
+        data = rest[int(n):]
+    assert len(frames) == 3 and all(f.startswith(b'<134>1 ') for f in frames)
+
+
+def test_worker_resumes_from_cursor(db, monkeypatch):
+    conn = db.conn
+    db.add_audit_entry('root', 'before.cursor')
+    conn.execute("INSERT INTO siem_targets (id, name, type, endpoint, created_at) "
+                 "VALUES ('t1', 'x', 'splunk_hec', 'https://h', '2026-10-01')")
+    conn.commit()
+    start = siem._load_cursor('t1')                   # NULL → current end, no replay
+    assert siem._pending_events(start, 10) == []
+    for i in range(3):
+        db.add_audit_entry('root', f'after.{i}')
+
+    sent = []
+    monkeypatch.setattr(siem, '_send_batch', lambda t, evts, ch: sent.extend(e['action'] for e in evts))
+    monkeypatch.setattr(siem, '_worker_running', True)
+    w = siem._TargetWorker({'id': 't1', 'type': 'splunk_hec', 'name': 'x'})
+    th = threading.Thread(target=w.run, daemon=True)
+    th.start()
+    deadline = time.time() + 5
+    while len(sent) < 3 and time.time() < deadline:
+        time.sleep(0.05)
+    w.stop()
+    th.join(5)
+    assert sent == ['after.0', 'after.1', 'after.2']
+    row = conn.execute("SELECT cursor_id, sent_count FROM siem_targets WHERE id = 't1'").fetchone()
+    assert row[0] == start + 3 and row[1] == 3
+    assert w.stats['backlog'] == 0 and w.stats['delivered'] == 3
+
+
+def test_rejected_event_is_bisected_out_and_dead_lettered(db, monkeypatch, chan):
+    conn = db.conn
+    conn.execute("INSERT INTO siem_targets (id, name, type, endpoint, created_at) "
+                 "VALUES ('t1', 'x', 'splunk_hec', 'https://h', '2026-10-01')")
+    conn.commit()
+    start = siem._load_cursor('t1')
+    for i in range(8):
+        db.add_audit_entry('root', 'poison' if i == 5 else f'ok.{i}')
+
+    # 400 = the payload itself is bad; 401 stays a transient (target-wide) failure
+    chan.session = _Session(_Resp(code=401))
+    with pytest.raises(RuntimeError) as exc:
+        siem._send_batch({'id': 't', 'type': 'generic', 'endpoint': 'https://h'}, _events(1), chan)
+    assert not isinstance(exc.value, siem._Rejected)
+
+    sent, calls = [], []
+
+    def send(t, evts, ch):
+        calls.append(len(evts))
+        if any(e['action'] == 'poison' for e in evts):
+            raise siem._Rejected('HTTP 400')
+        sent.extend(e['action'] for e in evts)
+
+    monkeypatch.setattr(siem, '_send_batch', send)
+    monkeypatch.setattr(siem, '_worker_running', True)
+    monkeypatch.setattr(siem, '_BACKOFF_MAX', 0)
+    monkeypatch.setattr(siem, '_IDLE_WAIT', 0.1)
+    w = siem._TargetWorker({'id': 't1', 'type': 'splunk_hec', 'name': 'x'})
+    th = threading.Thread(target=w.run, daemon=True)
+    th.start()
+    deadline = time.time() + 5
+    while len(sent) < 7 and time.time() < deadline:
+        time.sleep(0.05)
+    w.stop()
+    th.join(5)
+    assert sent == [f'ok.{i}' for i in range(8) if i != 5]
+    assert w.stats['dead_lettered'] == 1 and w.stats['dead_letter'][0]['id'] == start + 6
+    assert calls[:3] == [8, 8, 8] and w.limit is None           # three tries, then halves
+    row = conn.execute("SELECT cursor_id FROM siem_targets WHERE id = 't1'").fetchone()
+    assert row[0] == start + 8
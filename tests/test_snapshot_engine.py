@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""Tests for the snapshot batch engine (pegaprox/core/snapshot_engine.py):
+retention selection, per-node parallelism with per-VM ordering, narrow
+(file-based) storages capped cluster-wide when shared, and _execute_policy
+recording the run's throughput in snapshot_runs."""
+import types
+
+from pegaprox.api import snapshots
+from pegaprox.core import snapshot_engine as se
+from pegaprox.globals import cluster_managers
+
+
+class _Resp:
+    def __init__(self, data, status=200):
+        self.status_code = status
+        self._data = data
+
+    def json(self):
+        return {'data': self._data}
+
+
+class _FakePve:
+    """Snapshot tasks finish `task_polls` status polls after they start; every
+    VM holds two old policy snapshots."""
+
+    host, api_port = 'pve', 8006
+
+    def __init__(self, storages, configs=None, task_polls=2, prefix='pegaprox-p1-'):
+        self.storages = storages
+        self.configs = configs or {}
+        self.task_polls = task_polls
+        self.prefix = prefix
+        self.tasks = {}             # upid → polls left
+        self.busy = {}              # vmid → upid running on it
+        self.events = []
+        self.max_busy = 0
+        self.snaps = {}
+
+    def _task(self, vmid, kind):
+        assert vmid not in self.busy, f'{vmid} locked by {self.busy[vmid]}'
+        upid = f'UPID:{kind}:{vmid}:{len(self.tasks)}'
+        self.tasks[upid] = self.task_polls
+        self.busy[vmid] = upid
+        self.max_busy = max(self.max_busy, len(self.busy))
+        self.events.append((kind, vmid))
+        return upid
+
+    def get_storage_list(self, node):
+        return self.storages[node]
+
+    def create_snapshot(self, node, vmid, vm_type, name, description='', vmstate=False):
+        if vmid == 666:
+            return {'success': False, 'error': 'VM is locked (another operation in progress)'}
+        self.snaps.setdefault(vmid, [{'name': f'{self.prefix}old{i}', 'snaptime': 100 + i} for i in range(2)])
+        self.snaps[vmid].append({'name': name, 'snaptime': 1000})
+        return {'success': True, 'task': self._task(vmid, 'create')}
+
+    def delete_snapshot(self, node, vmid, vm_type, name):
+        self.snaps[vmid] = [s for s in self.snaps[vmid] if s['name'] != name]
+        return {'success': True, 'task': self._task(vmid, 'delete')}
+
+    def _api_get(self, url):
+        if '/tasks/' in url:
+            upid = url.split('/tasks/')[1].rsplit('/status', 1)[0]
+            self.tasks[upid] -= 1
+            if self.tasks[upid] > 0:
+                return _Resp({'status': 'running'})
+            self.busy = {k: v for k, v in self.busy.items() if v != upid}
+            return _Resp({'status': 'stopped', 'exitstatus': 'OK'})
+        vmid = int(url.split('/')[-2])
+        if url.endswith('/snapshot'):
+            return _Resp(self.snaps.get(vmid, []) + [{'name': 'current'}])
+        return _Resp(self.configs.get(vmid, {}))
+
+
+def _batch(mgr, targets, **kw):
+    clock = types.SimpleNamespace(t=0.0)
+    names = iter(range(10 ** 6))
+    return se.SnapshotBatch(mgr, targets, prefix='pegaprox-p1-', retention_count=1,
+                            snap_name=lambda: f'pegaprox-p1-new{next(names)}', poll_interval=1.0,
+                            clock=lambda: clock.t, sleep=lambda s: setattr(clock, 't', clock.t + s), **kw)
+
+
+def test_select_expired():
+    snaps = [{'name': f'pegaprox-p1-{i}', 'snaptime': t} for i, t in enumerate((500, 100, 300, 200))]
+    snaps += [{'name': 'manual', 'snaptime': 1}, {'name': 'pegaprox-p2-x', 'snaptime': 1}]
+    assert se.select_expired(snaps, 'pegaprox-p1-', retention_count=2) == ['pegaprox-p1-1', 'pegaprox-p1-3']
+    assert se.select_expired(snaps, 'pegaprox-p1-', retention_count=0) == [
+        'pegaprox-p1-1', 'pegaprox-p1-3', 'pegaprox-p1-2', 'pegaprox-p1-0']
+    assert se.disk_storages({'scsi0': 'local-zfs:vm-1-disk-0,size=32G', 'ide2': 'nfs:iso/x.iso,media=cdrom',
+                             'net0': 'virtio=aa,bridge=vmbr0', 'rootfs': 'nas:subvol-1-disk-0',
+                             'scsi1': '/dev/sdb'}) == {'local-zfs', 'nas'}
+
+
+def test_copy_on_write_storage_goes_wide_per_node():
+    zfs = [{'storage': 'local-zfs', 'type': 'zfspool', 'content': 'images,rootdir'},
+           {'storage': 'local', 'type': 'dir', 'content': 'iso,vztmpl,backup'}]
+    mgr = _FakePve({'n1': zfs, 'n2': zfs})
+    targets = [('n1', 100 + i, 'qemu') for i in range(6)] + [('n2', 200 + i, 'qemu') for i in range(6)]
+    targets.append(('n2', 666, 'qemu'))
+    log = []
+    res = _batch(mgr, targets, log=log, node_parallel=4).run()
+    assert res['created'] == 12 and res['failed'] == 1 and res['pruned'] == 24
+    assert res['peak_parallel'] == 8 and mgr.max_busy == 8
+    # per VM: create, then the two deletes — never overlapping (the fake asserts on the lock)
+    for vmid in (100, 205):
+        assert [k for k, v in mgr.events if v == vmid] == ['create', 'delete', 'delete']
+    assert all(len(s) == 1 for s in mgr.snaps.values())     # retention 1: only the new one is kept
+    assert any('✗ qemu/666@n2' in line for line in log)
+    # no config reads: nothing file-based holds guest disks on either node
+    assert res['api_calls'] == 2 + 13 + 12 + 24 + 36 * 2
+
+
+def test_shared_nfs_is_narrow_cluster_wide():
+    mixed = [{'storage': 'local-zfs', 'type': 'zfspool'}, {'storage': 'nas', 'type': 'nfs', 'shared': 1}]
+    configs = {100: {'scsi0': 'nas:100/vm-100-disk-0.qcow2'}, 101: {'scsi0': 'nas:101/vm-101-disk-0.qcow2'},
+               200: {'scsi0': 'nas:200/vm-200-disk-0.qcow2'}, 102: {'virtio0': 'local-zfs:vm-102-disk-0'},
+               103: {'virtio0': 'local-zfs:vm-103-disk-0'}}
+    mgr = _FakePve({'n1': mixed, 'n2': mixed}, configs)
+    res = _batch(mgr, [('n1', 100, 'qemu'), ('n1', 101, 'qemu'), ('n2', 200, 'qemu'),
+                       ('n1', 102, 'qemu'), ('n1', 103, 'qemu')]).run()
+    assert res['created'] == 5 and res['pruned'] == 10
+    # one qcow2 guest on the NAS at a time, the ZFS guests run alongside
+    create_order = [v for k, v in mgr.events if k == 'create']
+    assert create_order[:3] == [100, 102, 103] and res['peak_parallel'] == 3
+    creates = [i for i, (k, v) in enumerate(mgr.events) if k == 'create' and v in (101, 200)]
+    last_100 = max(i for i, (k, v) in enumerate(mgr.events) if v == 100)
+    assert min(creates) > last_100
+
+
+def test_timed_out_delete_stops_pruning_that_guest(monkeypatch):
+    monkeypatch.setattr(se, 'DELETE_TIMEOUT', 5)
+    mgr = _FakePve({'n1': [{'storage': 'rbd', 'type': 'rbd'}]}, task_polls=1)
+    hung = mgr._task
+
+    def task(vmid, kind):
+        upid = hung(vmid, kind)
+        if (vmid, kind) == (100, 'delete'):
+            mgr.tasks[upid] = 10 ** 6       # never finishes — the guest stays locked
+        return upid
+    mgr._task = task
+    log = []
+    res = _batch(mgr, [('n1', 100, 'qemu'), ('n1', 101, 'qemu')], log=log, node_parallel=1).run()
+    # one delete on 100 timed out: its second delete is not sent (it would hit the lock)
+    assert [k for k, v in mgr.events if v == 100] == ['create', 'delete']
+    assert [k for k, v in mgr.events if v == 101] == ['create', 'delete', 'delete']
+    assert res['created'] == 2 and res['prune_failed'] == 1 and res['pruned'] == 2
+    assert any('qemu/100@n1: delete still running, 1 old snapshot(s) left' in line for line in log)
+
+
+def test_execute_policy_records_throughput(db, monkeypatch):
+    mgr = _FakePve({'n1': [{'storage': 'rbd', 'type': 'rbd'}]}, task_polls=1)   # no poll sleeps
+    mgr.get_vm_resources = lambda: [{'vmid': v, 'type': 'qemu', 'node': 'n1'} for v in (100, 101, 102)]
+    mgr.is_connected = True
+    monkeypatch.setitem(cluster_managers, 'c1', mgr)
+    c = db.conn.cursor()
+    c.execute('''INSERT INTO snapshot_policies (id, cluster_id, name, target_type, target_value,
+                 schedule, retention_count, retention_days, include_ram, enabled, created_at)
+                 VALUES ('p1', 'c1', 'p', 'vm', '100,101,102', 'daily', 1, 0, 0, 1, '2026-01-01')''')
+    db.conn.commit()
+    snapshots._execute_policy('p1')
+    c.execute('SELECT * FROM snapshot_runs WHERE policy_id = ?', ('p1',))
+    run = dict(c.fetchone())
+    assert run['status'] == 'completed' and run['snapshots_created'] == 3 and run['snapshots_pruned'] == 6
+    assert run['peak_parallel'] == 3 and run['duration_seconds'] >= 0
+    assert 'peak 3 in flight' in run['log']
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for the SSE fan-out index behind broadcast_sse
+(pegaprox/utils/realtime.py): routing per subscription, encode-once frames,
+drop accounting."""
+import json
+import queue
+
+import pytest
+
+from pegaprox.globals import sse_clients, sse_clients_lock
+from pegaprox.utils import realtime
+
+
+@pytest.fixture
+def clients():
+    made = {}
+
+    def add(client_id, clusters, maxsize=100):
+        q = queue.Queue(maxsize=maxsize)
+        with sse_clients_lock:
+            sse_clients[client_id] = {'queue': q, 'user': 'u', 'clusters': clusters}
+        made[client_id] = q
+        realtime.rebuild_sse_index()
+        return q
+
+    yield add
+    with sse_clients_lock:
+        for cid in made:
+            sse_clients.pop(cid, None)
+    realtime.rebuild_sse_index()
+
+
+def _types(q):
+    out = []
+    while not q.empty():
+        frame = q.get_nowait()
+        assert frame.startswith(b'data: ') and frame.endswith(b'\n\n')
+        out.append(json.loads(frame[6:])['type'])
+    return out
+
+
+def test_routing_by_subscription(clients):
+    admin = clients('f-admin', None)
+    a = clients('f-a', ['c1'])
+    b = clients('f-b', ['c2', 'c3'])
+    realtime.broadcast_sse('tasks', [], 'c1')
+    realtime.broadcast_sse('heartbeat', {})
+    realtime.broadcast_sse('esxi', {}, target_clusters=['c3', 'c2'])
+    realtime.broadcast_sse('tasks', [])          # cluster-specific without cluster → nobody
+    assert _types(admin) == ['tasks', 'heartbeat', 'esxi']
+    assert _types(a) == ['tasks', 'heartbeat']
+    assert _types(b) == ['heartbeat', 'esxi']   # subscribed to both targets, gets it once
+
+
+def test_frame_is_shared_and_subscription_change_rebuilds(clients):
+    a = clients('f-a', ['c1'])
+    admin = clients('f-admin', None)
+    realtime.broadcast_sse('metrics', {}, 'c1')
+    assert a.get_nowait() is admin.get_nowait()      # encoded once
+    with sse_clients_lock:
+        sse_clients['f-a']['clusters'] = ['c2']
+    realtime.rebuild_sse_index()
+    realtime.broadcast_sse('metrics', {}, 'c1')
+    assert a.empty()
+
+
+def test_full_queue_counts_drops(clients):
+    q = clients('f-slow', ['c1'], maxsize=1)
+    before = realtime.sse_fanout_stats()
+    realtime.broadcast_sse('metrics', {}, 'c1')
+    realtime.broadcast_sse('metrics', {}, 'c1')
+    after = realtime.sse_fanout_stats()
+    assert q.qsize() == 1
+    assert sse_clients['f-slow']['dropped'] == 1
+    assert after['dropped'] - before['dropped'] == 1
+    assert after['events'] - before['events'] == 2
+
+    # exported as aggregates only — no per-client series, no usernames
+    from pegaprox.api import metrics_exporter as mx
+    fam = mx._render_self()
+    assert b'pegaprox_sse_slow_clients 1' in fam.buffers['pegaprox_sse_slow_clients']
+    assert b'pegaprox_sse_client_dropped_frames_max 1' in fam.buffers['pegaprox_sse_client_dropped_frames_max']
+    assert b'f-slow' not in b''.join(fam.buffers.values())
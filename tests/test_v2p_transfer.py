@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""Tests for V2P disk transfer scheduling (pegaprox/core/v2p_transfer.py):
+disks copy concurrently within the per-datastore / per-storage caps with the
+largest disk first, a failed disk stops the ones not yet started, throughput
+and ETA come out of the progress feed, and allocation maps turn into aligned
+extent lists the sparse copy and the delta sync can use."""
+import random
+import threading
+import time
+
+from pegaprox.core import v2p_transfer as vt
+from pegaprox.core.v2p import V2PMigrationTask
+
+MB = 1024 * 1024
+
+
+def _jobs(specs, seen, lock, fail=()):
+    def make(key, src, tgt):
+        def fn():
+            with lock:
+                seen['order'].append(key)
+                seen['active'][src] = seen['active'].get(src, 0) + 1
+                seen['active'][tgt] = seen['active'].get(tgt, 0) + 1
+                seen['peak_src'] = max(seen['peak_src'], seen['active'][src])
+                seen['peak_tgt'] = max(seen['peak_tgt'], seen['active'][tgt])
+            time.sleep(0.05)
+            with lock:
+                seen['active'][src] -= 1
+                seen['active'][tgt] -= 1
+            return None if key in fail else (f'vol-{key}', f'/dev/x/{key}')
+        return fn
+    return [{'key': k, 'source': s, 'target': t, 'size': size, 'fn': make(k, s, t)}
+            for k, s, t, size in specs]
+
+
+def test_scheduler_respects_caps_and_starts_largest_first():
+    lock = threading.Lock()
+    seen = {'order': [], 'active': {}, 'peak_src': 0, 'peak_tgt': 0}
+    specs = [(0, 'ds1', 'lvm', 10), (1, 'ds1', 'lvm', 500), (2, 'ds1', 'lvm', 40),
+             (3, 'ds2', 'lvm', 20), (4, 'ds2', 'lvm', 30)]
+    sched = vt.DiskTransferScheduler(max_parallel=4, per_source=2, per_target=3)
+    t0 = time.monotonic()
+    res = sched.run(_jobs(specs, seen, lock))
+    elapsed = time.monotonic() - t0
+    assert res == {k: (f'vol-{k}', f'/dev/x/{k}') for k in range(5)}
+    assert seen['order'][0] == 1 and sched.peak == 3
+    assert seen['peak_tgt'] == 3 and seen['peak_src'] <= 2
+    assert elapsed < 0.05 * 4 and set(sched.seconds) == set(range(5))
+
+
+def test_scheduler_stops_pending_jobs_after_failure():
+    lock = threading.Lock()
+    seen = {'order': [], 'active': {}, 'peak_src': 0, 'peak_tgt': 0}
+    specs = [(0, 'ds1', 'rbd', 300), (1, 'ds1', 'rbd', 200), (2, 'ds1', 'rbd', 100)]
+    logs = []
+    sched = vt.DiskTransferScheduler(max_parallel=1, log=logs.append)
+    res = sched.run(_jobs(specs, seen, lock, fail={0}), stop_on_failure=True,
+                    ok=lambda r: bool(r and r[0]))
+    assert res == {0: None, 1: None, 2: None} and seen['order'] == [0]
+    assert any('skipped' in line for line in logs)
+
+    # a crashing job is a failed job, the others still run without stop_on_failure
+    jobs = [{'key': 'a', 'size': 1, 'fn': lambda: 1 / 0}, {'key': 'b', 'size': 1, 'fn': lambda: 'ok'}]
+    assert vt.DiskTransferScheduler().run(jobs) == {'a': None, 'b': 'ok'}
+
+
+def test_transfer_limits_and_task_rate_eta(monkeypatch):
+    assert vt.transfer_limits({'parallel_disks': '8', 'per_datastore_streams': 0,
+                               'per_storage_streams': 'x'}) == (8, 1, vt.PER_STORAGE_STREAMS)
+    assert vt.transfer_limits(None) == (vt.PARALLEL_DISKS, vt.PER_DATASTORE_STREAMS, vt.PER_STORAGE_STREAMS)
+
+    sample = {}
+    assert vt.update_rate(sample, 0, 1000, now=0.0) == (0.0, None)
+    assert vt.update_rate(sample, 100, 1000, now=1.0) == (100.0, 9)
+    rate, eta = vt.update_rate(sample, 300, 1000, now=2.0)
+    assert rate == 0.3 * 200 + 0.7 * 100 and eta == int(700 / rate)
+    assert vt.update_rate(sample, 1000, 1000, now=3.0)[1] == 0
+
+    monkeypatch.setattr('pegaprox.core.v2p.broadcast_sse', lambda *a, **k: None)
+    task = V2PMigrationTask('t1', 'vmw', 'vm-1', 'c1', 'pve1', 'local-lvm',
+                            config={'parallel_disks': 3, 'sparse_copy': False})
+    task.phase = 'pre_sync'
+    task.update_progress('disk0', 0, 10 * MB)
+    task.update_progress('disk0', 4 * MB, 10 * MB)
+    dp = task.disk_progress['disk0']
+    assert dp['pct'] == 40.0 and dp['bytes_per_sec'] > 0 and dp['eta_seconds'] is not None
+    assert task.to_dict()['config']['parallel_disks'] == 3 and task.sparse_copy is False
+
+
+def test_allocation_maps_to_extents_and_blocks():
+    qmap = [{'start': 0, 'length': 65536, 'depth': 0, 'data': True},
+            {'start': 65536, 'length': 10 * MB, 'depth': 0, 'data': False},
+            {'start': 20 * MB + 4096, 'length': 8192, 'data': True},
+            {'start': 30 * MB, 'length': MB, 'data': True, 'zero': True}]
+    ext = vt.merge_extents(vt.extents_from_qemu_map(qmap), 64 * MB)
+    assert ext == [(0, MB), (20 * MB, MB)]
+    assert vt.allocated_bytes(ext) == 2 * MB and vt.worth_sparse(ext, 64 * MB)
+    assert not vt.worth_sparse([(0, 60 * MB)], 64 * MB) and not vt.worth_sparse(None, 64 * MB)
+
+    # clipped to the disk size, overlaps merged, smallest gaps closed past max_extents
+    raw = [(0, MB), (MB // 2, MB), (10 * MB, MB), (13 * MB, MB), (40 * MB, 5 * MB)]
+    assert vt.merge_extents(raw, 42 * MB) == [(0, 2 * MB), (10 * MB, MB), (13 * MB, MB), (40 * MB, 2 * MB)]
+    assert vt.merge_extents(raw, 42 * MB, max_extents=2) == [(0, 14 * MB), (40 * MB, 2 * MB)]
+
+    blk = 256 * MB
+    assert vt.blocks_with_data([(0, MB), (blk - 1, 2), (5 * blk, 3 * blk)], blk, 7) == {0, 1, 5, 6}
+
+
+def test_merge_extents_scales_to_fragmented_maps():
+    def reference(ext, limit):       # the old one-gap-at-a-time loop
+        out = [[s, s + l] for s, l in ext]
+        while len(out) > limit:
+            gi = min(range(len(out) - 1), key=lambda i: out[i + 1][0] - out[i][1])
+            out[gi][1] = out[gi + 1][1]
+            del out[gi + 1]
+        return [(a, b - a) for a, b in out]
+
+    rnd = random.Random(7)
+    align = vt.EXTENT_ALIGN
+    ext, pos = [], 0
+    for _ in range(300):
+        pos += rnd.choice((1, 1, 2, 3, 5, 8)) * align
+        ext.append((pos, align))
+        pos += align
+    base = vt.merge_extents(ext, pos)
+    for limit in (1, 2, 17, 150, 299, 300):
+        assert vt.merge_extents(ext, pos, max_extents=limit) == reference(base, limit)
+
+    # a fragmented CBT map: 40k extents down to the sparse-copy cap in one pass
+    big = [(i * 3 * align, align) for i in range(40000)]
+    t0 = time.monotonic()
+    out = vt.merge_extents(big, 40000 * 3 * align, max_extents=512)
+    assert time.monotonic() - t0 < 2
+    assert len(out) == 512 and out[0][0] == 0 and sum(l for _, l in out) == (40000 + 2 * (40000 - 512)) * align
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Tests for the precomputed VM visibility sets (pegaprox/utils/rbac.py
+get_vm_visibility): every decision must match user_can_access_vm for ACL,
+pool, '*' and cross-tenant users, and writes must invalidate the cache."""
+import time
+
+import pegaprox.utils.rbac as rbac
+from pegaprox.utils.rbac import (
+    user_can_access_vm, get_vm_visibility, get_vm_list_visibility, invalidate_vm_acls_cache,
+)
+
+_VMIDS = (100, 101, 102, 200, 201, 300, 999)
+_PERMS = ('vm.view', 'vm.console', 'vm.snapshot', 'vm.delete')
+
+
+def _membership(cluster_id, data):
+    with rbac._pool_cache_lock:
+        rbac._pool_membership_cache[cluster_id] = {
+            'data': data, 'timestamp': time.time(), 'refreshing': False,
+        }
+
+
+def test_visibility_matches_user_can_access_vm(api, seed):
+    seed.tenant('default')
+    seed.tenant('acme', clusters=['cluster_1'])
+    seed.tenant('other', clusters=['cluster_2'])
+    _membership('cluster_1', {'200:qemu': 'gold', '201:lxc': 'silver', '300:qemu': 'gold'})
+    seed.vm_acl('cluster_1', 100, users=['acl'], inherit_role=True)
+    seed.vm_acl('cluster_1', 101, users=['acl'], inherit_role=False, permissions=['vm.view'])
+    seed.vm_acl('cluster_1', 102, users=['*'], inherit_role=True)
+    seed.vm_acl('cluster_1', 300, users=['ops'], inherit_role=False, permissions=['vm.console'])
+    seed.pool('cluster_1', 'gold', 'pooled', ['vm.view', 'vm.snapshot'])
+    seed.pool('cluster_1', 'silver', 'pooled', ['pool.admin'])
+    users = [
+        seed.user('ops', tenant_id='acme', permissions=['vm.view', 'vm.console', 'vm.snapshot']),
+        seed.user('acl', tenant_id='acme', permissions=['vm.view', 'vm.console']),
+        seed.user('pooled', tenant_id='acme', permissions=['vm.view']),
+        seed.user('foreign', tenant_id='other', permissions=['vm.view', 'vm.console']),
+        seed.user('viewer', role='viewer', tenant_id='acme'),
+        seed.user('root', role='admin'),
+    ]
+    with api.app.app_context():
+        for u in users:
+            for perm in _PERMS:
+                vis = get_vm_visibility(u, 'cluster_1', perm)
+                for vmid in _VMIDS:
+                    for vt in (None, 'qemu', 'lxc'):
+                        want = user_can_access_vm(u, 'cluster_1', vmid, perm, vt)
+                        assert vis.can(vmid, vt) == want, (u['username'], perm, vmid, vt)
+
+
+def test_visibility_cached_until_acl_write(api, seed):
+    seed.tenant('default')
+    seed.tenant('acme', clusters=['cluster_1'])
+    bob = seed.user('bob', tenant_id='acme', permissions=['vm.view'])
+    rows = [{'vmid': 100, 'type': 'qemu'}, {'vmid': 138, 'type': 'qemu'}]
+    with api.app.app_context():
+        vis = get_vm_visibility(bob, 'cluster_1')
+        assert vis.filter(rows) == rows
+        assert get_vm_visibility(bob, 'cluster_1') is vis
+
+        # bob gets scoped to VM 100 → the cached set must not survive the ACL write
+        seed.vm_acl('cluster_1', 100, users=['bob'])
+        invalidate_vm_acls_cache()
+        assert get_vm_visibility(bob, 'cluster_1').filter(rows) == rows[:1]
+
+        # restrictive /resources list: ACL'd VMs only for the named users
+        seed.vm_acl('cluster_1', 138, users=['carol'])
+        invalidate_vm_acls_cache()
+        assert get_vm_list_visibility(bob, 'cluster_1').filter(rows, type_key=None) == rows[:1]
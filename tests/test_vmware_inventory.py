@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Tests for the PropertyCollector-backed SOAP inventory
+(pegaprox/core/vmware.py SoapInventory): paged initial load, incremental
+enter/modify/leave updates and the manager's listings built from it."""
+from types import SimpleNamespace as NS
+
+import pytest
+
+pytest.importorskip('pyVmomi')
+from pyVmomi import vim
+
+from pegaprox.core.vmware import SoapInventory, VMwareManager
+
+
+def _enter(obj, **props):
+    return NS(kind='enter', obj=obj,
+              changeSet=[NS(name=k.replace('__', '.'), op='assign', val=v) for k, v in props.items()])
+
+
+class _FakePC:
+    def __init__(self, pages):
+        self.pages = pages
+        self.versions = []
+        self.filters = []
+
+    def CreateFilter(self, spec, partial):
+        self.filters.append(spec)
+        return NS(Destroy=lambda: None)
+
+    def WaitForUpdatesEx(self, version, opts):
+        self.versions.append(version)
+        if not self.pages:
+            return None
+        objs, truncated = self.pages.pop(0)
+        return NS(version=f'v{len(self.versions)}', truncated=truncated,
+                  filterSet=[NS(objectSet=objs)])
+
+    def Destroy(self):
+        pass
+
+
+def _content(pc):
+    view = vim.view.ContainerView('session[1]view-1')
+    return NS(rootFolder=vim.Folder('group-d1'),
+              viewManager=NS(CreateContainerView=lambda root, types, rec: view),
+              propertyCollector=NS(CreatePropertyCollector=lambda: pc))
+
+
+def test_paged_load_then_incremental_updates():
+    vm1, vm2 = vim.VirtualMachine('vm-1'), vim.VirtualMachine('vm-2')
+    pg = vim.dvs.DistributedVirtualPortgroup('dvportgroup-7')
+    pc = _FakePC([
+        ([_enter(vm1, name='web', config__hardware__numCPU=2, runtime__powerState='poweredOn')], True),
+        ([_enter(vm2, name='db'), _enter(pg, name='VM Network')], False),
+    ])
+    inv = SoapInventory(_content(pc))
+    assert inv.sync() is True
+    # one filter; both pages fetched, continuing from the truncated page's version
+    assert len(pc.filters) == 1 and pc.versions == ['', 'v1']
+    assert {m for m, _ in inv.rows('VirtualMachine')} == {'vm-1', 'vm-2'}
+    assert inv.lookup('Network', 'dvportgroup-7') is pg
+
+    assert inv.sync() is False                  # nothing changed → no data pulled
+    pc.pages.append(([NS(kind='modify', obj=vm1,
+                         changeSet=[NS(name='runtime.powerState', op='assign', val='poweredOff'),
+                                    NS(name='config.hardware.numCPU', op='remove', val=None)]),
+                      NS(kind='leave', obj=vm2, changeSet=[])], False))
+    assert inv.sync() is True
+    rows = dict(inv.rows('VirtualMachine'))
+    assert list(rows) == ['vm-1']
+    assert rows['vm-1'] == {'name': 'web', 'runtime.powerState': 'poweredOff'}
+
+
+def test_manager_listings_come_from_inventory():
+    vm = vim.VirtualMachine('vm-9')
+    host = vim.HostSystem('host-1')
+    pc = _FakePC([([
+        _enter(vm, name='app', config__name='app', config__hardware__numCPU=4,
+               config__hardware__memoryMB=8192, config__guestFullName='Debian',
+               runtime__powerState='poweredOn'),
+        _enter(host, name='esx1', runtime__connectionState='connected',
+               hardware__memorySize=2 ** 36),
+    ], False)])
+    mgr = VMwareManager('vm1', {'host': 'vc'})
+    mgr._connection_type = 'soap'
+    mgr._soap_content = _content(pc)
+
+    assert mgr.get_vms() == {'data': [{'vm': 'vm-9', 'name': 'app', 'power_state': 'POWERED_ON',
+                                       'cpu_count': 4, 'memory_size_MiB': 8192, 'guest_OS': 'Debian'}]}
+    hosts = mgr.get_hosts()['data']
+    assert hosts[0]['connection_state'] == 'CONNECTED' and hosts[0]['memory_bytes'] == 2 ** 36
+    # V2P / detail paths resolve the MoRef from the cache instead of walking a view
+    assert mgr._soap_get_managed_object(vim.VirtualMachine, 'vm-9') is vm
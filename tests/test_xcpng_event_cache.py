@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""Tests for the XAPI event cache (pegaprox/core/xcpng.py XapiRecordCache):
+bootstrap via get_all_records, event.from add/mod/del and building VM rows
+from the local records without per-object RPCs."""
+from types import SimpleNamespace
+
+from pegaprox.core.xcpng import XapiRecordCache, XcpngManager, _XapiRpcRecords
+
+
+class _Cls:
+    def __init__(self, records):
+        self.records = records
+        self.get_record_calls = 0
+
+    def get_all_records(self):
+        return dict(self.records)
+
+    def get_all(self):
+        return list(self.records)
+
+    def get_record(self, ref):
+        self.get_record_calls += 1
+        return self.records[ref]
+
+
+class _Event:
+    def __init__(self):
+        self.batches = []
+        self.seen_tokens = []
+
+    def _from(self, classes, token, timeout):
+        self.seen_tokens.append(token)
+        if not classes:
+            return {'events': [], 'token': 't0'}
+        events = self.batches.pop(0) if self.batches else []
+        return {'events': events, 'token': f't{len(self.seen_tokens)}'}
+
+
+class _FakeXenAPI:
+    def __init__(self):
+        self.host = _Cls({'OpaqueRef:h1': {'hostname': 'xcp1', 'metrics': 'OpaqueRef:hm1', 'PIFs': []}})
+        self.host_metrics = _Cls({'OpaqueRef:hm1': {'memory_total': 64, 'memory_free': 16}})
+        self.VM = _Cls({
+            'OpaqueRef:v1': _vm('u-1', 'web', 'OpaqueRef:h1', vbds=['OpaqueRef:b1'],
+                                gm='OpaqueRef:g1', metrics='OpaqueRef:m1'),
+            'OpaqueRef:tpl': dict(_vm('u-t', 'tpl', 'OpaqueRef:NULL'), is_a_template=True),
+        })
+        self.VM_metrics = _Cls({'OpaqueRef:m1': {'VCPUs_utilisation': {'0': 0.5, '1': 0.1},
+                                                 'memory_actual': 2048}})
+        self.VM_guest_metrics = _Cls({'OpaqueRef:g1': {'networks': {'0/ip': '10.0.0.5', '0/ipv4/0': '10.0.0.5'}}})
+        self.VBD = _Cls({'OpaqueRef:b1': {'type': 'Disk', 'VDI': 'OpaqueRef:d1'}})
+        self.VDI = _Cls({'OpaqueRef:d1': {'virtual_size': '1000'}})
+        self.PIF = _Cls({})
+        self.event = SimpleNamespace()
+        self._ev = _Event()
+        setattr(self.event, 'from', self._ev._from)
+
+
+def _vm(uuid, name, host, vbds=(), gm='OpaqueRef:NULL', metrics='OpaqueRef:NULL'):
+    return {'uuid': uuid, 'name_label': name, 'resident_on': host, 'power_state': 'Running',
+            'VCPUs_at_startup': 2, 'VCPUs_max': 2, 'memory_dynamic_max': 4096,
+            'metrics': metrics, 'guest_metrics': gm, 'VBDs': list(vbds)}
+
+
+def _mgr():
+    mgr = XcpngManager.__new__(XcpngManager)
+    mgr.id = 'x1'
+    mgr._xapi_cache = XapiRecordCache()
+    return mgr
+
+
+def test_bootstrap_and_event_stream(db):
+    api = _FakeXenAPI()
+    cache = XapiRecordCache()
+    cache.bootstrap(api)
+    assert cache.ready and cache.token == 't0'
+    assert set(cache.records['vm']) == {'OpaqueRef:v1', 'OpaqueRef:tpl'}
+
+    api._ev.batches.append([
+        {'class': 'vm', 'operation': 'add', 'ref': 'OpaqueRef:v2',
+         'snapshot': _vm('u-2', 'db', 'OpaqueRef:h1')},
+        {'class': 'VM_metrics', 'operation': 'mod', 'ref': 'OpaqueRef:m1',
+         'snapshot': {'VCPUs_utilisation': {'0': 1.0}, 'memory_actual': 4096}},
+        {'class': 'vm', 'operation': 'del', 'ref': 'OpaqueRef:tpl'},
+        {'class': 'SR', 'operation': 'mod', 'ref': 'OpaqueRef:sr', 'snapshot': {}},
+    ])
+    changed = cache.pump(api, timeout=0)
+    assert changed == {'vm', 'vm_metrics'}
+    assert api._ev.seen_tokens[-1] == 't0' and cache.token == 't2'
+    assert set(cache.records['vm']) == {'OpaqueRef:v1', 'OpaqueRef:v2'}
+
+    rows = {r['name']: r for r in _mgr()._build_vms(cache)}
+    assert set(rows) == {'web', 'db'}
+    web = rows['web']
+    assert web['node'] == 'xcp1' and web['cpu'] == 1.0 and web['mem'] == 4096
+    assert web['maxdisk'] == 1000 and web['ip_addresses'] == ['10.0.0.5']
+    assert rows['db']['vmid'] != web['vmid']
+    # built entirely from the local maps
+    assert api.VM.get_record_calls == 0 and api.host.get_record_calls == 0
+
+
+def test_rpc_fallback_builds_same_rows(db):
+    api = _FakeXenAPI()
+    cache = XapiRecordCache()
+    cache.bootstrap(api)
+    mgr = _mgr()
+    from_cache = mgr._build_vms(cache)
+    from_rpc = mgr._build_vms(_XapiRpcRecords(api))
+    assert from_rpc == from_cache
+    # per-build memo: the host record is fetched once, not once per VM
+    assert api.host.get_record_calls == 1
+
+    # not bootstrapped yet → builders go through RPC
+    assert isinstance(mgr._records(api), _XapiRpcRecords)
+    mgr._xapi_cache = cache
+    assert mgr._records(api) is cache
+    cache.reset()
+    assert isinstance(mgr._records(api), _XapiRpcRecords)
+
+
+def test_pool_without_event_from_stays_on_polling(db, monkeypatch):
+    import logging
+    import threading
+    from pegaprox.core import xcpng
+
+    api = _FakeXenAPI()
+    calls = []
+
+    def unknown(classes, token, timeout):
+        calls.append(token)
+        raise Exception("['MESSAGE_METHOD_UNKNOWN', 'event.from']")
+    setattr(api.event, 'from', unknown)
+    session = SimpleNamespace(xenapi=SimpleNamespace(**vars(api)))
+    session.xenapi.session = SimpleNamespace(logout=lambda: None)
+
+    mgr = _mgr()
+    mgr.stop_event, mgr.running, mgr.is_connected = threading.Event(), False, True
+    mgr.logger = logging.getLogger('test.xcpng')
+    mgr._events_unsupported, mgr._event_thread = False, None
+    mgr._open_session = lambda: session
+    monkeypatch.setattr(xcpng, 'XENAPI_AVAILABLE', True)
+    monkeypatch.setattr(mgr, '_run_loop', lambda: None)
+
+    mgr._event_loop()
+    assert mgr._events_unsupported and len(calls) == 1 and not mgr._xapi_cache.ready
+    # a restart doesn't probe event.from again
+    mgr.start()
+    mgr.stop_event.set()
+    assert mgr._event_thread is None
+    mgr._event_loop()
+    assert len(calls) == 1
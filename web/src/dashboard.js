@@ -8335,6 +8335,7 @@
             const selectedClusterRef = useRef(null);  // for ws callback, dont ask
             const expandedSidebarClustersRef = useRef({});
             const sseClientIdRef = useRef(null);  // capture from SSE connected msg
+            const resourceMirrorRef = useRef({});  // NS Oct 2026 - cluster_id -> {seq, rows: Map(vmid -> row)} for resources_delta
             const sidebarClusterDataRef = useRef({});
             // NS May 2026 — per-cluster fail counter + skip-until timestamp
             // to suppress 503 spam when a cluster keeps failing.
@@ -10556,7 +10557,24 @@
                 let isClosing = false;
                 let sseToken = null;
                 let tokenRefreshInterval = null;
-                
+                const resyncRequestedAt = {};
+
+                // NS Oct 2026 - a resources_delta whose base doesn't match our mirror means we
+                // missed a frame: ask the backend to re-send that cluster's snapshot on this stream.
+                // Throttled per cluster, the deltas keep coming while the snapshot is in flight.
+                const requestResourceResync = (clusterId) => {
+                    const cid = sseClientIdRef.current;
+                    if (!cid || !clusterId) return;
+                    const now = Date.now();
+                    if (resyncRequestedAt[clusterId] && now - resyncRequestedAt[clusterId] < 3000) return;
+                    resyncRequestedAt[clusterId] = now;
+                    authFetch(`${API_URL}/sse/resync`, {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'application/json' },
+                        body: JSON.stringify({ client_id: cid, clusters: [clusterId] })
+                    }).catch(() => {});  // next delta retries
+                };
+
                 // Get SSE token (more secure than session ID in URL)
                 const getSseToken = async () => {
                     try {
@@ -10640,6 +10658,7 @@
 
                             if (data.type === 'connected') {
                                 sseClientIdRef.current = data.client_id;
+                                resourceMirrorRef.current = {};  // new stream - snapshots follow
                                 console.log('SSE authenticated, client:', data.client_id);
                             } else if (data.type === 'tasks') {
                                 // Tasks kommen mit cluster_id - nur vom aktuellen Cluster anzeigen
@@ -10729,14 +10748,46 @@
                                         return { ...prev, [data.cluster_id]: { ...prev[data.cluster_id], metrics: data.data } };
                                     });
                                 }
-                            } else if (data.type === 'resources') {
+                            } else if (data.type === 'resources' || data.type === 'resources_delta') {
+                                // NS Oct 2026: the backend sends a `resources` snapshot (with seq) on
+                                // connect/subscribe/resync and `resources_delta` frames
+                                // ({seq, base, added, removed, changed}) after that. We keep a per-cluster
+                                // mirror keyed by vmid; untouched rows keep their object identity.
+                                const mirrors = resourceMirrorRef.current;
+                                let list;
+                                if (data.type === 'resources') {
+                                    list = Array.isArray(data.data) ? data.data : [];
+                                    if (data.seq !== undefined) {
+                                        mirrors[data.cluster_id] = { seq: data.seq, rows: new Map(list.map(r => [r.vmid, r])) };
+                                    }
+                                } else {
+                                    const d = data.data || {};
+                                    let m = mirrors[data.cluster_id];
+                                    if (!m && d.base === 0) m = mirrors[data.cluster_id] = { seq: 0, rows: new Map() };
+                                    if (!m || m.seq !== d.base) {
+                                        delete mirrors[data.cluster_id];
+                                        requestResourceResync(data.cluster_id);
+                                        return;
+                                    }
+                                    (d.removed || []).forEach(k => m.rows.delete(k));
+                                    (d.added || []).forEach(r => m.rows.set(r.vmid, r));
+                                    (d.changed || []).forEach(c => {
+                                        const cur = m.rows.get(c.vmid);
+                                        if (!cur) return;
+                                        const next = { ...cur, ...c.set };
+                                        (c.unset || []).forEach(f => { delete next[f]; });
+                                        m.rows.set(c.vmid, next);
+                                    });
+                                    m.seq = d.seq;
+                                    list = [...m.rows.values()].sort((a, b) => (a.vmid || 0) - (b.vmid || 0));
+                                }
                                 if (currentCluster && data.cluster_id === currentCluster.id) {
                                     // NS Jul 2026 (render-perf): skip the array swap on a no-op/
                                     // keepalive frame so the VM grid doesn't re-filter/re-render
                                     // every second (window.pegaproxVmList is the last-applied list)
-                                    if (!areResourcesEqual(window.pegaproxVmList, data.data)) {
-                                        setClusterResources(data.data);
-                                        window.pegaproxVmList = data.data;
+                                    if (!areResourcesEqual(window.pegaproxVmList, list)) {
+                                        setClusterResources(list);
+                                        window.pegaproxVmList = list;
                                         setLastUpdate(new Date());
                                     }
                                 }
@@ -10744,8 +10795,8 @@
                                 if (data.cluster_id && (!currentCluster || data.cluster_id !== currentCluster.id)) {
                                     setSidebarClusterData(prev => {
                                         if (!prev[data.cluster_id]) return prev;
-                                        if (areResourcesEqual(prev[data.cluster_id].resources, data.data)) return prev;
-                                        return { ...prev, [data.cluster_id]: { ...prev[data.cluster_id], resources: data.data } };
+                                        if (areResourcesEqual(prev[data.cluster_id].resources, list)) return prev;
+                                        return { ...prev, [data.cluster_id]: { ...prev[data.cluster_id], resources: list } };
                                     });
                                 }
                             } else if (data.type === 'vm_config') {
@@ -12567,6 +12618,9 @@
             // NS: Mar 2026 - update SSE subscription when sidebar clusters change
             // 300ms debounce to batch rapid toggles
             const sseSubTimer = useRef(null);
+            // NS Oct 2026 - {clusterId: [vmid]} of guests open on screen, sent along so
+            // the server polls their guest agent first (sseFocusKey effect further down)
+            const sseFocusRef = useRef({});
             const updateSseSubscription = useCallback((expanded, selCluster) => {
                 if (sseSubTimer.current) clearTimeout(sseSubTimer.current);
                 sseSubTimer.current = setTimeout(() => {
@@ -12579,7 +12633,7 @@
                     authFetch(`${API_URL}/sse/subscribe`, {
                         method: 'POST',
                         headers: { 'Content-Type': 'application/json' },
-                        body: JSON.stringify({ client_id: cid, clusters })
+                        body: JSON.stringify({ client_id: cid, clusters, focus: sseFocusRef.current })
                     }).catch(() => {});  // best effort
                 }, 300);
             }, []);
@@ -13053,7 +13107,8 @@
                     
                     if (response && response.ok) {
                         const result = await response.json();
-                        addToast(`${result.successful}/${result.total} ${t('migrationsStarted') || 'migrations started'}`);
+                        addToast(`${result.successful}/${result.total} ${t('migrationsStarted') || 'migrations started'}`
+                            + (result.queued ? `, ${result.queued} ${t('migrationsQueued') || 'queued'}` : ''));
                         setTimeout(() => fetchClusterResources(selectedCluster.id), 3000);
                     } else if (response) {
                         const err = await response.json();
@@ -13336,6 +13391,20 @@
                 setConfigVm(resource);
             };
 
+            // NS Oct 2026 - re-subscribe when the guest detail view or config modal changes
+            const sseFocusKey = [selectedSidebarVm && `${selectedSidebarVm._clusterId}:${selectedSidebarVm.vmid}`,
+                                 configVm && `${configVm._clusterId || selectedCluster?.id}:${configVm.vmid}`].join('|');
+            useEffect(() => {
+                const focus = {};
+                sseFocusKey.split('|').filter(Boolean).forEach(k => {
+                    const i = k.lastIndexOf(':');
+                    const c = k.slice(0, i), v = Number(k.slice(i + 1));
+                    if (c && c !== 'undefined' && v) (focus[c] = focus[c] || []).push(v);
+                });
+                sseFocusRef.current = focus;
+                if (sseClientIdRef.current) updateSseSubscription(expandedSidebarClusters, selectedCluster);
+            }, [sseFocusKey]);
+
             const handleCloseConfig = () => {
                 // NS: Feb 2026 - Refresh correct cluster's resources after config changes
                 const cId = configVm?._clusterId || selectedCluster?.id;